@@ -0,0 +1,173 @@
+"""Crear tablas de rollup diario de ventas.
+
+Agregados por (empresa, sucursal, día local) que mantiene
+``app.services.sales_rollup_service``: totales del día y cortes por categoría,
+producto, medio de pago, vendedor y hora. Dashboard y reporte de ventas leen
+de acá en lugar de re-agregar ``sale``/``saleitem`` en cada carga.
+
+Las tablas nacen vacías: después de aplicar la migración hay que poblarlas con
+``python scripts/rebuild_sales_rollup.py --all`` (idempotente). Creación
+DEFENSIVA (solo si no existen), igual que ``z2b3c4d5``.
+
+Revision ID: z3c4d5e6
+Revises: z2b3c4d5
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "z3c4d5e6"
+down_revision = "z2b3c4d5"
+branch_labels = None
+depends_on = None
+
+
+def _existing_tables() -> set[str]:
+    return set(sa.inspect(op.get_bind()).get_table_names())
+
+
+def _money(name: str) -> sa.Column:
+    return sa.Column(name, sa.Numeric(14, 2), nullable=False, server_default="0")
+
+
+def _quantity(name: str) -> sa.Column:
+    return sa.Column(name, sa.Numeric(18, 4), nullable=False, server_default="0")
+
+
+def _count(name: str) -> sa.Column:
+    return sa.Column(name, sa.Integer(), nullable=False, server_default="0")
+
+
+def _create_rollup_table(
+    table: str,
+    key_columns: list[sa.Column],
+    value_columns: list[sa.Column],
+    unique_name: str,
+) -> None:
+    op.create_table(
+        table,
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("company_id", sa.Integer(), nullable=False),
+        sa.Column("branch_id", sa.Integer(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        *key_columns,
+        *value_columns,
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["company_id"], ["company.id"]),
+        sa.ForeignKeyConstraint(["branch_id"], ["branch.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "company_id",
+            "branch_id",
+            "day",
+            *[column.name for column in key_columns],
+            name=unique_name,
+        ),
+    )
+    op.create_index(f"ix_{table}_company_id", table, ["company_id"])
+    op.create_index(f"ix_{table}_branch_id", table, ["branch_id"])
+
+
+def upgrade() -> None:
+    existing = _existing_tables()
+
+    if "salesdailyrollup" not in existing:
+        _create_rollup_table(
+            "salesdailyrollup",
+            [],
+            [
+                _count("sales_count"),
+                _money("gross_amount"),
+                _money("items_amount"),
+                _money("cost_amount"),
+                _money("discount_amount"),
+                _count("credit_count"),
+                _money("credit_amount"),
+                _count("refund_count"),
+                _money("refund_amount"),
+                _money("refund_cost_amount"),
+            ],
+            "uq_salesdailyrollup_tenant_day",
+        )
+
+    if "salescategoryrollup" not in existing:
+        _create_rollup_table(
+            "salescategoryrollup",
+            [sa.Column("category", sa.String(length=100), nullable=False)],
+            [
+                _count("sales_count"),
+                _quantity("quantity"),
+                _money("gross_amount"),
+                _money("cost_amount"),
+                _money("discount_amount"),
+                _quantity("refund_quantity"),
+                _money("refund_amount"),
+                _money("refund_cost_amount"),
+            ],
+            "uq_salescategoryrollup_tenant_day_category",
+        )
+
+    if "salesproductrollup" not in existing:
+        _create_rollup_table(
+            "salesproductrollup",
+            [
+                sa.Column("product_id", sa.Integer(), nullable=False),
+                sa.Column("product_name", sa.String(length=255), nullable=False),
+                sa.Column("category", sa.String(length=100), nullable=False),
+            ],
+            [
+                _count("sales_count"),
+                _quantity("quantity"),
+                _money("gross_amount"),
+                _money("cost_amount"),
+                _quantity("refund_quantity"),
+                _money("refund_amount"),
+                _money("refund_cost_amount"),
+            ],
+            "uq_salesproductrollup_tenant_day_product",
+        )
+        op.create_index(
+            "ix_salesproductrollup_tenant_product_day",
+            "salesproductrollup",
+            ["company_id", "branch_id", "product_id", "day"],
+        )
+
+    if "salespaymentrollup" not in existing:
+        _create_rollup_table(
+            "salespaymentrollup",
+            [
+                sa.Column("method_type", sa.String(length=50), nullable=False),
+                sa.Column("payment_method_id", sa.Integer(), nullable=False),
+            ],
+            [_count("payments_count"), _money("amount")],
+            "uq_salespaymentrollup_tenant_day_method",
+        )
+
+    if "salesuserrollup" not in existing:
+        _create_rollup_table(
+            "salesuserrollup",
+            [sa.Column("user_id", sa.Integer(), nullable=False)],
+            [_count("sales_count"), _money("gross_amount")],
+            "uq_salesuserrollup_tenant_day_user",
+        )
+
+    if "saleshourrollup" not in existing:
+        _create_rollup_table(
+            "saleshourrollup",
+            [sa.Column("hour", sa.Integer(), nullable=False)],
+            [_count("sales_count"), _money("gross_amount")],
+            "uq_saleshourrollup_tenant_day_hour",
+        )
+
+
+def downgrade() -> None:
+    existing = _existing_tables()
+    for table in (
+        "saleshourrollup",
+        "salesuserrollup",
+        "salespaymentrollup",
+        "salesproductrollup",
+        "salescategoryrollup",
+        "salesdailyrollup",
+    ):
+        if table in existing:
+            op.drop_table(table)
@@ -0,0 +1,45 @@
+"""Índice (company_id, branch_id, description) en product.
+
+Soporta la paginación keyset del listado de inventario, que ordena por
+``(description, id)`` dentro de la sucursal: con este índice cada página es
+un rango del índice (InnoDB agrega el id) en vez de ordenar todo el catálogo.
+``ix_product_search`` (category, description) no arranca por tenant y no
+sirve para ese orden.
+
+Idempotencia: verifica existencia previa.
+
+Revision ID: z4d5e6f7
+Revises: z3c4d5e6
+"""
+from __future__ import annotations
+
+from alembic import op
+from sqlalchemy import inspect as sa_inspect
+
+revision = "z4d5e6f7"
+down_revision = "z3c4d5e6"
+branch_labels = None
+depends_on = None
+
+INDEX_NAME = "ix_product_tenant_description"
+
+
+def _has_index(conn, table: str, name: str) -> bool:
+    inspector = sa_inspect(conn)
+    if table not in inspector.get_table_names():
+        return False
+    return any(idx.get("name") == name for idx in inspector.get_indexes(table))
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    if "product" in sa_inspect(conn).get_table_names() and not _has_index(
+        conn, "product", INDEX_NAME
+    ):
+        op.create_index(INDEX_NAME, "product", ["company_id", "branch_id", "description"])
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    if _has_index(conn, "product", INDEX_NAME):
+        op.drop_index(INDEX_NAME, table_name="product")
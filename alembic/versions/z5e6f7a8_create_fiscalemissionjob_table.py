@@ -0,0 +1,78 @@
+"""Crear tabla fiscalemissionjob (cola de emisión fiscal).
+
+``VentaState.confirm_sale`` ya no emite el comprobante en una tarea suelta del
+proceso: encola una fila acá y los workers de ``app.services.fiscal_queue`` la
+procesan (orden por empresa, backoff y tope de concurrencia por proveedor).
+Una fila por ``(company_id, sale_id, receipt_type)``.
+
+Creación DEFENSIVA (solo si no existe), igual que ``z2b3c4d5``.
+
+Revision ID: z5e6f7a8
+Revises: z4d5e6f7
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "z5e6f7a8"
+down_revision = "z4d5e6f7"
+branch_labels = None
+depends_on = None
+
+
+def _existing_tables() -> set[str]:
+    return set(sa.inspect(op.get_bind()).get_table_names())
+
+
+def upgrade() -> None:
+    if "fiscalemissionjob" in _existing_tables():
+        return
+    op.create_table(
+        "fiscalemissionjob",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("company_id", sa.Integer(), nullable=False),
+        sa.Column("branch_id", sa.Integer(), nullable=False),
+        sa.Column("sale_id", sa.Integer(), nullable=False),
+        sa.Column("receipt_type", sa.String(length=20), nullable=False),
+        sa.Column("buyer_doc_type", sa.String(length=5), nullable=True),
+        sa.Column("buyer_doc_number", sa.String(length=20), nullable=True),
+        sa.Column("buyer_name", sa.String(length=255), nullable=True),
+        sa.Column("provider", sa.String(length=20), nullable=False, server_default=""),
+        sa.Column("status", sa.String(length=20), nullable=False, server_default="queued"),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("next_attempt_at", sa.DateTime(), nullable=False),
+        sa.Column("locked_until", sa.DateTime(), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("fiscal_document_id", sa.Integer(), nullable=True),
+        sa.Column("fiscal_status", sa.String(length=20), nullable=True),
+        sa.Column("full_number", sa.String(length=30), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["company_id"], ["company.id"]),
+        sa.ForeignKeyConstraint(["branch_id"], ["branch.id"]),
+        sa.ForeignKeyConstraint(["sale_id"], ["sale.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(
+            ["fiscal_document_id"], ["fiscaldocument.id"], ondelete="SET NULL"
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "company_id",
+            "sale_id",
+            "receipt_type",
+            name="uq_fiscalemissionjob_company_sale_type",
+        ),
+    )
+    op.create_index(
+        "ix_fiscalemissionjob_status_next",
+        "fiscalemissionjob",
+        ["status", "next_attempt_at"],
+    )
+    op.create_index(
+        "ix_fiscalemissionjob_company_status",
+        "fiscalemissionjob",
+        ["company_id", "status"],
+    )
+
+
+def downgrade() -> None:
+    if "fiscalemissionjob" in _existing_tables():
+        op.drop_table("fiscalemissionjob")
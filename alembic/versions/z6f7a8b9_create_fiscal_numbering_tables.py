@@ -0,0 +1,76 @@
+"""Crear tablas fiscalnumberblock y fiscalquotacounter.
+
+Numeración de comprobantes por bloques reservados por emisor
+(``app.services.fiscal_numbering``) y contador de cuota mensual fuera de
+``companybillingconfig``: con varias terminales por empresa la emisión ya no
+se serializa en el ``FOR UPDATE`` de la config.
+
+Creación DEFENSIVA (solo si no existe), igual que ``z2b3c4d5``.
+
+Revision ID: z6f7a8b9
+Revises: z5e6f7a8
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "z6f7a8b9"
+down_revision = "z5e6f7a8"
+branch_labels = None
+depends_on = None
+
+
+def _existing_tables() -> set[str]:
+    return set(sa.inspect(op.get_bind()).get_table_names())
+
+
+def upgrade() -> None:
+    existing = _existing_tables()
+    if "fiscalnumberblock" not in existing:
+        op.create_table(
+            "fiscalnumberblock",
+            sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column("company_id", sa.Integer(), nullable=False),
+            sa.Column("serie_kind", sa.String(length=10), nullable=False),
+            sa.Column("serie", sa.String(length=10), nullable=False),
+            sa.Column("range_start", sa.Integer(), nullable=False),
+            sa.Column("range_end", sa.Integer(), nullable=False),
+            sa.Column("next_number", sa.Integer(), nullable=False),
+            sa.Column("holder", sa.String(length=64), nullable=False, server_default=""),
+            sa.Column("status", sa.String(length=20), nullable=False, server_default="open"),
+            sa.Column("lease_until", sa.DateTime(), nullable=True),
+            sa.Column("voided_count", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.Column("updated_at", sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(["company_id"], ["company.id"]),
+            sa.PrimaryKeyConstraint("id"),
+            sa.CheckConstraint(
+                "range_end >= range_start", name="ck_fiscalnumberblock_range"
+            ),
+        )
+        op.create_index(
+            "ix_fiscalnumberblock_company_kind_status",
+            "fiscalnumberblock",
+            ["company_id", "serie_kind", "status"],
+        )
+    if "fiscalquotacounter" not in existing:
+        op.create_table(
+            "fiscalquotacounter",
+            sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column("company_id", sa.Integer(), nullable=False),
+            sa.Column("period", sa.String(length=6), nullable=False),
+            sa.Column("used", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("updated_at", sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(["company_id"], ["company.id"]),
+            sa.PrimaryKeyConstraint("id"),
+            sa.UniqueConstraint(
+                "company_id", "period", name="uq_fiscalquotacounter_company_period"
+            ),
+        )
+
+
+def downgrade() -> None:
+    existing = _existing_tables()
+    if "fiscalquotacounter" in existing:
+        op.drop_table("fiscalquotacounter")
+    if "fiscalnumberblock" in existing:
+        op.drop_table("fiscalnumberblock")
@@ -0,0 +1,45 @@
+"""Crear tabla replica_heartbeat.
+
+Fila única (id=1) que ``app.utils.db_read`` actualiza en el primario y relee
+desde la réplica de lectura para medir el lag de replicación: si la réplica
+va atrasada, las lecturas vuelven al primario.
+
+Creación DEFENSIVA (solo si no existe), igual que ``z2b3c4d5``.
+
+Revision ID: z7a8b9c0
+Revises: z6f7a8b9
+"""
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "z7a8b9c0"
+down_revision = "z6f7a8b9"
+branch_labels = None
+depends_on = None
+
+
+def _existing_tables() -> set[str]:
+    return set(sa.inspect(op.get_bind()).get_table_names())
+
+
+def upgrade() -> None:
+    if "replica_heartbeat" in _existing_tables():
+        return
+    table = op.create_table(
+        "replica_heartbeat",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("beat_at", sa.DateTime(timezone=False), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    # La fila existe desde el arranque: el monitor sólo hace UPDATE.
+    op.bulk_insert(
+        table,
+        [{"id": 1, "beat_at": datetime.now(timezone.utc).replace(tzinfo=None)}],
+    )
+
+
+def downgrade() -> None:
+    if "replica_heartbeat" in _existing_tables():
+        op.drop_table("replica_heartbeat")
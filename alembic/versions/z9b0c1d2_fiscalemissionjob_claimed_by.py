@@ -0,0 +1,35 @@
+"""Agregar fiscalemissionjob.claimed_by (dueño del lease).
+
+El worker que toma un job escribe su identificador acá y sólo asienta el
+resultado o renueva el lease si la fila sigue siendo suya: si el lease venció
+y otra réplica retomó el job, el worker viejo no pisa su estado.
+
+Idempotente y reversible.
+
+Revision ID: z9b0c1d2
+Revises: z7a8b9c0
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "z9b0c1d2"
+down_revision = "z7a8b9c0"
+branch_labels = None
+depends_on = None
+
+TABLE = "fiscalemissionjob"
+
+
+def _has_column(column: str) -> bool:
+    inspector = sa.inspect(op.get_bind())
+    return any(col["name"] == column for col in inspector.get_columns(TABLE))
+
+
+def upgrade() -> None:
+    if not _has_column("claimed_by"):
+        op.add_column(TABLE, sa.Column("claimed_by", sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    if _has_column("claimed_by"):
+        op.drop_column(TABLE, "claimed_by")
@@ -4,12 +4,14 @@ Health check y endpoints API personalizados para TUWAYKI.
 Se integran con Reflex via `api_transformer` en app.py.
 Reflex 0.8.x utiliza Starlette como framework ASGI subyacente.
 
-Incluye lifespan handler para el fiscal retry worker (background task).
+Incluye lifespan handler para el fiscal retry worker (background task), el
+dispatcher de la cola de emisión fiscal, la renovación de tickets WSAA y los monitores de ``/api/metrics`` (lag del event loop, latencia de Redis).
 """
 from __future__ import annotations
 
 import asyncio
 import contextlib
+import hmac
 import logging
 import os
 import random
@@ -18,7 +20,7 @@ from datetime import datetime, timezone
 
 from starlette.applications import Starlette
 from starlette.requests import Request
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, PlainTextResponse, Response
 from starlette.routing import Route
 
 _logger = logging.getLogger("api")
@@ -26,7 +28,21 @@ _logger = logging.getLogger("api")
 # Timestamp de arranque para cálculo de uptime.
 _BOOT_TS = time.monotonic()
 
+from app.utils.db_read import (
+    dispose_read_engines,
+    read_replica_configured,
+    read_routing_status,
+    replica_heartbeat_monitor,
+)
 from app.utils.env import APP_SURFACE
+from app.utils.metrics import (
+    CONTENT_TYPE as _METRICS_CONTENT_TYPE,
+    METRICS_ENABLED,
+    METRICS_TOKEN,
+    event_loop_lag_monitor,
+    redis_latency_monitor,
+    render_metrics,
+)
 _VERSION_FILE = os.path.join(os.path.dirname(__file__), "..", "VERSION")
 
 
@@ -100,6 +116,10 @@ async def _health_check(request: Request) -> JSONResponse:
             "redis": {"ok": redis_ok, "error": redis_err},
         },
     }
+    if read_replica_configured():
+        # Informativo: con la réplica atrasada las lecturas van al primario,
+        # así que no degrada la instancia.
+        payload["checks"]["db_read"] = read_routing_status()
     return JSONResponse(content=payload, status_code=200 if all_ok else 503)
 
 
@@ -112,6 +132,21 @@ async def _ping(request: Request) -> JSONResponse:
     return JSONResponse(content={"pong": True}, status_code=200)
 
 
+async def _metrics(request: Request) -> Response:
+    """Métricas Prometheus del proceso (ver :mod:`app.utils.metrics`).
+
+    Con ``METRICS_TOKEN`` configurado exige ``Authorization: Bearer``; sin
+    token, el proxy público no debe rutear ``/api/metrics``.
+    """
+    if not METRICS_ENABLED:
+        return Response(status_code=404)
+    if METRICS_TOKEN:
+        supplied = request.headers.get("authorization", "")
+        if not hmac.compare_digest(supplied, f"Bearer {METRICS_TOKEN}"):
+            return Response(status_code=401)
+    return PlainTextResponse(render_metrics(), media_type=_METRICS_CONTENT_TYPE)
+
+
 # ── Fiscal Retry Worker (background task) ──────────────────
 _FISCAL_RETRY_INTERVAL_SECONDS = int(
     os.getenv("FISCAL_RETRY_INTERVAL", "1800")  # 30 min default
@@ -154,6 +189,34 @@ async def _fiscal_retry_loop():
         await asyncio.sleep(delay)
 
 
+_AFIP_WSAA_REFRESH_ENABLED = os.getenv("AFIP_WSAA_REFRESH_ENABLED", "1").strip() != "0"
+
+
+async def _afip_wsaa_refresh_loop():
+    """Renueva tickets WSAA antes de que venzan (ver app.services.afip_wsaa)."""
+    from app.services.afip_wsaa import (
+        AFIP_WSAA_REFRESH_INTERVAL_SECONDS,
+        refresh_expiring_credentials,
+    )
+
+    await asyncio.sleep(random.uniform(0, 30))
+    while True:
+        try:
+            refreshed = await refresh_expiring_credentials()
+            if refreshed:
+                _logger.info("WSAA: %d tickets renovados por adelantado", refreshed)
+        except Exception:
+            _logger.exception("Error renovando tickets WSAA")
+        await asyncio.sleep(AFIP_WSAA_REFRESH_INTERVAL_SECONDS)
+
+
+async def _fiscal_queue_loop():
+    """Dispatcher de la cola de emisión fiscal (ver app.services.fiscal_queue)."""
+    from app.services.fiscal_queue import FiscalQueueDispatcher
+
+    await FiscalQueueDispatcher().run()
+
+
 @contextlib.asynccontextmanager
 async def _lifespan(app):
     """Lifespan handler: inicia background tasks al arrancar y libera
@@ -168,6 +231,18 @@ async def _lifespan(app):
             APP_SURFACE,
             sorted(_FISCAL_RETRY_SURFACES),
         )
+    if _FISCAL_RETRY_ALLOWED_HERE:
+        from app.services.fiscal_queue import FISCAL_QUEUE_ENABLED
+
+        if FISCAL_QUEUE_ENABLED:
+            tasks.append(asyncio.create_task(_fiscal_queue_loop()))
+        if _AFIP_WSAA_REFRESH_ENABLED:
+            tasks.append(asyncio.create_task(_afip_wsaa_refresh_loop()))
+    if METRICS_ENABLED:
+        tasks.append(asyncio.create_task(event_loop_lag_monitor()))
+        tasks.append(asyncio.create_task(redis_latency_monitor()))
+    if read_replica_configured():
+        tasks.append(asyncio.create_task(replica_heartbeat_monitor()))
     try:
         yield
     finally:
@@ -176,12 +251,36 @@ async def _lifespan(app):
             task.cancel()
             with contextlib.suppress(asyncio.CancelledError):
                 await task
+        # Bloques de correlativos de este proceso: el sobrante vuelve a la
+        # serie (o queda anulado) en vez de esperar el lease.
+        try:
+            from app.services.fiscal_numbering import (
+                FISCAL_NUMBER_BLOCK_SIZE,
+                default_holder,
+                reconcile_number_blocks,
+            )
+
+            if FISCAL_NUMBER_BLOCK_SIZE > 1:
+                await reconcile_number_blocks(default_holder())
+        except Exception:
+            _logger.exception("Error reconciliando bloques de numeración en shutdown")
+        # Clientes HTTP compartidos (Nubefact, AFIP, lookups): cierra sus
+        # conexiones keep-alive.
+        try:
+            from app.utils.http_client import close_http_clients
+            await close_http_clients()
+        except Exception:
+            _logger.exception("Error cerrando clientes HTTP en shutdown")
         # Cerrar pool async de MySQL para evitar Aborted_clients en RDS.
         try:
             from app.utils.db import dispose_engine
             await dispose_engine()
         except Exception:
             _logger.exception("Error cerrando engine async en shutdown")
+        try:
+            await dispose_read_engines()
+        except Exception:
+            _logger.exception("Error cerrando engines de la réplica en shutdown")
 
 
 # Starlette app con las rutas de operaciones.
@@ -189,6 +288,7 @@ health_app = Starlette(
     routes=[
         Route("/api/health", _health_check, methods=["GET"]),
         Route("/api/ping", _ping, methods=["GET"]),
+        Route("/api/metrics", _metrics, methods=["GET"]),
     ],
     lifespan=_lifespan,
 )
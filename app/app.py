@@ -75,6 +75,13 @@ from app.components.notification import NotificationHolder
 from app.api import health_app
 
 from app.utils.env import APP_SURFACE
+from app.utils.db_read import (
+    ReadRoutingMiddleware,
+    read_replica_configured,
+    register_read_routing_listeners,
+)
+from app.utils.metrics import METRICS_ENABLED, EventMetricsMiddleware
+from app.utils.state_size import STATE_SIZE_TRACKING, StateSizeMiddleware
 
 PUBLIC_SITE_URL = (os.getenv("PUBLIC_SITE_URL") or "https://tuwayki.app").strip().rstrip("/")
 LANDING_TITLE = "TUWAYKISHOP | Sistema de Ventas para tiendas, servicios y reservas"
@@ -477,6 +484,15 @@ app = rx.App(
     ],
 )
 
+if METRICS_ENABLED:
+    app.add_middleware(EventMetricsMiddleware())
+if STATE_SIZE_TRACKING:
+    app.add_middleware(StateSizeMiddleware())
+if read_replica_configured():
+    # Read-your-writes: quien acaba de escribir lee del primario.
+    register_read_routing_listeners()
+    app.add_middleware(ReadRoutingMiddleware())
+
 PRIVATE_META = [{"name": "robots", "content": "noindex,nofollow"}]
 
 
@@ -1208,7 +1208,7 @@ def filter_action_buttons(
     on_export: Callable | None = None,
     search_text: str = "Buscar",
     clear_text: str = "Limpiar",
-    export_text: str = "Exportar",
+    export_text: str | rx.Var = "Exportar",
 ) -> rx.Component:
     """
     Crea un grupo de botones de accion para filtros.
@@ -27,6 +27,7 @@ class _Messages:
     PERM_SALES = "No tiene permisos para crear ventas."
     PERM_DELETE_SALE = "No tiene permisos para eliminar ventas."
     PERM_EXPORT = "No tiene permisos para exportar datos."
+    PERM_RATE_LIMITED = "Demasiadas solicitudes. Espere {seconds} s e intente de nuevo."
 
     # ── Validaciones genéricas ────────────────────────────────
     VAL_COMPANY_UNDEFINED = "Empresa no definida."
@@ -71,6 +72,9 @@ class _Messages:
     # ── Historial / Exportación ───────────────────────────────
     HIST_NO_CLOSINGS_EXPORT = "No hay cierres para exportar."
     HIST_NO_INCOMES_EXPORT = "No hay ingresos para exportar."
+    EXPORT_IN_PROGRESS = "Ya hay una exportación en curso."
+    EXPORT_FAILED = "No se pudo generar el archivo: {detail}"
+    EXPORT_TIMEOUT = "La exportación está tardando demasiado. Intente de nuevo en unos minutos."
 
     # ── Facturación Electrónica ───────────────────────────────
     FISCAL_CONFIG_SAVED = "Configuración de facturación guardada."
@@ -125,6 +129,17 @@ class _Messages:
     )
     FISCAL_NC_FAILED = "No se pudo emitir la Nota de Crédito."
     FISCAL_NC_ERROR = "Error al emitir la Nota de Crédito."
+    # Estado de la emisión de la última venta (modal del recibo).
+    FISCAL_QUEUE_QUEUED = "Comprobante electrónico en cola de envío."
+    FISCAL_QUEUE_RUNNING = "Enviando comprobante a SUNAT/AFIP..."
+    FISCAL_QUEUE_RETRYING = "SUNAT/AFIP no respondió; se reintenta automáticamente."
+    FISCAL_QUEUE_AUTHORIZED = "Comprobante {full_number} autorizado."
+    FISCAL_QUEUE_REJECTED = (
+        "Comprobante {full_number} rechazado. Revise los documentos fiscales."
+    )
+    FISCAL_QUEUE_FAILED = (
+        "No se pudo emitir el comprobante. Revise los documentos fiscales."
+    )
 
     # ── Lookup fiscal (consulta RUC/CUIT) ─────────────────────
     LOOKUP_RUC_BAD_STATUS = (
@@ -38,14 +38,28 @@ from .sales import (
     SaleReturn,
     SaleReturnItem,
 )
+from .sales_rollup import (
+    SalesCategoryRollup,
+    SalesDailyRollup,
+    SalesHourRollup,
+    SalesPaymentRollup,
+    SalesProductRollup,
+    SalesUserRollup,
+)
 # PriceList ANTES de Client — Client.price_list_id referencia pricelist.id
 from .price_lists import PriceList, PriceListItem
 from .client import Client
 # billing DESPUÉS de sales — FiscalDocument.sale necesita que Sale
 # esté registrado en el class registry de SQLAlchemy.
-from .billing import CompanyBillingConfig, FiscalDocument
+from .billing import (
+    CompanyBillingConfig,
+    FiscalDocument,
+    FiscalEmissionJob,
+    FiscalNumberBlock,
+    FiscalQuotaCounter,
+)
 from .lookup_cache import DocumentLookupCache
-from .platform_config import PlatformBillingSettings
+from .platform_config import PlatformBillingSettings, ReplicaHeartbeat
 # Presupuestos DESPUÉS de sales y client (FK a sale.id y client.id)
 from .quotations import Quotation, QuotationItem
 # Promociones: FK opcional a product.id
@@ -96,10 +110,20 @@ __all__ = [
     "OwnerAuditLog",
     "SaleReturn",
     "SaleReturnItem",
+    "SalesDailyRollup",
+    "SalesCategoryRollup",
+    "SalesProductRollup",
+    "SalesPaymentRollup",
+    "SalesUserRollup",
+    "SalesHourRollup",
     "CompanyBillingConfig",
     "FiscalDocument",
+    "FiscalEmissionJob",
+    "FiscalNumberBlock",
+    "FiscalQuotaCounter",
     "DocumentLookupCache",
     "PlatformBillingSettings",
+    "ReplicaHeartbeat",
     "Quotation",
     "QuotationItem",
     "Promotion",
@@ -12,6 +12,9 @@ Seguridad:
 Multi-tenant:
     - CompanyBillingConfig: scoped por company_id (una config por empresa).
     - FiscalDocument: scoped por company_id + branch_id (un doc por venta).
+    - FiscalEmissionJob: cola de emisión, ordenada por company_id.
+    - FiscalNumberBlock / FiscalQuotaCounter: numeración por bloques y cuota
+      mensual, scoped por company_id.
 """
 from __future__ import annotations
 
@@ -519,3 +522,206 @@ class FiscalDocument(SQLModel, table=True):
     # Nota: la relación bidireccional se define solo desde Sale
     # (sale.fiscal_document) para evitar problemas de resolución
     # de nombres cross-file con el registry de SQLAlchemy/Reflex.
+
+
+# ═════════════════════════════════════════════════════════════
+# COLA DE EMISIÓN FISCAL
+# ═════════════════════════════════════════════════════════════
+
+
+class FiscalEmissionJob(SQLModel, table=True):
+    """Emisión fiscal pendiente de una venta (cola durable).
+
+    La encola ``VentaState.confirm_sale`` después del commit de la venta y la
+    consumen los workers de ``app.services.fiscal_queue``: el cajero no espera
+    la respuesta de SUNAT/AFIP. Dentro de una empresa los jobs se procesan en
+    orden de ``id`` (uno a la vez), así la numeración correlativa sigue el
+    orden de las ventas.
+
+    Ciclo de vida (status):
+        queued → running → done      (autorizado, rechazado o sin billing)
+        queued → running → queued    (error transitorio, con backoff)
+        queued → running → failed    (agotó los reintentos del documento)
+    """
+
+    __tablename__ = "fiscalemissionjob"
+
+    __table_args__ = (
+        UniqueConstraint(
+            "company_id",
+            "sale_id",
+            "receipt_type",
+            name="uq_fiscalemissionjob_company_sale_type",
+        ),
+        sqlalchemy.Index(
+            "ix_fiscalemissionjob_status_next",
+            "status",
+            "next_attempt_at",
+        ),
+        sqlalchemy.Index(
+            "ix_fiscalemissionjob_company_status",
+            "company_id",
+            "status",
+        ),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+    company_id: int = Field(foreign_key="company.id", nullable=False)
+    branch_id: int = Field(foreign_key="branch.id", nullable=False)
+    sale_id: int = Field(
+        sa_column=sqlalchemy.Column(
+            sqlalchemy.Integer,
+            sqlalchemy.ForeignKey("sale.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+    )
+
+    # ── Datos de la emisión (argumentos de emit_fiscal_document) ──
+    receipt_type: str = Field(max_length=20)
+    buyer_doc_type: Optional[str] = Field(default=None, max_length=5)
+    buyer_doc_number: Optional[str] = Field(default=None, max_length=20)
+    buyer_name: Optional[str] = Field(default=None, max_length=255)
+    provider: str = Field(
+        default="",
+        max_length=20,
+        description="Upstream HTTP del proveedor fiscal (nubefact, afip_wsfe).",
+    )
+
+    # ── Estado de la cola ────────────────────────────────────
+    status: str = Field(default="queued", max_length=20)
+    attempts: int = Field(default=0)
+    next_attempt_at: datetime = Field(
+        default_factory=utc_now_naive,
+        sa_column=sqlalchemy.Column(sqlalchemy.DateTime(timezone=False), nullable=False),
+    )
+    locked_until: Optional[datetime] = Field(
+        default=None,
+        sa_column=sqlalchemy.Column(sqlalchemy.DateTime(timezone=False), nullable=True),
+        description="Fin del lease del worker que lo tomó (running).",
+    )
+    claimed_by: Optional[str] = Field(
+        default=None,
+        max_length=64,
+        description="Worker dueño del lease; sólo él renueva o asienta el resultado.",
+    )
+    last_error: Optional[str] = Field(
+        default=None,
+        sa_column=sqlalchemy.Column(Text, nullable=True),
+    )
+
+    # ── Resultado (snapshot del FiscalDocument para el POS) ──
+    fiscal_document_id: Optional[int] = Field(
+        default=None,
+        sa_column=sqlalchemy.Column(
+            sqlalchemy.Integer,
+            sqlalchemy.ForeignKey("fiscaldocument.id", ondelete="SET NULL"),
+            nullable=True,
+        ),
+    )
+    fiscal_status: Optional[str] = Field(default=None, max_length=20)
+    full_number: Optional[str] = Field(default=None, max_length=30)
+
+    created_at: datetime = Field(
+        default_factory=utc_now_naive,
+        sa_column=sqlalchemy.Column(sqlalchemy.DateTime(timezone=False)),
+    )
+    updated_at: datetime = Field(
+        default_factory=utc_now_naive,
+        sa_column=sqlalchemy.Column(sqlalchemy.DateTime(timezone=False)),
+    )
+
+
+# ═════════════════════════════════════════════════════════════
+# NUMERACIÓN POR BLOQUES Y CUOTA MENSUAL
+# ═════════════════════════════════════════════════════════════
+
+
+class FiscalNumberBlock(SQLModel, table=True):
+    """Rango de correlativos reservado para un emisor (worker / terminal).
+
+    ``app.services.fiscal_numbering`` reserva ``[range_start, range_end]`` de
+    una serie en una transacción corta sobre ``CompanyBillingConfig`` y
+    después cada emisión toma ``next_number`` de su propio bloque, sin
+    competir por la fila de la config.
+
+    Ciclo de vida (status):
+        open → closed          (se usaron todos los números)
+        open → reconciled      (abandonado: el resto se devolvió a la serie
+                                o quedó anulado en ``voided_count``)
+
+    El holder renueva ``lease_until`` con cada número; un bloque con lease
+    vencido lo adopta otro emisor antes de reservar uno nuevo.
+    """
+
+    __tablename__ = "fiscalnumberblock"
+
+    __table_args__ = (
+        CheckConstraint(
+            "range_end >= range_start",
+            name="ck_fiscalnumberblock_range",
+        ),
+        sqlalchemy.Index(
+            "ix_fiscalnumberblock_company_kind_status",
+            "company_id",
+            "serie_kind",
+            "status",
+        ),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+    company_id: int = Field(foreign_key="company.id", nullable=False)
+    serie_kind: str = Field(
+        max_length=10,
+        description="Contador de la config: 'factura' o 'boleta'.",
+    )
+    serie: str = Field(max_length=10)
+    range_start: int
+    range_end: int
+    next_number: int
+    holder: str = Field(default="", max_length=64)
+    status: str = Field(default="open", max_length=20)
+    lease_until: Optional[datetime] = Field(
+        default=None,
+        sa_column=sqlalchemy.Column(sqlalchemy.DateTime(timezone=False), nullable=True),
+    )
+    voided_count: int = Field(
+        default=0,
+        description="Números del bloque que no se emitieron ni volvieron a la serie.",
+    )
+
+    created_at: datetime = Field(
+        default_factory=utc_now_naive,
+        sa_column=sqlalchemy.Column(sqlalchemy.DateTime(timezone=False)),
+    )
+    updated_at: datetime = Field(
+        default_factory=utc_now_naive,
+        sa_column=sqlalchemy.Column(sqlalchemy.DateTime(timezone=False)),
+    )
+
+
+class FiscalQuotaCounter(SQLModel, table=True):
+    """Documentos emitidos por empresa y mes (cuota del plan).
+
+    Fila propia por período ``YYYYMM`` para que descontar cuota sea un
+    ``UPDATE ... WHERE used < límite`` atómico y no un lock de
+    ``CompanyBillingConfig``.
+    """
+
+    __tablename__ = "fiscalquotacounter"
+
+    __table_args__ = (
+        UniqueConstraint(
+            "company_id",
+            "period",
+            name="uq_fiscalquotacounter_company_period",
+        ),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+    company_id: int = Field(foreign_key="company.id", nullable=False)
+    period: str = Field(max_length=6)
+    used: int = Field(default=0)
+    updated_at: datetime = Field(
+        default_factory=utc_now_naive,
+        sa_column=sqlalchemy.Column(sqlalchemy.DateTime(timezone=False)),
+    )
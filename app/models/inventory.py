@@ -47,6 +47,12 @@ class Product(TenantMixin, SQLModel, table=True):
             "branch_id",
             "barcode",
         ),
+        sqlalchemy.Index(
+            "ix_product_tenant_description",
+            "company_id",
+            "branch_id",
+            "description",
+        ),
     )
 
     __mapper_args__ = {"eager_defaults": True}
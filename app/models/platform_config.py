@@ -55,3 +55,26 @@ class PlatformBillingSettings(SQLModel, table=True):
         ),
         description="Última actualización de configuración por el Owner.",
     )
+
+
+REPLICA_HEARTBEAT_ID = 1  # Singleton — siempre id=1
+
+
+class ReplicaHeartbeat(SQLModel, table=True):
+    """Latido escrito en el primario para medir el lag de la réplica (id=1).
+
+    ``app.utils.db_read`` actualiza ``beat_at`` en el primario cada pocos
+    segundos y lo relee desde la réplica: la diferencia con el reloj actual es
+    el retraso de replicación. No pertenece a ningún tenant.
+    """
+
+    __tablename__ = "replica_heartbeat"
+
+    id: int | None = Field(default=None, primary_key=True)
+    beat_at: datetime = Field(
+        default_factory=utc_now_naive,
+        sa_column=sqlalchemy.Column(
+            sqlalchemy.DateTime(timezone=False), nullable=False
+        ),
+        description="Último latido escrito en el primario (UTC naive).",
+    )
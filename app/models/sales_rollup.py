@@ -0,0 +1,219 @@
+"""Rollups diarios de ventas por tenant y día LOCAL.
+
+Tablas de agregados que mantiene ``app.services.sales_rollup_service`` de
+forma incremental (misma transacción que la venta, devolución o anulación)
+para que dashboard y reportes no re-agreguen ``Sale``/``SaleItem`` en cada
+carga. Fuente de verdad: las tablas transaccionales; estas se pueden
+reconstruir con ``scripts/rebuild_sales_rollup.py``.
+
+Convenciones:
+  * ``day`` es la fecha LOCAL de la sucursal (timezone de ``CompanySettings``).
+  * Las ventas se imputan al día de la venta; las devoluciones (``refund_*``)
+    al día de la devolución, igual que las queries crudas del dashboard.
+  * Claves "sin valor" usan 0 / "" (no NULL) para que el UNIQUE funcione en
+    MySQL, que admite múltiples NULL.
+"""
+from datetime import date, datetime
+from decimal import Decimal
+
+from sqlmodel import Field, SQLModel
+import sqlalchemy
+from sqlalchemy import Numeric
+
+from app.utils.timezone import utc_now_naive
+
+from ._mixins import TenantMixin
+
+
+def _money_column() -> sqlalchemy.Column:
+    return sqlalchemy.Column(Numeric(14, 2), nullable=False, server_default="0")
+
+
+def _quantity_column() -> sqlalchemy.Column:
+    return sqlalchemy.Column(Numeric(18, 4), nullable=False, server_default="0")
+
+
+def _updated_at_column() -> sqlalchemy.Column:
+    return sqlalchemy.Column(sqlalchemy.DateTime(timezone=False), nullable=True)
+
+
+class SalesDailyRollup(TenantMixin, SQLModel, table=True):
+    """Totales del día: ventas, costo, descuentos, crédito y devoluciones."""
+
+    __tablename__ = "salesdailyrollup"
+
+    __table_args__ = (
+        sqlalchemy.UniqueConstraint(
+            "company_id", "branch_id", "day", name="uq_salesdailyrollup_tenant_day"
+        ),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+    day: date = Field(sa_column=sqlalchemy.Column(sqlalchemy.Date, nullable=False))
+    sales_count: int = Field(default=0, nullable=False)
+    gross_amount: Decimal = Field(default=Decimal("0.00"), sa_column=_money_column())
+    # Suma de SaleItem.subtotal (base del margen; puede diferir de gross_amount
+    # por redondeos o reservas cobradas).
+    items_amount: Decimal = Field(default=Decimal("0.00"), sa_column=_money_column())
+    cost_amount: Decimal = Field(default=Decimal("0.00"), sa_column=_money_column())
+    discount_amount: Decimal = Field(default=Decimal("0.00"), sa_column=_money_column())
+    credit_count: int = Field(default=0, nullable=False)
+    credit_amount: Decimal = Field(default=Decimal("0.00"), sa_column=_money_column())
+    refund_count: int = Field(default=0, nullable=False)
+    refund_amount: Decimal = Field(default=Decimal("0.00"), sa_column=_money_column())
+    refund_cost_amount: Decimal = Field(default=Decimal("0.00"), sa_column=_money_column())
+    updated_at: datetime | None = Field(
+        default_factory=utc_now_naive, sa_column=_updated_at_column()
+    )
+
+
+class SalesCategoryRollup(TenantMixin, SQLModel, table=True):
+    """Totales del día por categoría (snapshot del ítem vendido)."""
+
+    __tablename__ = "salescategoryrollup"
+
+    __table_args__ = (
+        sqlalchemy.UniqueConstraint(
+            "company_id",
+            "branch_id",
+            "day",
+            "category",
+            name="uq_salescategoryrollup_tenant_day_category",
+        ),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+    day: date = Field(sa_column=sqlalchemy.Column(sqlalchemy.Date, nullable=False))
+    category: str = Field(default="", max_length=100, nullable=False)
+    sales_count: int = Field(default=0, nullable=False)
+    quantity: Decimal = Field(default=Decimal("0.0000"), sa_column=_quantity_column())
+    gross_amount: Decimal = Field(default=Decimal("0.00"), sa_column=_money_column())
+    cost_amount: Decimal = Field(default=Decimal("0.00"), sa_column=_money_column())
+    discount_amount: Decimal = Field(default=Decimal("0.00"), sa_column=_money_column())
+    refund_quantity: Decimal = Field(default=Decimal("0.0000"), sa_column=_quantity_column())
+    refund_amount: Decimal = Field(default=Decimal("0.00"), sa_column=_money_column())
+    refund_cost_amount: Decimal = Field(default=Decimal("0.00"), sa_column=_money_column())
+    updated_at: datetime | None = Field(
+        default_factory=utc_now_naive, sa_column=_updated_at_column()
+    )
+
+
+class SalesProductRollup(TenantMixin, SQLModel, table=True):
+    """Totales del día por producto (id + snapshots de nombre/categoría).
+
+    ``product_id = 0`` agrupa ítems sin producto (cobro de reservas).
+    """
+
+    __tablename__ = "salesproductrollup"
+
+    __table_args__ = (
+        sqlalchemy.UniqueConstraint(
+            "company_id",
+            "branch_id",
+            "day",
+            "product_id",
+            "product_name",
+            "category",
+            name="uq_salesproductrollup_tenant_day_product",
+        ),
+        sqlalchemy.Index(
+            "ix_salesproductrollup_tenant_product_day",
+            "company_id",
+            "branch_id",
+            "product_id",
+            "day",
+        ),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+    day: date = Field(sa_column=sqlalchemy.Column(sqlalchemy.Date, nullable=False))
+    product_id: int = Field(default=0, nullable=False)
+    product_name: str = Field(default="", max_length=255, nullable=False)
+    category: str = Field(default="", max_length=100, nullable=False)
+    sales_count: int = Field(default=0, nullable=False)
+    quantity: Decimal = Field(default=Decimal("0.0000"), sa_column=_quantity_column())
+    gross_amount: Decimal = Field(default=Decimal("0.00"), sa_column=_money_column())
+    cost_amount: Decimal = Field(default=Decimal("0.00"), sa_column=_money_column())
+    refund_quantity: Decimal = Field(default=Decimal("0.0000"), sa_column=_quantity_column())
+    refund_amount: Decimal = Field(default=Decimal("0.00"), sa_column=_money_column())
+    refund_cost_amount: Decimal = Field(default=Decimal("0.00"), sa_column=_money_column())
+    updated_at: datetime | None = Field(
+        default_factory=utc_now_naive, sa_column=_updated_at_column()
+    )
+
+
+class SalesPaymentRollup(TenantMixin, SQLModel, table=True):
+    """Totales del día por medio de pago (``SalePayment``)."""
+
+    __tablename__ = "salespaymentrollup"
+
+    __table_args__ = (
+        sqlalchemy.UniqueConstraint(
+            "company_id",
+            "branch_id",
+            "day",
+            "method_type",
+            "payment_method_id",
+            name="uq_salespaymentrollup_tenant_day_method",
+        ),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+    day: date = Field(sa_column=sqlalchemy.Column(sqlalchemy.Date, nullable=False))
+    method_type: str = Field(default="", max_length=50, nullable=False)
+    payment_method_id: int = Field(default=0, nullable=False)
+    payments_count: int = Field(default=0, nullable=False)
+    amount: Decimal = Field(default=Decimal("0.00"), sa_column=_money_column())
+    updated_at: datetime | None = Field(
+        default_factory=utc_now_naive, sa_column=_updated_at_column()
+    )
+
+
+class SalesUserRollup(TenantMixin, SQLModel, table=True):
+    """Totales del día por vendedor (``user_id = 0``: sin usuario)."""
+
+    __tablename__ = "salesuserrollup"
+
+    __table_args__ = (
+        sqlalchemy.UniqueConstraint(
+            "company_id",
+            "branch_id",
+            "day",
+            "user_id",
+            name="uq_salesuserrollup_tenant_day_user",
+        ),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+    day: date = Field(sa_column=sqlalchemy.Column(sqlalchemy.Date, nullable=False))
+    user_id: int = Field(default=0, nullable=False)
+    sales_count: int = Field(default=0, nullable=False)
+    gross_amount: Decimal = Field(default=Decimal("0.00"), sa_column=_money_column())
+    updated_at: datetime | None = Field(
+        default_factory=utc_now_naive, sa_column=_updated_at_column()
+    )
+
+
+class SalesHourRollup(TenantMixin, SQLModel, table=True):
+    """Totales del día por hora local (0-23)."""
+
+    __tablename__ = "saleshourrollup"
+
+    __table_args__ = (
+        sqlalchemy.UniqueConstraint(
+            "company_id",
+            "branch_id",
+            "day",
+            "hour",
+            name="uq_saleshourrollup_tenant_day_hour",
+        ),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+    day: date = Field(sa_column=sqlalchemy.Column(sqlalchemy.Date, nullable=False))
+    hour: int = Field(default=0, nullable=False)
+    sales_count: int = Field(default=0, nullable=False)
+    gross_amount: Decimal = Field(default=Decimal("0.00"), sa_column=_money_column())
+    updated_at: datetime | None = Field(
+        default_factory=utc_now_naive, sa_column=_updated_at_column()
+    )
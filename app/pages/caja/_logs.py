@@ -30,7 +30,7 @@ def _cashbox_log_filters() -> rx.Component:
       on_search=State.apply_cashbox_log_filters,
       on_clear=State.reset_cashbox_log_filters,
       on_export=State.export_cashbox_sessions,
-      export_text="Exportar",
+      export_text=State.export_button_label,
     ),
     class_name="grid grid-cols-1 sm:grid-cols-2 lg:grid-cols-3 gap-4 items-end",
   )
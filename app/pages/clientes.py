@@ -10,6 +10,7 @@ from app.components.ui import (
   empty_state,
   modal_container,
   page_header,
+  pagination_controls,
   permission_guard,
 )
 
@@ -614,10 +615,22 @@ def clientes_page() -> rx.Component:
           class_name="hidden md:block overflow-x-auto",
         ),
         rx.cond(
-          State.clients_view.length() == 0,
+          State.clients_total == 0,
           empty_state("No hay clientes registrados."),
           rx.fragment(),
         ),
+        rx.cond(
+          State.clients_total_pages > 1,
+          pagination_controls(
+            current_page=State.clients_page,
+            total_pages=State.clients_total_pages,
+            on_prev=State.prev_clients_page,
+            on_next=State.next_clients_page,
+            on_goto=lambda p: State.set_clients_page(p),
+            page_window=State.clients_page_window,
+          ),
+          rx.fragment(),
+        ),
         class_name=f"{CARD_STYLES['default']} flex flex-col gap-4",
       ),
       class_name="flex flex-col gap-6 p-4 sm:p-6 w-full",
@@ -813,7 +813,7 @@ def cuentas_page() -> rx.Component:
               class_name="hidden md:block overflow-x-auto",
             ),
             rx.cond(
-              State.debtors.length() == 0,
+              State.debtors_total == 0,
               empty_state("No hay clientes con deuda registrada."),
               rx.fragment(),
             ),
@@ -885,7 +885,7 @@ def cuentas_page() -> rx.Component:
               class_name="hidden md:block overflow-x-auto",
             ),
             rx.cond(
-              State.installments_rows.length() == 0,
+              State.installments_total == 0,
               empty_state("No hay cuotas registradas para este filtro."),
               rx.fragment(),
             ),
@@ -88,8 +88,9 @@ def history_filters() -> rx.Component:
       ),
       rx.el.button(
         rx.icon("download", class_name="h-4 w-4"),
-        "Exportar",
+        State.export_button_label,
         on_click=State.export_to_excel,
+        disabled=State.export_job_running,
         class_name=BUTTON_STYLES["success"],
       ),
     ]
@@ -275,7 +275,12 @@ def import_modal() -> rx.Component:
       rx.el.button(
         rx.cond(
           State.import_processing,
-          rx.fragment(rx.icon("loader-circle", class_name="h-4 w-4 animate-spin"), "Importando..."),
+          rx.fragment(
+            rx.icon("loader-circle", class_name="h-4 w-4 animate-spin"),
+            "Importando... ",
+            State.import_progress.to_string(),
+            "%",
+          ),
           rx.fragment(rx.icon("check", class_name="h-4 w-4"), "Confirmar importación"),
         ),
         on_click=State.confirm_import,
@@ -717,3 +722,158 @@ def inventory_adjustment_modal() -> rx.Component:
     ),
     rx.fragment(),
   )
+
+
+def bulk_price_modal() -> rx.Component:
+  """Modal de ajuste masivo de precios de venta (sucursal o categoría)."""
+  return modal_container(
+    is_open=State.bulk_price_modal_open,
+    on_close=State.close_bulk_price_modal,
+    title="Ajustar precios",
+    description="Aplica un ajuste al precio de venta de todos los productos de la sucursal o de una categoría.",
+    max_width="max-w-2xl",
+    children=[
+      rx.el.div(
+        rx.el.div(
+          rx.el.label("Alcance", class_name=TYPOGRAPHY["label"]),
+          rx.el.select(
+            rx.el.option("Todas las categorías", value="__all__"),
+            rx.foreach(
+              State.categories,
+              lambda c: rx.el.option(c, value=c),
+            ),
+            value=rx.cond(State.bulk_price_category == "", "__all__", State.bulk_price_category),
+            on_change=State.set_bulk_price_category,
+            class_name=INPUT_STYLES["default"],
+          ),
+          class_name="flex flex-col gap-1",
+        ),
+        rx.el.div(
+          rx.el.label("Tipo de ajuste", class_name=TYPOGRAPHY["label"]),
+          rx.el.select(
+            rx.el.option("Porcentaje (%)", value="percent"),
+            rx.el.option("Monto fijo", value="amount"),
+            rx.el.option("Recalcular por margen", value="margin"),
+            value=State.bulk_price_kind,
+            on_change=State.set_bulk_price_kind,
+            class_name=INPUT_STYLES["default"],
+          ),
+          class_name="flex flex-col gap-1",
+        ),
+        rx.el.div(
+          rx.el.label(
+            rx.match(
+              State.bulk_price_kind,
+              ("percent", "Porcentaje (negativo = baja)"),
+              ("amount", "Monto (negativo = baja)"),
+              "Margen % (vacío = margen de cada producto)",
+            ),
+            class_name=TYPOGRAPHY["label"],
+          ),
+          rx.el.input(
+            type="number",
+            step="0.01",
+            value=State.bulk_price_value,
+            on_change=State.set_bulk_price_value,
+            class_name=INPUT_STYLES["default"],
+          ),
+          class_name="flex flex-col gap-1",
+        ),
+        rx.el.div(
+          rx.el.label("Redondeo", class_name=TYPOGRAPHY["label"]),
+          rx.el.div(
+            rx.el.select(
+              rx.el.option("0.01", value="0.01"),
+              rx.el.option("0.10", value="0.10"),
+              rx.el.option("0.50", value="0.50"),
+              rx.el.option("1.00", value="1"),
+              value=State.bulk_price_round_step,
+              on_change=State.set_bulk_price_round_step,
+              class_name=INPUT_STYLES["default"],
+            ),
+            rx.el.select(
+              rx.el.option("Al más cercano", value="nearest"),
+              rx.el.option("Hacia arriba", value="up"),
+              rx.el.option("Hacia abajo", value="down"),
+              value=State.bulk_price_round_mode,
+              on_change=State.set_bulk_price_round_mode,
+              class_name=INPUT_STYLES["default"],
+            ),
+            class_name="grid grid-cols-2 gap-2",
+          ),
+          class_name="flex flex-col gap-1",
+        ),
+        class_name="grid grid-cols-1 sm:grid-cols-2 gap-3",
+      ),
+      rx.cond(
+        State.bulk_price_stats["matched"].to(int) > 0,
+        rx.el.div(
+          rx.el.p(
+            State.bulk_price_stats["changed"].to_string(),
+            " de ",
+            State.bulk_price_stats["matched"].to_string(),
+            " precios cambiarían (",
+            State.bulk_price_stats["skipped"].to_string(),
+            " sin precio base o costo, se omiten).",
+            class_name="text-sm text-slate-700",
+          ),
+          rx.cond(
+            State.bulk_price_preview.length() > 0,
+            rx.el.div(
+              rx.el.table(
+                rx.el.thead(
+                  rx.el.tr(
+                    rx.el.th("Producto", scope="col", class_name=TABLE_STYLES["header_cell"]),
+                    rx.el.th("Actual", scope="col", class_name=TABLE_STYLES["header_cell"] + " text-right"),
+                    rx.el.th("Nuevo", scope="col", class_name=TABLE_STYLES["header_cell"] + " text-right"),
+                    class_name=TABLE_STYLES["header"],
+                  ),
+                ),
+                rx.el.tbody(
+                  rx.foreach(
+                    State.bulk_price_preview,
+                    lambda row: rx.el.tr(
+                      rx.el.td(row["description"], class_name="py-2 px-3 text-sm truncate max-w-[260px]"),
+                      rx.el.td(row["old_price"], class_name="py-2 px-3 text-sm text-right text-slate-500"),
+                      rx.el.td(row["new_price"], class_name="py-2 px-3 text-sm text-right font-semibold"),
+                      class_name="border-b border-slate-100",
+                    ),
+                  ),
+                ),
+                class_name="min-w-full",
+              ),
+              class_name="max-h-64 overflow-y-auto border border-slate-200 rounded-lg",
+            ),
+            rx.fragment(),
+          ),
+          class_name="flex flex-col gap-2 bg-slate-50 border border-slate-200 rounded-lg p-3",
+        ),
+        rx.fragment(),
+      ),
+    ],
+    footer=rx.el.div(
+      rx.el.button(
+        "Cancelar",
+        on_click=State.close_bulk_price_modal,
+        class_name=BUTTON_STYLES["ghost"],
+      ),
+      rx.el.button(
+        rx.icon("eye", class_name="h-4 w-4"),
+        "Vista previa",
+        on_click=State.preview_bulk_price,
+        disabled=State.bulk_price_processing,
+        class_name=BUTTON_STYLES["ghost"],
+      ),
+      rx.el.button(
+        rx.cond(
+          State.bulk_price_processing,
+          rx.fragment(rx.icon("loader-circle", class_name="h-4 w-4 animate-spin"), "Aplicando..."),
+          rx.fragment(rx.icon("check", class_name="h-4 w-4"), "Aplicar ajuste"),
+        ),
+        on_click=State.apply_bulk_price,
+        disabled=rx.cond(State.bulk_price_stats["changed"].to(int) > 0, State.bulk_price_processing, True),
+        class_name=BUTTON_STYLES["primary_sm"],
+      ),
+      class_name="flex items-center justify-end gap-3",
+    ),
+  )
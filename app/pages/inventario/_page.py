@@ -13,7 +13,12 @@ from app.components.ui import (
   permission_guard,
 )
 from ._edit_product import edit_product_modal
-from ._modals import import_modal, stock_details_modal, inventory_adjustment_modal
+from ._modals import (
+  bulk_price_modal,
+  import_modal,
+  inventory_adjustment_modal,
+  stock_details_modal,
+)
 from ._product_table import inventory_stat_card, _product_card
 from ._movements_section import movements_section
 from ._transfer_modal import (
@@ -225,6 +230,13 @@ def inventario_page() -> rx.Component:
             ),
             rx.fragment(),
           ),
+          rx.el.button(
+            rx.icon("percent", class_name="h-4 w-4"),
+            "Ajustar precios",
+            on_click=State.open_bulk_price_modal,
+            class_name=BUTTON_STYLES["ghost"],
+            title="Ajuste masivo de precios de venta",
+          ),
           rx.el.button(
             rx.icon("tag", class_name="h-4 w-4"),
             "Etiquetas",
@@ -608,6 +620,7 @@ def inventario_page() -> rx.Component:
     edit_product_modal(),
     stock_details_modal(),
     import_modal(),
+    bulk_price_modal(),
     transfer_modal(),
     transfer_detail_modal(),
     on_mount=[State.refresh_inventory_cache, rx.call_script(_inventario_keyboard_js())],
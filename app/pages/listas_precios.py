@@ -257,17 +257,17 @@ def _tab_precios() -> rx.Component:
                     rx.debounce_input(
                         rx.input(
                             placeholder="Buscar producto por nombre o código...",
-                            value=State.pl_item_product_search,
-                            on_change=State.pl_search_products,
+                            value=State.picker_query,
+                            on_change=State.set_picker_query,
                             class_name=INPUT_STYLES["default"],
                         ),
                         debounce_timeout=400,
                     ),
                     rx.cond(
-                        State.pl_item_product_results.length() > 0,
+                        State.picker_rows.length() > 0,
                         rx.el.div(
                             rx.foreach(
-                                State.pl_item_product_results,
+                                State.picker_rows,
                                 lambda p: rx.el.div(
                                     rx.el.p(p["description"], class_name="text-sm font-medium"),
                                     rx.el.p(p["barcode"], class_name="text-xs text-slate-400 font-mono"),
@@ -275,6 +275,17 @@ def _tab_precios() -> rx.Component:
                                     class_name="px-3 py-2 hover:bg-indigo-50 cursor-pointer border-b border-slate-100",
                                 ),
                             ),
+                            rx.cond(
+                                State.picker_has_more,
+                                rx.el.button(
+                                    "Cargar más",
+                                    on_click=State.picker_load_more,
+                                    disabled=State.picker_loading,
+                                    type="button",
+                                    class_name="w-full py-2 text-xs font-medium text-indigo-600 hover:bg-indigo-50",
+                                ),
+                                rx.fragment(),
+                            ),
                             class_name="absolute z-50 w-full bg-white border border-slate-200 rounded-xl shadow-lg max-h-48 overflow-y-auto",
                         ),
                         rx.fragment(),
@@ -316,6 +327,11 @@ def _tab_precios() -> rx.Component:
                             step="1",
                             class_name="h-8 w-20 px-2 text-sm border border-slate-200 rounded-lg text-center focus:outline-none focus:ring-2 focus:ring-amber-400/30 focus:border-amber-400",
                         ),
+                        rx.el.button(
+                            "Vista previa",
+                            on_click=State.preview_bulk_discount,
+                            class_name="text-xs px-3 py-1.5 border border-amber-400 text-amber-700 hover:bg-amber-50 rounded-lg font-medium whitespace-nowrap",
+                        ),
                         rx.el.button(
                             "Aplicar a todos",
                             on_click=State.apply_bulk_discount,
@@ -416,26 +416,33 @@ def _promo_form_modal() -> rx.Component:
                             ),
                             class_name=TYPOGRAPHY["label"],
                         ),
-                        # Buscador
-                        rx.el.input(
-                            placeholder="Buscar producto...",
-                            on_change=State.set_promo_product_search,
-                            class_name=INPUT_STYLES["default"] + " mb-1",
-                            key=State.promo_form_key.to_string(),
+                        # Buscador (paginado en el servidor)
+                        rx.debounce_input(
+                            rx.input(
+                                placeholder="Buscar producto...",
+                                value=State.picker_query,
+                                on_change=State.set_picker_query,
+                                class_name=INPUT_STYLES["default"] + " mb-1",
+                            ),
+                            debounce_timeout=300,
                         ),
                         # Lista scrollable de checkboxes
                         rx.el.div(
                             rx.cond(
-                                State.promotion_products.length() == 0,
+                                State.picker_rows.length() == 0,
                                 rx.el.p(
-                                    "No hay productos activos en esta sucursal.",
+                                    rx.cond(
+                                        State.picker_query == "",
+                                        "No hay productos activos en esta sucursal.",
+                                        "Sin resultados.",
+                                    ),
                                     class_name="text-xs text-amber-600 p-2",
                                 ),
                                 rx.foreach(
-                                    State.filtered_promotion_products,
+                                    State.picker_rows,
                                     lambda prod: rx.el.div(
                                         rx.cond(
-                                            State.promo_product_ids.contains(prod["id"].to_string()),
+                                            State.promo_product_ids.contains(prod["id"]),
                                             rx.icon("square-check", class_name="h-4 w-4 text-indigo-600 shrink-0"),
                                             rx.icon("square", class_name="h-4 w-4 text-slate-300 shrink-0"),
                                         ),
@@ -443,7 +450,7 @@ def _promo_form_modal() -> rx.Component:
                                             prod["label"],
                                             class_name="text-sm text-slate-700 truncate",
                                         ),
-                                        on_click=State.toggle_promo_product_id(prod["id"].to_string()),
+                                        on_click=State.toggle_promo_product_id(prod["id"]),
                                         class_name=(
                                             "flex items-center gap-2 px-2 py-1.5 rounded cursor-pointer "
                                             "hover:bg-indigo-50 select-none"
@@ -451,6 +458,17 @@ def _promo_form_modal() -> rx.Component:
                                     ),
                                 ),
                             ),
+                            rx.cond(
+                                State.picker_has_more,
+                                rx.el.button(
+                                    "Cargar más",
+                                    on_click=State.picker_load_more,
+                                    disabled=State.picker_loading,
+                                    type="button",
+                                    class_name="w-full py-1.5 text-xs font-medium text-indigo-600 hover:bg-indigo-50",
+                                ),
+                                rx.fragment(),
+                            ),
                             class_name="border border-slate-200 rounded-lg max-h-44 overflow-y-auto",
                         ),
                         rx.cond(
@@ -312,8 +312,9 @@ def reservations_table() -> rx.Component:
         ),
         rx.el.button(
           rx.icon("download", class_name="h-4 w-4"),
-          "Exportar",
+          State.export_button_label,
           on_click=State.export_reservations_excel,
+          disabled=State.export_job_running,
           class_name=BUTTON_STYLES["success"],
         ),
         class_name="flex flex-col sm:flex-row sm:flex-wrap gap-2 xl:justify-end",
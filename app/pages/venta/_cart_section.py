@@ -397,6 +397,25 @@ def sale_receipt_modal() -> rx.Component:
             "Selecciona la salida del comprobante para finalizar la venta.",
             class_name="text-sm text-slate-600 text-center",
         ),
+        rx.cond(
+            State.last_fiscal_status_label != "",
+            rx.el.p(
+                rx.cond(
+                    (State.last_fiscal_status == "queued")
+                    | (State.last_fiscal_status == "running")
+                    | (State.last_fiscal_status == "retrying"),
+                    rx.icon("loader-circle", class_name="h-4 w-4 animate-spin shrink-0"),
+                    rx.icon("receipt-text", class_name="h-4 w-4 shrink-0"),
+                ),
+                State.last_fiscal_status_label,
+                class_name=rx.cond(
+                    (State.last_fiscal_status == "rejected")
+                    | (State.last_fiscal_status == "failed"),
+                    "mt-3 flex items-center justify-center gap-2 text-xs text-red-600",
+                    "mt-3 flex items-center justify-center gap-2 text-xs text-slate-500",
+                ),
+            ),
+        ),
         rx.el.div(
             rx.el.label(
                 "Tamaño de impresión",
@@ -10,6 +10,20 @@ web services de AFIP (WSFEv1, etc.):
     4. Parsea la respuesta: Token + Sign (válidos por 12h).
     5. Cachea el resultado para evitar re-autenticaciones innecesarias.
 
+Cache compartido (``REDIS_URL``):
+    - El ticket se guarda encriptado (``encrypt_text``) en Redis con TTL
+      hasta su expiración: réplicas nuevas y reinicios lo reutilizan en vez
+      de volver a firmar un TRA y llamar a LoginCms (que AFIP limita).
+    - Single-flight entre réplicas: sólo la que toma ``afip:wsaa:lock:*``
+      (SET NX con vencimiento) hace el login; las demás esperan su ticket.
+    - :func:`refresh_expiring_credentials` (tarea de fondo del lifespan)
+      renueva los tickets vencidos (o dentro de
+      ``AFIP_WSAA_REFRESH_AHEAD_SECONDS``), antes de que una emisión lo pida.
+    - WSAA rechaza un LoginCms mientras el TA anterior siga vigente
+      (``coe.alreadyAuthenticated``): ese rechazo no es un error, se sigue
+      usando el TA vigente y no se vuelve a pedir otro hasta que venza.
+    - Sin Redis el cache es sólo del proceso, como antes.
+
 Seguridad:
     - Certificados y claves privadas se almacenan encriptados en DB
       (encrypt_credential/decrypt_credential de app.utils.crypto).
@@ -25,11 +39,14 @@ from __future__ import annotations
 import asyncio
 import base64
 import hashlib
+import json
 import logging
+import os
 import time
+import uuid
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 # W1-04: defusedxml previene XXE en respuestas no-trusted de AFIP.
 # Drop-in compatible con xml.etree.ElementTree (Element/ParseError/fromstring).
 from defusedxml import ElementTree as ET
@@ -39,7 +56,12 @@ from cryptography import x509
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.serialization import pkcs7
 
-from app.utils.crypto import decrypt_credential
+from app.utils.crypto import decrypt_credential, decrypt_text, encrypt_text
+from app.utils.http_client import http_client
+from app.utils.redis_client import SharedRedis
+
+if TYPE_CHECKING:
+    import redis.asyncio as aioredis
 
 logger = logging.getLogger(__name__)
 
@@ -50,7 +72,8 @@ WSAA_URLS = {
     "production": "https://wsaa.afip.gov.ar/ws/services/LoginCms",
 }
 
-# Margen de seguridad: renovar 10 minutos antes de expirar
+# Margen de seguridad: intentar renovar 10 minutos antes de expirar (si WSAA
+# responde alreadyAuthenticated se usa el TA vigente hasta que venza).
 _TOKEN_RENEW_MARGIN_SECONDS = 600
 
 # Timeout para la llamada SOAP a WSAA
@@ -59,6 +82,44 @@ _WSAA_TIMEOUT_SECONDS = 30
 # Duración del TRA (12 horas como AFIP permite)
 _TRA_DURATION_HOURS = 12
 
+AFIP_WSAA_SHARED_CACHE = os.getenv("AFIP_WSAA_SHARED_CACHE", "1").strip().lower() not in {
+    "0",
+    "false",
+    "no",
+}
+# Vencimiento del lock de login entre réplicas (cubre el timeout de LoginCms).
+AFIP_WSAA_LOCK_SECONDS = max(
+    _WSAA_TIMEOUT_SECONDS + 5, int(os.getenv("AFIP_WSAA_LOCK_SECONDS", "45"))
+)
+# La tarea de fondo renueva tickets vencidos o que vencen dentro de esta
+# ventana. WSAA no emite un TA nuevo mientras el anterior siga vigente, así
+# que por defecto es 0 (sólo vencidos); subirla sólo si el WSAA del ambiente
+# acepta renovar antes.
+AFIP_WSAA_REFRESH_AHEAD_SECONDS = max(
+    0, int(os.getenv("AFIP_WSAA_REFRESH_AHEAD_SECONDS", "0"))
+)
+AFIP_WSAA_REFRESH_INTERVAL_SECONDS = max(
+    30, int(os.getenv("AFIP_WSAA_REFRESH_INTERVAL_SECONDS", "240"))
+)
+
+# Código del fault SOAP de LoginCms cuando el TA anterior sigue vigente.
+_ALREADY_AUTHENTICATED = "coe.alreadyAuthenticated"
+
+_SHARED_KEY_PREFIX = "afip:wsaa:ta"
+_SHARED_LOCK_PREFIX = "afip:wsaa:lock"
+_SHARED_WAIT_POLL_SECONDS = 0.25
+# Libera el lock sólo si sigue siendo nuestro (pudo vencer y tomarlo otra réplica).
+_RELEASE_LOCK_LUA = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class WSAAAlreadyAuthenticated(ValueError):
+    """WSAA rechazó el login: el TA anterior del certificado sigue vigente."""
+
 
 # ── Dataclass para credenciales WSAA ─────────────────────────
 
@@ -75,10 +136,20 @@ class WSAACredentials:
         """True si el token aún es válido (con margen de seguridad)."""
         return time.time() < (self.expiration - _TOKEN_RENEW_MARGIN_SECONDS)
 
+    def expires_within(self, seconds: float) -> bool:
+        return time.time() >= (self.expiration - seconds)
+
+    @property
+    def is_expired(self) -> bool:
+        return self.expires_within(0)
+
 
 # ── Cache en memoria (por company_id + service) ─────────────
 
 _credentials_cache: dict[str, WSAACredentials] = {}
+# key → time.time() hasta el que WSAA no acepta otro login (respondió
+# alreadyAuthenticated): hasta entonces se usa el TA vigente sin reintentar.
+_relogin_blocked_until: dict[str, float] = {}
 _cache_locks: dict[str, asyncio.Lock] = {}
 _cache_locks_mutex: asyncio.Lock = asyncio.Lock()
 
@@ -134,17 +205,153 @@ def clear_cache(company_id: int | None = None) -> None:
     """
     if company_id is None:
         _credentials_cache.clear()
+        _relogin_blocked_until.clear()
         _cache_locks.clear()
         return
     prefix = f"{company_id}:"
     cache_keys = [k for k in _credentials_cache if k.startswith(prefix)]
     for k in cache_keys:
         del _credentials_cache[k]
+    for k in [k for k in _relogin_blocked_until if k.startswith(prefix)]:
+        del _relogin_blocked_until[k]
     lock_keys = [k for k in _cache_locks if k.startswith(prefix)]
     for k in lock_keys:
         del _cache_locks[k]
 
 
+# ── Cache compartido entre réplicas (Redis) ─────────────────
+
+_redis = SharedRedis("tickets WSAA", timeout=2, logger=logger)
+
+
+def _get_shared_redis() -> "aioredis.Redis | None":
+    """Cliente Redis del event loop actual; None = cache sólo en proceso."""
+    if not AFIP_WSAA_SHARED_CACHE:
+        return None
+    return _redis.async_client()
+
+
+def _redis_failed(exc: Exception) -> None:
+    _redis.failed(exc)
+
+
+async def _load_shared_credentials(key: str) -> Optional[WSAACredentials]:
+    """Ticket no vencido guardado por cualquier réplica, o None.
+
+    Puede estar dentro del margen de renovación: lo decide el caller.
+    """
+    client = _get_shared_redis()
+    if client is None:
+        return None
+    try:
+        payload = await client.get(f"{_SHARED_KEY_PREFIX}:{key}")
+    except Exception as exc:
+        _redis_failed(exc)
+        return None
+    if not payload:
+        return None
+    try:
+        data = json.loads(decrypt_text(payload))
+        credentials = WSAACredentials(
+            token=data["token"],
+            sign=data["sign"],
+            expiration=float(data["expiration"]),
+            service=data.get("service", "wsfe"),
+        )
+    except Exception as exc:
+        logger.warning("Ticket WSAA compartido ilegible (%s): %s", key, str(exc)[:80])
+        return None
+    return None if credentials.is_expired else credentials
+
+
+async def _store_shared_credentials(key: str, credentials: WSAACredentials) -> None:
+    client = _get_shared_redis()
+    ttl = int(credentials.expiration - time.time())
+    if client is None or ttl <= 0:
+        return
+    payload = encrypt_text(json.dumps({
+        "token": credentials.token,
+        "sign": credentials.sign,
+        "expiration": credentials.expiration,
+        "service": credentials.service,
+    }))
+    try:
+        await client.set(f"{_SHARED_KEY_PREFIX}:{key}", payload, ex=ttl)
+    except Exception as exc:
+        _redis_failed(exc)
+
+
+async def _acquire_shared_lock(key: str) -> tuple[bool, str | None]:
+    """``(adquirido, token)``; sin Redis se considera adquirido (token None)."""
+    client = _get_shared_redis()
+    if client is None:
+        return True, None
+    token = uuid.uuid4().hex
+    try:
+        acquired = await client.set(
+            f"{_SHARED_LOCK_PREFIX}:{key}", token, nx=True, ex=AFIP_WSAA_LOCK_SECONDS
+        )
+    except Exception as exc:
+        _redis_failed(exc)
+        return True, None
+    return bool(acquired), token if acquired else None
+
+
+async def _release_shared_lock(key: str, token: str | None) -> None:
+    client = _get_shared_redis()
+    if client is None or token is None:
+        return
+    try:
+        await client.eval(_RELEASE_LOCK_LUA, 1, f"{_SHARED_LOCK_PREFIX}:{key}", token)
+    except Exception as exc:
+        logger.debug("No se pudo liberar lock WSAA %s: %s", key, exc)
+
+
+async def _wait_for_shared_credentials(
+    key: str, fresher_than: float
+) -> Optional[WSAACredentials]:
+    """Espera el ticket que está obteniendo otra réplica.
+
+    Devuelve None si el lock se libera (o vence) sin que aparezca un ticket
+    que expire después de ``fresher_than``: el caller hace su propio login.
+    """
+    client = _get_shared_redis()
+    if client is None:
+        return None
+    deadline = time.monotonic() + AFIP_WSAA_LOCK_SECONDS
+    while time.monotonic() < deadline:
+        await asyncio.sleep(_SHARED_WAIT_POLL_SECONDS)
+        credentials = await _load_shared_credentials(key)
+        if credentials is not None and credentials.expiration > fresher_than:
+            return credentials
+        try:
+            if not await client.exists(f"{_SHARED_LOCK_PREFIX}:{key}"):
+                return None
+        except Exception as exc:
+            _redis_failed(exc)
+            return None
+    return None
+
+
+async def invalidate_credentials(company_id: int) -> None:
+    """Descarta los tickets de la empresa en este proceso y en Redis.
+
+    Llamar al cambiar el certificado o la clave privada.
+    """
+    clear_cache(company_id)
+    client = _get_shared_redis()
+    if client is None:
+        return
+    try:
+        keys = [
+            k async for k in client.scan_iter(match=f"{_SHARED_KEY_PREFIX}:{company_id}:*")
+        ]
+        if keys:
+            await client.delete(*keys)
+    except Exception as exc:
+        _redis_failed(exc)
+
+
 # ── Generación y firma del TRA ───────────────────────────────
 
 def build_tra_xml(service: str = "wsfe") -> bytes:
@@ -340,16 +547,19 @@ async def authenticate(
     private_key_encrypted: str,
     environment: str = "sandbox",
     service: str = "wsfe",
+    *,
+    force_refresh: bool = False,
 ) -> WSAACredentials:
     """Autenticación completa contra WSAA de AFIP.
 
     Flujo:
-        1. Verifica cache → si hay credenciales válidas, las retorna.
-        2. Desencripta certificado y clave privada desde DB.
-        3. Genera TRA XML.
-        4. Firma TRA con CMS/PKCS#7.
+        1. Verifica cache del proceso y luego el compartido (Redis).
+        2. Toma el lock de login entre réplicas (o espera el ticket de la
+           réplica que lo tiene).
+        3. Desencripta certificado y clave privada desde DB.
+        4. Genera TRA XML y lo firma con CMS/PKCS#7.
         5. Envía SOAP a WSAA LoginCms.
-        6. Parsea respuesta y cachea credenciales.
+        6. Parsea respuesta y cachea credenciales (proceso + Redis).
 
     Args:
         company_id: ID de la empresa (para cache multi-tenant).
@@ -357,12 +567,20 @@ async def authenticate(
         private_key_encrypted: Clave privada RSA PEM encriptada (de DB).
         environment: "sandbox" o "production".
         service: Servicio AFIP a autorizar (default: "wsfe").
+        force_refresh: renovar el ticket cacheado si vence dentro de
+            ``AFIP_WSAA_REFRESH_AHEAD_SECONDS`` (tarea de fondo, ver
+            :func:`refresh_expiring_credentials`).
 
     Returns:
         WSAACredentials con token y sign para usar en WSFEv1.
 
+    Si WSAA responde ``coe.alreadyAuthenticated`` se devuelve el ticket
+    vigente conocido y no se pide otro hasta que venza.
+
     Raises:
         ValueError: Si los certificados son inválidos o WSAA rechaza.
+        WSAAAlreadyAuthenticated: WSAA no emite otro TA y no hay ticket
+            vigente en este proceso ni en Redis.
         ConnectionError: Si no se puede contactar a WSAA.
     """
     # W1-02: ambiente debe estar en la whitelist; fallback silencioso a
@@ -375,9 +593,19 @@ async def authenticate(
 
     key = _cache_key(company_id, service, environment)
 
+    def _usable(creds: Optional[WSAACredentials]) -> bool:
+        if creds is None or creds.is_expired:
+            return False
+        if time.time() < _relogin_blocked_until.get(key, 0.0):
+            # WSAA no acepta otro login todavía: el ticket vigente es el único.
+            return True
+        if force_refresh:
+            return not creds.expires_within(AFIP_WSAA_REFRESH_AHEAD_SECONDS)
+        return creds.is_valid
+
     # 1. Fast path: verificar cache sin lock
-    cached = get_cached_credentials(company_id, service, environment)
-    if cached:
+    cached = _credentials_cache.get(key)
+    if _usable(cached):
         logger.debug(
             "WSAA: usando token cacheado company_id=%s env=%s service=%s",
             company_id, environment, service,
@@ -388,79 +616,209 @@ async def authenticate(
     company_lock = await _get_company_lock(key)
     async with company_lock:
         # Double-check después de adquirir el lock (otro worker puede haber completado)
-        cached = get_cached_credentials(company_id, service, environment)
-        if cached:
+        cached = _credentials_cache.get(key)
+        if _usable(cached):
             logger.debug(
                 "WSAA: token cacheado post-lock company_id=%s env=%s service=%s",
                 company_id, environment, service,
             )
             return cached
+        shared = await _load_shared_credentials(key)
+        if _usable(shared):
+            logger.debug(
+                "WSAA: token compartido company_id=%s env=%s service=%s",
+                company_id, environment, service,
+            )
+            _credentials_cache[key] = shared
+            return shared
 
-        logger.info(
-            "WSAA: autenticando company_id=%s environment=%s service=%s",
-            company_id, environment, service,
+        # 2. Single-flight entre réplicas
+        previous_expiration = shared.expiration if shared else 0.0
+        acquired, lock_token = await _acquire_shared_lock(key)
+        try:
+            if not acquired:
+                shared = await _wait_for_shared_credentials(key, previous_expiration)
+                if shared is not None:
+                    _credentials_cache[key] = shared
+                    return shared
+                if force_refresh and cached is not None and not cached.is_expired:
+                    # La otra réplica no pudo renovar; el ticket actual sirve.
+                    return cached
+            else:
+                # Otra réplica pudo renovar entre la lectura y el lock.
+                shared = await _load_shared_credentials(key)
+                if _usable(shared):
+                    _credentials_cache[key] = shared
+                    return shared
+
+            try:
+                credentials = await _login_cms(
+                    company_id,
+                    certificate_encrypted,
+                    private_key_encrypted,
+                    environment,
+                    service,
+                )
+            except WSAAAlreadyAuthenticated:
+                current = max(
+                    (c for c in (cached, shared) if c is not None and not c.is_expired),
+                    key=lambda c: c.expiration,
+                    default=None,
+                )
+                if current is None:
+                    raise
+                logger.info(
+                    "WSAA: TA vigente hasta %s company_id=%s; se sigue usando",
+                    datetime.fromtimestamp(current.expiration, tz=timezone.utc)
+                    .strftime("%Y-%m-%d %H:%M:%S UTC"),
+                    company_id,
+                )
+                _relogin_blocked_until[key] = current.expiration
+                _credentials_cache[key] = current
+                return current
+            _relogin_blocked_until.pop(key, None)
+            _credentials_cache[key] = credentials
+            await _store_shared_credentials(key, credentials)
+            return credentials
+        finally:
+            await _release_shared_lock(key, lock_token)
+
+
+async def _login_cms(
+    company_id: int,
+    certificate_encrypted: str,
+    private_key_encrypted: str,
+    environment: str,
+    service: str,
+) -> WSAACredentials:
+    """Firma un TRA y llama a LoginCms (sin cache)."""
+    logger.info(
+        "WSAA: autenticando company_id=%s environment=%s service=%s",
+        company_id, environment, service,
+    )
+
+    # 1. Desencriptar certificados
+    try:
+        cert_pem = decrypt_credential(certificate_encrypted)
+        key_pem = decrypt_credential(private_key_encrypted)
+    except (ValueError, RuntimeError) as exc:
+        raise ValueError(
+            f"Error desencriptando certificados AFIP: {exc}"
+        ) from exc
+
+    # 2. Generar y firmar TRA
+    tra_xml = build_tra_xml(service)
+    cms_base64 = sign_tra(tra_xml, cert_pem, key_pem)
+
+    # 3. Enviar SOAP a WSAA — environment validado en authenticate (W1-02)
+    wsaa_url = WSAA_URLS[environment]
+    soap_envelope = _build_login_cms_soap(cms_base64)
+
+    try:
+        async with http_client("afip_wsaa", timeout=_WSAA_TIMEOUT_SECONDS) as client:
+            response = await client.post(
+                wsaa_url,
+                content=soap_envelope.encode("utf-8"),
+                headers={
+                    "Content-Type": "text/xml; charset=utf-8",
+                    "SOAPAction": '""',
+                },
+            )
+    except httpx.TimeoutException:
+        raise ConnectionError(
+            f"Timeout conectando a WSAA ({wsaa_url}). "
+            "AFIP puede estar experimentando demoras."
         )
+    except httpx.ConnectError as exc:
+        raise ConnectionError(
+            f"No se pudo conectar a WSAA ({wsaa_url}): {exc}"
+        ) from exc
 
-        # 2. Desencriptar certificados
-        try:
-            cert_pem = decrypt_credential(certificate_encrypted)
-            key_pem = decrypt_credential(private_key_encrypted)
-        except (ValueError, RuntimeError) as exc:
-            raise ValueError(
-                f"Error desencriptando certificados AFIP: {exc}"
-            ) from exc
+    if _ALREADY_AUTHENTICATED in response.text:
+        # Llega como SOAP fault (HTTP 500): no es un error del certificado.
+        raise WSAAAlreadyAuthenticated(
+            "WSAA: el certificado ya posee un TA vigente para este servicio."
+        )
 
-        # 3. Generar y firmar TRA
-        tra_xml = build_tra_xml(service)
-        cms_base64 = sign_tra(tra_xml, cert_pem, key_pem)
+    if response.status_code != 200:
+        # W1-06: no incluimos el cuerpo de la respuesta en el mensaje del
+        # ValueError (podría filtrarse a logs/UI). Solo un snippet corto y
+        # el código HTTP. El body completo queda en el log de debug.
+        logger.debug(
+            "WSAA HTTP %s body=%r", response.status_code, response.text
+        )
+        raise ValueError(
+            f"WSAA retornó HTTP {response.status_code}: "
+            f"{response.text[:100].strip()}"
+        )
 
-        # 4. Enviar SOAP a WSAA — environment validado al inicio (W1-02)
-        wsaa_url = WSAA_URLS[environment]
-        soap_envelope = _build_login_cms_soap(cms_base64)
+    # 4. Parsear respuesta
+    credentials = _parse_login_response(response.text)
+    credentials.service = service
 
-        try:
-            async with httpx.AsyncClient(timeout=_WSAA_TIMEOUT_SECONDS) as client:
-                response = await client.post(
-                    wsaa_url,
-                    content=soap_envelope.encode("utf-8"),
-                    headers={
-                        "Content-Type": "text/xml; charset=utf-8",
-                        "SOAPAction": '""',
-                    },
+    logger.info(
+        "WSAA: autenticación exitosa company_id=%s, "
+        "token válido hasta %s",
+        company_id,
+        datetime.fromtimestamp(credentials.expiration, tz=timezone.utc)
+        .strftime("%Y-%m-%d %H:%M:%S UTC"),
+    )
+
+    return credentials
+
+
+# ── Renovación anticipada ────────────────────────────────────
+
+async def refresh_expiring_credentials() -> int:
+    """Renueva los tickets cacheados vencidos o dentro de la ventana.
+
+    Recorre las empresas AR con certificado cargado y sólo renueva tickets
+    existentes (una empresa que no emite no dispara logins). Un ticket aún
+    vigente no se renueva antes de ``AFIP_WSAA_REFRESH_AHEAD_SECONDS``: WSAA
+    lo rechazaría con alreadyAuthenticated. Devuelve la cantidad de tickets
+    renovados.
+    """
+    from sqlmodel import select
+
+    from app.models.billing import CompanyBillingConfig
+    from app.utils.db import get_async_session
+
+    async with get_async_session() as session:
+        rows = (
+            await session.exec(
+                select(
+                    CompanyBillingConfig.company_id,
+                    CompanyBillingConfig.environment,
+                    CompanyBillingConfig.encrypted_certificate,
+                    CompanyBillingConfig.encrypted_private_key,
                 )
-        except httpx.TimeoutException:
-            raise ConnectionError(
-                f"Timeout conectando a WSAA ({wsaa_url}). "
-                "AFIP puede estar experimentando demoras."
+                .where(CompanyBillingConfig.country == "AR")
+                .where(CompanyBillingConfig.is_active == True)  # noqa: E712
+                .where(CompanyBillingConfig.encrypted_certificate.is_not(None))  # type: ignore[union-attr]
+                .where(CompanyBillingConfig.encrypted_private_key.is_not(None))  # type: ignore[union-attr]
             )
-        except httpx.ConnectError as exc:
-            raise ConnectionError(
-                f"No se pudo conectar a WSAA ({wsaa_url}): {exc}"
-            ) from exc
-
-        if response.status_code != 200:
-            # W1-06: no incluimos el cuerpo de la respuesta en el mensaje del
-            # ValueError (podría filtrarse a logs/UI). Solo un snippet corto y
-            # el código HTTP. El body completo queda en el log de debug.
-            logger.debug(
-                "WSAA HTTP %s body=%r", response.status_code, response.text
+        ).all()
+
+    refreshed = 0
+    for company_id, environment, cert_enc, key_enc in rows:
+        environment = environment or "sandbox"
+        if environment not in WSAA_URLS:
+            continue
+        key = _cache_key(company_id, "wsfe", environment)
+        current = _credentials_cache.get(key) or await _load_shared_credentials(key)
+        if current is None or not current.expires_within(AFIP_WSAA_REFRESH_AHEAD_SECONDS):
+            continue
+        try:
+            renewed = await authenticate(
+                company_id, cert_enc, key_enc, environment, "wsfe", force_refresh=True
             )
-            raise ValueError(
-                f"WSAA retornó HTTP {response.status_code}: "
-                f"{response.text[:100].strip()}"
+        except (ValueError, ConnectionError) as exc:
+            # Se reintenta en el próximo ciclo (o lo pide la próxima emisión).
+            logger.warning(
+                "WSAA: no se pudo renovar ticket company_id=%s: %s",
+                company_id, str(exc)[:120],
             )
-
-        # 5. Parsear respuesta y cachear (dentro del lock)
-        credentials = _parse_login_response(response.text)
-        credentials.service = service
-        _credentials_cache[key] = credentials
-
-        logger.info(
-            "WSAA: autenticación exitosa company_id=%s, "
-            "token válido hasta %s",
-            company_id,
-            datetime.fromtimestamp(credentials.expiration, tz=timezone.utc)
-            .strftime("%Y-%m-%d %H:%M:%S UTC"),
-        )
-
-        return credentials
+            continue
+        if renewed.expiration > current.expiration:
+            refreshed += 1
+    return refreshed
@@ -4,7 +4,9 @@ Implementa las operaciones necesarias para emitir comprobantes
 electrónicos ante AFIP:
 
     - FECompUltimoAutorizado: obtiene último comprobante autorizado.
-    - FECAESolicitar: solicita CAE para un comprobante nuevo.
+    - FECAESolicitar: solicita CAE para un comprobante nuevo, o para un
+      lote de comprobantes del mismo tipo y punto de venta
+      (``fe_cae_solicitar_lote``, ``FeCabReq.CantReg`` > 1).
     - FEParamGetTiposCbte: consulta tipos de comprobante (diagnóstico).
 
 Arquitectura:
@@ -33,6 +35,8 @@ from xml.sax.saxutils import escape as _xml_escape_raw
 
 import httpx
 
+from app.utils.http_client import http_client
+
 logger = logging.getLogger(__name__)
 
 # ── Constantes ───────────────────────────────────────────────
@@ -44,6 +48,8 @@ WSFE_URLS = {
 
 _WSFE_NAMESPACE = "http://ar.gov.afip.dif.FEV1/"
 _WSFE_TIMEOUT_SECONDS = 30
+# Máximo de registros por FECAESolicitar (FEParamGetCantMaxRegDetalle).
+WSFE_MAX_CANT_REG = 250
 
 
 # ── Dataclasses de resultado ─────────────────────────────────
@@ -217,7 +223,7 @@ async def _soap_call(
     }
 
     try:
-        async with httpx.AsyncClient(timeout=_WSFE_TIMEOUT_SECONDS) as client:
+        async with http_client("afip_wsfe", timeout=_WSFE_TIMEOUT_SECONDS) as client:
             response = await client.post(
                 url,
                 content=envelope.encode("utf-8"),
@@ -375,22 +381,18 @@ class FECAERequest:
             self.iva_items = []
 
 
-def _build_fecae_request_xml(
-    token: str,
-    sign: str,
-    cuit: int,
-    req: FECAERequest,
-) -> str:
-    """Construye el XML para FECAESolicitar.
+def _fecae_det_xml(req: FECAERequest) -> str:
+    """Bloque ``FECAEDetRequest`` de un comprobante.
 
     WF1-01: todos los strings pasan por ``_xe`` (XML-escape).
     WF1-03: todos los montos pasan por ``_money`` (Decimal + HALF_UP).
-    WF1-08: valida ``cbte_desde == cbte_hasta`` — ``CantReg=1`` hardcoded no
-    soporta lotes y AFIP rechazaría por inconsistencia.
+    WF1-08: valida ``cbte_desde == cbte_hasta`` — cada registro es un
+    comprobante; los rangos (sólo válidos para clase B sin identificar
+    receptor) no están soportados.
     """
     if int(req.cbte_desde) != int(req.cbte_hasta):
         raise ValueError(
-            f"FECAESolicitar solo soporta 1 comprobante por request (CantReg=1); "
+            f"FECAESolicitar solo soporta 1 comprobante por registro; "
             f"recibido cbte_desde={req.cbte_desde} cbte_hasta={req.cbte_hasta}."
         )
 
@@ -413,15 +415,7 @@ def _build_fecae_request_xml(
             )
         iva_xml = f"<wsfe:Iva>{iva_entries}</wsfe:Iva>"
 
-    body = (
-        f"{_auth_xml(token, sign, cuit)}"
-        "<wsfe:FeCAEReq>"
-        "<wsfe:FeCabReq>"
-        f"<wsfe:CantReg>1</wsfe:CantReg>"
-        f"<wsfe:PtoVta>{int(req.punto_vta)}</wsfe:PtoVta>"
-        f"<wsfe:CbteTipo>{int(req.cbte_tipo)}</wsfe:CbteTipo>"
-        "</wsfe:FeCabReq>"
-        "<wsfe:FeDetReq>"
+    return (
         "<wsfe:FECAEDetRequest>"
         f"<wsfe:Concepto>{int(req.concepto)}</wsfe:Concepto>"
         f"<wsfe:DocTipo>{int(req.tipo_doc)}</wsfe:DocTipo>"
@@ -446,12 +440,64 @@ def _build_fecae_request_xml(
         )
         + f"{iva_xml}"
         "</wsfe:FECAEDetRequest>"
-        "</wsfe:FeDetReq>"
+    )
+
+
+def _build_fecae_lote_xml(
+    token: str,
+    sign: str,
+    cuit: int,
+    requests: list[FECAERequest],
+) -> str:
+    """Construye el XML de FECAESolicitar con ``len(requests)`` registros.
+
+    AFIP exige que todos los registros del lote compartan tipo de
+    comprobante y punto de venta (van en ``FeCabReq``) y que la numeración
+    sea consecutiva; esto último lo garantiza el caller.
+    """
+    if not requests:
+        raise ValueError("FECAESolicitar requiere al menos un comprobante.")
+    if len(requests) > WSFE_MAX_CANT_REG:
+        raise ValueError(
+            f"FECAESolicitar admite hasta {WSFE_MAX_CANT_REG} comprobantes "
+            f"por request; recibidos {len(requests)}."
+        )
+    head = requests[0]
+    for req in requests[1:]:
+        if (int(req.cbte_tipo), int(req.punto_vta)) != (
+            int(head.cbte_tipo), int(head.punto_vta)
+        ):
+            raise ValueError(
+                "Un lote de FECAESolicitar debe tener un único tipo de "
+                "comprobante y punto de venta."
+            )
+
+    body = (
+        f"{_auth_xml(token, sign, cuit)}"
+        "<wsfe:FeCAEReq>"
+        "<wsfe:FeCabReq>"
+        f"<wsfe:CantReg>{len(requests)}</wsfe:CantReg>"
+        f"<wsfe:PtoVta>{int(head.punto_vta)}</wsfe:PtoVta>"
+        f"<wsfe:CbteTipo>{int(head.cbte_tipo)}</wsfe:CbteTipo>"
+        "</wsfe:FeCabReq>"
+        "<wsfe:FeDetReq>"
+        + "".join(_fecae_det_xml(req) for req in requests)
+        + "</wsfe:FeDetReq>"
         "</wsfe:FeCAEReq>"
     )
     return _soap_envelope("FECAESolicitar", body)
 
 
+def _build_fecae_request_xml(
+    token: str,
+    sign: str,
+    cuit: int,
+    req: FECAERequest,
+) -> str:
+    """Construye el XML para FECAESolicitar de un solo comprobante."""
+    return _build_fecae_lote_xml(token, sign, cuit, [req])
+
+
 async def fe_cae_solicitar(
     token: str,
     sign: str,
@@ -477,63 +523,27 @@ async def fe_cae_solicitar(
         ValueError: Si ``environment`` no está en la whitelist (WF1-02) o si
             el request es inconsistente (p.ej. rango cbte_desde≠cbte_hasta).
     """
-    if environment not in WSFE_URLS:
-        raise ValueError(
-            f"WSFEv1 environment inválido: {environment!r}. "
-            f"Valores aceptados: {sorted(WSFE_URLS.keys())}."
-        )
-    url = WSFE_URLS[environment]
-    envelope = _build_fecae_request_xml(token, sign, cuit, request)
-
-    logger.info(
-        "AFIP FECAESolicitar: cuit=%s pto_vta=%s cbte_tipo=%s nro=%s total=%.2f",
-        cuit, request.punto_vta, request.cbte_tipo,
-        request.cbte_desde, request.imp_total,
+    results = await fe_cae_solicitar_lote(
+        token, sign, cuit, [request], environment=environment
     )
+    return results[0]
 
-    try:
-        root = await _soap_call(url, "FECAESolicitar", envelope)
-    except (ConnectionError, ValueError) as exc:
-        logger.error("AFIP FECAESolicitar error: %s", exc)
-        return CAEResult(
-            success=False,
-            errors=[str(exc)],
-        )
-
-    # Buscar FECAESolicitarResult
-    result_elem = None
-    for elem in root.iter():
-        tag_local = elem.tag.split("}")[-1] if "}" in elem.tag else elem.tag
-        if tag_local == "FECAESolicitarResult":
-            result_elem = elem
-            break
-
-    if result_elem is None:
-        return CAEResult(
-            success=False,
-            errors=["No se encontró FECAESolicitarResult en respuesta AFIP."],
-        )
 
-    # Extraer errores generales
-    general_errors = _extract_errors(result_elem)
+def _det_responses(result_elem: ET.Element) -> list[ET.Element]:
+    return [
+        elem
+        for elem in result_elem.iter()
+        if (elem.tag.split("}")[-1] if "}" in elem.tag else elem.tag)
+        == "FECAEDetResponse"
+    ]
 
-    # Buscar FECAEDetResponse (detalle del comprobante)
-    det_response = None
-    for elem in result_elem.iter():
-        tag_local = elem.tag.split("}")[-1] if "}" in elem.tag else elem.tag
-        if tag_local == "FECAEDetResponse":
-            det_response = elem
-            break
 
-    if det_response is None:
-        return CAEResult(
-            success=False,
-            errors=general_errors or [
-                "No se encontró FECAEDetResponse en respuesta AFIP."
-            ],
-        )
-
-    # Extraer datos del detalle
+def _cae_result(
+    det_response: ET.Element,
+    request: FECAERequest,
+    general_errors: list[str],
+) -> CAEResult:
+    """CAEResult de un registro (``FECAEDetResponse``) de la respuesta."""
     resultado = _find_text(det_response, ["Resultado"])
     cae = _find_text(det_response, ["CAE"])
     cae_fch_vto = _find_text(det_response, ["CAEFchVto"])
@@ -570,3 +580,92 @@ async def fe_cae_solicitar(
         errors=all_errors,
         observations=observations,
     )
+
+
+async def fe_cae_solicitar_lote(
+    token: str,
+    sign: str,
+    cuit: int,
+    requests: list[FECAERequest],
+    environment: str = "sandbox",
+) -> list[CAEResult]:
+    """Solicita CAE para varios comprobantes en un solo FECAESolicitar.
+
+    Todos los ``requests`` deben ser del mismo tipo y punto de venta, con
+    números consecutivos a partir del próximo a autorizar. AFIP resuelve
+    cada registro por separado (unos pueden aprobarse y otros no).
+
+    Returns:
+        Un CAEResult por request, en el mismo orden. Si la llamada falla
+        (red, SOAP Fault) todos llevan el mismo error y ``resultado`` vacío.
+
+    Raises:
+        ValueError: environment fuera de la whitelist o lote inconsistente.
+    """
+    if environment not in WSFE_URLS:
+        raise ValueError(
+            f"WSFEv1 environment inválido: {environment!r}. "
+            f"Valores aceptados: {sorted(WSFE_URLS.keys())}."
+        )
+    url = WSFE_URLS[environment]
+    envelope = _build_fecae_lote_xml(token, sign, cuit, requests)
+
+    head = requests[0]
+    logger.info(
+        "AFIP FECAESolicitar: cuit=%s pto_vta=%s cbte_tipo=%s nro=%s-%s "
+        "registros=%d total=%.2f",
+        cuit, head.punto_vta, head.cbte_tipo,
+        head.cbte_desde, requests[-1].cbte_hasta,
+        len(requests), sum(float(req.imp_total) for req in requests),
+    )
+
+    def _failed(errors: list[str]) -> list[CAEResult]:
+        return [CAEResult(success=False, errors=list(errors)) for _ in requests]
+
+    try:
+        root = await _soap_call(url, "FECAESolicitar", envelope)
+    except (ConnectionError, ValueError) as exc:
+        logger.error("AFIP FECAESolicitar error: %s", exc)
+        return _failed([str(exc)])
+
+    # Buscar FECAESolicitarResult
+    result_elem = None
+    for elem in root.iter():
+        tag_local = elem.tag.split("}")[-1] if "}" in elem.tag else elem.tag
+        if tag_local == "FECAESolicitarResult":
+            result_elem = elem
+            break
+
+    if result_elem is None:
+        return _failed(["No se encontró FECAESolicitarResult en respuesta AFIP."])
+
+    # Errores generales (aplican a todo el lote)
+    general_errors = _extract_errors(result_elem)
+
+    # Un FECAEDetResponse por registro; se asocian por CbteDesde y, si AFIP
+    # no lo informa, por posición.
+    det_by_nro: dict[int, ET.Element] = {}
+    det_list = _det_responses(result_elem)
+    for det in det_list:
+        try:
+            det_by_nro[int(_find_text(det, ["CbteDesde"]))] = det
+        except (ValueError, TypeError):
+            pass
+
+    results: list[CAEResult] = []
+    for position, req in enumerate(requests):
+        det = det_by_nro.get(int(req.cbte_desde))
+        if det is None and position < len(det_list) and (
+            not det_by_nro or len(requests) == 1
+        ):
+            det = det_list[position]
+        if det is None:
+            results.append(CAEResult(
+                success=False,
+                errors=general_errors or [
+                    "No se encontró FECAEDetResponse en respuesta AFIP."
+                ],
+            ))
+            continue
+        results.append(_cae_result(det, req, general_errors))
+    return results
@@ -19,7 +19,6 @@ from typing import List, Optional
 logger = logging.getLogger(__name__)
 from app.utils.timezone import local_day_bounds_utc_naive, utc_now_naive
 
-import reflex as rx
 from sqlmodel import select, func
 from sqlalchemy import and_, or_
 
@@ -33,6 +32,7 @@ from app.models import (
 from app.models.billing import CompanyBillingConfig
 from app.enums import SaleStatus
 from app.i18n import MSG
+from app.utils.db_read import read_session
 from app.utils.formatting import format_currency
 from app.utils.tenant import tenant_context
 
@@ -106,13 +106,13 @@ def _alert_scope(stack: ExitStack, company_id: int, branch_id: int, external):
 
     A1-03: cuando ``external`` viene (``get_all_alerts``), reutiliza esa
     sesión y asume que el caller ya abrió ``tenant_context``. En caso
-    contrario, abre un ``tenant_context`` + ``rx.session()`` propios
+    contrario, abre un ``tenant_context`` + ``read_session()`` propios
     registrados en el ``ExitStack`` para cierre ordenado.
     """
     if external is not None:
         return external
     stack.enter_context(tenant_context(company_id, branch_id))
-    return stack.enter_context(rx.session())
+    return stack.enter_context(read_session())
 
 
 def get_low_stock_alerts(
@@ -586,7 +586,7 @@ def get_cert_expiry_alerts(
         if _session is not None:
             session = _session
         else:
-            session = stack.enter_context(rx.session())
+            session = stack.enter_context(read_session())
             session.info["tenant_bypass"] = True
 
         config = session.exec(
@@ -692,7 +692,7 @@ def get_all_alerts(
     # A1-03: una sola sesión + un solo tenant_context para las 4 consultas.
     # Antes: 4 conexiones; ahora: 1. Cada getter recibe ``_session`` y
     # reutiliza el contexto ya activo en este bloque.
-    with tenant_context(company_id, branch_id), rx.session() as session:
+    with tenant_context(company_id, branch_id), read_session() as session:
         try:
             alerts.extend(
                 get_low_stock_alerts(company_id, branch_id, _session=session)
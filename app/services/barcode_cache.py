@@ -0,0 +1,509 @@
+"""Cache en proceso de códigos de barras/SKU → payload de producto, por sucursal.
+
+Cada escaneo del POS (``CartMixin._process_barcode``) pasaba por
+``sale_service.get_product_by_barcode``: margen global, variante por SKU,
+producto padre y producto por barcode (hasta 4 queries por pitido), más el
+chequeo de kit. Este módulo mantiene, por ``(company_id, branch_id)``, un
+:class:`BranchBarcodeSnapshot` con:
+
+  * ``código → BarcodeEntry`` (payload ya adaptado, con precio efectivo).
+  * ``product_id → es kit``.
+  * El margen global vigente, para resolver los códigos que no están.
+
+``page_init_venta`` lo precarga completo (``sale_service.warm_barcode_cache``);
+completo, un código ausente es "no encontrado" sin ir a la BD. Si el catálogo
+supera ``BARCODE_CACHE_MAX_ENTRIES`` el snapshot queda parcial y se llena al
+escanear (LRU dentro de la sucursal). ``BARCODE_CACHE_MAX_BRANCHES`` acota las
+sucursales en memoria y ``BARCODE_CACHE_TTL_SECONDS`` la antigüedad.
+
+Invalidación automática vía eventos de ``Session`` (``after_flush`` junta,
+``after_commit`` aplica; un rollback descarta):
+
+  * Cambios de catálogo en ``Product``/``ProductVariant`` (código,
+    descripción, precios, ``is_active``…) o en ``ProductKit`` descartan el
+    snapshot de la sucursal; cambios de ``default_profit_margin`` en
+    ``CompanySettings``, los de toda la empresa.
+  * Cambios sólo de stock (``Product``/``ProductVariant``/``ProductBatch``)
+    no descartan nada: marcan el stock de esos productos como viejo y el
+    próximo escaneo lo relee con una query por PK.
+
+Los ``UPDATE`` masivos (``session.execute(update(Product)…)``) no pasan por
+esos eventos: llamar a :func:`invalidate_barcode_cache` después del commit.
+Con ``REDIS_URL`` las consultas comparan contadores de versión (un ``MGET``)
+para enterarse de escrituras de otras réplicas, a lo sumo una vez cada
+``BARCODE_CACHE_VERSION_CHECK_SECONDS`` por sucursal: el escaneo corre en
+handlers async y el cliente es síncrono. ``BARCODE_CACHE=0`` vuelve a las
+queries por escaneo.
+
+Sólo para armar el carrito: el cobro (``sale_service``) revalida stock y
+precios contra la BD dentro de su transacción.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Iterable
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.utils.redis_client import SharedRedis
+
+if TYPE_CHECKING:
+    import redis
+
+logger = logging.getLogger("BarcodeCache")
+
+BARCODE_CACHE_ENABLED = os.getenv("BARCODE_CACHE", "1").strip().lower() not in {
+    "0",
+    "false",
+    "no",
+}
+BARCODE_CACHE_TTL_SECONDS = float(os.getenv("BARCODE_CACHE_TTL_SECONDS", "600"))
+BARCODE_CACHE_MAX_BRANCHES = int(os.getenv("BARCODE_CACHE_MAX_BRANCHES", "32"))
+BARCODE_CACHE_MAX_ENTRIES = int(os.getenv("BARCODE_CACHE_MAX_ENTRIES", "20000"))
+# Cada cuánto se releen los contadores de Redis por sucursal; las escrituras de
+# otras réplicas se ven con ese atraso (las propias, al instante).
+BARCODE_CACHE_VERSION_CHECK_SECONDS = float(
+    os.getenv("BARCODE_CACHE_VERSION_CHECK_SECONDS", "2")
+)
+
+_VERSION_KEY_PREFIX = "barcode:version"
+_STOCK_KEY_PREFIX = "barcode:stock"
+
+# Columnas que cambian el payload (o si el código resuelve). El resto de
+# columnas de Product/ProductVariant salvo ``stock`` no se muestran al escanear.
+_PRODUCT_CATALOG_FIELDS = (
+    "barcode",
+    "description",
+    "category",
+    "unit",
+    "purchase_price",
+    "sale_price",
+    "is_active",
+    "location",
+)
+_VARIANT_CATALOG_FIELDS = ("sku", "size", "color", "sale_price", "product_id")
+
+
+def barcode_key(code: str | None) -> str:
+    """Clave del código: la BD compara sin distinguir mayúsculas (``_ci``)."""
+    return (code or "").strip().lower()
+
+
+@dataclass
+class BarcodeEntry:
+    """Payload de un código + sello del stock que trae."""
+
+    payload: dict[str, Any]
+    product_id: int
+    variant_id: int | None = None
+    stock_seq: int = 0
+
+
+@dataclass
+class BranchBarcodeSnapshot:
+    """Códigos de una sucursal.
+
+    El stock se sella con ``seq``: cada cambio de stock lo incrementa y anota
+    el valor en ``product_stock_seq[product_id]`` (o en ``stock_epoch`` si no
+    se sabe qué productos cambiaron, p. ej. una escritura de otra réplica).
+    Una entrada sellada antes de eso tiene el stock viejo.
+    """
+
+    company_id: int
+    branch_id: int
+    codes: "OrderedDict[str, BarcodeEntry]" = field(default_factory=OrderedDict)
+    kits: dict[int, bool] = field(default_factory=dict)
+    margin: float | None = None
+    complete: bool = False
+    version: tuple[int, int] = (0, 0)
+    stock_version: int = 0
+    seq: int = 0
+    stock_epoch: int = 0
+    product_stock_seq: dict[int, int] = field(default_factory=dict)
+    loaded_at: float = field(default_factory=time.monotonic)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def is_fresh(self, ttl: float = BARCODE_CACHE_TTL_SECONDS) -> bool:
+        return (time.monotonic() - self.loaded_at) < ttl
+
+    def lookup(self, code: str) -> BarcodeEntry | None:
+        key = barcode_key(code)
+        with self._lock:
+            entry = self.codes.get(key)
+            if entry is not None:
+                self.codes.move_to_end(key)
+            return entry
+
+    def remember(
+        self,
+        code: str,
+        entry: BarcodeEntry,
+        *,
+        max_entries: int | None = None,
+    ) -> None:
+        limit = BARCODE_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        key = barcode_key(code)
+        with self._lock:
+            self.codes[key] = entry
+            self.codes.move_to_end(key)
+            while len(self.codes) > max(1, limit):
+                self.codes.popitem(last=False)
+                # Ya no están todos los códigos: ausente ≠ inexistente.
+                self.complete = False
+
+    def current_seq(self) -> int:
+        with self._lock:
+            return self.seq
+
+    def stock_is_stale(self, entry: BarcodeEntry) -> bool:
+        with self._lock:
+            changed = max(self.stock_epoch, self.product_stock_seq.get(entry.product_id, 0))
+            return entry.stock_seq < changed
+
+    def refresh_stock(self, entry: BarcodeEntry, stock: Any, seq: int) -> None:
+        """Guarda el stock leído en vivo; ``seq`` es el de antes de leerlo."""
+        with self._lock:
+            entry.payload["stock"] = stock
+            entry.stock_seq = max(entry.stock_seq, seq)
+
+    def mark_stock_changed(self, product_ids: Iterable[int] | None = None) -> None:
+        """Stock viejo para ``product_ids`` (None = toda la sucursal)."""
+        with self._lock:
+            self.seq += 1
+            if product_ids is None:
+                self.stock_epoch = self.seq
+                return
+            for product_id in product_ids:
+                self.product_stock_seq[int(product_id)] = self.seq
+
+    def kit_flag(self, product_id: int) -> bool | None:
+        with self._lock:
+            return self.kits.get(int(product_id))
+
+    def remember_kit_flag(self, product_id: int, is_kit: bool) -> None:
+        with self._lock:
+            self.kits[int(product_id)] = bool(is_kit)
+
+
+# ─── Estado del proceso ──────────────────────────────────────────────────────
+
+_lock = threading.Lock()
+_entries: "OrderedDict[tuple[int, int], BranchBarcodeSnapshot]" = OrderedDict()
+_generations: dict[tuple[int, int], int] = {}
+_company_generations: dict[int, int] = {}
+_stock_generations: dict[tuple[int, int], int] = {}
+# (company_id, branch_id) → (monotonic de la lectura, versiones remotas).
+_remote_checked: dict[tuple[int, int], tuple[float, tuple[tuple[int, int], int]]] = {}
+
+_redis = SharedRedis("cache de códigos", logger=logger)
+
+
+def _generation(key: tuple[int, int]) -> tuple[int, int]:
+    return _generations.get(key, 0), _company_generations.get(key[0], 0)
+
+
+def _get_redis() -> "redis.Redis | None":
+    """Cliente Redis para los contadores de versión; None = sólo invalidación local."""
+    return _redis.sync_client()
+
+
+def _version_keys(company_id: int, branch_id: int) -> list[str]:
+    return [
+        f"{_VERSION_KEY_PREFIX}:{company_id}:{branch_id}",
+        f"{_VERSION_KEY_PREFIX}:{company_id}:*",
+        f"{_STOCK_KEY_PREFIX}:{company_id}:{branch_id}",
+    ]
+
+
+def _remote_versions(key: tuple[int, int]) -> tuple[tuple[int, int], int]:
+    """``((versión sucursal, versión empresa), versión de stock)``.
+
+    Reusa la última lectura durante ``BARCODE_CACHE_VERSION_CHECK_SECONDS``.
+    """
+    client = _get_redis()
+    if client is None:
+        return (0, 0), 0
+    now = time.monotonic()
+    with _lock:
+        checked = _remote_checked.get(key)
+    if checked is not None and (now - checked[0]) < BARCODE_CACHE_VERSION_CHECK_SECONDS:
+        return checked[1]
+    try:
+        branch_v, company_v, stock_v = client.mget(_version_keys(*key))
+    except Exception as exc:
+        logger.warning("No se pudo leer versión del cache de códigos: %s", str(exc)[:80])
+        return (0, 0), 0
+    versions = (int(branch_v or 0), int(company_v or 0)), int(stock_v or 0)
+    with _lock:
+        _remote_checked[key] = (now, versions)
+    return versions
+
+
+def _forget_remote_versions(company_id: int, branch_id: int | None) -> None:
+    """Tras un ``INCR`` propio: la próxima consulta relee los contadores."""
+    with _lock:
+        for key in [k for k in _remote_checked if k[0] == company_id]:
+            if branch_id is None or key[1] == branch_id:
+                _remote_checked.pop(key, None)
+
+
+LoadToken = tuple[tuple[int, int], int, tuple[int, int], int]
+
+
+def load_token(company_id: int, branch_id: int) -> LoadToken:
+    """Marca el inicio de una precarga; pasarlo a :func:`install_barcode_snapshot`."""
+    key = (int(company_id), int(branch_id))
+    version, stock_version = _remote_versions(key)
+    with _lock:
+        return (
+            _generation(key),
+            _stock_generations.get(key, 0),
+            version,
+            stock_version,
+        )
+
+
+def install_barcode_snapshot(
+    snapshot: BranchBarcodeSnapshot,
+    token: LoadToken,
+) -> bool:
+    """Publica un snapshot precargado si el catálogo no cambió mientras se leía.
+
+    Si sólo cambió stock, se publica con todo el stock marcado como viejo.
+    """
+    key = (snapshot.company_id, snapshot.branch_id)
+    generation, stock_generation, version, stock_version = token
+    snapshot.version = version
+    snapshot.stock_version = stock_version
+    with _lock:
+        if _generation(key) != generation:
+            return False
+        if _stock_generations.get(key, 0) != stock_generation:
+            snapshot.mark_stock_changed()
+        _entries[key] = snapshot
+        _entries.move_to_end(key)
+        while len(_entries) > max(1, BARCODE_CACHE_MAX_BRANCHES):
+            _entries.popitem(last=False)
+    return True
+
+
+def get_barcode_snapshot(
+    company_id: int,
+    branch_id: int,
+    *,
+    create: bool = True,
+) -> BranchBarcodeSnapshot | None:
+    """Snapshot vigente de la sucursal (o uno parcial vacío si ``create``).
+
+    Con Redis compara los contadores de versión: catálogo distinto descarta
+    el snapshot; stock distinto marca todo el stock como viejo.
+    """
+    key = (int(company_id), int(branch_id))
+    version, stock_version = _remote_versions(key)
+    with _lock:
+        snapshot = _entries.get(key)
+        if snapshot is not None and (not snapshot.is_fresh() or snapshot.version != version):
+            _entries.pop(key, None)
+            snapshot = None
+        if snapshot is None:
+            if not create:
+                return None
+            snapshot = BranchBarcodeSnapshot(
+                company_id=key[0],
+                branch_id=key[1],
+                version=version,
+                stock_version=stock_version,
+            )
+            _entries[key] = snapshot
+            while len(_entries) > max(1, BARCODE_CACHE_MAX_BRANCHES):
+                _entries.popitem(last=False)
+        _entries.move_to_end(key)
+    if snapshot.stock_version != stock_version:
+        snapshot.mark_stock_changed()
+        snapshot.stock_version = stock_version
+    return snapshot
+
+
+def _invalidate_local(company_id: int, branch_id: int | None) -> None:
+    with _lock:
+        if branch_id is None:
+            _company_generations[company_id] = _company_generations.get(company_id, 0) + 1
+            for key in [k for k in _entries if k[0] == company_id]:
+                _entries.pop(key, None)
+        else:
+            key = (company_id, branch_id)
+            _generations[key] = _generations.get(key, 0) + 1
+            _entries.pop(key, None)
+
+
+def invalidate_barcode_cache(
+    company_id: int | None,
+    branch_id: int | None = None,
+    *,
+    broadcast: bool = True,
+) -> None:
+    """Descarta los códigos de la sucursal (``branch_id=None``: de la empresa).
+
+    Los eventos de ``Session`` ya la llaman para escrituras ORM; hace falta a
+    mano tras ``UPDATE`` masivos sobre ``product``/``productvariant``.
+    """
+    if not company_id:
+        return
+    company_id = int(company_id)
+    branch_id = int(branch_id) if branch_id else None
+    _invalidate_local(company_id, branch_id)
+    if not broadcast:
+        return
+    client = _get_redis()
+    if client is None:
+        return
+    try:
+        client.incr(f"{_VERSION_KEY_PREFIX}:{company_id}:{branch_id if branch_id else '*'}")
+    except Exception as exc:
+        logger.warning("No se pudo propagar invalidación de códigos: %s", str(exc)[:80])
+    _forget_remote_versions(company_id, branch_id)
+
+
+def mark_barcode_stock_changed(
+    company_id: int | None,
+    branch_id: int | None,
+    product_ids: Iterable[int] | None = None,
+    *,
+    broadcast: bool = True,
+) -> None:
+    """Marca como viejo el stock de ``product_ids`` (None = toda la sucursal)."""
+    if not company_id or not branch_id:
+        return
+    key = (int(company_id), int(branch_id))
+    with _lock:
+        _stock_generations[key] = _stock_generations.get(key, 0) + 1
+        snapshot = _entries.get(key)
+    if snapshot is not None:
+        snapshot.mark_stock_changed(product_ids)
+    if not broadcast:
+        return
+    client = _get_redis()
+    if client is None:
+        return
+    try:
+        version = int(client.incr(_version_keys(*key)[2]))
+    except Exception as exc:
+        logger.warning("No se pudo propagar cambio de stock: %s", str(exc)[:80])
+        return
+    _forget_remote_versions(*key)
+    # Si nadie más escribió en el medio, el incremento es el propio: no hace
+    # falta marcar toda la sucursal en la próxima consulta.
+    if snapshot is not None and snapshot.stock_version == version - 1:
+        snapshot.stock_version = version
+
+
+def clear_barcode_cache() -> None:
+    """Vacía el cache local completo (tests / mantenimiento)."""
+    with _lock:
+        _entries.clear()
+        _generations.clear()
+        _company_generations.clear()
+        _stock_generations.clear()
+        _remote_checked.clear()
+
+
+# ─── Invalidación por eventos de Session ─────────────────────────────────────
+
+_PENDING_KEY = "barcode_cache_pending"
+
+
+@dataclass
+class _PendingChanges:
+    catalog: set[tuple[int, int]] = field(default_factory=set)
+    companies: set[int] = field(default_factory=set)
+    stock: dict[tuple[int, int], set[int]] = field(default_factory=dict)
+
+
+def _changed(state, names: Iterable[str]) -> bool:
+    attrs = state.attrs
+    return any(name in attrs and attrs[name].history.has_changes() for name in names)
+
+
+def _collect_changes(session: Session, _flush_context) -> None:
+    """``after_flush``: anota qué sucursales/productos tocó el flush.
+
+    Las listas ``new``/``dirty``/``deleted`` y el historial de atributos
+    todavía reflejan lo que se acaba de escribir.
+    """
+    try:
+        pending: _PendingChanges | None = session.info.get(_PENDING_KEY)
+        for objects, removed in (
+            (session.new, False),
+            (session.dirty, False),
+            (session.deleted, True),
+        ):
+            for obj in objects:
+                table = getattr(type(obj), "__tablename__", None)
+                if table not in {"product", "productvariant", "productbatch", "productkit", "companysettings"}:
+                    continue
+                company_id = getattr(obj, "company_id", None)
+                branch_id = getattr(obj, "branch_id", None)
+                if not company_id or not branch_id:
+                    continue
+                if pending is None:
+                    pending = session.info.setdefault(_PENDING_KEY, _PendingChanges())
+                key = (int(company_id), int(branch_id))
+                state = inspect(obj)
+                is_new = state.key is None or obj in session.new
+
+                if table == "companysettings":
+                    if removed or is_new or _changed(state, ("default_profit_margin",)):
+                        pending.companies.add(key[0])
+                elif table == "productkit":
+                    pending.catalog.add(key)
+                elif table == "productbatch":
+                    if getattr(obj, "product_id", None):
+                        pending.stock.setdefault(key, set()).add(int(obj.product_id))
+                else:
+                    fields = (
+                        _PRODUCT_CATALOG_FIELDS if table == "product" else _VARIANT_CATALOG_FIELDS
+                    )
+                    product_id = obj.id if table == "product" else obj.product_id
+                    if removed or is_new or _changed(state, fields):
+                        pending.catalog.add(key)
+                    elif product_id and _changed(state, ("stock",)):
+                        pending.stock.setdefault(key, set()).add(int(product_id))
+    except Exception:
+        logger.exception("No se pudieron registrar cambios para el cache de códigos")
+
+
+def _apply_changes(session: Session) -> None:
+    """``after_commit``: aplica lo anotado por los flushes de la transacción."""
+    pending: _PendingChanges | None = session.info.pop(_PENDING_KEY, None)
+    if pending is None:
+        return
+    try:
+        for company_id in pending.companies:
+            invalidate_barcode_cache(company_id)
+        for company_id, branch_id in pending.catalog:
+            if company_id not in pending.companies:
+                invalidate_barcode_cache(company_id, branch_id)
+        for (company_id, branch_id), product_ids in pending.stock.items():
+            if company_id in pending.companies or (company_id, branch_id) in pending.catalog:
+                continue
+            mark_barcode_stock_changed(company_id, branch_id, product_ids)
+    except Exception:
+        logger.exception("No se pudo invalidar el cache de códigos")
+
+
+def _discard_changes(session: Session, transaction) -> None:
+    """Fin de la transacción raíz sin commit (rollback/close): nada que aplicar."""
+    if transaction.parent is None:
+        session.info.pop(_PENDING_KEY, None)
+
+
+if BARCODE_CACHE_ENABLED:
+    event.listen(Session, "after_flush", _collect_changes)
+    event.listen(Session, "after_commit", _apply_changes)
+    event.listen(Session, "after_transaction_end", _discard_changes)
@@ -14,6 +14,10 @@ Arquitectura:
         3. Invoca la strategy en background
         4. Persiste el FiscalDocument con resultado
 
+    authorize_fiscal_batch() → envía juntos documentos ya numerados
+        (``emit_fiscal_document(..., send_now=False)``); en AFIP van varios
+        comprobantes por FECAESolicitar.
+
 Principios:
     - sale_service.py NO se modifica — el hook es post-commit.
     - NoOp es el default — cero overhead para el 99% del mundo.
@@ -26,6 +30,7 @@ from __future__ import annotations
 import abc
 import json
 import logging
+import os
 import re
 from datetime import datetime
 from decimal import ROUND_HALF_UP, Decimal
@@ -38,9 +43,20 @@ from app.enums import FiscalStatus, ReceiptType
 from app.models.billing import CompanyBillingConfig, FiscalDocument
 from app.models.platform_config import PlatformBillingSettings, PLATFORM_CONFIG_ID
 from app.models.sales import Sale, SaleItem
+from app.services.fiscal_numbering import (
+    FISCAL_NUMBER_BLOCK_SIZE,
+    SERIE_BOLETA,
+    SERIE_FACTURA,
+    prepare_number_block,
+    reserve_quota,
+    take_number,
+    uses_number_blocks,
+)
 from app.utils.crypto import decrypt_text
 from app.utils.db import get_async_session
 from app.utils.fiscal_validators import VALID_ENVIRONMENTS, validate_cuit
+from app.utils.http_client import http_client
+from app.utils.metrics import FISCAL_EMISSIONS_TOTAL
 from app.utils.tenant import set_tenant_context, tenant_context
 from app.utils.timezone import utc_now_naive
 
@@ -50,6 +66,9 @@ logger = logging.getLogger(__name__)
 MAX_RETRY_ATTEMPTS = 3
 NUBEFACT_TIMEOUT_SECONDS = 30
 AFIP_TIMEOUT_SECONDS = 15
+# Comprobantes por FECAESolicitar en AFIPBillingStrategy.send_documents
+# (AFIP admite hasta 250; 1 desactiva el lote).
+AFIP_WSFE_BATCH_SIZE = max(1, int(os.getenv("AFIP_WSFE_BATCH_SIZE", "50")))
 
 # Sanitiza credenciales Nubefact en mensajes de excepción antes de persistirlos
 # en ``FiscalDocument.fiscal_errors`` (visible en UI de reintentos → defensa
@@ -307,6 +326,21 @@ class BillingStrategy(abc.ABC):
         """
         ...
 
+    async def send_documents(
+        self,
+        entries: list[tuple[FiscalDocument, Sale, list[SaleItem]]],
+        config: CompanyBillingConfig,
+    ) -> list[FiscalDocument]:
+        """Envía varios documentos de la misma empresa.
+
+        Por defecto uno por uno con :meth:`send_document`; las autoridades
+        que aceptan lotes (AFIP) lo redefinen.
+        """
+        return [
+            await self.send_document(fiscal_doc, sale, items, config)
+            for fiscal_doc, sale, items in entries
+        ]
+
     @abc.abstractmethod
     def build_qr_data(
         self,
@@ -455,7 +489,7 @@ class SUNATBillingStrategy(BillingStrategy):
         fiscal_doc.retry_count += 1
 
         try:
-            async with httpx.AsyncClient(timeout=NUBEFACT_TIMEOUT_SECONDS) as client:
+            async with http_client("nubefact", timeout=NUBEFACT_TIMEOUT_SECONDS) as client:
                 response = await client.post(
                     nubefact_url,
                     json=payload,
@@ -750,64 +784,46 @@ class AFIPBillingStrategy(BillingStrategy):
         }]
         return imp_neto, imp_iva, Decimal("0"), iva_items
 
-    async def send_document(
+    async def _open_wsfe_session(
         self,
-        fiscal_doc: FiscalDocument,
-        sale: Sale,
-        items: list[SaleItem],
         config: CompanyBillingConfig,
-    ) -> FiscalDocument:
-        """Envía comprobante a AFIP WSFEv1 y obtiene CAE.
+    ) -> tuple[int, str, Any] | dict:
+        """Valida la config y autentica con WSAA (con cache de 12h).
 
-        Flujo:
-            1. Validar que existan certificados.
-            2. Autenticar con WSAA (con cache de 12h).
-            3. Determinar tipo de comprobante (A/B/C).
-            4. Construir request FECAESolicitar.
-            5. Enviar y procesar respuesta.
-            6. Actualizar FiscalDocument con CAE o error.
+        Returns:
+            ``(cuit, environment, wsaa_creds)`` o, si no se puede emitir, el
+            dict de error a guardar en ``fiscal_errors``.
         """
         from app.services.afip_wsaa import authenticate
-        from app.services.afip_wsfe import FECAERequest, fe_cae_solicitar
 
         cuit_str = (config.tax_id or "").strip()
         environment = (config.environment or "sandbox").strip().lower()
 
-        # ── 0. Validar environment ─────────────────────────
+        # ── Validar environment ───────────────────────────────
         if environment not in VALID_ENVIRONMENTS:
-            fiscal_doc.fiscal_status = FiscalStatus.error
-            fiscal_doc.fiscal_errors = json.dumps({
+            return {
                 "error": f"Entorno '{environment}' no válido. "
                 f"Valores permitidos: {', '.join(sorted(VALID_ENVIRONMENTS))}.",
-            })
-            return fiscal_doc
+            }
 
-        # ── 1. Validar certificados ──────────────────────────
+        # ── Validar certificados ──────────────────────────────
         if not config.encrypted_certificate or not config.encrypted_private_key:
-            fiscal_doc.fiscal_status = FiscalStatus.error
-            fiscal_doc.fiscal_errors = json.dumps({
-                "error": "Certificados AFIP no configurados para esta empresa. "
-                "Contacte al administrador de la plataforma para cargar "
-                "el certificado X.509 y la clave privada.",
-            })
             logger.warning(
                 "AFIP: sin certificados company_id=%s cuit=%s",
                 config.company_id, cuit_str,
             )
-            return fiscal_doc
+            return {
+                "error": "Certificados AFIP no configurados para esta empresa. "
+                "Contacte al administrador de la plataforma para cargar "
+                "el certificado X.509 y la clave privada.",
+            }
 
         # Validar CUIT con dígito verificador (Ley 20.594)
         cuit_ok, cuit_err = validate_cuit(cuit_str)
         if not cuit_ok:
-            fiscal_doc.fiscal_status = FiscalStatus.error
-            fiscal_doc.fiscal_errors = json.dumps({
-                "error": f"CUIT inválido: {cuit_err}",
-            })
-            return fiscal_doc
-
-        cuit = int(cuit_str)
+            return {"error": f"CUIT inválido: {cuit_err}"}
 
-        # ── 2. Autenticar con WSAA ───────────────────────────
+        # ── Autenticar con WSAA ───────────────────────────────
         try:
             wsaa_creds = await authenticate(
                 company_id=config.company_id,
@@ -817,41 +833,62 @@ class AFIPBillingStrategy(BillingStrategy):
                 service="wsfe",
             )
         except ValueError as exc:
-            fiscal_doc.fiscal_status = FiscalStatus.error
-            fiscal_doc.fiscal_errors = json.dumps({
-                "error": f"Error de autenticación WSAA: {_sanitize_exc(exc)}",
-                "tipo": "wsaa_auth",
-            })
             logger.error(
                 "AFIP WSAA auth error company_id=%s: %s",
                 config.company_id, exc,
             )
-            return fiscal_doc
+            return {
+                "error": f"Error de autenticación WSAA: {_sanitize_exc(exc)}",
+                "tipo": "wsaa_auth",
+            }
         except ConnectionError as exc:
-            fiscal_doc.fiscal_status = FiscalStatus.error
-            fiscal_doc.fiscal_errors = json.dumps({
-                "error": f"No se pudo conectar a WSAA: {_sanitize_exc(exc)}",
-                "tipo": "wsaa_connection",
-            })
             logger.error(
                 "AFIP WSAA connection error company_id=%s: %s",
                 config.company_id, exc,
             )
-            return fiscal_doc
+            return {
+                "error": f"No se pudo conectar a WSAA: {_sanitize_exc(exc)}",
+                "tipo": "wsaa_connection",
+            }
 
-        # ── 3. Determinar tipo de comprobante ────────────────
+        return int(cuit_str), environment, wsaa_creds
+
+    def _cbte_tipo(
+        self,
+        config: CompanyBillingConfig,
+        fiscal_doc: FiscalDocument,
+    ) -> tuple[str, int]:
+        """(categoría A/B/C, código de comprobante AFIP) del documento."""
         cbte_category = self._determine_cbte_category(config, fiscal_doc)
         cbte_tipo = _AFIP_CBTE_TIPO.get(cbte_category, {}).get(
             fiscal_doc.receipt_type, 11  # Default: Factura C
         )
+        return cbte_category, cbte_tipo
+
+    def _prepare_request(
+        self,
+        fiscal_doc: FiscalDocument,
+        sale: Sale,
+        config: CompanyBillingConfig,
+        cuit: int,
+        environment: str,
+    ):
+        """Arma el FECAERequest del documento y lo marca como enviado.
 
-        # ── 4. Calcular montos ───────────────────────────────
+        Guarda el request en ``xml_request`` (auditoría), pasa el documento a
+        ``sent`` e incrementa ``retry_count``.
+        """
+        from app.services.afip_wsfe import FECAERequest
+
+        # ── Determinar tipo de comprobante ───────────────────
+        cbte_category, cbte_tipo = self._cbte_tipo(config, fiscal_doc)
+
+        # ── Calcular montos ──────────────────────────────────
         total = fiscal_doc.total_amount
         imp_neto, imp_iva, imp_tot_conc, iva_items = self._compute_afip_amounts(
             cbte_category, total
         )
 
-        # ── 5. Construir y enviar FECAESolicitar ─────────────
         fecha_cbte = (
             sale.timestamp.strftime("%Y%m%d")
             if sale.timestamp
@@ -914,28 +951,16 @@ class AFIPBillingStrategy(BillingStrategy):
         fiscal_doc.fiscal_status = FiscalStatus.sent
         fiscal_doc.sent_at = utc_now_naive()
         fiscal_doc.retry_count += 1
+        return fecae_request
 
-        try:
-            cae_result = await fe_cae_solicitar(
-                token=wsaa_creds.token,
-                sign=wsaa_creds.sign,
-                cuit=cuit,
-                request=fecae_request,
-                environment=environment,
-            )
-        except Exception as exc:
-            fiscal_doc.fiscal_status = FiscalStatus.error
-            fiscal_doc.fiscal_errors = json.dumps({
-                "error": f"Error en FECAESolicitar: {_sanitize_exc(exc)}",
-                "tipo": "wsfe_exception",
-            })
-            logger.exception(
-                "AFIP FECAESolicitar exception company_id=%s sale_id=%s",
-                config.company_id, sale.id,
-            )
-            return fiscal_doc
-
-        # ── 6. Procesar resultado ────────────────────────────
+    def _apply_cae_result(
+        self,
+        fiscal_doc: FiscalDocument,
+        sale: Sale,
+        config: CompanyBillingConfig,
+        cae_result,
+    ) -> FiscalDocument:
+        """Vuelca el CAEResult de AFIP sobre el FiscalDocument."""
         fiscal_doc.xml_response = json.dumps({
             "resultado": cae_result.resultado,
             "cae": cae_result.cae,
@@ -977,6 +1002,206 @@ class AFIPBillingStrategy(BillingStrategy):
 
         return fiscal_doc
 
+    async def send_document(
+        self,
+        fiscal_doc: FiscalDocument,
+        sale: Sale,
+        items: list[SaleItem],
+        config: CompanyBillingConfig,
+    ) -> FiscalDocument:
+        """Envía comprobante a AFIP WSFEv1 y obtiene CAE.
+
+        Flujo:
+            1. Validar environment, certificados y CUIT.
+            2. Autenticar con WSAA (con cache de 12h).
+            3. Determinar tipo de comprobante (A/B/C) y montos.
+            4. Construir request FECAESolicitar.
+            5. Enviar y procesar respuesta.
+            6. Actualizar FiscalDocument con CAE o error.
+        """
+        from app.services.afip_wsfe import fe_cae_solicitar
+
+        wsfe_session = await self._open_wsfe_session(config)
+        if isinstance(wsfe_session, dict):
+            fiscal_doc.fiscal_status = FiscalStatus.error
+            fiscal_doc.fiscal_errors = json.dumps(wsfe_session)
+            return fiscal_doc
+        cuit, environment, wsaa_creds = wsfe_session
+
+        fecae_request = self._prepare_request(
+            fiscal_doc, sale, config, cuit, environment
+        )
+
+        try:
+            cae_result = await fe_cae_solicitar(
+                token=wsaa_creds.token,
+                sign=wsaa_creds.sign,
+                cuit=cuit,
+                request=fecae_request,
+                environment=environment,
+            )
+        except Exception as exc:
+            fiscal_doc.fiscal_status = FiscalStatus.error
+            fiscal_doc.fiscal_errors = json.dumps({
+                "error": f"Error en FECAESolicitar: {_sanitize_exc(exc)}",
+                "tipo": "wsfe_exception",
+            })
+            logger.exception(
+                "AFIP FECAESolicitar exception company_id=%s sale_id=%s",
+                config.company_id, sale.id,
+            )
+            return fiscal_doc
+
+        return self._apply_cae_result(fiscal_doc, sale, config, cae_result)
+
+    async def send_documents(
+        self,
+        entries: list[tuple[FiscalDocument, Sale, list[SaleItem]]],
+        config: CompanyBillingConfig,
+    ) -> list[FiscalDocument]:
+        """Autoriza varios comprobantes con FECAESolicitar en lote.
+
+        Una sola autenticación WSAA; los documentos se agrupan por tipo de
+        comprobante (el punto de venta es el de la config) y cada grupo se
+        manda en lotes de hasta ``AFIP_WSFE_BATCH_SIZE`` registros.
+
+        AFIP exige que el lote empiece en el próximo número a autorizar y
+        sea consecutivo, así que antes de cada grupo se consulta
+        FECompUltimoAutorizado (la misma fuente que
+        :func:`sync_afip_last_authorized`) y sólo va en lote el tramo
+        contiguo desde ``último + 1``. Lo que queda fuera del tramo, o los
+        lotes posteriores a uno con registros no aprobados, se manda de a uno
+        con :meth:`send_document` y recibe el mismo trato que hoy.
+
+        Una falla de transporte del lote deja los documentos en ``error``
+        (reintentables): AFIP no llegó a resolver ninguno.
+
+        Returns:
+            Los FiscalDocument en el orden de ``entries``.
+        """
+        from app.services.afip_wsfe import (
+            WSFE_MAX_CANT_REG,
+            fe_cae_solicitar_lote,
+            fe_comp_ultimo_autorizado,
+        )
+
+        if len(entries) <= 1:
+            return [
+                await self.send_document(fiscal_doc, sale, items, config)
+                for fiscal_doc, sale, items in entries
+            ]
+
+        wsfe_session = await self._open_wsfe_session(config)
+        if isinstance(wsfe_session, dict):
+            for fiscal_doc, _sale, _items in entries:
+                fiscal_doc.fiscal_status = FiscalStatus.error
+                fiscal_doc.fiscal_errors = json.dumps(wsfe_session)
+            return [fiscal_doc for fiscal_doc, _sale, _items in entries]
+        cuit, environment, wsaa_creds = wsfe_session
+
+        batch_size = max(1, min(AFIP_WSFE_BATCH_SIZE, WSFE_MAX_CANT_REG))
+        groups: dict[int, list[tuple[FiscalDocument, Sale, list[SaleItem]]]] = {}
+        for entry in entries:
+            _category, cbte_tipo = self._cbte_tipo(config, entry[0])
+            groups.setdefault(cbte_tipo, []).append(entry)
+
+        for cbte_tipo, group in groups.items():
+            group.sort(key=lambda entry: entry[0].fiscal_number or 0)
+            try:
+                last = await fe_comp_ultimo_autorizado(
+                    token=wsaa_creds.token,
+                    sign=wsaa_creds.sign,
+                    cuit=cuit,
+                    punto_venta=config.afip_punto_venta,
+                    cbte_tipo=cbte_tipo,
+                    environment=environment,
+                )
+                next_nro = (last.cbte_nro or 0) + 1 if last.success else None
+            except Exception as exc:
+                logger.warning(
+                    "AFIP lote: FECompUltimoAutorizado falló company_id=%s "
+                    "cbte_tipo=%s: %s",
+                    config.company_id, cbte_tipo, exc,
+                )
+                next_nro = None
+
+            before = [
+                entry for entry in group
+                if next_nro is None or (entry[0].fiscal_number or 0) < next_nro
+            ]
+            run: list[tuple[FiscalDocument, Sale, list[SaleItem]]] = []
+            for entry in group[len(before):]:
+                if entry[0].fiscal_number != next_nro + len(run):
+                    break
+                run.append(entry)
+            after = group[len(before) + len(run):]
+            if before or after:
+                logger.warning(
+                    "AFIP lote: numeración no contigua company_id=%s cbte_tipo=%s "
+                    "próximo=%s; %d comprobantes van de a uno",
+                    config.company_id, cbte_tipo, next_nro,
+                    len(before) + len(after),
+                )
+
+            for fiscal_doc, sale, items in before:
+                await self.send_document(fiscal_doc, sale, items, config)
+
+            for offset in range(0, len(run), batch_size):
+                chunk = run[offset:offset + batch_size]
+                if len(chunk) == 1:
+                    await self.send_document(*chunk[0], config)
+                    continue
+                requests = [
+                    self._prepare_request(fiscal_doc, sale, config, cuit, environment)
+                    for fiscal_doc, sale, _items in chunk
+                ]
+                try:
+                    results = await fe_cae_solicitar_lote(
+                        token=wsaa_creds.token,
+                        sign=wsaa_creds.sign,
+                        cuit=cuit,
+                        requests=requests,
+                        environment=environment,
+                    )
+                except Exception as exc:
+                    logger.exception(
+                        "AFIP FECAESolicitar lote exception company_id=%s",
+                        config.company_id,
+                    )
+                    results = None
+                    error = {
+                        "error": f"Error en FECAESolicitar: {_sanitize_exc(exc)}",
+                        "tipo": "wsfe_exception",
+                    }
+                else:
+                    if not any(result.resultado for result in results):
+                        error = {
+                            "error": "; ".join(results[0].errors)
+                            or "FECAESolicitar sin resultado",
+                            "tipo": "wsfe_lote",
+                        }
+                        results = None
+                if results is None:
+                    # AFIP no respondió: el resto del grupo queda pending para
+                    # el próximo intento en vez de insistir de a uno.
+                    for fiscal_doc, _sale, _items in chunk:
+                        fiscal_doc.fiscal_status = FiscalStatus.error
+                        fiscal_doc.fiscal_errors = json.dumps(error)
+                    after = []
+                    break
+
+                for (fiscal_doc, sale, _items), cae_result in zip(chunk, results):
+                    self._apply_cae_result(fiscal_doc, sale, config, cae_result)
+                if not all(result.success for result in results):
+                    # Un hueco en la numeración invalida los lotes siguientes.
+                    after = run[offset + batch_size:] + after
+                    break
+
+            for fiscal_doc, sale, items in after:
+                await self.send_document(fiscal_doc, sale, items, config)
+
+        return [fiscal_doc for fiscal_doc, _sale, _items in entries]
+
     def build_qr_data(
         self,
         fiscal_doc: FiscalDocument,
@@ -1095,14 +1320,18 @@ def _check_monthly_quota(
         config.billing_count_reset_date = now
 
     if config.current_billing_count >= config.max_billing_limit:
-        return False, (
-            f"Límite mensual alcanzado ({config.max_billing_limit} documentos). "
-            "Actualice su plan para emitir más comprobantes electrónicos."
-        )
+        return False, _quota_exceeded_message(config)
 
     return True, ""
 
 
+def _quota_exceeded_message(config: CompanyBillingConfig) -> str:
+    return (
+        f"Límite mensual alcanzado ({config.max_billing_limit} documentos). "
+        "Actualice su plan para emitir más comprobantes electrónicos."
+    )
+
+
 _DEFAULT_TAX_RATE = Decimal("0.18")
 
 
@@ -1131,6 +1360,34 @@ def _compute_fiscal_amounts(
     return base, tax, total
 
 
+async def _record_quota_exceeded(
+    session,
+    company_id: int,
+    branch_id: int,
+    sale_id: int,
+    receipt_type: str,
+    message: str,
+) -> FiscalDocument:
+    """Persiste el ``FiscalDocument`` en error por cuota agotada."""
+    logger.warning(
+        "Cuota billing agotada: company_id=%s | %s",
+        company_id,
+        message,
+    )
+    fiscal_doc = FiscalDocument(
+        company_id=company_id,
+        branch_id=branch_id,
+        sale_id=sale_id,
+        receipt_type=receipt_type,
+        fiscal_status=FiscalStatus.error,
+        fiscal_errors=json.dumps({"quota_exceeded": message}),
+    )
+    session.add(fiscal_doc)
+    await session.commit()
+    FISCAL_EMISSIONS_TOTAL.inc(status="quota_exceeded")
+    return fiscal_doc
+
+
 async def emit_fiscal_document(
     sale_id: int,
     company_id: int,
@@ -1143,6 +1400,8 @@ async def emit_fiscal_document(
     receipt_type_override: str | None = None,
     credit_note_reason: str | None = None,
     original_fiscal_doc_id: int | None = None,
+    send_now: bool = True,
+    number_holder: str | None = None,
 ) -> FiscalDocument | None:
     """Orquesta la emisión de un documento fiscal electrónico.
 
@@ -1158,6 +1417,10 @@ async def emit_fiscal_document(
         6. Invoca la estrategia correspondiente (llamada HTTP async).
         7. Commit final con resultado y QR.
 
+    Con numeración por bloques la config se lee sin lock: el bloque del
+    holder se prepara antes de abrir la transacción (``prepare_number_block``)
+    y cupo y número se toman justo antes de crear el documento.
+
     Args:
         sale_id: ID de la venta ya commiteada.
         company_id: tenant company.
@@ -1170,6 +1433,11 @@ async def emit_fiscal_document(
             Usado para emitir Nota de Crédito (ReceiptType.nota_credito).
         credit_note_reason: motivo de la nota de crédito (texto libre).
         original_fiscal_doc_id: ID del FiscalDocument original que se está anulando.
+        send_now: si es False se detiene tras el paso 5 y devuelve el
+            documento numerado en ``pending``; lo envía después
+            :func:`authorize_fiscal_batch` junto con otros de la empresa.
+        number_holder: dueño del bloque de correlativos cuando la numeración
+            es por bloques (terminal o worker; por defecto el proceso).
 
     Returns:
         FiscalDocument con resultado, o None si billing no está activo.
@@ -1179,7 +1447,28 @@ async def emit_fiscal_document(
 
     set_tenant_context(company_id, branch_id)
 
+    # Nota de crédito y nota de débito usan la serie de factura/boleta
+    # según el tipo de documento original al que referencian.
+    _uses_factura_serie = effective_receipt_type in (
+        ReceiptType.factura,
+        ReceiptType.nota_credito,  # NC factura usa serie F
+        ReceiptType.nota_debito,
+    )
+    # Verificar si hay "FACTURA" (mayúsculas) por compatibilidad
+    try:
+        _uses_factura_serie = _uses_factura_serie or (
+            effective_receipt_type == ReceiptType.FACTURA
+        )
+    except AttributeError:
+        pass
+    serie_kind = SERIE_FACTURA if _uses_factura_serie else SERIE_BOLETA
+
     try:
+        if FISCAL_NUMBER_BLOCK_SIZE > 1:
+            # El bloque se adopta/reserva en su propia transacción ANTES de
+            # abrir la de emisión: dentro de ella solo se bloquea su fila.
+            await prepare_number_block(company_id, serie_kind, holder=number_holder)
+
         async with get_async_session() as session:
             # 0. Idempotencia granular:
             #    - Factura/Boleta: una sola por venta (por tipo).
@@ -1216,15 +1505,26 @@ async def emit_fiscal_document(
                 )
                 return existing
 
-            # 1. Obtener config con lock exclusivo para numeración atómica
-            config = (
-                await session.exec(
-                    select(CompanyBillingConfig)
-                    .where(CompanyBillingConfig.company_id == company_id)
-                    .where(CompanyBillingConfig.is_active == True)  # noqa: E712
-                    .with_for_update()
-                )
-            ).first()
+            # 1. Obtener config con lock exclusivo para numeración atómica.
+            #    Con numeración por bloques (fiscal_numbering) se lee sin lock:
+            #    número y cuota salen del bloque y del contador mensual.
+            config_q = (
+                select(CompanyBillingConfig)
+                .where(CompanyBillingConfig.company_id == company_id)
+                .where(CompanyBillingConfig.is_active == True)  # noqa: E712
+            )
+            if FISCAL_NUMBER_BLOCK_SIZE > 1:
+                config = (await session.exec(config_q)).first()
+                if config is not None and not uses_number_blocks(config):
+                    config = (
+                        await session.exec(
+                            config_q.with_for_update().execution_options(
+                                populate_existing=True
+                            )
+                        )
+                    ).first()
+            else:
+                config = (await session.exec(config_q.with_for_update())).first()
 
             if config is None:
                 logger.debug(
@@ -1233,57 +1533,30 @@ async def emit_fiscal_document(
                 )
                 return None
 
-            # 2. Validar cuota mensual
-            allowed, message = _check_monthly_quota(config)
-            if not allowed:
-                logger.warning(
-                    "Cuota billing agotada: company_id=%s | %s",
-                    company_id,
-                    message,
-                )
-                # Crear FiscalDocument con error de cuota
-                fiscal_doc = FiscalDocument(
-                    company_id=company_id,
-                    branch_id=branch_id,
-                    sale_id=sale_id,
-                    receipt_type=receipt_type,
-                    fiscal_status=FiscalStatus.error,
-                    fiscal_errors=json.dumps({"quota_exceeded": message}),
-                )
-                session.add(fiscal_doc)
-                await session.commit()
-                return fiscal_doc
-
-            # 3. Asignar serie y número correlativo (atómico bajo FOR UPDATE)
-            # Nota de crédito y nota de débito usan la serie de factura/boleta
-            # según el tipo de documento original al que referencian.
-            _uses_factura_serie = effective_receipt_type in (
-                ReceiptType.factura,
-                ReceiptType.nota_credito,  # NC factura usa serie F
-                ReceiptType.nota_debito,
-            )
-            # Verificar si hay "FACTURA" (mayúsculas) por compatibilidad
-            try:
-                _uses_factura_serie = _uses_factura_serie or (
-                    effective_receipt_type == ReceiptType.FACTURA
-                )
-            except AttributeError:
-                pass
-
-            if _uses_factura_serie:
-                config.current_sequence_factura += 1
-                serie = config.serie_factura
-                seq = config.current_sequence_factura
-            else:
-                config.current_sequence_boleta += 1
-                serie = config.serie_boleta
-                seq = config.current_sequence_boleta
+            by_blocks = uses_number_blocks(config)
 
-            full_number = f"{serie}-{seq:08d}"
+            # 2. Validar cuota mensual (con bloques se descuenta en el paso 7)
+            if not by_blocks:
+                allowed, message = _check_monthly_quota(config)
+                if not allowed:
+                    return await _record_quota_exceeded(
+                        session, company_id, branch_id, sale_id, receipt_type, message
+                    )
 
-            # 4. Incrementar contador mensual
-            config.current_billing_count += 1
-            config.updated_at = utc_now_naive()
+            # 3. Asignar serie y número correlativo (atómico bajo FOR UPDATE)
+            #    y 4. incrementar contador mensual. Con bloques, ambos en el
+            #    paso 7.
+            if not by_blocks:
+                if _uses_factura_serie:
+                    config.current_sequence_factura += 1
+                    serie = config.serie_factura
+                    seq = config.current_sequence_factura
+                else:
+                    config.current_sequence_boleta += 1
+                    serie = config.serie_boleta
+                    seq = config.current_sequence_boleta
+                config.current_billing_count += 1
+                config.updated_at = utc_now_naive()
 
             # 5. Cargar la venta y sus ítems — filtrado estricto por tenant
             #    para evitar emisión cross-tenant si el caller envía
@@ -1322,7 +1595,22 @@ async def emit_fiscal_document(
                 sale, items, tax_rate=_company_tax_rate
             )
 
-            # 7. Crear FiscalDocument
+            # 7. Con bloques, cupo y número recién acá: la fila del contador
+            #    mensual y la del bloque quedan bloqueadas solo hasta el
+            #    commit parcial, y un rollback devuelve ambos.
+            if by_blocks:
+                if not await reserve_quota(session, config):
+                    message = _quota_exceeded_message(config)
+                    await session.rollback()
+                    return await _record_quota_exceeded(
+                        session, company_id, branch_id, sale_id, receipt_type, message
+                    )
+                serie, seq = await take_number(
+                    session, config, serie_kind, holder=number_holder
+                )
+            full_number = f"{serie}-{seq:08d}"
+
+            # Crear FiscalDocument
             # Para nota de crédito, almacenar el motivo y doc original
             _fiscal_errors_pre = None
             if effective_receipt_type == ReceiptType.nota_credito:
@@ -1364,6 +1652,8 @@ async def emit_fiscal_document(
             await session.commit()
             await session.refresh(fiscal_doc)
             await session.refresh(config)
+            if not send_now:
+                return fiscal_doc
 
             # 8. Invocar estrategia (llamada HTTP async a SUNAT/AFIP)
             strategy = BillingFactory.get_strategy(config)
@@ -1394,6 +1684,7 @@ async def emit_fiscal_document(
                 fiscal_doc.fiscal_status,
                 sale_id,
             )
+            FISCAL_EMISSIONS_TOTAL.inc(status=fiscal_doc.fiscal_status)
             return fiscal_doc
 
     except Exception as exc:
@@ -1401,6 +1692,7 @@ async def emit_fiscal_document(
             "Error crítico en emit_fiscal_document | sale_id=%s",
             sale_id,
         )
+        FISCAL_EMISSIONS_TOTAL.inc(status="error")
         # B1-01: Si ya existe una fila parcialmente persistida (commit
         # de numeración en L~1287 ya pasó), actualizamos esa fila en lugar
         # de crear una nueva huérfana sin serie/número — evita duplicados
@@ -1452,6 +1744,118 @@ async def emit_fiscal_document(
         set_tenant_context(None, None)
 
 
+async def authorize_fiscal_batch(
+    fiscal_doc_ids: list[int],
+    company_id: int,
+    branch_id: int,
+) -> list[FiscalDocument]:
+    """Envía juntos documentos ya numerados de una empresa/sucursal.
+
+    Complemento de ``emit_fiscal_document(..., send_now=False)``: toma los
+    documentos con FOR UPDATE, carga ventas e ítems con una query cada uno
+    y delega en ``strategy.send_documents`` (AFIP: FECAESolicitar en lote).
+    Sólo se envían los que siguen en ``pending``/``error`` con reintentos
+    disponibles; el resto se devuelve tal cual.
+
+    Returns:
+        Los FiscalDocument encontrados, en el orden de ``fiscal_doc_ids``.
+    """
+    if not fiscal_doc_ids:
+        return []
+    set_tenant_context(company_id, branch_id)
+
+    try:
+        async with get_async_session() as session:
+            docs = (
+                await session.exec(
+                    select(FiscalDocument)
+                    .where(FiscalDocument.id.in_(fiscal_doc_ids))
+                    .where(FiscalDocument.company_id == company_id)
+                    .order_by(FiscalDocument.id)
+                    .with_for_update()
+                )
+            ).all()
+            by_id = {doc.id: doc for doc in docs}
+            ordered = [by_id[doc_id] for doc_id in fiscal_doc_ids if doc_id in by_id]
+            sendable = [
+                doc for doc in ordered
+                if doc.fiscal_status in (FiscalStatus.pending, FiscalStatus.error)
+                and doc.retry_count < MAX_RETRY_ATTEMPTS
+            ]
+            if not sendable:
+                return ordered
+
+            config = (
+                await session.exec(
+                    select(CompanyBillingConfig)
+                    .where(CompanyBillingConfig.company_id == company_id)
+                    .where(CompanyBillingConfig.is_active == True)  # noqa: E712
+                )
+            ).first()
+            if config is None:
+                return ordered
+
+            sale_ids = {doc.sale_id for doc in sendable}
+            sales = {
+                sale.id: sale
+                for sale in (
+                    await session.exec(
+                        select(Sale)
+                        .where(Sale.id.in_(sale_ids))
+                        .where(Sale.company_id == company_id)
+                        .where(Sale.branch_id == branch_id)
+                    )
+                ).all()
+            }
+            items_by_sale: dict[int, list[SaleItem]] = {}
+            for item in (
+                await session.exec(
+                    select(SaleItem)
+                    .where(SaleItem.sale_id.in_(sale_ids))
+                    .where(SaleItem.company_id == company_id)
+                )
+            ).all():
+                items_by_sale.setdefault(item.sale_id, []).append(item)
+
+            entries = []
+            for doc in sendable:
+                sale = sales.get(doc.sale_id)
+                if sale is None:
+                    logger.error(
+                        "batch: Sale id=%s no encontrada en tenant",
+                        doc.sale_id,
+                    )
+                    continue
+                entries.append((doc, sale, items_by_sale.get(sale.id, [])))
+
+            strategy = BillingFactory.get_strategy(config)
+            await strategy.send_documents(entries, config)
+
+            for doc, _sale, _items in entries:
+                if doc.fiscal_status == FiscalStatus.authorized:
+                    try:
+                        doc.qr_data = strategy.build_qr_data(doc, config)
+                    except Exception as qr_exc:
+                        logger.warning(
+                            "batch: Error generando QR para doc_id=%s: %s",
+                            doc.id,
+                            qr_exc,
+                        )
+                session.add(doc)
+            await session.commit()
+
+            for doc, _sale, _items in entries:
+                FISCAL_EMISSIONS_TOTAL.inc(status=doc.fiscal_status)
+            logger.info(
+                "batch: %d documentos enviados | company_id=%s",
+                len(entries),
+                company_id,
+            )
+            return ordered
+    finally:
+        set_tenant_context(None, None)
+
+
 async def retry_fiscal_document(
     fiscal_doc_id: int,
     company_id: int,
@@ -37,6 +37,8 @@ from datetime import timedelta
 
 import httpx
 
+from app.utils.http_client import http_client
+
 logger = logging.getLogger(__name__)
 
 # ── TTLs de caché (exportados para el state que gestiona DocumentLookupCache) ──
@@ -188,7 +190,7 @@ class PEDocumentLookup(DocumentLookupStrategy):
             headers["Authorization"] = f"Bearer {self.api_token}"
 
         try:
-            async with httpx.AsyncClient(timeout=PE_API_TIMEOUT_SECONDS) as client:
+            async with http_client("lookup_pe", timeout=PE_API_TIMEOUT_SECONDS) as client:
                 resp = await client.get(
                     endpoint,
                     params={"numero": doc_number},
@@ -300,7 +302,7 @@ class ARDocumentLookup(DocumentLookupStrategy):
             return LookupResult(error="El CUIT debe tener 11 dígitos.")
 
         try:
-            async with httpx.AsyncClient(timeout=AR_API_TIMEOUT_SECONDS) as client:
+            async with http_client("lookup_ar", timeout=AR_API_TIMEOUT_SECONDS) as client:
                 resp = await client.get(
                     self.api_url,
                     params={"cuit": doc_number},
@@ -0,0 +1,515 @@
+"""Cola de exportaciones en segundo plano (XLSX) con progreso y deduplicación.
+
+Los exports del historial, caja y reservas armaban el workbook dentro del
+handler: openpyxl es CPU puro y, con el GIL, congelaba el event loop (y la
+sesión del usuario) hasta tener el archivo. Ahora el handler sólo junta las
+filas (BD, vía ``run_sync_db``) y encola un job; el armado del XLSX corre en un
+``ProcessPoolExecutor`` y el state consulta el progreso hasta poder descargar.
+
+Piezas:
+
+  * **Job**: hash ``export:job:<id>`` en Redis con TTL (``EXPORT_JOB_TTL_SECONDS``).
+    En modo local, un JSON por job en ``EXPORT_JOBS_DIR`` (los procesos hijos
+    del pool también lo pueden actualizar).
+  * **Cola**: lista ``export:queue`` en Redis; la consume el dispatcher embebido
+    de cada réplica o ``python -m app.tasks.export_worker``. En modo local, cola
+    en memoria del proceso que encoló.
+  * **Store temporal**: ``EXPORT_JOBS_DIR`` guarda el payload (pickle) y el
+    resultado (``.xlsx``). :func:`cleanup_export_files` borra lo vencido.
+
+El payload y el resultado viven en disco: quien saca un job de la cola
+compartida tiene que ver el mismo directorio que quien lo encoló y que quien
+lo descarga. Por eso la cola y los jobs van a Redis sólo con
+``EXPORT_JOBS_SHARED_DIR=1`` (volumen compartido entre réplicas y workers);
+si no, cada réplica procesa sus propios exports en modo local aunque haya
+Redis.
+  * **Dedupe**: mismo ``(empresa, sucursal, reporte, filtros)`` devuelve el job
+    en curso, o el terminado hace menos de ``EXPORT_JOB_DEDUP_SECONDS``.
+
+Los renderers (``app.services.export_renderers``) reciben el payload y un
+callback ``progress(pct)`` y devuelven el workbook; no tocan BD ni state.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import pickle
+import queue
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict, dataclass, field
+from typing import TYPE_CHECKING, Any
+
+from app.utils.redis_client import SharedRedis
+
+if TYPE_CHECKING:
+    import redis
+
+logger = logging.getLogger("ExportJobs")
+
+EXPORT_JOBS_ENABLED = os.getenv("EXPORT_JOBS", "1").strip().lower() not in {"0", "false", "no"}
+# Procesos del pool (cada uno arma un workbook a la vez).
+EXPORT_JOB_WORKERS = max(1, int(os.getenv("EXPORT_JOB_WORKERS", "2")))
+# Vida de jobs, payloads y resultados en el store temporal.
+EXPORT_JOB_TTL_SECONDS = max(60, int(os.getenv("EXPORT_JOB_TTL_SECONDS", "900")))
+# Ventana en la que un export terminado se reusa para los mismos filtros.
+EXPORT_JOB_DEDUP_SECONDS = max(0, int(os.getenv("EXPORT_JOB_DEDUP_SECONDS", "60")))
+# 0 = esta réplica sólo encola; los jobs los toma ``app.tasks.export_worker``.
+# En modo local se ignora: la cola es del proceso y siempre se procesa embebida.
+EXPORT_JOBS_EMBEDDED = os.getenv("EXPORT_JOBS_EMBEDDED", "1").strip().lower() not in {"0", "false", "no"}
+EXPORT_JOBS_DIR = os.getenv("EXPORT_JOBS_DIR", "").strip() or os.path.join(
+    tempfile.gettempdir(), "tuwayki_exports"
+)
+# 1 = ``EXPORT_JOBS_DIR`` es un volumen que ven todas las réplicas y workers:
+# recién ahí la cola y los jobs se comparten por Redis.
+EXPORT_JOBS_SHARED_DIR = os.getenv("EXPORT_JOBS_SHARED_DIR", "0").strip().lower() in {"1", "true", "yes"}
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_ERROR = "error"
+
+_QUEUE_KEY = "export:queue"
+_JOB_KEY_PREFIX = "export:job"
+_DEDUP_KEY_PREFIX = "export:dedup"
+_CLEANUP_INTERVAL_SECONDS = 60.0
+
+_redis = SharedRedis("exports", logger=logger)
+_lock = threading.Lock()
+# Sin Redis: índice de dedupe y cola del proceso que encola.
+_local_dedup: dict[str, str] = {}
+_local_queue: "queue.SimpleQueue[str]" = queue.SimpleQueue()
+_dispatcher: "ExportDispatcher | None" = None
+
+
+class ExportJobError(Exception):
+    """El export no se pudo generar (job vencido, error del renderer, etc.)."""
+
+
+@dataclass
+class ExportJob:
+    id: str
+    report: str
+    filename: str
+    dedup_key: str = ""
+    status: str = STATUS_QUEUED
+    progress: int = 0
+    error: str = ""
+    created_at: float = field(default_factory=time.time)
+    finished_at: float = 0.0
+
+    @property
+    def pending(self) -> bool:
+        return self.status in {STATUS_QUEUED, STATUS_RUNNING}
+
+    def to_mapping(self) -> dict[str, str]:
+        return {key: str(value) for key, value in asdict(self).items()}
+
+    @classmethod
+    def from_mapping(cls, data: dict[str, Any]) -> "ExportJob":
+        return cls(
+            id=str(data["id"]),
+            report=str(data.get("report", "")),
+            filename=str(data.get("filename", "")),
+            dedup_key=str(data.get("dedup_key", "")),
+            status=str(data.get("status", STATUS_QUEUED)),
+            progress=int(float(data.get("progress", 0) or 0)),
+            error=str(data.get("error", "")),
+            created_at=float(data.get("created_at", 0) or 0),
+            finished_at=float(data.get("finished_at", 0) or 0),
+        )
+
+
+def _get_redis() -> "redis.Redis | None":
+    """Cliente Redis para cola y jobs; None = modo local (archivos + cola en memoria).
+
+    Sin ``EXPORT_JOBS_SHARED_DIR`` siempre es modo local: otra réplica que
+    tomara el job no encontraría el payload en su disco.
+    """
+    if not EXPORT_JOBS_SHARED_DIR:
+        return None
+    return _redis.sync_client()
+
+
+def export_queue_backend() -> str:
+    """``"redis"`` si la cola es compartida entre réplicas/workers, si no ``"local"``."""
+    return "redis" if _get_redis() is not None else "local"
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Store temporal (payloads, resultados y jobs sin Redis)
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _path(job_id: str, suffix: str) -> str:
+    return os.path.join(EXPORT_JOBS_DIR, f"{job_id}{suffix}")
+
+
+def _atomic_write(path: str, data: bytes) -> None:
+    os.makedirs(EXPORT_JOBS_DIR, exist_ok=True)
+    tmp = f"{path}.part"
+    with open(tmp, "wb") as fh:
+        fh.write(data)
+    os.replace(tmp, path)
+
+
+def export_result_path(job_id: str) -> str:
+    return _path(job_id, ".xlsx")
+
+
+def read_export_result(job_id: str) -> bytes:
+    """Bytes del XLSX terminado; ``ExportJobError`` si ya se limpió."""
+    try:
+        with open(export_result_path(job_id), "rb") as fh:
+            return fh.read()
+    except FileNotFoundError as exc:
+        raise ExportJobError("El archivo del export ya no está disponible.") from exc
+
+
+def cleanup_export_files(now: float | None = None) -> int:
+    """Borra payloads, resultados y jobs locales más viejos que el TTL."""
+    if not os.path.isdir(EXPORT_JOBS_DIR):
+        return 0
+    cutoff = (now if now is not None else time.time()) - EXPORT_JOB_TTL_SECONDS
+    removed = 0
+    for entry in os.scandir(EXPORT_JOBS_DIR):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            continue
+    if removed:
+        logger.info("Exports vencidos eliminados: %d", removed)
+    return removed
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Jobs
+# ─────────────────────────────────────────────────────────────────────────────
+
+def export_dedup_key(
+    report: str,
+    company_id: int,
+    branch_id: int | None,
+    filters: dict[str, Any],
+) -> str:
+    """Huella estable de ``(tenant, reporte, filtros)``."""
+    raw = json.dumps(
+        [report, company_id, branch_id or 0, filters],
+        sort_keys=True,
+        default=str,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _save_job(job: ExportJob) -> None:
+    client = _get_redis()
+    if client is not None:
+        key = f"{_JOB_KEY_PREFIX}:{job.id}"
+        pipe = client.pipeline()
+        pipe.hset(key, mapping=job.to_mapping())
+        pipe.expire(key, EXPORT_JOB_TTL_SECONDS)
+        pipe.execute()
+        return
+    _atomic_write(_path(job.id, ".json"), json.dumps(job.to_mapping()).encode("utf-8"))
+
+
+def get_export_job(job_id: str) -> ExportJob | None:
+    client = _get_redis()
+    if client is not None:
+        data = client.hgetall(f"{_JOB_KEY_PREFIX}:{job_id}")
+        return ExportJob.from_mapping(data) if data else None
+    try:
+        with open(_path(job_id, ".json"), "rb") as fh:
+            return ExportJob.from_mapping(json.loads(fh.read()))
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _update_job(job_id: str, **fields: Any) -> None:
+    client = _get_redis()
+    if client is not None:
+        client.hset(
+            f"{_JOB_KEY_PREFIX}:{job_id}",
+            mapping={key: str(value) for key, value in fields.items()},
+        )
+        return
+    job = get_export_job(job_id)
+    if job is None:
+        return
+    for key, value in fields.items():
+        setattr(job, key, value)
+    _save_job(job)
+
+
+def _reusable(job: ExportJob | None) -> bool:
+    if job is None:
+        return False
+    if job.pending:
+        return True
+    return (
+        job.status == STATUS_DONE
+        and (time.time() - job.finished_at) <= EXPORT_JOB_DEDUP_SECONDS
+        and os.path.exists(export_result_path(job.id))
+    )
+
+
+def find_export_job(
+    report: str,
+    company_id: int,
+    branch_id: int | None,
+    filters: dict[str, Any],
+) -> ExportJob | None:
+    """Job en curso (o recién terminado) para los mismos filtros, si existe."""
+    dedup_key = export_dedup_key(report, company_id, branch_id, filters)
+    client = _get_redis()
+    if client is not None:
+        job_id = client.get(f"{_DEDUP_KEY_PREFIX}:{dedup_key}")
+    else:
+        with _lock:
+            job_id = _local_dedup.get(dedup_key)
+    if not job_id:
+        return None
+    job = get_export_job(job_id)
+    return job if _reusable(job) else None
+
+
+def submit_export_job(
+    report: str,
+    *,
+    company_id: int,
+    branch_id: int | None,
+    filters: dict[str, Any],
+    payload: dict[str, Any],
+    filename: str,
+) -> ExportJob:
+    """Encola ``report`` con ``payload`` o devuelve el job equivalente ya encolado."""
+    from app.services.export_renderers import EXPORT_RENDERERS
+
+    if report not in EXPORT_RENDERERS:
+        raise ValueError(f"Reporte de export desconocido: {report}")
+    existing = find_export_job(report, company_id, branch_id, filters)
+    if existing is not None:
+        return existing
+
+    dedup_key = export_dedup_key(report, company_id, branch_id, filters)
+    job = ExportJob(
+        id=uuid.uuid4().hex,
+        report=report,
+        filename=filename,
+        dedup_key=dedup_key,
+    )
+    _atomic_write(_path(job.id, ".payload"), pickle.dumps(payload, pickle.HIGHEST_PROTOCOL))
+
+    client = _get_redis()
+    if client is not None:
+        # SET NX: si otra réplica encoló el mismo export en paralelo, gana la suya.
+        claimed = client.set(
+            f"{_DEDUP_KEY_PREFIX}:{dedup_key}", job.id, nx=True, ex=EXPORT_JOB_TTL_SECONDS
+        )
+        if not claimed:
+            other = find_export_job(report, company_id, branch_id, filters)
+            if other is not None:
+                _remove_quietly(_path(job.id, ".payload"))
+                return other
+            client.set(f"{_DEDUP_KEY_PREFIX}:{dedup_key}", job.id, ex=EXPORT_JOB_TTL_SECONDS)
+        _save_job(job)
+        client.lpush(_QUEUE_KEY, job.id)
+        if EXPORT_JOBS_EMBEDDED:
+            ensure_export_dispatcher()
+    else:
+        _save_job(job)
+        with _lock:
+            _local_dedup[dedup_key] = job.id
+        _local_queue.put(job.id)
+        ensure_export_dispatcher()
+    logger.info("Export encolado: %s %s (empresa=%s)", report, job.id, company_id)
+    return job
+
+
+def _remove_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _next_job_id(timeout: float) -> str | None:
+    client = _get_redis()
+    if client is not None:
+        job_id = client.rpop(_QUEUE_KEY)
+        if job_id:
+            return job_id
+        time.sleep(min(timeout, 0.5))
+    try:
+        return _local_queue.get(timeout=timeout if client is None else 0.01)
+    except queue.Empty:
+        return None
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Ejecución (proceso hijo)
+# ─────────────────────────────────────────────────────────────────────────────
+
+def run_export_job(job_id: str) -> str:
+    """Arma el XLSX de ``job_id``. Corre en un proceso del pool.
+
+    Devuelve el estado final. Los errores del renderer quedan en el job; no
+    se propagan al dispatcher.
+    """
+    from app.services.export_renderers import EXPORT_RENDERERS
+
+    job = get_export_job(job_id)
+    if job is None or job.status != STATUS_QUEUED:
+        return job.status if job else STATUS_ERROR
+    _update_job(job_id, status=STATUS_RUNNING, progress=1)
+    payload_path = _path(job_id, ".payload")
+    last_reported = [1]
+
+    def progress(pct: float) -> None:
+        value = max(1, min(99, int(pct)))
+        # Pocas escrituras: sólo saltos de 5 puntos.
+        if value - last_reported[0] >= 5:
+            last_reported[0] = value
+            _update_job(job_id, progress=value)
+
+    try:
+        with open(payload_path, "rb") as fh:
+            payload = pickle.load(fh)
+        workbook = EXPORT_RENDERERS[job.report](payload, progress)
+        os.makedirs(EXPORT_JOBS_DIR, exist_ok=True)
+        tmp = f"{export_result_path(job_id)}.part"
+        workbook.save(tmp)
+        os.replace(tmp, export_result_path(job_id))
+    except Exception as exc:
+        logger.exception("Export %s (%s) falló", job_id, job.report)
+        _update_job(
+            job_id,
+            status=STATUS_ERROR,
+            error=(str(exc) or type(exc).__name__)[:200],
+            finished_at=time.time(),
+        )
+        return STATUS_ERROR
+    finally:
+        _remove_quietly(payload_path)
+    _update_job(job_id, status=STATUS_DONE, progress=100, finished_at=time.time())
+    return STATUS_DONE
+
+
+class ExportDispatcher:
+    """Toma jobs de la cola y los reparte en un pool de procesos.
+
+    Sólo saca de la cola cuando hay un proceso libre, así los jobs pendientes
+    quedan en Redis para otras réplicas/workers.
+    """
+
+    def __init__(self, max_workers: int = EXPORT_JOB_WORKERS) -> None:
+        self._max_workers = max_workers
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._executor: ProcessPoolExecutor | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._last_cleanup = 0.0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: el proceso del app tiene threads (event loop, pools) y un
+            # fork podría heredar locks tomados.
+            self._executor = ProcessPoolExecutor(
+                max_workers=self._max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def _on_done(self, job_id: str, future: Future) -> None:
+        # Import diferido: los procesos hijos importan este módulo y no
+        # necesitan las métricas (ni reflex).
+        from app.utils.metrics import EXPORTS_TOTAL
+
+        self._slots.release()
+        exc = future.exception()
+        if exc is None:
+            EXPORTS_TOTAL.inc(status=future.result())
+            return
+        EXPORTS_TOTAL.inc(status="crashed")
+        logger.error("Proceso de export caído en %s: %s", job_id, exc)
+        try:
+            _update_job(
+                job_id,
+                status=STATUS_ERROR,
+                error="El proceso de exportación terminó inesperadamente.",
+                finished_at=time.time(),
+            )
+        except Exception:
+            logger.exception("No se pudo marcar el export %s como fallido", job_id)
+        if isinstance(exc, BrokenProcessPool) and self._executor is not None:
+            # Un hijo murió (OOM, señal): el pool entero queda inutilizable.
+            broken, self._executor = self._executor, None
+            broken.shutdown(wait=False, cancel_futures=True)
+
+    def _maybe_cleanup(self) -> None:
+        now = time.monotonic()
+        if now - self._last_cleanup >= _CLEANUP_INTERVAL_SECONDS:
+            self._last_cleanup = now
+            try:
+                cleanup_export_files()
+            except OSError as exc:
+                logger.warning("Limpieza de exports falló: %s", exc)
+
+    def serve_forever(self) -> None:
+        logger.info("Dispatcher de exports iniciado | workers=%d", self._max_workers)
+        while not self._stop.is_set():
+            self._maybe_cleanup()
+            if not self._slots.acquire(timeout=1.0):
+                continue
+            try:
+                job_id = _next_job_id(timeout=1.0)
+            except Exception as exc:
+                logger.warning("Cola de exports no disponible: %s", str(exc)[:80])
+                job_id = None
+                time.sleep(1.0)
+            if not job_id:
+                self._slots.release()
+                continue
+            try:
+                future = self._pool().submit(run_export_job, job_id)
+            except Exception:
+                self._slots.release()
+                logger.exception("No se pudo lanzar el export %s", job_id)
+                _update_job(job_id, status=STATUS_ERROR, error="Pool de exportación no disponible.")
+                continue
+            future.add_done_callback(lambda fut, jid=job_id: self._on_done(jid, fut))
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self.serve_forever, name="export-dispatcher", daemon=True
+        )
+        self._thread.start()
+
+    def is_alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def stop(self, wait: bool = True) -> None:
+        self._stop.set()
+        if self._thread is not None and wait:
+            self._thread.join(timeout=5)
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def ensure_export_dispatcher() -> None:
+    """Arranca (una vez por proceso) el dispatcher embebido."""
+    global _dispatcher
+    with _lock:
+        if _dispatcher is not None and _dispatcher.is_alive():
+            return
+        _dispatcher = ExportDispatcher()
+        _dispatcher.start()
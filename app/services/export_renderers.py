@@ -0,0 +1,497 @@
+"""Renderers XLSX de los exports encolados (``app.services.export_jobs``).
+
+Cada renderer recibe el payload que armó el state (filas ya resueltas: sin
+ORM ni acceso a BD, sólo tipos picklables) y un callback ``progress(pct)``, y
+devuelve el workbook listo para guardar. Corren en un proceso del pool de
+exports; el formato es el mismo que generaban los handlers inline.
+"""
+from __future__ import annotations
+
+from typing import Any, Callable
+
+from app.i18n import MSG
+from app.utils.exports import (
+    NEGATIVE_FILL,
+    NUMBER_FORMAT,
+    PERCENT_FORMAT,
+    POSITIVE_FILL,
+    THIN_BORDER,
+    WARNING_FILL,
+    add_company_header,
+    add_notes_section,
+    add_totals_row_with_formulas,
+    auto_adjust_column_widths,
+    create_excel_workbook,
+    create_report_workbook,
+    style_header_row,
+)
+
+Progress = Callable[[float], None]
+
+# Cada cuántas filas se informa progreso.
+_PROGRESS_EVERY = 500
+
+
+def _write_rows(
+    ws,
+    rows: list,
+    start_row: int,
+    formats: dict[int, str],
+    progress: Progress,
+) -> int:
+    """Escribe ``rows`` con borde fino y ``formats`` por columna; devuelve la
+    fila siguiente a la última. El progreso va de 5% a 90%.
+    """
+    total = len(rows) or 1
+    row = start_row
+    for index, values in enumerate(rows, start=1):
+        for column, value in enumerate(values, start=1):
+            cell = ws.cell(row=row, column=column, value=value)
+            if column in formats:
+                cell.number_format = formats[column]
+            cell.border = THIN_BORDER
+        row += 1
+        if index % _PROGRESS_EVERY == 0:
+            progress(5 + 85 * index / total)
+    return row
+
+
+def render_sales_history(payload: dict[str, Any], progress: Progress):
+    """Historial de ventas (una fila por ítem) — ``HistorialState.export_to_excel``."""
+    currency_label = payload["currency_label"]
+    currency_format = payload["currency_format"]
+    # Puede tener decenas de miles de ítems: hoja en streaming.
+    wb = create_report_workbook()
+    ws = wb.active
+    ws.title = "Historial de Ventas"
+
+    row = add_company_header(
+        ws,
+        payload["company_name"],
+        "HISTORIAL DE MOVIMIENTOS Y VENTAS",
+        payload["period_label"],
+        columns=17,
+        generated_at=payload["generated_at"],
+    )
+    headers = [
+        "Fecha y Hora",
+        "Nº Venta",
+        "Cliente",
+        "Vendedor",
+        "Método de Pago",
+        MSG.FALLBACK_PRODUCT,
+        "Variante",
+        "Categoría",
+        "Cantidad",
+        f"Precio Base ({currency_label})",
+        f"Precio Final ({currency_label})",
+        f"Descuento ({currency_label})",
+        "% Descuento",
+        "Fuente Descuento",
+        f"Subtotal ({currency_label})",
+        "Estado",
+        f"Devolución ({currency_label})",
+    ]
+    style_header_row(ws, row, headers)
+    data_start = row + 1
+    totals_row = _write_rows(
+        ws,
+        payload["rows"],
+        data_start,
+        {
+            9: NUMBER_FORMAT,
+            10: currency_format,
+            11: currency_format,
+            12: currency_format,
+            13: PERCENT_FORMAT,
+            15: currency_format,
+            17: currency_format,
+        },
+        progress,
+    )
+
+    add_totals_row_with_formulas(ws, totals_row, data_start, [
+        {"type": "label", "value": "TOTALES"},           # 1
+        {"type": "text", "value": ""},                    # 2
+        {"type": "text", "value": ""},                    # 3
+        {"type": "text", "value": ""},                    # 4
+        {"type": "text", "value": ""},                    # 5
+        {"type": "text", "value": ""},                    # 6
+        {"type": "text", "value": ""},                    # 7
+        {"type": "text", "value": ""},                    # 8
+        {"type": "sum", "col_letter": "I", "number_format": NUMBER_FORMAT},   # 9: cantidad
+        {"type": "text", "value": ""},                    # 10: precio base
+        {"type": "text", "value": ""},                    # 11: precio final
+        {"type": "sum", "col_letter": "L", "number_format": currency_format}, # 12: descuento
+        {"type": "text", "value": ""},                    # 13: %
+        {"type": "text", "value": ""},                    # 14: fuente
+        {"type": "sum", "col_letter": "O", "number_format": currency_format}, # 15: subtotal
+        {"type": "text", "value": ""},                    # 16: estado
+        {"type": "sum", "col_letter": "Q", "number_format": currency_format}, # 17: devolución
+    ])
+
+    add_notes_section(ws, totals_row, [
+        "Nº Venta: Identificador único de la transacción en el sistema.",
+        "Precio Base: Precio original del producto antes de aplicar descuentos.",
+        "Precio Final: Precio efectivamente cobrado al cliente.",
+        "Descuento ($): (Precio Base - Precio Final) × Cantidad.",
+        "% Descuento: Porcentaje de reducción respecto al precio base.",
+        "Fuente Descuento: Origen del descuento (Promoción, Lista de Precios, Especial).",
+        "Subtotal: Precio Final × Cantidad.",
+        "Estado: 'Devuelta' = devolución total del pedido; 'Dev. Parcial' = devolución parcial.",
+        "Devolución: Monto devuelto al cliente. Subtotal - Devolución = ingreso neto real.",
+        "Crédito (Completado): El cliente pagó la totalidad del crédito.",
+        "Crédito (Adelanto): El cliente realizó un pago parcial.",
+        "Crédito (Pendiente Total): No se ha recibido ningún pago aún.",
+        "Venta al contado: Cliente no identificado, pago inmediato.",
+    ], columns=17)
+
+    auto_adjust_column_widths(ws)
+    return wb
+
+
+def render_closings_history(payload: dict[str, Any], progress: Progress):
+    """Pestaña "cierres" de ``HistorialState.export_report_data``."""
+    currency_format = payload["currency_format"]
+    wb, ws = create_excel_workbook(MSG.REPORT_CLOSINGS_SHEET)
+
+    row = add_company_header(
+        ws,
+        payload["company_name"],
+        "HISTORIAL DE CIERRES DE CAJA",
+        payload["period_label"],
+        columns=5,
+        generated_at=payload["generated_at"],
+    )
+    headers = [
+        "Fecha y Hora",
+        "Tipo Operación",
+        "Responsable",
+        f"Monto ({payload['currency_label']})",
+        "Observaciones",
+    ]
+    style_header_row(ws, row, headers)
+    data_start = row + 1
+    totals_row = _write_rows(ws, payload["rows"], data_start, {4: currency_format}, progress)
+
+    add_totals_row_with_formulas(ws, totals_row, data_start, [
+        {"type": "label", "value": "TOTAL"},
+        {"type": "text", "value": ""},
+        {"type": "text", "value": ""},
+        {"type": "sum", "col_letter": "D", "number_format": currency_format},
+        {"type": "text", "value": ""},
+    ])
+
+    add_notes_section(ws, totals_row, [
+        "Apertura de Caja: Monto inicial del día.",
+        "Cierre de Caja: Monto contado al finalizar.",
+    ], columns=5)
+
+    auto_adjust_column_widths(ws)
+    return wb
+
+
+def _write_payments_detail(ws, payload: dict[str, Any], progress: Progress, total_label: str) -> int:
+    """Hoja de detalle de cobros; devuelve la fila de totales."""
+    currency_format = payload["currency_format"]
+    row = add_company_header(
+        ws,
+        payload["company_name"],
+        MSG.REPORT_PAYMENTS_TITLE,
+        payload["period_label"],
+        columns=6,
+        generated_at=payload["generated_at"],
+    )
+    detail_headers = [
+        "Fecha y Hora",
+        "Origen/Tipo",
+        "Método de Pago",
+        f"Monto ({payload['currency_label']})",
+        "Responsable",
+        "Referencia",
+    ]
+    style_header_row(ws, row, detail_headers)
+    data_start = row + 1
+    totals_row = _write_rows(ws, payload["entries"], data_start, {4: currency_format}, progress)
+
+    add_totals_row_with_formulas(ws, totals_row, data_start, [
+        {"type": "label", "value": total_label},
+        {"type": "text", "value": ""},
+        {"type": "text", "value": ""},
+        {"type": "sum", "col_letter": "D", "number_format": currency_format},
+        {"type": "text", "value": ""},
+        {"type": "text", "value": ""},
+    ])
+    return totals_row
+
+
+def render_payments_detail(payload: dict[str, Any], progress: Progress):
+    """Pestaña "detalle" de ``HistorialState.export_report_data``."""
+    wb, ws = create_excel_workbook(MSG.REPORT_PAYMENTS_SHEET)
+    totals_row = _write_payments_detail(ws, payload, progress, MSG.REPORT_TOTAL_INCOME)
+
+    add_notes_section(ws, totals_row, [
+        "Origen: Tipo de transacción (Venta, Cobro de Cuota, Reserva, etc.).",
+        "Referencia: Información adicional del pago.",
+    ], columns=6)
+
+    auto_adjust_column_widths(ws)
+    return wb
+
+
+def render_payments_by_method(payload: dict[str, Any], progress: Progress):
+    """Pestaña "metodos" (default) de ``HistorialState.export_report_data``:
+    resumen por método + hoja de detalle.
+    """
+    currency_format = payload["currency_format"]
+    wb, ws = create_excel_workbook("Resumen por Método")
+
+    row = add_company_header(
+        ws,
+        payload["company_name"],
+        "INGRESOS POR MÉTODO DE PAGO",
+        payload["period_label"],
+        columns=4,
+        generated_at=payload["generated_at"],
+    )
+    summary_headers = [
+        "Método de Pago",
+        "Nº Operaciones",
+        f"Total Recaudado ({payload['currency_label']})",
+        "Participación (%)",
+    ]
+    style_header_row(ws, row, summary_headers)
+    data_start = row + 1
+    summary = payload["summary"]
+    totals_row = data_start + len(summary)
+
+    # Participación con fórmula contra la fila de totales (ya conocida).
+    summary_rows = [
+        (label, count, total, f"=IF($C${totals_row}>0,C{r}/$C${totals_row},0)")
+        for r, (label, count, total) in enumerate(summary, start=data_start)
+    ]
+    _write_rows(ws, summary_rows, data_start, {3: currency_format, 4: PERCENT_FORMAT}, lambda _pct: None)
+
+    add_totals_row_with_formulas(ws, totals_row, data_start, [
+        {"type": "label", "value": "TOTAL RECAUDADO"},
+        {"type": "sum", "col_letter": "B"},
+        {"type": "sum", "col_letter": "C", "number_format": currency_format},
+        {"type": "text", "value": "100.00%"},
+    ])
+
+    add_notes_section(ws, totals_row, [
+        "Total Recaudado: Suma de todos los pagos por método.",
+        "Participación = Monto del Método ÷ Total General × 100.",
+    ], columns=4)
+
+    auto_adjust_column_widths(ws)
+
+    detail_ws = wb.create_sheet(MSG.REPORT_PAYMENTS_SHEET)
+    _write_payments_detail(detail_ws, payload, progress, "TOTAL")
+    auto_adjust_column_widths(detail_ws)
+    return wb
+
+
+def render_cashbox_sessions(payload: dict[str, Any], progress: Progress):
+    """Aperturas y cierres de caja — ``ReportsMixin.export_cashbox_sessions``."""
+    currency_label = payload["currency_label"]
+    currency_format = payload["currency_format"]
+    summary = payload["summary"]
+    wb, ws = create_excel_workbook("Aperturas y Cierres")
+
+    row = add_company_header(
+        ws,
+        payload["company_name"],
+        "REGISTRO DE APERTURAS Y CIERRES DE CAJA",
+        payload["period_label"],
+        columns=7,
+        generated_at=payload["generated_at"],
+    )
+
+    row += 1
+    ws.cell(row=row, column=1, value="RESUMEN DE OPERACIONES")
+    row += 1
+    ws.cell(row=row, column=1, value="Fecha de corte:")
+    ws.cell(row=row, column=2, value=summary["today"])
+    row += 1
+    ws.cell(row=row, column=1, value="Cantidad de aperturas:")
+    ws.cell(row=row, column=2, value=summary["opening_count"])
+    row += 1
+    ws.cell(row=row, column=1, value="Cantidad de cierres:")
+    ws.cell(row=row, column=2, value=summary["closing_count"])
+    row += 1
+    ws.cell(row=row, column=1, value=f"Total aperturas ({currency_label}):")
+    ws.cell(row=row, column=2, value=summary["opening_total"]).number_format = currency_format
+    row += 1
+    ws.cell(row=row, column=1, value=f"Total cierres ({currency_label}):")
+    ws.cell(row=row, column=2, value=summary["closing_total"]).number_format = currency_format
+    row += 2
+
+    headers = [
+        "Fecha y Hora",
+        "Tipo de Operación",
+        "Responsable",
+        f"Monto Apertura ({currency_label})",
+        f"Monto Cierre ({currency_label})",
+        "Desglose por Método",
+        "Observaciones",
+    ]
+    style_header_row(ws, row, headers)
+    data_start = row + 1
+    totals_row = _write_rows(
+        ws, payload["rows"], data_start, {4: currency_format, 5: currency_format}, progress
+    )
+
+    add_totals_row_with_formulas(ws, totals_row, data_start, [
+        {"type": "label", "value": "TOTALES"},
+        {"type": "text", "value": ""},
+        {"type": "text", "value": ""},
+        {"type": "sum", "col_letter": "D", "number_format": currency_format},
+        {"type": "sum", "col_letter": "E", "number_format": currency_format},
+        {"type": "text", "value": ""},
+        {"type": "text", "value": ""},
+    ])
+
+    add_notes_section(ws, totals_row, [
+        "Apertura de Caja: Monto inicial con el que se inicia la jornada.",
+        "Cierre de Caja: Monto total contado al finalizar la jornada.",
+        "Desglose por Método: Distribución del dinero según forma de pago (solo en cierres).",
+        "La diferencia entre Cierres y Aperturas debe coincidir con las ventas del día.",
+    ], columns=7)
+
+    auto_adjust_column_widths(ws)
+    return wb
+
+
+_RESERVATION_STATUS_FILLS = {
+    "pagado": POSITIVE_FILL,
+    "pendiente": WARNING_FILL,
+    "cancelado": NEGATIVE_FILL,
+}
+
+
+def render_reservations(payload: dict[str, Any], progress: Progress):
+    """Reservas de campos — ``ServicesState.export_reservations_excel``.
+
+    Cada fila del payload trae la clave de estado al final (para el color de
+    la celda "Estado"); no se escribe como columna.
+    """
+    currency_label = payload["currency_label"]
+    currency_format = payload["currency_format"]
+    summary = payload["summary"]
+    wb, ws = create_excel_workbook("Reservas")
+
+    row = add_company_header(
+        ws,
+        payload["company_name"],
+        "RESERVAS DE CAMPOS DEPORTIVOS",
+        payload["period_label"],
+        columns=12,
+        generated_at=payload["generated_at"],
+    )
+
+    row += 1
+    ws.cell(row=row, column=1, value="RESUMEN OPERATIVO")
+    row += 1
+    ws.cell(row=row, column=1, value="Total de Reservas:")
+    ws.cell(row=row, column=2, value=summary["total_reservations"])
+    row += 1
+    ws.cell(row=row, column=1, value="Reservas Pagadas:")
+    ws.cell(row=row, column=2, value=summary["status_counts"].get("pagado", 0))
+    row += 1
+    ws.cell(row=row, column=1, value="Reservas Pendientes:")
+    ws.cell(row=row, column=2, value=summary["status_counts"].get("pendiente", 0))
+    row += 1
+    ws.cell(row=row, column=1, value="Reservas Canceladas:")
+    ws.cell(row=row, column=2, value=summary["status_counts"].get("cancelado", 0))
+    row += 1
+    ws.cell(row=row, column=1, value=f"Monto Total ({currency_label}):")
+    ws.cell(row=row, column=2, value=summary["total_amount"]).number_format = currency_format
+    row += 1
+    ws.cell(row=row, column=1, value=f"Monto Cobrado ({currency_label}):")
+    ws.cell(row=row, column=2, value=summary["total_paid"]).number_format = currency_format
+    row += 1
+    ws.cell(row=row, column=1, value=f"Saldo Pendiente ({currency_label}):")
+    ws.cell(row=row, column=2, value=summary["total_balance"]).number_format = currency_format
+
+    row += 2
+    headers = [
+        "Fecha",
+        "Hora Inicio",
+        "Hora Fin",
+        "Cliente",
+        "DNI",
+        "Teléfono",
+        "Deporte",
+        "Campo",
+        "Estado",
+        f"Monto Total ({currency_label})",
+        f"Pagado ({currency_label})",
+        f"Saldo ({currency_label})",
+    ]
+    style_header_row(ws, row, headers)
+    data_start = row + 1
+
+    rows = payload["rows"]
+    sheet_rows = [
+        (*values[:11], f"=J{r}-K{r}")
+        for r, values in enumerate(rows, start=data_start)
+    ]
+    totals_row = _write_rows(
+        ws,
+        sheet_rows,
+        data_start,
+        {10: currency_format, 11: currency_format, 12: currency_format},
+        progress,
+    )
+    for r, values in enumerate(rows, start=data_start):
+        fill = _RESERVATION_STATUS_FILLS.get(values[11])
+        if fill is not None:
+            ws.cell(row=r, column=9).fill = fill
+
+    add_totals_row_with_formulas(
+        ws,
+        totals_row,
+        data_start,
+        [
+            {"type": "label", "value": "TOTALES"},
+            {"type": "text", "value": ""},
+            {"type": "text", "value": ""},
+            {"type": "text", "value": ""},
+            {"type": "text", "value": ""},
+            {"type": "text", "value": ""},
+            {"type": "text", "value": ""},
+            {"type": "text", "value": ""},
+            {"type": "formula", "value": f"=COUNTA(A{data_start}:A{totals_row-1})"},
+            {"type": "sum", "col_letter": "J", "number_format": currency_format},
+            {"type": "sum", "col_letter": "K", "number_format": currency_format},
+            {"type": "sum", "col_letter": "L", "number_format": currency_format},
+        ],
+    )
+
+    add_notes_section(
+        ws,
+        totals_row,
+        [
+            "Monto Total: Tarifa completa de la reserva.",
+            "Pagado: Importe efectivamente cobrado al cliente.",
+            "Saldo = Monto Total - Pagado (fórmula verificable en Excel).",
+            "Estado Pendiente: reserva creada con saldo pendiente de cobro.",
+            "Estado Pagada: reserva totalmente cobrada, sin saldo pendiente.",
+            "Estado Cancelada: reserva anulada, no genera ingreso operativo.",
+        ],
+        columns=12,
+    )
+
+    auto_adjust_column_widths(ws)
+    return wb
+
+
+EXPORT_RENDERERS: dict[str, Callable[[dict[str, Any], Progress], Any]] = {
+    "historial_ventas": render_sales_history,
+    "historial_cierres": render_closings_history,
+    "detalle_cobros": render_payments_detail,
+    "ingresos_por_metodo": render_payments_by_method,
+    "aperturas_cierres_caja": render_cashbox_sessions,
+    "reservas": render_reservations,
+}
@@ -0,0 +1,438 @@
+"""Numeración fiscal por bloques y cuota mensual fuera de la config.
+
+``emit_fiscal_document`` asignaba cada correlativo y descontaba la cuota con
+un ``FOR UPDATE`` sobre la fila ``CompanyBillingConfig`` de la empresa, y lo
+mantenía hasta el commit parcial (lectura de venta, ítems y tasa incluidas):
+con varias terminales cobrando a la vez, todas las emisiones de la empresa se
+encolaban detrás de esa fila. Con ``FISCAL_NUMBER_BLOCK_SIZE`` > 1:
+
+  * **Bloques por emisor**: cada holder (proceso/worker o terminal) reserva
+    ``FISCAL_NUMBER_BLOCK_SIZE`` correlativos de la serie en una transacción
+    corta sobre la config (:func:`prepare_number_block`, antes de abrir la
+    transacción de emisión) y después toma números de su propio
+    :class:`FiscalNumberBlock`, bloqueando solo esa fila por PK. El número se
+    toma en la misma transacción que inserta el ``FiscalDocument``: si el
+    proceso muere antes del commit, el número vuelve al bloque.
+  * **Adopción**: el holder renueva el lease del bloque con cada número; un
+    bloque con lease vencido (proceso reiniciado) lo adopta el siguiente
+    emisor antes de reservar uno nuevo, así no quedan huecos por reinicios.
+  * **Reconciliación**: :func:`reconcile_number_blocks` cierra bloques
+    abandonados más de ``FISCAL_NUMBER_BLOCK_ABANDON_SECONDS`` o de una serie
+    que ya no es la vigente. Si el bloque es el último reservado, el resto
+    vuelve a la serie; si no, los números quedan anulados en
+    ``voided_count`` (SUNAT no exige informar números nunca enviados).
+  * **Cuota**: :func:`reserve_quota` descuenta de :class:`FiscalQuotaCounter`
+    con un ``UPDATE ... WHERE used < límite`` dentro de la transacción de
+    emisión: si el ``FiscalDocument`` no llega a commitearse, el cupo vuelve.
+
+AFIP exige correlativos estrictos (FECAESolicitar rechaza el N+1 si el N no
+está autorizado), así que Argentina sigue numerando de a uno bajo el lock de
+la config (:func:`uses_number_blocks`).
+"""
+from __future__ import annotations
+
+import os
+import socket
+from datetime import timedelta
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import select
+
+from app.models.billing import CompanyBillingConfig, FiscalNumberBlock, FiscalQuotaCounter
+from app.utils.db import get_async_session
+from app.utils.logger import get_logger
+from app.utils.timezone import utc_now_naive
+
+logger = get_logger("FiscalNumbering")
+
+# Correlativos por bloque; 1 mantiene la numeración de a uno bajo el lock de
+# la config.
+FISCAL_NUMBER_BLOCK_SIZE = max(1, int(os.getenv("FISCAL_NUMBER_BLOCK_SIZE", "1")))
+FISCAL_NUMBER_BLOCK_LEASE_SECONDS = max(
+    30, int(os.getenv("FISCAL_NUMBER_BLOCK_LEASE_SECONDS", "900"))
+)
+# Sin actividad por este tiempo el bloque se reconcilia (devolución o anulación).
+FISCAL_NUMBER_BLOCK_ABANDON_SECONDS = max(
+    FISCAL_NUMBER_BLOCK_LEASE_SECONDS,
+    int(os.getenv("FISCAL_NUMBER_BLOCK_ABANDON_SECONDS", "86400")),
+)
+
+SERIE_FACTURA = "factura"
+SERIE_BOLETA = "boleta"
+
+BLOCK_OPEN = "open"
+BLOCK_CLOSED = "closed"
+BLOCK_RECONCILED = "reconciled"
+
+# Autoridades que no aceptan huecos ni desorden en la numeración.
+_STRICT_SEQUENCE_COUNTRIES = {"AR"}
+
+_HOLDER = f"{socket.gethostname()}:{os.getpid()}"[:64]
+
+
+def default_holder() -> str:
+    """Holder de este proceso (los workers de la cola comparten bloque)."""
+    return _HOLDER
+
+
+def uses_number_blocks(config: CompanyBillingConfig) -> bool:
+    return (
+        FISCAL_NUMBER_BLOCK_SIZE > 1
+        and (config.country or "").upper() not in _STRICT_SEQUENCE_COUNTRIES
+    )
+
+
+def _period(now) -> str:
+    return now.strftime("%Y%m")
+
+
+def _serie_for(config: CompanyBillingConfig, serie_kind: str) -> str:
+    return config.serie_factura if serie_kind == SERIE_FACTURA else config.serie_boleta
+
+
+def _sequence_attr(serie_kind: str) -> str:
+    return (
+        "current_sequence_factura"
+        if serie_kind == SERIE_FACTURA
+        else "current_sequence_boleta"
+    )
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Cuota mensual
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+async def reserve_quota(session, config: CompanyBillingConfig) -> bool:
+    """Descuenta un documento de la cuota del mes; False si no queda cupo.
+
+    Corre dentro de la transacción de ``session``: el cupo queda consumido
+    recién cuando el caller commitea el ``FiscalDocument`` (si la emisión
+    hace rollback, el cupo vuelve). El caller debe llamarla lo más tarde
+    posible, porque el ``UPDATE`` bloquea la fila del mes hasta el commit.
+
+    La primera emisión del mes crea la fila del período. Si la config trae
+    un conteo del mismo mes (numeración anterior a los bloques), se arranca
+    desde ahí.
+    """
+    now = utc_now_naive()
+    period = _period(now)
+    limit = config.max_billing_limit
+    for _ in range(2):
+        result = await session.execute(
+            update(FiscalQuotaCounter)
+            .where(FiscalQuotaCounter.company_id == config.company_id)
+            .where(FiscalQuotaCounter.period == period)
+            .where(FiscalQuotaCounter.used < limit)
+            .values(used=FiscalQuotaCounter.used + 1, updated_at=now)
+        )
+        if result.rowcount == 1:
+            return True
+        exists = (
+            await session.exec(
+                select(FiscalQuotaCounter.id)
+                .where(FiscalQuotaCounter.company_id == config.company_id)
+                .where(FiscalQuotaCounter.period == period)
+            )
+        ).first()
+        if exists is not None:
+            return False
+
+        reset = config.billing_count_reset_date
+        seed = (
+            config.current_billing_count or 0
+            if reset is not None and _period(reset) == period
+            else 0
+        )
+        if seed >= limit:
+            return False
+        try:
+            async with session.begin_nested():
+                session.add(FiscalQuotaCounter(
+                    company_id=config.company_id,
+                    period=period,
+                    used=seed + 1,
+                    updated_at=now,
+                ))
+            return True
+        except IntegrityError:
+            # Otra emisión creó la fila del mes: reintentar el UPDATE.
+            continue
+    return False
+
+
+def monthly_usage_query(company_id: int):
+    """``SELECT used`` del contador del mes en curso (None si aún no emitió)."""
+    return (
+        select(FiscalQuotaCounter.used)
+        .where(FiscalQuotaCounter.company_id == company_id)
+        .where(FiscalQuotaCounter.period == _period(utc_now_naive()))
+    )
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Bloques de correlativos
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+async def prepare_number_block(
+    company_id: int,
+    serie_kind: str,
+    holder: str | None = None,
+) -> int | None:
+    """Deja un bloque abierto para ``holder`` antes de la transacción de emisión.
+
+    Adopta o reserva el bloque en su propia transacción corta; el caller la
+    llama ANTES de abrir la suya, así :func:`take_number` solo bloquea la fila
+    del bloque por PK. Devuelve el id del bloque, o None si la empresa no
+    factura o no numera por bloques.
+    """
+    holder = (holder or default_holder())[:64]
+    now = utc_now_naive()
+    async with get_async_session() as session:
+        config = (
+            await session.exec(
+                select(CompanyBillingConfig)
+                .where(CompanyBillingConfig.company_id == company_id)
+                .where(CompanyBillingConfig.is_active == True)  # noqa: E712
+            )
+        ).first()
+        if config is None or not uses_number_blocks(config):
+            return None
+        serie = _serie_for(config, serie_kind)
+        own = await _own_block_ids(session, company_id, serie_kind, serie, holder)
+        if own:
+            return own[0]
+        block_id = await _adopt_block(session, company_id, serie_kind, serie, holder, now)
+        if block_id is None:
+            block_id = await _allocate_block(session, company_id, serie_kind, holder, now)
+        await session.commit()
+        return block_id
+
+
+async def take_number(
+    session,
+    config: CompanyBillingConfig,
+    serie_kind: str,
+    holder: str | None = None,
+) -> tuple[str, int]:
+    """Próximo ``(serie, número)`` del bloque de ``holder``.
+
+    Modifica el bloque dentro de la transacción de ``session``: el número
+    queda consumido recién cuando el caller commitea (junto con el
+    ``FiscalDocument`` que lo usa). Solo bloquea la fila del bloque por PK;
+    si ``holder`` se quedó sin bloque (no pasó por
+    :func:`prepare_number_block` o lo agotó otra emisión en el medio), lo
+    adopta o reserva en la misma transacción, con la config bloqueada hasta
+    el commit.
+    """
+    holder = (holder or default_holder())[:64]
+    serie = _serie_for(config, serie_kind)
+    now = utc_now_naive()
+
+    block = None
+    for block_id in await _own_block_ids(session, config.company_id, serie_kind, serie, holder):
+        block = await _lock_block(session, block_id)
+        if _usable(block, serie, holder):
+            break
+        block = None
+    if block is None:
+        block_id = await _adopt_block(session, config.company_id, serie_kind, serie, holder, now)
+        if block_id is None:
+            block_id = await _allocate_block(session, config.company_id, serie_kind, holder, now)
+        block = await _lock_block(session, block_id)
+        serie = block.serie
+
+    number = block.next_number
+    block.next_number = number + 1
+    block.lease_until = now + timedelta(seconds=FISCAL_NUMBER_BLOCK_LEASE_SECONDS)
+    block.updated_at = now
+    if block.next_number > block.range_end:
+        block.status = BLOCK_CLOSED
+    session.add(block)
+    return serie, number
+
+
+async def _own_block_ids(session, company_id, serie_kind, serie, holder) -> list[int]:
+    """Bloques abiertos de ``holder``, sin lock (holder/serie no están en el índice)."""
+    return (
+        await session.exec(
+            select(FiscalNumberBlock.id)
+            .where(FiscalNumberBlock.company_id == company_id)
+            .where(FiscalNumberBlock.serie_kind == serie_kind)
+            .where(FiscalNumberBlock.status == BLOCK_OPEN)
+            .where(FiscalNumberBlock.serie == serie)
+            .where(FiscalNumberBlock.holder == holder)
+            .order_by(FiscalNumberBlock.range_start)
+            .limit(5)
+        )
+    ).all()
+
+
+async def _lock_block(session, block_id: int) -> FiscalNumberBlock:
+    return (
+        await session.exec(
+            select(FiscalNumberBlock)
+            .where(FiscalNumberBlock.id == block_id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+    ).one()
+
+
+def _usable(block: FiscalNumberBlock, serie: str, holder: str) -> bool:
+    """Revalida con la fila bloqueada lo que se buscó sin lock."""
+    return (
+        block.status == BLOCK_OPEN
+        and block.serie == serie
+        and block.holder == holder
+        and block.next_number <= block.range_end
+    )
+
+
+async def _adopt_block(session, company_id, serie_kind, serie, holder, now) -> int | None:
+    """Toma el bloque abierto más bajo cuyo holder dejó vencer el lease."""
+    orphans = (
+        await session.exec(
+            select(FiscalNumberBlock.id)
+            .where(FiscalNumberBlock.company_id == company_id)
+            .where(FiscalNumberBlock.serie_kind == serie_kind)
+            .where(FiscalNumberBlock.status == BLOCK_OPEN)
+            .where(FiscalNumberBlock.serie == serie)
+            .where(FiscalNumberBlock.lease_until < now)
+            .order_by(FiscalNumberBlock.range_start)
+            .limit(5)
+        )
+    ).all()
+    for block_id in orphans:
+        result = await session.execute(
+            update(FiscalNumberBlock)
+            .where(FiscalNumberBlock.id == block_id)
+            .where(FiscalNumberBlock.status == BLOCK_OPEN)
+            .where(FiscalNumberBlock.lease_until < now)
+            .values(
+                holder=holder,
+                lease_until=now + timedelta(seconds=FISCAL_NUMBER_BLOCK_LEASE_SECONDS),
+                updated_at=now,
+            )
+        )
+        if result.rowcount == 1:
+            logger.info("Bloque fiscal %s adoptado por %s", block_id, holder)
+            return block_id
+    return None
+
+
+async def _allocate_block(session, company_id: int, serie_kind: str, holder: str, now) -> int:
+    """Reserva un bloque nuevo en la transacción de ``session`` (lock de la config)."""
+    attr = _sequence_attr(serie_kind)
+    config = (
+        await session.exec(
+            select(CompanyBillingConfig)
+            .where(CompanyBillingConfig.company_id == company_id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+    ).one()
+    start = (getattr(config, attr) or 0) + 1
+    end = start + FISCAL_NUMBER_BLOCK_SIZE - 1
+    setattr(config, attr, end)
+    config.updated_at = now
+    block = FiscalNumberBlock(
+        company_id=company_id,
+        serie_kind=serie_kind,
+        serie=_serie_for(config, serie_kind),
+        range_start=start,
+        range_end=end,
+        next_number=start,
+        holder=holder,
+        lease_until=now + timedelta(seconds=FISCAL_NUMBER_BLOCK_LEASE_SECONDS),
+        created_at=now,
+        updated_at=now,
+    )
+    session.add(config)
+    session.add(block)
+    await session.flush()
+    logger.info(
+        "Bloque fiscal %s reservado: company=%s %s %s-%s holder=%s",
+        block.id, company_id, block.serie, start, end, holder,
+    )
+    return block.id
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Reconciliación
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+async def reconcile_number_blocks(holder: str | None = None) -> dict:
+    """Cierra los bloques abandonados (o los de ``holder``, p.ej. al apagar).
+
+    Por empresa y serie, con la config bloqueada: si el bloque es el último
+    reservado (``range_end`` == contador de la serie) los números sin usar
+    vuelven a la serie; si no, quedan anulados en ``voided_count``.
+
+    Returns:
+        ``{"blocks": n, "returned": números devueltos, "voided": anulados}``.
+    """
+    now = utc_now_naive()
+    stats = {"blocks": 0, "returned": 0, "voided": 0}
+    async with get_async_session() as session:
+        stmt = select(FiscalNumberBlock).where(FiscalNumberBlock.status == BLOCK_OPEN)
+        if holder is not None:
+            stmt = stmt.where(FiscalNumberBlock.holder == holder[:64])
+        # Del más alto al más bajo: devolver un bloque vacío deja al anterior
+        # como último reservado y también puede devolverse.
+        blocks = (
+            await session.exec(
+                stmt.order_by(FiscalNumberBlock.range_end.desc()).with_for_update()
+            )
+        ).all()
+        company_ids = sorted({block.company_id for block in blocks})
+        if not company_ids:
+            return stats
+        configs = {
+            config.company_id: config
+            for config in (
+                await session.exec(
+                    select(CompanyBillingConfig)
+                    .where(CompanyBillingConfig.company_id.in_(company_ids))
+                    .order_by(CompanyBillingConfig.company_id)
+                    .with_for_update()
+                )
+            ).all()
+        }
+        abandoned_before = now - timedelta(seconds=FISCAL_NUMBER_BLOCK_ABANDON_SECONDS)
+        for block in blocks:
+            config = configs.get(block.company_id)
+            stale_serie = config is None or block.serie != _serie_for(config, block.serie_kind)
+            if holder is None and not stale_serie and (
+                block.lease_until is None or block.lease_until >= abandoned_before
+            ):
+                continue
+            unused = block.range_end - block.next_number + 1
+            attr = _sequence_attr(block.serie_kind)
+            if (
+                config is not None
+                and not stale_serie
+                and (getattr(config, attr) or 0) == block.range_end
+            ):
+                setattr(config, attr, block.next_number - 1)
+                config.updated_at = now
+                session.add(config)
+                stats["returned"] += unused
+            elif unused > 0:
+                block.voided_count = unused
+                stats["voided"] += unused
+                logger.warning(
+                    "Bloque fiscal %s: %s-%08d a %s-%08d anulados sin emitir",
+                    block.id, block.serie, block.next_number, block.serie, block.range_end,
+                )
+            block.status = BLOCK_RECONCILED
+            block.updated_at = now
+            session.add(block)
+            stats["blocks"] += 1
+        await session.commit()
+    if stats["blocks"]:
+        logger.info("Bloques fiscales reconciliados: %s", stats)
+    return stats
@@ -0,0 +1,680 @@
+"""Cola de emisión fiscal: el POS encola, workers async emiten.
+
+``confirm_sale`` emitía el comprobante en un ``asyncio.create_task`` suelto:
+si el proceso se reiniciaba la emisión se perdía hasta el cron de
+``fiscal_retry_worker`` (cada 30 min, 50 documentos, 1 s de pausa fija) y con
+SUNAT/AFIP caído cada venta abría su propia conexión para fallar. Ahora la
+venta deja una fila en ``fiscalemissionjob`` (:func:`enqueue_fiscal_emission`)
+y el :class:`FiscalQueueDispatcher` del lifespan de ``app.api`` la procesa:
+
+  * **Orden por empresa**: sólo se toma la cabeza de cada empresa (el menor
+    ``id`` entre ``queued``/``running``), así el correlativo sigue el orden de
+    las ventas y AFIP nunca recibe el N+1 antes que el N. Empresas distintas
+    se procesan en paralelo (``FISCAL_QUEUE_WORKERS``).
+  * **Claim atómico**: ``UPDATE ... WHERE status = <el leído>`` con chequeo de
+    ``rowcount``; varias réplicas pueden correr el dispatcher a la vez. El
+    job tomado queda con un lease (``FISCAL_QUEUE_LEASE_SECONDS``) a nombre
+    del dispatcher (``claimed_by``); si el worker muere, otra réplica lo
+    retoma al vencer. El lease se renueva antes de cada documento, y la
+    renovación y el resultado sólo se escriben ``WHERE claimed_by = <yo>``:
+    un worker que perdió el lease no pisa al que retomó el job.
+  * **Tope por proveedor**: ``FISCAL_QUEUE_PROVIDER_CONCURRENCY`` emisiones en
+    curso por upstream (``nubefact``, ``afip_wsfe``).
+  * **Backoff adaptativo**: un job con error vuelve a ``queued`` con backoff
+    exponencial con jitter. Además cada error pausa al proveedor entero
+    (la pausa se duplica con cada error y se reduce a la mitad con cada
+    respuesta válida), y con el circuit breaker de
+    :mod:`app.utils.http_client` abierto no se toma nada de ese proveedor:
+    una caída no quema intentos ni hace cola de conexiones.
+  * **Lote AFIP**: con la cabeza de una empresa en ``afip_wsfe`` se toman
+    también los jobs siguientes de la misma sucursal que esperan su primer
+    intento (hasta ``FISCAL_QUEUE_BATCH_SIZE``): se numeran en orden y van
+    juntos en un FECAESolicitar (``authorize_fiscal_batch``).
+  * **Estado**: el job guarda el snapshot del ``FiscalDocument``
+    (``fiscal_status``, ``full_number``); el POS lo sigue con
+    :func:`get_fiscal_job_status` / :func:`wait_fiscal_job_update`.
+
+La emisión en sí sigue siendo ``emit_fiscal_document`` (primer intento) y
+``retry_fiscal_document`` (siguientes); ``run_auto_retry`` queda como barrido
+de lo que la cola dio por perdido.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import socket
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import timedelta
+
+from sqlalchemy import and_, func, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import select
+
+from app.enums import FiscalStatus
+from app.models.billing import CompanyBillingConfig, FiscalEmissionJob
+from app.services.billing_service import (
+    MAX_RETRY_ATTEMPTS,
+    authorize_fiscal_batch,
+    emit_fiscal_document,
+    retry_fiscal_document,
+)
+from app.utils.db import get_async_session
+from app.utils.http_client import circuit_open
+from app.utils.logger import get_logger
+from app.utils.tenant import tenant_context
+from app.utils.timezone import utc_now_naive
+
+logger = get_logger("FiscalQueue")
+
+FISCAL_QUEUE_ENABLED = os.getenv("FISCAL_QUEUE_ENABLED", "1").strip().lower() not in {
+    "0",
+    "false",
+    "no",
+}
+# Empresas emitiendo en paralelo en esta réplica (una emisión por empresa).
+FISCAL_QUEUE_WORKERS = max(1, int(os.getenv("FISCAL_QUEUE_WORKERS", "8")))
+# Emisiones en curso por proveedor fiscal.
+FISCAL_QUEUE_PROVIDER_CONCURRENCY = max(
+    1, int(os.getenv("FISCAL_QUEUE_PROVIDER_CONCURRENCY", "4"))
+)
+# Sondeo de la tabla cuando no llegan avisos de encolado (otras réplicas,
+# backoffs que vencen).
+FISCAL_QUEUE_POLL_SECONDS = max(0.2, float(os.getenv("FISCAL_QUEUE_POLL_SECONDS", "2")))
+FISCAL_QUEUE_LEASE_SECONDS = max(30, int(os.getenv("FISCAL_QUEUE_LEASE_SECONDS", "120")))
+FISCAL_QUEUE_BACKOFF_BASE_SECONDS = max(
+    0.5, float(os.getenv("FISCAL_QUEUE_BACKOFF_BASE_SECONDS", "5"))
+)
+FISCAL_QUEUE_BACKOFF_MAX_SECONDS = max(
+    FISCAL_QUEUE_BACKOFF_BASE_SECONDS,
+    float(os.getenv("FISCAL_QUEUE_BACKOFF_MAX_SECONDS", "300")),
+)
+# Intentos del job antes de marcarlo failed (excepciones incluidas; los
+# envíos al proveedor además los limita MAX_RETRY_ATTEMPTS del documento).
+FISCAL_QUEUE_MAX_ATTEMPTS = max(1, int(os.getenv("FISCAL_QUEUE_MAX_ATTEMPTS", "6")))
+# Jobs de una empresa emitidos juntos en proveedores que aceptan lotes
+# (AFIP); 1 desactiva el lote.
+FISCAL_QUEUE_BATCH_SIZE = max(1, int(os.getenv("FISCAL_QUEUE_BATCH_SIZE", "20")))
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+# País de CompanyBillingConfig → upstream de app.utils.http_client.
+_PROVIDER_UPSTREAMS = {"PE": "nubefact", "AR": "afip_wsfe"}
+_BATCH_PROVIDERS = {"afip_wsfe"}
+_FINAL_FISCAL_STATUSES = {FiscalStatus.authorized, FiscalStatus.rejected}
+
+_wakeup: asyncio.Event | None = None
+# Avisos locales de cambio de estado por job (el POS y el worker suelen
+# compartir proceso; si no, el watcher cae al sondeo).
+_job_events: dict[int, asyncio.Event] = {}
+
+
+@dataclass(frozen=True)
+class FiscalJobStatus:
+    id: int
+    status: str
+    fiscal_status: str
+    full_number: str
+    last_error: str
+
+    @property
+    def finished(self) -> bool:
+        return self.status in {STATUS_DONE, STATUS_FAILED}
+
+
+def _snapshot(job: FiscalEmissionJob) -> FiscalJobStatus:
+    return FiscalJobStatus(
+        id=job.id,
+        status=job.status,
+        fiscal_status=job.fiscal_status or "",
+        full_number=job.full_number or "",
+        last_error=job.last_error or "",
+    )
+
+
+def _notify(job_id: int | None = None) -> None:
+    if _wakeup is not None:
+        _wakeup.set()
+    if job_id is not None:
+        event = _job_events.get(job_id)
+        if event is not None:
+            event.set()
+
+
+def _backoff_seconds(attempts: int) -> float:
+    """Exponencial sobre ``attempts`` con jitter completo (mínimo la base)."""
+    ceiling = min(
+        FISCAL_QUEUE_BACKOFF_MAX_SECONDS,
+        FISCAL_QUEUE_BACKOFF_BASE_SECONDS * 2 ** max(attempts - 1, 0),
+    )
+    return random.uniform(FISCAL_QUEUE_BACKOFF_BASE_SECONDS, ceiling)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Encolado y consulta
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+async def enqueue_fiscal_emission(
+    sale_id: int,
+    company_id: int,
+    branch_id: int,
+    receipt_type: str,
+    buyer_doc_type: str | None = None,
+    buyer_doc_number: str | None = None,
+    buyer_name: str | None = None,
+) -> FiscalJobStatus | None:
+    """Encola la emisión de ``sale_id`` (ya commiteada) y despierta al dispatcher.
+
+    Devuelve None si la empresa no tiene billing activo (no hay nada que
+    emitir). Encolar dos veces la misma venta y tipo devuelve el job existente.
+    """
+    async with get_async_session() as session:
+        country = (
+            await session.exec(
+                select(CompanyBillingConfig.country)
+                .where(CompanyBillingConfig.company_id == company_id)
+                .where(CompanyBillingConfig.is_active == True)  # noqa: E712
+            )
+        ).first()
+        if country is None:
+            return None
+
+        job = FiscalEmissionJob(
+            company_id=company_id,
+            branch_id=branch_id,
+            sale_id=sale_id,
+            receipt_type=receipt_type,
+            buyer_doc_type=buyer_doc_type,
+            buyer_doc_number=buyer_doc_number,
+            buyer_name=(buyer_name or "")[:255] or None,
+            provider=_PROVIDER_UPSTREAMS.get((country or "").upper(), ""),
+        )
+        session.add(job)
+        try:
+            await session.commit()
+            await session.refresh(job)
+        except IntegrityError:
+            await session.rollback()
+            job = (
+                await session.exec(
+                    select(FiscalEmissionJob)
+                    .where(FiscalEmissionJob.company_id == company_id)
+                    .where(FiscalEmissionJob.sale_id == sale_id)
+                    .where(FiscalEmissionJob.receipt_type == receipt_type)
+                )
+            ).first()
+            if job is None:
+                raise
+        status = _snapshot(job)
+
+    _notify()
+    return status
+
+
+async def get_fiscal_job_status(job_id: int) -> FiscalJobStatus | None:
+    async with get_async_session() as session:
+        job = await session.get(FiscalEmissionJob, job_id)
+        return _snapshot(job) if job is not None else None
+
+
+async def wait_fiscal_job_update(job_id: int, timeout: float) -> None:
+    """Duerme hasta ``timeout`` o hasta que este proceso actualice el job."""
+    event = _job_events.setdefault(job_id, asyncio.Event())
+    try:
+        await asyncio.wait_for(event.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        _job_events.pop(job_id, None)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Dispatcher
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+@dataclass
+class _ProviderThrottle:
+    """Cupo y pausa adaptativa de un proveedor fiscal."""
+
+    semaphore: asyncio.Semaphore
+    penalty: float = 0.0
+    paused_until: float = 0.0
+
+    def paused(self) -> bool:
+        return time.monotonic() < self.paused_until
+
+    def record(self, ok: bool) -> None:
+        if ok:
+            self.penalty /= 2
+            if self.penalty < FISCAL_QUEUE_BACKOFF_BASE_SECONDS:
+                self.penalty = 0.0
+            return
+        self.penalty = min(
+            FISCAL_QUEUE_BACKOFF_MAX_SECONDS,
+            max(FISCAL_QUEUE_BACKOFF_BASE_SECONDS, self.penalty * 2),
+        )
+        self.paused_until = time.monotonic() + self.penalty
+
+
+class FiscalQueueDispatcher:
+    """Toma cabezas de empresa de ``fiscalemissionjob`` y las emite."""
+
+    def __init__(self) -> None:
+        self._tasks: dict[int, asyncio.Task] = {}  # company_id → emisión en curso
+        self._throttles: dict[str, _ProviderThrottle] = {}
+        # Dueño de los leases que toma este dispatcher (``claimed_by``).
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"[-64:]
+
+    def _throttle(self, provider: str) -> _ProviderThrottle:
+        throttle = self._throttles.get(provider)
+        if throttle is None:
+            throttle = self._throttles[provider] = _ProviderThrottle(
+                asyncio.Semaphore(FISCAL_QUEUE_PROVIDER_CONCURRENCY)
+            )
+        return throttle
+
+    def _provider_available(self, provider: str) -> bool:
+        if not provider:
+            return True
+        return not self._throttle(provider).paused() and not circuit_open(provider)
+
+    async def run(self) -> None:
+        global _wakeup
+        _wakeup = asyncio.Event()
+        logger.info(
+            "Fiscal queue started (workers=%d, por proveedor=%d)",
+            FISCAL_QUEUE_WORKERS,
+            FISCAL_QUEUE_PROVIDER_CONCURRENCY,
+        )
+        try:
+            while True:
+                try:
+                    await self.dispatch_once()
+                except Exception:
+                    logger.exception("Error tomando jobs de la cola fiscal")
+                try:
+                    await asyncio.wait_for(_wakeup.wait(), FISCAL_QUEUE_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                _wakeup.clear()
+        finally:
+            _wakeup = None
+            for task in self._tasks.values():
+                task.cancel()
+            if self._tasks:
+                await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    async def dispatch_once(self) -> int:
+        """Toma las cabezas listas hasta llenar los workers; devuelve cuántas."""
+        capacity = FISCAL_QUEUE_WORKERS - len(self._tasks)
+        if capacity <= 0:
+            return 0
+        now = utc_now_naive()
+        heads = (
+            select(func.min(FiscalEmissionJob.id))
+            .where(FiscalEmissionJob.status.in_([STATUS_QUEUED, STATUS_RUNNING]))
+            .group_by(FiscalEmissionJob.company_id)
+        )
+        stmt = (
+            select(FiscalEmissionJob)
+            .where(FiscalEmissionJob.id.in_(heads))
+            .where(
+                or_(
+                    and_(
+                        FiscalEmissionJob.status == STATUS_QUEUED,
+                        FiscalEmissionJob.next_attempt_at <= now,
+                    ),
+                    and_(
+                        FiscalEmissionJob.status == STATUS_RUNNING,
+                        FiscalEmissionJob.locked_until < now,
+                    ),
+                )
+            )
+            .order_by(FiscalEmissionJob.next_attempt_at, FiscalEmissionJob.id)
+        )
+        if self._tasks:
+            stmt = stmt.where(FiscalEmissionJob.company_id.notin_(list(self._tasks)))
+
+        claimed = 0
+        async with get_async_session() as session:
+            candidates = [
+                (_JobArgs.from_job(job), job.status)
+                for job in (await session.exec(stmt)).all()
+            ]
+            for job, status in candidates:
+                if claimed >= capacity:
+                    break
+                if not self._provider_available(job.provider):
+                    continue
+                if not await self._claim(session, job.id, status, now):
+                    continue
+                batch = [job]
+                if job.provider in _BATCH_PROVIDERS and job.fiscal_document_id is None:
+                    batch += await self._claim_followers(session, job, now)
+                self._tasks[job.company_id] = asyncio.create_task(self._run_jobs(batch))
+                claimed += 1
+        return claimed
+
+    async def _claim_followers(self, session, head: "_JobArgs", now) -> list["_JobArgs"]:
+        """Jobs que siguen a ``head`` y pueden ir en su mismo lote.
+
+        Se corta en el primero que no califica (otra sucursal, reintento,
+        backoff pendiente o ya tomado) para no adelantar a nadie en la fila.
+        """
+        if FISCAL_QUEUE_BATCH_SIZE <= 1:
+            return []
+        rows = (
+            await session.exec(
+                select(FiscalEmissionJob)
+                .where(FiscalEmissionJob.company_id == head.company_id)
+                .where(FiscalEmissionJob.status.in_([STATUS_QUEUED, STATUS_RUNNING]))
+                .where(FiscalEmissionJob.id > head.id)
+                .order_by(FiscalEmissionJob.id)
+                .limit(FISCAL_QUEUE_BATCH_SIZE - 1)
+            )
+        ).all()
+        candidates = []
+        for job in rows:
+            if (
+                job.status != STATUS_QUEUED
+                or job.branch_id != head.branch_id
+                or job.provider != head.provider
+                or job.fiscal_document_id is not None
+                or (job.attempts or 0) > 0
+                or job.next_attempt_at > now
+            ):
+                break
+            candidates.append(_JobArgs.from_job(job))
+        followers = []
+        for job in candidates:
+            if not await self._claim(session, job.id, STATUS_QUEUED, now):
+                break
+            followers.append(job)
+        return followers
+
+    async def _claim(self, session, job_id: int, status: str, now) -> bool:
+        condition = FiscalEmissionJob.status == status
+        if status == STATUS_RUNNING:
+            # Lease vencido: el worker que lo tenía murió.
+            condition = and_(condition, FiscalEmissionJob.locked_until < now)
+        result = await session.execute(
+            update(FiscalEmissionJob)
+            .where(FiscalEmissionJob.id == job_id)
+            .where(condition)
+            .values(
+                status=STATUS_RUNNING,
+                locked_until=now + timedelta(seconds=FISCAL_QUEUE_LEASE_SECONDS),
+                claimed_by=self.worker_id,
+                updated_at=now,
+            )
+        )
+        await session.commit()
+        return result.rowcount == 1
+
+    def _owned(self):
+        return and_(
+            FiscalEmissionJob.status == STATUS_RUNNING,
+            FiscalEmissionJob.claimed_by == self.worker_id,
+        )
+
+    async def _renew_lease(self, jobs: list["_JobArgs"]) -> bool:
+        """Extiende el lease de ``jobs``; False si alguno ya no es nuestro."""
+        now = utc_now_naive()
+        async with get_async_session() as session:
+            result = await session.execute(
+                update(FiscalEmissionJob)
+                .where(FiscalEmissionJob.id.in_([job.id for job in jobs]))
+                .where(self._owned())
+                .values(
+                    locked_until=now + timedelta(seconds=FISCAL_QUEUE_LEASE_SECONDS),
+                    updated_at=now,
+                )
+            )
+            await session.commit()
+        if result.rowcount == len(jobs):
+            return True
+        logger.warning("Lease perdido en jobs fiscales %s", [job.id for job in jobs])
+        return False
+
+    async def _release(self, jobs: list["_JobArgs"]) -> None:
+        """Devuelve a la cola, sin gastar intento, jobs tomados y no emitidos."""
+        if not jobs:
+            return
+        now = utc_now_naive()
+        async with get_async_session() as session:
+            await session.execute(
+                update(FiscalEmissionJob)
+                .where(FiscalEmissionJob.id.in_([job.id for job in jobs]))
+                .where(self._owned())
+                .values(
+                    status=STATUS_QUEUED,
+                    locked_until=None,
+                    claimed_by=None,
+                    updated_at=now,
+                )
+            )
+            await session.commit()
+
+    async def _run_jobs(self, jobs: list["_JobArgs"]) -> None:
+        try:
+            if len(jobs) == 1:
+                await self.process(jobs[0])
+            else:
+                await self.process_batch(jobs)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Error procesando jobs fiscales %s", [job.id for job in jobs])
+        finally:
+            self._tasks.pop(jobs[0].company_id, None)
+            for job in jobs:
+                _notify(job.id)
+
+    async def process(self, job: "_JobArgs") -> None:
+        """Un intento de emisión del job ya tomado; deja el resultado en la fila."""
+        throttle = self._throttle(job.provider) if job.provider else None
+        try:
+            if throttle is None:
+                outcome = await self._emit(job)
+            else:
+                async with throttle.semaphore:
+                    # La espera por el cupo del proveedor pudo comerse el lease.
+                    if not await self._renew_lease([job]):
+                        return
+                    outcome = await self._emit(job)
+        except Exception as exc:
+            outcome = exc
+        await self._settle(job, throttle, outcome)
+
+    async def process_batch(self, jobs: list["_JobArgs"]) -> None:
+        """Emite varios jobs tomados de una empresa con un solo envío.
+
+        Cada venta se numera en orden de job (``send_now=False``) y los
+        documentos pendientes se autorizan juntos; el resultado de cada
+        documento se asienta en su job como en :meth:`process`. El lease
+        del lote se renueva antes de cada documento; si se perdió, no se
+        numera nada más (se adelantaría a quien retomó el job) y lo no
+        emitido vuelve a la cola.
+        """
+        throttle = self._throttle(jobs[0].provider)
+        outcomes: dict[int, object] = {}
+        async with throttle.semaphore:
+            pending: dict[int, int] = {}  # fiscal_document_id → job.id
+            for index, job in enumerate(jobs):
+                if not await self._renew_lease(jobs):
+                    await self._release(jobs[index:])
+                    jobs = jobs[:index]
+                    break
+                try:
+                    with tenant_context(job.company_id, job.branch_id):
+                        fiscal_doc = await emit_fiscal_document(
+                            sale_id=job.sale_id,
+                            company_id=job.company_id,
+                            branch_id=job.branch_id,
+                            receipt_type=job.receipt_type,
+                            buyer_doc_type=job.buyer_doc_type,
+                            buyer_doc_number=job.buyer_doc_number,
+                            buyer_name=job.buyer_name,
+                            send_now=False,
+                        )
+                except Exception as exc:
+                    outcomes[job.id] = exc
+                    continue
+                outcomes[job.id] = fiscal_doc
+                if fiscal_doc is not None and fiscal_doc.fiscal_status == FiscalStatus.pending:
+                    pending[fiscal_doc.id] = job.id
+
+            if pending:
+                head = jobs[0]
+                try:
+                    await self._renew_lease(jobs)
+                    with tenant_context(head.company_id, head.branch_id):
+                        sent = await authorize_fiscal_batch(
+                            list(pending), head.company_id, head.branch_id
+                        )
+                except Exception:
+                    # Los documentos quedan numerados en pending: el job
+                    # guarda el id y el próximo intento va por retry.
+                    logger.exception(
+                        "Envío en lote falló (jobs %s)", list(pending.values())
+                    )
+                else:
+                    for fiscal_doc in sent:
+                        outcomes[pending[fiscal_doc.id]] = fiscal_doc
+
+        for job in jobs:
+            await self._settle(job, throttle, outcomes[job.id])
+
+    async def _settle(self, job: "_JobArgs", throttle, outcome) -> None:
+        """Asienta en la fila el resultado de un intento (documento o excepción)."""
+        attempts = job.attempts + 1
+        if isinstance(outcome, Exception):
+            exc = outcome
+            logger.warning("Emisión fiscal del job %s falló: %s", job.id, exc)
+            if throttle is not None:
+                throttle.record(False)
+            await self._finish(
+                job,
+                attempts=attempts,
+                status=STATUS_FAILED if attempts >= FISCAL_QUEUE_MAX_ATTEMPTS else STATUS_QUEUED,
+                last_error=(str(exc) or type(exc).__name__)[:500],
+            )
+            return
+
+        fiscal_doc = outcome
+        if fiscal_doc is None:
+            # Billing desactivado entre el encolado y la emisión.
+            await self._finish(job, attempts=attempts, status=STATUS_DONE)
+            return
+
+        fiscal_status = str(getattr(fiscal_doc.fiscal_status, "value", fiscal_doc.fiscal_status))
+        final = fiscal_status in _FINAL_FISCAL_STATUSES
+        if throttle is not None:
+            throttle.record(final)
+        if final:
+            status = STATUS_DONE
+        elif (
+            (fiscal_doc.retry_count or 0) >= MAX_RETRY_ATTEMPTS
+            or attempts >= FISCAL_QUEUE_MAX_ATTEMPTS
+        ):
+            status = STATUS_FAILED
+        else:
+            status = STATUS_QUEUED
+        await self._finish(
+            job,
+            attempts=attempts,
+            status=status,
+            fiscal_document_id=fiscal_doc.id,
+            fiscal_status=fiscal_status,
+            full_number=fiscal_doc.full_number,
+            last_error=None if final else (fiscal_doc.fiscal_errors or "")[:500] or None,
+        )
+
+    async def _emit(self, job: "_JobArgs"):
+        with tenant_context(job.company_id, job.branch_id):
+            if job.fiscal_document_id is None:
+                return await emit_fiscal_document(
+                    sale_id=job.sale_id,
+                    company_id=job.company_id,
+                    branch_id=job.branch_id,
+                    receipt_type=job.receipt_type,
+                    buyer_doc_type=job.buyer_doc_type,
+                    buyer_doc_number=job.buyer_doc_number,
+                    buyer_name=job.buyer_name,
+                )
+            return await retry_fiscal_document(
+                fiscal_doc_id=job.fiscal_document_id,
+                company_id=job.company_id,
+                branch_id=job.branch_id,
+            )
+
+    async def _finish(self, job: "_JobArgs", *, attempts: int, status: str, **values) -> None:
+        now = utc_now_naive()
+        if status == STATUS_QUEUED:
+            values["next_attempt_at"] = now + timedelta(seconds=_backoff_seconds(attempts))
+        async with get_async_session() as session:
+            result = await session.execute(
+                update(FiscalEmissionJob)
+                .where(FiscalEmissionJob.id == job.id)
+                .where(self._owned())
+                .values(
+                    status=status,
+                    attempts=attempts,
+                    locked_until=None,
+                    claimed_by=None,
+                    updated_at=now,
+                    **values,
+                )
+            )
+            await session.commit()
+        if result.rowcount != 1:
+            # Lease vencido y job retomado por otro worker: su resultado manda.
+            logger.warning("Job fiscal %s ya no es de este worker; no se asienta", job.id)
+            return
+        if status == STATUS_FAILED:
+            logger.warning(
+                "Job fiscal %s (venta %s) agotó reintentos: %s",
+                job.id,
+                job.sale_id,
+                values.get("last_error"),
+            )
+
+
+@dataclass(frozen=True)
+class _JobArgs:
+    """Copia desacoplada de la fila tomada (la sesión del claim se cierra)."""
+
+    id: int
+    company_id: int
+    branch_id: int
+    sale_id: int
+    receipt_type: str
+    buyer_doc_type: str | None
+    buyer_doc_number: str | None
+    buyer_name: str | None
+    provider: str
+    attempts: int
+    fiscal_document_id: int | None
+
+    @classmethod
+    def from_job(cls, job: FiscalEmissionJob) -> "_JobArgs":
+        return cls(
+            id=job.id,
+            company_id=job.company_id,
+            branch_id=job.branch_id,
+            sale_id=job.sale_id,
+            receipt_type=job.receipt_type,
+            buyer_doc_type=job.buyer_doc_type,
+            buyer_doc_number=job.buyer_doc_number,
+            buyer_name=job.buyer_name,
+            provider=job.provider or "",
+            attempts=job.attempts or 0,
+            fiscal_document_id=job.fiscal_document_id,
+        )
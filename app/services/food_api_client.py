@@ -11,6 +11,8 @@ import os
 
 import httpx
 
+from app.utils.http_client import http_client
+
 logger = logging.getLogger(__name__)
 
 FOOD_API_TIMEOUT_SECONDS = 10
@@ -38,7 +40,7 @@ async def register_food_company(
         "phone": phone,
     }
     try:
-        async with httpx.AsyncClient(timeout=FOOD_API_TIMEOUT_SECONDS) as client:
+        async with http_client("food", timeout=FOOD_API_TIMEOUT_SECONDS) as client:
             response = await client.post(f"{base_url}/api/registro", json=payload)
         data = response.json() if response.content else {}
         if response.status_code == 201:
@@ -0,0 +1,617 @@
+"""Importación masiva de inventario (CSV/XLSX) por streaming y upsert en bloque.
+
+La importación anterior parseaba el archivo completo a ``import_preview_rows``
+(en el state de Reflex), sólo importaba esas filas y escribía fila por fila:
+un ``flush`` por categoría nueva y un ``Product``/``StockMovement`` ORM por
+fila. Un catálogo de proveedor de 50k filas no terminaba nunca.
+
+Ahora el archivo subido se guarda en ``IMPORT_FILES_DIR`` y el state sólo
+conserva su token, una muestra (``IMPORT_PREVIEW_LIMIT`` filas) y el resumen de
+errores. Tanto el preview como la importación **re-leen** el archivo:
+
+  * **Lectura**: :func:`iter_import_rows` recorre el CSV con ``csv.DictReader``
+    sobre el archivo o el XLSX con openpyxl ``read_only``; nunca hay más de
+    ``IMPORT_CHUNK_SIZE`` filas en memoria.
+  * **Validación**: :func:`parse_import_row` normaliza y valida cada fila
+    (código, descripción, números, unidad entera con stock decimal). Las
+    filas inválidas se cuentan y se omiten en los dos pasos.
+  * **Escritura** (:func:`apply_inventory_import`), por bloque y en una sola
+    transacción: 3 SELECT por ``IN`` (productos, variantes, lotes), un upsert
+    de categorías, hasta 4 upserts de productos (según se pise precio y/o
+    stock) y un INSERT en bloque de movimientos. En MySQL el upsert es
+    ``INSERT ... ON DUPLICATE KEY UPDATE`` sobre
+    ``uq_product_company_branch_barcode``; en SQLite (tests, bench),
+    ``ON CONFLICT DO UPDATE``.
+
+Las sentencias Core no pasan por los eventos ORM: el caller invalida
+``barcode_cache`` y el índice de búsqueda tras el commit. Con varias réplicas
+detrás del balanceador, ``INVENTORY_IMPORT_DIR`` tiene que ser un volumen
+compartido (igual que ``EXPORT_JOBS_DIR``).
+"""
+from __future__ import annotations
+
+import csv
+import logging
+import os
+import re
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass, field, replace
+from decimal import Decimal, InvalidOperation
+from typing import Any, Callable, Iterable, Iterator
+
+from sqlalchemy import insert
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, select
+
+from app.models import Category, Product, ProductBatch, ProductVariant, StockMovement
+from app.services.barcode_cache import barcode_key
+from app.utils.timezone import utc_now_naive
+
+logger = logging.getLogger("InventoryImport")
+
+# Filas validadas/escritas por bloque (un round-trip por tabla y bloque).
+IMPORT_CHUNK_SIZE = max(50, int(os.getenv("INVENTORY_IMPORT_CHUNK_SIZE", "1000")))
+# Filas de muestra y errores que viajan al state.
+IMPORT_PREVIEW_LIMIT = 200
+IMPORT_ERROR_LIMIT = 50
+# Vida de los archivos subidos que no se confirmaron ni cancelaron.
+IMPORT_FILE_TTL_SECONDS = max(300, int(os.getenv("INVENTORY_IMPORT_FILE_TTL_SECONDS", "3600")))
+IMPORT_FILES_DIR = os.getenv("INVENTORY_IMPORT_DIR", "").strip() or os.path.join(
+    tempfile.gettempdir(), "tuwayki_imports"
+)
+
+IMPORT_MOVEMENT_TYPE = "Importacion"
+
+# Alias de encabezados aceptados → campo normalizado.
+IMPORT_COLUMN_MAP = {
+    "codigo": "barcode", "código": "barcode", "barcode": "barcode",
+    "sku": "barcode", "cod": "barcode", "codigo/sku": "barcode",
+    "código/sku": "barcode",
+    "descripcion": "description", "descripción": "description",
+    "description": "description", "producto": "description",
+    "nombre": "description", "descripción del producto": "description",
+    "categoria": "category", "categoría": "category",
+    "category": "category",
+    "stock": "stock", "stock actual": "stock", "cantidad": "stock",
+    "unidad": "unit", "unit": "unit",
+    "costo": "purchase_price", "costo unitario": "purchase_price",
+    "purchase_price": "purchase_price", "precio compra": "purchase_price",
+    "precio": "sale_price", "precio venta": "sale_price",
+    "sale_price": "sale_price", "precio de venta": "sale_price",
+    "pvp": "sale_price",
+}
+
+_TOKEN_RE = re.compile(r"^[0-9a-f]{32}\.(csv|xlsx|xls)$")
+_EXCEL_EXTENSIONS = {"xlsx", "xls"}
+
+# Valores por defecto de Product para los INSERT Core (no pasan por el modelo).
+_PRODUCT_DEFAULTS: dict[str, Any] = {
+    name: info.get_default(call_default_factory=True)
+    for name, info in Product.model_fields.items()
+    if name != "id" and name in Product.__table__.c and not info.is_required()
+}
+_PRODUCT_BASE_UPDATE = ("description", "category", "unit", "purchase_price")
+
+
+class ImportRowError(ValueError):
+    """Fila del archivo que no se puede importar (el mensaje va al usuario)."""
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Archivos subidos
+# ─────────────────────────────────────────────────────────────────────────────
+
+def save_import_file(filename: str, data: bytes) -> str:
+    """Guarda el archivo subido y devuelve su token (nombre dentro del dir)."""
+    ext = (filename.rsplit(".", 1)[-1] if "." in filename else "").lower()
+    if ext not in _EXCEL_EXTENSIONS:
+        ext = "csv"
+    token = f"{uuid.uuid4().hex}.{ext}"
+    os.makedirs(IMPORT_FILES_DIR, exist_ok=True)
+    path = import_file_path(token)
+    tmp = f"{path}.part"
+    with open(tmp, "wb") as fh:
+        fh.write(data)
+    os.replace(tmp, path)
+    return token
+
+
+def import_file_path(token: str) -> str:
+    if not _TOKEN_RE.match(token or ""):
+        raise ValueError("Token de importación inválido.")
+    return os.path.join(IMPORT_FILES_DIR, token)
+
+
+def discard_import_file(token: str) -> None:
+    if not token:
+        return
+    try:
+        os.remove(import_file_path(token))
+    except (FileNotFoundError, ValueError):
+        pass
+
+
+def cleanup_import_files(now: float | None = None) -> int:
+    """Borra los archivos subidos más viejos que el TTL."""
+    if not os.path.isdir(IMPORT_FILES_DIR):
+        return 0
+    cutoff = (now if now is not None else time.time()) - IMPORT_FILE_TTL_SECONDS
+    removed = 0
+    for entry in os.scandir(IMPORT_FILES_DIR):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            continue
+    if removed:
+        logger.info("Archivos de importación vencidos eliminados: %d", removed)
+    return removed
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Lectura y validación
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _normalize_header(value: Any) -> str:
+    clean = str(value or "").strip().lower()
+    return IMPORT_COLUMN_MAP.get(clean, clean)
+
+
+def iter_import_rows(path: str) -> Iterator[tuple[int, dict[str, Any]]]:
+    """Recorre el CSV/XLSX fila a fila: ``(número de fila, {campo: valor})``.
+
+    El número de fila es el de la planilla (la 1 es el encabezado).
+    """
+    ext = path.rsplit(".", 1)[-1].lower()
+    if ext in _EXCEL_EXTENSIONS:
+        import openpyxl
+
+        wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows_iter = wb.active.iter_rows(values_only=True)
+            header_raw = next(rows_iter, None)
+            if not header_raw:
+                return
+            headers = [_normalize_header(h) for h in header_raw]
+            for row_num, values in enumerate(rows_iter, start=2):
+                if all(v is None for v in values):
+                    continue
+                yield row_num, dict(zip(headers, values))
+        finally:
+            wb.close()
+        return
+
+    with open(path, encoding="utf-8-sig", newline="") as fh:
+        sample = fh.read(2048)
+        fh.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample)
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.DictReader(fh, dialect=dialect)
+        for row in reader:
+            yield reader.line_num, {_normalize_header(k): v for k, v in row.items()}
+
+
+def _decimal(value: Any) -> Decimal:
+    if value is None:
+        return Decimal("0")
+    text = str(value).strip()
+    if not text:
+        return Decimal("0")
+    number = Decimal(text)
+    if not number.is_finite():
+        raise InvalidOperation(text)
+    return number
+
+
+@dataclass
+class ImportRow:
+    """Fila validada del archivo."""
+
+    row_num: int
+    barcode: str
+    description: str
+    category: str
+    stock: Decimal
+    unit: str
+    purchase_price: Decimal
+    # None = P.Venta vacía → precio dinámico por margen (producto nuevo) o
+    # se conserva el precio actual (producto existente).
+    sale_price: Decimal | None
+
+    @property
+    def price_from_margin(self) -> bool:
+        return self.sale_price is None
+
+    def preview(self, *, is_new: bool, stock_locked: bool) -> dict[str, Any]:
+        return {
+            "row_num": self.row_num,
+            "barcode": self.barcode,
+            "description": self.description,
+            "category": self.category,
+            "stock": float(self.stock),
+            "unit": self.unit,
+            "purchase_price": float(self.purchase_price),
+            "sale_price": 0.0 if self.sale_price is None else float(self.sale_price),
+            "price_from_margin": self.price_from_margin,
+            "status": "Nuevo" if is_new else "Actualizar",
+            "stock_locked": stock_locked,
+        }
+
+
+def parse_import_row(
+    row_num: int,
+    raw: dict[str, Any],
+    decimal_units: Iterable[str] = (),
+) -> ImportRow:
+    """Normaliza una fila cruda; ``ImportRowError`` con el mensaje si no sirve."""
+    barcode = str(raw.get("barcode", "") or "").strip()
+    description = str(raw.get("description", "") or "").strip()
+    if not barcode:
+        raise ImportRowError(f"Fila {row_num}: código de barras vacío.")
+    if not description:
+        raise ImportRowError(f"Fila {row_num} ({barcode}): descripción vacía.")
+
+    raw_sale = raw.get("sale_price", None)
+    try:
+        stock = _decimal(raw.get("stock"))
+        purchase_price = _decimal(raw.get("purchase_price"))
+        sale_price = None if raw_sale is None or str(raw_sale).strip() == "" else _decimal(raw_sale)
+    except (InvalidOperation, ValueError, TypeError):
+        raise ImportRowError(f"Fila {row_num} ({barcode}): valores numéricos inválidos.") from None
+
+    unit = str(raw.get("unit", "Unidad") or "Unidad").strip()
+    # Integridad unidad↔stock: nunca redondear, se omite la fila y se avisa.
+    if unit.lower() not in decimal_units and stock != stock.to_integral_value():
+        raise ImportRowError(
+            f"Fila {row_num} ({barcode}): la unidad «{unit}» no admite "
+            f"decimales (stock {stock}). Corregí la unidad "
+            f"(kg/g/L/ml/m/cm) o usá un stock entero."
+        )
+
+    return ImportRow(
+        row_num=row_num,
+        barcode=barcode,
+        description=description,
+        category=str(raw.get("category", "GENERAL") or "GENERAL").strip().upper(),
+        stock=stock,
+        unit=unit,
+        purchase_price=purchase_price,
+        sale_price=sale_price,
+    )
+
+
+@dataclass
+class ImportSummary:
+    """Conteos, muestra y errores de un preview o de una importación."""
+
+    total: int = 0
+    new: int = 0
+    updated: int = 0
+    errors: int = 0
+    stock_locked: int = 0
+    margin_missing: int = 0
+    preview: list[dict[str, Any]] = field(default_factory=list)
+    error_messages: list[str] = field(default_factory=list)
+
+    def add_error(self, message: str) -> None:
+        self.errors += 1
+        if len(self.error_messages) < IMPORT_ERROR_LIMIT:
+            self.error_messages.append(message)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "new": self.new,
+            "updated": self.updated,
+            "errors": self.errors,
+            "total": self.total,
+            "stock_locked": self.stock_locked,
+            "margin_missing": self.margin_missing,
+        }
+
+
+def _valid_chunks(
+    path: str,
+    decimal_units: Iterable[str],
+    summary: ImportSummary,
+) -> Iterator[list[ImportRow]]:
+    units = {str(u).lower() for u in decimal_units}
+    chunk: list[ImportRow] = []
+    for row_num, raw in iter_import_rows(path):
+        summary.total += 1
+        try:
+            chunk.append(parse_import_row(row_num, raw, units))
+        except ImportRowError as exc:
+            summary.add_error(str(exc))
+            continue
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Productos existentes
+# ─────────────────────────────────────────────────────────────────────────────
+
+@dataclass
+class _Known:
+    product_id: int | None
+    stock: Decimal
+    # Stock DERIVADO de variantes/lotes: el archivo no lo pisa.
+    managed: bool
+
+
+def _load_known(
+    session: Session,
+    company_id: int,
+    branch_id: int,
+    barcodes: Iterable[str],
+    known: dict[str, _Known],
+) -> None:
+    """Agrega a ``known`` los productos del bloque que ya están en BD.
+
+    ``known`` va por :func:`barcode_key`: la BD compara los códigos sin
+    distinguir mayúsculas y devuelve el código guardado, no el del archivo.
+    """
+    missing = sorted({b for b in barcodes if barcode_key(b) not in known})
+    if not missing:
+        return
+    rows = session.exec(
+        select(Product.id, Product.barcode, Product.stock)
+        .where(Product.company_id == company_id)
+        .where(Product.branch_id == branch_id)
+        .where(Product.barcode.in_(missing))
+    ).all()
+    if not rows:
+        return
+    ids = [pid for pid, _barcode, _stock in rows]
+    managed = set(session.exec(
+        select(ProductVariant.product_id)
+        .where(ProductVariant.company_id == company_id)
+        .where(ProductVariant.branch_id == branch_id)
+        .where(ProductVariant.product_id.in_(ids))
+        .distinct()
+    ).all())
+    managed.update(session.exec(
+        select(ProductBatch.product_id)
+        .where(ProductBatch.company_id == company_id)
+        .where(ProductBatch.branch_id == branch_id)
+        .where(ProductBatch.product_id.in_(ids))
+        .distinct()
+    ).all())
+    for pid, barcode, stock in rows:
+        known[barcode_key(barcode)] = _Known(pid, Decimal(str(stock or 0)), pid in managed)
+
+
+def analyze_inventory_import(
+    session: Session,
+    path: str,
+    *,
+    company_id: int,
+    branch_id: int,
+    decimal_units: Iterable[str] = (),
+    global_margin: float = 0.0,
+) -> ImportSummary:
+    """Preview: valida el archivo completo por bloques, sin escribir.
+
+    Un código repetido en el archivo cuenta como "Actualizar" desde su segunda
+    aparición (así lo aplica la importación).
+    """
+    summary = ImportSummary()
+    known: dict[str, _Known] = {}
+    for chunk in _valid_chunks(path, decimal_units, summary):
+        _load_known(session, company_id, branch_id, (r.barcode for r in chunk), known)
+        for row in chunk:
+            key = barcode_key(row.barcode)
+            current = known.get(key)
+            is_new = current is None
+            stock_locked = bool(current and current.managed)
+            if is_new:
+                summary.new += 1
+                known[key] = _Known(None, row.stock, False)
+                # Sólo un producto NUEVO sin precio y sin margen quedaría en $0.
+                if row.price_from_margin and global_margin <= 0:
+                    summary.margin_missing += 1
+            else:
+                summary.updated += 1
+            if stock_locked:
+                summary.stock_locked += 1
+            if len(summary.preview) < IMPORT_PREVIEW_LIMIT:
+                summary.preview.append(row.preview(is_new=is_new, stock_locked=stock_locked))
+    return summary
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Escritura
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _upsert(
+    session: Session,
+    table,
+    rows: list[dict[str, Any]],
+    conflict_columns: tuple[str, ...],
+    update_columns: Iterable[str],
+) -> None:
+    """INSERT en bloque que, ante clave duplicada, pisa ``update_columns``."""
+    if not rows:
+        return
+    if session.get_bind().dialect.name == "sqlite":
+        stmt = sqlite_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(conflict_columns),
+            set_={name: stmt.excluded[name] for name in update_columns},
+        )
+    else:
+        stmt = mysql_insert(table)
+        stmt = stmt.on_duplicate_key_update(
+            {name: stmt.inserted[name] for name in update_columns}
+        )
+    session.execute(stmt, rows)
+
+
+def _apply_chunk(
+    session: Session,
+    chunk: list[ImportRow],
+    *,
+    company_id: int,
+    branch_id: int,
+    user_id: int | None,
+    known: dict[str, _Known],
+    categories: set[str],
+    summary: ImportSummary,
+) -> None:
+    _load_known(session, company_id, branch_id, (r.barcode for r in chunk), known)
+
+    # Un código repetido dentro del bloque se escribe una vez, con el mismo
+    # resultado que aplicar sus filas en orden: gana la última, salvo un precio
+    # vacío, que conserva el último explícito.
+    # Todo va por barcode_key, como ``known``.
+    latest: dict[str, ImportRow] = {}
+    first_stock: dict[str, Decimal] = {}
+    for row in chunk:
+        key = barcode_key(row.barcode)
+        previous = latest.get(key)
+        if key in known or previous is not None:
+            summary.updated += 1
+            current = known.get(key)
+            if current is not None and current.managed:
+                summary.stock_locked += 1
+        else:
+            summary.new += 1
+            first_stock[key] = row.stock
+        if previous is not None and row.sale_price is None:
+            row = replace(row, sale_price=previous.sale_price)
+        latest[key] = row
+
+    new_categories = sorted({row.category for row in chunk} - categories)
+    _upsert(
+        session,
+        Category.__table__,
+        [
+            {"company_id": company_id, "branch_id": branch_id, "name": name, "requires_batch": False}
+            for name in new_categories
+        ],
+        ("company_id", "branch_id", "name"),
+        ("name",),
+    )
+    categories.update(new_categories)
+
+    # Agrupar por columnas a pisar: el precio sólo si vino explícito y el
+    # stock sólo si no lo gobiernan variantes/lotes.
+    groups: dict[tuple[bool, bool], list[dict[str, Any]]] = {}
+    for key, row in latest.items():
+        current = known.get(key)
+        write_stock = current is None or not current.managed
+        groups.setdefault((row.sale_price is not None, write_stock), []).append({
+            **_PRODUCT_DEFAULTS,
+            "barcode": row.barcode,
+            "description": row.description,
+            "category": row.category,
+            "stock": row.stock if write_stock else current.stock,
+            "unit": row.unit,
+            "purchase_price": row.purchase_price,
+            "sale_price": row.sale_price,
+            "company_id": company_id,
+            "branch_id": branch_id,
+        })
+    for (write_price, write_stock), rows in sorted(groups.items()):
+        update_columns = list(_PRODUCT_BASE_UPDATE)
+        if write_price:
+            update_columns.append("sale_price")
+        if write_stock:
+            update_columns.append("stock")
+        _upsert(
+            session,
+            Product.__table__,
+            rows,
+            ("company_id", "branch_id", "barcode"),
+            update_columns,
+        )
+
+    created = {key for key in latest if key not in known}
+    if created:
+        for pid, barcode in session.exec(
+            select(Product.id, Product.barcode)
+            .where(Product.company_id == company_id)
+            .where(Product.branch_id == branch_id)
+            .where(Product.barcode.in_(sorted(latest[key].barcode for key in created)))
+        ).all():
+            # Alta con stock <= 0: sin movimiento de ingreso; el resto del
+            # bloque se registra como ajuste desde ese stock.
+            key = barcode_key(barcode)
+            known[key] = _Known(pid, min(first_stock[key], Decimal("0")), False)
+
+    now = utc_now_naive()
+    movements: list[dict[str, Any]] = []
+    for key, row in latest.items():
+        current = known[key]
+        if current.managed:
+            continue
+        quantity = row.stock - current.stock
+        current.stock = row.stock
+        if quantity == 0:
+            continue
+        label = "Importación masiva" if key in created else "Importación masiva (ajuste)"
+        movements.append({
+            "timestamp": now,
+            "type": IMPORT_MOVEMENT_TYPE,
+            "quantity": quantity,
+            "description": f"{label}: {row.description}",
+            "product_id": current.product_id,
+            "user_id": user_id,
+            "company_id": company_id,
+            "branch_id": branch_id,
+        })
+    if movements:
+        session.execute(insert(StockMovement.__table__), movements)
+
+
+def apply_inventory_import(
+    session: Session,
+    path: str,
+    *,
+    company_id: int,
+    branch_id: int,
+    user_id: int | None,
+    decimal_units: Iterable[str] = (),
+    progress: Callable[[int], None] | None = None,
+) -> ImportSummary:
+    """Importa el archivo en una transacción (todo o nada ante error de BD).
+
+    Las filas inválidas se omiten y quedan en ``error_messages``. ``progress``
+    recibe las filas leídas tras cada bloque. ``stock_locked`` cuenta las
+    filas de productos con stock gestionado por variantes/lotes (no se pisa).
+    """
+    summary = ImportSummary()
+    known: dict[str, _Known] = {}
+    categories = set(session.exec(
+        select(Category.name)
+        .where(Category.company_id == company_id)
+        .where(Category.branch_id == branch_id)
+    ).all())
+    try:
+        for chunk in _valid_chunks(path, decimal_units, summary):
+            _apply_chunk(
+                session,
+                chunk,
+                company_id=company_id,
+                branch_id=branch_id,
+                user_id=user_id,
+                known=known,
+                categories=categories,
+                summary=summary,
+            )
+            if progress is not None:
+                progress(summary.total)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return summary
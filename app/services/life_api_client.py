@@ -11,6 +11,8 @@ import os
 
 import httpx
 
+from app.utils.http_client import http_client
+
 logger = logging.getLogger(__name__)
 
 LIFE_API_TIMEOUT_SECONDS = 10
@@ -38,7 +40,7 @@ async def register_life_company(
         "phone": phone,
     }
     try:
-        async with httpx.AsyncClient(timeout=LIFE_API_TIMEOUT_SECONDS) as client:
+        async with http_client("life", timeout=LIFE_API_TIMEOUT_SECONDS) as client:
             response = await client.post(f"{base_url}/api/registro", json=payload)
         data = response.json() if response.content else {}
         if response.status_code == 201:
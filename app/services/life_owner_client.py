@@ -13,6 +13,7 @@ import os
 import httpx
 
 from app.services._owner_effective_status import effective_status as _effective_status
+from app.utils.http_client import http_client
 
 logger = logging.getLogger(__name__)
 
@@ -80,7 +81,7 @@ async def _request(method: str, path: str, **kwargs) -> dict:
     if not base_url:
         raise LifeOwnerClientError("TUWAYKILIFE no está disponible en este momento.")
     try:
-        async with httpx.AsyncClient(timeout=LIFE_API_TIMEOUT_SECONDS) as client:
+        async with http_client("life", timeout=LIFE_API_TIMEOUT_SECONDS) as client:
             response = await client.request(
                 method, f"{base_url}{path}", headers=_headers(), **kwargs
             )
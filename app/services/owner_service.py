@@ -23,6 +23,7 @@ from app.models.company import Branch, Company, PlanType, ProductType, Subscript
 from app.models.owner import OwnerAuditLog
 from app.models.sales import CompanySettings
 from app.utils.logger import get_logger
+from app.utils.login_pipeline import forget_verified_tokens
 from app.utils.sanitization import escape_like
 from app.utils.timezone import utc_now_naive
 
@@ -1142,6 +1143,8 @@ class OwnerService:
             ip_address=ip_address,
         )
         await session.commit()
+        # Sin esto el fast path de login serviría el snapshot previo al reset.
+        forget_verified_tokens(user_id)
 
         logger.info(
             "Owner %s reseteó contraseña del usuario %s (id=%s) en empresa %s",
@@ -5,6 +5,10 @@ Este módulo es la **única fuente de verdad** para:
   * Lookup de override de precio por lista (PriceListItem).
   * Lookup de precio por volumen (PriceTier).
   * Match de promoción aplicable a un ítem (Promotion).
+  * Snapshot batch de todo lo anterior para un carrito completo
+    (:class:`CartPricingSnapshot`), con el mismo núcleo de matching.
+  * Reprecio masivo de una lista, categoría o sucursal
+    (:func:`reprice_price_list`, :func:`reprice_products`).
 
 Los helpers son puros (no mutan el modelo, no incrementan ``current_uses``).
 El caller decide cuándo aplicar efectos secundarios:
@@ -19,22 +23,25 @@ precio mostrado en el carrito difiera del cobrado al confirmar la venta.
 """
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
-from decimal import Decimal
-from typing import Optional
+from decimal import ROUND_CEILING, ROUND_FLOOR, ROUND_HALF_UP, Decimal
+from types import SimpleNamespace
+from typing import Any, Optional
 
-from sqlalchemy import func as _sql_func
+from sqlalchemy import bindparam, func as _sql_func, or_, update
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlmodel import select
+from sqlmodel import Session, select
 
 
 def sqla_func_upper(col):  # alias local para evitar import-shadow en lectura
     return _sql_func.upper(col)
 
-from app.models.inventory import PriceTier, Product
+from app.models.inventory import PriceTier, Product, ProductVariant
 from app.models.price_lists import PriceListItem
 from app.models.promotions import Promotion, PromotionProduct, PromotionScope, PromotionType
+from app.utils.performance import track_queries
+from app.utils.pricing import resolve_effective_price as resolve_cascade_price
 from app.utils.timezone import utc_now_naive
 
 
@@ -152,6 +159,21 @@ async def resolve_price_tier_price(
     return None
 
 
+def _pick_tier_price(tiers, quantity: Decimal) -> Decimal | None:
+    """Equivalente en memoria de ``ORDER BY min_quantity DESC ... .first()``.
+
+    ``tiers`` debe venir ordenado por ``min_quantity`` descendente. Igual que
+    la query, sólo se mira el primer tier aplicable: si su ``unit_price`` es
+    NULL no se prueba el siguiente escalón.
+    """
+    for tier in tiers:
+        if Decimal(str(tier.min_quantity)) <= quantity:
+            if tier.unit_price is not None:
+                return Decimal(str(tier.unit_price))
+            return None
+    return None
+
+
 # ─── Promociones ─────────────────────────────────────────────────────────────
 
 
@@ -191,8 +213,43 @@ async def find_applicable_promotion(
     Útil al cobrar la venta efectiva; innecesario para preview del carrito.
     """
     effective_now = now or utc_now_naive()
-    normalized_coupon = (coupon_code or "").strip().upper() or None
+    normalized_coupon = _normalize_coupon(coupon_code)
+
+    stmt = _active_promotions_stmt(
+        company_id=company_id,
+        branch_id=branch_id,
+        effective_now=effective_now,
+        normalized_coupon=normalized_coupon,
+    )
+    if lock_for_update:
+        stmt = stmt.with_for_update()
+    promotions = (await session.exec(stmt)).all()
+    product_ids_by_promo = await _load_promotion_product_ids(session, promotions)
 
+    return _match_promotion(
+        promotions,
+        product_ids_by_promo,
+        product_id=product_id,
+        category=category,
+        quantity=quantity,
+        effective_now=effective_now,
+        normalized_coupon=normalized_coupon,
+        cart_subtotal=cart_subtotal,
+    )
+
+
+def _normalize_coupon(coupon_code: str | None) -> str | None:
+    return (coupon_code or "").strip().upper() or None
+
+
+def _active_promotions_stmt(
+    *,
+    company_id: int,
+    branch_id: int,
+    effective_now: datetime,
+    normalized_coupon: str | None,
+):
+    """SELECT de promociones vigentes del tenant, ya ordenado por prioridad."""
     today_start = effective_now.replace(hour=0, minute=0, second=0, microsecond=0)
     stmt = (
         select(Promotion)
@@ -215,17 +272,20 @@ async def find_applicable_promotion(
 
     # Ordenar para que las con cupón salgan primero (ganan prioridad), luego
     # por scope (PRODUCT > CATEGORY > ALL).
-    stmt = stmt.order_by(
+    return stmt.order_by(
         Promotion.coupon_code.is_(None).asc(),  # None al final
         Promotion.scope.desc(),
     )
 
-    if lock_for_update:
-        stmt = stmt.with_for_update()
-    promotions = (await session.exec(stmt)).all()
 
-    # Pre-cargar product_ids multi-producto para promos con scope=PRODUCT.
-    # Evita N+1: una sola query antes del loop.
+async def _load_promotion_product_ids(
+    session: AsyncSession,
+    promotions,
+) -> dict[int, set[int]]:
+    """Pre-carga los product_ids multi-producto de las promos con scope=PRODUCT.
+
+    Evita N+1: una sola query para todas las promos candidatas.
+    """
     product_scope_ids = [p.id for p in promotions if p.scope == PromotionScope.PRODUCT]
     product_ids_by_promo: dict[int, set[int]] = {}
     if product_scope_ids:
@@ -236,7 +296,26 @@ async def find_applicable_promotion(
         )).all()
         for pp in pp_rows:
             product_ids_by_promo.setdefault(pp.promotion_id, set()).add(pp.product_id)
+    return product_ids_by_promo
+
+
+def _match_promotion(
+    promotions,
+    product_ids_by_promo: dict[int, set[int]],
+    *,
+    product_id: int,
+    category: str | None,
+    quantity: Decimal,
+    effective_now: datetime,
+    normalized_coupon: str | None,
+    cart_subtotal: Decimal | None,
+) -> Promotion | None:
+    """Recorre las promos candidatas (ya ordenadas) y devuelve la primera que aplica.
 
+    Núcleo compartido por :func:`find_applicable_promotion` (una query por
+    ítem) y :class:`CartPricingSnapshot` (una query por carrito), de modo que
+    ambos caminos resuelvan exactamente la misma promoción.
+    """
     for promo in promotions:
         # Defensa: si la promo tiene cupón y el caller no lo ingresó (o es
         # distinto), descartar. La query SQL ya filtra esto, pero el guard en
@@ -445,13 +524,7 @@ async def resolve_effective_price(
             source = PriceSource.TIER
 
     if base_price is None:
-        if product.sale_price is not None:
-            base_price = Decimal(str(product.sale_price))
-        elif global_margin > 0 and product.purchase_price and float(product.purchase_price) > 0:
-            pp = float(product.purchase_price)
-            base_price = Decimal(str(round(pp * (1 + global_margin / 100), 2)))
-        else:
-            base_price = Decimal("0")
+        base_price = _product_base_price(product, global_margin)
         source = PriceSource.BASE
 
     promo = await find_applicable_promotion(
@@ -473,3 +546,592 @@ async def resolve_effective_price(
         source=source,
         applied_promotion=promo,
     )
+
+
+def _product_base_price(product: Product, global_margin: float) -> Decimal:
+    """Último escalón: ``sale_price`` o compra × margen global."""
+    if product.sale_price is not None:
+        return Decimal(str(product.sale_price))
+    if global_margin > 0 and product.purchase_price and float(product.purchase_price) > 0:
+        pp = float(product.purchase_price)
+        return Decimal(str(round(pp * (1 + global_margin / 100), 2)))
+    return Decimal("0")
+
+
+# ─── Resolución batch (carrito completo) ─────────────────────────────────────
+
+
+@dataclass
+class CartPricingSnapshot:
+    """Datos de pricing de un carrito completo, precargados en memoria.
+
+    Se construye con :func:`load_cart_pricing_snapshot` (una query por tabla)
+    y luego resuelve cada línea sin volver a la BD. Los métodos replican
+    exactamente a :func:`resolve_price_list_price`,
+    :func:`resolve_price_tier_price` y :func:`find_applicable_promotion`
+    (comparten el núcleo de matching), pero sin una round-trip por ítem.
+
+    Attributes:
+        price_list_items: ``(product_id, variant_id) → unit_price`` de la lista
+            del cliente; ``variant_id=None`` es el override del producto base.
+        tiers_by_variant: Tiers por variante, ordenados por ``min_quantity`` desc.
+        tiers_by_product: Tiers por producto, ordenados por ``min_quantity`` desc.
+        promotions: Promociones vigentes, en el orden de prioridad de la query.
+        product_ids_by_promo: Filas de ``PromotionProduct`` por promoción.
+        now: Instante de evaluación (vigencia, día y banda horaria).
+        coupon_code: Cupón normalizado (mayúsculas) o None.
+    """
+    price_list_items: dict[tuple[int, int | None], Decimal]
+    tiers_by_variant: dict[int, list[PriceTier]]
+    tiers_by_product: dict[int, list[PriceTier]]
+    promotions: list[Promotion]
+    product_ids_by_promo: dict[int, set[int]]
+    now: datetime
+    coupon_code: str | None = None
+
+    def price_list_price(
+        self,
+        product_id: int,
+        variant_id: int | None,
+    ) -> Decimal | None:
+        """Override de lista: variante específica primero, luego producto base."""
+        if variant_id:
+            price = self.price_list_items.get((product_id, variant_id))
+            if price is not None:
+                return price
+        return self.price_list_items.get((product_id, None))
+
+    def tier_price(
+        self,
+        product_id: int | None,
+        variant_id: int | None,
+        quantity: Decimal,
+    ) -> Decimal | None:
+        """Precio por volumen: tier de variante primero, fallback a producto."""
+        if variant_id:
+            price = _pick_tier_price(self.tiers_by_variant.get(variant_id, ()), quantity)
+            if price is not None:
+                return price
+        if product_id:
+            return _pick_tier_price(self.tiers_by_product.get(product_id, ()), quantity)
+        return None
+
+    def find_promotion(
+        self,
+        *,
+        product_id: int,
+        category: str | None,
+        quantity: Decimal,
+        cart_subtotal: Decimal | None = None,
+    ) -> Promotion | None:
+        """Promoción aplicable al ítem (misma jerarquía que la versión async)."""
+        return _match_promotion(
+            self.promotions,
+            self.product_ids_by_promo,
+            product_id=product_id,
+            category=category,
+            quantity=quantity,
+            effective_now=self.now,
+            normalized_coupon=self.coupon_code,
+            cart_subtotal=cart_subtotal,
+        )
+
+
+async def load_cart_pricing_snapshot(
+    session: AsyncSession,
+    *,
+    product_ids: list[int] | set[int],
+    variant_ids: list[int] | set[int],
+    company_id: int,
+    branch_id: int,
+    price_list_id: int | None = None,
+    now: datetime | None = None,
+    coupon_code: str | None = None,
+) -> CartPricingSnapshot:
+    """Carga en bloque lo necesario para preciar un carrito completo.
+
+    A lo sumo cuatro queries, independientes del tamaño del carrito:
+    ``PriceListItem`` (sólo si hay lista), ``PriceTier``, ``Promotion`` y
+    ``PromotionProduct`` (sólo si hay promos con scope=PRODUCT). Pensado
+    para el cobro, donde cada round-trip extiende el tiempo que las filas
+    de ``Product`` quedan tomadas con ``FOR UPDATE``.
+    """
+    effective_now = now or utc_now_naive()
+    normalized_coupon = _normalize_coupon(coupon_code)
+    unique_product_ids = sorted({pid for pid in product_ids if pid})
+    unique_variant_ids = sorted({vid for vid in variant_ids if vid})
+
+    price_list_items: dict[tuple[int, int | None], Decimal] = {}
+    if price_list_id and unique_product_ids:
+        rows = (await session.exec(
+            select(PriceListItem)
+            .where(PriceListItem.price_list_id == price_list_id)
+            .where(PriceListItem.product_id.in_(unique_product_ids))
+            .where(PriceListItem.company_id == company_id)
+            .where(PriceListItem.branch_id == branch_id)
+        )).all()
+        for row in rows:
+            key = (row.product_id, row.product_variant_id or None)
+            price_list_items.setdefault(key, Decimal(str(row.unit_price)))
+
+    tiers_by_variant: dict[int, list[PriceTier]] = {}
+    tiers_by_product: dict[int, list[PriceTier]] = {}
+    tier_filters = []
+    if unique_variant_ids:
+        tier_filters.append(PriceTier.product_variant_id.in_(unique_variant_ids))
+    if unique_product_ids:
+        tier_filters.append(PriceTier.product_id.in_(unique_product_ids))
+    if tier_filters:
+        tiers = (await session.exec(
+            select(PriceTier)
+            .where(PriceTier.company_id == company_id)
+            .where(PriceTier.branch_id == branch_id)
+            .where(or_(*tier_filters))
+            .order_by(PriceTier.min_quantity.desc())
+        )).all()
+        tiers = sorted(tiers, key=lambda t: t.min_quantity, reverse=True)
+        for tier in tiers:
+            if tier.product_variant_id:
+                tiers_by_variant.setdefault(tier.product_variant_id, []).append(tier)
+            if tier.product_id:
+                tiers_by_product.setdefault(tier.product_id, []).append(tier)
+
+    promotions = list((await session.exec(
+        _active_promotions_stmt(
+            company_id=company_id,
+            branch_id=branch_id,
+            effective_now=effective_now,
+            normalized_coupon=normalized_coupon,
+        )
+    )).all())
+    product_ids_by_promo = await _load_promotion_product_ids(session, promotions)
+
+    return CartPricingSnapshot(
+        price_list_items=price_list_items,
+        tiers_by_variant=tiers_by_variant,
+        tiers_by_product=tiers_by_product,
+        promotions=promotions,
+        product_ids_by_promo=product_ids_by_promo,
+        now=effective_now,
+        coupon_code=normalized_coupon,
+    )
+
+
+def resolve_base_price_from_snapshot(
+    snapshot: CartPricingSnapshot,
+    *,
+    product: Product,
+    variant_id: int | None,
+    quantity: Decimal,
+    client_price_list_id: int | None,
+    global_margin: float = 0.0,
+) -> tuple[Decimal, str]:
+    """Precio base (sin promo) y su origen, leyendo sólo del snapshot."""
+    if client_price_list_id:
+        pl_price = snapshot.price_list_price(product.id, variant_id)
+        if pl_price is not None and pl_price > 0:
+            return pl_price, PriceSource.PRICE_LIST
+
+    tier_price = snapshot.tier_price(product.id, variant_id, quantity)
+    if tier_price is not None and tier_price > 0:
+        return tier_price, PriceSource.TIER
+
+    return _product_base_price(product, global_margin), PriceSource.BASE
+
+
+def resolve_effective_price_from_snapshot(
+    snapshot: CartPricingSnapshot,
+    *,
+    product: Product,
+    variant_id: int | None,
+    quantity: Decimal,
+    client_price_list_id: int | None,
+    global_margin: float = 0.0,
+    cart_subtotal: Decimal | None = None,
+) -> PriceResolution:
+    """Equivalente en memoria de :func:`resolve_effective_price`.
+
+    El cupón y el instante de evaluación son los del snapshot.
+    """
+    base_price, source = resolve_base_price_from_snapshot(
+        snapshot,
+        product=product,
+        variant_id=variant_id,
+        quantity=quantity,
+        client_price_list_id=client_price_list_id,
+        global_margin=global_margin,
+    )
+    promo = snapshot.find_promotion(
+        product_id=product.id,
+        category=product.category,
+        quantity=quantity,
+        cart_subtotal=cart_subtotal,
+    )
+    final_price = apply_promotion_to_price(promo, base_price, quantity) if promo else base_price
+    return PriceResolution(
+        base_price=base_price,
+        final_price=final_price,
+        source=source,
+        applied_promotion=promo,
+    )
+
+
+# ─── Reprecio masivo ─────────────────────────────────────────────────────────
+#
+# Una query trae todas las filas del alcance (lista/categoría/sucursal) con
+# los precios que hacen falta, el precio nuevo se calcula en memoria con la
+# misma cascada que ``app.utils.pricing.resolve_effective_price`` y se
+# escribe con ``UPDATE … WHERE id = :row_id`` en executemany por lotes.
+# Son sync (``rx.session``): llamarlas vía ``run_sync_db``. El commit es del
+# caller; al confirmarlo se invalidan ``pricing_cache`` y, si se tocaron
+# productos, ``barcode_cache`` (el ``UPDATE`` de Core no pasa por los eventos
+# del ORM que los invalidan solos).
+
+ADJUST_PERCENT = "percent"
+ADJUST_AMOUNT = "amount"
+ADJUST_MARGIN = "margin"
+
+ROUND_NEAREST = "nearest"
+ROUND_UP = "up"
+ROUND_DOWN = "down"
+
+BULK_PRICE_BATCH_SIZE = 1000
+_CENT = Decimal("0.01")
+_ROUNDINGS = {ROUND_NEAREST: ROUND_HALF_UP, ROUND_UP: ROUND_CEILING, ROUND_DOWN: ROUND_FLOOR}
+
+
+def round_price(
+    value: Decimal,
+    step: Decimal = _CENT,
+    mode: str = ROUND_NEAREST,
+) -> Decimal:
+    """Redondea ``value`` a múltiplos de ``step`` (0.01, 0.10, 0.50, 1…)."""
+    step = Decimal(str(step or 0))
+    if step <= 0:
+        step = _CENT
+    units = (Decimal(str(value)) / step).quantize(
+        Decimal("1"), rounding=_ROUNDINGS.get(mode, ROUND_HALF_UP)
+    )
+    return (units * step).quantize(_CENT, rounding=ROUND_HALF_UP)
+
+
+@dataclass(frozen=True)
+class PriceAdjustment:
+    """Regla de reprecio.
+
+    ``percent``: ``value`` % sobre la base (-15 = 15% menos).
+    ``amount``: suma ``value`` a la base (negativo resta).
+    ``margin``: P. COMPRA × (1 + margen / 100), con ``value`` como margen o,
+    si es None, el ``custom_profit_margin`` del producto o el margen global.
+    """
+    kind: str
+    value: Decimal | None = None
+    round_step: Decimal = _CENT
+    round_mode: str = ROUND_NEAREST
+
+    def __post_init__(self) -> None:
+        if self.kind not in (ADJUST_PERCENT, ADJUST_AMOUNT, ADJUST_MARGIN):
+            raise ValueError(f"Tipo de ajuste inválido: {self.kind!r}")
+        if self.round_mode not in _ROUNDINGS:
+            raise ValueError(f"Redondeo inválido: {self.round_mode!r}")
+        if self.kind != ADJUST_MARGIN and self.value is None:
+            raise ValueError("El ajuste requiere un valor.")
+        if self.kind == ADJUST_PERCENT and Decimal(str(self.value)) <= -100:
+            raise ValueError("El porcentaje debe ser mayor a -100.")
+        if self.kind == ADJUST_MARGIN and self.value is not None and Decimal(str(self.value)) < 0:
+            raise ValueError("El margen no puede ser negativo.")
+
+    def apply(
+        self,
+        base: Decimal | None,
+        *,
+        purchase_price: Decimal | None = None,
+        margin: Decimal | float | None = None,
+    ) -> Decimal | None:
+        """Precio nuevo, o None si no hay de dónde calcularlo (se omite)."""
+        if self.kind == ADJUST_MARGIN:
+            cost = Decimal(str(purchase_price or 0))
+            pct = self.value if self.value is not None else margin
+            if cost <= 0 or pct is None:
+                return None
+            raw = cost * (1 + Decimal(str(pct)) / 100)
+        else:
+            if base is None or base <= 0:
+                return None
+            value = Decimal(str(self.value))
+            raw = base * (1 + value / 100) if self.kind == ADJUST_PERCENT else base + value
+        if raw <= 0:
+            return None
+        return round_price(raw, self.round_step, self.round_mode)
+
+
+@dataclass
+class BulkPriceResult:
+    """Conteos de un reprecio; ``preview`` trae las primeras filas que cambian."""
+    matched: int = 0
+    changed: int = 0
+    skipped: int = 0
+    dry_run: bool = False
+    preview: list[dict[str, Any]] = field(default_factory=list)
+
+    def _record(
+        self,
+        row_id: int,
+        description: str,
+        old: Decimal | None,
+        new: Decimal | None,
+        preview_limit: int,
+    ) -> bool:
+        self.matched += 1
+        if new is None:
+            self.skipped += 1
+            return False
+        if old is not None and Decimal(str(old)) == new:
+            return False
+        self.changed += 1
+        if len(self.preview) < preview_limit:
+            self.preview.append(
+                {"id": row_id, "description": description, "old_price": old, "new_price": new}
+            )
+        return True
+
+
+def _cascade_price(
+    product_sale_price: Decimal | None,
+    purchase_price: Decimal | None,
+    variant_sale_price: Decimal | None,
+    global_margin: float,
+    has_variant: bool,
+) -> Decimal:
+    return resolve_cascade_price(
+        SimpleNamespace(sale_price=product_sale_price, purchase_price=purchase_price),
+        SimpleNamespace(sale_price=variant_sale_price) if has_variant else None,
+        global_margin,
+    )
+
+
+def _variant_description(description: str | None, size: str | None, color: str | None) -> str:
+    label = " / ".join(part for part in (size, color) if part)
+    return f"{description or ''} ({label})" if label else (description or "")
+
+
+def _write_prices(
+    session: Session,
+    price_column,
+    company_id: int,
+    branch_id: int,
+    rows: list[dict[str, Any]],
+    extra_values: dict[str, Any] | None = None,
+) -> None:
+    table = price_column.table
+    stmt = (
+        update(table)
+        .where(table.c.id == bindparam("row_id"))
+        .where(table.c.company_id == company_id)
+        .where(table.c.branch_id == branch_id)
+        .values({price_column.name: bindparam("new_price"), **(extra_values or {})})
+    )
+    for start in range(0, len(rows), BULK_PRICE_BATCH_SIZE):
+        session.execute(stmt, rows[start:start + BULK_PRICE_BATCH_SIZE])
+
+
+def _invalidate_caches_after_commit(
+    session: Session,
+    company_id: int,
+    branch_id: int,
+    *,
+    barcodes: bool,
+) -> None:
+    """Invalida los caches de precios cuando el caller confirme la transacción.
+
+    Invalidar antes del commit dejaría que otra réplica recargue los precios
+    viejos y los cachee hasta el TTL.
+    """
+    from sqlalchemy import event
+
+    from app.services.barcode_cache import invalidate_barcode_cache
+    from app.services.pricing_cache import invalidate_pricing_cache
+
+    def _invalidate(_session) -> None:
+        invalidate_pricing_cache(company_id, branch_id)
+        if barcodes:
+            invalidate_barcode_cache(company_id, branch_id)
+
+    event.listen(session, "after_commit", _invalidate, once=True)
+
+
+@track_queries()
+def reprice_price_list(
+    session: Session,
+    *,
+    company_id: int,
+    branch_id: int,
+    price_list_id: int,
+    adjustment: PriceAdjustment,
+    global_margin: float = 0.0,
+    from_current: bool = False,
+    category: str | None = None,
+    dry_run: bool = False,
+    preview_limit: int = 20,
+) -> BulkPriceResult:
+    """Reprecia los ítems de una lista (opcionalmente sólo una categoría).
+
+    La base es el precio efectivo del producto/variante (cascada variante >
+    producto > compra × margen global) o, con ``from_current``, el
+    ``unit_price`` actual del ítem. ``dry_run`` sólo cuenta y arma el preview.
+    Al commit del caller se invalida ``pricing_cache`` de la sucursal.
+    """
+    query = (
+        select(
+            PriceListItem.id,
+            PriceListItem.unit_price,
+            PriceListItem.product_variant_id,
+            Product.description,
+            Product.sale_price,
+            Product.purchase_price,
+            Product.custom_profit_margin,
+            ProductVariant.sale_price,
+            ProductVariant.size,
+            ProductVariant.color,
+        )
+        .join(Product, Product.id == PriceListItem.product_id)
+        .outerjoin(ProductVariant, ProductVariant.id == PriceListItem.product_variant_id)
+        .where(PriceListItem.price_list_id == price_list_id)
+        .where(PriceListItem.company_id == company_id)
+        .where(PriceListItem.branch_id == branch_id)
+        .where(Product.company_id == company_id)
+        .where(Product.branch_id == branch_id)
+        .order_by(PriceListItem.id)
+    )
+    if category:
+        query = query.where(Product.category == category)
+
+    result = BulkPriceResult(dry_run=dry_run)
+    updates: list[dict[str, Any]] = []
+    for (
+        item_id, unit_price, variant_id, description, sale_price, purchase_price,
+        custom_margin, variant_price, size, color,
+    ) in session.exec(query):
+        if from_current:
+            base = Decimal(str(unit_price or 0))
+        else:
+            base = _cascade_price(
+                sale_price, purchase_price, variant_price, global_margin, variant_id is not None
+            )
+        new_price = adjustment.apply(
+            base,
+            purchase_price=purchase_price,
+            margin=custom_margin if custom_margin is not None else global_margin,
+        )
+        label = _variant_description(description, size, color)
+        if result._record(item_id, label, unit_price, new_price, preview_limit):
+            updates.append({"row_id": item_id, "new_price": new_price})
+
+    if updates and not dry_run:
+        _write_prices(
+            session, PriceListItem.__table__.c.unit_price, company_id, branch_id, updates
+        )
+        _invalidate_caches_after_commit(session, company_id, branch_id, barcodes=False)
+    return result
+
+
+@track_queries()
+def reprice_products(
+    session: Session,
+    *,
+    company_id: int,
+    branch_id: int,
+    adjustment: PriceAdjustment,
+    global_margin: float = 0.0,
+    category: str | None = None,
+    include_variants: bool = True,
+    dry_run: bool = False,
+    preview_limit: int = 20,
+) -> BulkPriceResult:
+    """Reprecia ``Product.sale_price`` de la sucursal (o de una categoría).
+
+    La base es el precio efectivo (``sale_price`` o compra × margen global).
+    Con ``include_variants`` también ajusta las variantes con precio propio,
+    para que no queden desfasadas de su producto. Marca
+    ``sale_price_updated_at`` (filtro de etiquetas con precio nuevo). Al
+    commit del caller se invalidan ``pricing_cache`` y ``barcode_cache`` de la
+    sucursal.
+    """
+    result = BulkPriceResult(dry_run=dry_run)
+    product_query = (
+        select(
+            Product.id,
+            Product.description,
+            Product.sale_price,
+            Product.purchase_price,
+            Product.custom_profit_margin,
+        )
+        .where(Product.company_id == company_id)
+        .where(Product.branch_id == branch_id)
+        .order_by(Product.id)
+    )
+    if category:
+        product_query = product_query.where(Product.category == category)
+
+    product_updates: list[dict[str, Any]] = []
+    for product_id, description, sale_price, purchase_price, custom_margin in session.exec(
+        product_query
+    ):
+        base = _cascade_price(sale_price, purchase_price, None, global_margin, False)
+        new_price = adjustment.apply(
+            base,
+            purchase_price=purchase_price,
+            margin=custom_margin if custom_margin is not None else global_margin,
+        )
+        if result._record(product_id, description or "", sale_price, new_price, preview_limit):
+            product_updates.append({"row_id": product_id, "new_price": new_price})
+
+    variant_updates: list[dict[str, Any]] = []
+    if include_variants:
+        variant_query = (
+            select(
+                ProductVariant.id,
+                ProductVariant.sale_price,
+                ProductVariant.size,
+                ProductVariant.color,
+                Product.description,
+                Product.purchase_price,
+                Product.custom_profit_margin,
+            )
+            .join(Product, Product.id == ProductVariant.product_id)
+            .where(ProductVariant.company_id == company_id)
+            .where(ProductVariant.branch_id == branch_id)
+            .where(ProductVariant.sale_price.is_not(None))
+            .order_by(ProductVariant.id)
+        )
+        if category:
+            variant_query = variant_query.where(Product.category == category)
+        for (
+            variant_id, variant_price, size, color, description, purchase_price, custom_margin,
+        ) in session.exec(variant_query):
+            new_price = adjustment.apply(
+                Decimal(str(variant_price)),
+                purchase_price=purchase_price,
+                margin=custom_margin if custom_margin is not None else global_margin,
+            )
+            label = _variant_description(description, size, color)
+            if result._record(variant_id, label, variant_price, new_price, preview_limit):
+                variant_updates.append({"row_id": variant_id, "new_price": new_price})
+
+    if not dry_run:
+        if product_updates:
+            _write_prices(
+                session,
+                Product.__table__.c.sale_price,
+                company_id,
+                branch_id,
+                product_updates,
+                {"sale_price_updated_at": utc_now_naive()},
+            )
+        if variant_updates:
+            _write_prices(
+                session, ProductVariant.__table__.c.sale_price, company_id, branch_id, variant_updates
+            )
+        if product_updates or variant_updates:
+            _invalidate_caches_after_commit(session, company_id, branch_id, barcodes=True)
+    return result
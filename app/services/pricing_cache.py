@@ -0,0 +1,435 @@
+"""Cache en proceso de los datos de pricing por tenant (empresa + sucursal).
+
+Promociones, listas de precios y tiers cambian pocas veces al día, pero el
+preview del carrito (``CartMixin``) los consultaba en cada recálculo. Este
+módulo mantiene, por ``(company_id, branch_id)``, un
+:class:`TenantPricingSnapshot` con:
+
+  * Promociones activas agrupadas por scope (con su máscara de días y banda
+    horaria, que se evalúan en memoria) + filas de ``PromotionProduct``.
+  * Escaleras de ``PriceTier`` por producto y por variante.
+  * Mapas de ``PriceListItem`` por lista, cargados a demanda la primera vez
+    que un carrito usa esa lista.
+
+Acotado por TTL (``PRICING_CACHE_TTL_SECONDS``) y LRU
+(``PRICING_CACHE_MAX_TENANTS``). Las escrituras llaman a
+:func:`invalidate_pricing_cache`, que descarta la entrada local y, si hay
+``REDIS_URL``, incrementa un contador de versión y lo publica por pub/sub
+para que las demás réplicas descarten la suya. Sin Redis la invalidación es
+local y el TTL acota la desactualización en el resto de procesos.
+
+Dentro del event loop las idas a Redis usan el cliente ``redis.asyncio``: la
+lectura de versión se espera sin bloquear y la propagación de una
+invalidación queda como tarea del loop. El cliente síncrono sólo lo usan el
+listener pub/sub (en su thread) y las invalidaciones fuera de un loop.
+
+Sólo para preview: el cobro (``sale_service``) sigue resolviendo contra la
+BD dentro de su transacción con ``FOR UPDATE``.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import TYPE_CHECKING
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+
+from app.models.inventory import PriceTier
+from app.models.price_lists import PriceListItem
+from app.models.promotions import Promotion, PromotionScope
+from app.services.pricing import (
+    CartPricingSnapshot,
+    _load_promotion_product_ids,
+    _normalize_coupon,
+)
+from app.utils.redis_client import SharedRedis
+from app.utils.timezone import utc_now_naive
+
+if TYPE_CHECKING:
+    import redis
+
+logger = logging.getLogger("PricingCache")
+
+PRICING_CACHE_TTL_SECONDS = float(os.getenv("PRICING_CACHE_TTL_SECONDS", "300"))
+PRICING_CACHE_MAX_TENANTS = int(os.getenv("PRICING_CACHE_MAX_TENANTS", "256"))
+
+_INVALIDATION_CHANNEL = "pricing:invalidate"
+_VERSION_KEY_PREFIX = "pricing:version"
+# Orden de prioridad de scope (== ORDER BY scope DESC de la query por ítem).
+_SCOPE_ORDER = (PromotionScope.PRODUCT, PromotionScope.CATEGORY, PromotionScope.ALL)
+
+
+@dataclass
+class TenantPricingSnapshot:
+    """Datos de pricing de una sucursal, listos para preciar carritos en memoria."""
+    company_id: int
+    branch_id: int
+    promotions_by_scope: dict[str, list[Promotion]]
+    product_ids_by_promo: dict[int, set[int]]
+    tiers_by_variant: dict[int, list[PriceTier]]
+    tiers_by_product: dict[int, list[PriceTier]]
+    version: int = 0
+    loaded_at: float = field(default_factory=time.monotonic)
+    price_lists: dict[int, dict[tuple[int, int | None], Decimal]] = field(
+        default_factory=dict
+    )
+
+    def is_fresh(self, ttl: float = PRICING_CACHE_TTL_SECONDS) -> bool:
+        return (time.monotonic() - self.loaded_at) < ttl
+
+    def active_promotions(
+        self,
+        now: datetime,
+        coupon_code: str | None = None,
+    ) -> list[Promotion]:
+        """Promos vigentes en ``now`` en el mismo orden que la query por ítem.
+
+        Cupón ingresado primero, luego PRODUCT > CATEGORY > ALL. Día de semana,
+        banda horaria, ``min_quantity`` y ``max_uses`` los evalúa el matcher.
+        """
+        normalized = _normalize_coupon(coupon_code)
+        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        with_coupon: list[Promotion] = []
+        automatic: list[Promotion] = []
+        for scope in _SCOPE_ORDER:
+            for promo in self.promotions_by_scope.get(scope, ()):
+                if promo.starts_at > now or promo.ends_at < today_start:
+                    continue
+                promo_coupon = _normalize_coupon(promo.coupon_code)
+                if promo_coupon is None:
+                    automatic.append(promo)
+                elif promo_coupon == normalized:
+                    with_coupon.append(promo)
+        return with_coupon + automatic
+
+    def for_cart(
+        self,
+        *,
+        price_list_id: int | None,
+        now: datetime,
+        coupon_code: str | None = None,
+    ) -> CartPricingSnapshot:
+        """Vista :class:`CartPricingSnapshot` para un carrito concreto."""
+        return CartPricingSnapshot(
+            price_list_items=self.price_lists.get(price_list_id or 0, {}),
+            tiers_by_variant=self.tiers_by_variant,
+            tiers_by_product=self.tiers_by_product,
+            promotions=self.active_promotions(now, coupon_code),
+            product_ids_by_promo=self.product_ids_by_promo,
+            now=now,
+            coupon_code=_normalize_coupon(coupon_code),
+        )
+
+
+# ─── Estado del proceso ──────────────────────────────────────────────────────
+
+_lock = threading.Lock()
+_entries: "OrderedDict[tuple[int, int], TenantPricingSnapshot]" = OrderedDict()
+# Generación local por tenant: un load que arrancó antes de una invalidación
+# no debe guardar su resultado (podría haber leído datos previos al write).
+_generations: dict[tuple[int, int], int] = {}
+_company_generations: dict[int, int] = {}
+
+_redis = SharedRedis("pricing cache", logger=logger)
+_subscriber_thread = None
+_subscriber_lock = threading.Lock()
+# Propagaciones en curso (el loop sólo guarda referencias débiles a sus tareas).
+_pending_broadcasts: "set[asyncio.Task]" = set()
+
+
+def _generation(key: tuple[int, int]) -> tuple[int, int]:
+    return _generations.get(key, 0), _company_generations.get(key[0], 0)
+
+
+def _get_redis() -> "redis.Redis | None":
+    """Cliente Redis síncrono (listener pub/sub); None = sólo invalidación local."""
+    return _redis.sync_client()
+
+
+def _version_key(company_id: int, branch_id: int | None) -> str:
+    return f"{_VERSION_KEY_PREFIX}:{company_id}:{branch_id if branch_id else '*'}"
+
+
+async def _remote_version(company_id: int, branch_id: int) -> int:
+    client = _redis.async_client()
+    if client is None:
+        return 0
+    try:
+        branch_v, company_v = await client.mget(
+            _version_key(company_id, branch_id), _version_key(company_id, None)
+        )
+        return int(branch_v or 0) + int(company_v or 0)
+    except Exception as exc:
+        _redis.failed(exc)
+        return 0
+
+
+def _on_invalidation_message(message: dict) -> None:
+    """Handler pub/sub: ``"<company_id>:<branch_id|*>"``."""
+    try:
+        company_raw, branch_raw = str(message.get("data") or "").split(":", 1)
+        company_id = int(company_raw)
+        branch_id = None if branch_raw == "*" else int(branch_raw)
+    except (ValueError, AttributeError):
+        return
+    _invalidate_local(company_id, branch_id)
+
+
+def _ensure_subscriber() -> None:
+    """Arranca (una vez por proceso) el listener de invalidaciones remotas."""
+    global _subscriber_thread
+    with _subscriber_lock:
+        if _subscriber_alive():
+            return
+        client = _get_redis()
+        if client is None:
+            return
+        try:
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{_INVALIDATION_CHANNEL: _on_invalidation_message})
+            _subscriber_thread = pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+        except Exception as exc:
+            logger.warning("No se pudo suscribir a invalidaciones de pricing: %s", str(exc)[:80])
+            _subscriber_thread = None
+
+
+# ─── Invalidación ────────────────────────────────────────────────────────────
+
+
+def _invalidate_local(company_id: int, branch_id: int | None) -> None:
+    with _lock:
+        if branch_id is None:
+            _company_generations[company_id] = _company_generations.get(company_id, 0) + 1
+            for key in [k for k in _entries if k[0] == company_id]:
+                _entries.pop(key, None)
+        else:
+            key = (company_id, branch_id)
+            _generations[key] = _generations.get(key, 0) + 1
+            _entries.pop(key, None)
+
+
+def invalidate_pricing_cache(
+    company_id: int | None,
+    branch_id: int | None = None,
+    *,
+    broadcast: bool = True,
+) -> None:
+    """Descarta el snapshot de pricing tras una escritura.
+
+    Llamar después del commit que modifica promociones, listas de precios,
+    tiers o precios de producto. ``branch_id=None`` invalida todas las
+    sucursales de la empresa. Con ``broadcast`` (y Redis disponible) el
+    resto de réplicas también descarta su copia.
+    """
+    if not company_id:
+        return
+    company_id = int(company_id)
+    branch_id = int(branch_id) if branch_id else None
+    _invalidate_local(company_id, branch_id)
+    if not broadcast or not _redis.configured():
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    if loop is None:
+        # Thread o script sin event loop: se puede esperar a Redis.
+        _broadcast_invalidation_sync(company_id, branch_id)
+        return
+    task = loop.create_task(_broadcast_invalidation(company_id, branch_id))
+    _pending_broadcasts.add(task)
+    task.add_done_callback(_pending_broadcasts.discard)
+
+
+def _broadcast_invalidation_sync(company_id: int, branch_id: int | None) -> None:
+    client = _get_redis()
+    if client is None:
+        return
+    try:
+        pipe = client.pipeline(transaction=False)
+        pipe.incr(_version_key(company_id, branch_id))
+        pipe.publish(_INVALIDATION_CHANNEL, f"{company_id}:{branch_id if branch_id else '*'}")
+        pipe.execute()
+    except Exception as exc:
+        logger.warning("No se pudo propagar invalidación de pricing: %s", str(exc)[:80])
+
+
+async def _broadcast_invalidation(company_id: int, branch_id: int | None) -> None:
+    client = _redis.async_client()
+    if client is None:
+        return
+    try:
+        pipe = client.pipeline(transaction=False)
+        pipe.incr(_version_key(company_id, branch_id))
+        pipe.publish(_INVALIDATION_CHANNEL, f"{company_id}:{branch_id if branch_id else '*'}")
+        await pipe.execute()
+    except Exception as exc:
+        _redis.failed(exc)
+
+
+def clear_pricing_cache() -> None:
+    """Vacía el cache local completo (tests / mantenimiento)."""
+    with _lock:
+        _entries.clear()
+        _generations.clear()
+        _company_generations.clear()
+
+
+# ─── Carga ───────────────────────────────────────────────────────────────────
+
+
+async def _load_tenant_snapshot(
+    session: AsyncSession,
+    company_id: int,
+    branch_id: int,
+) -> TenantPricingSnapshot:
+    # Margen de un día sobre la vigencia: el filtro exacto se hace en memoria
+    # con la hora local de la empresa (ver TenantPricingSnapshot.active_promotions).
+    horizon = utc_now_naive() - timedelta(days=1)
+    promotions = (await session.exec(
+        select(Promotion)
+        .where(Promotion.company_id == company_id)
+        .where(Promotion.branch_id == branch_id)
+        .where(Promotion.is_active == True)  # noqa: E712 — SQL boolean
+        .where(Promotion.ends_at >= horizon)
+        .order_by(Promotion.id)
+    )).all()
+    promotions_by_scope: dict[str, list[Promotion]] = {}
+    for promo in promotions:
+        promotions_by_scope.setdefault(promo.scope, []).append(promo)
+    product_ids_by_promo = await _load_promotion_product_ids(session, promotions)
+
+    tiers = (await session.exec(
+        select(PriceTier)
+        .where(PriceTier.company_id == company_id)
+        .where(PriceTier.branch_id == branch_id)
+        .order_by(PriceTier.min_quantity.desc())
+    )).all()
+    tiers_by_variant: dict[int, list[PriceTier]] = {}
+    tiers_by_product: dict[int, list[PriceTier]] = {}
+    for tier in sorted(tiers, key=lambda t: t.min_quantity, reverse=True):
+        if tier.product_variant_id:
+            tiers_by_variant.setdefault(tier.product_variant_id, []).append(tier)
+        if tier.product_id:
+            tiers_by_product.setdefault(tier.product_id, []).append(tier)
+
+    return TenantPricingSnapshot(
+        company_id=company_id,
+        branch_id=branch_id,
+        promotions_by_scope=promotions_by_scope,
+        product_ids_by_promo=product_ids_by_promo,
+        tiers_by_variant=tiers_by_variant,
+        tiers_by_product=tiers_by_product,
+    )
+
+
+async def _load_price_list_items(
+    session: AsyncSession,
+    company_id: int,
+    branch_id: int,
+    price_list_id: int,
+) -> dict[tuple[int, int | None], Decimal]:
+    rows = (await session.exec(
+        select(PriceListItem)
+        .where(PriceListItem.price_list_id == price_list_id)
+        .where(PriceListItem.company_id == company_id)
+        .where(PriceListItem.branch_id == branch_id)
+    )).all()
+    items: dict[tuple[int, int | None], Decimal] = {}
+    for row in rows:
+        if row.product_id:
+            items.setdefault(
+                (row.product_id, row.product_variant_id or None),
+                Decimal(str(row.unit_price)),
+            )
+    return items
+
+
+def _subscriber_alive() -> bool:
+    return _subscriber_thread is not None and _subscriber_thread.is_alive()
+
+
+async def get_tenant_pricing_snapshot(
+    session: AsyncSession,
+    company_id: int,
+    branch_id: int,
+) -> TenantPricingSnapshot:
+    """Snapshot cacheado del tenant; lo (re)carga si falta o venció el TTL.
+
+    Con el listener pub/sub vivo un hit no sale del proceso. Si la
+    suscripción se cayó, se compara el contador de versión de Redis antes de
+    servir la entrada, para no depender de mensajes que pudieron perderse.
+    """
+    key = (int(company_id), int(branch_id))
+    if _redis.configured() and not _subscriber_alive():
+        # Conectar y suscribir hace I/O bloqueante: fuera del loop.
+        await asyncio.to_thread(_ensure_subscriber)
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None and not entry.is_fresh():
+            entry = None
+        generation = _generation(key)
+
+    if entry is not None:
+        if _subscriber_alive() or entry.version == await _remote_version(*key):
+            with _lock:
+                if key in _entries:
+                    _entries.move_to_end(key)
+            return entry
+        _invalidate_local(*key)
+        with _lock:
+            generation = _generation(key)
+
+    version = await _remote_version(*key)
+    snapshot = await _load_tenant_snapshot(session, *key)
+    snapshot.version = version
+
+    with _lock:
+        if _generation(key) == generation:
+            _entries[key] = snapshot
+            _entries.move_to_end(key)
+            while len(_entries) > max(1, PRICING_CACHE_MAX_TENANTS):
+                _entries.popitem(last=False)
+    return snapshot
+
+
+async def get_cart_pricing_snapshot(
+    session: AsyncSession,
+    *,
+    company_id: int,
+    branch_id: int,
+    price_list_id: int | None = None,
+    now: datetime | None = None,
+    coupon_code: str | None = None,
+) -> CartPricingSnapshot:
+    """:class:`CartPricingSnapshot` servido desde el cache del tenant.
+
+    En caliente no toca la BD; la primera vez que aparece una lista de
+    precios se carga esa lista (una query) y queda en el snapshot.
+    """
+    key = (int(company_id), int(branch_id))
+    effective_now = now or utc_now_naive()
+    tenant = await get_tenant_pricing_snapshot(session, *key)
+    snapshot = tenant.for_cart(
+        price_list_id=price_list_id,
+        now=effective_now,
+        coupon_code=coupon_code,
+    )
+    if price_list_id and int(price_list_id) not in tenant.price_lists:
+        with _lock:
+            generation = _generation(key)
+        items = await _load_price_list_items(session, *key, int(price_list_id))
+        with _lock:
+            if _generation(key) == generation:
+                tenant.price_lists[int(price_list_id)] = items
+        # Si hubo invalidación durante la carga, se usa igual sin cachearla.
+        snapshot.price_list_items = items
+    return snapshot
@@ -0,0 +1,270 @@
+"""Selector de productos paginado en el servidor (promociones, listas de precios).
+
+Los editores cargaban el catálogo activo completo (productos + variantes) al
+abrir la página y filtraban en Python en cada tecla. Acá se devuelve sólo una
+ventana de ``PRODUCT_PICKER_PAGE_SIZE`` filas:
+
+  * con búsqueda: el índice de trigramas de la sucursal
+    (:mod:`app.services.product_search_index`) rankea y pagina por
+    ``offset``; con ``PRODUCT_SEARCH_INDEX=0`` se usan ``ILIKE`` con
+    ``LIMIT/OFFSET``;
+  * sin búsqueda: recorrido por ``(description, id)``, que resuelve
+    ``ix_product_tenant_description``.
+
+Las filas de la ventana se cargan por id (una query de productos y otra de
+variantes). El estado guarda la selección como ids, no como filas.
+"""
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass, field
+from typing import Any
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import or_, select
+
+from app.models import Product, ProductVariant
+from app.services.product_search_index import (
+    PRODUCT_SEARCH_INDEX_ENABLED,
+    get_product_search_index,
+)
+from app.utils.db import get_async_session
+from app.utils.formatting import fmt_input_num
+from app.utils.pricing import resolve_effective_price
+from app.utils.sanitization import escape_like
+from app.utils.tenant import set_tenant_context
+
+PRODUCT_PICKER_PAGE_SIZE = int(os.getenv("PRODUCT_PICKER_PAGE_SIZE", "30"))
+
+
+@dataclass
+class PickerPage:
+    rows: list[dict[str, Any]] = field(default_factory=list)
+    has_more: bool = False
+
+
+def picker_key(product_id: int, variant_id: int | None = None) -> str:
+    """Clave estable de una fila: ``"12"`` o ``"12:7"`` para variantes."""
+    return f"{product_id}:{variant_id}" if variant_id else str(product_id)
+
+
+def _variant_label(variant: ProductVariant) -> str:
+    parts = [s for s in (variant.size, variant.color) if s]
+    return " / ".join(parts) if parts else (variant.sku or "")
+
+
+def _row(
+    product: Product,
+    variant: ProductVariant | None,
+    global_margin: float,
+) -> dict[str, Any]:
+    if variant is None:
+        description = product.description
+        code = product.barcode or ""
+        variant_id = None
+    else:
+        description = f"{product.description} — {_variant_label(variant)}"
+        code = variant.sku or ""
+        variant_id = variant.id
+    return {
+        "key": picker_key(product.id, variant_id),
+        "id": str(product.id),
+        "variant_id": str(variant_id) if variant_id else "",
+        "description": description,
+        "barcode": code,
+        "category": product.category or "",
+        "label": f"{description} ({code})" if code else description,
+        "sale_price": fmt_input_num(
+            float(resolve_effective_price(product, variant, global_margin))
+        ),
+    }
+
+
+async def _load_rows(
+    session: AsyncSession,
+    company_id: int,
+    branch_id: int,
+    hits: list[tuple[int, int | None]],
+    global_margin: float,
+) -> list[dict[str, Any]]:
+    """Filas de ``hits`` (``(product_id, variant_id)``) en el mismo orden."""
+    if not hits:
+        return []
+    products = {
+        p.id: p
+        for p in (await session.exec(
+            select(Product)
+            .where(Product.company_id == company_id)
+            .where(Product.branch_id == branch_id)
+            .where(Product.is_active == True)  # noqa: E712
+            .where(Product.id.in_({pid for pid, _vid in hits}))
+        )).all()
+    }
+    variant_ids = {vid for _pid, vid in hits if vid is not None}
+    variants: dict[int, ProductVariant] = {}
+    if variant_ids:
+        variants = {
+            v.id: v
+            for v in (await session.exec(
+                select(ProductVariant)
+                .where(ProductVariant.company_id == company_id)
+                .where(ProductVariant.branch_id == branch_id)
+                .where(ProductVariant.id.in_(variant_ids))
+            )).all()
+        }
+    rows: list[dict[str, Any]] = []
+    for pid, vid in hits:
+        product = products.get(pid)
+        if product is None:
+            continue
+        if vid is None:
+            rows.append(_row(product, None, global_margin))
+        elif vid in variants:
+            rows.append(_row(product, variants[vid], global_margin))
+    return rows
+
+
+async def _browse_hits(
+    session: AsyncSession,
+    company_id: int,
+    branch_id: int,
+    offset: int,
+    limit: int,
+    include_variants: bool,
+) -> tuple[list[tuple[int, int | None]], bool]:
+    """Ventana sin búsqueda: productos por descripción y, debajo, sus variantes."""
+    product_ids = list((await session.exec(
+        select(Product.id)
+        .where(Product.company_id == company_id)
+        .where(Product.branch_id == branch_id)
+        .where(Product.is_active == True)  # noqa: E712
+        .order_by(Product.description, Product.id)
+        .offset(offset)
+        .limit(limit + 1)
+    )).all())
+    has_more = len(product_ids) > limit
+    product_ids = product_ids[:limit]
+    by_product: dict[int, list[int]] = {}
+    if include_variants and product_ids:
+        for vid, pid in (await session.exec(
+            select(ProductVariant.id, ProductVariant.product_id)
+            .where(ProductVariant.company_id == company_id)
+            .where(ProductVariant.branch_id == branch_id)
+            .where(ProductVariant.product_id.in_(product_ids))
+            .order_by(ProductVariant.size, ProductVariant.color, ProductVariant.id)
+        )).all():
+            by_product.setdefault(pid, []).append(vid)
+    hits: list[tuple[int, int | None]] = []
+    for pid in product_ids:
+        hits.append((pid, None))
+        hits.extend((pid, vid) for vid in by_product.get(pid, ()))
+    return hits, has_more
+
+
+async def _ilike_hits(
+    session: AsyncSession,
+    company_id: int,
+    branch_id: int,
+    term: str,
+    offset: int,
+    limit: int,
+    include_variants: bool,
+) -> tuple[list[tuple[int, int | None]], bool]:
+    """Fallback sin índice: ``ILIKE`` paginado por ``(description, id)``."""
+    like = f"%{escape_like(term)}%"
+    variant_match = (
+        select(ProductVariant.product_id)
+        .where(ProductVariant.company_id == company_id)
+        .where(ProductVariant.branch_id == branch_id)
+        .where(ProductVariant.sku.ilike(like))
+    )
+    product_filter = or_(Product.description.ilike(like), Product.barcode.ilike(like))
+    if not include_variants:
+        # Sin variantes en la lista, un SKU que coincide trae a su producto.
+        product_filter = or_(product_filter, Product.id.in_(variant_match))
+    window = offset + limit + 1
+    products = list((await session.exec(
+        select(Product.description, Product.id)
+        .where(Product.company_id == company_id)
+        .where(Product.branch_id == branch_id)
+        .where(Product.is_active == True)  # noqa: E712
+        .where(product_filter)
+        .order_by(Product.description, Product.id)
+        .limit(window)
+    )).all())
+    merged: list[tuple[str, int, int | None]] = [(d or "", pid, None) for d, pid in products]
+    if include_variants:
+        variants = (await session.exec(
+            select(Product.description, ProductVariant.product_id, ProductVariant.id)
+            .join(Product, Product.id == ProductVariant.product_id)
+            .where(ProductVariant.company_id == company_id)
+            .where(ProductVariant.branch_id == branch_id)
+            .where(Product.is_active == True)  # noqa: E712
+            .where(or_(
+                Product.description.ilike(like),
+                ProductVariant.sku.ilike(like),
+                ProductVariant.size.ilike(like),
+                ProductVariant.color.ilike(like),
+            ))
+            .order_by(Product.description, ProductVariant.product_id, ProductVariant.id)
+            .limit(window)
+        )).all()
+        merged.extend((d or "", pid, vid) for d, pid, vid in variants)
+        merged.sort(key=lambda item: (item[0], item[1], item[2] or 0))
+    page = merged[offset:offset + limit + 1]
+    return [(pid, vid) for _d, pid, vid in page[:limit]], len(page) > limit
+
+
+async def product_picker_page(
+    company_id: int,
+    branch_id: int,
+    *,
+    query: str = "",
+    offset: int = 0,
+    limit: int = PRODUCT_PICKER_PAGE_SIZE,
+    include_variants: bool = True,
+    global_margin: float = 0.0,
+    session: AsyncSession | None = None,
+) -> PickerPage:
+    """Una ventana del selector.
+
+    ``include_variants=False`` devuelve sólo productos (una fila por producto
+    aunque matchee por el SKU de una variante), que es lo que referencian las
+    promociones; con ``True`` las variantes son filas propias, como en las
+    listas de precios. ``has_more`` indica si hay una ventana siguiente
+    (se pide una fila de más en vez de contar).
+    """
+    if not company_id or not branch_id:
+        return PickerPage()
+    offset = max(int(offset), 0)
+    limit = max(int(limit), 1)
+    term = (query or "").strip()
+
+    async def _run(current_session: AsyncSession) -> PickerPage:
+        if not term:
+            hits, has_more = await _browse_hits(
+                current_session, company_id, branch_id, offset, limit, include_variants
+            )
+        elif PRODUCT_SEARCH_INDEX_ENABLED:
+            index = await get_product_search_index(current_session, company_id, branch_id)
+            hits = index.search(
+                term, limit + 1, offset=offset, products_only=not include_variants
+            )
+            has_more = len(hits) > limit
+            hits = hits[:limit]
+        else:
+            hits, has_more = await _ilike_hits(
+                current_session, company_id, branch_id, term, offset, limit, include_variants
+            )
+        rows = await _load_rows(current_session, company_id, branch_id, hits, global_margin)
+        return PickerPage(rows=rows, has_more=has_more)
+
+    # S1-02: reset tenant al salir para evitar bleed cross-tenant.
+    set_tenant_context(company_id, branch_id)
+    try:
+        if session is not None:
+            return await _run(session)
+        async with get_async_session() as current_session:
+            return await _run(current_session)
+    finally:
+        set_tenant_context(None, None)
@@ -0,0 +1,400 @@
+"""Índice de búsqueda de productos en proceso, por sucursal (autocompletado POS).
+
+``sale_service.search_products`` corría tres ``ILIKE '%term%'`` por tecla
+(producto, variante con ``CONCAT`` y atributos EAV) que no pueden usar índice.
+Este módulo mantiene, por ``(company_id, branch_id)``, un
+:class:`ProductSearchIndex` con un documento por producto activo y otro por
+cada variante:
+
+  * Texto normalizado (minúsculas, sin tildes) de descripción, código de
+    barras, SKU, talla/color y nombre/valor de atributos.
+  * Índice invertido de trigramas → documentos, con listas compactas
+    (``array``) para acotar memoria a ~decenas de bytes por producto.
+
+Una búsqueda intersecta las listas de los trigramas de cada palabra, verifica
+las candidatas (todas las palabras deben aparecer) y las ordena por
+relevancia: código exacto, prefijo de código, descripción que empieza con la
+búsqueda, palabras que empiezan con cada término y, al final, coincidencias
+en el medio. Devuelve ids; el llamador carga las filas con una query por id.
+
+Mismo esquema de vida que ``pricing_cache``: TTL
+(``PRODUCT_SEARCH_TTL_SECONDS``), LRU (``PRODUCT_SEARCH_MAX_BRANCHES``),
+generación local para no guardar un índice armado con datos previos a una
+escritura, y contador de versión en Redis (si hay ``REDIS_URL``) que las
+escrituras incrementan vía :func:`invalidate_product_search` para que las
+demás réplicas rearmen el suyo (se relee a lo sumo una vez cada
+``PRODUCT_SEARCH_VERSION_CHECK_SECONDS`` por sucursal, no por tecla).
+``PRODUCT_SEARCH_INDEX=0`` vuelve a los ``ILIKE``.
+"""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import logging
+import os
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+
+from app.models import Product, ProductAttribute, ProductVariant
+from app.utils.redis_client import SharedRedis
+
+if TYPE_CHECKING:
+    import redis
+
+logger = logging.getLogger("ProductSearchIndex")
+
+PRODUCT_SEARCH_INDEX_ENABLED = os.getenv("PRODUCT_SEARCH_INDEX", "1").strip().lower() not in {
+    "0",
+    "false",
+    "no",
+}
+PRODUCT_SEARCH_TTL_SECONDS = float(os.getenv("PRODUCT_SEARCH_TTL_SECONDS", "900"))
+PRODUCT_SEARCH_MAX_BRANCHES = int(os.getenv("PRODUCT_SEARCH_MAX_BRANCHES", "64"))
+# Cada cuánto se relee el contador de Redis por sucursal; las escrituras de
+# otras réplicas se ven con ese atraso (las propias, al instante).
+PRODUCT_SEARCH_VERSION_CHECK_SECONDS = float(
+    os.getenv("PRODUCT_SEARCH_VERSION_CHECK_SECONDS", "2")
+)
+
+_VERSION_KEY_PREFIX = "product_search:version"
+_GRAM = 3
+
+# Rangos de relevancia (menor = mejor).
+RANK_CODE_EXACT = 0
+RANK_CODE_PREFIX = 1
+RANK_DESCRIPTION_PREFIX = 2
+RANK_WORD_PREFIX = 3
+RANK_SUBSTRING = 4
+
+
+def normalize_search_text(value: str | None) -> str:
+    """Minúsculas y sin tildes, como compara la collation ``utf8mb4_unicode_ci``."""
+    raw = unicodedata.normalize("NFKD", str(value or "").lower())
+    return " ".join("".join(ch for ch in raw if not unicodedata.combining(ch)).split())
+
+
+def _trigrams(term: str) -> set[str]:
+    return {term[i:i + _GRAM] for i in range(len(term) - _GRAM + 1)}
+
+
+@dataclass(frozen=True)
+class SearchDoc:
+    """Un resultado posible: producto (``variant_id=None``) o variante.
+
+    ``text`` lleva un espacio adelante para que "empieza una palabra" sea
+    un simple ``" " + término in text``.
+    """
+
+    product_id: int
+    variant_id: int | None
+    description: str
+    codes: tuple[str, ...]
+    text: str
+
+
+@dataclass
+class ProductSearchIndex:
+    """Documentos de una sucursal + índice invertido de trigramas."""
+
+    docs: list[SearchDoc]
+    postings: dict[str, array] = field(default_factory=dict)
+    version: int = 0
+    loaded_at: float = field(default_factory=time.monotonic)
+
+    @classmethod
+    def build(cls, docs: list[SearchDoc]) -> "ProductSearchIndex":
+        grams: dict[str, list[int]] = {}
+        for idx, doc in enumerate(docs):
+            for gram in _trigrams(doc.text):
+                grams.setdefault(gram, []).append(idx)
+        return cls(docs=docs, postings={g: array("I", ids) for g, ids in grams.items()})
+
+    def is_fresh(self, ttl: float = PRODUCT_SEARCH_TTL_SECONDS) -> bool:
+        return (time.monotonic() - self.loaded_at) < ttl
+
+    def _candidates(self, terms: list[str]) -> range | set[int]:
+        grams: set[str] = set()
+        for term in terms:
+            grams |= _trigrams(term)
+        if not grams:
+            # Sólo términos de 1-2 letras: se verifica todo el catálogo.
+            return range(len(self.docs))
+        lists = sorted(
+            (self.postings.get(gram, ()) for gram in grams), key=len
+        )
+        candidates = set(lists[0])
+        for ids in lists[1:]:
+            if not candidates:
+                break
+            candidates.intersection_update(ids)
+        return candidates
+
+    @staticmethod
+    def _rank(doc: SearchDoc, query: str, terms: list[str]) -> int:
+        if query in doc.codes:
+            return RANK_CODE_EXACT
+        if any(code.startswith(query) for code in doc.codes):
+            return RANK_CODE_PREFIX
+        if doc.description.startswith(query):
+            return RANK_DESCRIPTION_PREFIX
+        if all(f" {term}" in doc.text for term in terms):
+            return RANK_WORD_PREFIX
+        return RANK_SUBSTRING
+
+    def search(
+        self,
+        query: str,
+        limit: int = 10,
+        *,
+        offset: int = 0,
+        products_only: bool = False,
+    ) -> list[tuple[int, int | None]]:
+        """``(product_id, variant_id)`` de los mejores ``limit`` resultados.
+
+        ``offset`` saltea los primeros (paginación del selector de
+        productos). Con ``products_only`` cada producto aparece una vez, con
+        ``variant_id=None`` y el mejor puntaje entre su documento y los de
+        sus variantes.
+        """
+        normalized = normalize_search_text(query)
+        terms = normalized.split()
+        offset = max(offset, 0)
+        if not terms or limit <= 0:
+            return []
+        docs = self.docs
+        scored = (
+            (self._rank(docs[idx], normalized, terms), len(docs[idx].description),
+             docs[idx].description, idx)
+            for idx in self._candidates(terms)
+            if all(term in docs[idx].text for term in terms)
+        )
+        if products_only:
+            best: dict[int, tuple] = {}
+            for key in scored:
+                product_id = docs[key[-1]].product_id
+                if product_id not in best or key < best[product_id]:
+                    best[product_id] = key
+            return [
+                (docs[idx].product_id, None)
+                for *_key, idx in heapq.nsmallest(offset + limit, best.values())[offset:]
+            ]
+        return [
+            (docs[idx].product_id, docs[idx].variant_id)
+            for *_key, idx in heapq.nsmallest(offset + limit, scored)[offset:]
+        ]
+
+
+def build_search_docs(
+    products: list[tuple[int, str, str]],
+    variants: list[tuple[int, int, str | None, str | None, str | None]],
+    attributes: list[tuple[int, str | None, str | None]],
+) -> list[SearchDoc]:
+    """Arma los documentos a partir de filas crudas.
+
+    ``products``: ``(id, description, barcode)`` de productos activos;
+    ``variants``: ``(id, product_id, sku, size, color)``;
+    ``attributes``: ``(product_id, nombre, valor)``. Los atributos sólo
+    suman al documento del producto, igual que la búsqueda por ``ILIKE``.
+    """
+    attr_text: dict[int, list[str]] = {}
+    for product_id, name, value in attributes:
+        attr_text.setdefault(product_id, []).extend((name or "", value or ""))
+
+    docs: list[SearchDoc] = []
+    descriptions: dict[int, str] = {}
+    for product_id, description, barcode in products:
+        desc = normalize_search_text(description)
+        code = normalize_search_text(barcode)
+        descriptions[product_id] = desc
+        text = " " + " ".join(
+            part
+            for part in (desc, code, normalize_search_text(" ".join(attr_text.get(product_id, ()))))
+            if part
+        )
+        docs.append(SearchDoc(product_id, None, desc, (code,) if code else (), text))
+    for variant_id, product_id, sku, size, color in variants:
+        desc = descriptions.get(product_id)
+        if desc is None:
+            continue
+        code = normalize_search_text(sku)
+        text = " " + " ".join(
+            part
+            for part in (desc, code, normalize_search_text(size), normalize_search_text(color))
+            if part
+        )
+        docs.append(SearchDoc(product_id, variant_id, desc, (code,) if code else (), text))
+    return docs
+
+
+# ─── Estado del proceso ──────────────────────────────────────────────────────
+
+_lock = threading.Lock()
+_entries: "OrderedDict[tuple[int, int], ProductSearchIndex]" = OrderedDict()
+_generations: dict[tuple[int, int], int] = {}
+_build_locks: dict[tuple[int, int], asyncio.Lock] = {}
+# (company_id, branch_id) → (monotonic de la lectura, versión remota).
+_remote_checked: dict[tuple[int, int], tuple[float, int]] = {}
+
+_redis = SharedRedis("índice de búsqueda", logger=logger)
+
+
+def _get_redis() -> "redis.Redis | None":
+    """Cliente Redis para el contador de versión; None = sólo invalidación local."""
+    return _redis.sync_client()
+
+
+def _version_key(company_id: int, branch_id: int) -> str:
+    return f"{_VERSION_KEY_PREFIX}:{company_id}:{branch_id}"
+
+
+def _remote_version(key: tuple[int, int]) -> int:
+    """Versión en Redis; reusa la última lectura por ``PRODUCT_SEARCH_VERSION_CHECK_SECONDS``."""
+    client = _get_redis()
+    if client is None:
+        return 0
+    now = time.monotonic()
+    with _lock:
+        checked = _remote_checked.get(key)
+    if checked is not None and (now - checked[0]) < PRODUCT_SEARCH_VERSION_CHECK_SECONDS:
+        return checked[1]
+    try:
+        version = int(client.get(_version_key(*key)) or 0)
+    except Exception as exc:
+        logger.warning("No se pudo leer versión del índice de búsqueda: %s", str(exc)[:80])
+        return 0
+    with _lock:
+        _remote_checked[key] = (now, version)
+    return version
+
+
+def _invalidate_local(key: tuple[int, int]) -> None:
+    with _lock:
+        _generations[key] = _generations.get(key, 0) + 1
+        _entries.pop(key, None)
+
+
+def invalidate_product_search(
+    company_id: int | None,
+    branch_id: int | None,
+    *,
+    broadcast: bool = True,
+) -> None:
+    """Descarta el índice de la sucursal tras crear/editar/borrar productos.
+
+    Llamar después del commit que toca descripción, código de barras,
+    variantes, atributos o ``is_active``. Los cambios de stock o precio no
+    hacen falta: el resultado se arma leyendo las filas actuales.
+    """
+    if not company_id or not branch_id:
+        return
+    key = (int(company_id), int(branch_id))
+    _invalidate_local(key)
+    if not broadcast:
+        return
+    client = _get_redis()
+    if client is None:
+        return
+    try:
+        client.incr(_version_key(*key))
+    except Exception as exc:
+        logger.warning("No se pudo propagar invalidación de búsqueda: %s", str(exc)[:80])
+    # Tras el INCR propio la próxima consulta relee la versión.
+    with _lock:
+        _remote_checked.pop(key, None)
+
+
+def clear_product_search_cache() -> None:
+    """Vacía el cache local completo (tests / mantenimiento)."""
+    with _lock:
+        _entries.clear()
+        _generations.clear()
+        _remote_checked.clear()
+
+
+# ─── Carga ───────────────────────────────────────────────────────────────────
+
+
+async def _load_search_docs(
+    session: AsyncSession, company_id: int, branch_id: int
+) -> list[SearchDoc]:
+    products = (await session.exec(
+        select(Product.id, Product.description, Product.barcode)
+        .where(Product.company_id == company_id)
+        .where(Product.branch_id == branch_id)
+        .where(Product.is_active == True)  # noqa: E712 — SQL boolean
+    )).all()
+    variants = (await session.exec(
+        select(
+            ProductVariant.id,
+            ProductVariant.product_id,
+            ProductVariant.sku,
+            ProductVariant.size,
+            ProductVariant.color,
+        )
+        .where(ProductVariant.company_id == company_id)
+        .where(ProductVariant.branch_id == branch_id)
+    )).all()
+    attributes = (await session.exec(
+        select(
+            ProductAttribute.product_id,
+            ProductAttribute.attribute_name,
+            ProductAttribute.attribute_value,
+        )
+        .where(ProductAttribute.company_id == company_id)
+        .where(ProductAttribute.branch_id == branch_id)
+    )).all()
+    return build_search_docs(list(products), list(variants), list(attributes))
+
+
+async def get_product_search_index(
+    session: AsyncSession, company_id: int, branch_id: int
+) -> ProductSearchIndex:
+    """Índice cacheado de la sucursal; lo (re)arma si falta, venció o cambió.
+
+    Con Redis compara el contador de versión (un GET, a lo sumo uno por
+    ``PRODUCT_SEARCH_VERSION_CHECK_SECONDS``) para enterarse de escrituras
+    hechas en otra réplica. El armado corre en un
+    thread y se serializa por sucursal: las teclas que llegan mientras tanto
+    esperan ese mismo índice.
+    """
+    key = (int(company_id), int(branch_id))
+    with _lock:
+        entry = _entries.get(key)
+    if entry is not None and entry.is_fresh() and entry.version == _remote_version(key):
+        with _lock:
+            if key in _entries:
+                _entries.move_to_end(key)
+        return entry
+
+    build_lock = _build_locks.setdefault(key, asyncio.Lock())
+    async with build_lock:
+        with _lock:
+            entry = _entries.get(key)
+            generation = _generations.get(key, 0)
+        version = _remote_version(key)
+        if entry is not None and entry.is_fresh() and entry.version == version:
+            return entry
+
+        started = time.perf_counter()
+        docs = await _load_search_docs(session, *key)
+        index = await asyncio.to_thread(ProductSearchIndex.build, docs)
+        index.version = version
+        logger.info(
+            "Índice de búsqueda armado | company=%s branch=%s docs=%d %.0fms",
+            key[0], key[1], len(docs), (time.perf_counter() - started) * 1000,
+        )
+        with _lock:
+            if _generations.get(key, 0) == generation:
+                _entries[key] = index
+                _entries.move_to_end(key)
+                while len(_entries) > max(1, PRODUCT_SEARCH_MAX_BRANCHES):
+                    _entries.popitem(last=False)
+        return index
@@ -8,9 +8,9 @@ import functools
 import io
 import re
 from contextvars import ContextVar
-from datetime import datetime, timedelta
+from datetime import date, datetime, time, timedelta
 from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
-from typing import Any
+from typing import Any, BinaryIO
 
 from openpyxl.workbook import Workbook
 from openpyxl.worksheet.worksheet import Worksheet
@@ -26,14 +26,30 @@ from app.models import Promotion
 from app.models import PriceList
 from app.models import PaymentMethod
 from app.models import CompanySettings
+from app.models import (
+    SalesCategoryRollup,
+    SalesDailyRollup,
+    SalesHourRollup,
+    SalesPaymentRollup,
+    SalesProductRollup,
+    SalesUserRollup,
+)
 from app.enums import SaleStatus, PaymentMethodType
 from app.i18n import MSG
 from app.utils.tenant import tenant_bypass, tenant_context
-from app.utils.exports import _safe_decimal, _sanitize_excel_value
+from app.utils.exports import (
+    StreamingWorksheet,
+    _safe_decimal,
+    _sanitize_excel_value,
+    create_report_workbook,
+    save_workbook_spooled,
+)
 from app.utils.formatting import fmt_input_num, format_number, currency_decimals
+from app.utils.performance import track_queries
 from app.utils.db_seeds import get_country_config
 from app.utils.pricing import resolve_effective_price
 from app.utils.timezone import format_local_datetime, to_local_datetime, utc_now_naive
+from app.services.sales_rollup_service import SALES_ROLLUP_READS_ENABLED
 
 
 def _with_tenant_reset(fn):
@@ -557,6 +573,9 @@ def _resolve_payment_display(payment, pm_by_id: dict[int, str]) -> str:
 
 def _auto_adjust_columns(ws: Worksheet, min_width: int = 12, max_width: int = 50) -> None:
     """Ajusta automáticamente el ancho de columnas."""
+    if isinstance(ws, StreamingWorksheet):
+        ws.auto_adjust(min_width, max_width)
+        return
     for column in ws.columns:
         max_length = 0
         column_letter = get_column_letter(column[0].column)
@@ -574,51 +593,18 @@ def _auto_adjust_columns(ws: Worksheet, min_width: int = 12, max_width: int = 50
 # REPORTE DE VENTAS CONSOLIDADO
 # =============================================================================
 
-@_with_tenant_reset
-def generate_sales_report(
+def _sales_report_aggregates_from_sales(
     session,
-    start_date: datetime,
-    end_date: datetime,
-    company_name: str = "TUWAYKIAPP",
-    include_cancelled: bool = False,
-    currency_symbol: str | None = None,
-    company_id: int | None = None,
-    branch_id: int | None = None,
-    country_code: str | None = None,
-    timezone: str | None = None,
-    generated_at: datetime | None = None,
-) -> io.BytesIO:
-    """
-    Genera reporte de ventas consolidado con detalles contables.
+    base: list,
+    pm_by_id: dict[int, str],
+    country_code: str | None,
+    timezone: str | None,
+) -> dict[str, Any]:
+    """Agregados del reporte de ventas recorriendo Sale/SaleItem/SalePayment.
 
-    Incluye:
-    - Resumen ejecutivo
-    - Detalle de ventas por día
-    - Desglose por categoría
-    - Desglose por método de pago
-    - Análisis de utilidad bruta
-    - Listado detallado de transacciones
+    Camino usado sin rollups (``include_cancelled``, rango no alineado a días
+    locales o ``SALES_ROLLUP_READS=0``).
     """
-    wb = Workbook()
-    currency_label = _currency_label(currency_symbol)
-    currency_format = _currency_format(currency_symbol)
-    header_kwargs = {
-        "generated_at": generated_at,
-        "country_code": country_code,
-        "timezone": timezone,
-    }
-
-    pm_by_id = _load_pm_names(session, company_id, branch_id)
-
-    # Filtros base reutilizables en todas las queries del reporte
-    _base: list = [Sale.timestamp >= start_date, Sale.timestamp <= end_date]
-    if company_id:
-        _base.append(Sale.company_id == company_id)
-    if branch_id:
-        _base.append(Sale.branch_id == branch_id)
-    if not include_cancelled:
-        _base.append(Sale.status != SaleStatus.cancelled)
-
     # ── 1. Stream liviano: totales + by_day + by_user + by_hour ─────────────
     # Solo 5 columnas escalares, 2000 filas a la vez. Sin cargar relaciones.
     total_ventas = Decimal("0")
@@ -633,7 +619,7 @@ def generate_sales_report(
     for _sid, _ts, _amt, _cond, _uname in session.execute(
         select(Sale.id, Sale.timestamp, Sale.total_amount, Sale.payment_condition, User.username)
         .outerjoin(User, Sale.user_id == User.id)
-        .where(*_base)
+        .where(*base)
         .execution_options(yield_per=2000)
     ):
         _t = _safe_decimal(_amt)
@@ -661,9 +647,6 @@ def generate_sales_report(
             by_hour[_hr]["count"] += 1
             by_hour[_hr]["total"] += _t
 
-    ventas_contado = ventas_count - ventas_credito
-    monto_contado = total_ventas - monto_credito
-
     # ── 2. Costo total + descuentos (SQL GROUP BY sobre SaleItem + Product) ──
     _cd = session.execute(
         select(
@@ -674,7 +657,7 @@ def generate_sales_report(
         )
         .join(Sale, SaleItem.sale_id == Sale.id)
         .outerjoin(Product, SaleItem.product_id == Product.id)
-        .where(*_base)
+        .where(*base)
     ).one()
     total_costo = Decimal(str(_cd[0] or 0))
     total_descuentos = Decimal(str(_cd[1] or 0))
@@ -687,7 +670,7 @@ def generate_sales_report(
         )
         .join(Sale, SaleItem.sale_id == Sale.id)
         .outerjoin(Product, SaleItem.product_id == Product.id)
-        .where(*_base)
+        .where(*base)
         .group_by(SaleItem.sale_id)
     ):
         _d = _sale_day_map.get(_sid_c)
@@ -709,7 +692,7 @@ def generate_sales_report(
         )
         .join(Sale, SaleItem.sale_id == Sale.id)
         .outerjoin(Product, SaleItem.product_id == Product.id)
-        .where(*_base)
+        .where(*base)
         .group_by(func.coalesce(SaleItem.product_category_snapshot, "Sin categoría"))
     ):
         by_category[_cat] = {
@@ -734,7 +717,7 @@ def generate_sales_report(
             func.coalesce(func.sum(SalePayment.amount), 0),
         )
         .join(Sale, SalePayment.sale_id == Sale.id)
-        .where(*_base)
+        .where(*base)
         .group_by(SalePayment.method_type, SalePayment.payment_method_id)
     ):
         _method = _resolve_payment_display(_PM(_mt, _pm_id), pm_by_id)
@@ -765,7 +748,7 @@ def generate_sales_report(
             )
             .join(Sale, SaleItem.sale_id == Sale.id)
             .outerjoin(Product, SaleItem.product_id == Product.id)
-            .where(*_base)
+            .where(*base)
             .group_by(
                 SaleItem.product_name_snapshot,
                 func.coalesce(SaleItem.product_category_snapshot, "Sin categoría"),
@@ -775,6 +758,280 @@ def generate_sales_report(
         )
     ]
 
+    return {
+        "total_ventas": total_ventas,
+        "ventas_count": ventas_count,
+        "ventas_credito": ventas_credito,
+        "monto_credito": monto_credito,
+        "total_costo": total_costo,
+        "total_descuentos": total_descuentos,
+        "by_day": by_day,
+        "by_user": by_user,
+        "by_hour": by_hour,
+        "by_category": by_category,
+        "by_payment": by_payment,
+        "sorted_products": sorted_products,
+    }
+
+
+def _rollup_report_days(
+    start_date: datetime,
+    end_date: datetime,
+    country_code: str | None,
+    timezone: str | None,
+) -> tuple[date, date] | None:
+    """Días locales ``[desde, hasta]`` si el rango cubre días completos.
+
+    Los períodos de ``ReportState`` van de 00:00:00 a 23:59:59 locales; un
+    rango que corte un día a la mitad no se puede responder con rollups.
+    """
+    local_start = to_local_datetime(start_date, country_code, timezone=timezone)
+    local_end = to_local_datetime(end_date, country_code, timezone=timezone)
+    if local_start is None or local_end is None:
+        return None
+    if local_start.time() != time.min or local_end.time() < time(23, 59, 59):
+        return None
+    return local_start.date(), local_end.date()
+
+
+def _sales_report_aggregates_from_rollup(
+    session,
+    company_id: int,
+    branch_id: int,
+    start_day: date,
+    end_day: date,
+    pm_by_id: dict[int, str],
+) -> dict[str, Any]:
+    """Mismos agregados que ``_sales_report_aggregates_from_sales`` leídos de
+    los rollups diarios: filas por día × dimensión en lugar de por venta.
+    """
+    def _tenant(model) -> list:
+        return [
+            model.company_id == company_id,
+            model.branch_id == branch_id,
+            model.day >= start_day,
+            model.day <= end_day,
+        ]
+
+    total_ventas = Decimal("0")
+    ventas_count = 0
+    ventas_credito = 0
+    monto_credito = Decimal("0")
+    total_costo = Decimal("0")
+    total_descuentos = Decimal("0")
+    by_day: dict[str, dict] = {}
+    for _r in session.exec(
+        select(SalesDailyRollup).where(*_tenant(SalesDailyRollup)).order_by(SalesDailyRollup.day)
+    ).all():
+        total_ventas += _safe_decimal(_r.gross_amount)
+        ventas_count += _r.sales_count or 0
+        ventas_credito += _r.credit_count or 0
+        monto_credito += _safe_decimal(_r.credit_amount)
+        total_costo += _safe_decimal(_r.cost_amount)
+        total_descuentos += _safe_decimal(_r.discount_amount)
+        if _r.sales_count:
+            by_day[_r.day.strftime("%Y-%m-%d")] = {
+                "count": _r.sales_count,
+                "total": _safe_decimal(_r.gross_amount),
+                "cost": _safe_decimal(_r.cost_amount),
+            }
+
+    by_user: dict[str, dict] = {}
+    for _uname, _cnt, _tot in session.exec(
+        select(
+            User.username,
+            func.sum(SalesUserRollup.sales_count),
+            func.coalesce(func.sum(SalesUserRollup.gross_amount), 0),
+        )
+        .select_from(SalesUserRollup)
+        .outerjoin(User, User.id == SalesUserRollup.user_id)
+        .where(*_tenant(SalesUserRollup))
+        .group_by(User.username)
+        .having(func.sum(SalesUserRollup.sales_count) != 0)
+    ).all():
+        _un = _safe_string(_uname, MSG.REPORT_UNKNOWN)
+        _entry = by_user.setdefault(_un, {"count": 0, "total": Decimal("0")})
+        _entry["count"] += int(_cnt or 0)
+        _entry["total"] += _safe_decimal(_tot)
+
+    by_hour: dict[int, dict] = {
+        int(_hr): {"count": int(_cnt or 0), "total": _safe_decimal(_tot)}
+        for _hr, _cnt, _tot in session.exec(
+            select(
+                SalesHourRollup.hour,
+                func.sum(SalesHourRollup.sales_count),
+                func.coalesce(func.sum(SalesHourRollup.gross_amount), 0),
+            )
+            .where(*_tenant(SalesHourRollup))
+            .group_by(SalesHourRollup.hour)
+            .having(func.sum(SalesHourRollup.sales_count) != 0)
+        ).all()
+    }
+
+    by_category: dict[str, dict] = {
+        _cat: {
+            "count": int(_cnt or 0),
+            "total": _safe_decimal(_ct),
+            "cost": _safe_decimal(_cc),
+            "discount": _safe_decimal(_cd),
+            "qty": int(_qty or 0),
+        }
+        for _cat, _cnt, _ct, _cc, _cd, _qty in session.exec(
+            select(
+                SalesCategoryRollup.category,
+                func.sum(SalesCategoryRollup.sales_count),
+                func.coalesce(func.sum(SalesCategoryRollup.gross_amount), 0),
+                func.coalesce(func.sum(SalesCategoryRollup.cost_amount), 0),
+                func.coalesce(func.sum(SalesCategoryRollup.discount_amount), 0),
+                func.coalesce(func.sum(SalesCategoryRollup.quantity), 0),
+            )
+            .where(*_tenant(SalesCategoryRollup))
+            .group_by(SalesCategoryRollup.category)
+            .having(func.sum(SalesCategoryRollup.sales_count) != 0)
+        ).all()
+    }
+
+    by_payment: dict[str, dict] = {}
+    for _mt, _pm_id, _pcnt, _ptot in session.exec(
+        select(
+            SalesPaymentRollup.method_type,
+            SalesPaymentRollup.payment_method_id,
+            func.sum(SalesPaymentRollup.payments_count),
+            func.coalesce(func.sum(SalesPaymentRollup.amount), 0),
+        )
+        .where(*_tenant(SalesPaymentRollup))
+        .group_by(SalesPaymentRollup.method_type, SalesPaymentRollup.payment_method_id)
+        .having(func.sum(SalesPaymentRollup.payments_count) != 0)
+    ).all():
+        try:
+            _method_type = PaymentMethodType(_mt) if _mt else None
+        except ValueError:
+            _method_type = None
+        _payment = SalePayment(method_type=_method_type, payment_method_id=_pm_id or None)
+        _method = _resolve_payment_display(_payment, pm_by_id)
+        _entry = by_payment.setdefault(_method, {"count": 0, "total": Decimal("0")})
+        _entry["count"] += int(_pcnt or 0)
+        _entry["total"] += _safe_decimal(_ptot)
+
+    sorted_products = [
+        {
+            "name": _r[0] or "Producto sin nombre",
+            "category": _r[1],
+            "qty": int(_r[2] or 0),
+            "total": _safe_decimal(_r[3]),
+            "cost": _safe_decimal(_r[4]),
+            "transactions": int(_r[5] or 0),
+        }
+        for _r in session.exec(
+            select(
+                SalesProductRollup.product_name,
+                SalesProductRollup.category,
+                func.coalesce(func.sum(SalesProductRollup.quantity), 0),
+                func.coalesce(func.sum(SalesProductRollup.gross_amount), 0),
+                func.coalesce(func.sum(SalesProductRollup.cost_amount), 0),
+                func.sum(SalesProductRollup.sales_count),
+            )
+            .where(*_tenant(SalesProductRollup))
+            .group_by(SalesProductRollup.product_name, SalesProductRollup.category)
+            .having(func.sum(SalesProductRollup.sales_count) != 0)
+            .order_by(func.sum(SalesProductRollup.gross_amount).desc())
+            .limit(20)
+        ).all()
+    ]
+
+    return {
+        "total_ventas": total_ventas,
+        "ventas_count": ventas_count,
+        "ventas_credito": ventas_credito,
+        "monto_credito": monto_credito,
+        "total_costo": total_costo,
+        "total_descuentos": total_descuentos,
+        "by_day": by_day,
+        "by_user": by_user,
+        "by_hour": by_hour,
+        "by_category": by_category,
+        "by_payment": by_payment,
+        "sorted_products": sorted_products,
+    }
+
+
+@_with_tenant_reset
+@track_queries()
+def generate_sales_report(
+    session,
+    start_date: datetime,
+    end_date: datetime,
+    company_name: str = "TUWAYKIAPP",
+    include_cancelled: bool = False,
+    currency_symbol: str | None = None,
+    company_id: int | None = None,
+    branch_id: int | None = None,
+    country_code: str | None = None,
+    timezone: str | None = None,
+    generated_at: datetime | None = None,
+) -> BinaryIO:
+    """
+    Genera reporte de ventas consolidado con detalles contables.
+
+    Incluye:
+    - Resumen ejecutivo
+    - Detalle de ventas por día
+    - Desglose por categoría
+    - Desglose por método de pago
+    - Análisis de utilidad bruta
+    - Listado detallado de transacciones
+
+    El workbook se genera en modo streaming (ver ``create_report_workbook``):
+    el detalle por ítem se escribe a medida que llega del cursor.
+    """
+    wb = create_report_workbook(min_width=12)
+    currency_label = _currency_label(currency_symbol)
+    currency_format = _currency_format(currency_symbol)
+    header_kwargs = {
+        "generated_at": generated_at,
+        "country_code": country_code,
+        "timezone": timezone,
+    }
+
+    pm_by_id = _load_pm_names(session, company_id, branch_id)
+
+    # Filtros base reutilizables en todas las queries del reporte
+    _base: list = [Sale.timestamp >= start_date, Sale.timestamp <= end_date]
+    if company_id:
+        _base.append(Sale.company_id == company_id)
+    if branch_id:
+        _base.append(Sale.branch_id == branch_id)
+    if not include_cancelled:
+        _base.append(Sale.status != SaleStatus.cancelled)
+
+    # ── 1-6. Totales y cortes: rollups diarios si el rango son días locales
+    # completos sin anuladas; si no, agregación directa sobre las ventas.
+    _rollup_days = None
+    if SALES_ROLLUP_READS_ENABLED and not include_cancelled and company_id and branch_id:
+        _rollup_days = _rollup_report_days(start_date, end_date, country_code, timezone)
+    if _rollup_days:
+        _agg = _sales_report_aggregates_from_rollup(
+            session, company_id, branch_id, _rollup_days[0], _rollup_days[1], pm_by_id
+        )
+    else:
+        _agg = _sales_report_aggregates_from_sales(
+            session, _base, pm_by_id, country_code, timezone
+        )
+    total_ventas = _agg["total_ventas"]
+    ventas_count = _agg["ventas_count"]
+    ventas_credito = _agg["ventas_credito"]
+    monto_credito = _agg["monto_credito"]
+    total_costo = _agg["total_costo"]
+    total_descuentos = _agg["total_descuentos"]
+    by_day = _agg["by_day"]
+    by_user = _agg["by_user"]
+    by_hour = _agg["by_hour"]
+    by_category = _agg["by_category"]
+    by_payment = _agg["by_payment"]
+    sorted_products = _agg["sorted_products"]
+    ventas_contado = ventas_count - ventas_credito
+    monto_contado = total_ventas - monto_credito
+
     # ── 7. Promo/PriceList names para hoja Detalle ────────────────────────────
     _promo_ids = {
         row[0]
@@ -814,13 +1071,22 @@ def generate_sales_report(
     total_devoluciones = _safe_decimal(session.execute(
         select(func.coalesce(func.sum(SaleReturn.refund_amount), 0)).where(*_ret_f)
     ).scalar())
+    # Día local de la venta original (solo ventas del período, como by_day).
     dev_by_day: dict[str, Decimal] = {}
-    for _ret_sid, _ret_amt in session.execute(
-        select(SaleReturn.original_sale_id, SaleReturn.refund_amount).where(*_ret_f)
+    _ret_sale_day: dict[int, str] = {}
+    for _ret_sid, _ret_amt, _ret_sale_ts in session.execute(
+        select(SaleReturn.original_sale_id, SaleReturn.refund_amount, Sale.timestamp)
+        .join(Sale, Sale.id == SaleReturn.original_sale_id)
+        .where(*_ret_f, *_base)
     ):
-        _d = _sale_day_map.get(_ret_sid, "")
-        if _d:
-            dev_by_day[_d] = dev_by_day.get(_d, Decimal("0")) + _safe_decimal(_ret_amt)
+        _d = _ret_sale_day.get(_ret_sid)
+        if _d is None:
+            _d = (
+                _format_report_datetime(_ret_sale_ts, "%Y-%m-%d", country_code, timezone)
+                if _ret_sale_ts else "Sin fecha"
+            )
+            _ret_sale_day[_ret_sid] = _d
+        dev_by_day[_d] = dev_by_day.get(_d, Decimal("0")) + _safe_decimal(_ret_amt)
 
     # ── Devoluciones detalladas a nivel de ítem (categoría, producto, costo) ──
     # Una sola query que cubre todas las dimensiones restantes.
@@ -863,7 +1129,7 @@ def generate_sales_report(
         dev_by_product[_pn] = (_old_pq + _qty_d, _old_pr + _rev_d)
         dev_cost_by_product[_pn] = dev_cost_by_product.get(_pn, Decimal("0")) + _cost_d
 
-        _day_k2 = _sale_day_map.get(_orig_sid_i, "")
+        _day_k2 = _ret_sale_day.get(_orig_sid_i, "")
         if _day_k2:
             dev_cost_by_day[_day_k2] = dev_cost_by_day.get(_day_k2, Decimal("0")) + _cost_d
 
@@ -1053,6 +1319,9 @@ def generate_sales_report(
     row += 1
 
     sorted_categories = sorted(by_category.items(), key=lambda x: x[1]["total"], reverse=True)
+    # Fila de totales conocida de antemano: la participación se escribe en la
+    # misma pasada (la hoja puede ser streaming y no admite volver atrás).
+    cat_totals_row = cat_data_start + len(sorted_categories)
 
     for cat_name, cat_data in sorted_categories:
         _cat_dev = dev_by_cat.get(cat_name, Decimal("0"))
@@ -1073,14 +1342,17 @@ def generate_sales_report(
         ws_category.cell(row=row, column=8, value=f"=F{row}-G{row}").number_format = currency_format
         # Margen % = Utilidad / Venta Neta
         ws_category.cell(row=row, column=9, value=f"=IF(F{row}>0,H{row}/F{row},0)").number_format = PERCENT_FORMAT
-        # % del Total (placeholder, se sustituye abajo con fórmula dinámica)
-        ws_category.cell(row=row, column=10, value=cat_data["total"]).number_format = currency_format
+        # Participación respecto a Venta Neta total (col F)
+        ws_category.cell(
+            row=row,
+            column=10,
+            value=f"=IF($F${cat_totals_row}>0,F{row}/$F${cat_totals_row},0)",
+        ).number_format = PERCENT_FORMAT
 
         for col in range(1, 11):
             ws_category.cell(row=row, column=col).border = THIN_BORDER
         row += 1
 
-    cat_totals_row = row
     _add_totals_row_with_formulas(ws_category, cat_totals_row, cat_data_start, [
         {"type": "label", "value": "TOTALES"},
         {"type": "sum", "col_letter": "B"},
@@ -1094,10 +1366,6 @@ def generate_sales_report(
         {"type": "text", "value": "100.00%"},
     ])
 
-    # Sustituir col J con fórmulas de participación respecto a Venta Neta total (col F)
-    for r in range(cat_data_start, cat_totals_row):
-        ws_category.cell(row=r, column=10, value=f"=IF($F${cat_totals_row}>0,F{r}/$F${cat_totals_row},0)").number_format = PERCENT_FORMAT
-
     _add_notes_section(ws_category, cat_totals_row, [
         "Venta Bruta: subtotal efectivamente facturado (Precio Final × Cantidad); los descuentos ya están incluidos.",
         "Descuentos: referencia informativa — diferencia entre precio de lista y precio final (ya deducida en Venta Bruta).",
@@ -1651,10 +1919,7 @@ def generate_sales_report(
     _auto_adjust_columns(ws_hourly)
 
     # Guardar
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
-    return output
+    return save_workbook_spooled(wb)
 
 
 # =============================================================================
@@ -1672,7 +1937,7 @@ def generate_inventory_report(
     country_code: str | None = None,
     timezone: str | None = None,
     generated_at: datetime | None = None,
-) -> io.BytesIO:
+) -> BinaryIO:
     """
     Genera reporte de inventario valorizado profesional.
 
@@ -1683,7 +1948,7 @@ def generate_inventory_report(
     - Productos con stock crítico
     - Rotación estimada
     """
-    wb = Workbook()
+    wb = create_report_workbook(min_width=12)
     currency_label = _currency_label(currency_symbol)
     currency_format = _currency_format(currency_symbol)
     header_kwargs = {
@@ -1722,20 +1987,24 @@ def generate_inventory_report(
         if _cs and _cs.default_profit_margin:
             _global_margin = float(_cs.default_profit_margin)
 
-    inventory_rows: list[dict[str, Any]] = []
-    for product in session.exec(query.execution_options(yield_per=500)):
-        variants = list(product.variants or [])
-        if variants:
-            for variant in variants:
-                stock = _safe_decimal(getattr(variant, "stock", 0))
-                if not include_zero_stock and stock <= 0:
-                    continue
-                label = _variant_label(variant)
-                description = _safe_string(product.description, "Sin descripción")
-                if label:
-                    description = f"{description} ({label})"
-                inventory_rows.append(
-                    {
+    def _inventory_rows():
+        """Filas del detalle leídas en streaming (``yield_per``).
+
+        Se recorre dos veces (métricas y hoja de detalle) en lugar de
+        materializar todo el inventario en memoria.
+        """
+        for product in session.exec(query.execution_options(yield_per=500)):
+            variants = list(product.variants or [])
+            if variants:
+                for variant in variants:
+                    stock = _safe_decimal(getattr(variant, "stock", 0))
+                    if not include_zero_stock and stock <= 0:
+                        continue
+                    label = _variant_label(variant)
+                    description = _safe_string(product.description, "Sin descripción")
+                    if label:
+                        description = f"{description} ({label})"
+                    yield {
                         "sku": _safe_string(variant.sku, product.barcode or "S/C"),
                         "description": description,
                         "category": _safe_string(product.category, "Sin categoría"),
@@ -1744,13 +2013,11 @@ def generate_inventory_report(
                         "purchase_price": _safe_decimal(product.purchase_price),
                         "sale_price": resolve_effective_price(product, variant=variant, global_margin=_global_margin),
                     }
-                )
-        else:
-            stock = _safe_decimal(product.stock)
-            if not include_zero_stock and stock <= 0:
-                continue
-            inventory_rows.append(
-                {
+            else:
+                stock = _safe_decimal(product.stock)
+                if not include_zero_stock and stock <= 0:
+                    continue
+                yield {
                     "sku": _safe_string(product.barcode, "S/C"),
                     "description": _safe_string(product.description, "Sin descripción"),
                     "category": _safe_string(product.category, "Sin categoría"),
@@ -1759,7 +2026,6 @@ def generate_inventory_report(
                     "purchase_price": _safe_decimal(product.purchase_price),
                     "sale_price": resolve_effective_price(product, global_margin=_global_margin),
                 }
-            )
 
     report_now = _report_now(generated_at, country_code, timezone)
     today = report_now.strftime("%d/%m/%Y")
@@ -1778,24 +2044,31 @@ def generate_inventory_report(
         **header_kwargs,
     )
 
-    # Calcular métricas
-    total_items = len(inventory_rows)
-    total_units = sum(row["stock"] for row in inventory_rows)
-    total_cost_value = sum(
-        row["stock"] * row["purchase_price"] for row in inventory_rows
-    )
-    total_sale_value = sum(
-        row["stock"] * row["sale_price"] for row in inventory_rows
-    )
-    potential_profit = total_sale_value - total_cost_value
-
-    stock_zero = sum(1 for row in inventory_rows if row["stock"] == 0)
-    stock_low = sum(1 for row in inventory_rows if 0 < row["stock"] <= 5)
-    stock_medium = sum(1 for row in inventory_rows if 5 < row["stock"] <= 10)
-    stock_ok = sum(1 for row in inventory_rows if row["stock"] > 10)
-
+    # Calcular métricas (primera pasada; solo se retienen los productos a reponer)
+    total_items = 0
+    total_units = Decimal("0")
+    total_cost_value = Decimal("0")
+    total_sale_value = Decimal("0")
+    stock_zero = stock_low = stock_medium = stock_ok = 0
+    critical_products: list[dict[str, Any]] = []
     by_category: dict[str, dict] = {}
-    for row_data in inventory_rows:
+    for row_data in _inventory_rows():
+        _stock = row_data["stock"]
+        total_items += 1
+        total_units += _stock
+        total_cost_value += _stock * row_data["purchase_price"]
+        total_sale_value += _stock * row_data["sale_price"]
+        if _stock == 0:
+            stock_zero += 1
+        elif 0 < _stock <= 5:
+            stock_low += 1
+        elif 5 < _stock <= 10:
+            stock_medium += 1
+        elif _stock > 10:
+            stock_ok += 1
+        if _safe_decimal(_stock) <= 10:
+            critical_products.append(row_data)
+
         cat = row_data["category"] or "Sin categoría"
         if cat not in by_category:
             by_category[cat] = {
@@ -1808,6 +2081,7 @@ def generate_inventory_report(
         by_category[cat]["units"] += row_data["stock"]
         by_category[cat]["cost"] += row_data["stock"] * row_data["purchase_price"]
         by_category[cat]["sale"] += row_data["stock"] * row_data["sale_price"]
+    potential_profit = total_sale_value - total_cost_value
 
     row += 1
     ws_summary.cell(row=row, column=1, value="RESUMEN DE VALORIZACIÓN").font = SUBTITLE_FONT
@@ -1870,6 +2144,7 @@ def generate_inventory_report(
     row += 1
 
     sorted_cats = sorted(by_category.items(), key=lambda x: x[1]["cost"], reverse=True)
+    inv_cat_totals_row = inv_cat_data_start + len(sorted_cats)
 
     for cat_name, cat_data in sorted_cats:
         ws_category.cell(row=row, column=1, value=_safe_string(cat_name))
@@ -1879,14 +2154,17 @@ def generate_inventory_report(
         ws_category.cell(row=row, column=5, value=cat_data["sale"]).number_format = currency_format
         # Utilidad Potencial = Fórmula: Valor Venta - Valor Costo
         ws_category.cell(row=row, column=6, value=f"=E{row}-D{row}").number_format = currency_format
-        # Participación - temporal, se actualizará con fórmula
-        ws_category.cell(row=row, column=7, value=cat_data["cost"]).number_format = currency_format
+        # Participación sobre el valor al costo total
+        ws_category.cell(
+            row=row,
+            column=7,
+            value=f"=IF($D${inv_cat_totals_row}>0,D{row}/$D${inv_cat_totals_row},0)",
+        ).number_format = PERCENT_FORMAT
 
         for col in range(1, 8):
             ws_category.cell(row=row, column=col).border = THIN_BORDER
         row += 1
 
-    inv_cat_totals_row = row
     _add_totals_row_with_formulas(ws_category, inv_cat_totals_row, inv_cat_data_start, [
         {"type": "label", "value": "TOTAL INVENTARIO"},
         {"type": "sum", "col_letter": "B"},
@@ -1897,10 +2175,6 @@ def generate_inventory_report(
         {"type": "text", "value": "100.00%"},
     ])
 
-    # Actualizar columna G con fórmulas de participación
-    for r in range(inv_cat_data_start, inv_cat_totals_row):
-        ws_category.cell(row=r, column=7, value=f"=IF($D${inv_cat_totals_row}>0,D{r}/$D${inv_cat_totals_row},0)").number_format = PERCENT_FORMAT
-
     _add_notes_section(ws_category, inv_cat_totals_row, [
         "Valor al Costo: Stock × Precio de Compra.",
         "Valor a Venta: Stock × Precio de Venta al Público.",
@@ -1932,7 +2206,7 @@ def generate_inventory_report(
     inv_detail_start = row + 1
     row += 1
 
-    for row_data in inventory_rows:
+    for row_data in _inventory_rows():
         stock = _safe_decimal(row_data["stock"])
         cost = _safe_decimal(row_data["purchase_price"])
         price = _safe_decimal(row_data["sale_price"])
@@ -2032,9 +2306,6 @@ def generate_inventory_report(
     critical_data_start = row + 1
     row += 1
 
-    critical_products = [
-        row_data for row_data in inventory_rows if _safe_decimal(row_data["stock"]) <= 10
-    ]
     critical_products.sort(key=lambda r: _safe_decimal(r["stock"]))
 
     for row_data in critical_products:
@@ -2082,10 +2353,7 @@ def generate_inventory_report(
     _auto_adjust_columns(ws_critical)
 
     # Guardar
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
-    return output
+    return save_workbook_spooled(wb)
 
 
 # =============================================================================
@@ -29,6 +29,7 @@ from app.models import (
 )
 from app.enums import SaleStatus
 from app.constants import CASHBOX_INCOME_ACTIONS
+from app.services.sales_rollup_service import apply_return_to_rollup
 from app.utils.stock import async_recalculate_stock_totals
 from app.utils.tenant import set_tenant_context
 from app.utils.timezone import utc_now_naive
@@ -482,6 +483,14 @@ async def _process_return_impl(
         )
         session.add(log)
 
+    # Ítems ya flusheados antes del recálculo de stock.
+    await apply_return_to_rollup(
+        session,
+        sale_return.id,
+        company_id=company_id,
+        branch_id=branch_id,
+    )
+
     return ReturnResult(
         success=True,
         sale_return_id=sale_return.id,
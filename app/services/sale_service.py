@@ -38,10 +38,10 @@ from __future__ import annotations
 import datetime
 from dataclasses import dataclass
 from decimal import Decimal, ROUND_HALF_UP
-from typing import Any, Dict, List
+from typing import TYPE_CHECKING, Any, Dict, List
 
 from sqlmodel import select
-from sqlalchemy import func, or_, desc
+from sqlalchemy import and_, func, or_, desc
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession  # ✅ IMPORTANTE
 
@@ -58,6 +58,7 @@ from app.models import (
     Product,
     ProductAttribute,
     ProductBatch,
+    ProductKit,
     ProductVariant,
     Sale,
     SaleInstallment,
@@ -68,9 +69,26 @@ from app.models import (
 )
 # PriceListItem y Promotion se acceden vía app.services.pricing (single source of truth).
 from app.schemas.sale_schemas import PaymentInfoDTO, SaleItemDTO
+from app.services.barcode_cache import (
+    BARCODE_CACHE_ENABLED,
+    BARCODE_CACHE_MAX_ENTRIES,
+    BarcodeEntry,
+    BranchBarcodeSnapshot,
+    barcode_key,
+    get_barcode_snapshot,
+    install_barcode_snapshot,
+    load_token,
+)
+from app.services.product_search_index import (
+    PRODUCT_SEARCH_INDEX_ENABLED,
+    get_product_search_index,
+)
+from app.services.sales_rollup_service import apply_sale_to_rollup
 from app.utils.calculations import calculate_subtotal, calculate_total
 from app.utils.db import get_async_session as get_session
 from app.utils.logger import get_logger
+from app.utils.metrics import SALES_TOTAL
+from app.utils.performance import track_queries
 from app.utils.sanitization import escape_like
 from app.utils.tenant import set_tenant_context
 from app.utils.payment import (
@@ -81,6 +99,9 @@ from app.utils.payment import (
 )
 from app.utils.timezone import format_local_datetime, utc_now_naive
 
+if TYPE_CHECKING:
+    from app.services.pricing import CartPricingSnapshot
+
 # Nota: get_session es un alias de get_async_session para uso interno.
 
 QTY_DECIMAL_QUANT = Decimal("0.0001")
@@ -356,13 +377,89 @@ async def _get_effective_margin(
     return float(company_row.default_profit_margin) if company_row.default_profit_margin else 0.0
 
 
+async def _find_barcode_in_db(
+    session: AsyncSession,
+    code: str,
+    company_id: int | None,
+    branch_id: int | None,
+    global_margin: float,
+) -> BarcodeEntry | None:
+    """Variante por SKU (con su padre) o, si no hay, producto activo por barcode."""
+    variant_query = select(ProductVariant).where(ProductVariant.sku == code)
+    variant = (
+        await session.exec(
+            _apply_tenant_filters(
+                variant_query, ProductVariant, company_id, branch_id
+            )
+        )
+    ).first()
+    if variant:
+        parent_query = select(Product).where(
+            Product.id == variant.product_id
+        )
+        parent = (
+            await session.exec(
+                _apply_tenant_filters(
+                    parent_query, Product, company_id, branch_id
+                )
+            )
+        ).first()
+        if parent:
+            return BarcodeEntry(
+                _adapt_variant_payload(variant, parent, global_margin=global_margin),
+                product_id=parent.id,
+                variant_id=variant.id,
+            )
+
+    product_query = select(Product).where(
+        Product.barcode == code,
+        Product.is_active == True,
+    )
+    product = (
+        await session.exec(
+            _apply_tenant_filters(
+                product_query, Product, company_id, branch_id
+            )
+        )
+    ).first()
+    if product:
+        return BarcodeEntry(
+            _adapt_product_payload(product, global_margin=global_margin),
+            product_id=product.id,
+        )
+    return None
+
+
+async def _read_entry_stock(
+    session: AsyncSession,
+    entry: BarcodeEntry,
+    company_id: int | None,
+    branch_id: int | None,
+) -> Any | None:
+    if entry.variant_id is not None:
+        query = select(ProductVariant.stock).where(ProductVariant.id == entry.variant_id)
+        model = ProductVariant
+    else:
+        query = select(Product.stock).where(Product.id == entry.product_id)
+        model = Product
+    return (
+        await session.exec(_apply_tenant_filters(query, model, company_id, branch_id))
+    ).first()
+
+
 async def get_product_by_barcode(
     barcode: str | None,
     company_id: int | None,
     branch_id: int | None,
     session: AsyncSession | None = None,
 ) -> dict[str, Any] | None:
-    """Busca un producto por SKU (variante) o barcode (producto estándar)."""
+    """Busca un producto por SKU (variante) o barcode (producto estándar).
+
+    Con ``BARCODE_CACHE`` (default) resuelve contra el snapshot de la
+    sucursal (ver ``barcode_cache``): un acierto con stock al día no toca la
+    BD; con stock viejo lo relee por PK. Lo no cacheado va a la BD y queda
+    guardado para el próximo escaneo.
+    """
     # S1-02: reset tenant al salir (éxito/excepción) → evita bleed cross-tenant
     # cuando el worker se reutiliza para otra request.
     set_tenant_context(company_id, branch_id)
@@ -371,44 +468,121 @@ async def get_product_by_barcode(
         if not code:
             return None
 
+        snapshot = None
+        entry = None
+        if BARCODE_CACHE_ENABLED and company_id and branch_id:
+            snapshot = get_barcode_snapshot(int(company_id), int(branch_id))
+            entry = snapshot.lookup(code)
+            if entry is not None and not snapshot.stock_is_stale(entry):
+                return dict(entry.payload)
+            if entry is None and snapshot.complete:
+                return None
+
         async def _run(current_session: AsyncSession) -> dict[str, Any] | None:
+            seq = snapshot.current_seq() if snapshot is not None else 0
+            if entry is not None:
+                stock = await _read_entry_stock(
+                    current_session, entry, company_id, branch_id
+                )
+                if stock is not None:
+                    snapshot.refresh_stock(entry, stock, seq)
+                    return dict(entry.payload)
+
+            gm = snapshot.margin if snapshot is not None else None
+            if gm is None:
+                gm = await _get_effective_margin(current_session, company_id, branch_id)
+            found = await _find_barcode_in_db(
+                current_session, code, company_id, branch_id, gm
+            )
+            if snapshot is not None:
+                snapshot.margin = gm
+                if found is not None:
+                    found.stock_seq = seq
+                    snapshot.remember(code, found)
+            return dict(found.payload) if found is not None else None
+
+        if session is not None:
+            return await _run(session)
+        async with get_session() as current_session:
+            return await _run(current_session)
+    finally:
+        set_tenant_context(None, None)
+
+
+async def warm_barcode_cache(
+    company_id: int | None,
+    branch_id: int | None,
+    session: AsyncSession | None = None,
+) -> bool:
+    """Precarga todos los códigos de la sucursal (al entrar al POS).
+
+    Cuatro queries (margen, productos, variantes, kits). No hace nada si ya
+    hay un snapshot completo vigente o si el catálogo supera
+    ``BARCODE_CACHE_MAX_ENTRIES`` (ahí se cachea a medida que se escanea).
+    Devuelve True si quedó un snapshot completo.
+    """
+    if not BARCODE_CACHE_ENABLED or not company_id or not branch_id:
+        return False
+    company_id, branch_id = int(company_id), int(branch_id)
+    current = get_barcode_snapshot(company_id, branch_id, create=False)
+    if current is not None and current.complete:
+        return True
+
+    set_tenant_context(company_id, branch_id)
+    try:
+        async def _run(current_session: AsyncSession) -> bool:
+            token = load_token(company_id, branch_id)
             gm = await _get_effective_margin(current_session, company_id, branch_id)
-            variant_query = select(ProductVariant).where(ProductVariant.sku == code)
-            variant = (
+            products = (
+                await current_session.exec(
+                    _apply_tenant_filters(select(Product), Product, company_id, branch_id)
+                )
+            ).all()
+            variants = (
                 await current_session.exec(
                     _apply_tenant_filters(
-                        variant_query, ProductVariant, company_id, branch_id
+                        select(ProductVariant), ProductVariant, company_id, branch_id
                     )
                 )
-            ).first()
-            if variant:
-                parent_query = select(Product).where(
-                    Product.id == variant.product_id
-                )
-                parent = (
+            ).all()
+            active = [product for product in products if product.is_active]
+            if len(active) + len(variants) > BARCODE_CACHE_MAX_ENTRIES:
+                return False
+            kit_ids = set(
+                (
                     await current_session.exec(
                         _apply_tenant_filters(
-                            parent_query, Product, company_id, branch_id
+                            select(ProductKit.kit_product_id).distinct(),
+                            ProductKit,
+                            company_id,
+                            branch_id,
                         )
                     )
-                ).first()
-                if parent:
-                    return _adapt_variant_payload(variant, parent, global_margin=gm)
-
-            product_query = select(Product).where(
-                Product.barcode == code,
-                Product.is_active == True,
+                ).all()
             )
-            product = (
-                await current_session.exec(
-                    _apply_tenant_filters(
-                        product_query, Product, company_id, branch_id
-                    )
+
+            snapshot = BranchBarcodeSnapshot(company_id, branch_id, margin=gm)
+            parents = {product.id: product for product in products}
+            # Mismo orden que la consulta: primero SKU de variante, luego barcode.
+            for variant in variants:
+                parent = parents.get(variant.product_id)
+                if parent is None or not variant.sku:
+                    continue
+                snapshot.codes[barcode_key(variant.sku)] = BarcodeEntry(
+                    _adapt_variant_payload(variant, parent, global_margin=gm),
+                    product_id=parent.id,
+                    variant_id=variant.id,
                 )
-            ).first()
-            if product:
-                return _adapt_product_payload(product, global_margin=gm)
-            return None
+            for product in active:
+                snapshot.kits[product.id] = product.id in kit_ids
+                code = barcode_key(product.barcode)
+                if code and code not in snapshot.codes:
+                    snapshot.codes[code] = BarcodeEntry(
+                        _adapt_product_payload(product, global_margin=gm),
+                        product_id=product.id,
+                    )
+            snapshot.complete = True
+            return install_barcode_snapshot(snapshot, token)
 
         if session is not None:
             return await _run(session)
@@ -426,6 +600,13 @@ async def search_products(
     limit: int = 10,
     session: AsyncSession | None = None,
 ) -> list[dict[str, Any]]:
+    """Autocompletado del POS: productos y variantes que coinciden con ``query``.
+
+    Con ``PRODUCT_SEARCH_INDEX`` (default) resuelve contra el índice en
+    memoria de la sucursal (ver ``product_search_index``) y carga sólo las
+    filas ganadoras; si no, corre los ``ILIKE`` sobre producto, variante y
+    atributos.
+    """
     # S1-02: reset tenant al salir para evitar bleed cross-tenant.
     set_tenant_context(company_id, branch_id)
     try:
@@ -434,7 +615,53 @@ async def search_products(
             return []
         like_search = f"%{escape_like(term)}%"
 
+        async def _run_indexed(current_session: AsyncSession) -> list[dict[str, Any]]:
+            index = await get_product_search_index(current_session, company_id, branch_id)
+            hits = index.search(term, limit)
+            if not hits:
+                return []
+            gm = await _get_effective_margin(current_session, company_id, branch_id)
+            variant_ids = [vid for _pid, vid in hits if vid is not None]
+            rows_query = (
+                select(Product, ProductVariant)
+                .outerjoin(
+                    ProductVariant,
+                    and_(
+                        ProductVariant.product_id == Product.id,
+                        ProductVariant.company_id == company_id,
+                        ProductVariant.branch_id == branch_id,
+                        ProductVariant.id.in_(variant_ids or [0]),
+                    ),
+                )
+                .where(
+                    Product.id.in_({pid for pid, _vid in hits}),
+                    Product.is_active == True,
+                )
+            )
+            rows_query = _apply_tenant_filters(rows_query, Product, company_id, branch_id)
+            products_map: dict[int, Product] = {}
+            variants_map: dict[int, ProductVariant] = {}
+            for product, variant in (await current_session.exec(rows_query)).all():
+                products_map[product.id] = product
+                if variant is not None:
+                    variants_map[variant.id] = variant
+
+            results: list[dict[str, Any]] = []
+            for pid, vid in hits:
+                product = products_map.get(pid)
+                if product is None:
+                    continue
+                if vid is None:
+                    results.append(_adapt_product_payload(product, global_margin=gm))
+                elif vid in variants_map:
+                    results.append(
+                        _adapt_variant_payload(variants_map[vid], product, global_margin=gm)
+                    )
+            return results
+
         async def _run(current_session: AsyncSession) -> list[dict[str, Any]]:
+            if PRODUCT_SEARCH_INDEX_ENABLED and company_id and branch_id:
+                return await _run_indexed(current_session)
             gm = await _get_effective_margin(current_session, company_id, branch_id)
             product_query = select(Product).where(
                 Product.is_active == True,
@@ -945,6 +1172,32 @@ async def _apply_promotions(
     return final_price, promo.id, promo_receipt_hint(promo)
 
 
+def _invalidate_pricing_cache_after_commit(
+    session: AsyncSession,
+    company_id: int,
+    branch_id: int,
+) -> None:
+    """Invalida el cache de pricing cuando el caller confirme la transacción.
+
+    El commit es del caller; invalidar antes dejaría que otra réplica
+    recargue el ``current_uses`` viejo y lo cachee hasta el TTL.
+    """
+    from sqlalchemy import event
+
+    from app.services.pricing_cache import invalidate_pricing_cache
+
+    sync_session = getattr(session, "sync_session", None)
+    if sync_session is None:
+        invalidate_pricing_cache(company_id, branch_id)
+        return
+    event.listen(
+        sync_session,
+        "after_commit",
+        lambda _s: invalidate_pricing_cache(company_id, branch_id),
+        once=True,
+    )
+
+
 async def _consume_promotions_for_sale(
     session: AsyncSession,
     promotion_ids: set[int],
@@ -964,6 +1217,7 @@ async def _consume_promotions_for_sale(
 
     from app.models.promotions import Promotion
 
+    capped = False
     try:
         stmt = (
             select(Promotion)
@@ -985,7 +1239,11 @@ async def _consume_promotions_for_sale(
                 )
                 continue
             promo.current_uses = (promo.current_uses or 0) + 1
+            if promo.max_uses is not None and promo.current_uses >= promo.max_uses:
+                capped = True
         await session.flush()
+        if capped:
+            _invalidate_pricing_cache_after_commit(session, company_id, branch_id)
     except Exception:
         logger.exception(
             "Fallo al consumir promociones %s; la venta no se aborta.",
@@ -1007,6 +1265,10 @@ async def _resolve_item_base_price(
     Extraído de ``_resolve_item_pricing`` para que el pre-pass que calcula
     ``cart_subtotal`` pueda obtener (base_price, applied_pl_id) sin duplicar
     queries al volver a entrar en la pasada principal.
+
+    Camino por ítem (2-4 queries por línea). El cobro usa
+    :func:`_resolve_item_base_price_from_snapshot`, que resuelve igual sobre
+    el snapshot batch del carrito.
     """
     from app.services.pricing import (
         resolve_price_list_price,
@@ -1108,6 +1370,58 @@ async def _resolve_item_pricing(
     return final_price, applied_pl_id, applied_promo_id, promo_hint
 
 
+def _resolve_item_base_price_from_snapshot(
+    snapshot: "CartPricingSnapshot",
+    product: Product,
+    variant: ProductVariant | None,
+    qty: Decimal,
+    price_list_id: int | None,
+    global_margin: float,
+) -> tuple[Decimal, int | None]:
+    """Versión en memoria de :func:`_resolve_item_base_price`.
+
+    Misma jerarquía PriceList → PriceTier → ``sale_price`` → margen global,
+    pero leyendo del snapshot precargado del carrito en vez de consultar la
+    BD por cada ítem. ``global_margin`` lo resuelve el caller una sola vez.
+    """
+    variant_id = variant.id if variant else None
+
+    if price_list_id:
+        pl_price = snapshot.price_list_price(product.id, variant_id)
+        if pl_price is not None and pl_price > 0:
+            return _round_money(pl_price), price_list_id
+
+    tier_price = snapshot.tier_price(product.id, variant_id, qty)
+    if tier_price is not None and tier_price > 0:
+        return _round_money(tier_price), None
+
+    if product.sale_price is not None:
+        return _round_money(product.sale_price), None
+    from app.utils.pricing import resolve_effective_price
+    return _round_money(resolve_effective_price(product, global_margin=global_margin)), None
+
+
+def _apply_promotions_from_snapshot(
+    snapshot: "CartPricingSnapshot",
+    product: Product,
+    qty: Decimal,
+    unit_price: Decimal,
+    cart_subtotal: Decimal | None = None,
+) -> tuple[Decimal, int | None, str | None]:
+    """Versión en memoria de :func:`_apply_promotions` (sin tocar ``current_uses``)."""
+    from app.services.pricing import apply_promotion_to_price, promo_receipt_hint
+
+    promo = snapshot.find_promotion(
+        product_id=product.id,
+        category=product.category,
+        quantity=qty,
+        cart_subtotal=cart_subtotal,
+    )
+    if promo is None:
+        return unit_price, None, None
+    return apply_promotion_to_price(promo, unit_price, qty), promo.id, promo_receipt_hint(promo)
+
+
 def _sum_batch_stock(
     batches: list[ProductBatch],
     allows_decimal: bool,
@@ -1492,6 +1806,7 @@ class SaleService:
         )
 
     @staticmethod
+    @track_queries()
     async def process_sale(
         session: AsyncSession | None,
         user_id: int | None,
@@ -1519,7 +1834,7 @@ class SaleService:
         try:
             if session is None:
                 async with get_session() as managed_session:
-                    return await SaleService._process_sale_impl(
+                    result = await SaleService._process_sale_impl(
                         managed_session,
                         user_id,
                         company_id,
@@ -1532,21 +1847,33 @@ class SaleService:
                         coupon_code,
                         promo_now,
                     )
-            return await SaleService._process_sale_impl(
-                session,
-                user_id,
-                company_id,
-                branch_id,
-                items,
-                payment_data,
-                reservation_id,
-                currency_symbol,
-                idempotency_key,
-                coupon_code,
-                promo_now,
-            )
+            else:
+                result = await SaleService._process_sale_impl(
+                    session,
+                    user_id,
+                    company_id,
+                    branch_id,
+                    items,
+                    payment_data,
+                    reservation_id,
+                    currency_symbol,
+                    idempotency_key,
+                    coupon_code,
+                    promo_now,
+                )
+        except DuplicateSaleError:
+            SALES_TOTAL.inc(result="duplicate")
+            raise
+        except ValueError:
+            SALES_TOTAL.inc(result="rejected")
+            raise
+        except Exception:
+            SALES_TOTAL.inc(result="error")
+            raise
         finally:
             set_tenant_context(None, None)
+        SALES_TOTAL.inc(result="ok")
+        return result
 
     @staticmethod
     async def _process_sale_impl(
@@ -1994,29 +2321,59 @@ class SaleService:
                 )
             return product, variant
 
-        # ── Pre-pass: matching + precio base (sin promo) → cart_subtotal. ──
+        matched_items = [_match_product(item) for item in pending_items]
+
+        # ── Snapshot de pricing del carrito completo ──
+        # Las líneas sin precio del carrito se resuelven contra un snapshot
+        # cargado con una query por tabla (listas, tiers, promociones) en vez
+        # de 3+ queries por ítem: los productos ya están tomados con
+        # FOR UPDATE, así que cada round-trip aquí alarga el lock.
+        pricing_snapshot = None
+        global_margin = 0.0
+        to_price = [
+            matched_items[idx]
+            for idx, item in enumerate(pending_items)
+            if item.get("price_override") is None
+        ]
+        if to_price:
+            from app.services.pricing import load_cart_pricing_snapshot
+
+            pricing_snapshot = await load_cart_pricing_snapshot(
+                session,
+                product_ids=[product.id for product, _ in to_price],
+                variant_ids=[variant.id for _, variant in to_price if variant],
+                company_id=company_id,
+                branch_id=branch_id,
+                price_list_id=client_price_list_id,
+                now=promo_now,
+                coupon_code=coupon_code,
+            )
+            if any(product.sale_price is None for product, _ in to_price):
+                global_margin = await _get_effective_margin(
+                    session, company_id, branch_id
+                )
+
+        # ── Pre-pass: precio base (sin promo) → cart_subtotal. ──
         # Necesario para que `min_cart_amount` pueda evaluarse con el contexto
         # completo del carrito. Se cachea (product, variant, base_price, pl_id)
-        # para que la pasada principal solo deba aplicar la promo y no repita
-        # las queries de PriceList/Tier.
+        # para que la pasada principal solo deba aplicar la promo.
         prepared_items: list[
             tuple[Product, ProductVariant | None, Decimal, int | None]
         ] = []
         cart_subtotal_pre_promo = Decimal("0.00")
-        for item in pending_items:
-            matched_product, matched_variant = _match_product(item)
+        for idx, item in enumerate(pending_items):
+            matched_product, matched_variant = matched_items[idx]
             if item.get("price_override") is not None:
                 base_price = _to_decimal(item["price_override"])
                 applied_pl_id_pre = None
             else:
-                base_price, applied_pl_id_pre = await _resolve_item_base_price(
-                    session,
+                base_price, applied_pl_id_pre = _resolve_item_base_price_from_snapshot(
+                    pricing_snapshot,
                     matched_product,
                     matched_variant,
                     item["quantity"],
-                    company_id,
-                    branch_id,
-                    price_list_id=client_price_list_id,
+                    client_price_list_id,
+                    global_margin,
                 )
             prepared_items.append(
                 (matched_product, matched_variant, base_price, applied_pl_id_pre)
@@ -2033,24 +2390,17 @@ class SaleService:
                 applied_promo_id = item.get("applied_promotion_id_from_cart")
                 promo_hint = item.get("promo_receipt_hint_from_cart")
             else:
+                applied_pl_id = pre_pl_id
                 (
                     unit_price,
-                    applied_pl_id,
                     applied_promo_id,
                     promo_hint,
-                ) = await _resolve_item_pricing(
-                    session,
+                ) = _apply_promotions_from_snapshot(
+                    pricing_snapshot,
                     product,
-                    variant,
                     item["quantity"],
-                    company_id,
-                    branch_id,
-                    price_list_id=client_price_list_id,
-                    now=promo_now,
-                    coupon_code=coupon_code,
+                    base_price,
                     cart_subtotal=cart_subtotal_pre_promo,
-                    precomputed_base_price=base_price,
-                    precomputed_applied_pl_id=pre_pl_id,
                 )
             if applied_promo_id is not None:
                 applied_promotion_ids.add(applied_promo_id)
@@ -2708,6 +3058,14 @@ class SaleService:
             # El commit/rollback es responsabilidad EXCLUSIVA del caller,
             # como documenta el docstring y el ejemplo de uso del módulo.
             await session.flush()
+            # Rollups diarios al final: las filas del día quedan bloqueadas
+            # sólo hasta el commit del caller.
+            await apply_sale_to_rollup(
+                session,
+                new_sale.id,
+                company_id=company_id,
+                branch_id=branch_id,
+            )
             return SaleProcessResult(
                 sale=new_sale,
                 receipt_items=receipt_items,
@@ -0,0 +1,632 @@
+"""Rollups diarios de ventas — mantenimiento incremental, rebuild y chequeo.
+
+Mantiene las tablas de ``app.models.sales_rollup`` (totales por empresa,
+sucursal y día LOCAL, con cortes por categoría, producto, medio de pago,
+vendedor y hora) para que dashboard y reporte de ventas lean agregados en
+lugar de recorrer el histórico de ``Sale``/``SaleItem``/``SalePayment``.
+
+Escrituras:
+  * :func:`apply_sale_to_rollup` — al final de ``SaleService.process_sale``.
+  * :func:`apply_sale_to_rollup_sync` — ventas de reservas registradas desde
+    los states (``services_state`` y el adelanto de caja).
+  * :func:`apply_return_to_rollup` — al final de ``return_service.process_return``.
+  * :func:`apply_sale_cancellation_to_rollup` — al anular una venta.
+
+Todas corren en la MISMA transacción que el evento (el commit es del
+caller) y al final, para retener el lock de las filas del día lo mínimo. Son
+best-effort como ``_consume_promotions_for_sale``: si fallan se loguea y la
+venta no se aborta; :func:`check_sales_rollup` detecta la deriva y
+:func:`rebuild_sales_rollup` la repara (``scripts/rebuild_sales_rollup.py``).
+
+Cada fila fuente aporta valores redondeados a 2 decimales, así el rebuild y el
+camino incremental suman exactamente lo mismo. El costo se toma de
+``Product.purchase_price`` al momento de registrar el evento (el rebuild usa
+el precio vigente), por eso el chequeo de consistencia no compara costos.
+
+Lecturas: ``SALES_ROLLUP_READS=0`` vuelve dashboard y reporte a las queries
+crudas (útil mientras corre el backfill inicial).
+"""
+from __future__ import annotations
+
+import logging
+import os
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Any, Iterable
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlmodel import select
+
+from app.enums import SaleStatus
+from app.i18n import MSG
+from app.models import (
+    CompanySettings,
+    Product,
+    Sale,
+    SaleItem,
+    SalePayment,
+    SaleReturn,
+    SaleReturnItem,
+    SalesCategoryRollup,
+    SalesDailyRollup,
+    SalesHourRollup,
+    SalesPaymentRollup,
+    SalesProductRollup,
+    SalesUserRollup,
+)
+from app.utils.timezone import local_datetime_to_utc_naive, to_local_datetime, utc_now_naive
+
+logger = logging.getLogger(__name__)
+
+SALES_ROLLUP_READS_ENABLED = os.getenv("SALES_ROLLUP_READS", "1").strip().lower() not in {
+    "0",
+    "false",
+    "no",
+}
+
+# Orden fijo de escritura: dos transacciones concurrentes toman los locks de
+# fila en el mismo orden y no se bloquean mutuamente (deadlock).
+ROLLUP_MODELS: tuple[type, ...] = (
+    SalesDailyRollup,
+    SalesCategoryRollup,
+    SalesProductRollup,
+    SalesPaymentRollup,
+    SalesUserRollup,
+    SalesHourRollup,
+)
+
+_KEY_FIELDS: dict[type, tuple[str, ...]] = {
+    SalesDailyRollup: ("day",),
+    SalesCategoryRollup: ("day", "category"),
+    SalesProductRollup: ("day", "product_id", "product_name", "category"),
+    SalesPaymentRollup: ("day", "method_type", "payment_method_id"),
+    SalesUserRollup: ("day", "user_id"),
+    SalesHourRollup: ("day", "hour"),
+}
+
+# Depende del precio de compra vigente al recalcular: no se compara.
+_UNCHECKED_FIELDS = frozenset({"cost_amount", "refund_cost_amount"})
+
+_CENT = Decimal("0.01")
+_QTY = Decimal("0.0001")
+_CREDIT_CONDITIONS = {"credito", "credit"}
+
+
+def _money(value: Any) -> Decimal:
+    return Decimal(str(value or 0)).quantize(_CENT, rounding=ROUND_HALF_UP)
+
+
+def _qty(value: Any) -> Decimal:
+    return Decimal(str(value or 0)).quantize(_QTY, rounding=ROUND_HALF_UP)
+
+
+def _category(snapshot: str | None, product_category: str | None = None) -> str:
+    """Misma normalización que el dashboard: snapshot → categoría actual → fallback."""
+    value = (snapshot or "").strip() or (product_category or "").strip()
+    return (value or MSG.FALLBACK_NO_CATEGORY)[:100]
+
+
+@dataclass(frozen=True)
+class TenantClock:
+    """Zona horaria con la que se asigna el día/hora local de cada evento."""
+
+    country_code: str = "PE"
+    timezone: str | None = None
+
+    def local(self, value: datetime) -> datetime:
+        return to_local_datetime(value, self.country_code, timezone=self.timezone) or value
+
+    def day_bounds_utc(self, start_day: date, end_day: date) -> tuple[datetime, datetime]:
+        """Rango UTC-naive ``[inicio de start_day, inicio de end_day + 1)``."""
+        return (
+            local_datetime_to_utc_naive(
+                datetime.combine(start_day, time.min),
+                self.country_code,
+                timezone=self.timezone,
+            ),
+            local_datetime_to_utc_naive(
+                datetime.combine(end_day + timedelta(days=1), time.min),
+                self.country_code,
+                timezone=self.timezone,
+            ),
+        )
+
+
+@dataclass
+class SalesRollupDelta:
+    """Acumulador de aportes por tabla y clave, listo para upsert o comparación."""
+
+    company_id: int
+    branch_id: int
+    clock: TenantClock
+    buckets: dict[type, dict[tuple, dict[str, Any]]] = field(
+        default_factory=lambda: defaultdict(dict)
+    )
+    # Claves ya contadas en la venta/devolución en curso (filas ordenadas por id).
+    _current_id: tuple[str, int] | None = field(default=None, init=False, repr=False)
+    _current_keys: set[tuple] = field(default_factory=set, init=False, repr=False)
+
+    def _add(self, model: type, key: tuple, **values: Any) -> None:
+        bucket = self.buckets[model].setdefault(key, {})
+        for name, value in values.items():
+            bucket[name] = bucket.get(name, 0) + value
+
+    def _first_time(self, kind: str, source_id: int, key: tuple) -> bool:
+        if self._current_id != (kind, source_id):
+            self._current_id = (kind, source_id)
+            self._current_keys = set()
+        if key in self._current_keys:
+            return False
+        self._current_keys.add(key)
+        return True
+
+    def is_empty(self) -> bool:
+        return not any(self.buckets.values())
+
+    def add_sale(self, row: Any, sign: int = 1) -> None:
+        """Cabecera: ``sale_id, timestamp, total_amount, payment_condition, user_id``."""
+        local = self.clock.local(row.timestamp)
+        day = local.date()
+        total = _money(row.total_amount) * sign
+        is_credit = (row.payment_condition or "").strip().lower() in _CREDIT_CONDITIONS
+        self._add(
+            SalesDailyRollup,
+            (day,),
+            sales_count=sign,
+            gross_amount=total,
+            credit_count=sign if is_credit else 0,
+            credit_amount=total if is_credit else Decimal("0"),
+        )
+        self._add(SalesUserRollup, (day, row.user_id or 0), sales_count=sign, gross_amount=total)
+        self._add(SalesHourRollup, (day, local.hour), sales_count=sign, gross_amount=total)
+
+    def add_sale_item(self, row: Any, sign: int = 1) -> None:
+        """Ítem: columnas de :func:`sale_item_rows_query`."""
+        day = self.clock.local(row.timestamp).date()
+        quantity = _qty(row.quantity)
+        subtotal = _money(row.subtotal)
+        cost = _money(Decimal(str(row.purchase_price or 0)) * quantity)
+        unit_price = Decimal(str(row.unit_price or 0))
+        base_price = Decimal(str(row.unit_price_base or 0)) or unit_price
+        discount = _money(max(Decimal("0"), (base_price - unit_price) * quantity))
+        category = _category(row.product_category_snapshot, row.product_category)
+        product_key = (
+            day,
+            row.product_id or 0,
+            (row.product_name_snapshot or "")[:255],
+            category,
+        )
+
+        self._add(
+            SalesDailyRollup,
+            (day,),
+            items_amount=subtotal * sign,
+            cost_amount=cost * sign,
+            discount_amount=discount * sign,
+        )
+        category_key = (day, category)
+        self._add(
+            SalesCategoryRollup,
+            category_key,
+            sales_count=sign if self._first_time("sale", row.sale_id, category_key) else 0,
+            quantity=quantity * sign,
+            gross_amount=subtotal * sign,
+            cost_amount=cost * sign,
+            discount_amount=discount * sign,
+        )
+        self._add(
+            SalesProductRollup,
+            product_key,
+            sales_count=sign if self._first_time("sale", row.sale_id, product_key) else 0,
+            quantity=quantity * sign,
+            gross_amount=subtotal * sign,
+            cost_amount=cost * sign,
+        )
+
+    def add_sale_payment(self, row: Any, sign: int = 1) -> None:
+        """Pago: ``timestamp`` (de la venta), ``method_type, payment_method_id, amount``."""
+        day = self.clock.local(row.timestamp).date()
+        method = getattr(row.method_type, "value", row.method_type) or ""
+        self._add(
+            SalesPaymentRollup,
+            (day, str(method)[:50], row.payment_method_id or 0),
+            payments_count=sign,
+            amount=_money(row.amount) * sign,
+        )
+
+    def add_return_item(self, row: Any, sign: int = 1) -> None:
+        """Devolución: columnas de :func:`return_item_rows_query` (una fila por ítem)."""
+        day = self.clock.local(row.timestamp).date()
+        if self._first_time("return", row.sale_return_id, ("header",)):
+            self._add(
+                SalesDailyRollup,
+                (day,),
+                refund_count=sign,
+                refund_amount=_money(row.refund_amount) * sign,
+            )
+        if row.return_quantity is None:
+            return  # cabecera sin ítems (no debería ocurrir)
+        quantity = _qty(row.return_quantity)
+        refund = _money(row.refund_subtotal) * sign
+        cost = _money(Decimal(str(row.purchase_price or 0)) * quantity) * sign
+        category = _category(row.product_category_snapshot, row.product_category)
+        self._add(SalesDailyRollup, (day,), refund_cost_amount=cost)
+        self._add(
+            SalesCategoryRollup,
+            (day, category),
+            refund_quantity=quantity * sign,
+            refund_amount=refund,
+            refund_cost_amount=cost,
+        )
+        self._add(
+            SalesProductRollup,
+            (day, row.product_id or 0, (row.product_name_snapshot or "")[:255], category),
+            refund_quantity=quantity * sign,
+            refund_amount=refund,
+            refund_cost_amount=cost,
+        )
+
+    def upsert_statements(self) -> list[Any]:
+        """``INSERT … ON DUPLICATE KEY UPDATE col = col + delta`` por clave, en orden fijo."""
+        now = utc_now_naive()
+        statements = []
+        for model in ROLLUP_MODELS:
+            table = model.__table__
+            key_fields = _KEY_FIELDS[model]
+            for key in sorted(self.buckets.get(model, {})):
+                values = self.buckets[model][key]
+                stmt = mysql_insert(model).values(
+                    company_id=self.company_id,
+                    branch_id=self.branch_id,
+                    updated_at=now,
+                    **dict(zip(key_fields, key)),
+                    **values,
+                )
+                statements.append(
+                    stmt.on_duplicate_key_update(
+                        updated_at=stmt.inserted.updated_at,
+                        **{name: table.c[name] + stmt.inserted[name] for name in values},
+                    )
+                )
+        return statements
+
+
+@dataclass(frozen=True)
+class RollupMismatch:
+    """Diferencia entre el rollup persistido y el recalculado desde las ventas."""
+
+    table: str
+    key: tuple
+    column: str
+    expected: Any
+    actual: Any
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Queries fuente (compartidas por el camino incremental, rebuild y chequeo)
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+def _tenant_clock_query(company_id: int):
+    return (
+        select(CompanySettings.branch_id, CompanySettings.country_code, CompanySettings.timezone)
+        .where(CompanySettings.company_id == company_id)
+        .order_by(CompanySettings.branch_id, CompanySettings.id)
+    )
+
+
+def _clock_from_rows(rows: Iterable[Any], branch_id: int) -> TenantClock:
+    # Fallback a la primera sucursal, como ``_company_settings_snapshot``.
+    rows = list(rows)
+    match = next((r for r in rows if r[0] == branch_id), rows[0] if rows else None)
+    if match is None:
+        return TenantClock()
+    timezone = (match[2] or "").strip() or None
+    return TenantClock(country_code=match[1] or "PE", timezone=timezone)
+
+
+def sale_rows_query(*filters: Any):
+    return (
+        select(
+            Sale.id.label("sale_id"),
+            Sale.timestamp,
+            Sale.total_amount,
+            Sale.payment_condition,
+            Sale.user_id,
+        )
+        .where(*filters)
+        .order_by(Sale.id)
+    )
+
+
+def sale_item_rows_query(*filters: Any):
+    return (
+        select(
+            SaleItem.sale_id,
+            Sale.timestamp,
+            SaleItem.product_id,
+            SaleItem.product_name_snapshot,
+            SaleItem.product_category_snapshot,
+            Product.category.label("product_category"),
+            SaleItem.quantity,
+            SaleItem.subtotal,
+            SaleItem.unit_price,
+            SaleItem.unit_price_base,
+            Product.purchase_price,
+        )
+        .join(Sale, Sale.id == SaleItem.sale_id)
+        .outerjoin(Product, Product.id == SaleItem.product_id)
+        .where(*filters)
+        .order_by(SaleItem.sale_id, SaleItem.id)
+    )
+
+
+def sale_payment_rows_query(*filters: Any):
+    return (
+        select(
+            Sale.timestamp,
+            SalePayment.method_type,
+            SalePayment.payment_method_id,
+            SalePayment.amount,
+        )
+        .join(Sale, Sale.id == SalePayment.sale_id)
+        .where(*filters)
+    )
+
+
+def return_item_rows_query(*filters: Any):
+    return (
+        select(
+            SaleReturn.id.label("sale_return_id"),
+            SaleReturn.timestamp,
+            SaleReturn.refund_amount,
+            SaleReturnItem.quantity.label("return_quantity"),
+            SaleReturnItem.refund_subtotal,
+            SaleItem.product_id,
+            SaleItem.product_name_snapshot,
+            SaleItem.product_category_snapshot,
+            Product.category.label("product_category"),
+            Product.purchase_price,
+        )
+        .select_from(SaleReturn)
+        .outerjoin(SaleReturnItem, SaleReturnItem.sale_return_id == SaleReturn.id)
+        .outerjoin(SaleItem, SaleItem.id == SaleReturnItem.sale_item_id)
+        .outerjoin(Product, Product.id == SaleItem.product_id)
+        .where(*filters)
+        .order_by(SaleReturn.id, SaleReturnItem.id)
+    )
+
+
+def _sale_filters(company_id: int, branch_id: int, sale_id: int) -> tuple:
+    return (Sale.id == sale_id, Sale.company_id == company_id, Sale.branch_id == branch_id)
+
+
+def _range_filters(company_id: int, branch_id: int, start: datetime, end: datetime):
+    sale = (
+        Sale.company_id == company_id,
+        Sale.branch_id == branch_id,
+        Sale.timestamp >= start,
+        Sale.timestamp < end,
+        Sale.status != SaleStatus.cancelled,
+    )
+    returns = (
+        SaleReturn.company_id == company_id,
+        SaleReturn.branch_id == branch_id,
+        SaleReturn.timestamp >= start,
+        SaleReturn.timestamp < end,
+    )
+    return sale, returns
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Camino incremental (AsyncSession de sale/return service)
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+async def _async_delta_for_sale(session, company_id: int, branch_id: int, sale_id: int, sign: int):
+    clock = _clock_from_rows((await session.exec(_tenant_clock_query(company_id))).all(), branch_id)
+    delta = SalesRollupDelta(company_id, branch_id, clock)
+    filters = _sale_filters(company_id, branch_id, sale_id)
+    for row in (await session.exec(sale_rows_query(*filters))).all():
+        delta.add_sale(row, sign)
+    for row in (await session.exec(sale_item_rows_query(*filters))).all():
+        delta.add_sale_item(row, sign)
+    for row in (await session.exec(sale_payment_rows_query(*filters))).all():
+        delta.add_sale_payment(row, sign)
+    return delta
+
+
+async def apply_sale_to_rollup(session, sale_id: int, *, company_id: int, branch_id: int) -> None:
+    """Suma la venta recién flusheada a los rollups (misma transacción)."""
+    try:
+        delta = await _async_delta_for_sale(session, company_id, branch_id, sale_id, 1)
+        for stmt in delta.upsert_statements():
+            await session.execute(stmt)
+    except Exception:
+        logger.exception("Rollup de ventas: fallo al sumar venta #%s", sale_id)
+
+
+async def apply_return_to_rollup(
+    session,
+    sale_return_id: int,
+    *,
+    company_id: int,
+    branch_id: int,
+) -> None:
+    """Suma la devolución recién flusheada a los rollups (día de la devolución)."""
+    try:
+        clock = _clock_from_rows(
+            (await session.exec(_tenant_clock_query(company_id))).all(), branch_id
+        )
+        delta = SalesRollupDelta(company_id, branch_id, clock)
+        rows = (await session.exec(return_item_rows_query(
+            SaleReturn.id == sale_return_id,
+            SaleReturn.company_id == company_id,
+            SaleReturn.branch_id == branch_id,
+        ))).all()
+        for row in rows:
+            delta.add_return_item(row)
+        for stmt in delta.upsert_statements():
+            await session.execute(stmt)
+    except Exception:
+        logger.exception("Rollup de ventas: fallo al sumar devolución #%s", sale_return_id)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Sesión sync (ventas de reservas y anulación desde los states, rebuild y chequeo)
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+def resolve_tenant_clock(session, company_id: int, branch_id: int) -> TenantClock:
+    return _clock_from_rows(session.exec(_tenant_clock_query(company_id)).all(), branch_id)
+
+
+def _sync_delta_for_sale(session, company_id: int, branch_id: int, sale_id: int, sign: int):
+    delta = SalesRollupDelta(
+        company_id, branch_id, resolve_tenant_clock(session, company_id, branch_id)
+    )
+    filters = _sale_filters(company_id, branch_id, sale_id)
+    for row in session.exec(sale_rows_query(*filters)).all():
+        delta.add_sale(row, sign)
+    for row in session.exec(sale_item_rows_query(*filters)).all():
+        delta.add_sale_item(row, sign)
+    for row in session.exec(sale_payment_rows_query(*filters)).all():
+        delta.add_sale_payment(row, sign)
+    return delta
+
+
+def apply_sale_to_rollup_sync(session, sale_id: int, *, company_id: int, branch_id: int) -> None:
+    """Versión sync de :func:`apply_sale_to_rollup`.
+
+    Para las ventas que se registran fuera de ``process_sale`` (pagos y
+    adelantos de reservas): se llama con la venta y sus ítems/pagos ya
+    flusheados, justo antes del ``commit`` del caller.
+    """
+    try:
+        delta = _sync_delta_for_sale(session, company_id, branch_id, sale_id, 1)
+        for stmt in delta.upsert_statements():
+            session.execute(stmt)
+    except Exception:
+        logger.exception("Rollup de ventas: fallo al sumar venta #%s", sale_id)
+
+
+def apply_sale_cancellation_to_rollup(
+    session,
+    sale_id: int,
+    *,
+    company_id: int,
+    branch_id: int,
+) -> None:
+    """Resta la venta anulada de los rollups del día en que se vendió.
+
+    Sus devoluciones previas quedan: siguen contando en el día en que
+    ocurrieron, igual que en las queries crudas.
+    """
+    try:
+        delta = _sync_delta_for_sale(session, company_id, branch_id, sale_id, -1)
+        for stmt in delta.upsert_statements():
+            session.execute(stmt)
+    except Exception:
+        logger.exception("Rollup de ventas: fallo al restar venta anulada #%s", sale_id)
+
+
+def compute_sales_rollup(
+    session,
+    company_id: int,
+    branch_id: int,
+    start_day: date,
+    end_day: date,
+    *,
+    clock: TenantClock | None = None,
+) -> SalesRollupDelta:
+    """Recalcula desde las tablas de ventas los rollups de ``[start_day, end_day]``.
+
+    Recorre las filas en streaming (``yield_per``): memoria proporcional a
+    días × dimensiones, no a la cantidad de ventas.
+    """
+    clock = clock or resolve_tenant_clock(session, company_id, branch_id)
+    start, end = clock.day_bounds_utc(start_day, end_day)
+    sale_filters, return_filters = _range_filters(company_id, branch_id, start, end)
+    delta = SalesRollupDelta(company_id, branch_id, clock)
+    stream = {"yield_per": 2000}
+    for row in session.execute(sale_rows_query(*sale_filters).execution_options(**stream)):
+        delta.add_sale(row)
+    for row in session.execute(sale_item_rows_query(*sale_filters).execution_options(**stream)):
+        delta.add_sale_item(row)
+    for row in session.execute(sale_payment_rows_query(*sale_filters).execution_options(**stream)):
+        delta.add_sale_payment(row)
+    for row in session.execute(return_item_rows_query(*return_filters).execution_options(**stream)):
+        delta.add_return_item(row)
+    return delta
+
+
+def rebuild_sales_rollup(
+    session,
+    company_id: int,
+    branch_id: int,
+    start_day: date,
+    end_day: date,
+) -> int:
+    """Reemplaza los rollups de ``[start_day, end_day]`` por el recálculo.
+
+    Idempotente. No hace commit: el caller confirma (o revierte) todo junto.
+    Devuelve la cantidad de filas de rollup escritas.
+    """
+    delta = compute_sales_rollup(session, company_id, branch_id, start_day, end_day)
+    for model in ROLLUP_MODELS:
+        session.execute(
+            delete(model)
+            .where(model.company_id == company_id)
+            .where(model.branch_id == branch_id)
+            .where(model.day >= start_day)
+            .where(model.day <= end_day)
+        )
+    statements = delta.upsert_statements()
+    for stmt in statements:
+        session.execute(stmt)
+    return len(statements)
+
+
+def check_sales_rollup(
+    session,
+    company_id: int,
+    branch_id: int,
+    start_day: date,
+    end_day: date,
+) -> list[RollupMismatch]:
+    """Compara el rollup persistido contra el recálculo; lista vacía = consistente."""
+    expected = compute_sales_rollup(session, company_id, branch_id, start_day, end_day)
+    mismatches: list[RollupMismatch] = []
+    for model in ROLLUP_MODELS:
+        key_fields = _KEY_FIELDS[model]
+        value_fields = [
+            name
+            for name in model.__table__.c.keys()
+            if name not in {"id", "company_id", "branch_id", "updated_at", *key_fields}
+            and name not in _UNCHECKED_FIELDS
+        ]
+        actual: dict[tuple, Any] = {
+            tuple(getattr(row, name) for name in key_fields): row
+            for row in session.exec(
+                select(model)
+                .where(model.company_id == company_id)
+                .where(model.branch_id == branch_id)
+                .where(model.day >= start_day)
+                .where(model.day <= end_day)
+            ).all()
+        }
+        wanted = expected.buckets.get(model, {})
+        for key in sorted(set(actual) | set(wanted)):
+            row = actual.get(key)
+            values = wanted.get(key, {})
+            for name in value_fields:
+                want = Decimal(str(values.get(name, 0)))
+                have = Decimal(str(getattr(row, name, 0) or 0)) if row is not None else Decimal("0")
+                if want != have:
+                    mismatches.append(
+                        RollupMismatch(model.__tablename__, key, name, want, have)
+                    )
+    return mismatches
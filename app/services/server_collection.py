@@ -0,0 +1,266 @@
+"""Colecciones del lado servidor: el resultado completo fuera del state de Reflex.
+
+Cada evento re-serializa el state completo (vars y backend vars) a Redis, así
+que un listado de miles de filas guardado en el state se paga en cada clic de
+cada usuario conectado. Una :class:`ServerCollection` guarda las filas por
+sesión del navegador (``client_token``) y el state sólo conserva la página
+visible y el total:
+
+  * Con Redis (``REDIS_URL``) las filas van a una lista (``RPUSH`` pickleado
+    fila por fila) con TTL; una página es un ``LRANGE`` y refresca el TTL.
+  * Sin Redis, en un dict del proceso con el mismo TTL y tope LRU
+    (``SERVER_COLLECTION_MAX_LOCAL``).
+
+Los handlers async usan los métodos ``*_async`` (cliente ``redis.asyncio``,
+no frenan el event loop); los síncronos quedan para código que ya corre en
+un thread (``run_sync_db``).
+
+Si la colección venció (sesión inactiva más de
+``SERVER_COLLECTION_TTL_SECONDS``) :meth:`ServerCollection.page` devuelve
+``None`` y el state vuelve a consultar.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any
+
+from app.utils.redis_client import SharedRedis
+
+if TYPE_CHECKING:
+    import redis
+    import redis.asyncio as aioredis
+
+logger = logging.getLogger("ServerCollection")
+
+SERVER_COLLECTION_TTL_SECONDS = int(os.getenv("SERVER_COLLECTION_TTL_SECONDS", "1800"))
+SERVER_COLLECTION_MAX_LOCAL = int(os.getenv("SERVER_COLLECTION_MAX_LOCAL", "512"))
+
+_KEY_PREFIX = "server_collection"
+# Filas por RPUSH al guardar (acota el tamaño de cada comando).
+_PUSH_CHUNK = 500
+
+_lock = threading.Lock()
+_local: "OrderedDict[str, tuple[float, list[Any]]]" = OrderedDict()
+
+_redis = SharedRedis("colecciones", decode_responses=False, logger=logger)
+
+
+def _get_redis() -> "redis.Redis | None":
+    """Cliente Redis (bytes, sin decode); None = store local del proceso."""
+    return _redis.sync_client()
+
+
+def _get_async_redis() -> "aioredis.Redis | None":
+    """Cliente ``redis.asyncio`` del loop actual; None = store local del proceso."""
+    return _redis.async_client()
+
+
+def _dump_chunks(rows: list[Any]):
+    for start in range(0, len(rows), _PUSH_CHUNK):
+        yield [
+            pickle.dumps(row, pickle.HIGHEST_PROTOCOL)
+            for row in rows[start:start + _PUSH_CHUNK]
+        ]
+
+
+def _page_bounds(page: int, per_page: int) -> tuple[int, int]:
+    per_page = max(int(per_page), 1)
+    start = (max(int(page), 1) - 1) * per_page
+    return start, per_page
+
+
+def _local_get(key: str) -> list[Any] | None:
+    with _lock:
+        entry = _local.get(key)
+        if entry is None:
+            return None
+        expires_at, rows = entry
+        if expires_at <= time.monotonic():
+            del _local[key]
+            return None
+        _local[key] = (time.monotonic() + SERVER_COLLECTION_TTL_SECONDS, rows)
+        _local.move_to_end(key)
+        return rows
+
+
+def _local_set(key: str, rows: list[Any]) -> None:
+    with _lock:
+        _local[key] = (time.monotonic() + SERVER_COLLECTION_TTL_SECONDS, rows)
+        _local.move_to_end(key)
+        while len(_local) > max(1, SERVER_COLLECTION_MAX_LOCAL):
+            _local.popitem(last=False)
+
+
+def clear_server_collections() -> None:
+    """Vacía el store local completo (tests / mantenimiento)."""
+    with _lock:
+        _local.clear()
+
+
+class ServerCollection:
+    """Listado con nombre cuyas filas viven fuera del state, una copia por sesión.
+
+    Uso típico en un state::
+
+        _DEBTORS = ServerCollection("cuentas:debtors")
+
+        total = await _DEBTORS.replace_async(self._collection_token(), rows)
+        self.paginated_debtors = await _DEBTORS.page_async(token, page, per_page) or []
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def _key(self, token: str) -> str:
+        return f"{_KEY_PREFIX}:{self.name}:{token}"
+
+    def replace(self, token: str, rows: list[Any]) -> int:
+        """Reemplaza las filas de la sesión ``token``; devuelve el total."""
+        rows = list(rows)
+        key = self._key(token)
+        client = _get_redis()
+        if client is not None and not rows:
+            # Redis no guarda listas vacías: el vacío queda en el store local.
+            self.clear(token)
+        elif client is not None:
+            try:
+                pipe = client.pipeline(transaction=True)
+                pipe.delete(key)
+                for chunk in _dump_chunks(rows):
+                    pipe.rpush(key, *chunk)
+                pipe.expire(key, SERVER_COLLECTION_TTL_SECONDS)
+                pipe.execute()
+                return len(rows)
+            except Exception as exc:
+                logger.warning("No se pudo guardar colección %s en Redis: %s", self.name, exc)
+        _local_set(key, rows)
+        return len(rows)
+
+    async def replace_async(self, token: str, rows: list[Any]) -> int:
+        """:meth:`replace` para el event loop."""
+        rows = list(rows)
+        key = self._key(token)
+        client = _get_async_redis()
+        if client is not None and not rows:
+            await self.clear_async(token)
+        elif client is not None:
+            try:
+                pipe = client.pipeline(transaction=True)
+                pipe.delete(key)
+                for chunk in _dump_chunks(rows):
+                    pipe.rpush(key, *chunk)
+                pipe.expire(key, SERVER_COLLECTION_TTL_SECONDS)
+                await pipe.execute()
+                return len(rows)
+            except Exception as exc:
+                _redis.failed(exc)
+        _local_set(key, rows)
+        return len(rows)
+
+    def page(self, token: str, page: int, per_page: int) -> list[Any] | None:
+        """Filas de la página ``page`` (desde 1); ``None`` si la colección venció."""
+        start, per_page = _page_bounds(page, per_page)
+        key = self._key(token)
+        client = _get_redis()
+        if client is not None:
+            try:
+                pipe = client.pipeline(transaction=False)
+                pipe.exists(key)
+                pipe.lrange(key, start, start + per_page - 1)
+                pipe.expire(key, SERVER_COLLECTION_TTL_SECONDS)
+                exists, raw_rows, _ = pipe.execute()
+                if exists:
+                    return [pickle.loads(raw) for raw in raw_rows]
+            except Exception as exc:
+                logger.warning("No se pudo leer colección %s de Redis: %s", self.name, exc)
+        rows = _local_get(key)
+        if rows is None:
+            return None
+        return rows[start:start + per_page]
+
+    async def page_async(self, token: str, page: int, per_page: int) -> list[Any] | None:
+        """:meth:`page` para el event loop."""
+        start, per_page = _page_bounds(page, per_page)
+        key = self._key(token)
+        client = _get_async_redis()
+        if client is not None:
+            try:
+                pipe = client.pipeline(transaction=False)
+                pipe.exists(key)
+                pipe.lrange(key, start, start + per_page - 1)
+                pipe.expire(key, SERVER_COLLECTION_TTL_SECONDS)
+                exists, raw_rows, _ = await pipe.execute()
+                if exists:
+                    return [pickle.loads(raw) for raw in raw_rows]
+            except Exception as exc:
+                _redis.failed(exc)
+        rows = _local_get(key)
+        if rows is None:
+            return None
+        return rows[start:start + per_page]
+
+    def rows(self, token: str) -> list[Any] | None:
+        """Todas las filas (exports); ``None`` si la colección venció."""
+        key = self._key(token)
+        client = _get_redis()
+        if client is not None:
+            try:
+                if client.exists(key):
+                    return [pickle.loads(raw) for raw in client.lrange(key, 0, -1)]
+            except Exception as exc:
+                logger.warning("No se pudo leer colección %s de Redis: %s", self.name, exc)
+        rows = _local_get(key)
+        return None if rows is None else list(rows)
+
+    async def rows_async(self, token: str) -> list[Any] | None:
+        """:meth:`rows` para el event loop."""
+        key = self._key(token)
+        client = _get_async_redis()
+        if client is not None:
+            try:
+                pipe = client.pipeline(transaction=False)
+                pipe.exists(key)
+                pipe.lrange(key, 0, -1)
+                exists, raw_rows = await pipe.execute()
+                if exists:
+                    return [pickle.loads(raw) for raw in raw_rows]
+            except Exception as exc:
+                _redis.failed(exc)
+        rows = _local_get(key)
+        return None if rows is None else list(rows)
+
+    def clear(self, token: str) -> None:
+        key = self._key(token)
+        client = _get_redis()
+        if client is not None:
+            try:
+                client.delete(key)
+            except Exception as exc:
+                logger.warning("No se pudo borrar colección %s de Redis: %s", self.name, exc)
+        with _lock:
+            _local.pop(key, None)
+
+    async def clear_async(self, token: str) -> None:
+        """:meth:`clear` para el event loop."""
+        key = self._key(token)
+        client = _get_async_redis()
+        if client is not None:
+            try:
+                await client.delete(key)
+            except Exception as exc:
+                _redis.failed(exc)
+        with _lock:
+            _local.pop(key, None)
+
+
+def page_count(total: int, per_page: int) -> int:
+    """Páginas para ``total`` filas (mínimo 1, como la barra numérica)."""
+    if total <= 0:
+        return 1
+    per_page = max(int(per_page), 1)
+    return (total + per_page - 1) // per_page
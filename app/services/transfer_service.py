@@ -13,11 +13,23 @@ verdad que ``sale_service``: **lote > variante > producto**.
 ``product.stock`` es siempre un valor DERIVADO (SUM de variantes/lotes) y se
 recalcula tras cada mutación, igual que en la venta. Todo bajo
 ``with_for_update()`` para evitar lost-updates bajo concurrencia.
+
+La ejecución trabaja por conjuntos: bloquea las filas de origen con pocas
+queries ``IN`` en orden de id (mismo orden en toda transferencia → sin
+deadlocks entre transferencias concurrentes del mismo origen), precarga los
+espejos de destino por barcode/SKU y escribe kardex y lotes nuevos con
+INSERT masivo. Sólo los productos/variantes que aún no existen en destino se
+crean por ORM (necesitan id y avisan al cache de códigos); el resto de
+sentencias no crece con las líneas (``scripts/bench_stock_transfer.py``).
 """
 import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
 from decimal import Decimal
+from typing import Any, Iterable, Iterator
 
-from sqlalchemy import func
+from sqlalchemy import func, insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 from sqlmodel import select
@@ -33,6 +45,7 @@ from app.models import (
     Unit,
 )
 from app.models.inventory import TransferStatus
+from app.services.barcode_cache import barcode_key
 from app.services.sale_service import (
     StockError,
     _deduct_from_batches,
@@ -69,6 +82,136 @@ def _batch_query(company_id: int, branch_id: int, *, product_id, variant_id):
     )
 
 
+# Tamaño de las listas IN y de los bloques de INSERT masivo.
+TRANSFER_CHUNK_SIZE = 500
+
+
+@dataclass
+class _OriginMove:
+    """Lo que una línea sacó del origen (resuelto en memoria)."""
+    origin_product: Product
+    origin_variant: ProductVariant | None
+    quantity: Decimal
+    allows_decimal: bool
+    # (batch_number, expiration_date, cantidad tomada) en orden FEFO.
+    moved_batches: list[tuple[str, Any, Decimal]] = field(default_factory=list)
+
+
+def _chunked(values: Iterable) -> Iterator[list]:
+    """Valores únicos ordenados en bloques de ``TRANSFER_CHUNK_SIZE``.
+
+    El orden fijo hace que los ``FOR UPDATE`` tomen los locks siempre en la
+    misma secuencia.
+    """
+    ordered = sorted(set(values))
+    for start in range(0, len(ordered), TRANSFER_CHUNK_SIZE):
+        yield ordered[start:start + TRANSFER_CHUNK_SIZE]
+
+
+def _fefo_key(batch: ProductBatch) -> tuple:
+    """Mismo orden que :func:`_batch_query`: vencimiento (NULL al final), id."""
+    return (
+        batch.expiration_date is None,
+        batch.expiration_date or datetime.min,
+        batch.id or 0,
+    )
+
+
+def _batch_owner(batch: ProductBatch) -> tuple[str, int]:
+    if batch.product_variant_id is not None:
+        return ("variant", batch.product_variant_id)
+    return ("product", batch.product_id)
+
+
+def _dest_product_key(origin_product: Product) -> tuple[str, str]:
+    """Clave del espejo en destino: barcode, o descripción si no tiene.
+
+    Normalizada con :func:`barcode_key`: la BD compara sin distinguir
+    mayúsculas y devuelve el valor guardado en destino, no el de origen.
+    """
+    if origin_product.barcode:
+        return ("barcode", barcode_key(origin_product.barcode))
+    return ("description", barcode_key(origin_product.description))
+
+
+def _dest_variant_key(origin_variant: ProductVariant) -> str:
+    """Clave de la variante espejo en destino (SKU normalizado)."""
+    return barcode_key(origin_variant.sku)
+
+
+async def _lock_rows_by_id(session, model, company_id, branch_id, ids) -> dict:
+    """``SELECT … WHERE id IN (…) FOR UPDATE`` por bloques, en orden de id."""
+    rows = {}
+    for chunk in _chunked(ids):
+        result = await session.exec(
+            select(model)
+            .where(
+                model.id.in_(chunk),
+                model.company_id == company_id,
+                model.branch_id == branch_id,
+            )
+            .order_by(model.id)
+            .with_for_update()
+        )
+        rows.update({row.id: row for row in result.all()})
+    return rows
+
+
+async def _lock_owner_batches(
+    session, company_id, branch_id, *, product_ids, variant_ids, in_stock_only=False
+) -> dict[tuple[str, int], list[ProductBatch]]:
+    """Lotes de varios dueños bloqueados en orden de id, agrupados y en FEFO."""
+    filters = [
+        ProductBatch.company_id == company_id,
+        ProductBatch.branch_id == branch_id,
+    ]
+    if in_stock_only:
+        filters.append(ProductBatch.stock > 0)
+    owners: dict[tuple[str, int], list[ProductBatch]] = defaultdict(list)
+    owner_filters = (
+        (variant_ids, lambda chunk: [ProductBatch.product_variant_id.in_(chunk)]),
+        (
+            product_ids,
+            lambda chunk: [
+                ProductBatch.product_id.in_(chunk),
+                ProductBatch.product_variant_id.is_(None),
+            ],
+        ),
+    )
+    for ids, owner_filter in owner_filters:
+        for chunk in _chunked(ids):
+            result = await session.exec(
+                select(ProductBatch)
+                .where(*filters, *owner_filter(chunk))
+                .order_by(ProductBatch.id)
+                .with_for_update()
+            )
+            for batch in result.all():
+                owners[_batch_owner(batch)].append(batch)
+    for batches in owners.values():
+        batches.sort(key=_fefo_key)
+    return dict(owners)
+
+
+def _batch_row(batch: ProductBatch) -> dict:
+    return {
+        "company_id": batch.company_id,
+        "branch_id": batch.branch_id,
+        "batch_number": batch.batch_number,
+        "expiration_date": batch.expiration_date,
+        "stock": batch.stock,
+        "product_id": batch.product_id,
+        "product_variant_id": batch.product_variant_id,
+    }
+
+
+async def _bulk_insert(session, model, rows: list[dict]) -> None:
+    """INSERT executemany sobre la tabla (Core: sin eventos ni identity map)."""
+    stmt = insert(model.__table__)
+    for start in range(0, len(rows), TRANSFER_CHUNK_SIZE):
+        await session.exec(stmt, params=rows[start:start + TRANSFER_CHUNK_SIZE])
+
+
 class TransferService:
     """Operaciones de transferencia de stock entre sucursales."""
 
@@ -222,6 +365,13 @@ class TransferService:
         company_id: int,
         user_id: int | None = None,
     ) -> StockTransfer:
+        """Ejecuta una transferencia PENDING con sentencias por conjunto.
+
+        Salvo los espejos nuevos, las queries no escalan con las líneas: origen
+        bloqueado en orden de id con ``IN`` (productos → variantes → lotes),
+        destino precargado por barcode/SKU, movimientos resueltos en memoria en
+        el orden de los ítems y kardex + lotes nuevos con INSERT masivo.
+        """
         result = await session.exec(
             select(StockTransfer)
             .where(
@@ -242,154 +392,139 @@ class TransferService:
         now = utc_now_naive()
 
         # Nombres de sucursal para descripciones de kardex auto-explicativas.
-        origin_branch = await session.get(Branch, origin_id)
-        dest_branch = await session.get(Branch, dest_id)
-        origin_name = origin_branch.name if origin_branch else f"sucursal {origin_id}"
-        dest_name = dest_branch.name if dest_branch else f"sucursal {dest_id}"
+        branches = {
+            b.id: b.name
+            for b in (
+                await session.exec(select(Branch).where(Branch.id.in_([origin_id, dest_id])))
+            ).all()
+        }
+        origin_name = branches.get(origin_id) or f"sucursal {origin_id}"
+        dest_name = branches.get(dest_id) or f"sucursal {dest_id}"
 
         decimal_units = await TransferService._decimal_units(session, company_id, origin_id)
-        # Productos cuyo agregado debe recalcularse desde variantes al final.
-        origin_products_recalc: set[int] = set()
-        dest_products_recalc: set[int] = set()
+        items = list(transfer.items)
 
-        for item in transfer.items:
-            # ── ORIGEN: bloquear producto + (variante) + lotes ──
-            origin_product = (
-                await session.exec(
-                    select(Product)
-                    .where(
-                        Product.id == item.product_id,
-                        Product.company_id == company_id,
-                        Product.branch_id == origin_id,
-                    )
-                    .with_for_update()
-                )
-            ).first()
-            if not origin_product:
-                raise TransferError(
-                    f"Producto '{item.product_name_snapshot}' ya no existe en sucursal origen."
-                )
+        # ── ORIGEN: bloquear todo lo que toca la transferencia ──
+        origin_products = await _lock_rows_by_id(
+            session, Product, company_id, origin_id, [i.product_id for i in items]
+        )
+        origin_variants = await _lock_rows_by_id(
+            session,
+            ProductVariant,
+            company_id,
+            origin_id,
+            [i.product_variant_id for i in items if i.product_variant_id is not None],
+        )
+        origin_batches = await _lock_owner_batches(
+            session,
+            company_id,
+            origin_id,
+            product_ids=[
+                i.product_id for i in items
+                if i.product_variant_id is None and i.product_id in origin_products
+            ],
+            variant_ids=list(origin_variants),
+            in_stock_only=True,
+        )
 
-            allows_decimal = decimal_units.get(
-                (origin_product.unit or "").strip().lower(), False
+        moves = [
+            TransferService._deduct_origin(
+                item, origin_products, origin_variants, origin_batches, decimal_units
             )
-            qty = _round_quantity(item.quantity, allows_decimal)
-
-            origin_variant = None
-            if item.product_variant_id is not None:
-                origin_variant = (
-                    await session.exec(
-                        select(ProductVariant)
-                        .where(
-                            ProductVariant.id == item.product_variant_id,
-                            ProductVariant.company_id == company_id,
-                            ProductVariant.branch_id == origin_id,
-                        )
-                        .with_for_update()
-                    )
-                ).first()
-                if not origin_variant:
-                    raise TransferError(
-                        f"Variante de '{item.product_name_snapshot}' ya no existe en origen."
-                    )
+            for item in items
+        ]
+        origin_products_recalc = {
+            m.origin_product.id for m in moves if m.origin_variant is not None
+        }
+
+        # ── DESTINO: precargar espejos y crear los que falten ──
+        dest_products = await TransferService._resolve_dest_products(
+            session, company_id=company_id, dest_id=dest_id, moves=moves
+        )
+        dest_variants = await TransferService._resolve_dest_variants(
+            session,
+            company_id=company_id,
+            dest_id=dest_id,
+            moves=moves,
+            dest_products=dest_products,
+        )
+        batch_moves = [m for m in moves if m.moved_batches]
+        dest_batches = await _lock_owner_batches(
+            session,
+            company_id,
+            dest_id,
+            product_ids=[
+                dest_products[_dest_product_key(m.origin_product)].id
+                for m in batch_moves if m.origin_variant is None
+            ],
+            variant_ids=[
+                dest_variants[_dest_variant_key(m.origin_variant)].id
+                for m in batch_moves if m.origin_variant is not None
+            ],
+        )
+        batches_by_number = {
+            owner: {b.batch_number: b for b in batches}
+            for owner, batches in dest_batches.items()
+        }
 
-            origin_batches = (
-                await session.exec(
-                    _batch_query(
-                        company_id,
-                        origin_id,
-                        product_id=origin_product.id,
-                        variant_id=origin_variant.id if origin_variant else None,
-                    ).with_for_update()
-                )
-            ).all()
+        new_batches: list[ProductBatch] = []
+        movement_rows: list[dict] = []
+        dest_products_recalc: set[int] = set()
+        for move in moves:
+            qty = move.quantity
+            allows_decimal = move.allows_decimal
+            dest_product = dest_products[_dest_product_key(move.origin_product)]
+            dest_variant = (
+                dest_variants[_dest_variant_key(move.origin_variant)]
+                if move.origin_variant is not None
+                else None
+            )
 
-            # Deducción respetando la jerarquía + captura de lo tomado por lote.
-            moved_batches: list[tuple[str, object, Decimal]] = []
-            if origin_batches:
-                before = {b.id: _round_quantity(b.stock, allows_decimal) for b in origin_batches}
-                used = _deduct_from_batches(origin_batches, qty, allows_decimal)
-                for b in used:
-                    taken = before[b.id] - _round_quantity(b.stock, allows_decimal)
-                    if taken > 0:
-                        moved_batches.append((b.batch_number, b.expiration_date, taken))
-                    session.add(b)
-                if origin_variant:
-                    origin_variant.stock = _sum_batch_stock(origin_batches, allows_decimal)
-                    session.add(origin_variant)
-                    origin_products_recalc.add(origin_product.id)
-                else:
-                    origin_product.stock = _sum_batch_stock(origin_batches, allows_decimal)
-                    session.add(origin_product)
-            elif origin_variant:
-                new_stock = _round_quantity(origin_variant.stock, allows_decimal) - qty
-                if new_stock < 0:
-                    raise TransferError(
-                        f"Stock insuficiente de '{origin_variant.sku}' (concurrencia detectada)."
+            if move.moved_batches:
+                owner = ("variant", dest_variant.id) if dest_variant else ("product", dest_product.id)
+                owner_batches = batches_by_number.setdefault(owner, {})
+                for batch_number, expiration_date, taken in move.moved_batches:
+                    dest_batch = owner_batches.get(batch_number)
+                    if dest_batch is not None:
+                        dest_batch.stock = _round_quantity(dest_batch.stock, allows_decimal) + taken
+                        if expiration_date:
+                            dest_batch.expiration_date = expiration_date
+                        continue
+                    dest_batch = ProductBatch(
+                        company_id=company_id,
+                        branch_id=dest_id,
+                        batch_number=batch_number,
+                        expiration_date=expiration_date,
+                        stock=taken,
+                        product_id=None if dest_variant else dest_product.id,
+                        product_variant_id=dest_variant.id if dest_variant else None,
                     )
-                origin_variant.stock = new_stock
-                session.add(origin_variant)
-                origin_products_recalc.add(origin_product.id)
+                    owner_batches[batch_number] = dest_batch
+                    new_batches.append(dest_batch)
+                # El dueño (variante o producto) queda = suma de sus lotes.
+                total = _sum_batch_stock(list(owner_batches.values()), allows_decimal)
+                if dest_variant:
+                    dest_variant.stock = total
+                    dest_products_recalc.add(dest_product.id)
+                else:
+                    dest_product.stock = total
+            elif dest_variant is not None:
+                dest_variant.stock = _round_quantity(dest_variant.stock, allows_decimal) + qty
+                dest_products_recalc.add(dest_product.id)
             else:
-                new_stock = _round_quantity(origin_product.stock, allows_decimal) - qty
-                if new_stock < 0:
-                    raise TransferError(
-                        f"Stock insuficiente de '{origin_product.description}' "
-                        f"(concurrencia detectada)."
-                    )
-                origin_product.stock = new_stock
-                session.add(origin_product)
+                dest_product.stock = _round_quantity(dest_product.stock, allows_decimal) + qty
 
-            session.add(StockMovement(
+            movement_rows.append(dict(
                 company_id=company_id,
                 branch_id=origin_id,
-                product_id=origin_product.id,
+                product_id=move.origin_product.id,
                 user_id=user_id,
                 type="Transferencia Salida",
                 quantity=-qty,
                 description=f"Transferencia #{transfer.id} · hacia {dest_name}",
                 timestamp=now,
             ))
-
-            # ── DESTINO: resolver/crear producto (+variante) espejo ──
-            dest_product = await TransferService._resolve_dest_product(
-                session,
-                company_id=company_id,
-                dest_id=dest_id,
-                origin_product=origin_product,
-            )
-
-            dest_variant = None
-            if origin_variant is not None:
-                dest_variant = await TransferService._resolve_dest_variant(
-                    session,
-                    company_id=company_id,
-                    dest_id=dest_id,
-                    dest_product=dest_product,
-                    origin_variant=origin_variant,
-                )
-
-            if moved_batches:
-                await TransferService._apply_dest_batches(
-                    session,
-                    company_id=company_id,
-                    dest_id=dest_id,
-                    dest_product=dest_product,
-                    dest_variant=dest_variant,
-                    moved_batches=moved_batches,
-                    allows_decimal=allows_decimal,
-                )
-                if dest_variant:
-                    dest_products_recalc.add(dest_product.id)
-            elif dest_variant is not None:
-                dest_variant.stock = _round_quantity(dest_variant.stock, allows_decimal) + qty
-                session.add(dest_variant)
-                dest_products_recalc.add(dest_product.id)
-            else:
-                dest_product.stock = _round_quantity(dest_product.stock, allows_decimal) + qty
-                session.add(dest_product)
-
-            session.add(StockMovement(
+            movement_rows.append(dict(
                 company_id=company_id,
                 branch_id=dest_id,
                 product_id=dest_product.id,
@@ -400,13 +535,20 @@ class TransferService:
                 timestamp=now,
             ))
 
+        await _bulk_insert(session, ProductBatch, [_batch_row(b) for b in new_batches])
+        await _bulk_insert(session, StockMovement, movement_rows)
+
         # Recalcular product.stock = SUM(variantes) donde hubo variantes.
         await session.flush()
         await TransferService._recalc_products_from_variants(
-            session, company_id, origin_id, origin_products_recalc, decimal_units
+            session, company_id, origin_id,
+            {pid: origin_products[pid] for pid in origin_products_recalc},
+            decimal_units,
         )
         await TransferService._recalc_products_from_variants(
-            session, company_id, dest_id, dest_products_recalc, decimal_units
+            session, company_id, dest_id,
+            {p.id: p for p in dest_products.values() if p.id in dest_products_recalc},
+            decimal_units,
         )
 
         transfer.status = TransferStatus.COMPLETED
@@ -418,180 +560,226 @@ class TransferService:
         return transfer
 
     @staticmethod
-    async def _resolve_dest_product(session, *, company_id, dest_id, origin_product) -> Product:
-        # No filtramos por is_active: el barcode es UNIQUE por (empresa, sucursal,
-        # barcode) sin importar el estado. Si en el destino existe un producto
-        # BORRADO (soft-delete) con ese mismo barcode y lo ignoráramos, el INSERT
-        # posterior chocaría con la constraint y abortaría toda la transferencia.
-        dest_query = select(Product).where(
-            Product.company_id == company_id,
-            Product.branch_id == dest_id,
-        )
-        if origin_product.barcode:
-            dest_query = dest_query.where(Product.barcode == origin_product.barcode)
-        else:
-            dest_query = dest_query.where(
-                Product.description == origin_product.description,
-                Product.barcode == "",
+    def _deduct_origin(
+        item, origin_products, origin_variants, origin_batches, decimal_units
+    ) -> _OriginMove:
+        """Descuenta una línea en memoria respetando lote > variante > producto.
+
+        Las líneas repetidas comparten los objetos bloqueados, así que cada una
+        ve el stock que dejó la anterior (igual que con una query por línea).
+        """
+        origin_product = origin_products.get(item.product_id)
+        if not origin_product:
+            raise TransferError(
+                f"Producto '{item.product_name_snapshot}' ya no existe en sucursal origen."
             )
-        dest_product = (await session.exec(dest_query.with_for_update())).first()
-        if dest_product:
-            # Recibe stock nuevamente → si estaba borrado, se reactiva.
-            if not dest_product.is_active:
-                dest_product.is_active = True
-                session.add(dest_product)
-            return dest_product
-
-        dest_product = Product(
-            company_id=company_id,
-            branch_id=dest_id,
-            barcode=origin_product.barcode,
-            description=origin_product.description,
-            category=origin_product.category,
-            stock=Decimal("0.0000"),
-            unit=origin_product.unit,
-            purchase_price=origin_product.purchase_price,
-            sale_price=origin_product.sale_price,
-            is_active=True,
-            min_stock_alert=origin_product.min_stock_alert,
-            tax_included=origin_product.tax_included,
-            tax_rate=origin_product.tax_rate,
-            tax_category=origin_product.tax_category,
-            custom_profit_margin=origin_product.custom_profit_margin,
+
+        allows_decimal = decimal_units.get(
+            (origin_product.unit or "").strip().lower(), False
         )
-        session.add(dest_product)
-        await session.flush()
-        return dest_product
+        qty = _round_quantity(item.quantity, allows_decimal)
 
-    @staticmethod
-    async def _resolve_dest_variant(
-        session, *, company_id, dest_id, dest_product, origin_variant
-    ) -> ProductVariant:
-        dest_variant = (
-            await session.exec(
-                select(ProductVariant)
-                .where(
-                    ProductVariant.company_id == company_id,
-                    ProductVariant.branch_id == dest_id,
-                    ProductVariant.sku == origin_variant.sku,
+        origin_variant = None
+        if item.product_variant_id is not None:
+            origin_variant = origin_variants.get(item.product_variant_id)
+            if not origin_variant:
+                raise TransferError(
+                    f"Variante de '{item.product_name_snapshot}' ya no existe en origen."
                 )
-                .with_for_update()
-            )
-        ).first()
-        if dest_variant:
-            return dest_variant
 
-        dest_variant = ProductVariant(
-            company_id=company_id,
-            branch_id=dest_id,
-            product_id=dest_product.id,
-            sku=origin_variant.sku,
-            size=origin_variant.size,
-            color=origin_variant.color,
-            stock=Decimal("0.0000"),
-            min_stock_alert=origin_variant.min_stock_alert,
-            sale_price=origin_variant.sale_price,
-        )
-        session.add(dest_variant)
-        await session.flush()
-        return dest_variant
+        owner = ("variant", origin_variant.id) if origin_variant else ("product", origin_product.id)
+        batches = [b for b in origin_batches.get(owner, ()) if b.stock > 0]
 
-    @staticmethod
-    async def _apply_dest_batches(
-        session, *, company_id, dest_id, dest_product, dest_variant, moved_batches, allows_decimal
-    ) -> None:
-        variant_id = dest_variant.id if dest_variant else None
-        for batch_number, expiration_date, taken in moved_batches:
-            batch_stmt = select(ProductBatch).where(
-                ProductBatch.company_id == company_id,
-                ProductBatch.branch_id == dest_id,
-                ProductBatch.batch_number == batch_number,
-            )
-            if variant_id is not None:
-                batch_stmt = batch_stmt.where(
-                    ProductBatch.product_variant_id == variant_id
-                )
+        # Deducción respetando la jerarquía + captura de lo tomado por lote.
+        moved_batches: list[tuple[str, object, Decimal]] = []
+        if batches:
+            before = {b.id: _round_quantity(b.stock, allows_decimal) for b in batches}
+            used = _deduct_from_batches(batches, qty, allows_decimal)
+            for b in used:
+                taken = before[b.id] - _round_quantity(b.stock, allows_decimal)
+                if taken > 0:
+                    moved_batches.append((b.batch_number, b.expiration_date, taken))
+            if origin_variant:
+                origin_variant.stock = _sum_batch_stock(batches, allows_decimal)
             else:
-                batch_stmt = batch_stmt.where(
-                    ProductBatch.product_id == dest_product.id,
-                    ProductBatch.product_variant_id.is_(None),
+                origin_product.stock = _sum_batch_stock(batches, allows_decimal)
+        elif origin_variant:
+            new_stock = _round_quantity(origin_variant.stock, allows_decimal) - qty
+            if new_stock < 0:
+                raise TransferError(
+                    f"Stock insuficiente de '{origin_variant.sku}' (concurrencia detectada)."
                 )
-            dest_batch = (await session.exec(batch_stmt.with_for_update())).first()
-            if dest_batch:
-                dest_batch.stock = _round_quantity(dest_batch.stock, allows_decimal) + taken
-                if expiration_date:
-                    dest_batch.expiration_date = expiration_date
-            else:
-                dest_batch = ProductBatch(
-                    company_id=company_id,
-                    branch_id=dest_id,
-                    batch_number=batch_number,
-                    expiration_date=expiration_date,
-                    stock=taken,
-                    product_id=None if variant_id is not None else dest_product.id,
-                    product_variant_id=variant_id,
+            origin_variant.stock = new_stock
+        else:
+            new_stock = _round_quantity(origin_product.stock, allows_decimal) - qty
+            if new_stock < 0:
+                raise TransferError(
+                    f"Stock insuficiente de '{origin_product.description}' "
+                    f"(concurrencia detectada)."
                 )
-            session.add(dest_batch)
+            origin_product.stock = new_stock
+
+        return _OriginMove(
+            origin_product=origin_product,
+            origin_variant=origin_variant,
+            quantity=qty,
+            allows_decimal=allows_decimal,
+            moved_batches=moved_batches,
+        )
 
-        await session.flush()
-        # Recalcular el dueño (variante o producto) desde sus lotes.
-        owner_batches = (
-            await session.exec(
-                select(ProductBatch).where(
-                    ProductBatch.company_id == company_id,
-                    ProductBatch.branch_id == dest_id,
-                    (
-                        ProductBatch.product_variant_id == variant_id
-                        if variant_id is not None
-                        else (
-                            (ProductBatch.product_id == dest_product.id)
-                            & (ProductBatch.product_variant_id.is_(None))
-                        )
-                    ),
+    @staticmethod
+    async def _resolve_dest_products(session, *, company_id, dest_id, moves) -> dict:
+        """Productos espejo en destino por clave de :func:`_dest_product_key`.
+
+        No filtramos por is_active: el barcode es UNIQUE por (empresa, sucursal,
+        barcode) sin importar el estado. Si en el destino existe un producto
+        BORRADO (soft-delete) con ese mismo barcode y lo ignoráramos, el INSERT
+        posterior chocaría con la constraint y abortaría toda la transferencia.
+        """
+        origins: dict[tuple, Product] = {}
+        for move in moves:
+            origins.setdefault(_dest_product_key(move.origin_product), move.origin_product)
+
+        base = select(Product).where(
+            Product.company_id == company_id,
+            Product.branch_id == dest_id,
+        )
+        found: dict[tuple, Product] = {}
+        barcodes = [
+            origin.barcode for (kind, _value), origin in origins.items() if kind == "barcode"
+        ]
+        for chunk in _chunked(barcodes):
+            rows = (
+                await session.exec(
+                    base.where(Product.barcode.in_(chunk)).order_by(Product.id).with_for_update()
                 )
+            ).all()
+            for row in rows:
+                found.setdefault(("barcode", barcode_key(row.barcode)), row)
+        descriptions = [
+            origin.description
+            for (kind, _value), origin in origins.items()
+            if kind == "description"
+        ]
+        for chunk in _chunked(descriptions):
+            rows = (
+                await session.exec(
+                    base.where(Product.description.in_(chunk), Product.barcode == "")
+                    .order_by(Product.id)
+                    .with_for_update()
+                )
+            ).all()
+            for row in rows:
+                found.setdefault(("description", barcode_key(row.description)), row)
+
+        created = []
+        for key, origin_product in origins.items():
+            dest_product = found.get(key)
+            if dest_product:
+                # Recibe stock nuevamente → si estaba borrado, se reactiva.
+                if not dest_product.is_active:
+                    dest_product.is_active = True
+                continue
+            dest_product = Product(
+                company_id=company_id,
+                branch_id=dest_id,
+                barcode=origin_product.barcode,
+                description=origin_product.description,
+                category=origin_product.category,
+                stock=Decimal("0.0000"),
+                unit=origin_product.unit,
+                purchase_price=origin_product.purchase_price,
+                sale_price=origin_product.sale_price,
+                is_active=True,
+                min_stock_alert=origin_product.min_stock_alert,
+                tax_included=origin_product.tax_included,
+                tax_rate=origin_product.tax_rate,
+                tax_category=origin_product.tax_category,
+                custom_profit_margin=origin_product.custom_profit_margin,
             )
-        ).all()
-        total = _sum_batch_stock(owner_batches, allows_decimal)
-        if dest_variant:
-            dest_variant.stock = total
-            session.add(dest_variant)
-        else:
-            dest_product.stock = total
-            session.add(dest_product)
+            found[key] = dest_product
+            created.append(dest_product)
+        if created:
+            session.add_all(created)
+            await session.flush()
+        return found
 
     @staticmethod
-    async def _recalc_products_from_variants(
-        session, company_id, branch_id, product_ids, decimal_units
-    ) -> None:
-        for product_id in product_ids:
-            product = (
+    async def _resolve_dest_variants(
+        session, *, company_id, dest_id, moves, dest_products
+    ) -> dict:
+        """Variantes espejo en destino por :func:`_dest_variant_key`; crea las que falten."""
+        origins: dict[str, tuple[ProductVariant, Product]] = {}
+        for move in moves:
+            if move.origin_variant is not None:
+                origins.setdefault(
+                    _dest_variant_key(move.origin_variant),
+                    (move.origin_variant, dest_products[_dest_product_key(move.origin_product)]),
+                )
+        found: dict[str, ProductVariant] = {}
+        skus = [origin_variant.sku for origin_variant, _dest_product in origins.values()]
+        for chunk in _chunked(skus):
+            rows = (
                 await session.exec(
-                    select(Product).where(
-                        Product.id == product_id,
-                        Product.company_id == company_id,
-                        Product.branch_id == branch_id,
+                    select(ProductVariant)
+                    .where(
+                        ProductVariant.company_id == company_id,
+                        ProductVariant.branch_id == dest_id,
+                        ProductVariant.sku.in_(chunk),
                     )
+                    .order_by(ProductVariant.id)
+                    .with_for_update()
                 )
-            ).first()
-            if not product:
+            ).all()
+            for row in rows:
+                found.setdefault(barcode_key(row.sku), row)
+
+        created = []
+        for key, (origin_variant, dest_product) in origins.items():
+            if key in found:
                 continue
-            total_row = (
+            dest_variant = ProductVariant(
+                company_id=company_id,
+                branch_id=dest_id,
+                product_id=dest_product.id,
+                sku=origin_variant.sku,
+                size=origin_variant.size,
+                color=origin_variant.color,
+                stock=Decimal("0.0000"),
+                min_stock_alert=origin_variant.min_stock_alert,
+                sale_price=origin_variant.sale_price,
+            )
+            found[key] = dest_variant
+            created.append(dest_variant)
+        if created:
+            session.add_all(created)
+            await session.flush()
+        return found
+
+    @staticmethod
+    async def _recalc_products_from_variants(
+        session, company_id, branch_id, products, decimal_units
+    ) -> None:
+        """``product.stock`` = SUM(variantes) con una query agrupada por bloque."""
+        totals: dict[int, Decimal] = {}
+        for chunk in _chunked(products):
+            rows = (
                 await session.exec(
-                    select(func.coalesce(func.sum(ProductVariant.stock), 0)).where(
-                        ProductVariant.product_id == product_id,
+                    select(ProductVariant.product_id, func.sum(ProductVariant.stock))
+                    .where(
+                        ProductVariant.product_id.in_(chunk),
                         ProductVariant.company_id == company_id,
                         ProductVariant.branch_id == branch_id,
                     )
+                    .group_by(ProductVariant.product_id)
                 )
-            ).first()
-            if total_row is None:
-                total_stock = Decimal("0.0000")
-            elif isinstance(total_row, tuple):
-                total_stock = total_row[0]
-            else:
-                total_stock = total_row
+            ).all()
+            totals.update({product_id: total for product_id, total in rows})
+        for product_id, product in products.items():
             allows_decimal = decimal_units.get((product.unit or "").strip().lower(), False)
-            product.stock = _round_quantity(total_stock, allows_decimal)
+            product.stock = _round_quantity(
+                totals.get(product_id) or Decimal("0.0000"), allows_decimal
+            )
             session.add(product)
 
     @staticmethod
@@ -41,6 +41,8 @@ from app.states.auth_state import (
 )
 from app.utils.db import AsyncSessionLocal, get_async_session
 from app.utils.db_seeds import init_payment_methods
+from app.services.sale_service import warm_barcode_cache
+from app.utils.state_size import record_state_size
 from app.utils.tenant import tenant_bypass
 from app.utils.logger import get_logger
 
@@ -96,6 +98,11 @@ class State(RootState):
     _last_config_data_load_ts: float = rx.field(default=0.0, is_var=False)
     _PAGE_DATA_TTL: float = rx.field(default=15.0, is_var=False)
 
+    def _serialize(self) -> bytes:
+        payload = super()._serialize()
+        record_state_size(self.get_full_name(), len(payload), values=self.__getstate__)
+        return payload
+
     @rx.event
     def notify(self, message: str, type: str = "info"):
         normalized_type = (type or "info").strip().lower()
@@ -459,6 +466,20 @@ class State(RootState):
                 self._last_users_load_ts = now
                 self.load_users()
 
+    @rx.event(background=True)
+    async def bg_warm_barcode_cache(self):
+        """Background: precarga el cache de códigos de la sucursal para /venta."""
+        async with self:
+            company_id = self._company_id()
+            branch_id = self._branch_id()
+        if not company_id or not branch_id:
+            return
+        try:
+            await warm_barcode_cache(company_id, branch_id)
+        except Exception:
+            # Sin precarga el escaneo sigue funcionando (consulta y cachea).
+            _logger.warning("No se pudo precargar el cache de códigos", exc_info=True)
+
     @rx.event
     async def handle_cross_tab_runtime_sync(self):
         """Refresca estado en caliente cuando otra pestaña cambia configuración."""
@@ -696,6 +717,8 @@ class State(RootState):
             self.load_billing_config()
         # Delta parcial: renderiza la UI de inmediato
         yield
+        # Códigos de barras en memoria antes del primer escaneo.
+        yield State.bg_warm_barcode_cache
 
     @rx.event
     async def page_init_caja(self):
@@ -738,9 +761,9 @@ class State(RootState):
         redirect = self.run_common_guards()
         if redirect:
             yield redirect
-        # Carga explícita de clientes (tenant-aware). load_clients es sync.
+        # Carga explícita de clientes (tenant-aware).
         if hasattr(self, "load_clients"):
-            self.load_clients()
+            await self.load_clients()
         yield
 
     @rx.event
@@ -53,12 +53,21 @@ from app.utils.auth import (
 from app.utils.logger import get_logger
 from app.utils.tenant import set_tenant_context, tenant_bypass
 from app.utils.timezone import country_today_date, utc_now_naive
-from app.utils.rate_limit import (
-    is_rate_limited as _is_rate_limited,
-    record_failed_attempt as _record_failed_attempt,
-    clear_login_attempts as _clear_login_attempts,
-    remaining_lockout_time as _remaining_lockout_time,
+from app.utils.async_rate_limit import (
+    is_rate_limited_async as _is_rate_limited,
+    record_failed_attempt_async as _record_failed_attempt,
+    clear_login_attempts_async as _clear_login_attempts,
+    remaining_lockout_time_async as _remaining_lockout_time,
 )
+from app.utils.login_pipeline import (
+    LoginBusyError,
+    forget_verified_tokens,
+    get_verified_token,
+    hash_password as _hash_password,
+    remember_verified_token,
+    verify_password_candidates as _verify_password_candidates,
+)
+from app.utils.sync_db import run_sync_db
 from app.i18n import MSG
 from app.utils.validators import validate_email, validate_password
 from app.constants import (
@@ -358,6 +367,15 @@ class AuthState(MixinState):
         except (TypeError, ValueError):
             token_version = 0
 
+        # Fast path: el mismo JWT ya se resolvió en este proceso (reconexión).
+        verified = get_verified_token(self.token)
+        if verified is not None:
+            set_tenant_context(verified.get("company_id"), verified.get("branch_id"))
+            self._cached_user = verified
+            self._cached_user_token = self.token
+            self._cached_user_time = now
+            return
+
         user_id = None
         try:
             user_id = int(subject_str)
@@ -420,6 +438,7 @@ class AuthState(MixinState):
                             else ""
                         ),
                     }
+                    remember_verified_token(self.token, self._cached_user)
             else:
                 self._cached_user = self._guest_user()
 
@@ -950,6 +969,9 @@ class AuthState(MixinState):
 
     def invalidate_user_cache(self) -> None:
         """Invalida el cache de usuario (llamar tras cambios de permisos)."""
+        cached_id = (self._cached_user or {}).get("id")
+        if cached_id or self.token:
+            forget_verified_tokens(cached_id, token=self.token or None)
         self._cached_user = None
         self._cached_user_token = ""
         self._cached_user_time = 0.0
@@ -1302,6 +1324,20 @@ class AuthState(MixinState):
             session.add(role)
         return role
 
+    def _forget_role_tokens(self, session, role_id: int | None) -> None:
+        """Descarta los snapshots de JWT de los usuarios del rol (tras el commit).
+
+        Los privilegios viven en el snapshot: sin esto el fast path de
+        ``_resolve_current_user`` los serviría desactualizados.
+        """
+        if not role_id:
+            return
+        user_ids = session.exec(
+            select(UserModel.id).where(UserModel.role_id == role_id)
+        ).all()
+        for user_id in user_ids:
+            forget_verified_tokens(user_id)
+
     def _bootstrap_default_roles(self, session, company_id: int | None):
         scoped_company_id = int(company_id) if company_id else None
         # Siempre asegurar catálogo de permisos global.
@@ -1848,12 +1884,12 @@ class AuthState(MixinState):
 
         current = getattr(self, "current_page", "")
         if current == "Dashboard" and hasattr(self, "load_dashboard"):
-            self.load_dashboard()
+            yield type(self).load_dashboard
         elif current == "Gestion de Caja":
             if hasattr(self, "_refresh_cashbox_caches"):
                 self._refresh_cashbox_caches()
         elif current == "Historial" and hasattr(self, "reload_history"):
-            self.reload_history()
+            yield type(self).reload_history
         elif current == "Inventario":
             pass  # triggers reactivos ya invalidan
         elif current == "Compras" and hasattr(self, "load_suppliers"):
@@ -1871,7 +1907,7 @@ class AuthState(MixinState):
             if hasattr(self, "load_config_data"):
                 self.load_config_data()
         elif current == "Clientes" and hasattr(self, "load_clients"):
-            self.load_clients()
+            await self.load_clients()
         elif current == "Cuentas Corrientes" and hasattr(self, "load_debtors"):
             yield type(self).load_debtors
 
@@ -1906,19 +1942,7 @@ class AuthState(MixinState):
         yield rx.toast(MSG.AUTH_BRANCH_UPDATED, duration=2000)
         yield rx.redirect(current_path)
 
-    @rx.event
-    def login(self, form_data: dict):
-        self.is_login_loading = True
-        self.error_message = ""
-        identifier = (
-            form_data.get("email")
-            or form_data.get("identifier")
-            or form_data.get("username")
-            or ""
-        ).strip().lower()
-        raw_password = form_data.get("password") or ""
-        password = raw_password.encode("utf-8")
-
+    def _login_client_ip(self) -> str | None:
         client_ip = None
         router = getattr(self, "router", None)
         session_ctx = getattr(router, "session", None)
@@ -1936,10 +1960,281 @@ class AuthState(MixinState):
                 or headers.get("x-real-ip")
                 or client_ip
             )
+        return client_ip
+
+    def _login_fast_path(self, identifier: str) -> str | None:
+        """Ruta de redirección si el token actual ya pertenece a ``identifier``.
+
+        Reenvíos del formulario tras una reconexión llegan con un JWT vigente:
+        no se repite bcrypt ni la carga de usuario.
+        """
+        if not self.token or not identifier or not decode_token(self.token):
+            return None
+        user = get_verified_token(self.token)
+        if user is None:
+            return None
+        if identifier not in {
+            str(user.get("username") or "").lower(),
+            str(user.get("email") or "").lower(),
+        }:
+            return None
+        # Suscripción suspendida o prueba vencida: login completo, que además
+        # marca la suspensión en BD y rutea a la pantalla correspondiente.
+        if self._subscription_block_route() is not None:
+            return None
+        return self._post_login_route(bool(user.get("must_change_password")))
+
+    def _subscription_block_route(self) -> str | None:
+        """Pantalla de bloqueo según ``subscription_snapshot``, o None si está activa."""
+        snapshot = self.subscription_snapshot or {}
+        status_label = str(snapshot.get("status_label", "") or "").strip().lower()
+        if bool(snapshot.get("is_trial")) and status_label == "vencido":
+            return "/periodo-prueba-finalizado"
+        if (not bool(snapshot.get("is_trial"))) and status_label in ("suspendido", "pago vencido"):
+            return "/cuenta-suspendida"
+        return None
+
+    def _post_login_route(self, must_change_password: bool) -> str:
+        """Destino tras iniciar sesión (compartido por login completo y fast path)."""
+        blocked = self._subscription_block_route()
+        if blocked:
+            return blocked
+        if must_change_password:
+            return "/cambiar-clave"
+        return "/dashboard"
+
+    def _load_login_candidates(self, identifier: str) -> Dict[str, Any]:
+        """Admin existente + candidatos (id, hash) para ``identifier`` (síncrono)."""
+        with rx.session() as session:
+            session.info["tenant_bypass"] = True
+            admin_exists = session.exec(
+                select(UserModel.id)
+                .where(UserModel.username == "admin")
+                .execution_options(tenant_bypass=True)
+            ).first() is not None
+            column = UserModel.email if "@" in identifier else UserModel.username
+            rows = session.exec(
+                select(UserModel.id, UserModel.password_hash)
+                .where(column == identifier)
+                .execution_options(tenant_bypass=True)
+            ).all()
+        if "@" in identifier:
+            rows = rows[:1]
+        return {
+            "admin_exists": admin_exists,
+            "candidates": [(row[0], row[1] or "") for row in rows],
+        }
+
+    def _create_initial_admin(self, password_hash: str, env: str) -> str:
+        """Crea el superadmin inicial y abre su sesión (síncrono, para ``run_sync_db``)."""
+        with rx.session() as session:
+            session.info["tenant_bypass"] = True
+            # Crear superadmin asociado a un tenant válido.
+            company, branch = self._get_or_create_bootstrap_company_and_branch(
+                session
+            )
+            role = self._get_role_by_name(
+                session,
+                "Superadmin",
+                company_id=company.id,
+            )
+            if not role:
+                role = self._ensure_role(
+                    session,
+                    "Superadmin",
+                    self._normalize_privileges(SUPERADMIN_PRIVILEGES),
+                    company_id=company.id,
+                    overwrite=True,
+                )
+            must_change_password = env == "prod"
+            admin_user = UserModel(
+                username="admin",
+                password_hash=password_hash,
+                role_id=role.id,
+                company_id=company.id,
+                branch_id=branch.id,
+                must_change_password=must_change_password,
+            )
+            session.add(admin_user)
+            session.flush()
+            session.add(
+                UserBranch(user_id=admin_user.id, branch_id=branch.id)
+            )
+            session.commit()
+
+            _tv = getattr(admin_user, "token_version", 0)
+            _cid = getattr(admin_user, "company_id", None)
+            _bid = getattr(admin_user, "branch_id", None)
+            self.token = create_access_token(
+                admin_user.id, token_version=_tv, company_id=_cid, branch_id=_bid,
+            )
+            self.refresh_token = create_refresh_token(
+                admin_user.id, token_version=_tv, company_id=_cid,
+            )
+            self.selected_branch_id = str(branch.id)
+        self._resolve_current_user()
+        self.refresh_auth_runtime_cache()
+        if hasattr(self, "refresh_cashbox_status"):
+            self.refresh_cashbox_status()
+        self.error_message = ""
+        self.password_change_error = ""
+        self.needs_initial_admin = False
+        if must_change_password:
+            return "/cambiar-clave"
+        return "/dashboard"
+
+    def _complete_login(self, user_id: int) -> str | None:
+        """Carga usuario, rol, empresa y sucursales en una sola sesión y abre la
+        sesión (síncrono, para ``run_sync_db``).
+
+        Devuelve la ruta de destino, o None con ``error_message`` cargado.
+        """
+        with rx.session() as session:
+            session.info["tenant_bypass"] = True
+            user = session.exec(
+                select(UserModel)
+                .options(selectinload(UserModel.role).selectinload(Role.permissions))
+                .where(UserModel.id == user_id)
+                .execution_options(tenant_bypass=True)
+            ).first()
+            if user is None:
+                self.error_message = "Usuario o contraseña incorrectos."
+                return None
+            if not user.is_active:
+                self.error_message = "Usuario inactivo. Contacte al administrador."
+                return None
+
+            # Verificar que la empresa esté activa y la suscripción vigente
+            user_company = session.exec(
+                select(Company).where(Company.id == user.company_id)
+                .execution_options(tenant_bypass=True)
+            ).first()
+            if user_company:
+                today = self._company_today_for_id(session, user_company.id)
+                plan_type = getattr(user_company, "plan_type", "") or ""
+                if hasattr(plan_type, "value"):
+                    plan_type = plan_type.value
+                plan_type = str(plan_type).strip().lower()
+                is_trial = plan_type == "trial"
+
+                if is_trial:
+                    trial_end = getattr(user_company, "trial_ends_at", None)
+                    if not trial_end or trial_end.date() < today:
+                        # Auto-suspender en DB (sin bloquear login;
+                        # la redirección se maneja post-login vía snapshot)
+                        sub_st = getattr(user_company, "subscription_status", "")
+                        if hasattr(sub_st, "value"):
+                            sub_st = sub_st.value
+                        if str(sub_st) != SubscriptionStatus.SUSPENDED.value:
+                            user_company.subscription_status = SubscriptionStatus.SUSPENDED.value
+                            user_company.is_active = False
+                            session.add(user_company)
+                            session.commit()
+                else:
+                    sub_end = getattr(user_company, "subscription_ends_at", None)
+                    sub_st = getattr(user_company, "subscription_status", "")
+                    if hasattr(sub_st, "value"):
+                        sub_st = sub_st.value
+                    sub_st = str(sub_st).strip().lower()
+                    if sub_st == SubscriptionStatus.SUSPENDED.value or (
+                        sub_end and sub_end.date() < today
+                    ):
+                        # Auto-suspender en DB si aún no lo está
+                        if sub_st != SubscriptionStatus.SUSPENDED.value:
+                            user_company.subscription_status = SubscriptionStatus.SUSPENDED.value
+                            user_company.is_active = False
+                            session.add(user_company)
+                            session.commit()
+
+            if not user.role_id:
+                fallback_role = (
+                    "Superadmin" if user.username == "admin" else "Usuario"
+                )
+                role = self._get_role_by_name(
+                    session,
+                    fallback_role,
+                    company_id=getattr(user, "company_id", None),
+                )
+                if not role:
+                    default_privileges = (
+                        SUPERADMIN_PRIVILEGES
+                        if fallback_role == "Superadmin"
+                        else DEFAULT_USER_PRIVILEGES
+                    )
+                    role = self._ensure_role(
+                        session,
+                        fallback_role,
+                        self._normalize_privileges(default_privileges),
+                        company_id=getattr(user, "company_id", None),
+                        overwrite=True,
+                    )
+                user.role_id = role.id
+                session.add(user)
+                session.commit()
+
+            _tv = getattr(user, "token_version", 0)
+            _cid = getattr(user, "company_id", None)
+            _bid = getattr(user, "branch_id", None)
+            self.token = create_access_token(
+                user.id, token_version=_tv, company_id=_cid, branch_id=_bid,
+            )
+            self.refresh_token = create_refresh_token(
+                user.id, token_version=_tv, company_id=_cid,
+            )
+            branch_ids, branch_access_changed = self._ensure_user_branch_access(session, user)
+            if branch_access_changed:
+                session.commit()
+            selected_branch = self._select_default_branch(
+                session, user, branch_ids
+            )
+            self.selected_branch_id = (
+                str(selected_branch) if selected_branch else ""
+            )
+            self._resolve_current_user()
+            self.refresh_auth_runtime_cache()
+            if hasattr(self, "refresh_cashbox_status"):
+                self.refresh_cashbox_status()
+            if hasattr(self, "load_settings"):
+                self.load_settings()
+            if hasattr(self, "load_config_data"):
+                self.load_config_data()
+            self.error_message = ""
+            self.password_change_error = ""
+            self._load_roles_cache(
+                session,
+                company_id=getattr(user, "company_id", None),
+            )
+            must_change_password = bool(getattr(user, "must_change_password", False))
+        return self._post_login_route(must_change_password)
+
+    @rx.event
+    async def login(self, form_data: dict):
+        """Login sin bloquear el event loop.
+
+        Rate limit con Redis async, bcrypt en el pool acotado de
+        :mod:`app.utils.login_pipeline` y la carga de usuario/rol/sucursales
+        en un solo viaje al pool sync (``run_sync_db``).
+        """
+        self.is_login_loading = True
+        self.error_message = ""
+        identifier = (
+            form_data.get("email")
+            or form_data.get("identifier")
+            or form_data.get("username")
+            or ""
+        ).strip().lower()
+        raw_password = form_data.get("password") or ""
+        password = raw_password.encode("utf-8")
+        client_ip = self._login_client_ip()
+
+        fast_target = self._login_fast_path(identifier)
+        if fast_target:
+            self.is_login_loading = False
+            return rx.call_script(f"window.location.assign('{fast_target}')")
 
         # Rate limiting: verificar si el usuario está bloqueado
-        if _is_rate_limited(identifier, ip_address=client_ip):
-            remaining = _remaining_lockout_time(identifier, ip_address=client_ip)
+        if await _is_rate_limited(identifier, ip_address=client_ip):
+            remaining = await _remaining_lockout_time(identifier, ip_address=client_ip)
             self.error_message = (
                 f"Demasiados intentos fallidos. Espere {remaining} minuto(s)."
             )
@@ -1950,17 +2245,14 @@ class AuthState(MixinState):
             )
             return
 
-        with rx.session() as session:
-            session.info["tenant_bypass"] = True
-            admin_user = session.exec(
-                select(UserModel)
-                .where(UserModel.username == "admin")
-                .execution_options(tenant_bypass=True)
-            ).first()
-            if admin_user and self.needs_initial_admin:
-                self.needs_initial_admin = False
+        lookup = await run_sync_db(
+            self._load_login_candidates, identifier, operation="login_lookup"
+        )
+        if lookup["admin_exists"] and self.needs_initial_admin:
+            self.needs_initial_admin = False
 
-            if self.needs_initial_admin and not admin_user:
+        try:
+            if self.needs_initial_admin and not lookup["admin_exists"]:
                 env = self._resolve_env()
                 initial_password = self._initial_admin_password()
                 if not initial_password:
@@ -1976,228 +2268,54 @@ class AuthState(MixinState):
                         return
 
                 if identifier == "admin" and raw_password == initial_password:
-                    # Crear superadmin asociado a un tenant válido.
-                    company, branch = self._get_or_create_bootstrap_company_and_branch(
-                        session
+                    password_hash = await _hash_password(password)
+                    target = await run_sync_db(
+                        self._create_initial_admin,
+                        password_hash,
+                        env,
+                        operation="login_initial_admin",
                     )
-                    password_hash = bcrypt.hashpw(
-                        password, bcrypt.gensalt()
-                    ).decode()
-                    role = self._get_role_by_name(
-                        session,
-                        "Superadmin",
-                        company_id=company.id,
-                    )
-                    if not role:
-                        role = self._ensure_role(
-                            session,
-                            "Superadmin",
-                            self._normalize_privileges(SUPERADMIN_PRIVILEGES),
-                            company_id=company.id,
-                            overwrite=True,
-                        )
-                    must_change_password = env == "prod"
-                    admin_user = UserModel(
-                        username="admin",
-                        password_hash=password_hash,
-                        role_id=role.id,
-                        company_id=company.id,
-                        branch_id=branch.id,
-                        must_change_password=must_change_password,
-                    )
-                    session.add(admin_user)
-                    session.flush()
-                    session.add(
-                        UserBranch(user_id=admin_user.id, branch_id=branch.id)
-                    )
-                    session.commit()
-
-                    _clear_login_attempts(identifier, ip_address=client_ip)
-                    _tv = getattr(admin_user, "token_version", 0)
-                    _cid = getattr(admin_user, "company_id", None)
-                    _bid = getattr(admin_user, "branch_id", None)
-                    self.token = create_access_token(
-                        admin_user.id, token_version=_tv, company_id=_cid, branch_id=_bid,
-                    )
-                    self.refresh_token = create_refresh_token(
-                        admin_user.id, token_version=_tv, company_id=_cid,
-                    )
-                    self.selected_branch_id = str(branch.id)
-                    self._resolve_current_user()
-                    self.refresh_auth_runtime_cache()
-                    if hasattr(self, "refresh_cashbox_status"):
-                        self.refresh_cashbox_status()
-                    self.error_message = ""
-                    self.password_change_error = ""
-                    self.needs_initial_admin = False
-                    self.is_login_loading = False
-                    if must_change_password:
-                        return rx.call_script("window.location.assign('/cambiar-clave')")
-                    return rx.call_script("window.location.assign('/dashboard')")
-
-                _record_failed_attempt(identifier, ip_address=client_ip)
+                    await _clear_login_attempts(identifier, ip_address=client_ip)
+                    return rx.call_script(f"window.location.assign('{target}')")
+
+                await _record_failed_attempt(identifier, ip_address=client_ip)
                 self.error_message = (
                     "Sistema no inicializado. Ingrese la contraseña inicial."
                 )
                 return
 
-            user = None
-            password_ok = False
-            if "@" in identifier:
-                user = session.exec(
-                    select(UserModel)
-                    .where(UserModel.email == identifier)
-                    .execution_options(tenant_bypass=True)
-                ).first()
-                if user and bcrypt.checkpw(password, user.password_hash.encode("utf-8")):
-                    password_ok = True
-            else:
-                users = session.exec(
-                    select(UserModel)
-                    .where(UserModel.username == identifier)
-                    .execution_options(tenant_bypass=True)
-                ).all()
-                if users:
-                    matches = [
-                        candidate
-                        for candidate in users
-                        if bcrypt.checkpw(
-                            password, candidate.password_hash.encode("utf-8")
-                        )
-                    ]
-                    if len(matches) > 1:
-                        self.error_message = (
-                            "Hay mas de un usuario con ese nombre. Inicie sesion con su correo."
-                        )
-                        self.is_login_loading = False
-                        return
-                    if len(matches) == 1:
-                        user = matches[0]
-                        password_ok = True
-
-            if user and password_ok:
-                if not user.is_active:
-                    self.error_message = "Usuario inactivo. Contacte al administrador."
-                    self.is_login_loading = False
-                    return
-
-                # Verificar que la empresa esté activa y la suscripción vigente
-                user_company = session.exec(
-                    select(Company).where(Company.id == user.company_id)
-                    .execution_options(tenant_bypass=True)
-                ).first()
-                if user_company:
-                    today = self._company_today_for_id(session, user_company.id)
-                    plan_type = getattr(user_company, "plan_type", "") or ""
-                    if hasattr(plan_type, "value"):
-                        plan_type = plan_type.value
-                    plan_type = str(plan_type).strip().lower()
-                    is_trial = plan_type == "trial"
-
-                    if is_trial:
-                        trial_end = getattr(user_company, "trial_ends_at", None)
-                        if not trial_end or trial_end.date() < today:
-                            # Auto-suspender en DB (sin bloquear login;
-                            # la redirección se maneja post-login vía snapshot)
-                            sub_st = getattr(user_company, "subscription_status", "")
-                            if hasattr(sub_st, "value"):
-                                sub_st = sub_st.value
-                            if str(sub_st) != SubscriptionStatus.SUSPENDED.value:
-                                user_company.subscription_status = SubscriptionStatus.SUSPENDED.value
-                                user_company.is_active = False
-                                session.add(user_company)
-                                session.commit()
-                    else:
-                        sub_end = getattr(user_company, "subscription_ends_at", None)
-                        sub_st = getattr(user_company, "subscription_status", "")
-                        if hasattr(sub_st, "value"):
-                            sub_st = sub_st.value
-                        sub_st = str(sub_st).strip().lower()
-                        if sub_st == SubscriptionStatus.SUSPENDED.value or (
-                            sub_end and sub_end.date() < today
-                        ):
-                            # Auto-suspender en DB si aún no lo está
-                            if sub_st != SubscriptionStatus.SUSPENDED.value:
-                                user_company.subscription_status = SubscriptionStatus.SUSPENDED.value
-                                user_company.is_active = False
-                                session.add(user_company)
-                                session.commit()
-
-                if not user.role_id:
-                    fallback_role = (
-                        "Superadmin" if user.username == "admin" else "Usuario"
-                    )
-                    role = self._get_role_by_name(
-                        session,
-                        fallback_role,
-                        company_id=getattr(user, "company_id", None),
-                    )
-                    if not role:
-                        default_privileges = (
-                            SUPERADMIN_PRIVILEGES
-                            if fallback_role == "Superadmin"
-                            else DEFAULT_USER_PRIVILEGES
-                        )
-                        role = self._ensure_role(
-                            session,
-                            fallback_role,
-                            self._normalize_privileges(default_privileges),
-                            company_id=getattr(user, "company_id", None),
-                            overwrite=True,
-                        )
-                    user.role_id = role.id
-                    session.add(user)
-                    session.commit()
-
-                # Login exitoso: limpiar intentos fallidos
-                _clear_login_attempts(identifier, ip_address=client_ip)
-                _tv = getattr(user, "token_version", 0)
-                _cid = getattr(user, "company_id", None)
-                _bid = getattr(user, "branch_id", None)
-                self.token = create_access_token(
-                    user.id, token_version=_tv, company_id=_cid, branch_id=_bid,
-                )
-                self.refresh_token = create_refresh_token(
-                    user.id, token_version=_tv, company_id=_cid,
-                )
-                branch_ids, branch_access_changed = self._ensure_user_branch_access(session, user)
-                if branch_access_changed:
-                    session.commit()
-                selected_branch = self._select_default_branch(
-                    session, user, branch_ids
-                )
-                self.selected_branch_id = (
-                    str(selected_branch) if selected_branch else ""
+            candidates = lookup["candidates"]
+            matches = await _verify_password_candidates(
+                password, [password_hash for _, password_hash in candidates]
+            )
+            matched_ids = [
+                user_id for (user_id, _), ok in zip(candidates, matches) if ok
+            ]
+            if len(matched_ids) > 1:
+                self.error_message = (
+                    "Hay mas de un usuario con ese nombre. Inicie sesion con su correo."
                 )
-                self._resolve_current_user()
-                self.refresh_auth_runtime_cache()
-                if hasattr(self, "refresh_cashbox_status"):
-                    self.refresh_cashbox_status()
-                if hasattr(self, "load_settings"):
-                    self.load_settings()
-                if hasattr(self, "load_config_data"):
-                    self.load_config_data()
-                self.error_message = ""
-                self.password_change_error = ""
-                self._load_roles_cache(
-                    session,
-                    company_id=getattr(user, "company_id", None),
+                return
+
+            if len(matched_ids) == 1:
+                target = await run_sync_db(
+                    self._complete_login, matched_ids[0], operation="login_complete"
                 )
-                snapshot = self.subscription_snapshot or {}
-                status_label = str(snapshot.get("status_label", "") or "").strip().lower()
-                self.is_login_loading = False
-                if bool(snapshot.get("is_trial")) and status_label == "vencido":
-                    return rx.call_script("window.location.assign('/periodo-prueba-finalizado')")
-                if (not bool(snapshot.get("is_trial"))) and status_label in ("suspendido", "pago vencido"):
-                    return rx.call_script("window.location.assign('/cuenta-suspendida')")
-                if getattr(user, "must_change_password", False):
-                    return rx.call_script("window.location.assign('/cambiar-clave')")
-                return rx.call_script("window.location.assign('/dashboard')")
+                if target is None:
+                    return
+                # Login exitoso: limpiar intentos fallidos
+                await _clear_login_attempts(identifier, ip_address=client_ip)
+                return rx.call_script(f"window.location.assign('{target}')")
+        except LoginBusyError:
+            logger.warning("Login rechazado: pool de hashing saturado")
+            self.error_message = "Servidor ocupado. Intente nuevamente en unos segundos."
+            return
+        finally:
+            self.is_login_loading = False
 
         # Login fallido: registrar intento
-        _record_failed_attempt(identifier, ip_address=client_ip)
+        await _record_failed_attempt(identifier, ip_address=client_ip)
         self.error_message = "Usuario o contraseña incorrectos."
-        self.is_login_loading = False
 
     @rx.event
     def change_password(self, form_data: dict):
@@ -2499,7 +2617,7 @@ class AuthState(MixinState):
         set_tenant_context(company_id, None)
         with rx.session() as session:
             session.info["tenant_bypass"] = True
-            self._ensure_role(
+            role_model = self._ensure_role(
                 session,
                 role,
                 privileges,
@@ -2507,6 +2625,7 @@ class AuthState(MixinState):
                 overwrite=True,
             )
             session.commit()
+            self._forget_role_tokens(session, role_model.id)
             self._load_roles_cache(session, company_id=company_id)
 
         return [
@@ -2647,6 +2766,8 @@ class AuthState(MixinState):
 
                 session.add(user_to_update)
                 session.commit()
+                forget_verified_tokens(user_to_update.id)
+                self._forget_role_tokens(session, role.id)
                 self._load_roles_cache(session, company_id=company_id)
 
                 self.hide_user_form()
@@ -2715,6 +2836,7 @@ class AuthState(MixinState):
                     UserBranch(user_id=new_user.id, branch_id=branch_id)
                 )
                 session.commit()
+                self._forget_role_tokens(session, role.id)
                 self._load_roles_cache(session, company_id=company_id)
 
                 self.hide_user_form()
@@ -2793,6 +2915,7 @@ class AuthState(MixinState):
                 for link in branch_links:
                     session.delete(link)
                 session.commit()
+            forget_verified_tokens(user.id)
 
             self.load_users()
             return [
@@ -13,6 +13,7 @@ from sqlmodel import select
 from app.enums import FiscalStatus, ReceiptType
 from app.models.billing import CompanyBillingConfig, FiscalDocument
 from app.services.billing_service import retry_fiscal_document, emit_fiscal_document
+from app.services.fiscal_numbering import monthly_usage_query
 from app.utils.crypto import encrypt_text, parse_certificate_pem
 from app.utils.fiscal_validators import validate_tax_id, validate_business_name
 from app.i18n import MSG
@@ -138,7 +139,11 @@ class BillingState(MixinState):
             self.billing_serie_factura = config.serie_factura or "F001"
             self.billing_serie_boleta = config.serie_boleta or "B001"
             self.billing_max_limit = config.max_billing_limit or 500
-            self.billing_current_count = config.current_billing_count or 0
+            # Con numeración por bloques la cuota vive en FiscalQuotaCounter.
+            used = session.exec(monthly_usage_query(company_id)).first()
+            self.billing_current_count = (
+                used if used is not None else config.current_billing_count or 0
+            )
             self.billing_seq_factura = config.current_sequence_factura or 0
             self.billing_seq_boleta = config.current_sequence_boleta or 0
             # ── Estado de certificados AFIP ──
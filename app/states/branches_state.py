@@ -15,6 +15,7 @@ from app.models import (
 from app.i18n import MSG
 from app.utils.db_seeds import seed_new_branch_data
 from app.utils.logger import get_logger
+from app.utils.login_pipeline import forget_verified_tokens
 from app.utils.tenant import set_tenant_context, tenant_bypass
 from .mixin_state import MixinState
 
@@ -486,11 +487,13 @@ class BranchesState(MixinState):
                 select(CompanySettings).where(CompanySettings.branch_id == branch_id_int)
             ).all():
                 session.delete(cs)
+            moved_user_ids = []
             for user in session.exec(
                 select(UserModel).where(UserModel.branch_id == branch_id_int)
             ).all():
                 user.branch_id = None
                 session.add(user)
+                moved_user_ids.append(user.id)
             session.flush()
             try:
                 session.delete(branch)
@@ -507,6 +510,9 @@ class BranchesState(MixinState):
                     "Verifique que no tenga registros pendientes.",
                     duration=4000,
                 )
+        # El snapshot del JWT guarda branch_id: descartar el de los movidos.
+        for user_id in moved_user_ids:
+            forget_verified_tokens(user_id)
         self.load_branches()
         if hasattr(self, "refresh_auth_runtime_cache"):
             self.refresh_auth_runtime_cache()
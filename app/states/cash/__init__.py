@@ -7,6 +7,7 @@ from typing import List, Dict
 
 from app.enums import SaleStatus
 from ..mixin_state import MixinState
+from ..export_job_mixin import ExportJobMixin
 from ..types import CashboxSale, CashboxSession, CashboxLogEntry
 
 from ._petty_cash_mixin import PettyCashMixin
@@ -24,6 +25,7 @@ class CashState(
     HistoryMixin,
     SessionMixin,
     PettyCashMixin,
+    ExportJobMixin,
     MixinState,
 ):
     """Estado de gestión de caja registradora.
@@ -22,10 +22,12 @@ from app.models import (
 )
 from app.constants import CASHBOX_INCOME_ACTIONS, CASHBOX_EXPENSE_ACTIONS
 from app.i18n import MSG
+from app.services.sales_rollup_service import apply_sale_to_rollup_sync
 from ..types import CashboxSale
 from app.utils.formatting import fmt_price
 from app.utils.print_helper import build_print_script
 from app.utils.receipt_format import receipt_style
+from app.utils.sync_db import run_sync_db
 
 logger = logging.getLogger(__name__)
 
@@ -180,23 +182,27 @@ class CloseMixin:
     # ── Open / close modal ───────────────────────────────────────
 
     @rx.event
-    def open_cashbox_close_modal(self):
+    async def open_cashbox_close_modal(self):
         denial = self._cashbox_guard()
         if denial:
-            return denial
+            yield denial
+            return
         # Abrir el modal inmediatamente para feedback visual rápido
         self.cashbox_close_modal_open = True
         self.cashbox_close_summary_sales = []
         self.summary_by_method = []
         yield
-        # Ahora calcular los datos pesados (5-6 DB queries)
+        # Ahora calcular los datos pesados (5-6 DB queries) fuera del event loop
         today = self._current_local_date_str()
-        breakdown = self._build_cashbox_close_breakdown(today)
-        day_sales = self._get_day_sales(today)
+        breakdown, day_sales, day_expenses = await run_sync_db(
+            self._load_cashbox_close_data,
+            today,
+            company_id=self._company_id(),
+            operation="cashbox.close_summary",
+        )
         summary = breakdown["summary"]
         # No bloqueamos el cierre aunque no haya movimientos: una caja abierta con
         # $0 y cero ventas es válida de cerrar (_cashbox_guard ya verificó is_open).
-        day_expenses = self._get_day_expenses(today)
         self.summary_by_method = summary
         self.cashbox_close_summary_sales = day_sales
         self.cashbox_close_summary_returns = day_expenses
@@ -216,7 +222,7 @@ class CloseMixin:
     # ── Close day ────────────────────────────────────────────────
 
     @rx.event
-    def close_cashbox_day(self):
+    async def close_cashbox_day(self):
         if not self.current_user["privileges"]["manage_cashbox"]:
             return rx.toast(MSG.PERM_CASH, duration=3000)
         denial = self._cashbox_guard()
@@ -230,10 +236,15 @@ class CloseMixin:
         if not company_id or not branch_id:
             return rx.toast(MSG.VAL_COMPANY_UNDEFINED, duration=3000)
         date = self.cashbox_close_summary_date or self._current_local_date_str()
-        breakdown = self._build_cashbox_close_breakdown(date)
+        breakdown, day_sales, day_expenses = await run_sync_db(
+            self._load_cashbox_close_data,
+            date,
+            day_sales=self.cashbox_close_summary_sales,
+            day_expenses=self.cashbox_close_summary_returns,
+            company_id=company_id,
+            operation="cashbox.close_summary",
+        )
         summary = breakdown["summary"]
-        day_sales = self.cashbox_close_summary_sales or self._get_day_sales(date)
-        day_expenses = self.cashbox_close_summary_returns or self._get_day_expenses(date)
         closing_timestamp = self._display_now().strftime("%Y-%m-%d %H:%M:%S")
         totals_list = [
             {
@@ -510,6 +521,23 @@ class CloseMixin:
 
     # ── Day sales helpers ────────────────────────────────────────
 
+    def _load_cashbox_close_data(
+        self,
+        date: str,
+        day_sales: list[CashboxSale] | None = None,
+        day_expenses: list[dict] | None = None,
+    ) -> tuple[dict[str, Any], list[CashboxSale], list[dict]]:
+        """Desglose + ingresos + egresos del turno (síncrono, para ``run_sync_db``).
+
+        ``day_sales``/``day_expenses`` ya cargados por el modal se reutilizan.
+        """
+        breakdown = self._build_cashbox_close_breakdown(date)
+        return (
+            breakdown,
+            day_sales or self._get_day_sales(date),
+            day_expenses or self._get_day_expenses(date),
+        )
+
     def _get_day_sales(self, date: str) -> list[CashboxSale]:
         start_dt, end_dt, session_info = self._cashbox_time_range(date)
         company_id = self._company_id()
@@ -818,4 +846,13 @@ class CloseMixin:
                     sale_id=new_sale.id,
                 )
             )
+            # Rollups diarios al final: las filas del día quedan bloqueadas
+            # sólo hasta el commit.
+            session.flush()
+            apply_sale_to_rollup_sync(
+                session,
+                new_sale.id,
+                company_id=company_id,
+                branch_id=branch_id,
+            )
             session.commit()
@@ -16,6 +16,7 @@ from app.models import (
     StockMovement,
 )
 from app.i18n import MSG
+from app.services.sales_rollup_service import apply_sale_cancellation_to_rollup
 from app.utils.sanitization import sanitize_reason, sanitize_reason_preserve_spaces
 from app.utils.stock import recalculate_stock_totals
 from app.utils.formatting import fmt_price
@@ -277,6 +278,12 @@ class DeleteMixin:
                     products_from_variants=products_recalc_variants,
                     products_from_batches=products_recalc_batches,
                 )
+                apply_sale_cancellation_to_rollup(
+                    session,
+                    sale_db_id,
+                    company_id=company_id,
+                    branch_id=branch_id,
+                )
                 session.commit()
             except Exception:
                 session.rollback()
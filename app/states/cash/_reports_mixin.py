@@ -811,88 +811,47 @@ class ReportsMixin:
         script = build_print_script(html_content)
         return rx.call_script(script)
 
-    @rx.event
-    def export_cashbox_sessions(self):
-        if not self.current_user["privileges"]["view_cashbox"]:
-            return rx.toast(MSG.PERM_CASH_MGMT, duration=3000)
-        if not self.current_user["privileges"]["export_data"]:
-            return rx.toast(MSG.PERM_EXPORT, duration=3000)
+    @rx.event(background=True)
+    async def export_cashbox_sessions(self):
+        async with self:
+            if not self.current_user["privileges"]["view_cashbox"]:
+                return rx.toast(MSG.PERM_CASH_MGMT, duration=3000)
+            if not self.current_user["privileges"]["export_data"]:
+                return rx.toast(MSG.PERM_EXPORT, duration=3000)
+            company_id = self._company_id()
+            branch_id = self._branch_id()
+            filters = {
+                "start": self.cashbox_log_filter_start_date,
+                "end": self.cashbox_log_filter_end_date,
+                "currency": self._currency_excel_format(),
+            }
+
+        return await self._run_export_job(
+            "aperturas_cierres_caja",
+            company_id=company_id,
+            branch_id=branch_id,
+            filters=filters,
+            filename="aperturas_cierres_caja.xlsx",
+            collect=lambda: self._collect_cashbox_sessions_export(),
+            empty_message=MSG.CASH_NO_OPENCLOSE_EXPORT,
+        )
+
+    def _collect_cashbox_sessions_export(self) -> dict | None:
+        """Payload de ``render_cashbox_sessions``; None si no hay registros."""
         logs = self._fetch_cashbox_logs()
         if not logs:
-            return rx.toast(MSG.CASH_NO_OPENCLOSE_EXPORT, duration=3000)
+            return None
 
-        currency_label = self._currency_symbol_clean()
-        currency_format = self._currency_excel_format()
-        company_name = getattr(self, "company_name", "") or "EMPRESA"
-        today = self._current_local_display_date()
         period_start = self.cashbox_log_filter_start_date or "Inicio"
         period_end = self.cashbox_log_filter_end_date or "Actual"
-        period_label = f"Período: {period_start} a {period_end}"
 
         opening_count = 0
         closing_count = 0
         opening_total = 0.0
         closing_total = 0.0
+        rows = []
         for log in logs:
             action = (log.get("action") or "").strip().lower()
-            opening_amount = self._coerce_amount(log.get("opening_amount", 0))
-            closing_amount = self._coerce_amount(log.get("closing_total", 0))
-            if action == "apertura":
-                opening_count += 1
-                opening_total += opening_amount
-            elif action == "cierre":
-                closing_count += 1
-                closing_total += closing_amount
-
-        wb, ws = create_excel_workbook("Aperturas y Cierres")
-
-        # Encabezado profesional
-        row = add_company_header(
-            ws,
-            company_name,
-            "REGISTRO DE APERTURAS Y CIERRES DE CAJA",
-            period_label,
-            columns=7,
-            generated_at=self._display_now(),
-        )
-
-        row += 1
-        ws.cell(row=row, column=1, value="RESUMEN DE OPERACIONES")
-        row += 1
-        ws.cell(row=row, column=1, value="Fecha de corte:")
-        ws.cell(row=row, column=2, value=today)
-        row += 1
-        ws.cell(row=row, column=1, value="Cantidad de aperturas:")
-        ws.cell(row=row, column=2, value=opening_count)
-        row += 1
-        ws.cell(row=row, column=1, value="Cantidad de cierres:")
-        ws.cell(row=row, column=2, value=closing_count)
-        row += 1
-        ws.cell(row=row, column=1, value=f"Total aperturas ({currency_label}):")
-        ws.cell(row=row, column=2, value=opening_total).number_format = currency_format
-        row += 1
-        ws.cell(row=row, column=1, value=f"Total cierres ({currency_label}):")
-        ws.cell(row=row, column=2, value=closing_total).number_format = currency_format
-        row += 2
-
-        headers = [
-            "Fecha y Hora",
-            "Tipo de Operación",
-            "Responsable",
-            f"Monto Apertura ({currency_label})",
-            f"Monto Cierre ({currency_label})",
-            "Desglose por Método",
-            "Observaciones",
-        ]
-        style_header_row(ws, row, headers)
-        data_start = row + 1
-        row += 1
-
-        total_aperturas = 0.0
-        total_cierres = 0.0
-
-        for log in logs:
-            action = (log.get("action") or "").lower()
             action_display = (
                 "Apertura de Caja"
                 if action == "apertura"
@@ -900,14 +859,14 @@ class ReportsMixin:
                 if action == "cierre"
                 else str(action).replace("_", " ").strip().title()
             )
-
             opening_amount = self._coerce_amount(log.get("opening_amount", 0))
             closing_amount = self._coerce_amount(log.get("closing_total", 0))
-
             if action == "apertura":
-                total_aperturas += opening_amount
+                opening_count += 1
+                opening_total += opening_amount
             elif action == "cierre":
-                total_cierres += closing_amount
+                closing_count += 1
+                closing_total += closing_amount
 
             totals_detail = ", ".join(
                 f"{item.get('method', 'Otro')}: {self._format_currency(self._coerce_amount(item.get('amount', 0)))}"
@@ -915,47 +874,31 @@ class ReportsMixin:
                 if item.get("amount", 0)
             ) or "Sin desglose"
 
-            ws.cell(row=row, column=1, value=log.get("timestamp", ""))
-            ws.cell(row=row, column=2, value=action_display)
-            ws.cell(row=row, column=3, value=log.get("user", MSG.FALLBACK_UNKNOWN))
-            ws.cell(row=row, column=4, value=opening_amount).number_format = currency_format
-            ws.cell(row=row, column=5, value=closing_amount).number_format = currency_format
-            ws.cell(row=row, column=6, value=totals_detail)
-            ws.cell(row=row, column=7, value=log.get("notes", "") or "Sin observaciones")
-
-            for col in range(1, 8):
-                ws.cell(row=row, column=col).border = THIN_BORDER
-            row += 1
-
-        # Fila de totales
-        totals_row = row
-        add_totals_row_with_formulas(ws, totals_row, data_start, [
-            {"type": "label", "value": "TOTALES"},
-            {"type": "text", "value": ""},
-            {"type": "text", "value": ""},
-            {"type": "sum", "col_letter": "D", "number_format": currency_format},
-            {"type": "sum", "col_letter": "E", "number_format": currency_format},
-            {"type": "text", "value": ""},
-            {"type": "text", "value": ""},
-        ])
-
-        # Notas explicativas
-        add_notes_section(ws, totals_row, [
-            "Apertura de Caja: Monto inicial con el que se inicia la jornada.",
-            "Cierre de Caja: Monto total contado al finalizar la jornada.",
-            "Desglose por Método: Distribución del dinero según forma de pago (solo en cierres).",
-            "La diferencia entre Cierres y Aperturas debe coincidir con las ventas del día.",
-        ], columns=7)
-
-        auto_adjust_column_widths(ws)
-
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-
-        return rx.download(
-            data=output.getvalue(), filename="aperturas_cierres_caja.xlsx"
-        )
+            rows.append((
+                log.get("timestamp", ""),
+                action_display,
+                log.get("user", MSG.FALLBACK_UNKNOWN),
+                opening_amount,
+                closing_amount,
+                totals_detail,
+                log.get("notes", "") or "Sin observaciones",
+            ))
+
+        return {
+            "company_name": getattr(self, "company_name", "") or "EMPRESA",
+            "period_label": f"Período: {period_start} a {period_end}",
+            "generated_at": self._display_now(),
+            "currency_label": self._currency_symbol_clean(),
+            "currency_format": self._currency_excel_format(),
+            "summary": {
+                "today": self._current_local_display_date(),
+                "opening_count": opening_count,
+                "closing_count": closing_count,
+                "opening_total": opening_total,
+                "closing_total": closing_total,
+            },
+            "rows": rows,
+        }
 
     @rx.event
     def export_petty_cash_report(self):
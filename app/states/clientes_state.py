@@ -28,6 +28,8 @@ from sqlmodel import select
 from sqlalchemy import or_
 
 from app.models import Client, Sale
+from app.services.server_collection import ServerCollection, page_count
+from app.utils.pagination import build_page_window
 from app.utils.tenant import set_tenant_context
 from app.utils.sanitization import (
     escape_like,
@@ -41,6 +43,9 @@ from app.utils.formatting import fmt_price
 
 logger = logging.getLogger(__name__)
 
+# Padrón completo por sesión fuera del state; el state lleva la página visible.
+_CLIENTS = ServerCollection("clientes:clients")
+
 
 class ClientesState(MixinState):
     """Estado de gestión de clientes.
@@ -49,13 +54,17 @@ class ClientesState(MixinState):
     Los clientes son requeridos para ventas a crédito.
     
     Attributes:
-        clients: Lista de clientes cargados
+        clients_view: Página visible de clientes (ya formateada)
+        clients_total: Total de clientes que coinciden con la búsqueda
         search_query: Término de búsqueda actual
         show_modal: Estado del modal de edición
         select_after_save: Si True, selecciona el cliente después de guardar
         current_client: Cliente en edición (dict temporal)
     """
-    clients: list[dict] = []
+    clients_view: list[dict] = []
+    clients_total: int = 0
+    clients_page: int = 1
+    clients_items_per_page: int = 25
     search_query: str = ""
     show_modal: bool = False
     select_after_save: bool = False
@@ -139,10 +148,9 @@ class ClientesState(MixinState):
     def client_delete_can_delete(self) -> bool:
         return bool(self.client_delete_target.get("can_delete", False))
 
-    @rx.var(cache=True)
-    def clients_view(self) -> list[dict]:
+    def _client_view_rows(self, clients: list[dict]) -> list[dict]:
         rows: list[dict] = []
-        for client in self.clients:
+        for client in clients:
             if isinstance(client, dict):
                 credit_limit_raw = client.get("credit_limit", 0)
                 current_debt_raw = client.get("current_debt", 0)
@@ -184,13 +192,54 @@ class ClientesState(MixinState):
             )
         return rows
 
+    @rx.var(cache=True)
+    def clients_total_pages(self) -> int:
+        return page_count(self.clients_total, self.clients_items_per_page)
+
+    @rx.var(cache=False)
+    def clients_page_window(self) -> list[int]:
+        """Ventana de páginas para la barra numérica (ver build_page_window)."""
+        return build_page_window(self.clients_page, self.clients_total_pages)
+
+    async def _set_clients(self, clients: list[dict]) -> None:
+        self.clients_total = await _CLIENTS.replace_async(self._collection_token(), clients)
+        await self._show_clients_page()
+
+    async def _show_clients_page(self) -> None:
+        per_page = max(self.clients_items_per_page, 1)
+        self.clients_page = min(max(self.clients_page, 1), page_count(self.clients_total, per_page))
+        clients = await _CLIENTS.page_async(self._collection_token(), self.clients_page, per_page)
+        if clients is None:
+            # Colección vencida: se vuelve a consultar (vuelve a entrar acá).
+            await self.load_clients()
+            return
+        self.clients_view = self._client_view_rows(clients)
+
     @rx.event
-    def load_clients(self):
+    async def next_clients_page(self):
+        if self.clients_page < self.clients_total_pages:
+            self.clients_page += 1
+            await self._show_clients_page()
+
+    @rx.event
+    async def prev_clients_page(self):
+        if self.clients_page > 1:
+            self.clients_page -= 1
+            await self._show_clients_page()
+
+    @rx.event
+    async def set_clients_page(self, page: int):
+        if 1 <= page <= self.clients_total_pages:
+            self.clients_page = page
+            await self._show_clients_page()
+
+    @rx.event
+    async def load_clients(self):
         term = (self.search_query or "").strip()
         company_id = self._company_id()
         branch_id = self._branch_id()
         if not company_id or not branch_id:
-            self.clients = []
+            await self._set_clients([])
             self.available_price_lists = []
             return
         with rx.session() as session:
@@ -212,7 +261,7 @@ class ClientesState(MixinState):
                 )
             query = query.order_by(Client.name)
             results = session.exec(query).all()
-            self.clients = [
+            await self._set_clients([
                 {
                     "id": client.id,
                     "name": client.name,
@@ -226,7 +275,7 @@ class ClientesState(MixinState):
                     "segment": client.segment or "",
                 }
                 for client in results
-            ]
+            ])
             # Listas activas del tenant para el selector del modal de cliente.
             from app.models.price_lists import PriceList
             pl_rows = session.exec(
@@ -252,9 +301,10 @@ class ClientesState(MixinState):
             ]
 
     @rx.event
-    def set_search_query(self, value: str):
+    async def set_search_query(self, value: str):
         self.search_query = value or ""
-        self.load_clients()
+        self.clients_page = 1
+        await self.load_clients()
 
     @rx.event
     async def open_modal(self, client: dict | None = None):
@@ -451,7 +501,7 @@ class ClientesState(MixinState):
         finally:
             self.is_loading = False
 
-        self.load_clients()
+        yield type(self).load_clients
         self.show_modal = False
         self.current_client = self._empty_client_form()
         self.is_loading = False
@@ -580,7 +630,7 @@ class ClientesState(MixinState):
             "id": 0, "name": "", "sale_count": 0,
             "current_debt": 0.0, "current_debt_raw": 0.0, "can_delete": False,
         }
-        self.load_clients()
+        yield type(self).load_clients
         return self.add_notification("Cliente eliminado.", "success")
 
     def delete_client(self, client_id: int):
@@ -36,6 +36,7 @@ from app.i18n import MSG
 from app.models import Client, Sale, SaleInstallment
 from app.services.credit_service import CreditService
 from app.services.alert_service import get_overdue_count
+from app.services.server_collection import ServerCollection, page_count
 from app.utils.db import get_async_session
 from app.utils.formatting import fmt_input_num, fmt_price
 from app.utils.pagination import build_page_window
@@ -57,6 +58,11 @@ from .mixin_state import MixinState
 
 logger = logging.getLogger(__name__)
 
+# Deudores y cuotas completos viven fuera del state (por sesión); el state
+# sólo lleva la página visible y el total.
+_DEBTORS = ServerCollection("cuentas:debtors")
+_INSTALLMENTS = ServerCollection("cuentas:installments")
+
 
 class CuentasState(MixinState):
     """Estado de gestión de cuentas por cobrar.
@@ -65,7 +71,7 @@ class CuentasState(MixinState):
     registrar pagos parciales o totales.
     
     Attributes:
-        debtors: Lista de clientes con deuda activa
+        paginated_debtors: Página visible de clientes con deuda activa
         selected_client: Cliente seleccionado para ver detalle
         client_installments: Cuotas del cliente seleccionado
         show_payment_modal: Estado del modal de pago
@@ -73,7 +79,8 @@ class CuentasState(MixinState):
         installment_payment_method: Método de pago seleccionado
         selected_installment_id: ID de cuota a pagar
     """
-    debtors: list[dict] = []
+    debtors_total: int = 0
+    paginated_debtors: list[dict] = []
     selected_client: dict | None = None
     client_installments: list[dict] = []
     show_payment_modal: bool = False
@@ -87,7 +94,8 @@ class CuentasState(MixinState):
     filter_mode: str = "all"
     view_mode: str = "clients"
     overdue_installments_count: int = 0
-    installments_rows: list[dict] = []
+    installments_total: int = 0
+    paginated_installments_rows: list[dict] = []
     debtors_page: int = 1
     debtors_items_per_page: int = 10
     installments_page: int = 1
@@ -299,19 +307,19 @@ class CuentasState(MixinState):
     @rx.event
     async def load_debtors(self):
         if not self.current_user["privileges"].get("view_cuentas"):
-            self.debtors = []
+            await self._set_debtors([])
             self.total_pagadas = 0
             self.total_pendientes = 0
-            self.installments_rows = []
+            await self._set_installments([])
             self.overdue_installments_count = 0
             return
         company_id = self._company_id()
         branch_id = self._branch_id()
         if not company_id or not branch_id:
-            self.debtors = []
+            await self._set_debtors([])
             self.total_pagadas = 0
             self.total_pendientes = 0
-            self.installments_rows = []
+            await self._set_installments([])
             self.overdue_installments_count = 0
             return
         route_filter = self._query_filter_mode()
@@ -327,15 +335,7 @@ class CuentasState(MixinState):
         from app.utils.tenant import set_tenant_context
         set_tenant_context(int(company_id), int(branch_id))
         async with get_async_session() as session:
-            result = await session.exec(
-                select(Client)
-                .where(Client.current_debt > 0)
-                .where(Client.company_id == company_id)
-                .where(Client.branch_id == branch_id)
-            )
-            self.debtors = [
-                self._client_snapshot(client) for client in result.all()
-            ]
+            await self._load_debtor_rows(session, company_id, branch_id)
             await self._refresh_installment_totals(session)
             self.overdue_installments_count = await get_overdue_count(
                 session,
@@ -352,11 +352,69 @@ class CuentasState(MixinState):
         async with self:
             await self.load_debtors()
 
+    async def _load_debtor_rows(self, session, company_id: int, branch_id: int) -> None:
+        result = await session.exec(
+            select(Client)
+            .where(Client.current_debt > 0)
+            .where(Client.company_id == company_id)
+            .where(Client.branch_id == branch_id)
+        )
+        await self._set_debtors([self._client_snapshot(client) for client in result.all()])
+
+    async def _set_debtors(self, rows: list[dict]) -> None:
+        self.debtors_total = await _DEBTORS.replace_async(self._collection_token(), rows)
+        await self._show_debtors_page()
+
+    async def _show_debtors_page(self) -> bool:
+        """Trae la página actual de deudores; False si la colección venció."""
+        per_page = max(self.debtors_items_per_page, 1)
+        self.debtors_page = min(max(self.debtors_page, 1), page_count(self.debtors_total, per_page))
+        rows = await _DEBTORS.page_async(self._collection_token(), self.debtors_page, per_page)
+        if rows is None:
+            return False
+        self.paginated_debtors = rows
+        return True
+
+    async def _goto_debtors_page(self, page: int) -> None:
+        self.debtors_page = page
+        if await self._show_debtors_page():
+            return
+        company_id = self._company_id()
+        branch_id = self._branch_id()
+        if not company_id or not branch_id:
+            await self._set_debtors([])
+            return
+        async with get_async_session() as session:
+            await self._load_debtor_rows(session, company_id, branch_id)
+
+    async def _set_installments(self, rows: list[dict]) -> None:
+        self.installments_total = await _INSTALLMENTS.replace_async(self._collection_token(), rows)
+        await self._show_installments_page()
+
+    async def _show_installments_page(self) -> bool:
+        """Trae la página actual de cuotas; False si la colección venció."""
+        per_page = max(self.installments_items_per_page, 1)
+        self.installments_page = min(
+            max(self.installments_page, 1), page_count(self.installments_total, per_page)
+        )
+        rows = await _INSTALLMENTS.page_async(
+            self._collection_token(), self.installments_page, per_page
+        )
+        if rows is None:
+            return False
+        self.paginated_installments_rows = rows
+        return True
+
+    async def _goto_installments_page(self, page: int) -> None:
+        self.installments_page = page
+        if not await self._show_installments_page():
+            await self.load_installments()
+
     async def _load_installments(self, session) -> None:
         company_id = self._company_id()
         branch_id = self._branch_id()
         if not company_id or not branch_id:
-            self.installments_rows = []
+            await self._set_installments([])
             return
         today_start = self._country_today_start()
 
@@ -445,14 +503,14 @@ class CuentasState(MixinState):
                     "is_paid": is_paid,
                 }
             )
-        self.installments_rows = rows
+        await self._set_installments(rows)
 
     @rx.event
     async def load_installments(self):
         company_id = self._company_id()
         branch_id = self._branch_id()
         if not company_id or not branch_id:
-            self.installments_rows = []
+            await self._set_installments([])
             return
         from app.utils.tenant import set_tenant_context
         set_tenant_context(int(company_id), int(branch_id))
@@ -487,14 +545,14 @@ class CuentasState(MixinState):
         return await self.set_filter_mode("all")
 
     @rx.event
-    def set_view_mode(self, mode: str):
+    async def set_view_mode(self, mode: str):
         normalized = (mode or "").strip().lower()
         if normalized in {"clients", "installments"}:
             self.view_mode = normalized
             if normalized == "clients":
-                self.debtors_page = 1
+                await self._goto_debtors_page(1)
             else:
-                self.installments_page = 1
+                await self._goto_installments_page(1)
             if normalized == "installments":
                 return rx.call_script(self._update_filter_url_script())
 
@@ -510,50 +568,26 @@ class CuentasState(MixinState):
 
     @rx.var(cache=True)
     def debtors_total_pages(self) -> int:
-        total_items = len(self.debtors or [])
-        if total_items == 0:
-            return 1
-        per_page = max(self.debtors_items_per_page, 1)
-        return (total_items + per_page - 1) // per_page
-
-    @rx.var(cache=True)
-    def paginated_debtors(self) -> list[dict]:
-        total_pages = self.debtors_total_pages
-        page = min(max(self.debtors_page, 1), total_pages)
-        per_page = max(self.debtors_items_per_page, 1)
-        offset = (page - 1) * per_page
-        return (self.debtors or [])[offset : offset + per_page]
+        return page_count(self.debtors_total, self.debtors_items_per_page)
 
     @rx.var(cache=True)
     def installments_total_pages(self) -> int:
-        total_items = len(self.installments_rows or [])
-        if total_items == 0:
-            return 1
-        per_page = max(self.installments_items_per_page, 1)
-        return (total_items + per_page - 1) // per_page
-
-    @rx.var(cache=True)
-    def paginated_installments_rows(self) -> list[dict]:
-        total_pages = self.installments_total_pages
-        page = min(max(self.installments_page, 1), total_pages)
-        per_page = max(self.installments_items_per_page, 1)
-        offset = (page - 1) * per_page
-        return (self.installments_rows or [])[offset : offset + per_page]
+        return page_count(self.installments_total, self.installments_items_per_page)
 
     @rx.event
-    def next_debtors_page(self):
+    async def next_debtors_page(self):
         if self.debtors_page < self.debtors_total_pages:
-            self.debtors_page += 1
+            await self._goto_debtors_page(self.debtors_page + 1)
 
     @rx.event
-    def prev_debtors_page(self):
+    async def prev_debtors_page(self):
         if self.debtors_page > 1:
-            self.debtors_page -= 1
+            await self._goto_debtors_page(self.debtors_page - 1)
 
     @rx.event
-    def set_debtors_page(self, page: int):
+    async def set_debtors_page(self, page: int):
         if 1 <= page <= self.debtors_total_pages:
-            self.debtors_page = page
+            await self._goto_debtors_page(page)
 
     @rx.var(cache=False)
     def debtors_page_window(self) -> list[int]:
@@ -561,19 +595,19 @@ class CuentasState(MixinState):
         return build_page_window(self.debtors_page, self.debtors_total_pages)
 
     @rx.event
-    def next_installments_page(self):
+    async def next_installments_page(self):
         if self.installments_page < self.installments_total_pages:
-            self.installments_page += 1
+            await self._goto_installments_page(self.installments_page + 1)
 
     @rx.event
-    def prev_installments_page(self):
+    async def prev_installments_page(self):
         if self.installments_page > 1:
-            self.installments_page -= 1
+            await self._goto_installments_page(self.installments_page - 1)
 
     @rx.event
-    def set_installments_page(self, page: int):
+    async def set_installments_page(self, page: int):
         if 1 <= page <= self.installments_total_pages:
-            self.installments_page = page
+            await self._goto_installments_page(page)
 
     @rx.var(cache=False)
     def installments_page_window(self) -> list[int]:
@@ -985,16 +1019,7 @@ class CuentasState(MixinState):
                     ]
                     self._set_current_client_totals(self.client_installments)
 
-                debtors_result = await session.exec(
-                    select(Client)
-                    .where(Client.current_debt > 0)
-                    .where(Client.company_id == company_id)
-                    .where(Client.branch_id == branch_id)
-                )
-                self.debtors = [
-                    self._client_snapshot(client)
-                    for client in debtors_result.all()
-                ]
+                await self._load_debtor_rows(session, company_id, branch_id)
                 await self._refresh_installment_totals(session)
                 country_code, timezone = self._company_time_context()
                 self.overdue_installments_count = await get_overdue_count(
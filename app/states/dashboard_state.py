@@ -8,7 +8,7 @@ Proporciona:
 - Alertas del sistema
 """
 import logging
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from decimal import Decimal
 
 import reflex as rx
@@ -29,8 +29,14 @@ from app.models import (
     FieldReservation,
     SaleReturn,
     SaleReturnItem,
+    SalesCategoryRollup,
+    SalesDailyRollup,
+    SalesProductRollup,
 )
+from app.services.sales_rollup_service import SALES_ROLLUP_READS_ENABLED
 from app.utils.timezone import utc_now_naive
+from app.utils.sync_db import run_sync_db
+from app.utils.db_read import read_session
 from .inventory import LOW_STOCK_THRESHOLD
 from app.enums import SaleStatus, ReservationStatus
 from app.i18n import MSG
@@ -236,26 +242,30 @@ class DashboardState(MixinState):
         return today_start.replace(hour=23, minute=59, second=59)
 
     @rx.event
-    def set_period(self, period: str):
+    async def set_period(self, period: str):
         """Cambia el período seleccionado y recarga datos."""
         self.selected_period = period
-        self.load_dashboard()
+        await self.load_dashboard()
 
     @rx.event
-    def set_custom_dates(self, start: str, end: str):
+    async def set_custom_dates(self, start: str, end: str):
         """Establece fechas personalizadas."""
         self.custom_start_date = start
         self.custom_end_date = end
         self.selected_period = "custom"
-        self.load_dashboard()
+        await self.load_dashboard()
 
     @rx.event
-    def load_dashboard(self):
+    async def load_dashboard(self):
         """Carga todos los datos del dashboard."""
         self.dashboard_loading = True
 
         try:
-            self._load_dashboard_data()
+            await run_sync_db(
+                self._load_dashboard_data,
+                company_id=self._company_id(),
+                operation="dashboard",
+            )
         except Exception:
             logger.exception("load_dashboard failed")
         finally:
@@ -283,14 +293,20 @@ class DashboardState(MixinState):
             self._last_dashboard_load_ts = now_ts
             self.dashboard_loading = True
             try:
-                self._load_dashboard_data()
+                # Las queries corren en el pool sync: el loop queda libre para
+                # los eventos del resto de usuarios mientras carga.
+                await run_sync_db(
+                    self._load_dashboard_data,
+                    company_id=self._company_id(),
+                    operation="dashboard",
+                )
             except Exception:
                 logger.exception("load_dashboard_background failed")
             finally:
                 self.dashboard_loading = False
 
     def _load_sales_summary(self):
-        """Carga resumen de ventas por período."""
+        """Carga resumen de ventas por período (rollup diario o queries crudas)."""
         local_now = self._display_now()
         today_start_local = local_now.replace(hour=0, minute=0, second=0, microsecond=0)
         week_start_local = today_start_local - timedelta(days=today_start_local.weekday())
@@ -314,57 +330,28 @@ class DashboardState(MixinState):
             self.avg_ticket = 0.0
             return
 
-        period_start, period_end, prev_start, prev_end = self._get_period_dates()
         reservation_start, _, _, _ = self._local_period_dates()
 
-        with rx.session() as session:
+        with read_session() as session:
             session.info["tenant_bypass"] = True
-            # Una sola pasada sobre Sale para today/week/month/period/prev con CASE WHEN.
-            # Sustituye 5 queries independientes por un único GROUP-BY vacío con sumas
-            # condicionales → de 5 round-trips a 1.
-            now_utc = self._company_local_datetime_to_utc_naive(self._display_now())
-            earliest = min(today_start, week_start, month_start, period_start, prev_start)
-            latest = max(now_utc, period_end)
-            agg = session.exec(
-                select(
-                    func.count(case((Sale.timestamp >= today_start, Sale.id))).label("t_cnt"),
-                    func.coalesce(func.sum(case((Sale.timestamp >= today_start, Sale.total_amount))), 0).label("t_amt"),
-                    func.count(case((Sale.timestamp >= week_start, Sale.id))).label("w_cnt"),
-                    func.coalesce(func.sum(case((Sale.timestamp >= week_start, Sale.total_amount))), 0).label("w_amt"),
-                    func.count(case((Sale.timestamp >= month_start, Sale.id))).label("m_cnt"),
-                    func.coalesce(func.sum(case((Sale.timestamp >= month_start, Sale.total_amount))), 0).label("m_amt"),
-                    func.count(case((and_(Sale.timestamp >= period_start, Sale.timestamp <= period_end), Sale.id))).label("p_cnt"),
-                    func.coalesce(func.sum(case((and_(Sale.timestamp >= period_start, Sale.timestamp <= period_end), Sale.total_amount))), 0).label("p_amt"),
-                    func.coalesce(func.sum(case((and_(Sale.timestamp >= prev_start, Sale.timestamp < prev_end), Sale.total_amount))), 0).label("prev_amt"),
-                )
-                .where(
-                    and_(
-                        Sale.timestamp >= earliest,
-                        Sale.timestamp <= latest,
-                        Sale.status != SaleStatus.cancelled,
-                        Sale.company_id == company_id,
-                        Sale.branch_id == branch_id,
-                    )
-                )
-            ).one()
-            # Restar devoluciones por período usando SaleReturn.timestamp
-            ret_agg = session.exec(
-                select(
-                    func.coalesce(func.sum(case((SaleReturn.timestamp >= today_start, SaleReturn.refund_amount))), 0).label("t_ref"),
-                    func.coalesce(func.sum(case((SaleReturn.timestamp >= week_start, SaleReturn.refund_amount))), 0).label("w_ref"),
-                    func.coalesce(func.sum(case((SaleReturn.timestamp >= month_start, SaleReturn.refund_amount))), 0).label("m_ref"),
-                    func.coalesce(func.sum(case((and_(SaleReturn.timestamp >= period_start, SaleReturn.timestamp <= period_end), SaleReturn.refund_amount))), 0).label("p_ref"),
-                    func.coalesce(func.sum(case((and_(SaleReturn.timestamp >= prev_start, SaleReturn.timestamp < prev_end), SaleReturn.refund_amount))), 0).label("prev_ref"),
+            if SALES_ROLLUP_READS_ENABLED:
+                agg, ret_agg, margin_result = self._sales_summary_from_rollup(
+                    session,
+                    company_id,
+                    branch_id,
+                    today_start_local.date(),
+                    week_start_local.date(),
+                    month_start_local.date(),
                 )
-                .where(
-                    and_(
-                        SaleReturn.timestamp >= earliest,
-                        SaleReturn.timestamp <= latest,
-                        SaleReturn.company_id == company_id,
-                        SaleReturn.branch_id == branch_id,
-                    )
+            else:
+                agg, ret_agg, margin_result = self._sales_summary_from_sales(
+                    session,
+                    company_id,
+                    branch_id,
+                    today_start,
+                    week_start,
+                    month_start,
                 )
-            ).one()
 
             self.today_sales_count = int(agg[0] or 0)
             self.today_sales = max(0.0, float(agg[1] or 0) - float(ret_agg[0] or 0))
@@ -402,29 +389,6 @@ class DashboardState(MixinState):
             ).one()
             self.period_reservations_count = int(reservation_result or 0)
 
-            # Margen bruto del período: ingresos - costo
-            margin_result = session.exec(
-                select(
-                    func.coalesce(
-                        func.sum(SaleItem.quantity * SaleItem.unit_price), 0
-                    ),
-                    func.coalesce(
-                        func.sum(SaleItem.quantity * func.coalesce(Product.purchase_price, 0)), 0
-                    ),
-                )
-                .select_from(SaleItem)
-                .join(Sale, SaleItem.sale_id == Sale.id)
-                .join(Product, SaleItem.product_id == Product.id, isouter=True)
-                .where(
-                    and_(
-                        Sale.timestamp >= period_start,
-                        Sale.timestamp <= period_end,
-                        Sale.status != SaleStatus.cancelled,
-                        Sale.company_id == company_id,
-                        Sale.branch_id == branch_id,
-                    )
-                )
-            ).one()
             revenue = float(margin_result[0] or 0)
             cost = float(margin_result[1] or 0)
             self.period_total_cost = cost
@@ -433,6 +397,157 @@ class DashboardState(MixinState):
                 ((revenue - cost) / revenue * 100) if revenue > 0 else 0.0
             )
 
+    def _sales_summary_from_sales(
+        self,
+        session,
+        company_id: int,
+        branch_id: int,
+        today_start: datetime,
+        week_start: datetime,
+        month_start: datetime,
+    ) -> tuple[tuple, tuple, tuple]:
+        """Agregados del resumen sobre Sale/SaleReturn/SaleItem (sin rollup).
+
+        Devuelve ``(agg, ret_agg, margin)``: conteos/montos por ventana,
+        devoluciones por ventana e (ingresos, costo) del período.
+        """
+        period_start, period_end, prev_start, prev_end = self._get_period_dates()
+        # Una sola pasada sobre Sale para today/week/month/period/prev con CASE WHEN.
+        # Sustituye 5 queries independientes por un único GROUP-BY vacío con sumas
+        # condicionales → de 5 round-trips a 1.
+        now_utc = self._company_local_datetime_to_utc_naive(self._display_now())
+        earliest = min(today_start, week_start, month_start, period_start, prev_start)
+        latest = max(now_utc, period_end)
+        agg = session.exec(
+            select(
+                func.count(case((Sale.timestamp >= today_start, Sale.id))).label("t_cnt"),
+                func.coalesce(func.sum(case((Sale.timestamp >= today_start, Sale.total_amount))), 0).label("t_amt"),
+                func.count(case((Sale.timestamp >= week_start, Sale.id))).label("w_cnt"),
+                func.coalesce(func.sum(case((Sale.timestamp >= week_start, Sale.total_amount))), 0).label("w_amt"),
+                func.count(case((Sale.timestamp >= month_start, Sale.id))).label("m_cnt"),
+                func.coalesce(func.sum(case((Sale.timestamp >= month_start, Sale.total_amount))), 0).label("m_amt"),
+                func.count(case((and_(Sale.timestamp >= period_start, Sale.timestamp <= period_end), Sale.id))).label("p_cnt"),
+                func.coalesce(func.sum(case((and_(Sale.timestamp >= period_start, Sale.timestamp <= period_end), Sale.total_amount))), 0).label("p_amt"),
+                func.coalesce(func.sum(case((and_(Sale.timestamp >= prev_start, Sale.timestamp < prev_end), Sale.total_amount))), 0).label("prev_amt"),
+            )
+            .where(
+                and_(
+                    Sale.timestamp >= earliest,
+                    Sale.timestamp <= latest,
+                    Sale.status != SaleStatus.cancelled,
+                    Sale.company_id == company_id,
+                    Sale.branch_id == branch_id,
+                )
+            )
+        ).one()
+        # Restar devoluciones por período usando SaleReturn.timestamp
+        ret_agg = session.exec(
+            select(
+                func.coalesce(func.sum(case((SaleReturn.timestamp >= today_start, SaleReturn.refund_amount))), 0).label("t_ref"),
+                func.coalesce(func.sum(case((SaleReturn.timestamp >= week_start, SaleReturn.refund_amount))), 0).label("w_ref"),
+                func.coalesce(func.sum(case((SaleReturn.timestamp >= month_start, SaleReturn.refund_amount))), 0).label("m_ref"),
+                func.coalesce(func.sum(case((and_(SaleReturn.timestamp >= period_start, SaleReturn.timestamp <= period_end), SaleReturn.refund_amount))), 0).label("p_ref"),
+                func.coalesce(func.sum(case((and_(SaleReturn.timestamp >= prev_start, SaleReturn.timestamp < prev_end), SaleReturn.refund_amount))), 0).label("prev_ref"),
+            )
+            .where(
+                and_(
+                    SaleReturn.timestamp >= earliest,
+                    SaleReturn.timestamp <= latest,
+                    SaleReturn.company_id == company_id,
+                    SaleReturn.branch_id == branch_id,
+                )
+            )
+        ).one()
+
+        # Margen bruto del período: ingresos - costo
+        margin_result = session.exec(
+            select(
+                func.coalesce(
+                    func.sum(SaleItem.quantity * SaleItem.unit_price), 0
+                ),
+                func.coalesce(
+                    func.sum(SaleItem.quantity * func.coalesce(Product.purchase_price, 0)), 0
+                ),
+            )
+            .select_from(SaleItem)
+            .join(Sale, SaleItem.sale_id == Sale.id)
+            .join(Product, SaleItem.product_id == Product.id, isouter=True)
+            .where(
+                and_(
+                    Sale.timestamp >= period_start,
+                    Sale.timestamp <= period_end,
+                    Sale.status != SaleStatus.cancelled,
+                    Sale.company_id == company_id,
+                    Sale.branch_id == branch_id,
+                )
+            )
+        ).one()
+        return agg, ret_agg, margin_result
+
+    def _sales_summary_from_rollup(
+        self,
+        session,
+        company_id: int,
+        branch_id: int,
+        today: date,
+        week_start: date,
+        month_start: date,
+    ) -> tuple[tuple, tuple, tuple]:
+        """Mismos agregados que ``_sales_summary_from_sales`` sumando días de
+        ``SalesDailyRollup``. Los períodos del dashboard son días locales
+        completos (el "hasta ahora" de hoy equivale a todo el día).
+        """
+        start, end, prev_start, prev_end = self._local_period_dates()
+        period = (start.date(), end.date())
+        prev = (prev_start.date(), prev_end.date())
+        rows = session.exec(
+            select(
+                SalesDailyRollup.day,
+                SalesDailyRollup.sales_count,
+                SalesDailyRollup.gross_amount,
+                SalesDailyRollup.refund_amount,
+                SalesDailyRollup.items_amount,
+                SalesDailyRollup.cost_amount,
+            ).where(
+                and_(
+                    SalesDailyRollup.company_id == company_id,
+                    SalesDailyRollup.branch_id == branch_id,
+                    SalesDailyRollup.day >= min(week_start, month_start, period[0], prev[0]),
+                    SalesDailyRollup.day <= max(today, period[1]),
+                )
+            )
+        ).all()
+
+        # today, week, month, period, prev (prev con fin exclusivo, como la query cruda)
+        windows = (
+            lambda d: d >= today,
+            lambda d: d >= week_start,
+            lambda d: d >= month_start,
+            lambda d: period[0] <= d <= period[1],
+            lambda d: prev[0] <= d < prev[1],
+        )
+        counts = [0] * len(windows)
+        gross = [Decimal("0")] * len(windows)
+        refunds = [Decimal("0")] * len(windows)
+        revenue = cost = Decimal("0")
+        for day, sales_count, gross_amount, refund_amount, items_amount, cost_amount in rows:
+            for idx, inside in enumerate(windows):
+                if inside(day):
+                    counts[idx] += sales_count or 0
+                    gross[idx] += gross_amount or 0
+                    refunds[idx] += refund_amount or 0
+            if windows[3](day):
+                revenue += items_amount or 0
+                cost += cost_amount or 0
+        agg = (
+            counts[0], gross[0],
+            counts[1], gross[1],
+            counts[2], gross[2],
+            counts[3], gross[3],
+            gross[4],
+        )
+        return agg, tuple(refunds), (revenue, cost)
+
     def _load_kpis(self):
         """Carga KPIs principales."""
         company_id = self._company_id()
@@ -443,7 +558,7 @@ class DashboardState(MixinState):
             self.pending_debt = 0.0
             self.low_stock_count = 0
             return
-        with rx.session() as session:
+        with read_session() as session:
             session.info["tenant_bypass"] = True
             # Total de clientes
             self.total_clients = session.exec(
@@ -548,6 +663,7 @@ class DashboardState(MixinState):
         Usa una sola query con CASE WHEN por día (UTC boundaries) en lugar
         de cargar N filas individuales y agrupar en Python.
         La diferencia timezone sólo afecta ventas en la hora de medianoche UTC.
+        Con los rollups habilitados lee 7 filas de ``SalesDailyRollup``.
         """
         today_local = self._display_now().replace(hour=0, minute=0, second=0, microsecond=0)
         company_id = self._company_id()
@@ -569,32 +685,47 @@ class DashboardState(MixinState):
         oldest_start = day_ranges[0][1]
         newest_end = day_ranges[-1][2]
 
-        with rx.session() as session:
+        with read_session() as session:
             session.info["tenant_bypass"] = True
-            # Una sola query: 7 sumas condicionales → 1 fila de resultado
-            cols = [
-                func.coalesce(
-                    func.sum(
-                        case(
-                            (and_(Sale.timestamp >= d_start, Sale.timestamp < d_end), Sale.total_amount),
-                            else_=literal(0),
+            if SALES_ROLLUP_READS_ENABLED:
+                totals = dict(
+                    session.exec(
+                        select(SalesDailyRollup.day, SalesDailyRollup.gross_amount).where(
+                            and_(
+                                SalesDailyRollup.company_id == company_id,
+                                SalesDailyRollup.branch_id == branch_id,
+                                SalesDailyRollup.day >= day_ranges[0][0].date(),
+                                SalesDailyRollup.day <= day_ranges[-1][0].date(),
+                            )
                         )
-                    ),
-                    0,
-                ).label(f"d{idx}")
-                for idx, (_, d_start, d_end) in enumerate(day_ranges)
-            ]
-            row = session.exec(
-                select(*cols).where(
-                    and_(
-                        Sale.timestamp >= oldest_start,
-                        Sale.timestamp < newest_end,
-                        Sale.status != SaleStatus.cancelled,
-                        Sale.company_id == company_id,
-                        Sale.branch_id == branch_id,
-                    )
+                    ).all()
                 )
-            ).one()
+                row = [totals.get(day_local.date(), 0) for day_local, _, _ in day_ranges]
+            else:
+                # Una sola query: 7 sumas condicionales → 1 fila de resultado
+                cols = [
+                    func.coalesce(
+                        func.sum(
+                            case(
+                                (and_(Sale.timestamp >= d_start, Sale.timestamp < d_end), Sale.total_amount),
+                                else_=literal(0),
+                            )
+                        ),
+                        0,
+                    ).label(f"d{idx}")
+                    for idx, (_, d_start, d_end) in enumerate(day_ranges)
+                ]
+                row = session.exec(
+                    select(*cols).where(
+                        and_(
+                            Sale.timestamp >= oldest_start,
+                            Sale.timestamp < newest_end,
+                            Sale.status != SaleStatus.cancelled,
+                            Sale.company_id == company_id,
+                            Sale.branch_id == branch_id,
+                        )
+                    )
+                ).one()
 
         days_data = [
             {
@@ -607,7 +738,11 @@ class DashboardState(MixinState):
         self.dash_sales_by_day = days_data
 
     def _load_top_products(self):
-        """Carga los 5 productos más vendidos del período seleccionado."""
+        """Carga los 5 productos más vendidos del período seleccionado.
+
+        Con los rollups habilitados, ventas y devoluciones salen de la misma
+        fila de ``SalesProductRollup`` (devoluciones por día de devolución).
+        """
         period_start, period_end, _, _ = self._get_period_dates()
         company_id = self._company_id()
         branch_id = self._branch_id()
@@ -615,54 +750,83 @@ class DashboardState(MixinState):
             self.dash_top_products = []
             return
 
-        with rx.session() as session:
+        with read_session() as session:
             session.info["tenant_bypass"] = True
-            results = session.exec(
-                select(
-                    Product.id,
-                    Product.description,
-                    func.sum(SaleItem.quantity).label("qty"),
-                    func.sum(SaleItem.subtotal).label("revenue")
-                )
-                .select_from(SaleItem)
-                .join(Product, Product.id == SaleItem.product_id)
-                .join(Sale, Sale.id == SaleItem.sale_id)
-                .where(
-                    and_(
-                        Sale.timestamp >= period_start,
-                        Sale.timestamp <= period_end,
-                        Sale.status != SaleStatus.cancelled,
-                        Sale.company_id == company_id,
-                        Sale.branch_id == branch_id,
-                        Product.company_id == company_id,
-                        Product.branch_id == branch_id,
+            if SALES_ROLLUP_READS_ENABLED:
+                local_start, local_end, _, _ = self._local_period_dates()
+                rows = session.exec(
+                    select(
+                        SalesProductRollup.product_id,
+                        Product.description,
+                        func.sum(SalesProductRollup.quantity),
+                        func.sum(SalesProductRollup.gross_amount),
+                        func.sum(SalesProductRollup.refund_quantity),
+                        func.sum(SalesProductRollup.refund_amount),
                     )
-                )
-                .group_by(Product.id, Product.description)
-                .order_by(func.sum(SaleItem.subtotal).desc())
-                .limit(30)
-            ).all()
+                    .join(Product, Product.id == SalesProductRollup.product_id)
+                    .where(
+                        and_(
+                            SalesProductRollup.company_id == company_id,
+                            SalesProductRollup.branch_id == branch_id,
+                            SalesProductRollup.day >= local_start.date(),
+                            SalesProductRollup.day <= local_end.date(),
+                            Product.company_id == company_id,
+                            Product.branch_id == branch_id,
+                        )
+                    )
+                    .group_by(SalesProductRollup.product_id, Product.description)
+                    .order_by(func.sum(SalesProductRollup.gross_amount).desc())
+                    .limit(30)
+                ).all()
+                results = [r[:4] for r in rows]
+                ret_rows = [(r[0], r[4], r[5]) for r in rows]
+            else:
+                results = session.exec(
+                    select(
+                        Product.id,
+                        Product.description,
+                        func.sum(SaleItem.quantity).label("qty"),
+                        func.sum(SaleItem.subtotal).label("revenue")
+                    )
+                    .select_from(SaleItem)
+                    .join(Product, Product.id == SaleItem.product_id)
+                    .join(Sale, Sale.id == SaleItem.sale_id)
+                    .where(
+                        and_(
+                            Sale.timestamp >= period_start,
+                            Sale.timestamp <= period_end,
+                            Sale.status != SaleStatus.cancelled,
+                            Sale.company_id == company_id,
+                            Sale.branch_id == branch_id,
+                            Product.company_id == company_id,
+                            Product.branch_id == branch_id,
+                        )
+                    )
+                    .group_by(Product.id, Product.description)
+                    .order_by(func.sum(SaleItem.subtotal).desc())
+                    .limit(30)
+                ).all()
 
-            # Devoluciones por producto para descontar del neto
-            ret_rows = session.exec(
-                select(
-                    SaleItem.product_id,
-                    func.sum(SaleReturnItem.quantity).label("ret_qty"),
-                    func.sum(SaleReturnItem.refund_subtotal).label("ret_rev"),
-                )
-                .select_from(SaleReturnItem)
-                .join(SaleReturn, SaleReturn.id == SaleReturnItem.sale_return_id)
-                .join(SaleItem, SaleItem.id == SaleReturnItem.sale_item_id)
-                .where(
-                    and_(
-                        SaleReturn.timestamp >= period_start,
-                        SaleReturn.timestamp <= period_end,
-                        SaleReturn.company_id == company_id,
-                        SaleReturn.branch_id == branch_id,
+                # Devoluciones por producto para descontar del neto
+                ret_rows = session.exec(
+                    select(
+                        SaleItem.product_id,
+                        func.sum(SaleReturnItem.quantity).label("ret_qty"),
+                        func.sum(SaleReturnItem.refund_subtotal).label("ret_rev"),
                     )
-                )
-                .group_by(SaleItem.product_id)
-            ).all()
+                    .select_from(SaleReturnItem)
+                    .join(SaleReturn, SaleReturn.id == SaleReturnItem.sale_return_id)
+                    .join(SaleItem, SaleItem.id == SaleReturnItem.sale_item_id)
+                    .where(
+                        and_(
+                            SaleReturn.timestamp >= period_start,
+                            SaleReturn.timestamp <= period_end,
+                            SaleReturn.company_id == company_id,
+                            SaleReturn.branch_id == branch_id,
+                        )
+                    )
+                    .group_by(SaleItem.product_id)
+                ).all()
 
         refund_by_prod: dict[int, tuple[float, float]] = {
             r[0]: (float(r[1] or 0), float(r[2] or 0)) for r in ret_rows
@@ -702,7 +866,7 @@ class DashboardState(MixinState):
         now = utc_now_naive()
         threshold = now + timedelta(days=BATCH_EXPIRING_DAYS)
 
-        with rx.session() as session:
+        with read_session() as session:
             session.info["tenant_bypass"] = True
             # Lote + producto + variante (LEFT JOIN sobre variante porque
             # un lote puede pertenecer al producto raíz o a una variante).
@@ -817,61 +981,87 @@ class DashboardState(MixinState):
         if not company_id or not branch_id:
             return []
 
-        with rx.session() as session:
+        with read_session() as session:
             session.info["tenant_bypass"] = True
-            category_expr = func.coalesce(
-                func.nullif(func.trim(SaleItem.product_category_snapshot), ""),
-                Product.category,
-                MSG.FALLBACK_NO_CATEGORY,
-            )
-            query = (
-                select(
-                    category_expr,
-                    func.sum(SaleItem.subtotal).label("total"),
-                )
-                .select_from(SaleItem)
-                .outerjoin(Product, Product.id == SaleItem.product_id)
-                .join(Sale, Sale.id == SaleItem.sale_id)
-                .where(
-                    and_(
-                        Sale.timestamp >= period_start,
-                        Sale.timestamp <= period_end,
-                        Sale.status != SaleStatus.cancelled,
-                        Sale.company_id == company_id,
-                        Sale.branch_id == branch_id,
-                        SaleItem.company_id == company_id,
-                        SaleItem.branch_id == branch_id,
+            if SALES_ROLLUP_READS_ENABLED:
+                local_start, local_end, _, _ = self._local_period_dates()
+                query = (
+                    select(
+                        SalesCategoryRollup.category,
+                        func.sum(SalesCategoryRollup.gross_amount).label("total"),
+                        func.sum(SalesCategoryRollup.refund_amount),
+                    )
+                    .where(
+                        and_(
+                            SalesCategoryRollup.company_id == company_id,
+                            SalesCategoryRollup.branch_id == branch_id,
+                            SalesCategoryRollup.day >= local_start.date(),
+                            SalesCategoryRollup.day <= local_end.date(),
+                        )
                     )
+                    .group_by(SalesCategoryRollup.category)
+                    .order_by(func.sum(SalesCategoryRollup.gross_amount).desc())
                 )
-                .group_by(category_expr)
-                .order_by(func.sum(SaleItem.subtotal).desc())
-            )
-            if limit is not None and int(limit) > 0:
-                query = query.limit(int(limit))
-            rows = session.exec(query).all()
-
-            # Devoluciones por categoría para descontar del neto
-            ref_cat_expr = func.coalesce(
-                func.nullif(func.trim(SaleItem.product_category_snapshot), ""),
-                Product.category,
-                MSG.FALLBACK_NO_CATEGORY,
-            )
-            ref_rows = session.exec(
-                select(ref_cat_expr, func.sum(SaleReturnItem.refund_subtotal))
-                .select_from(SaleReturnItem)
-                .join(SaleReturn, SaleReturn.id == SaleReturnItem.sale_return_id)
-                .join(SaleItem, SaleItem.id == SaleReturnItem.sale_item_id)
-                .outerjoin(Product, Product.id == SaleItem.product_id)
-                .where(
-                    and_(
-                        SaleReturn.timestamp >= period_start,
-                        SaleReturn.timestamp <= period_end,
-                        SaleReturn.company_id == company_id,
-                        SaleReturn.branch_id == branch_id,
+                if limit is not None and int(limit) > 0:
+                    query = query.limit(int(limit))
+                cat_rows = session.exec(query).all()
+                rows = [r[:2] for r in cat_rows]
+                ref_rows = [(r[0], r[2]) for r in cat_rows]
+            else:
+                category_expr = func.coalesce(
+                    func.nullif(func.trim(SaleItem.product_category_snapshot), ""),
+                    Product.category,
+                    MSG.FALLBACK_NO_CATEGORY,
+                )
+                query = (
+                    select(
+                        category_expr,
+                        func.sum(SaleItem.subtotal).label("total"),
+                    )
+                    .select_from(SaleItem)
+                    .outerjoin(Product, Product.id == SaleItem.product_id)
+                    .join(Sale, Sale.id == SaleItem.sale_id)
+                    .where(
+                        and_(
+                            Sale.timestamp >= period_start,
+                            Sale.timestamp <= period_end,
+                            Sale.status != SaleStatus.cancelled,
+                            Sale.company_id == company_id,
+                            Sale.branch_id == branch_id,
+                            SaleItem.company_id == company_id,
+                            SaleItem.branch_id == branch_id,
+                        )
                     )
+                    .group_by(category_expr)
+                    .order_by(func.sum(SaleItem.subtotal).desc())
                 )
-                .group_by(ref_cat_expr)
-            ).all()
+                if limit is not None and int(limit) > 0:
+                    query = query.limit(int(limit))
+                rows = session.exec(query).all()
+
+                # Devoluciones por categoría para descontar del neto
+                ref_cat_expr = func.coalesce(
+                    func.nullif(func.trim(SaleItem.product_category_snapshot), ""),
+                    Product.category,
+                    MSG.FALLBACK_NO_CATEGORY,
+                )
+                ref_rows = session.exec(
+                    select(ref_cat_expr, func.sum(SaleReturnItem.refund_subtotal))
+                    .select_from(SaleReturnItem)
+                    .join(SaleReturn, SaleReturn.id == SaleReturnItem.sale_return_id)
+                    .join(SaleItem, SaleItem.id == SaleReturnItem.sale_item_id)
+                    .outerjoin(Product, Product.id == SaleItem.product_id)
+                    .where(
+                        and_(
+                            SaleReturn.timestamp >= period_start,
+                            SaleReturn.timestamp <= period_end,
+                            SaleReturn.company_id == company_id,
+                            SaleReturn.branch_id == branch_id,
+                        )
+                    )
+                    .group_by(ref_cat_expr)
+                ).all()
+
         refund_by_cat: dict[str, float] = {
             (r[0] or MSG.FALLBACK_NO_CATEGORY): float(r[1] or 0) for r in ref_rows
         }
@@ -904,7 +1094,7 @@ class DashboardState(MixinState):
             self.dash_payment_breakdown = []
             return
 
-        with rx.session() as session:
+        with read_session() as session:
             session.info["tenant_bypass"] = True
             results = session.exec(
                 select(
@@ -1029,7 +1219,7 @@ class DashboardState(MixinState):
         discount_by_cat: dict[str, float] = {}
         refund_by_cat: dict[str, float] = {}
         if company_id and branch_id:
-            with rx.session() as session:
+            with read_session() as session:
                 session.info["tenant_bypass"] = True
                 category_expr = func.coalesce(
                     func.nullif(func.trim(SaleItem.product_category_snapshot), ""),
@@ -0,0 +1,158 @@
+"""Mixin de exports encolados: junta filas, encola y entrega la descarga.
+
+Los handlers de export son ``@rx.event(background=True)``: validan y capturan
+filtros bajo lock y delegan en :meth:`ExportJobMixin._run_export_job`, que
+
+  1. reusa un job equivalente (mismos tenant/reporte/filtros) si existe;
+  2. si no, junta el payload con ``collect`` en el pool sync (con el state
+     tomado, igual que un handler normal, pero sin bloquear el event loop);
+  3. encola el job y suelta el state mientras el pool de procesos arma el
+     XLSX, actualizando ``export_job_progress``;
+  4. devuelve ``rx.download`` con el resultado.
+
+Con ``EXPORT_JOBS=0`` el renderer corre en un thread del proceso (sin cola).
+"""
+from __future__ import annotations
+
+import asyncio
+import io
+import os
+import time
+from typing import Any, Callable
+
+import reflex as rx
+
+from app.i18n import MSG
+from app.services.export_jobs import (
+    EXPORT_JOBS_ENABLED,
+    STATUS_DONE,
+    ExportJobError,
+    find_export_job,
+    get_export_job,
+    read_export_result,
+    submit_export_job,
+)
+from app.services.export_renderers import EXPORT_RENDERERS
+from app.utils.async_rate_limit import Limit, hit_limits
+from app.utils.logger import get_logger
+from app.utils.sync_db import run_sync_db
+
+logger = get_logger("ExportJobMixin")
+
+EXPORT_JOB_POLL_SECONDS = 0.5
+# Espera máxima del handler por un job (cola + armado).
+EXPORT_JOB_WAIT_SECONDS = float(os.getenv("EXPORT_JOB_WAIT_SECONDS", "600"))
+# Exports nuevos (no reusados) por empresa y minuto.
+EXPORT_RATE_LIMIT = int(os.getenv("EXPORT_RATE_LIMIT", "10"))
+EXPORT_RATE_WINDOW_SECONDS = 60
+
+
+def _render_inline(report: str, payload: dict[str, Any]) -> bytes:
+    workbook = EXPORT_RENDERERS[report](payload, lambda _pct: None)
+    output = io.BytesIO()
+    workbook.save(output)
+    return output.getvalue()
+
+
+class ExportJobMixin:
+    export_job_running: bool = False
+    export_job_progress: int = 0
+    export_job_report: str = ""
+
+    @rx.var(cache=True)
+    def export_button_label(self) -> str:
+        if not self.export_job_running:
+            return "Exportar"
+        return f"Exportando… {self.export_job_progress}%"
+
+    async def _finish_export_job(self) -> None:
+        async with self:
+            self.export_job_running = False
+            self.export_job_progress = 0
+            self.export_job_report = ""
+
+    async def _run_export_job(
+        self,
+        report: str,
+        *,
+        company_id: int,
+        branch_id: int | None,
+        filters: dict[str, Any],
+        filename: str,
+        collect: Callable[[], dict[str, Any] | None],
+        empty_message: str,
+    ):
+        """Genera ``report`` fuera del event loop y devuelve el evento final.
+
+        ``collect`` arma el payload del renderer leyendo el state/BD; devuelve
+        None si no hay nada que exportar (→ toast ``empty_message``). Corre con
+        el state tomado: pasar un lambda que resuelva ``self.…`` al llamarse,
+        no un método ligado fuera del lock.
+        """
+        async with self:
+            if self.export_job_running:
+                return rx.toast(MSG.EXPORT_IN_PROGRESS, duration=3000)
+            self.export_job_running = True
+            self.export_job_progress = 0
+            self.export_job_report = report
+
+        try:
+            job = None
+            if EXPORT_JOBS_ENABLED:
+                job = await asyncio.to_thread(
+                    find_export_job, report, company_id, branch_id, filters
+                )
+            if job is None:
+                throttle = await hit_limits(
+                    Limit(f"export:{company_id}", EXPORT_RATE_LIMIT, EXPORT_RATE_WINDOW_SECONDS)
+                )
+                if not throttle.allowed:
+                    seconds = max(1, int(throttle.retry_after + 0.999))
+                    return rx.toast(
+                        MSG.PERM_RATE_LIMITED.format(seconds=seconds), duration=4000
+                    )
+                async with self:
+                    payload = await run_sync_db(
+                        collect, company_id=company_id, operation=f"export:{report}"
+                    )
+                if not payload:
+                    return rx.toast(empty_message, duration=3000)
+                if not EXPORT_JOBS_ENABLED:
+                    data = await asyncio.to_thread(_render_inline, report, payload)
+                    return rx.download(data=data, filename=filename)
+                job = await asyncio.to_thread(
+                    submit_export_job,
+                    report,
+                    company_id=company_id,
+                    branch_id=branch_id,
+                    filters=filters,
+                    payload=payload,
+                    filename=filename,
+                )
+
+            deadline = time.monotonic() + EXPORT_JOB_WAIT_SECONDS
+            while job.pending:
+                if time.monotonic() > deadline:
+                    return rx.toast(MSG.EXPORT_TIMEOUT, duration=5000)
+                await asyncio.sleep(EXPORT_JOB_POLL_SECONDS)
+                current = await asyncio.to_thread(get_export_job, job.id)
+                if current is None:
+                    raise ExportJobError("El export venció antes de terminar.")
+                if current.progress != job.progress:
+                    async with self:
+                        self.export_job_progress = current.progress
+                job = current
+
+            if job.status != STATUS_DONE:
+                raise ExportJobError(job.error or "Error desconocido.")
+            data = await asyncio.to_thread(read_export_result, job.id)
+            return rx.download(data=data, filename=job.filename or filename)
+        except ExportJobError as exc:
+            logger.warning("Export %s falló: %s", report, exc)
+            return rx.toast(MSG.EXPORT_FAILED.format(detail=exc), duration=5000)
+        except Exception as exc:
+            logger.exception("Export %s falló", report)
+            detail = str(exc) or type(exc).__name__
+            return rx.toast(MSG.EXPORT_FAILED.format(detail=detail), duration=5000)
+        finally:
+            await self._finish_export_job()
@@ -12,6 +12,9 @@ from app.enums import PaymentMethodType, ReceiptType, FiscalStatus, ReturnReason
 from app.i18n import MSG
 from app.utils.payment import payment_method_label
 from app.utils.sanitization import escape_like
+from app.services.server_collection import ServerCollection, page_count
+from app.utils.sync_db import run_sync_db
+from app.utils.db_read import read_session
 from app.models import (
     Sale,
     SaleItem,
@@ -31,25 +34,29 @@ from app.models import (
     PriceList,
 )
 from .mixin_state import MixinState
+from .export_job_mixin import ExportJobMixin
 from app.utils.exports import (
     create_excel_workbook,
     style_header_row,
     add_data_rows,
     auto_adjust_column_widths,
     add_company_header,
-    add_totals_row_with_formulas,
-    add_notes_section,
     CURRENCY_FORMAT,
-    PERCENT_FORMAT,
-    NUMBER_FORMAT,
-    THIN_BORDER,
     POSITIVE_FILL,
     NEGATIVE_FILL,
     WARNING_FILL,
 )
 from app.utils.tenant import tenant_bypass
 from app.utils.formatting import fmt_input_num, fmt_price
-from app.utils.pagination import build_page_window
+from app.utils.pagination import (
+    KeysetPlan,
+    build_page_window,
+    count_cache,
+    keyset_after,
+    plan_keyset_page,
+    remember_keyset_page,
+    settle_keyset_total,
+)
 
 REPORT_METHOD_KEYS = [
     "cash",
@@ -82,8 +89,12 @@ REPORT_CASHBOX_ACTIONS = {
 
 logger = logging.getLogger(__name__)
 
+# Detalle del reporte por método de pago: filas completas por sesión fuera
+# del state; el state guarda la página visible.
+_REPORT_DETAIL = ServerCollection("historial:report_detail")
+
 
-class HistorialState(MixinState):
+class HistorialState(ExportJobMixin, MixinState):
     """Estado del historial de ventas y reportes financieros.
 
     Gestiona la vista de historial con filtros por fecha, método de pago,
@@ -131,7 +142,13 @@ class HistorialState(MixinState):
     filtered_history: list[dict] = []
     total_pages: int = 1
     report_method_summary: list[dict] = []
-    _report_detail_rows: list[dict] = rx.field(default_factory=list, is_var=False)
+    report_detail_total: int = 0
+    paginated__report_detail_rows: list[dict] = []
+    # Paginación keyset del historial: marcadores página → [primera, última]
+    # clave (timestamp, id), válidos para el alcance (tenant + filtros) indicado.
+    _history_keyset_pages: dict[int, list] = rx.field(default_factory=dict, is_var=False)
+    _history_keyset_scope: str = ""
+    _history_total_items: int = 0
     report_closing_rows: list[dict] = []
     payment_stats: Dict[str, float] = {
         "efectivo": 0.0,
@@ -196,7 +213,7 @@ class HistorialState(MixinState):
         if not company_id or not branch_id:
             self.available_category_options = [["Todas", "Todas"]]
             return
-        with rx.session() as session:
+        with read_session() as session:
             session.info["tenant_bypass"] = True
             for name in session.exec(
                 select(Category.name)
@@ -291,7 +308,7 @@ class HistorialState(MixinState):
         if not company_id:
             self.available_report_user_options = [["Todos", "Todos"]]
             return
-        with rx.session() as session:
+        with read_session() as session:
             session.info["tenant_bypass"] = True
             usernames = session.exec(
                 select(User.username).where(User.company_id == company_id)
@@ -395,7 +412,7 @@ class HistorialState(MixinState):
         branch_id = self._branch_id()
         if not company_id or not branch_id:
             return rows
-        with rx.session() as session:
+        with read_session() as session:
             session.info["tenant_bypass"] = True
             pm_names = self._load_pm_names(session, company_id, branch_id)
             if source_filter in {"Todos", "Ventas"}:
@@ -544,7 +561,7 @@ class HistorialState(MixinState):
         branch_id = self._branch_id()
         if not company_id or not branch_id:
             return rows
-        with rx.session() as session:
+        with read_session() as session:
             session.info["tenant_bypass"] = True
             log_query = (
                 select(CashboxLog, User.username)
@@ -847,21 +864,72 @@ class HistorialState(MixinState):
             }
         return info
 
-    def _fetch_sales_history(
-        self, offset: int | None = None, limit: int | None = None
-    ) -> list[dict]:
+    def _sales_page_keys(self, session, plan: KeysetPlan) -> list[tuple]:
+        """Claves ``(timestamp, id)`` de una página, sin cargar las ventas.
+
+        Un SELECT por estado no cancelado con ``status = X`` unidos con UNION
+        ALL: cada rama recorre en orden ``ix_sale_tenant_status_timestamp``
+        (covering: InnoDB guarda el id en el índice) y corta en su LIMIT; el
+        ``status != cancelled`` de una sola query obligaba a ordenar todo.
+        """
+        keyset_cols = (Sale.timestamp, Sale.id)
+        descending = not plan.backward
+        order = (
+            (Sale.timestamp.desc(), Sale.id.desc())
+            if descending
+            else (Sale.timestamp.asc(), Sale.id.asc())
+        )
+        branches = []
+        for status in SaleStatus:
+            if status == SaleStatus.cancelled:
+                continue
+            branch = select(Sale.timestamp.label("ts"), Sale.id.label("sale_id")).where(
+                Sale.status == status
+            )
+            branch = self._apply_sales_filters(branch)
+            if plan.after is not None:
+                branch = branch.where(
+                    keyset_after(keyset_cols, plan.after, descending=descending)
+                )
+            branches.append(branch.order_by(*order).limit(plan.offset + plan.limit))
+        if not branches:
+            return []
+        keys = sa.union_all(*branches).subquery()
+        outer_order = (
+            (keys.c.ts.desc(), keys.c.sale_id.desc())
+            if descending
+            else (keys.c.ts.asc(), keys.c.sale_id.asc())
+        )
+        rows = session.exec(
+            select(keys.c.ts, keys.c.sale_id)
+            .order_by(*outer_order)
+            .offset(plan.offset)
+            .limit(plan.limit)
+        ).all()
+        page_keys = [(ts, int(sale_id)) for ts, sale_id in rows]
+        if plan.backward:
+            page_keys.reverse()
+        return page_keys
+
+    def _fetch_sales_history(self, plan: KeysetPlan) -> tuple[list[dict], list[tuple]]:
+        """Filas del historial para ``plan`` y sus claves ``(timestamp, id)``."""
         # tenant_bypass: evita que el listener aplique with_loader_criteria
         # dos veces en los SELECTs secundarios de selectinload (payments, items,
         # user, client). La query principal ya tiene WHERE explícito de tenant;
         # los secundarios quedan aislados por sale_id IN (...).
         with tenant_bypass():
-          with rx.session() as session:
-            query = self._sales_query()
-            if offset is not None:
-                query = query.offset(offset)
-            if limit is not None:
-                query = query.limit(limit)
-            sales = session.exec(query).all()
+          with read_session() as session:
+            page_keys = self._sales_page_keys(session, plan)
+            if not page_keys:
+                return [], []
+            page_ids = [sale_id for _ts, sale_id in page_keys]
+            sales_by_id = {
+                sale.id: sale
+                for sale in session.exec(
+                    self._sales_query().where(Sale.id.in_(page_ids))
+                ).all()
+            }
+            sales = [sales_by_id[sale_id] for sale_id in page_ids if sale_id in sales_by_id]
             sale_ids = [sale.id for sale in sales if sale and sale.id is not None]
             log_payment_info = self._sale_log_payment_info(session, sale_ids)
             sale_user_lookup = self._build_sale_user_lookup(session, sales)
@@ -938,46 +1006,96 @@ class HistorialState(MixinState):
                         "total_refunded": self._fmt_amount(self._round_currency(refunded)),
                     }
                 )
-            return rows
+            return rows, page_keys
+
+    def _sales_count_key(self) -> tuple:
+        start_date, end_date = self._history_date_range()
+        return (
+            "historial.ventas",
+            self._company_id(),
+            self._branch_id(),
+            start_date,
+            end_date,
+            self.history_filter_type,
+            (self.history_filter_product or "").strip(),
+            (self.history_filter_category or "").strip(),
+        )
 
-    def _sales_total_count(self) -> int:
+    def _sales_total_count(self, refresh: bool = False) -> int:
+        """Total del historial filtrado, cacheado por proceso (ver CountCache)."""
         company_id = self._company_id()
         branch_id = self._branch_id()
         if not company_id or not branch_id:
             return 0
-        with rx.session() as session:
-            session.info["tenant_bypass"] = True
-            count_query = (
-                select(sa.func.count())
-                .select_from(Sale)
-                .where(Sale.status != SaleStatus.cancelled)
-            )
-            count_query = self._apply_sales_filters(count_query)
-            return session.exec(count_query).one()
 
-    def _refresh_history_cache(self):
+        def _count() -> int:
+            with read_session() as session:
+                session.info["tenant_bypass"] = True
+                count_query = (
+                    select(sa.func.count())
+                    .select_from(Sale)
+                    .where(Sale.status != SaleStatus.cancelled)
+                )
+                count_query = self._apply_sales_filters(count_query)
+                return session.exec(count_query).one()
+
+        return count_cache.get(self._sales_count_key(), _count, refresh=refresh)
+
+    def _refresh_history_cache(self, recount: bool = True):
+        """Recarga la página actual del historial.
+
+        ``recount=False`` (cambio de página) reutiliza el total ya calculado;
+        el total se corrige igual con lo que devuelve la página leída.
+        """
         if not self.current_user["privileges"]["view_historial"]:
             self.filtered_history = []
             self.total_pages = 1
             return
 
-        total_items = int(self._sales_total_count() or 0)
-        total_pages = 1 if total_items == 0 else (total_items + self.items_per_page - 1) // self.items_per_page
+        per_page = max(self.items_per_page, 1)
+        count_key = self._sales_count_key()
+        scope = repr((count_key, per_page))
+        if scope != self._history_keyset_scope:
+            self._history_keyset_scope = scope
+            self._history_keyset_pages = {}
+            recount = True
+        if recount:
+            self._history_total_items = int(self._sales_total_count() or 0)
+
+        total_items = self._history_total_items
+        total_pages = 1 if total_items == 0 else (total_items + per_page - 1) // per_page
         page = min(max(self.current_page_history, 1), total_pages)
         if page != self.current_page_history:
             self.current_page_history = page
 
-        offset = (page - 1) * self.items_per_page
-        self.filtered_history = self._fetch_sales_history(
-            offset=offset,
-            limit=self.items_per_page,
+        plan = plan_keyset_page(page, per_page, total_items, self._history_keyset_pages)
+        rows, page_keys = self._fetch_sales_history(plan)
+        if not page_keys and page > 1 and plan.backward and not recount:
+            # Leída desde el final con un total viejo: recontar y reintentar.
+            self._history_total_items = int(self._sales_total_count(refresh=True) or 0)
+            return self._refresh_history_cache(recount=False)
+        if page_keys:
+            self._history_keyset_pages = remember_keyset_page(
+                self._history_keyset_pages, page, page_keys[0], page_keys[-1]
+            )
+        settled = settle_keyset_total(
+            total_items, page, per_page, len(page_keys), exact_start=not plan.backward
         )
+        if settled != total_items:
+            self._history_total_items = settled
+            count_cache.put(count_key, settled)
+            total_pages = 1 if settled == 0 else (settled + per_page - 1) // per_page
+            if page > total_pages:
+                # El total cacheado estaba alto y la página quedó vacía.
+                self.current_page_history = total_pages
+                return self._refresh_history_cache(recount=False)
+        self.filtered_history = rows
         self.total_pages = total_pages
 
     def _refresh_report_cache(self):
         if not self.current_user["privileges"]["view_historial"]:
             self.report_method_summary = []
-            self._report_detail_rows = []
+            self._set_report_detail_rows([])
             self.report_closing_rows = []
             return
 
@@ -1017,17 +1135,8 @@ class HistorialState(MixinState):
 
         closings = self._build_report_closings()
         self.report_method_summary = summary
-        self._report_detail_rows = entries
         self.report_closing_rows = closings
-
-        detail_total_pages = (
-            1
-            if len(entries) == 0
-            else (len(entries) + self.report_detail_items_per_page - 1)
-            // self.report_detail_items_per_page
-        )
-        if self.report_detail_current_page > detail_total_pages:
-            self.report_detail_current_page = detail_total_pages
+        self._set_report_detail_rows(entries)
 
         closing_total_pages = (
             1
@@ -1217,7 +1326,7 @@ class HistorialState(MixinState):
         total_credit = Decimal("0.00")
         pending_total = Decimal("0.00")
 
-        with rx.session() as session:
+        with read_session() as session:
             session.info["tenant_bypass"] = True
             pm_names = self._load_pm_names(session, company_id, branch_id)
             payment_query = (
@@ -1436,6 +1545,45 @@ class HistorialState(MixinState):
             for day, total in sales_day_rows
         ]
 
+    def _set_report_detail_rows(self, rows: list[dict]) -> None:
+        self.report_detail_total = _REPORT_DETAIL.replace(self._collection_token(), rows)
+        self._show_report_detail_page()
+
+    def _show_report_detail_page(self) -> None:
+        per_page = max(self.report_detail_items_per_page, 1)
+        self.report_detail_current_page = min(
+            max(self.report_detail_current_page, 1),
+            page_count(self.report_detail_total, per_page),
+        )
+        rows = _REPORT_DETAIL.page(
+            self._collection_token(), self.report_detail_current_page, per_page
+        )
+        if rows is None:
+            # Colección vencida: se rearma el reporte (vuelve a entrar acá).
+            self._refresh_report_cache()
+            return
+        self.paginated__report_detail_rows = rows
+
+    async def _goto_report_detail_page(self, page_num: int) -> None:
+        """Cambio de página desde el loop: lee sólo la página de la colección."""
+        self.report_detail_current_page = page_num
+        rows = await _REPORT_DETAIL.page_async(
+            self._collection_token(),
+            page_num,
+            max(self.report_detail_items_per_page, 1),
+        )
+        if rows is None:
+            await self._reload_report()
+            return
+        self.paginated__report_detail_rows = rows
+
+    async def _reload_report(self) -> None:
+        await run_sync_db(
+            self._refresh_report_cache,
+            company_id=self._company_id(),
+            operation="historial.report",
+        )
+
     def _refresh_historial_cache(self):
         self._refresh_history_cache()
         self._refresh_report_cache()
@@ -1443,26 +1591,7 @@ class HistorialState(MixinState):
 
     @rx.var(cache=True)
     def report_detail_total_pages(self) -> int:
-        _ = self._report_update_trigger
-        total_items = len(self._report_detail_rows)
-        if total_items == 0:
-            return 1
-        return (
-            total_items + self.report_detail_items_per_page - 1
-        ) // self.report_detail_items_per_page
-
-    @rx.var(cache=True)
-    def paginated__report_detail_rows(self) -> list[dict]:
-        _ = self._report_update_trigger
-        if not self.current_user["privileges"]["view_historial"]:
-            return []
-        total_pages = self.report_detail_total_pages
-        page = min(
-            max(self.report_detail_current_page, 1), total_pages
-        )
-        per_page = max(self.report_detail_items_per_page, 1)
-        offset = (page - 1) * per_page
-        return self._report_detail_rows[offset : offset + per_page]
+        return page_count(self.report_detail_total, self.report_detail_items_per_page)
 
     @rx.var(cache=True)
     def report_closing_total_pages(self) -> int:
@@ -1488,10 +1617,14 @@ class HistorialState(MixinState):
         return self.report_closing_rows[offset : offset + per_page]
 
     @rx.event
-    def set_history_page(self, page_num: int):
+    async def set_history_page(self, page_num: int):
         if 1 <= page_num <= self.total_pages:
             self.current_page_history = page_num
-            self._refresh_history_cache()
+            await run_sync_db(
+                lambda: self._refresh_history_cache(recount=False),
+                company_id=self._company_id(),
+                operation="historial.page",
+            )
 
     @rx.var(cache=False)
     def history_page_window(self) -> list[int]:
@@ -1500,7 +1633,7 @@ class HistorialState(MixinState):
 
 
     @rx.event
-    def apply_history_filters(self):
+    async def apply_history_filters(self):
         self.history_filter_type = self.staged_history_filter_type
         self.history_filter_product = self.staged_history_filter_product
         self.history_filter_category = self.staged_history_filter_category
@@ -1508,15 +1641,32 @@ class HistorialState(MixinState):
         self.history_filter_end_date = self.staged_history_filter_end_date
         self.current_page_history = 1
         self._history_update_trigger += 1
+        await run_sync_db(
+            self._refresh_filtered_history,
+            company_id=self._company_id(),
+            operation="historial.filters",
+        )
+
+    def _refresh_filtered_history(self):
         self._refresh_history_cache()
         self._refresh_financial_cache()
 
     @rx.event
-    def reload_history(self):
-        self._load_category_options()
-        self._load_report_options()
+    async def reload_history(self):
         self._history_update_trigger += 1
         self._report_update_trigger += 1
+        await run_sync_db(
+            self._reload_history_data,
+            company_id=self._company_id(),
+            operation="historial.reload",
+        )
+
+    def _reload_history_data(self):
+        # Recarga explícita: total y marcadores se recalculan desde cero.
+        count_cache.invalidate(self._sales_count_key())
+        self._history_keyset_pages = {}
+        self._load_category_options()
+        self._load_report_options()
         self._refresh_historial_cache()
         self._load_returns_report()
 
@@ -1524,16 +1674,16 @@ class HistorialState(MixinState):
     async def reload_history_background(self):
         """Recarga el historial en segundo plano para evitar bloquear la navegación."""
         async with self:
-            self.reload_history()
+            await self.reload_history()
 
     @rx.event
-    def reset_history_filters(self):
+    async def reset_history_filters(self):
         self.staged_history_filter_type = "Todos"
         self.staged_history_filter_product = ""
         self.staged_history_filter_category = "Todas"
         self.staged_history_filter_start_date = ""
         self.staged_history_filter_end_date = ""
-        self.apply_history_filters()
+        await self.apply_history_filters()
 
     @rx.event
     def set_staged_history_filter_type(self, value: str):
@@ -1556,14 +1706,14 @@ class HistorialState(MixinState):
         self.staged_history_filter_end_date = value or ""
 
     @rx.event
-    def set_report_tab(self, value: str):
+    async def set_report_tab(self, value: str):
         self.report_active_tab = value or "metodos"
         self.report_detail_current_page = 1
         self.report_closing_current_page = 1
-        self._refresh_report_cache()
+        await self._reload_report()
 
     @rx.event
-    def apply_report_filters(self):
+    async def apply_report_filters(self):
         self.report_filter_start_date = self.staged_report_filter_start_date
         self.report_filter_end_date = self.staged_report_filter_end_date
         self.report_filter_method = self.staged_report_filter_method
@@ -1572,10 +1722,10 @@ class HistorialState(MixinState):
         self.report_detail_current_page = 1
         self.report_closing_current_page = 1
         self._report_update_trigger += 1
-        self._refresh_report_cache()
+        await self._reload_report()
 
     @rx.event
-    def reset_report_filters(self):
+    async def reset_report_filters(self):
         self.staged_report_filter_start_date = ""
         self.staged_report_filter_end_date = ""
         self.staged_report_filter_method = "Todos"
@@ -1583,7 +1733,7 @@ class HistorialState(MixinState):
         self.staged_report_filter_user = "Todos"
         self.report_detail_current_page = 1
         self.report_closing_current_page = 1
-        self.apply_report_filters()
+        await self.apply_report_filters()
 
     @rx.event
     def set_staged_report_filter_start_date(self, value: str):
@@ -1606,19 +1756,19 @@ class HistorialState(MixinState):
         self.staged_report_filter_user = value or "Todos"
 
     @rx.event
-    def set_report_detail_page(self, page_num: int):
+    async def set_report_detail_page(self, page_num: int):
         if 1 <= page_num <= self.report_detail_total_pages:
-            self.report_detail_current_page = page_num
+            await self._goto_report_detail_page(page_num)
 
     @rx.event
-    def next_report_detail_page(self):
+    async def next_report_detail_page(self):
         if self.report_detail_current_page < self.report_detail_total_pages:
-            self.report_detail_current_page += 1
+            await self._goto_report_detail_page(self.report_detail_current_page + 1)
 
     @rx.event
-    def prev_report_detail_page(self):
+    async def prev_report_detail_page(self):
         if self.report_detail_current_page > 1:
-            self.report_detail_current_page -= 1
+            await self._goto_report_detail_page(self.report_detail_current_page - 1)
 
     @rx.event
     def set_report_closing_page(self, page_num: int):
@@ -1647,7 +1797,7 @@ class HistorialState(MixinState):
         branch_id = self._branch_id()
         if not company_id or not branch_id:
             return rx.toast(MSG.VAL_COMPANY_UNDEFINED, duration=3000)
-        with rx.session() as session:
+        with read_session() as session:
             session.info["tenant_bypass"] = True
             # FIX 38c: add branch_id filter for branch-level isolation
             sale = session.exec(
@@ -1855,18 +2005,38 @@ class HistorialState(MixinState):
     def total_credit_display(self) -> str:
         return self._fmt_amount(self.total_credit)
 
-    @rx.event
-    def export_to_excel(self):
-        if not self.current_user["privileges"]["export_data"]:
-            return rx.toast(MSG.PERM_EXPORT, duration=3000)
+    @rx.event(background=True)
+    async def export_to_excel(self):
+        async with self:
+            if not self.current_user["privileges"]["export_data"]:
+                return rx.toast(MSG.PERM_EXPORT, duration=3000)
+
+            company_id = self._company_id()
+            if not company_id:
+                return rx.toast(MSG.VAL_COMPANY_UNDEFINED, duration=3000)
+            branch_id = self._branch_id()
+            start_dt, end_dt = self._history_date_range()
+            filters = {
+                "type": self.history_filter_type,
+                "product": self.history_filter_product,
+                "category": self.history_filter_category,
+                "start": start_dt,
+                "end": end_dt,
+                "currency": self._currency_excel_format(),
+            }
 
-        company_id = self._company_id()
-        if not company_id:
-            return rx.toast(MSG.VAL_COMPANY_UNDEFINED, duration=3000)
+        return await self._run_export_job(
+            "historial_ventas",
+            company_id=company_id,
+            branch_id=branch_id,
+            filters=filters,
+            filename="historial_ventas.xlsx",
+            collect=lambda: self._collect_sales_history_export(company_id),
+            empty_message=MSG.SALE_NO_EXPORT,
+        )
 
-        currency_label = self._currency_symbol_clean()
-        currency_format = self._currency_excel_format()
-        company_name = getattr(self, "company_name", "") or "EMPRESA"
+    def _collect_sales_history_export(self, company_id: int) -> dict[str, Any]:
+        """Payload de ``render_sales_history``: una fila por ítem vendido."""
         start_dt, end_dt = self._history_date_range()
         period_start = (
             self._format_company_datetime(start_dt, "%d/%m/%Y")
@@ -1878,44 +2048,9 @@ class HistorialState(MixinState):
             if end_dt
             else "Actual"
         )
-        period_label = f"Período: {period_start} a {period_end}"
-
-        wb, ws = create_excel_workbook("Historial de Ventas")
-
-        # Encabezado profesional
-        row = add_company_header(
-            ws,
-            company_name,
-            "HISTORIAL DE MOVIMIENTOS Y VENTAS",
-            period_label,
-            columns=17,
-            generated_at=self._display_now(),
-        )
-
-        headers = [
-            "Fecha y Hora",
-            "Nº Venta",
-            "Cliente",
-            "Vendedor",
-            "Método de Pago",
-            MSG.FALLBACK_PRODUCT,
-            "Variante",
-            "Categoría",
-            "Cantidad",
-            f"Precio Base ({currency_label})",
-            f"Precio Final ({currency_label})",
-            f"Descuento ({currency_label})",
-            "% Descuento",
-            "Fuente Descuento",
-            f"Subtotal ({currency_label})",
-            "Estado",
-            f"Devolución ({currency_label})",
-        ]
-        style_header_row(ws, row, headers)
-        data_start = row + 1
-        row += 1
+        rows: list[tuple] = []
 
-        with rx.session() as session:
+        with read_session() as session:
             session.info["tenant_bypass"] = True
             query = (
                 select(Sale)
@@ -2120,94 +2255,77 @@ class HistorialState(MixinState):
                         else:
                             discount_source = "Sin Descuento"
 
-                    ws.cell(
-                        row=row,
-                        column=1,
-                        value=self._format_company_datetime(
+                    item_refund = _hist_item_refunds.get(item.id, 0.0) if item and item.id else 0.0
+                    rows.append((
+                        self._format_company_datetime(
                             sale.timestamp,
                             "%d/%m/%Y %H:%M",
                         ) if sale.timestamp else "",
-                    )
-                    ws.cell(row=row, column=2, value=str(sale.id))
-                    ws.cell(row=row, column=3, value=client_name)
-                    ws.cell(row=row, column=4, value=user_name)
-                    ws.cell(row=row, column=5, value=method_display)
-                    ws.cell(row=row, column=6, value=product_name)
-                    ws.cell(row=row, column=7, value=variant_label)
-                    ws.cell(row=row, column=8, value=category)
-                    ws.cell(row=row, column=9, value=quantity).number_format = NUMBER_FORMAT
-                    ws.cell(row=row, column=10, value=display_base).number_format = currency_format
-                    ws.cell(row=row, column=11, value=unit_price).number_format = currency_format
-                    ws.cell(row=row, column=12, value=line_discount).number_format = currency_format
-                    ws.cell(row=row, column=13, value=discount_pct_fraction).number_format = PERCENT_FORMAT
-                    ws.cell(row=row, column=14, value=discount_source)
-                    ws.cell(row=row, column=15, value=subtotal).number_format = currency_format
-                    ws.cell(row=row, column=16, value=estado_sale if idx_item == 0 else "")
-                    item_refund = _hist_item_refunds.get(item.id, 0.0) if item and item.id else 0.0
-                    if item_refund > 0:
-                        ws.cell(row=row, column=17, value=item_refund).number_format = currency_format
-                    else:
-                        ws.cell(row=row, column=17, value="")
-
-                    for col in range(1, 18):
-                        ws.cell(row=row, column=col).border = THIN_BORDER
-                    row += 1
-
-        # Fila de totales
-        totals_row = row
-        add_totals_row_with_formulas(ws, totals_row, data_start, [
-            {"type": "label", "value": "TOTALES"},           # 1
-            {"type": "text", "value": ""},                    # 2
-            {"type": "text", "value": ""},                    # 3
-            {"type": "text", "value": ""},                    # 4
-            {"type": "text", "value": ""},                    # 5
-            {"type": "text", "value": ""},                    # 6
-            {"type": "text", "value": ""},                    # 7
-            {"type": "text", "value": ""},                    # 8
-            {"type": "sum", "col_letter": "I", "number_format": NUMBER_FORMAT},   # 9: cantidad
-            {"type": "text", "value": ""},                    # 10: precio base
-            {"type": "text", "value": ""},                    # 11: precio final
-            {"type": "sum", "col_letter": "L", "number_format": currency_format}, # 12: descuento
-            {"type": "text", "value": ""},                    # 13: %
-            {"type": "text", "value": ""},                    # 14: fuente
-            {"type": "sum", "col_letter": "O", "number_format": currency_format}, # 15: subtotal
-            {"type": "text", "value": ""},                    # 16: estado
-            {"type": "sum", "col_letter": "Q", "number_format": currency_format}, # 17: devolución
-        ])
-
-        # Notas explicativas
-        add_notes_section(ws, totals_row, [
-            "Nº Venta: Identificador único de la transacción en el sistema.",
-            "Precio Base: Precio original del producto antes de aplicar descuentos.",
-            "Precio Final: Precio efectivamente cobrado al cliente.",
-            "Descuento ($): (Precio Base - Precio Final) × Cantidad.",
-            "% Descuento: Porcentaje de reducción respecto al precio base.",
-            "Fuente Descuento: Origen del descuento (Promoción, Lista de Precios, Especial).",
-            "Subtotal: Precio Final × Cantidad.",
-            "Estado: 'Devuelta' = devolución total del pedido; 'Dev. Parcial' = devolución parcial.",
-            "Devolución: Monto devuelto al cliente. Subtotal - Devolución = ingreso neto real.",
-            "Crédito (Completado): El cliente pagó la totalidad del crédito.",
-            "Crédito (Adelanto): El cliente realizó un pago parcial.",
-            "Crédito (Pendiente Total): No se ha recibido ningún pago aún.",
-            "Venta al contado: Cliente no identificado, pago inmediato.",
-        ], columns=17)
-
-        auto_adjust_column_widths(ws)
-
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
+                        str(sale.id),
+                        client_name,
+                        user_name,
+                        method_display,
+                        product_name,
+                        variant_label,
+                        category,
+                        quantity,
+                        display_base,
+                        unit_price,
+                        line_discount,
+                        discount_pct_fraction,
+                        discount_source,
+                        subtotal,
+                        estado_sale if idx_item == 0 else "",
+                        item_refund if item_refund > 0 else "",
+                    ))
+
+        return {
+            "company_name": getattr(self, "company_name", "") or "EMPRESA",
+            "period_label": f"Período: {period_start} a {period_end}",
+            "generated_at": self._display_now(),
+            "currency_label": self._currency_symbol_clean(),
+            "currency_format": self._currency_excel_format(),
+            "rows": rows,
+        }
 
-        return rx.download(data=output.getvalue(), filename="historial_ventas.xlsx")
+    @rx.event(background=True)
+    async def export_report_data(self):
+        async with self:
+            if not self.current_user["privileges"]["export_data"]:
+                return rx.toast(MSG.PERM_EXPORT, duration=3000)
+
+            company_id = self._company_id()
+            branch_id = self._branch_id()
+            start_dt, end_dt = self._report_date_range()
+            active_tab = self.report_active_tab or "metodos"
+            filters = {
+                "tab": active_tab,
+                "start": start_dt,
+                "end": end_dt,
+                "method": self.report_filter_method,
+                "source": self.report_filter_source,
+                "user": self.report_filter_user,
+                "currency": self._currency_excel_format(),
+            }
 
-    @rx.event
-    def export_report_data(self):
-        if not self.current_user["privileges"]["export_data"]:
-            return rx.toast(MSG.PERM_EXPORT, duration=3000)
+        if active_tab == "cierres":
+            report, empty_message = "historial_cierres", MSG.HIST_NO_CLOSINGS_EXPORT
+        elif active_tab == "detalle":
+            report, empty_message = "detalle_cobros", MSG.HIST_NO_INCOMES_EXPORT
+        else:
+            report, empty_message = "ingresos_por_metodo", MSG.HIST_NO_INCOMES_EXPORT
+        return await self._run_export_job(
+            report,
+            company_id=company_id,
+            branch_id=branch_id,
+            filters=filters,
+            filename=f"{report}.xlsx",
+            collect=lambda: self._collect_report_export(active_tab),
+            empty_message=empty_message,
+        )
 
-        currency_label = self._currency_symbol_clean()
-        currency_format = self._currency_excel_format()
-        company_name = getattr(self, "company_name", "") or "EMPRESA"
+    def _collect_report_export(self, active_tab: str) -> dict[str, Any] | None:
+        """Payload de la pestaña activa del reporte de ingresos; None si está vacía."""
         start_dt, end_dt = self._report_date_range()
         period_start = (
             self._format_company_datetime(start_dt, "%d/%m/%Y")
@@ -2219,136 +2337,48 @@ class HistorialState(MixinState):
             if end_dt
             else "Actual"
         )
-        period_label = f"Período: {period_start} a {period_end}"
+        payload: dict[str, Any] = {
+            "company_name": getattr(self, "company_name", "") or "EMPRESA",
+            "period_label": f"Período: {period_start} a {period_end}",
+            "generated_at": self._display_now(),
+            "currency_label": self._currency_symbol_clean(),
+            "currency_format": self._currency_excel_format(),
+        }
 
-        active_tab = self.report_active_tab or "metodos"
         if active_tab == "cierres":
-            rows = self._build_report_closings()
-            if not rows:
-                return rx.toast(MSG.HIST_NO_CLOSINGS_EXPORT, duration=3000)
-
-            wb, ws = create_excel_workbook(MSG.REPORT_CLOSINGS_SHEET)
-
-            # Encabezado profesional
-            row = add_company_header(
-                ws,
-                company_name,
-                "HISTORIAL DE CIERRES DE CAJA",
-                period_label,
-                columns=5,
-                generated_at=self._display_now(),
-            )
-
-            headers = [
-                "Fecha y Hora",
-                "Tipo Operación",
-                "Responsable",
-                f"Monto ({currency_label})",
-                "Observaciones",
-            ]
-            style_header_row(ws, row, headers)
-            data_start = row + 1
-            row += 1
-
-            for item in rows:
+            closings = self._build_report_closings()
+            if not closings:
+                return None
+            rows = []
+            for item in closings:
                 action = item.get("action", "")
                 action_display = "Apertura de Caja" if action.lower() == "apertura" else "Cierre de Caja" if action.lower() == "cierre" else action.capitalize()
-
-                ws.cell(row=row, column=1, value=item.get("timestamp_display", ""))
-                ws.cell(row=row, column=2, value=action_display)
-                ws.cell(row=row, column=3, value=item.get("user", MSG.FALLBACK_UNKNOWN))
-                ws.cell(row=row, column=4, value=item.get("amount", 0) or 0).number_format = currency_format
-                ws.cell(row=row, column=5, value=item.get("notes", "") or MSG.FALLBACK_NO_OBS)
-
-                for col in range(1, 6):
-                    ws.cell(row=row, column=col).border = THIN_BORDER
-                row += 1
-
-            # Totales
-            totals_row = row
-            add_totals_row_with_formulas(ws, totals_row, data_start, [
-                {"type": "label", "value": "TOTAL"},
-                {"type": "text", "value": ""},
-                {"type": "text", "value": ""},
-                {"type": "sum", "col_letter": "D", "number_format": currency_format},
-                {"type": "text", "value": ""},
-            ])
-
-            add_notes_section(ws, totals_row, [
-                "Apertura de Caja: Monto inicial del día.",
-                "Cierre de Caja: Monto contado al finalizar.",
-            ], columns=5)
-
-            auto_adjust_column_widths(ws)
-
-            output = io.BytesIO()
-            wb.save(output)
-            output.seek(0)
-            return rx.download(data=output.getvalue(), filename="historial_cierres.xlsx")
+                rows.append((
+                    item.get("timestamp_display", ""),
+                    action_display,
+                    item.get("user", MSG.FALLBACK_UNKNOWN),
+                    item.get("amount", 0) or 0,
+                    item.get("notes", "") or MSG.FALLBACK_NO_OBS,
+                ))
+            payload["rows"] = rows
+            return payload
 
         entries = self._build_report_entries()
         if not entries:
-            return rx.toast(MSG.HIST_NO_INCOMES_EXPORT, duration=3000)
-
-        if active_tab == "detalle":
-            wb, ws = create_excel_workbook(MSG.REPORT_PAYMENTS_SHEET)
-
-            # Encabezado profesional
-            row = add_company_header(
-                ws,
-                company_name,
-                MSG.REPORT_PAYMENTS_TITLE,
-                period_label,
-                columns=6,
-                generated_at=self._display_now(),
+            return None
+        payload["entries"] = [
+            (
+                entry.get("timestamp_display", ""),
+                entry.get("source", "Venta"),
+                entry.get("method_label", MSG.FALLBACK_NOT_SPECIFIED),
+                entry.get("amount_raw", 0) or 0,
+                entry.get("user", MSG.FALLBACK_SYSTEM),
+                entry.get("reference", "") or MSG.FALLBACK_NO_REFERENCE,
             )
-
-            detail_headers = [
-                "Fecha y Hora",
-                "Origen/Tipo",
-                "Método de Pago",
-                f"Monto ({currency_label})",
-                "Responsable",
-                "Referencia",
-            ]
-            style_header_row(ws, row, detail_headers)
-            data_start = row + 1
-            row += 1
-
-            for entry in entries:
-                ws.cell(row=row, column=1, value=entry.get("timestamp_display", ""))
-                ws.cell(row=row, column=2, value=entry.get("source", "Venta"))
-                ws.cell(row=row, column=3, value=entry.get("method_label", MSG.FALLBACK_NOT_SPECIFIED))
-                ws.cell(row=row, column=4, value=entry.get("amount_raw", 0) or 0).number_format = currency_format
-                ws.cell(row=row, column=5, value=entry.get("user", MSG.FALLBACK_SYSTEM))
-                ws.cell(row=row, column=6, value=entry.get("reference", "") or MSG.FALLBACK_NO_REFERENCE)
-
-                for col in range(1, 7):
-                    ws.cell(row=row, column=col).border = THIN_BORDER
-                row += 1
-
-            # Totales
-            totals_row = row
-            add_totals_row_with_formulas(ws, totals_row, data_start, [
-                {"type": "label", "value": MSG.REPORT_TOTAL_INCOME},
-                {"type": "text", "value": ""},
-                {"type": "text", "value": ""},
-                {"type": "sum", "col_letter": "D", "number_format": currency_format},
-                {"type": "text", "value": ""},
-                {"type": "text", "value": ""},
-            ])
-
-            add_notes_section(ws, totals_row, [
-                "Origen: Tipo de transacción (Venta, Cobro de Cuota, Reserva, etc.).",
-                "Referencia: Información adicional del pago.",
-            ], columns=6)
-
-            auto_adjust_column_widths(ws)
-
-            output = io.BytesIO()
-            wb.save(output)
-            output.seek(0)
-            return rx.download(data=output.getvalue(), filename="detalle_cobros.xlsx")
+            for entry in entries
+        ]
+        if active_tab == "detalle":
+            return payload
 
         # Tab por defecto: métodos de pago
         summary_totals: dict[str, dict[str, Any]] = {}
@@ -2364,127 +2394,17 @@ class HistorialState(MixinState):
             summary_totals[key]["total"] += Decimal(
                 str(entry.get("amount_raw", 0) or 0)
             )
-
-        wb, ws = create_excel_workbook("Resumen por Método")
-
-        # Encabezado profesional
-        row = add_company_header(
-            ws,
-            company_name,
-            "INGRESOS POR MÉTODO DE PAGO",
-            period_label,
-            columns=4,
-            generated_at=self._display_now(),
-        )
-
-        summary_headers = [
-            "Método de Pago",
-            "Nº Operaciones",
-            f"Total Recaudado ({currency_label})",
-            "Participación (%)",
-        ]
-        style_header_row(ws, row, summary_headers)
-        data_start = row + 1
-        row += 1
-
-        for key in REPORT_METHOD_KEYS:
-            if key in summary_totals:
-                summary = summary_totals[key]
-                ws.cell(row=row, column=1, value=summary["method_label"])
-                ws.cell(row=row, column=2, value=summary["count"])
-                ws.cell(row=row, column=3, value=summary["total"]).number_format = currency_format
-                # Participación se calculará después
-                ws.cell(row=row, column=4, value=summary["total"]).number_format = currency_format
-
-                for col in range(1, 5):
-                    ws.cell(row=row, column=col).border = THIN_BORDER
-                row += 1
-
-        for key, summary in summary_totals.items():
-            if key not in REPORT_METHOD_KEYS:
-                ws.cell(row=row, column=1, value=summary["method_label"])
-                ws.cell(row=row, column=2, value=summary["count"])
-                ws.cell(row=row, column=3, value=summary["total"]).number_format = currency_format
-                ws.cell(row=row, column=4, value=summary["total"]).number_format = currency_format
-
-                for col in range(1, 5):
-                    ws.cell(row=row, column=col).border = THIN_BORDER
-                row += 1
-
-        # Totales
-        totals_row = row
-        add_totals_row_with_formulas(ws, totals_row, data_start, [
-            {"type": "label", "value": "TOTAL RECAUDADO"},
-            {"type": "sum", "col_letter": "B"},
-            {"type": "sum", "col_letter": "C", "number_format": currency_format},
-            {"type": "text", "value": "100.00%"},
-        ])
-
-        # Actualizar participación con fórmulas
-        from openpyxl.styles import Font
-        PERCENT_FORMAT_LOCAL = '0.00%'
-        for r in range(data_start, totals_row):
-            ws.cell(row=r, column=4, value=f"=IF($C${totals_row}>0,C{r}/$C${totals_row},0)").number_format = PERCENT_FORMAT_LOCAL
-
-        add_notes_section(ws, totals_row, [
-            "Total Recaudado: Suma de todos los pagos por método.",
-            "Participación = Monto del Método ÷ Total General × 100.",
-        ], columns=4)
-
-        auto_adjust_column_widths(ws)
-
-        # Segunda hoja: Detalle
-        detail_ws = wb.create_sheet(MSG.REPORT_PAYMENTS_SHEET)
-        row = add_company_header(
-            detail_ws,
-            company_name,
-            MSG.REPORT_PAYMENTS_TITLE,
-            period_label,
-            columns=6,
-            generated_at=self._display_now(),
-        )
-
-        detail_headers = [
-            "Fecha y Hora",
-            "Origen/Tipo",
-            "Método de Pago",
-            f"Monto ({currency_label})",
-            "Responsable",
-            "Referencia",
+        ordered_keys = [key for key in REPORT_METHOD_KEYS if key in summary_totals]
+        ordered_keys += [key for key in summary_totals if key not in REPORT_METHOD_KEYS]
+        payload["summary"] = [
+            (
+                summary_totals[key]["method_label"],
+                summary_totals[key]["count"],
+                summary_totals[key]["total"],
+            )
+            for key in ordered_keys
         ]
-        style_header_row(detail_ws, row, detail_headers)
-        detail_data_start = row + 1
-        row += 1
-
-        for entry in entries:
-            detail_ws.cell(row=row, column=1, value=entry.get("timestamp_display", ""))
-            detail_ws.cell(row=row, column=2, value=entry.get("source", "Venta"))
-            detail_ws.cell(row=row, column=3, value=entry.get("method_label", MSG.FALLBACK_NOT_SPECIFIED))
-            detail_ws.cell(row=row, column=4, value=entry.get("amount_raw", 0) or 0).number_format = currency_format
-            detail_ws.cell(row=row, column=5, value=entry.get("user", MSG.FALLBACK_SYSTEM))
-            detail_ws.cell(row=row, column=6, value=entry.get("reference", "") or MSG.FALLBACK_NO_REFERENCE)
-
-            for col in range(1, 7):
-                detail_ws.cell(row=row, column=col).border = THIN_BORDER
-            row += 1
-
-        # Totales en detalle
-        detail_totals_row = row
-        add_totals_row_with_formulas(detail_ws, detail_totals_row, detail_data_start, [
-            {"type": "label", "value": "TOTAL"},
-            {"type": "text", "value": ""},
-            {"type": "text", "value": ""},
-            {"type": "sum", "col_letter": "D", "number_format": currency_format},
-            {"type": "text", "value": ""},
-            {"type": "text", "value": ""},
-        ])
-
-        auto_adjust_column_widths(detail_ws)
-
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-        return rx.download(data=output.getvalue(), filename="ingresos_por_metodo.xlsx")
+        return payload
 
     def _parse_payment_amount(self, text: str, keyword: str) -> Decimal:
         """Extrae el monto de un keyword en un texto de pago mixto como 'Efectivo S/ 15.00'."""
@@ -2984,7 +2904,7 @@ class HistorialState(MixinState):
 
         start_dt, end_dt = self._returns_date_range()
 
-        with rx.session() as session:
+        with read_session() as session:
             session.info["tenant_bypass"] = True
             query = (
                 select(SaleReturn)
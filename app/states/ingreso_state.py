@@ -6,6 +6,7 @@ import logging
 from decimal import Decimal
 from sqlmodel import select
 from sqlalchemy import func, or_
+from app.services.product_search_index import invalidate_product_search
 from app.models import (
     Product,
     ProductBatch,
@@ -1028,6 +1029,7 @@ class IngresoState(MixinState):
                             _products_by_desc[_p.description] = _p
                 # --- END FIX 34 pre-load ---
 
+                created_products = False
                 for item in self.new_entry_items:
                     barcode = (item.get("barcode") or "").strip()
                     description = (item.get("description") or "").strip()
@@ -1103,6 +1105,7 @@ class IngresoState(MixinState):
                         )
                         session.add(new_product)
                         session.flush()
+                        created_products = True
 
                         product = new_product
                         product_id = new_product.id
@@ -1340,6 +1343,8 @@ class IngresoState(MixinState):
                 )
 
                 session.commit()
+                if created_products:
+                    invalidate_product_search(company_id, branch_id)
             except Exception:
                 session.rollback()
                 logger.exception(
@@ -17,6 +17,7 @@ from ._export_mixin import ExportMixin
 from ._label_mixin import LabelMixin
 from ._movements_mixin import MovementsMixin
 from ._transfer_mixin import TransferMixin
+from ._bulk_price_mixin import BulkPriceMixin
 
 # Re-export constants for backwards compatibility (dashboard_state, etc.)
 DEFAULT_LOW_STOCK_THRESHOLD = 5
@@ -24,6 +25,7 @@ LOW_STOCK_THRESHOLD = DEFAULT_LOW_STOCK_THRESHOLD
 
 
 class InventoryState(
+    BulkPriceMixin,
     TransferMixin,
     MovementsMixin,
     LabelMixin,
@@ -104,6 +106,11 @@ class InventoryState(
     _inventory_update_trigger: int = 0
     inventory_list: list[dict] = []
     inventory_total_pages: int = 1
+    # Paginación keyset del listado: marcadores página → [primera, última]
+    # clave de orden y total de la última recuenta (ver app.utils.pagination).
+    _inventory_keyset_pages: dict[int, list] = rx.field(default_factory=dict, is_var=False)
+    _inventory_keyset_scope: str = rx.field(default="", is_var=False)
+    _inventory_total_items: int = rx.field(default=0, is_var=False)
     inventory_total_products: int = 0
     inventory_in_stock_count: int = 0
     inventory_low_stock_count: int = 0
@@ -120,9 +127,15 @@ class InventoryState(
     import_modal_open: bool = False
     import_preview_rows: list[dict] = []
     import_errors: list[str] = []
-    import_stats: dict = {"new": 0, "updated": 0, "errors": 0, "total": 0, "stock_locked": 0}
+    import_stats: dict = {
+        "new": 0, "updated": 0, "errors": 0, "total": 0,
+        "stock_locked": 0, "margin_missing": 0,
+    }
     import_processing: bool = False
+    import_progress: int = 0
     import_file_name: str = ""
+    # Token del archivo subido en IMPORT_FILES_DIR (ver app.services.inventory_import).
+    _import_file_token: str = rx.field(default="", is_var=False)
 
 
 __all__ = ["InventoryState"]
@@ -0,0 +1,215 @@
+"""Mixin de ajuste masivo de precios de venta para InventoryState.
+
+Reprecia ``Product.sale_price`` (y las variantes con precio propio) de toda
+la sucursal o de una categoría con ``pricing.reprice_products``: una query
+para leer y ``UPDATE`` por lotes, fuera del event loop. La vista previa
+cuenta cuántos precios cambian sin escribir.
+"""
+from __future__ import annotations
+
+from decimal import Decimal, InvalidOperation
+
+import reflex as rx
+
+from app.services.pricing import (
+    ADJUST_AMOUNT,
+    ADJUST_PERCENT,
+    ROUND_NEAREST,
+    BulkPriceResult,
+    PriceAdjustment,
+    reprice_products,
+)
+from app.utils.sync_db import run_sync_db
+
+_BULK_PRICE_STATS_EMPTY = {"matched": 0, "changed": 0, "skipped": 0}
+
+
+class BulkPriceMixin:
+    """Ajuste masivo de precios de venta por sucursal o categoría."""
+
+    bulk_price_modal_open: bool = False
+    bulk_price_category: str = ""             # "" = toda la sucursal
+    bulk_price_kind: str = ADJUST_PERCENT     # percent | amount | margin
+    bulk_price_value: str = ""
+    bulk_price_round_step: str = "0.01"
+    bulk_price_round_mode: str = ROUND_NEAREST
+    bulk_price_preview: list[dict] = []
+    bulk_price_stats: dict = dict(_BULK_PRICE_STATS_EMPTY)
+    bulk_price_processing: bool = False
+
+    def _reset_bulk_price_preview(self) -> None:
+        self.bulk_price_preview = []
+        self.bulk_price_stats = dict(_BULK_PRICE_STATS_EMPTY)
+
+    @rx.event
+    def open_bulk_price_modal(self):
+        if not self.current_user["privileges"].get("edit_inventario", False):
+            return rx.toast("No tiene permisos para editar precios.", duration=3000)
+        if not self.bulk_price_processing:
+            self.bulk_price_category = self.inventory_category_filter or ""
+            self.bulk_price_kind = ADJUST_PERCENT
+            self.bulk_price_value = ""
+            self.bulk_price_round_step = "0.01"
+            self.bulk_price_round_mode = ROUND_NEAREST
+            self._reset_bulk_price_preview()
+        self.bulk_price_modal_open = True
+
+    @rx.event
+    def close_bulk_price_modal(self):
+        self.bulk_price_modal_open = False
+
+    @rx.event
+    def set_bulk_price_category(self, value: str):
+        self.bulk_price_category = "" if value == "__all__" else value
+        self._reset_bulk_price_preview()
+
+    @rx.event
+    def set_bulk_price_kind(self, value: str):
+        self.bulk_price_kind = value
+        self._reset_bulk_price_preview()
+
+    @rx.event
+    def set_bulk_price_value(self, value: str):
+        self.bulk_price_value = value
+        self._reset_bulk_price_preview()
+
+    @rx.event
+    def set_bulk_price_round_step(self, value: str):
+        self.bulk_price_round_step = value
+        self._reset_bulk_price_preview()
+
+    @rx.event
+    def set_bulk_price_round_mode(self, value: str):
+        self.bulk_price_round_mode = value
+        self._reset_bulk_price_preview()
+
+    def _bulk_price_adjustment(self) -> PriceAdjustment | str:
+        """Regla armada desde el formulario, o el mensaje de error."""
+        raw = (self.bulk_price_value or "").strip().replace(",", ".")
+        try:
+            value = Decimal(raw) if raw else None
+            step = Decimal(self.bulk_price_round_step or "0.01")
+        except InvalidOperation:
+            return "Ingrese un valor numérico."
+        if self.bulk_price_kind in (ADJUST_PERCENT, ADJUST_AMOUNT) and not value:
+            return "Ingrese un valor distinto de cero."
+        try:
+            return PriceAdjustment(
+                self.bulk_price_kind,
+                value,
+                round_step=step,
+                round_mode=self.bulk_price_round_mode,
+            )
+        except ValueError as exc:
+            return str(exc)
+
+    async def _run_bulk_price(self, *, dry_run: bool) -> BulkPriceResult | str:
+        adjustment = self._bulk_price_adjustment()
+        if isinstance(adjustment, str):
+            return adjustment
+        company_id = self._company_id()
+        branch_id = self._branch_id()
+        if not company_id or not branch_id:
+            return "Empresa no definida."
+        global_margin = float(getattr(self, "effective_profit_margin_decimal", 0.0) or 0.0)
+        return await run_sync_db(
+            _reprice_branch,
+            company_id,
+            branch_id,
+            adjustment,
+            global_margin,
+            self.bulk_price_category or None,
+            dry_run,
+            company_id=company_id,
+            operation="inventory.bulk_price_preview" if dry_run else "inventory.bulk_price",
+        )
+
+    @rx.event
+    async def preview_bulk_price(self):
+        """Cuenta cuántos precios cambiarían y muestra una muestra, sin escribir."""
+        if self.bulk_price_processing:
+            return
+        self.bulk_price_processing = True
+        yield
+        try:
+            result = await self._run_bulk_price(dry_run=True)
+        finally:
+            self.bulk_price_processing = False
+        if isinstance(result, str):
+            self._reset_bulk_price_preview()
+            yield rx.toast(result, duration=3000)
+            return
+        self.bulk_price_stats = {
+            "matched": result.matched,
+            "changed": result.changed,
+            "skipped": result.skipped,
+        }
+        self.bulk_price_preview = [
+            {
+                "description": row["description"],
+                "old_price": self._format_currency(float(row["old_price"] or 0)),
+                "new_price": self._format_currency(float(row["new_price"])),
+            }
+            for row in result.preview
+        ]
+        if not result.changed:
+            yield rx.toast("Ningún precio cambiaría con ese ajuste.", duration=3000)
+
+    @rx.event
+    async def apply_bulk_price(self):
+        """Aplica el ajuste a todos los productos del alcance."""
+        if not self.current_user["privileges"].get("edit_inventario", False):
+            yield rx.toast("No tiene permisos para editar precios.", duration=3000)
+            return
+        block = self._require_active_subscription()
+        if block:
+            yield block
+            return
+        if self.bulk_price_processing:
+            return
+        self.bulk_price_processing = True
+        yield
+        try:
+            result = await self._run_bulk_price(dry_run=False)
+        finally:
+            self.bulk_price_processing = False
+        if isinstance(result, str):
+            yield rx.toast(result, duration=3000)
+            return
+        self.bulk_price_modal_open = False
+        self._reset_bulk_price_preview()
+        self._refresh_inventory_cache()
+        updated = result.changed
+        yield rx.toast(
+            f"{updated} precio{'s' if updated != 1 else ''} actualizado{'s' if updated != 1 else ''}.",
+            duration=4000,
+        )
+
+
+def _reprice_branch(
+    company_id: int,
+    branch_id: int,
+    adjustment: PriceAdjustment,
+    global_margin: float,
+    category: str | None,
+    dry_run: bool,
+) -> BulkPriceResult:
+    """Reprecio de la sucursal (síncrono, para ``run_sync_db``).
+
+    ``reprice_products`` invalida los caches de precios y códigos al commit.
+    """
+    with rx.session() as session:
+        session.info["tenant_bypass"] = True
+        result = reprice_products(
+            session,
+            company_id=company_id,
+            branch_id=branch_id,
+            adjustment=adjustment,
+            global_margin=global_margin,
+            category=category,
+            dry_run=dry_run,
+        )
+        if not dry_run:
+            session.commit()
+    return result
+
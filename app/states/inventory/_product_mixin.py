@@ -22,6 +22,8 @@ from app.models import (
     SaleItem,
     Supplier,
 )
+from app.services.pricing_cache import invalidate_pricing_cache
+from app.services.product_search_index import invalidate_product_search
 from app.utils.formatting import fmt_input_num, fmt_price
 
 logger = logging.getLogger(__name__)
@@ -1391,6 +1393,10 @@ class ProductMixin:
                             session.delete(k)
 
                 session.commit()
+            # Precio de venta y tiers alimentan el snapshot de pricing del carrito.
+            invalidate_pricing_cache(company_id, branch_id)
+            # Descripción, códigos, variantes y atributos alimentan la búsqueda del POS.
+            invalidate_product_search(company_id, branch_id)
         except Exception:
             logger.exception(
                 "save_edited_product failed | company=%s branch=%s",
@@ -1471,6 +1477,7 @@ class ProductMixin:
                         )
                     session.delete(product)
                     session.commit()
+                    invalidate_product_search(company_id, branch_id)
                     self._inventory_update_trigger += 1
                     deleted = True
                 else:
@@ -11,16 +11,40 @@ from app.models import (
     ProductKit,
     Category,
 )
+from app.services.barcode_cache import invalidate_barcode_cache
+from app.services.product_search_index import invalidate_product_search
 from app.utils.tenant import set_tenant_context, tenant_bypass
 from app.states.mixin_state import ScopedCtx
 from app.utils.formatting import fmt_input_num, fmt_price
 from app.utils.sanitization import escape_like
 from app.utils.pricing import resolve_effective_price
-from app.utils.pagination import build_page_window
+from app.utils.pagination import (
+    KeysetPlan,
+    build_page_window,
+    keyset_after,
+    plan_keyset_page,
+    remember_keyset_page,
+    settle_keyset_total,
+)
 
 DEFAULT_LOW_STOCK_THRESHOLD = 5
 
 
+def _unnormalized_category(session):
+    """Filtro de productos cuya categoría no está en mayúsculas y sin espacios.
+
+    En MySQL la collation ``_ci`` iguala "bebidas" con "BEBIDAS": la
+    comparación se fuerza binaria para que sólo cuenten las filas a corregir.
+    """
+    category = Product.category
+    if session.get_bind().dialect.name in {"mysql", "mariadb"}:
+        category = category.collate("utf8mb4_bin")
+    return or_(
+        category != func.upper(Product.category),
+        func.char_length(Product.category) != func.char_length(func.trim(Product.category)),
+    )
+
+
 class SearchMixin:
     """Busqueda, listado paginado y gestion de categorias de inventario."""
 
@@ -48,6 +72,7 @@ class SearchMixin:
                 ).all()
                 # Normalize existing Category records to uppercase, merging duplicates
                 seen: dict[str, int] = {}  # uppercased name → first id seen
+                changed = False
                 for c in cats:
                     upped = c.name.strip().upper()
                     if upped in seen:
@@ -60,6 +85,7 @@ class SearchMixin:
                             .values(category=upped)
                         )
                         session.delete(c)
+                        changed = True
                     else:
                         seen[upped] = c.id
                         if c.name != upped:
@@ -68,14 +94,20 @@ class SearchMixin:
                 session.flush()
                 names = list(seen.keys())
                 # Normalize Product.category to uppercase in bulk
-                session.execute(
+                result = session.execute(
                     sa_update(Product)
                     .where(Product.company_id == company_id)
                     .where(Product.branch_id == branch_id)
                     .where(Product.category.is_not(None))
+                    .where(_unnormalized_category(session))
                     .values(category=func.upper(func.trim(Product.category)))
                 )
+                changed = changed or bool(result.rowcount)
                 session.commit()
+                if changed:
+                    # UPDATE masivo: no pasa por el after_flush del cache de
+                    # códigos, que guarda la categoría de cada producto.
+                    invalidate_barcode_cache(company_id, branch_id)
                 # Include categories stored directly on products (may not be in Category table)
                 product_cats = session.exec(
                     select(Product.category)
@@ -259,8 +291,16 @@ class SearchMixin:
         cat_filter: str = "",
         sort_field: str = "description",
         sort_asc: bool = True,
-    ) -> List[Dict[str, Any]]:
-        """Fetch one page of search results via SQL UNION ALL + OFFSET/LIMIT."""
+        plan: KeysetPlan | None = None,
+    ) -> tuple[List[Dict[str, Any]], List[tuple]]:
+        """Fetch one page of search results via SQL UNION ALL + keyset.
+
+        Orden por ``(descripción, product_id, variant_id)`` (0 para productos
+        sin variantes). Devuelve las filas y sus claves de orden; sin ``plan``
+        se lee desde ``offset``.
+        """
+        if plan is None:
+            plan = KeysetPlan(None, False, offset, per_page)
         term = f"%{escape_like(search)}%"
         active_filter = [] if self.show_inactive_products else [Product.is_active == True]
         cat_clause = [Product.category == cat_filter] if cat_filter else []
@@ -271,7 +311,7 @@ class SearchMixin:
                 Product.id.label("pid"),
                 ProductVariant.id.label("vid"),
                 Product.description.label("sort_desc"),
-                func.coalesce(ProductVariant.sku, Product.barcode).label("sort_code"),
+                ProductVariant.id.label("sort_vid"),
             )
             .join(Product, ProductVariant.product_id == Product.id)
             .where(ProductVariant.company_id == company_id)
@@ -301,7 +341,7 @@ class SearchMixin:
                 Product.id.label("pid"),
                 literal(None).label("vid"),
                 Product.description.label("sort_desc"),
-                Product.barcode.label("sort_code"),
+                literal(0).label("sort_vid"),
             )
             .where(Product.company_id == company_id)
             .where(Product.branch_id == branch_id)
@@ -317,23 +357,26 @@ class SearchMixin:
             )
         )
 
-        # SQL UNION ALL con sort dinámico
-        sort_order = unioned_c = None
+        # SQL UNION ALL con keyset sobre (descripción, id)
         unioned = union_all(variant_ids_q, product_ids_q).subquery()
         unioned_c = unioned.c
-        sort_order = (
-            unioned_c.sort_desc if sort_asc else unioned_c.sort_desc.desc()
-        )
+        key_cols = (unioned_c.sort_desc, unioned_c.pid, unioned_c.sort_vid)
+        descending = (not sort_asc) != plan.backward
+        page_q = select(unioned_c.pid, unioned_c.vid, *key_cols)
+        if plan.after is not None:
+            page_q = page_q.where(keyset_after(key_cols, plan.after, descending=descending))
         page_q = (
-            select(unioned_c.pid, unioned_c.vid)
-            .order_by(sort_order, unioned_c.sort_code)
-            .offset(offset)
-            .limit(per_page)
+            page_q.order_by(*(col.desc() if descending else col for col in key_cols))
+            .offset(plan.offset)
+            .limit(plan.limit)
         )
         page_id_rows = session.exec(page_q).all()
+        if plan.backward:
+            page_id_rows = list(reversed(page_id_rows))
 
         if not page_id_rows:
-            return []
+            return [], []
+        page_keys = [(desc, pid, sort_vid) for _pid, _vid, desc, pid, sort_vid in page_id_rows]
 
         # Batch fetch ORM objects for this page only
         product_ids_needed = list({r[0] for r in page_id_rows})
@@ -370,7 +413,7 @@ class SearchMixin:
 
         # Build rows preserving SQL sort order
         rows: List[Dict[str, Any]] = []
-        for pid, vid in page_id_rows:
+        for pid, vid, *_key in page_id_rows:
             product = products_map.get(pid)
             if not product:
                 continue
@@ -380,9 +423,14 @@ class SearchMixin:
                     rows.append(self._inventory_row_from_variant(product, variant, is_kit=pid in kit_ids))
             else:
                 rows.append(self._inventory_row_from_product(product, is_kit=pid in kit_ids))
-        return rows
+        return rows, page_keys
+
+    def _refresh_inventory_cache(self, recount: bool = True):
+        """Recarga la página actual del inventario.
 
-    def _refresh_inventory_cache(self):
+        ``recount=False`` (cambio de página) reutiliza el total de la última
+        recuenta y los marcadores keyset; cualquier otra recarga recuenta.
+        """
         privileges = self.current_user["privileges"]
         if not privileges.get("view_inventario"):
             self.inventory_list = []
@@ -408,6 +456,17 @@ class SearchMixin:
         cat_filter = (self.inventory_category_filter or "").strip()
         per_page = max(self.inventory_items_per_page, 1)
         page = max(self.inventory_current_page, 1)
+        scope = repr((
+            company_id, branch_id, search, cat_filter, self.show_inactive_products,
+            self.inventory_sort_field, self.inventory_sort_asc, per_page,
+        ))
+        if recount or scope != self._inventory_keyset_scope:
+            self._inventory_keyset_scope = scope
+            self._inventory_keyset_pages = {}
+            recount = True
+        # El listado sin búsqueda pagina por keyset sólo ordenado por
+        # descripción (NOT NULL); el resto de columnas sigue con OFFSET.
+        use_keyset = bool(search) or self.inventory_sort_field == "description"
 
         # Mapa de campo de orden a columna ORM
         _sort_col = {
@@ -428,53 +487,70 @@ class SearchMixin:
             # Filtro por categoría (aplica a ambas ramas)
             cat_clause = [Product.category == cat_filter] if cat_filter else []
 
-            if search:
-                total_items = self._inventory_search_count(
-                    session, search, company_id, branch_id, cat_filter=cat_filter
-                )
-                total_pages = (
-                    1 if total_items == 0 else (total_items + per_page - 1) // per_page
+            active_filter = [] if self.show_inactive_products else [Product.is_active == True]
+            if recount:
+                if search:
+                    total_items = self._inventory_search_count(
+                        session, search, company_id, branch_id, cat_filter=cat_filter
+                    )
+                else:
+                    total_items = int(
+                        session.exec(
+                            select(func.count(Product.id))
+                            .where(Product.company_id == company_id)
+                            .where(Product.branch_id == branch_id)
+                            .where(*active_filter)
+                            .where(*cat_clause)
+                        ).one()
+                        or 0
+                    )
+                self._inventory_total_items = total_items
+            total_items = self._inventory_total_items
+            total_pages = (
+                1 if total_items == 0 else (total_items + per_page - 1) // per_page
+            )
+            if page > total_pages:
+                page = total_pages
+                self.inventory_current_page = page
+            if use_keyset:
+                plan = plan_keyset_page(
+                    page, per_page, total_items, self._inventory_keyset_pages
                 )
-                if page > total_pages:
-                    page = total_pages
-                    self.inventory_current_page = page
-                offset = (page - 1) * per_page
-                page_rows = self._inventory_search_rows(
+            else:
+                plan = KeysetPlan(None, False, (page - 1) * per_page, per_page)
+
+            if search:
+                page_rows, page_keys = self._inventory_search_rows(
                     session, search, company_id, branch_id,
-                    offset=offset, per_page=per_page,
+                    per_page=per_page,
                     cat_filter=cat_filter, sort_field=self.inventory_sort_field,
-                    sort_asc=self.inventory_sort_asc,
+                    sort_asc=self.inventory_sort_asc, plan=plan,
                 )
             else:
-                active_filter = [] if self.show_inactive_products else [Product.is_active == True]
-                total_items = int(
-                    session.exec(
-                        select(func.count(Product.id))
-                        .where(Product.company_id == company_id)
-                        .where(Product.branch_id == branch_id)
-                        .where(*active_filter)
-                        .where(*cat_clause)
-                    ).one()
-                    or 0
-                )
-                total_pages = (
-                    1 if total_items == 0 else (total_items + per_page - 1) // per_page
-                )
-                if page > total_pages:
-                    page = total_pages
-                    self.inventory_current_page = page
-                offset = (page - 1) * per_page
                 query = (
                     select(Product)
                     .where(Product.company_id == company_id)
                     .where(Product.branch_id == branch_id)
                     .where(*active_filter)
                     .where(*cat_clause)
-                    .order_by(sort_expr, Product.id)
-                    .offset(offset)
-                    .limit(per_page)
                 )
-                products_page = session.exec(query).all()
+                if use_keyset:
+                    key_cols = (Product.description, Product.id)
+                    descending = (not self.inventory_sort_asc) != plan.backward
+                    if plan.after is not None:
+                        query = query.where(
+                            keyset_after(key_cols, plan.after, descending=descending)
+                        )
+                    query = query.order_by(
+                        *(col.desc() if descending else col for col in key_cols)
+                    )
+                else:
+                    query = query.order_by(sort_expr, Product.id)
+                query = query.offset(plan.offset).limit(plan.limit)
+                products_page = list(session.exec(query).all())
+                if plan.backward:
+                    products_page.reverse()
+                page_keys = [(p.description, p.id) for p in products_page]
                 page_product_ids = [p.id for p in products_page]
                 page_kit_ids: set = set(
                     session.exec(
@@ -524,6 +600,20 @@ class SearchMixin:
             ).one()
             total_value = float(total_value_raw or 0)
 
+        if not page_keys and page > 1 and not recount:
+            # Total viejo (se borraron o desactivaron productos): recontar.
+            return self._refresh_inventory_cache(recount=True)
+        if use_keyset and page_keys:
+            self._inventory_keyset_pages = remember_keyset_page(
+                self._inventory_keyset_pages, page, page_keys[0], page_keys[-1]
+            )
+        settled = settle_keyset_total(
+            total_items, page, per_page, len(page_keys), exact_start=not plan.backward
+        )
+        if settled != total_items:
+            self._inventory_total_items = settled
+            total_pages = 1 if settled == 0 else (settled + per_page - 1) // per_page
+
         # Subtotal de la página actual
         page_total = sum(
             float(str(r.get("purchase_price") or 0)) * float(str(r.get("stock") or 0))
@@ -577,6 +667,7 @@ class SearchMixin:
                 product.is_active = not product.is_active
                 ctx.session.add(product)
                 ctx.session.commit()
+                invalidate_product_search(ctx.company_id, ctx.branch_id)
                 status = "activado" if product.is_active else "desactivado"
                 self._refresh_inventory_cache()
                 return self.add_notification(
@@ -701,7 +792,7 @@ class SearchMixin:
     def set_inventory_page(self, page_num: int):
         if 1 <= page_num <= self.inventory_total_pages:
             self.inventory_current_page = page_num
-            self._refresh_inventory_cache()
+            self._refresh_inventory_cache(recount=False)
 
     @rx.event
     def set_inventory_items_per_page(self, value: str):
@@ -19,6 +19,7 @@ from app.models import (
 )
 from app.models.inventory import TransferStatus
 from app.services.sale_service import StockError, _round_quantity
+from app.services.product_search_index import invalidate_product_search
 from app.services.transfer_service import TransferError, TransferService
 from app.utils.sanitization import escape_like
 
@@ -481,6 +482,8 @@ class TransferMixin:
                         user_id=self.current_user.get("id"),
                     )
                     await session.commit()
+            # La transferencia puede crear el producto/variante en el destino.
+            invalidate_product_search(company_id, dest_id)
 
             self.transfer_modal_open = False
             self.transfer_items = []
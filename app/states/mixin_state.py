@@ -209,6 +209,10 @@ class MixinState:
             "try{localStorage.setItem('twk_runtime_sync', String(Date.now()));}catch(_err){}"
         )
 
+    def _collection_token(self) -> str:
+        """Clave de sesión para ``ServerCollection`` (una copia por pestaña)."""
+        return self.router.session.client_token or "anon"
+
     def _tenant_ids(self) -> tuple[int | None, int | None]:
         company_value = None
         if hasattr(self, "current_user"):
@@ -23,6 +23,7 @@ from app.models.auth import User as UserModel
 from app.models.billing import CompanyBillingConfig
 from app.models.company import PlanType, ProductType, SubscriptionStatus
 from app.models.owner import OwnerAuditLog
+from app.services.afip_wsaa import invalidate_credentials
 from app.services import food_owner_client
 from app.services.food_owner_client import FoodOwnerClientError
 from app.services import life_owner_client
@@ -37,12 +38,11 @@ from app.utils.fiscal_validators import (
 )
 from app.utils.db import AsyncSessionLocal
 from app.utils.logger import get_logger
+from app.utils.async_rate_limit import Limit, add_hits, check_limits
 from app.utils.rate_limit import (
     is_rate_limited,
     record_failed_attempt,
     clear_login_attempts,
-    is_action_rate_limited,
-    record_action,
 )
 from app.utils.tenant import tenant_bypass
 from app.utils.timezone import utc_now_naive
@@ -170,23 +170,25 @@ OWNER_ACTION_WINDOW_SECONDS: int = 60
 _OWNER_RL_PREFIX: str = "owner_action"
 
 
-def _is_owner_rate_limited(actor_email: str) -> bool:
-    """Verifica si el actor excedió el límite de acciones owner (Redis-backed)."""
-    return is_action_rate_limited(
-        actor_email,
-        max_actions=OWNER_MAX_ACTIONS,
-        window_seconds=OWNER_ACTION_WINDOW_SECONDS,
-        prefix=_OWNER_RL_PREFIX,
+def _owner_action_limit(actor_email: str) -> Limit:
+    return Limit(
+        f"{_OWNER_RL_PREFIX}:{actor_email}",
+        OWNER_MAX_ACTIONS,
+        OWNER_ACTION_WINDOW_SECONDS,
     )
 
 
-def _record_owner_action(actor_email: str) -> None:
+async def _is_owner_rate_limited(actor_email: str) -> bool:
+    """Verifica si el actor excedió el límite de acciones owner (Redis-backed)."""
+    if not actor_email:
+        return True
+    return not (await check_limits(_owner_action_limit(actor_email))).allowed
+
+
+async def _record_owner_action(actor_email: str) -> None:
     """Registra una acción exitosa del owner (Redis-backed)."""
-    record_action(
-        actor_email,
-        window_seconds=OWNER_ACTION_WINDOW_SECONDS,
-        prefix=_OWNER_RL_PREFIX,
-    )
+    if actor_email:
+        await add_hits(_owner_action_limit(actor_email))
 
 
 def _normalize_non_negative_int_input(value: str | float | int) -> str:
@@ -900,7 +902,7 @@ class OwnerState:
 
         # Rate limiting — prevenir abuso
         actor_email = self.owner_session_email or "unknown"
-        if _is_owner_rate_limited(actor_email):
+        if await _is_owner_rate_limited(actor_email):
             yield rx.toast(
                 f"Demasiadas acciones. Espera {OWNER_ACTION_WINDOW_SECONDS}s.",
                 duration=5000,
@@ -1032,7 +1034,7 @@ class OwnerState:
                 yield rx.toast("Error inesperado. Revise los logs del servidor.", duration=5000)
                 return
 
-            _record_owner_action(actor_email)
+            await _record_owner_action(actor_email)
             self.owner_modal_open = False
             self.owner_loading = False
             yield rx.toast(toast_msg, duration=4000)
@@ -1150,7 +1152,7 @@ class OwnerState:
             yield rx.toast("Error inesperado. Revise los logs del servidor.", duration=5000)
             return
 
-        _record_owner_action(actor_email)
+        await _record_owner_action(actor_email)
         self.owner_modal_open = False
         self.owner_loading = False
         yield type(self).owner_load_companies
@@ -1282,7 +1284,7 @@ class OwnerState:
             return
 
         actor_email = self.owner_session_email or "unknown"
-        if _is_owner_rate_limited(actor_email):
+        if await _is_owner_rate_limited(actor_email):
             yield rx.toast(
                 f"Demasiadas acciones. Espera {OWNER_ACTION_WINDOW_SECONDS}s.",
                 duration=5000,
@@ -1302,7 +1304,7 @@ class OwnerState:
                 data = await food_owner_client.reset_password(
                     self.owner_reset_company_id, actor=actor_email,
                 )
-                _record_owner_action(actor_email)
+                await _record_owner_action(actor_email)
                 self.owner_reset_temp_password = (data.get("temp_password") or "").strip()
                 self.owner_reset_target_username = data.get("username") or username
                 self.owner_reset_result_visible = True
@@ -1325,7 +1327,7 @@ class OwnerState:
                 data = await life_owner_client.reset_password(
                     self.owner_reset_company_id, user_id=user_id, actor=actor_email,
                 )
-                _record_owner_action(actor_email)
+                await _record_owner_action(actor_email)
                 self.owner_reset_temp_password = (data.get("temp_password") or "").strip()
                 self.owner_reset_target_username = data.get("username") or username
                 self.owner_reset_result_visible = True
@@ -1352,7 +1354,7 @@ class OwnerState:
                         reason="Reset de contraseña por admin de plataforma",
                         **actor,
                     )
-            _record_owner_action(actor_email)
+            await _record_owner_action(actor_email)
             self.owner_reset_temp_password = temp_password.strip()
             self.owner_reset_target_username = username
             self.owner_reset_result_visible = True
@@ -1680,7 +1682,7 @@ class OwnerState:
             return
 
         actor_email = self.owner_session_email or "unknown"
-        if _is_owner_rate_limited(actor_email):
+        if await _is_owner_rate_limited(actor_email):
             yield rx.toast(
                 f"Demasiadas acciones. Espera {OWNER_ACTION_WINDOW_SECONDS}s.",
                 duration=5000,
@@ -1796,7 +1798,7 @@ class OwnerState:
                                 company_id, _sync_exc,
                             )
 
-            _record_owner_action(actor_email)
+            await _record_owner_action(actor_email)
             self.owner_billing_config_exists = True
             logger.info(
                 "Owner billing config saved company_id=%s actor=%s active=%s",
@@ -1907,6 +1909,7 @@ class OwnerState:
                     session.add(config)
                     await session.commit()
 
+            await invalidate_credentials(company_id)
             self.owner_billing_cert_display = "****certificado****"
             logger.info(
                 "Owner saved AFIP certificate company_id=%s",
@@ -1970,6 +1973,7 @@ class OwnerState:
                     session.add(config)
                     await session.commit()
 
+            await invalidate_credentials(company_id)
             self.owner_billing_key_display = "****clave_privada****"
             logger.info(
                 "Owner saved AFIP private key company_id=%s",
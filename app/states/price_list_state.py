@@ -10,16 +10,25 @@ from sqlmodel import select, func
 
 from app.models import Client, Product, ProductVariant
 from app.models.price_lists import PriceList, PriceListItem
+from app.services.pricing import (
+    ADJUST_PERCENT,
+    BulkPriceResult,
+    PriceAdjustment,
+    reprice_price_list,
+)
+from app.services.pricing_cache import invalidate_pricing_cache
 from app.utils.timezone import utc_now_naive
-from app.utils.formatting import fmt_input_num, fmt_price
+from app.utils.formatting import fmt_input_num
 from app.utils.pricing import resolve_effective_price
+from app.utils.sync_db import run_sync_db
 
 from .mixin_state import MixinState, require_permission
+from .product_picker_mixin import ProductPickerMixin
 
 logger = logging.getLogger(__name__)
 
 
-class PriceListState(MixinState):
+class PriceListState(ProductPickerMixin, MixinState):
     """Estado para el módulo de Listas de Precios."""
 
     # ── Listas ───────────────────────────────────────────────────────
@@ -41,11 +50,9 @@ class PriceListState(MixinState):
     price_list_items: list[dict[str, Any]] = []
     selected_price_list_clients: list[dict[str, Any]] = []
 
-    # Formulario de ítem
+    # Formulario de ítem (el buscador es el selector de ProductPickerMixin)
     show_pl_item_form: bool = False
     pl_item_product_id: str = ""
-    pl_item_product_search: str = ""
-    pl_item_product_results: list[dict[str, Any]] = []
     pl_item_unit_price: str = ""
     pl_item_variant_id: str = ""
 
@@ -70,6 +77,23 @@ class PriceListState(MixinState):
 
     # ─── Carga ───────────────────────────────────────────────────────
 
+    @staticmethod
+    def _price_list_counts(session, list_ids: list[int]) -> tuple[dict[int, int], dict[int, int]]:
+        """Ítems y clientes por lista, con un GROUP BY por tabla."""
+        if not list_ids:
+            return {}, {}
+        counts = dict(session.exec(
+            select(PriceListItem.price_list_id, func.count(PriceListItem.id))
+            .where(PriceListItem.price_list_id.in_(list_ids))
+            .group_by(PriceListItem.price_list_id)
+        ).all())
+        client_counts = dict(session.exec(
+            select(Client.price_list_id, func.count(Client.id))
+            .where(Client.price_list_id.in_(list_ids))
+            .group_by(Client.price_list_id)
+        ).all())
+        return counts, client_counts
+
     async def _load_price_lists(self):
         company_id = self._company_id()
         branch_id = self._branch_id()
@@ -88,21 +112,7 @@ class PriceListState(MixinState):
             )
             rows = session.exec(stmt).all()
 
-            counts = {}
-            for pl in rows:
-                cnt = session.exec(
-                    select(func.count(PriceListItem.id))
-                    .where(PriceListItem.price_list_id == pl.id)
-                ).one()
-                counts[pl.id] = cnt or 0
-
-            client_counts = {}
-            for pl in rows:
-                cnt = session.exec(
-                    select(func.count(Client.id))
-                    .where(Client.price_list_id == pl.id)
-                ).one()
-                client_counts[pl.id] = cnt or 0
+            counts, client_counts = self._price_list_counts(session, [pl.id for pl in rows])
 
         self.price_lists = [
             {
@@ -135,6 +145,26 @@ class PriceListState(MixinState):
                 .order_by(PriceListItem.id)
             )
             items = session.exec(stmt).all()
+            product_ids = {item.product_id for item in items if item.product_id}
+            variant_ids = {item.product_variant_id for item in items if item.product_variant_id}
+            products = {
+                p.id: p
+                for p in session.exec(
+                    select(Product)
+                    .where(Product.id.in_(product_ids))
+                    .where(Product.company_id == company_id)
+                    .where(Product.branch_id == branch_id)
+                ).all()
+            } if product_ids else {}
+            variants = {
+                v.id: v
+                for v in session.exec(
+                    select(ProductVariant)
+                    .where(ProductVariant.id.in_(variant_ids))
+                    .where(ProductVariant.company_id == company_id)
+                    .where(ProductVariant.branch_id == branch_id)
+                ).all()
+            } if variant_ids else {}
 
             _gm = float(getattr(self, "effective_profit_margin_decimal", 0.0) or 0.0)
             result = []
@@ -142,28 +172,16 @@ class PriceListState(MixinState):
                 product_name = ""
                 barcode = ""
                 sale_price_val = 0.0
-                if item.product_id:
-                    p = session.exec(
-                        select(Product)
-                        .where(Product.id == item.product_id)
-                        .where(Product.company_id == company_id)
-                        .where(Product.branch_id == branch_id)
-                    ).first()
-                    if p:
-                        product_name = p.description or ""
-                        barcode = p.barcode or ""
-                        sale_price_val = float(resolve_effective_price(p, global_margin=_gm))
+                p = products.get(item.product_id) if item.product_id else None
+                if p:
+                    product_name = p.description or ""
+                    barcode = p.barcode or ""
+                    sale_price_val = float(resolve_effective_price(p, global_margin=_gm))
                 variant_desc = ""
-                if item.product_variant_id:
-                    v = session.exec(
-                        select(ProductVariant)
-                        .where(ProductVariant.id == item.product_variant_id)
-                        .where(ProductVariant.company_id == company_id)
-                        .where(ProductVariant.branch_id == branch_id)
-                    ).first()
-                    if v:
-                        parts = [v.size, v.color]
-                        variant_desc = " / ".join(x for x in parts if x)
+                v = variants.get(item.product_variant_id) if item.product_variant_id else None
+                if v:
+                    parts = [v.size, v.color]
+                    variant_desc = " / ".join(x for x in parts if x)
 
                 unit_price_f = float(item.unit_price or 0)
                 diff_display = ""
@@ -281,6 +299,7 @@ class PriceListState(MixinState):
                 pl.is_default = self.pl_is_default
                 pl.currency_code = self.pl_currency_code
                 session.commit()
+            invalidate_pricing_cache(company_id, branch_id)
 
             self.show_price_list_form = False
             await self._load_price_lists()
@@ -306,8 +325,7 @@ class PriceListState(MixinState):
         self.pl_item_product_id = ""
         self.pl_item_variant_id = ""
         self.pl_item_unit_price = ""
-        self.pl_item_product_search = ""
-        self.pl_item_product_results = []
+        await self._open_product_picker(include_variants=True, browse=False)
         await self._load_price_list_items(price_list_id)
         await self._load_price_list_clients(price_list_id)
 
@@ -434,8 +452,7 @@ class PriceListState(MixinState):
                 .where(PriceList.is_active == True)  # noqa: E712
                 .order_by(PriceList.is_default.desc(), PriceList.name)
             ).all()
-            counts = {pl.id: session.exec(select(func.count(PriceListItem.id)).where(PriceListItem.price_list_id == pl.id)).one() or 0 for pl in rows}
-            client_counts = {pl.id: session.exec(select(func.count(Client.id)).where(Client.price_list_id == pl.id)).one() or 0 for pl in rows}
+            counts, client_counts = self._price_list_counts(session, [pl.id for pl in rows])
         self.price_lists = [
             {
                 "id": pl.id,
@@ -460,90 +477,13 @@ class PriceListState(MixinState):
 
     # ─── Ítems de la lista ───────────────────────────────────────────
 
-    @rx.event
-    async def pl_search_products(self, query: str):
-        self.pl_item_product_search = query
-        if len(query.strip()) < 2:
-            self.pl_item_product_results = []
-            return
-
-        company_id = self._company_id()
-        branch_id = self._branch_id()
-        from app.utils.tenant import set_tenant_context
-        from sqlalchemy import func as sa_func
-        set_tenant_context(company_id, branch_id)
-        q_lower = query.strip().lower()
-        _gm = float(getattr(self, "effective_profit_margin_decimal", 0.0) or 0.0)
-        results: list[dict] = []
-        with rx.session() as session:
-            session.info["tenant_bypass"] = True
-            # Productos base
-            stmt = (
-                select(Product)
-                .where(Product.company_id == company_id)
-                .where(Product.branch_id == branch_id)
-                .where(Product.is_active == True)
-                .where(
-                    (sa_func.lower(Product.description).contains(q_lower))
-                    | (Product.barcode.contains(query.strip()))
-                )
-                .limit(10)
-            )
-            for p in session.exec(stmt).all():
-                results.append({
-                    "id": str(p.id),
-                    "variant_id": "",
-                    "description": p.description,
-                    "barcode": p.barcode or "",
-                    "sale_price": fmt_price(resolve_effective_price(p, global_margin=_gm)),
-                })
-
-            # Variantes
-            stmt_v = (
-                select(ProductVariant)
-                .join(Product, ProductVariant.product_id == Product.id)
-                .where(ProductVariant.company_id == company_id)
-                .where(ProductVariant.branch_id == branch_id)
-                .where(Product.is_active == True)
-                .where(
-                    (sa_func.lower(Product.description).contains(q_lower))
-                    | (sa_func.lower(ProductVariant.sku).contains(q_lower))
-                    | (sa_func.lower(ProductVariant.size).contains(q_lower))
-                    | (sa_func.lower(ProductVariant.color).contains(q_lower))
-                )
-                .limit(10)
-            )
-            variant_rows = session.exec(stmt_v).all()
-            parent_ids = {v.product_id for v in variant_rows}
-            parents = {
-                p.id: p
-                for p in session.exec(
-                    select(Product).where(Product.id.in_(parent_ids))
-                ).all()
-            }
-            for v in variant_rows:
-                parent = parents.get(v.product_id)
-                if not parent:
-                    continue
-                parts = [s for s in [v.size, v.color] if s]
-                variant_label = " / ".join(parts) if parts else v.sku
-                results.append({
-                    "id": str(v.product_id),
-                    "variant_id": str(v.id),
-                    "description": f"{parent.description} — {variant_label}",
-                    "barcode": v.sku,
-                    "sale_price": fmt_input_num(float(resolve_effective_price(parent, v, _gm))),
-                })
-
-        self.pl_item_product_results = results
-
     @rx.event
     def pl_select_product(self, product: dict):
         self.pl_item_product_id = product.get("id", "")
         self.pl_item_variant_id = product.get("variant_id", "")
         self.pl_item_unit_price = str(product.get("sale_price", ""))
-        self.pl_item_product_search = product.get("description", "")
-        self.pl_item_product_results = []
+        self.picker_query = product.get("description", "")
+        self._close_product_picker()
 
     @rx.event
     def set_pl_item_price(self, v: str):
@@ -592,11 +532,12 @@ class PriceListState(MixinState):
                 )
                 session.add(item)
             session.commit()
+        invalidate_pricing_cache(company_id, branch_id)
 
         self.pl_item_product_id = ""
         self.pl_item_variant_id = ""
         self.pl_item_unit_price = ""
-        self.pl_item_product_search = ""
+        self.picker_query = ""
         await self._load_price_list_items(pl_id)
         await self._load_price_lists()
         yield rx.toast("Precio actualizado en la lista.", duration=3000)
@@ -605,64 +546,95 @@ class PriceListState(MixinState):
     def set_pl_bulk_discount_pct(self, v: float):
         self.pl_bulk_discount_pct = v
 
-    @rx.event
-    @require_permission("manage_listas_precios")
-    async def apply_bulk_discount(self):
-        """Recalcula unit_price de todos los ítems de la lista aplicando un % de descuento sobre Product.sale_price."""
-        pl_id = self.selected_price_list.get("id")
-        if not pl_id:
-            yield rx.toast("No hay lista seleccionada.", duration=3000)
-            return
+    def _bulk_discount_pct(self) -> Decimal | None:
         try:
             pct = Decimal(str(self.pl_bulk_discount_pct or 0))
-            if pct <= 0 or pct >= 100:
-                yield rx.toast("El descuento debe ser un valor entre 1 y 99.", duration=3000)
-                return
         except Exception:
-            yield rx.toast("Porcentaje inválido.", duration=3000)
-            return
+            return None
+        if pct <= 0 or pct >= 100:
+            return None
+        return pct
 
+    def _reprice_selected_list(self, pl_id: int, pct: Decimal, *, dry_run: bool) -> BulkPriceResult:
+        """Descuento ``pct`` sobre el precio efectivo de cada ítem (en el pool sync)."""
         company_id = self._company_id()
         branch_id = self._branch_id()
         from app.utils.tenant import set_tenant_context
         set_tenant_context(company_id, branch_id)
 
         _gm = float(getattr(self, "effective_profit_margin_decimal", 0.0) or 0.0)
-        updated = 0
         with rx.session() as session:
             session.info["tenant_bypass"] = True
-            items = session.exec(
-                select(PriceListItem)
-                .where(PriceListItem.price_list_id == pl_id)
-                .where(PriceListItem.company_id == company_id)
-                .where(PriceListItem.branch_id == branch_id)
-            ).all()
-            for item in items:
-                if not item.product_id:
-                    continue
-                p = session.exec(
-                    select(Product)
-                    .where(Product.id == item.product_id)
-                    .where(Product.company_id == company_id)
-                    .where(Product.branch_id == branch_id)
-                ).first()
-                if not p:
-                    continue
-                v = None
-                if item.product_variant_id:
-                    v = session.exec(
-                        select(ProductVariant)
-                        .where(ProductVariant.id == item.product_variant_id)
-                    ).first()
-                base_price = Decimal(str(resolve_effective_price(p, v, _gm)))
-                if base_price > 0:
-                    factor = (Decimal("100") - pct) / Decimal("100")
-                    item.unit_price = round(base_price * factor, 2)
-                    updated += 1
-            session.commit()
+            result = reprice_price_list(
+                session,
+                company_id=company_id,
+                branch_id=branch_id,
+                price_list_id=int(pl_id),
+                adjustment=PriceAdjustment(ADJUST_PERCENT, -pct),
+                global_margin=_gm,
+                dry_run=dry_run,
+            )
+            if not dry_run:
+                session.commit()
+        return result
+
+    @rx.event
+    @require_permission("manage_listas_precios")
+    async def preview_bulk_discount(self):
+        """Cuenta cuántos precios cambiaría el descuento masivo, sin escribir."""
+        pl_id = self.selected_price_list.get("id")
+        if not pl_id:
+            yield rx.toast("No hay lista seleccionada.", duration=3000)
+            return
+        pct = self._bulk_discount_pct()
+        if pct is None:
+            yield rx.toast("El descuento debe ser un valor entre 1 y 99.", duration=3000)
+            return
+
+        result = await run_sync_db(
+            lambda: self._reprice_selected_list(pl_id, pct, dry_run=True),
+            company_id=self._company_id(),
+            operation="price_list:bulk_preview",
+        )
+        if not result.changed:
+            yield rx.toast("Ningún precio cambiaría con ese descuento.", duration=3000)
+            return
+        sample = result.preview[0]
+        yield rx.toast(
+            f"{result.changed} de {result.matched} precios cambiarían. "
+            f"Ej.: {sample['description']} "
+            f"{self._format_currency(float(sample['old_price'] or 0))} → "
+            f"{self._format_currency(float(sample['new_price']))}",
+            duration=5000,
+        )
+
+    @rx.event
+    @require_permission("manage_listas_precios")
+    async def apply_bulk_discount(self):
+        """Recalcula unit_price de todos los ítems de la lista aplicando un % de descuento sobre el precio efectivo.
+
+        Una query para todos los ítems y ``UPDATE`` por lotes
+        (``pricing.reprice_price_list``), fuera del event loop.
+        """
+        pl_id = self.selected_price_list.get("id")
+        if not pl_id:
+            yield rx.toast("No hay lista seleccionada.", duration=3000)
+            return
+        pct = self._bulk_discount_pct()
+        if pct is None:
+            yield rx.toast("El descuento debe ser un valor entre 1 y 99.", duration=3000)
+            return
+
+        company_id = self._company_id()
+        result = await run_sync_db(
+            lambda: self._reprice_selected_list(pl_id, pct, dry_run=False),
+            company_id=company_id,
+            operation="price_list:bulk_discount",
+        )
 
         await self._load_price_list_items(pl_id)
         self.pl_bulk_discount_pct = 0.0
+        updated = result.changed
         yield rx.toast(
             f"{updated} precio{'s' if updated != 1 else ''} actualizado{'s' if updated != 1 else ''} con {pct}% de descuento.",
             duration=4000,
@@ -686,6 +658,7 @@ class PriceListState(MixinState):
             if item:
                 session.delete(item)
                 session.commit()
+        invalidate_pricing_cache(company_id, self._branch_id())
         if pl_id:
             await self._load_price_list_items(pl_id)
             await self._load_price_lists()
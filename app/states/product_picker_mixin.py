@@ -0,0 +1,84 @@
+"""Mixin del selector de productos paginado (promociones y listas de precios).
+
+El state sólo tiene la ventana visible (``picker_rows``) y el texto buscado;
+cada editor guarda su selección como ids (``promo_product_ids``,
+``pl_item_product_id``) y abre el selector con :meth:`_open_product_picker`.
+Ver :mod:`app.services.product_picker`.
+"""
+from __future__ import annotations
+
+from typing import Any
+
+import reflex as rx
+
+from app.services.product_picker import PRODUCT_PICKER_PAGE_SIZE, product_picker_page
+from app.utils.logger import get_logger
+
+logger = get_logger("ProductPickerMixin")
+
+# Con menos letras el selector en modo "sólo búsqueda" no consulta.
+PICKER_MIN_QUERY = 2
+
+
+class ProductPickerMixin:
+    picker_query: str = ""
+    picker_rows: list[dict[str, Any]] = []
+    picker_has_more: bool = False
+    picker_loading: bool = False
+
+    _picker_include_variants: bool = rx.field(default=True, is_var=False)
+    _picker_browse: bool = rx.field(default=True, is_var=False)
+    _picker_offset: int = rx.field(default=0, is_var=False)
+
+    async def _open_product_picker(self, *, include_variants: bool, browse: bool) -> None:
+        """Reinicia el selector; con ``browse`` carga la primera ventana."""
+        self._picker_include_variants = include_variants
+        self._picker_browse = browse
+        self.picker_query = ""
+        self.picker_rows = []
+        self.picker_has_more = False
+        self._picker_offset = 0
+        if browse:
+            await self._load_picker_page()
+
+    def _close_product_picker(self) -> None:
+        self.picker_rows = []
+        self.picker_has_more = False
+        self._picker_offset = 0
+
+    async def _load_picker_page(self, *, append: bool = False) -> None:
+        term = (self.picker_query or "").strip()
+        if not self._picker_browse and len(term) < PICKER_MIN_QUERY:
+            self._close_product_picker()
+            return
+        offset = self._picker_offset + PRODUCT_PICKER_PAGE_SIZE if append else 0
+        self.picker_loading = True
+        try:
+            page = await product_picker_page(
+                self._company_id(),
+                self._branch_id(),
+                query=term,
+                offset=offset,
+                include_variants=self._picker_include_variants,
+                global_margin=float(
+                    getattr(self, "effective_profit_margin_decimal", 0.0) or 0.0
+                ),
+            )
+        except Exception as exc:
+            logger.warning("Selector de productos: error cargando ventana: %s", exc)
+            return
+        finally:
+            self.picker_loading = False
+        self._picker_offset = offset
+        self.picker_rows = (self.picker_rows + page.rows) if append else page.rows
+        self.picker_has_more = page.has_more
+
+    @rx.event
+    async def set_picker_query(self, query: str):
+        self.picker_query = query
+        await self._load_picker_page()
+
+    @rx.event
+    async def picker_load_more(self):
+        if self.picker_has_more and not self.picker_loading:
+            await self._load_picker_page(append=True)
@@ -13,6 +13,7 @@ import reflex as rx
 from sqlmodel import select
 
 from app.models import User
+from app.utils.login_pipeline import forget_verified_tokens
 from app.utils.receipt_format import normalize_paper
 from .mixin_state import MixinState
 
@@ -105,6 +106,9 @@ class ProfileState(MixinState):
             db_user.receipt_width = None
             session.add(db_user)
             session.commit()
+        # El snapshot del JWT guarda receipt_paper: sin esto el fast path de
+        # _resolve_current_user devolvería el papel anterior.
+        forget_verified_tokens(int(user_id))
 
         # Refrescar _cached_user para que el nuevo papel aplique ya en esta
         # sesión (la cascada de impresión lee _cached_user, no el rx.var cacheado).
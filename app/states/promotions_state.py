@@ -12,10 +12,12 @@ from sqlmodel import select, func
 from app.models import Promotion
 from app.models.auth import User
 from app.models.promotions import PromotionType, PromotionScope
+from app.services.pricing_cache import invalidate_pricing_cache
 from app.utils.formatting import fmt_price
 from app.utils.timezone import utc_now_naive
 
 from .mixin_state import MixinState, require_permission
+from .product_picker_mixin import ProductPickerMixin
 
 logger = logging.getLogger(__name__)
 
@@ -33,7 +35,7 @@ _SCOPE_LABELS = {
 }
 
 
-class PromotionsState(MixinState):
+class PromotionsState(ProductPickerMixin, MixinState):
     """Estado para el módulo de Ofertas y Promociones."""
 
     # ── Lista ────────────────────────────────────────────────────────
@@ -55,8 +57,9 @@ class PromotionsState(MixinState):
     promo_starts_at: str = ""
     promo_ends_at: str = ""
     promo_max_uses: str = ""
+    # Selección de productos (scope=PRODUCT): sólo ids; las filas visibles
+    # vienen del selector paginado (ProductPickerMixin).
     promo_product_ids: list[str] = []
-    promo_product_search: str = ""
     promo_category: str = ""
     promo_is_active: bool = True
 
@@ -90,25 +93,10 @@ class PromotionsState(MixinState):
     # Categorías disponibles para selector
     promotion_categories: list[str] = []
 
-    # Productos disponibles para selector (scope=PRODUCT)
-    promotion_products: list[dict[str, Any]] = []
-
     # ─── Página init ─────────────────────────────────────────────────
     # Renombrado para evitar shadowing del guard en `State.page_init_promociones`
     # (ver nota en quotation_state.bg_load_quotations).
 
-    @rx.var(cache=True)
-    def filtered_promotion_products(self) -> list[dict[str, Any]]:
-        """Productos filtrados por el buscador del formulario."""
-        search = (self.promo_product_search or "").strip().lower()
-        if not search:
-            return self.promotion_products
-        return [
-            p for p in self.promotion_products
-            if search in (p.get("description") or "").lower()
-            or search in (p.get("barcode") or "").lower()
-        ]
-
     @rx.event
     async def bg_load_promotions(self):
         guard = self._require_active_subscription()
@@ -117,7 +105,6 @@ class PromotionsState(MixinState):
             return
         await self._load_promotions()
         await self._load_promo_categories()
-        await self._load_promo_products()
 
     # ─── Carga ───────────────────────────────────────────────────────
 
@@ -255,73 +242,10 @@ class PromotionsState(MixinState):
             cats = session.exec(stmt).all()
         self.promotion_categories = [c for c in cats if c]
 
-    async def _load_promo_products(self):
-        company_id = self._company_id()
-        branch_id = self._branch_id()
-        if not company_id:
-            return
-        from app.models import Product, ProductVariant
-        from app.utils.tenant import set_tenant_context
-        set_tenant_context(company_id, branch_id)
-        products: list[dict[str, Any]] = []
-        with rx.session() as session:
-            session.info["tenant_bypass"] = True
-            # Productos base
-            stmt = (
-                select(Product.id, Product.description, Product.barcode, Product.category)
-                .where(Product.company_id == company_id)
-                .where(Product.branch_id == branch_id)
-                .where(Product.is_active == True)  # noqa: E712
-                .order_by(Product.description)
-            )
-            for r in session.exec(stmt).all():
-                products.append({
-                    "id": r[0],
-                    "description": r[1],
-                    "barcode": r[2] or "",
-                    "category": r[3] or "",
-                    "label": f"{r[1]} ({r[2]})" if r[2] else r[1],
-                })
-
-            # Variantes — usan el product_id del padre para que el toggle
-            # del checkbox actúe sobre el mismo producto en PromotionProduct
-            stmt_v = (
-                select(ProductVariant)
-                .join(Product, ProductVariant.product_id == Product.id)
-                .where(ProductVariant.company_id == company_id)
-                .where(ProductVariant.branch_id == branch_id)
-                .where(Product.is_active == True)  # noqa: E712
-                .order_by(Product.description, ProductVariant.size, ProductVariant.color)
-            )
-            variant_rows = session.exec(stmt_v).all()
-            parent_ids = {v.product_id for v in variant_rows}
-            parents = {
-                p.id: p
-                for p in session.exec(
-                    select(Product).where(Product.id.in_(parent_ids))
-                ).all()
-            }
-            for v in variant_rows:
-                parent = parents.get(v.product_id)
-                if not parent:
-                    continue
-                parts = [s for s in [v.size, v.color] if s]
-                variant_label = " / ".join(parts) if parts else v.sku
-                desc = f"{parent.description} — {variant_label}"
-                products.append({
-                    "id": v.product_id,
-                    "description": desc,
-                    "barcode": v.sku,
-                    "category": parent.category or "",
-                    "label": f"{desc} ({v.sku})",
-                })
-
-        self.promotion_products = products
-
     # ─── Formulario ──────────────────────────────────────────────────
 
     @rx.event
-    def open_new_promotion(self):
+    async def open_new_promotion(self):
         self.promo_editing_id = 0
         self.promo_name = ""
         self.promo_description = ""
@@ -334,7 +258,7 @@ class PromotionsState(MixinState):
         self.promo_ends_at = (utc_now_naive() + timedelta(days=7)).strftime("%Y-%m-%d")
         self.promo_max_uses = ""
         self.promo_product_ids = []
-        self.promo_product_search = ""
+        await self._open_product_picker(include_variants=False, browse=True)
         self.promo_category = ""
         self.promo_is_active = True
         self._set_weekdays_from_mask(127)
@@ -347,7 +271,7 @@ class PromotionsState(MixinState):
         self.promo_form_key += 1
 
     @rx.event
-    def open_edit_promotion(self, promo: dict):
+    async def open_edit_promotion(self, promo: dict):
         self.promo_editing_id = promo.get("id", 0)
         self.promo_name = promo.get("name", "")
         self.promo_description = promo.get("description", "")
@@ -364,7 +288,7 @@ class PromotionsState(MixinState):
         if not saved_pids and promo.get("product_id"):
             saved_pids = [promo["product_id"]]
         self.promo_product_ids = [str(pid) for pid in saved_pids]
-        self.promo_product_search = ""
+        await self._open_product_picker(include_variants=False, browse=True)
         self.promo_category = promo.get("category", "")
         self.promo_is_active = promo.get("is_active", True)
         self._set_weekdays_from_mask(promo.get("weekdays_mask", 127) or 127)
@@ -405,6 +329,7 @@ class PromotionsState(MixinState):
     @rx.event
     def close_promotion_form(self):
         self.show_promotion_form = False
+        self._close_product_picker()
 
     # Setters de formulario
     @rx.event
@@ -436,9 +361,6 @@ class PromotionsState(MixinState):
             ids.append(product_id_str)
         self.promo_product_ids = ids
 
-    @rx.event
-    def set_promo_product_search(self, v: str): self.promo_product_search = v
-
     @rx.event
     def set_promo_category(self, v: str): self.promo_category = v
     @rx.event
@@ -701,8 +623,10 @@ class PromotionsState(MixinState):
                         session.delete(pp)
                     if old_pp:
                         session.commit()
+            invalidate_pricing_cache(company_id, branch_id)
 
             self.show_promotion_form = False
+            self._close_product_picker()
             await self._load_promotions()
             action = "actualizada" if self.promo_editing_id else "creada"
             yield rx.toast(f"Promoción {action} exitosamente.", duration=3000)
@@ -732,6 +656,7 @@ class PromotionsState(MixinState):
             if promo:
                 promo.is_active = new_active
                 session.commit()
+        invalidate_pricing_cache(company_id, branch_id)
         await self._load_promotions()
         label = "activada" if new_active else "desactivada"
         yield rx.toast(f"Promoción {label}.", duration=3000)
@@ -794,6 +719,7 @@ class PromotionsState(MixinState):
                     session.delete(pp)
                 session.delete(promo)
                 session.commit()
+            invalidate_pricing_cache(company_id, branch_id)
             await self._load_promotions()
             yield rx.toast("Promoción eliminada.", duration=3000)
         except Exception as exc:
@@ -15,11 +15,11 @@ from app.utils.logger import get_logger
 from app.utils.validators import validate_email, validate_password
 from app.utils.sanitization import sanitize_name, sanitize_phone
 from app.utils.timezone import utc_now_naive
-from app.utils.rate_limit import (
-    is_rate_limited as _is_rate_limited,
-    record_failed_attempt as _record_failed_attempt,
-    clear_login_attempts as _clear_login_attempts,
-    remaining_lockout_time as _remaining_lockout_time,
+from app.utils.async_rate_limit import (
+    is_rate_limited_async as _is_rate_limited,
+    record_failed_attempt_async as _record_failed_attempt,
+    clear_login_attempts_async as _clear_login_attempts,
+    remaining_lockout_time_async as _remaining_lockout_time,
 )
 from .auth_state import ADMIN_PRIVILEGES
 from .mixin_state import MixinState
@@ -138,8 +138,8 @@ class RegisterState(MixinState):
                 or client_ip
             )
 
-        if _is_rate_limited(identifier, ip_address=client_ip):
-            remaining = _remaining_lockout_time(identifier, ip_address=client_ip)
+        if await _is_rate_limited(identifier, ip_address=client_ip):
+            remaining = await _remaining_lockout_time(identifier, ip_address=client_ip)
             self.register_error = (
                 f"Demasiados intentos. Espere {remaining} minuto(s) para registrar."
             )
@@ -188,7 +188,7 @@ class RegisterState(MixinState):
                 if existing_email:
                     self.register_error = "El correo ya esta registrado."
                     self.is_registering = False
-                    _record_failed_attempt(identifier, ip_address=client_ip)
+                    await _record_failed_attempt(identifier, ip_address=client_ip)
                     return
 
                 now = utc_now_naive()
@@ -241,7 +241,7 @@ class RegisterState(MixinState):
                 if not role:
                     self.register_error = "No se pudo crear el rol administrador."
                     self.is_registering = False
-                    _record_failed_attempt(identifier, ip_address=client_ip)
+                    await _record_failed_attempt(identifier, ip_address=client_ip)
                     return
 
                 branch = Branch(
@@ -306,7 +306,7 @@ class RegisterState(MixinState):
                     exc_info=True,
                 )
                 self.is_registering = False
-                _record_failed_attempt(identifier, ip_address=client_ip)
+                await _record_failed_attempt(identifier, ip_address=client_ip)
                 return
             except Exception:
                 session.rollback()
@@ -316,13 +316,13 @@ class RegisterState(MixinState):
                     exc_info=True,
                 )
                 self.is_registering = False
-                _record_failed_attempt(identifier, ip_address=client_ip)
+                await _record_failed_attempt(identifier, ip_address=client_ip)
                 return
 
         if not user_id or not company_id or not branch_id:
             self.register_error = "No se pudo completar el registro."
             self.is_registering = False
-            _record_failed_attempt(identifier, ip_address=client_ip)
+            await _record_failed_attempt(identifier, ip_address=client_ip)
             return
 
         self.token = create_access_token(
@@ -330,7 +330,7 @@ class RegisterState(MixinState):
             token_version=token_version,
             company_id=company_id,
         )
-        _clear_login_attempts(identifier, ip_address=client_ip)
+        await _clear_login_attempts(identifier, ip_address=client_ip)
         if hasattr(self, "selected_branch_id"):
             self.selected_branch_id = str(branch_id)
         # Cargar runtime (suscripción, módulos, sucursales) igual que login
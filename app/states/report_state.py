@@ -199,7 +199,9 @@ def _run_report_sync(params: dict):
         else:
             raise ValueError(f"Tipo de reporte no válido: {report_type!r}")
 
-    return output.getvalue(), filename
+    # Ventas/inventario devuelven un archivo temporal (streaming); el resto, BytesIO.
+    with output:
+        return output.read(), filename
 
 
 class ReportState(MixinState):
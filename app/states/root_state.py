@@ -35,6 +35,7 @@ from sqlalchemy import func
 from sqlmodel import select
 
 from app.models import SaleInstallment
+from app.utils.state_size import register_state_var_groups
 from .auth_state import AuthState
 from .billing_state import BillingState
 from .ui_state import UIState
@@ -166,11 +167,15 @@ def _collect_mixin_chain(top_cls):
     return chain
 
 
+# Var → clase que la declara, para el desglose de tamaño del state por mixin.
+_var_groups: dict[str, str] = {}
+
 for _mixin in _mixins:
     if _mixin is VentaState:
         for _venta_mixin in (CartMixin, PaymentMixin, ReceiptMixin, RecentMovesMixin):
             if hasattr(_venta_mixin, "__annotations__"):
                 _class_dict["__annotations__"].update(_venta_mixin.__annotations__)
+                _var_groups.update(dict.fromkeys(_venta_mixin.__annotations__, _venta_mixin.__name__))
             for _name, _value in _venta_mixin.__dict__.items():
                 if _name.startswith("__"):
                     continue
@@ -181,6 +186,7 @@ for _mixin in _mixins:
     for _ancestor in _collect_mixin_chain(_mixin):
         if hasattr(_ancestor, "__annotations__"):
             _class_dict["__annotations__"].update(_ancestor.__annotations__)
+            _var_groups.update(dict.fromkeys(_ancestor.__annotations__, _ancestor.__name__))
         for _name, _value in _ancestor.__dict__.items():
             if _name.startswith("__"):
                 continue
@@ -194,6 +200,8 @@ _class_dict["__annotations__"]["is_loading"] = bool
 _class_dict["is_loading"] = False
 _class_dict["check_overdue_alerts"] = check_overdue_alerts
 
+register_state_var_groups(_var_groups)
+
 # Crear RootState dinamicamente para que BaseStateMeta procese todos los metodos mixin
 RootState = type("RootState", (*_mixins, rx.State), _class_dict)
 
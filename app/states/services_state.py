@@ -7,7 +7,6 @@ import math
 
 logger = logging.getLogger(__name__)
 import calendar
-import io
 from sqlmodel import select
 from sqlalchemy import func, or_, text
 from app.models import Sale, SaleItem, FieldReservation as FieldReservationModel, FieldPrice as FieldPriceModel, User as UserModel, SalePayment, CashboxLog, PaymentMethod
@@ -28,23 +27,13 @@ from app.utils.sanitization import (
 )
 from .types import FieldReservation, ServiceLogEntry, ReservationReceipt, FieldPrice, FieldPriceGroup
 from .mixin_state import MixinState
+from .export_job_mixin import ExportJobMixin
+from app.services.sales_rollup_service import apply_sale_to_rollup_sync
 from app.utils.pagination import build_page_window
 from app.utils.dates import get_today_str, get_current_week_str, get_current_month_str
 from app.utils.formatting import fmt_input_num, fmt_price, format_number
 from app.utils.print_helper import build_print_script
 from app.utils.receipt_format import receipt_style
-from app.utils.exports import (
-    create_excel_workbook,
-    style_header_row,
-    auto_adjust_column_widths,
-    add_company_header,
-    add_totals_row_with_formulas,
-    add_notes_section,
-    THIN_BORDER,
-    POSITIVE_FILL,
-    WARNING_FILL,
-    NEGATIVE_FILL,
-)
 
 TODAY_STR = get_today_str()
 CURRENT_WEEK_STR = get_current_week_str()
@@ -85,7 +74,7 @@ _EMPTY_RESERVATION: FieldReservation = {
 }
 
 
-class ServicesState(MixinState):
+class ServicesState(ExportJobMixin, MixinState):
     """Estado para el módulo de servicios (reservas de canchas).
 
     Gestiona reservas de canchas deportivas con calendario interactivo,
@@ -561,13 +550,39 @@ class ServicesState(MixinState):
         self.reservation_staged_end_date = ""
         self.apply_reservation_filters()
 
-    def export_reservations_excel(self):
-        if not self.current_user["privileges"].get("view_servicios"):
-            return rx.toast("No tiene permisos para ver servicios.", duration=3000)
-        if not self.current_user["privileges"].get("export_data"):
-            return rx.toast("No tiene permisos para exportar datos.", duration=3000)
-        if not self._company_id() or not self._branch_id():
-            return rx.toast("Empresa no definida.", duration=3000)
+    @rx.event(background=True)
+    async def export_reservations_excel(self):
+        async with self:
+            if not self.current_user["privileges"].get("view_servicios"):
+                return rx.toast("No tiene permisos para ver servicios.", duration=3000)
+            if not self.current_user["privileges"].get("export_data"):
+                return rx.toast("No tiene permisos para exportar datos.", duration=3000)
+            company_id = self._company_id()
+            branch_id = self._branch_id()
+            if not company_id or not branch_id:
+                return rx.toast("Empresa no definida.", duration=3000)
+            filters = {
+                "sport": self.field_rental_sport,
+                "search": self.reservation_search,
+                "status": self.reservation_filter_status,
+                "start": self.reservation_filter_start_date,
+                "end": self.reservation_filter_end_date,
+                "currency": self._currency_excel_format(),
+            }
+            filename = f"reservas_{self.field_rental_sport}_{TODAY_STR}.xlsx"
+
+        return await self._run_export_job(
+            "reservas",
+            company_id=company_id,
+            branch_id=branch_id,
+            filters=filters,
+            filename=filename,
+            collect=lambda: self._collect_reservations_export(),
+            empty_message="No hay datos para exportar.",
+        )
+
+    def _collect_reservations_export(self) -> dict | None:
+        """Payload de ``render_reservations``; None si no hay reservas."""
         with rx.session() as session:
             session.info["tenant_bypass"] = True
             data_query = (
@@ -579,87 +594,22 @@ class ServicesState(MixinState):
             data = [self._reservation_to_dict(reservation) for reservation in reservations]
 
         if not data:
-            return rx.toast("No hay datos para exportar.", duration=3000)
+            return None
 
-        currency_label = self._currency_symbol_clean()
-        currency_format = self._currency_excel_format()
-        company_name = getattr(self, "company_name", "") or "EMPRESA"
         sport_label = self.field_rental_sport.capitalize() if self.field_rental_sport else "Todos"
         period_from = self.reservation_filter_start_date or "Inicio"
         period_to = self.reservation_filter_end_date or "Actual"
-        period_label = f"Período: {period_from} a {period_to} | Deporte: {sport_label}"
 
-        total_reservations = len(data)
         total_amount = sum(float(item.get("total_amount", 0) or 0) for item in data)
         total_paid = sum(float(item.get("paid_amount", 0) or 0) for item in data)
-        total_balance = total_amount - total_paid
-
-        status_counts: dict[str, int] = {"pendiente": 0, "pagado": 0, "cancelado": 0}
-        for item in data:
-            status_value = self._reservation_status_to_ui(item.get("status", "pendiente"))
-            key = str(status_value or "pendiente").strip().lower()
-            status_counts[key] = status_counts.get(key, 0) + 1
-
-        wb, ws = create_excel_workbook("Reservas")
-
-        row = add_company_header(
-            ws,
-            company_name,
-            "RESERVAS DE CAMPOS DEPORTIVOS",
-            period_label,
-            columns=12,
-            generated_at=self._display_now(),
-        )
-
-        row += 1
-        ws.cell(row=row, column=1, value="RESUMEN OPERATIVO")
-        row += 1
-        ws.cell(row=row, column=1, value="Total de Reservas:")
-        ws.cell(row=row, column=2, value=total_reservations)
-        row += 1
-        ws.cell(row=row, column=1, value="Reservas Pagadas:")
-        ws.cell(row=row, column=2, value=status_counts.get("pagado", 0))
-        row += 1
-        ws.cell(row=row, column=1, value="Reservas Pendientes:")
-        ws.cell(row=row, column=2, value=status_counts.get("pendiente", 0))
-        row += 1
-        ws.cell(row=row, column=1, value="Reservas Canceladas:")
-        ws.cell(row=row, column=2, value=status_counts.get("cancelado", 0))
-        row += 1
-        ws.cell(row=row, column=1, value=f"Monto Total ({currency_label}):")
-        ws.cell(row=row, column=2, value=total_amount).number_format = currency_format
-        row += 1
-        ws.cell(row=row, column=1, value=f"Monto Cobrado ({currency_label}):")
-        ws.cell(row=row, column=2, value=total_paid).number_format = currency_format
-        row += 1
-        ws.cell(row=row, column=1, value=f"Saldo Pendiente ({currency_label}):")
-        ws.cell(row=row, column=2, value=total_balance).number_format = currency_format
-
-        row += 2
-        headers = [
-            "Fecha",
-            "Hora Inicio",
-            "Hora Fin",
-            "Cliente",
-            "DNI",
-            "Teléfono",
-            "Deporte",
-            "Campo",
-            "Estado",
-            f"Monto Total ({currency_label})",
-            f"Pagado ({currency_label})",
-            f"Saldo ({currency_label})",
-        ]
-        style_header_row(ws, row, headers)
-        data_start = row + 1
-        row += 1
 
         status_display_map = {
             "pendiente": "Pendiente",
             "pagado": "Pagada",
             "cancelado": "Cancelada",
         }
-
+        status_counts: dict[str, int] = {"pendiente": 0, "pagado": 0, "cancelado": 0}
+        rows = []
         for r in data:
             try:
                 start_date, start_time = r["start_datetime"].split(" ")
@@ -671,81 +621,39 @@ class ServicesState(MixinState):
 
             status_ui = self._reservation_status_to_ui(r.get("status", "pendiente"))
             status_key = str(status_ui or "pendiente").strip().lower()
+            status_counts[status_key] = status_counts.get(status_key, 0) + 1
             status_display = status_display_map.get(status_key, status_key.capitalize())
 
-            total_value = float(r.get("total_amount", 0) or 0)
-            paid_value = float(r.get("paid_amount", 0) or 0)
-
-            ws.cell(row=row, column=1, value=start_date)
-            ws.cell(row=row, column=2, value=start_time)
-            ws.cell(row=row, column=3, value=end_time)
-            ws.cell(row=row, column=4, value=r.get("client_name", "") or "Cliente no registrado")
-            ws.cell(row=row, column=5, value=r.get("dni", "") or "-")
-            ws.cell(row=row, column=6, value=r.get("phone", "") or "-")
-            ws.cell(row=row, column=7, value=r.get("sport_label", r.get("sport", "")) or "Sin deporte")
-            ws.cell(row=row, column=8, value=r.get("field_name", "") or "Sin campo")
-            ws.cell(row=row, column=9, value=status_display)
-            ws.cell(row=row, column=10, value=total_value).number_format = currency_format
-            ws.cell(row=row, column=11, value=paid_value).number_format = currency_format
-            ws.cell(row=row, column=12, value=f"=J{row}-K{row}").number_format = currency_format
-
-            status_cell = ws.cell(row=row, column=9)
-            if status_key == "pagado":
-                status_cell.fill = POSITIVE_FILL
-            elif status_key == "pendiente":
-                status_cell.fill = WARNING_FILL
-            elif status_key == "cancelado":
-                status_cell.fill = NEGATIVE_FILL
-
-            for col in range(1, 13):
-                ws.cell(row=row, column=col).border = THIN_BORDER
-            row += 1
-
-        totals_row = row
-        add_totals_row_with_formulas(
-            ws,
-            totals_row,
-            data_start,
-            [
-                {"type": "label", "value": "TOTALES"},
-                {"type": "text", "value": ""},
-                {"type": "text", "value": ""},
-                {"type": "text", "value": ""},
-                {"type": "text", "value": ""},
-                {"type": "text", "value": ""},
-                {"type": "text", "value": ""},
-                {"type": "text", "value": ""},
-                {"type": "formula", "value": f"=COUNTA(A{data_start}:A{totals_row-1})"},
-                {"type": "sum", "col_letter": "J", "number_format": currency_format},
-                {"type": "sum", "col_letter": "K", "number_format": currency_format},
-                {"type": "sum", "col_letter": "L", "number_format": currency_format},
-            ],
-        )
-
-        add_notes_section(
-            ws,
-            totals_row,
-            [
-                "Monto Total: Tarifa completa de la reserva.",
-                "Pagado: Importe efectivamente cobrado al cliente.",
-                "Saldo = Monto Total - Pagado (fórmula verificable en Excel).",
-                "Estado Pendiente: reserva creada con saldo pendiente de cobro.",
-                "Estado Pagada: reserva totalmente cobrada, sin saldo pendiente.",
-                "Estado Cancelada: reserva anulada, no genera ingreso operativo.",
-            ],
-            columns=12,
-        )
-
-        auto_adjust_column_widths(ws)
+            rows.append((
+                start_date,
+                start_time,
+                end_time,
+                r.get("client_name", "") or "Cliente no registrado",
+                r.get("dni", "") or "-",
+                r.get("phone", "") or "-",
+                r.get("sport_label", r.get("sport", "")) or "Sin deporte",
+                r.get("field_name", "") or "Sin campo",
+                status_display,
+                float(r.get("total_amount", 0) or 0),
+                float(r.get("paid_amount", 0) or 0),
+                status_key,
+            ))
 
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-
-        return rx.download(
-            data=output.getvalue(),
-            filename=f"reservas_{self.field_rental_sport}_{TODAY_STR}.xlsx"
-        )
+        return {
+            "company_name": getattr(self, "company_name", "") or "EMPRESA",
+            "period_label": f"Período: {period_from} a {period_to} | Deporte: {sport_label}",
+            "generated_at": self._display_now(),
+            "currency_label": self._currency_symbol_clean(),
+            "currency_format": self._currency_excel_format(),
+            "summary": {
+                "total_reservations": len(data),
+                "status_counts": status_counts,
+                "total_amount": total_amount,
+                "total_paid": total_paid,
+                "total_balance": total_amount - total_paid,
+            },
+            "rows": rows,
+        }
 
     field_prices: List[FieldPrice] = []
 
@@ -2089,6 +1997,15 @@ class ServicesState(MixinState):
                     sale_id=new_sale.id,
                 )
             )
+            # Rollups diarios al final: las filas del día quedan bloqueadas
+            # sólo hasta el commit.
+            session.flush()
+            apply_sale_to_rollup_sync(
+                session,
+                new_sale.id,
+                company_id=company_id,
+                branch_id=branch_id,
+            )
             session.commit()
 
             reservation["paid_amount"] = new_paid_amount
@@ -2257,6 +2174,15 @@ class ServicesState(MixinState):
                     sale_id=new_sale.id,
                 )
             )
+            # Rollups diarios al final: las filas del día quedan bloqueadas
+            # sólo hasta el commit.
+            session.flush()
+            apply_sale_to_rollup_sync(
+                session,
+                new_sale.id,
+                company_id=company_id,
+                branch_id=branch_id,
+            )
             session.commit()
 
             reservation["paid_amount"] = new_paid_amount
@@ -13,6 +13,7 @@ from app.models.inventory import Category, ProductBatch, ProductKit, ProductVari
 from app.services.sale_service import SaleService
 from app.utils.barcode import clean_barcode, validate_barcode
 from app.utils.db import get_async_session
+from app.utils.performance import track_queries
 from ..types import SaleItemDict, TransactionItem
 from app.utils.formatting import fmt_input_num, fmt_price
 
@@ -103,6 +104,52 @@ class CartMixin:
 
     _autocomplete_debounce_seq: int = rx.field(default=0, is_var=False)
 
+    async def _product_is_kit(self, product_id, company_id, branch_id) -> bool:
+        """True si el producto tiene componentes (se expande en el carrito).
+
+        Consulta primero el cache de códigos de la sucursal; si no lo sabe,
+        va a la BD y lo anota. Ante error se trata como producto normal.
+        """
+        from app.services.barcode_cache import (
+            BARCODE_CACHE_ENABLED,
+            get_barcode_snapshot,
+        )
+        from app.utils.tenant import set_tenant_context
+
+        snapshot = None
+        if BARCODE_CACHE_ENABLED:
+            snapshot = get_barcode_snapshot(int(company_id), int(branch_id))
+            cached = snapshot.kit_flag(int(product_id))
+            if cached is not None:
+                return cached
+        try:
+            set_tenant_context(int(company_id), int(branch_id))
+            async with get_async_session() as session:
+                kit_exists = bool(
+                    (
+                        await session.exec(
+                            sql_select(ProductKit.id)
+                            .where(
+                                ProductKit.kit_product_id == int(product_id),
+                                ProductKit.company_id == int(company_id),
+                                ProductKit.branch_id == int(branch_id),
+                            )
+                            .limit(1)
+                        )
+                    ).first()
+                )
+        except Exception:
+            logging.exception(
+                "[POS] Error verificando kit para producto %s — se omite check",
+                product_id,
+            )
+            return False
+        finally:
+            set_tenant_context(None, None)
+        if snapshot is not None:
+            snapshot.remember_kit_flag(int(product_id), kit_exists)
+        return kit_exists
+
     async def _process_barcode(self, barcode: str):
         """Lógica compartida para procesar un código de barras."""
         company_id = None
@@ -127,32 +174,9 @@ class CartMixin:
                 prod_id = product.get("product_id") or product.get("id")
                 kit_exists = False
                 if prod_id and not product.get("is_variant"):
-                    try:
-                        from app.utils.tenant import set_tenant_context
-                        set_tenant_context(int(company_id), int(branch_id))
-                        async with get_async_session() as session:
-                            kit_exists = bool(
-                                (
-                                    await session.exec(
-                                        sql_select(ProductKit.id)
-                                        .where(
-                                            ProductKit.kit_product_id == int(prod_id),
-                                            ProductKit.company_id == int(company_id),
-                                            ProductKit.branch_id == int(branch_id),
-                                        )
-                                        .limit(1)
-                                    )
-                                ).first()
-                            )
-                    except Exception:
-                        logging.exception(
-                            "[POS] Error verificando kit para producto %s — se omite check",
-                            prod_id,
-                        )
-                        kit_exists = False
-                    finally:
-                        from app.utils.tenant import set_tenant_context
-                        set_tenant_context(None, None)
+                    kit_exists = await self._product_is_kit(
+                        prod_id, company_id, branch_id
+                    )
                 if kit_exists:
                     return await self._add_kit_to_cart(
                         product, company_id, branch_id
@@ -277,12 +301,18 @@ class CartMixin:
     ) -> Decimal | None:
         """Resuelve el precio efectivo del ítem en el formulario de venta.
 
-        Usa ``resolve_effective_price`` (la misma función que ``_recompute_cart_prices``
-        y ``sale_service``) para garantizar que el precio del carrito siempre coincida
-        con el que se cobrará al confirmar la venta.
+        Usa la misma jerarquía que ``sale_service`` (``_match_promotion``,
+        ``_pick_tier_price``) sobre el snapshot cacheado del tenant, así el precio
+        del carrito coincide con el que se cobrará sin consultar promos/tiers en
+        cada tecla.
         """
         from app.models import Product as ProductModel
-        from app.services.pricing import PriceSource, resolve_effective_price
+        from app.services.pricing import (
+            PriceSource,
+            resolve_base_price_from_snapshot,
+            resolve_effective_price_from_snapshot,
+        )
+        from app.services.pricing_cache import get_cart_pricing_snapshot
 
         product = product or self.selected_product
         if not product:
@@ -342,32 +372,33 @@ class CartMixin:
                 if _gm <= 0:
                     from app.services.sale_service import _get_effective_margin
                     _gm = await _get_effective_margin(session, int(company_id), int(branch_id))
-                # Primer pass: precio base sin promo para obtener el subtotal correcto.
-                base_res = await resolve_effective_price(
+                # Promos, tiers y lista del tenant salen del cache en proceso.
+                snapshot = await get_cart_pricing_snapshot(
                     session,
+                    company_id=int(company_id),
+                    branch_id=int(branch_id),
+                    price_list_id=price_list_id,
+                    coupon_code=coupon,
+                )
+                # Primer pass: precio base sin promo para obtener el subtotal correcto.
+                base_price, _source = resolve_base_price_from_snapshot(
+                    snapshot,
                     product=orm_product,
                     variant_id=int(variant_id) if variant_id else None,
                     quantity=qty_dec,
-                    company_id=int(company_id),
-                    branch_id=int(branch_id),
                     client_price_list_id=price_list_id,
                     global_margin=_gm,
-                    coupon_code=None,
-                    cart_subtotal=None,
                 )
-                cart_subtotal_pre_promo += qty_dec * base_res.base_price
+                cart_subtotal_pre_promo += qty_dec * base_price
 
                 # Segundo pass: resolución completa con promo y subtotal real.
-                resolution = await resolve_effective_price(
-                    session,
+                resolution = resolve_effective_price_from_snapshot(
+                    snapshot,
                     product=orm_product,
                     variant_id=int(variant_id) if variant_id else None,
                     quantity=qty_dec,
-                    company_id=int(company_id),
-                    branch_id=int(branch_id),
                     client_price_list_id=price_list_id,
                     global_margin=_gm,
-                    coupon_code=coupon,
                     cart_subtotal=cart_subtotal_pre_promo,
                 )
         except Exception:
@@ -1413,33 +1444,9 @@ class CartMixin:
                 else self._product_value(product, "is_variant", False)
             )
             if _kprod_id and not _kis_variant:
-                _kit_exists = False
-                try:
-                    from app.utils.tenant import set_tenant_context
-                    set_tenant_context(int(company_id), int(branch_id))
-                    async with get_async_session() as _ksession:
-                        _kit_exists = bool(
-                            (
-                                await _ksession.exec(
-                                    sql_select(ProductKit.id)
-                                    .where(
-                                        ProductKit.kit_product_id == int(_kprod_id),
-                                        ProductKit.company_id == int(company_id),
-                                        ProductKit.branch_id == int(branch_id),
-                                    )
-                                    .limit(1)
-                                )
-                            ).first()
-                        )
-                except Exception:
-                    logging.exception(
-                        "[POS] Error verificando kit (add_item) para producto %s",
-                        _kprod_id,
-                    )
-                    _kit_exists = False
-                finally:
-                    from app.utils.tenant import set_tenant_context
-                    set_tenant_context(None, None)
+                _kit_exists = await self._product_is_kit(
+                    _kprod_id, company_id, branch_id
+                )
                 if _kit_exists:
                     return await self._add_kit_to_cart(product, company_id, branch_id)
 
@@ -1835,157 +1842,255 @@ class CartMixin:
 
         self.cart_coupon_status = "applied"
         self.cart_coupon_message = f"Cupón '{promo.name}' aplicado."
-        await self._recompute_cart_prices()
-        return rx.toast(self.cart_coupon_message, duration=2500)
+        return [
+            rx.toast(self.cart_coupon_message, duration=2500),
+            type(self).bg_recompute_cart_prices,
+        ]
 
     @rx.event
     async def clear_cart_coupon(self):
         """Limpia el cupón aplicado y recompone precios."""
         self.cart_coupon_status = ""
         self.cart_coupon_message = ""
-        await self._recompute_cart_prices()
+        return type(self).bg_recompute_cart_prices
 
     async def _recompute_cart_prices(self):
         """Re-resuelve precio efectivo de cada ítem del carrito tras
-        aplicar/quitar cupón. Llama a ``resolve_effective_price`` para
-        recomponer desde la jerarquía completa (price_list > tier > sale_price)
+        aplicar/quitar cupón. Recompone desde la jerarquía completa
+        (price_list > tier > sale_price) sobre el snapshot cacheado del tenant
         en vez de partir del precio cacheado del item — esto evita acumular
         descuentos cuando el cupón se aplica sobre un ítem que ya tenía promo.
 
-        Hace dos pasadas: la primera computa precios base sin promo para
-        obtener el subtotal pre-promo; la segunda aplica promos pasando ese
-        subtotal como contexto, lo que permite evaluar ``min_cart_amount``
-        coherentemente sobre todo el carrito (no por ítem aislado).
+        Versión inline (con el state lock tomado) para los handlers que
+        necesitan el carrito ya recalculado antes de seguir (agregar/quitar
+        ítems). Cupones usan :meth:`bg_recompute_cart_prices`.
         """
-        from app.models import Product
-        from app.services.pricing import promo_receipt_hint, resolve_effective_price
-        from sqlmodel import select
+        request = self._cart_repricing_request()
+        if request is None:
+            return
+        repriced = await self._reprice_cart_lines(request)
+        self._apply_cart_repricing(repriced)
 
+    @rx.event(background=True)
+    async def bg_recompute_cart_prices(self):
+        """Background: recalcula precios del carrito sin retener el state lock.
+
+        Mismo patrón que ``State.bg_load_suppliers``: lee parámetros con lock →
+        resuelve precios sin lock → aplica resultados con lock. Con carritos
+        grandes el cajero puede seguir operando mientras se recalcula.
+        """
+        async with self:
+            request = self._cart_repricing_request()
+        if request is None:
+            return
+        try:
+            repriced = await self._reprice_cart_lines(request)
+        except Exception:
+            logging.exception("[POS] Error recalculando precios del carrito")
+            return
+        async with self:
+            self._apply_cart_repricing(repriced)
+            self._refresh_payment_feedback()
+
+    def _cart_repricing_request(self) -> dict[str, Any] | None:
+        """Congela lo que el recálculo necesita del state (rápido, sin IO)."""
         company_id = self.current_user.get("company_id") if hasattr(self, "current_user") else None
         branch_id = self._branch_id() if hasattr(self, "_branch_id") else None
-        if not company_id or not self.new_sale_items:
-            return
+        if not company_id or not branch_id or not self.new_sale_items:
+            return None
+        lines = [
+            {
+                "temp_id": item.get("temp_id"),
+                "product_id": item.get("product_id"),
+                "variant_id": item.get("variant_id"),
+                "quantity": item.get("quantity"),
+                "kit_product_id": item.get("kit_product_id"),
+                "price": item.get("price"),
+            }
+            for item in self.new_sale_items
+        ]
+        return {
+            "company_id": int(company_id),
+            "branch_id": int(branch_id),
+            "price_list_id": int(getattr(self, "_active_price_list_id", 0) or 0) or None,
+            "coupon": self.cart_coupon_code if self.cart_coupon_status == "applied" else None,
+            "now": self._display_now().replace(tzinfo=None),
+            "global_margin": float(getattr(self, "effective_profit_margin_decimal", 0.0) or 0.0),
+            "lines": lines,
+        }
+
+    @staticmethod
+    @track_queries()
+    async def _reprice_cart_lines(request: dict[str, Any]) -> dict[str, dict[str, Any]]:
+        """Resuelve precios de todas las líneas; no toca el state.
 
-        client_pl_id = int(getattr(self, "_active_price_list_id", 0) or 0) or None
-        coupon = self.cart_coupon_code if self.cart_coupon_status == "applied" else None
-        local_now = self._display_now().replace(tzinfo=None)
-        _gm = float(getattr(self, "effective_profit_margin_decimal", 0.0) or 0.0)
+        Una query ``IN`` trae todos los productos del carrito; promos, tiers y
+        lista salen del snapshot del tenant. Las dos pasadas corren en memoria:
+        la primera computa precios base sin promo para obtener el subtotal
+        pre-promo; la segunda aplica promos con ese subtotal como contexto,
+        lo que permite evaluar ``min_cart_amount`` sobre todo el carrito.
 
+        Devuelve, por ``temp_id``, el resultado de cada línea re-resuelta.
+        """
+        from app.models import Product
+        from app.services.pricing import (
+            PriceSource,
+            promo_receipt_hint,
+            resolve_base_price_from_snapshot,
+            resolve_effective_price_from_snapshot,
+        )
+        from app.services.pricing_cache import get_cart_pricing_snapshot
+        from app.utils.pricing import resolve_effective_price as _util_price
         from app.utils.tenant import set_tenant_context
-        set_tenant_context(int(company_id), int(branch_id))
-        async with get_async_session() as session:
-            if not _gm:
-                from app.services.sale_service import _get_effective_margin
-                _gm = await _get_effective_margin(session, int(company_id), int(branch_id))
-            # ── Pasada 1: precios base + subtotal pre-promo. ──
-            # Se omite cart_subtotal a propósito (None) para que la pasada 1
-            # NO dispare promos con umbral; solo nos interesa el base_price.
-            base_resolutions: list[tuple[Decimal, Decimal] | None] = []
-            cart_subtotal_pre_promo = Decimal("0.00")
-            for item in self.new_sale_items:
-                # Componente de kit/combo: mantiene su precio de combo (ya
-                # distribuido en _add_kit_to_cart). NO se re-resuelve ni recibe
-                # promos/cupones — un combo ya es el precio con descuento; aplicar
-                # otra promo encima sería doble descuento. Su subtotal igual cuenta
-                # para el total del carrito (y umbrales de otras promos).
-                if item.get("kit_product_id"):
-                    base_resolutions.append(None)
-                    try:
-                        cart_subtotal_pre_promo += (
-                            Decimal(str(item.get("price") or 0))
-                            * Decimal(str(item.get("quantity") or 0))
-                        )
-                    except (ArithmeticError, ValueError, TypeError):
-                        pass
-                    continue
-                product_id = item.get("product_id")
-                if not product_id:
-                    base_resolutions.append(None)
-                    continue
-                product = (
-                    await session.exec(
-                        select(Product)
-                        .where(Product.id == int(product_id))
-                        .where(Product.company_id == company_id)
-                        .where(Product.branch_id == branch_id)
-                    )
-                ).first()
-                if not product:
-                    base_resolutions.append(None)
-                    continue
-                qty = Decimal(str(item.get("quantity") or 0))
-                resolution = await resolve_effective_price(
+
+        company_id = request["company_id"]
+        branch_id = request["branch_id"]
+        client_pl_id = request["price_list_id"]
+        _gm = request["global_margin"]
+        lines = request["lines"]
+        product_ids = {
+            int(line["product_id"])
+            for line in lines
+            if line["product_id"] and not line["kit_product_id"]
+        }
+
+        set_tenant_context(company_id, branch_id)
+        try:
+            async with get_async_session() as session:
+                if not _gm:
+                    from app.services.sale_service import _get_effective_margin
+                    _gm = await _get_effective_margin(session, company_id, branch_id)
+                products_by_id: dict[int, Any] = {}
+                if product_ids:
+                    products_by_id = {
+                        p.id: p
+                        for p in (
+                            await session.exec(
+                                sql_select(Product)
+                                .where(Product.id.in_(product_ids))
+                                .where(Product.company_id == company_id)
+                                .where(Product.branch_id == branch_id)
+                            )
+                        ).all()
+                    }
+                snapshot = await get_cart_pricing_snapshot(
                     session,
-                    product=product,
-                    variant_id=item.get("variant_id"),
-                    quantity=qty,
-                    company_id=int(company_id),
-                    branch_id=int(branch_id),
-                    client_price_list_id=client_pl_id,
-                    global_margin=_gm,
-                    now=local_now,
-                    coupon_code=None,
-                    cart_subtotal=None,
+                    company_id=company_id,
+                    branch_id=branch_id,
+                    price_list_id=client_pl_id,
+                    now=request["now"],
+                    coupon_code=request["coupon"],
                 )
-                base_resolutions.append((qty, resolution.base_price))
-                cart_subtotal_pre_promo += qty * resolution.base_price
-
-            # ── Pasada 2: aplicar promo con cart_subtotal completo. ──
-            for item, prepared in zip(self.new_sale_items, base_resolutions):
-                if prepared is None:
-                    continue
-                qty, base_price = prepared
-                product_id = item.get("product_id")
-                product = (
-                    await session.exec(
-                        select(Product)
-                        .where(Product.id == int(product_id))
-                        .where(Product.company_id == company_id)
-                        .where(Product.branch_id == branch_id)
+        finally:
+            set_tenant_context(None, None)
+
+        # ── Pasada 1: precios base + subtotal pre-promo. ──
+        prepared: list[tuple[dict[str, Any], Any, Decimal, Decimal]] = []
+        cart_subtotal_pre_promo = Decimal("0.00")
+        for line in lines:
+            # Componente de kit/combo: mantiene su precio de combo (ya
+            # distribuido en _add_kit_to_cart). NO se re-resuelve ni recibe
+            # promos/cupones — un combo ya es el precio con descuento; aplicar
+            # otra promo encima sería doble descuento. Su subtotal igual cuenta
+            # para el total del carrito (y umbrales de otras promos).
+            if line["kit_product_id"]:
+                try:
+                    cart_subtotal_pre_promo += (
+                        Decimal(str(line["price"] or 0))
+                        * Decimal(str(line["quantity"] or 0))
                     )
-                ).first()
-                if not product:
-                    continue
-                resolution = await resolve_effective_price(
-                    session,
-                    product=product,
-                    variant_id=item.get("variant_id"),
-                    quantity=qty,
-                    company_id=int(company_id),
-                    branch_id=int(branch_id),
-                    client_price_list_id=client_pl_id,
-                    global_margin=_gm,
-                    now=local_now,
-                    coupon_code=coupon,
-                    cart_subtotal=cart_subtotal_pre_promo,
-                )
-                effective = Decimal(str(resolution.final_price))
-                quot_price = item.get("quotation_price")
-                if quot_price:
-                    quot_dec = Decimal(str(quot_price))
-                    if quot_dec < effective:
-                        effective = quot_dec
-                item["price"] = round(float(effective), 4)
-                item["sale_price"] = fmt_price(self._round_currency(effective))
-                item["base_price"] = fmt_price(self._round_currency(resolution.base_price))
-                item["subtotal"] = fmt_price(self._round_currency(qty * effective))
-                applied_promo = resolution.applied_promotion
-                item["promotion_name"] = applied_promo.name if applied_promo else ""
-                item["applied_promotion_id"] = applied_promo.id if applied_promo else None
-                item["promo_receipt_hint"] = promo_receipt_hint(applied_promo) if applied_promo else None
-                from app.services.pricing import PriceSource
-                from app.utils.pricing import resolve_effective_price as _util_price
-                if resolution.source == PriceSource.PRICE_LIST:
-                    pl_name = ((getattr(self, "selected_client", None) or {}).get("price_list_name", "") or "")
-                    item["price_list_name"] = pl_name
-                    item["original_price"] = fmt_price(self._round_currency(float(_util_price(product, None, _gm))))
-                    if not applied_promo:
-                        item["promo_receipt_hint"] = f"Lista {pl_name}" if pl_name else "Lista"
-                else:
-                    item["price_list_name"] = ""
-                    item["original_price"] = fmt_price(self._round_currency(float(resolution.base_price)))
-                if not applied_promo and quot_price:
-                    quot_dec = Decimal(str(quot_price))
-                    if quot_dec < Decimal(str(resolution.base_price)):
-                        item["promotion_name"] = "Desc. presupuesto"
+                except (ArithmeticError, ValueError, TypeError):
+                    pass
+                continue
+            product = products_by_id.get(int(line["product_id"] or 0))
+            if product is None:
+                continue
+            qty = Decimal(str(line["quantity"] or 0))
+            base_price, _source = resolve_base_price_from_snapshot(
+                snapshot,
+                product=product,
+                variant_id=line["variant_id"],
+                quantity=qty,
+                client_price_list_id=client_pl_id,
+                global_margin=_gm,
+            )
+            prepared.append((line, product, qty, base_price))
+            cart_subtotal_pre_promo += qty * base_price
+
+        # ── Pasada 2: aplicar promo con cart_subtotal completo. ──
+        repriced: dict[str, dict[str, Any]] = {}
+        for line, product, qty, _base in prepared:
+            resolution = resolve_effective_price_from_snapshot(
+                snapshot,
+                product=product,
+                variant_id=line["variant_id"],
+                quantity=qty,
+                client_price_list_id=client_pl_id,
+                global_margin=_gm,
+                cart_subtotal=cart_subtotal_pre_promo,
+            )
+            applied_promo = resolution.applied_promotion
+            from_list = resolution.source == PriceSource.PRICE_LIST
+            repriced[line["temp_id"]] = {
+                "product_id": line["product_id"],
+                "quantity": line["quantity"],
+                "final_price": Decimal(str(resolution.final_price)),
+                "base_price": Decimal(str(resolution.base_price)),
+                "from_price_list": from_list,
+                "original_price": (
+                    Decimal(str(_util_price(product, None, _gm)))
+                    if from_list
+                    else Decimal(str(resolution.base_price))
+                ),
+                "promotion_name": applied_promo.name if applied_promo else "",
+                "applied_promotion_id": applied_promo.id if applied_promo else None,
+                "promo_receipt_hint": (
+                    promo_receipt_hint(applied_promo) if applied_promo else None
+                ),
+            }
+        return repriced
+
+    def _apply_cart_repricing(self, repriced: dict[str, dict[str, Any]]) -> None:
+        """Vuelca los precios resueltos en ``new_sale_items``.
+
+        Una línea cuyo producto o cantidad cambió mientras se resolvía (modo
+        background) se deja como está: esa edición ya disparó su propio recálculo.
+        """
+        pl_name = ((getattr(self, "selected_client", None) or {}).get("price_list_name", "") or "")
+        for item in self.new_sale_items:
+            result = repriced.get(item.get("temp_id"))
+            if result is None:
+                continue
+            if (
+                item.get("product_id") != result["product_id"]
+                or item.get("quantity") != result["quantity"]
+            ):
+                continue
+            qty = Decimal(str(item.get("quantity") or 0))
+            effective = result["final_price"]
+            quot_price = item.get("quotation_price")
+            if quot_price:
+                quot_dec = Decimal(str(quot_price))
+                if quot_dec < effective:
+                    effective = quot_dec
+            item["price"] = round(float(effective), 4)
+            item["sale_price"] = fmt_price(self._round_currency(effective))
+            item["base_price"] = fmt_price(self._round_currency(result["base_price"]))
+            item["subtotal"] = fmt_price(self._round_currency(qty * effective))
+            item["promotion_name"] = result["promotion_name"]
+            item["applied_promotion_id"] = result["applied_promotion_id"]
+            item["promo_receipt_hint"] = result["promo_receipt_hint"]
+            item["original_price"] = fmt_price(
+                self._round_currency(float(result["original_price"]))
+            )
+            if result["from_price_list"]:
+                item["price_list_name"] = pl_name
+                if not result["applied_promotion_id"]:
+                    item["promo_receipt_hint"] = f"Lista {pl_name}" if pl_name else "Lista"
+            else:
+                item["price_list_name"] = ""
+            if not result["applied_promotion_id"] and quot_price:
+                quot_dec = Decimal(str(quot_price))
+                if quot_dec < result["base_price"]:
+                    item["promotion_name"] = "Desc. presupuesto"
         self.new_sale_items = list(self.new_sale_items)
@@ -26,6 +26,7 @@ Flujo típico:
 import asyncio
 import json
 import reflex as rx
+import time
 import uuid
 from datetime import datetime, timezone
 from decimal import Decimal
@@ -43,6 +44,15 @@ from app.schemas.sale_schemas import PaymentInfoDTO, SaleItemDTO
 from app.enums import ReceiptType
 from app.models.billing import CompanyBillingConfig
 from app.services.billing_service import emit_fiscal_document
+from app.services.fiscal_queue import (
+    FISCAL_QUEUE_ENABLED,
+    STATUS_DONE,
+    STATUS_FAILED,
+    FiscalJobStatus,
+    enqueue_fiscal_emission,
+    get_fiscal_job_status,
+    wait_fiscal_job_update,
+)
 from app.services.document_lookup_service import (
     determine_ar_cbte_tipo,
     get_cache_ttl,
@@ -51,6 +61,7 @@ from app.services.document_lookup_service import (
 from app.models.lookup_cache import DocumentLookupCache
 from app.services.sale_service import SaleService, StockError
 from app.i18n import MSG
+from app.utils.async_rate_limit import rate_limited
 from app.utils.db import get_async_session
 from app.utils.logger import get_logger
 from app.utils.sanitization import escape_like
@@ -62,6 +73,13 @@ from .venta import CartMixin, PaymentMixin, ReceiptMixin, RecentMovesMixin
 
 logger = get_logger("VentaState")
 
+# Seguimiento del job de emisión de la última venta (modal del recibo).
+FISCAL_STATUS_POLL_SECONDS = 1.5
+FISCAL_STATUS_WATCH_SECONDS = 300.0
+# Consultas RUC/CUIT/DNI por usuario: cada una puede pegarle a la API externa.
+DOC_LOOKUP_RATE_LIMIT = 30
+DOC_LOOKUP_RATE_WINDOW_SECONDS = 60
+
 
 class VentaState(MixinState, CartMixin, PaymentMixin, ReceiptMixin, RecentMovesMixin):
     """Estado principal de la pantalla de ventas.
@@ -102,6 +120,25 @@ class VentaState(MixinState, CartMixin, PaymentMixin, ReceiptMixin, RecentMovesM
     fiscal_lookup_error: str = ""
     fiscal_ar_cbte_letra: str = ""  # "A", "B", "C" — auto-determinado
 
+    # ── Emisión fiscal de la última venta (cola) ───────────────
+    last_fiscal_job_id: int = 0
+    # queued | running | retrying | authorized | rejected | failed | ""
+    last_fiscal_status: str = ""
+    last_fiscal_number: str = ""
+
+    @rx.var(cache=True)
+    def last_fiscal_status_label(self) -> str:
+        labels = {
+            "queued": MSG.FISCAL_QUEUE_QUEUED,
+            "running": MSG.FISCAL_QUEUE_RUNNING,
+            "retrying": MSG.FISCAL_QUEUE_RETRYING,
+            "authorized": MSG.FISCAL_QUEUE_AUTHORIZED,
+            "rejected": MSG.FISCAL_QUEUE_REJECTED,
+            "failed": MSG.FISCAL_QUEUE_FAILED,
+        }
+        label = labels.get(self.last_fiscal_status, "")
+        return label.format(full_number=self.last_fiscal_number or "")
+
     @rx.var(cache=True)
     def has_selected_client(self) -> bool:
         return self.selected_client is not None
@@ -247,6 +284,11 @@ class VentaState(MixinState, CartMixin, PaymentMixin, ReceiptMixin, RecentMovesM
             self._clear_fiscal_lookup()
 
     @rx.event
+    @rate_limited(
+        "doc_lookup",
+        limit=DOC_LOOKUP_RATE_LIMIT,
+        window_seconds=DOC_LOOKUP_RATE_WINDOW_SECONDS,
+    )
     async def lookup_fiscal_document(self, doc_number: str):
         """Consulta RUC/CUIT/DNI en la API fiscal correspondiente.
 
@@ -776,21 +818,43 @@ class VentaState(MixinState, CartMixin, PaymentMixin, ReceiptMixin, RecentMovesM
 
             self.add_notification(MSG.SALE_CONFIRMED, "success")
 
-            # ── Fiscal document emission (fire-and-forget background) ──
+            # ── Fiscal document emission (cola de emisión) ──
             # Solo emitir si el tipo de comprobante NO es nota_venta (ticket
             # interno). Las notas de venta no requieren emisión fiscal.
+            # La venta ya está commiteada: se encola y el modal muestra el
+            # estado a medida que el worker avanza (watch_fiscal_emission).
+            self.last_fiscal_job_id = 0
+            self.last_fiscal_status = ""
+            self.last_fiscal_number = ""
             if receipt_type and receipt_type != ReceiptType.nota_venta:
-                asyncio.create_task(
-                    self._fire_fiscal_emission(
-                        fiscal_sale_id,
-                        fiscal_company_id or 0,
-                        fiscal_branch_id or 0,
-                        receipt_type,
-                        buyer_doc_type,
-                        buyer_doc_number,
-                        buyer_name,
-                    )
+                fiscal_args = (
+                    fiscal_sale_id,
+                    fiscal_company_id or 0,
+                    fiscal_branch_id or 0,
+                    receipt_type,
+                    buyer_doc_type,
+                    buyer_doc_number,
+                    buyer_name,
                 )
+                fiscal_job = None
+                if FISCAL_QUEUE_ENABLED:
+                    try:
+                        fiscal_job = await enqueue_fiscal_emission(*fiscal_args)
+                    except Exception as exc:
+                        # Sin cola (BD/migración): no perder la emisión.
+                        logger.exception(
+                            "No se pudo encolar la emisión fiscal | sale_id=%s: %s",
+                            fiscal_sale_id,
+                            exc,
+                        )
+                        asyncio.create_task(self._fire_fiscal_emission(*fiscal_args))
+                    else:
+                        if fiscal_job is not None:
+                            self.last_fiscal_job_id = fiscal_job.id
+                            self._apply_fiscal_job_status(fiscal_job)
+                            yield type(self).watch_fiscal_emission(fiscal_job.id)
+                else:
+                    asyncio.create_task(self._fire_fiscal_emission(*fiscal_args))
             return
         finally:
             self.is_processing_sale = False
@@ -875,6 +939,52 @@ class VentaState(MixinState, CartMixin, PaymentMixin, ReceiptMixin, RecentMovesM
             doc_type = "0"
         return doc_type, dni, name or None
 
+    def _apply_fiscal_job_status(self, job: FiscalJobStatus) -> None:
+        if job.status == STATUS_FAILED:
+            status = "failed"
+        elif job.status == STATUS_DONE:
+            # Sin fiscal_status: billing se desactivó antes de emitir.
+            status = job.fiscal_status
+        elif job.fiscal_status:
+            # Volvió a la cola tras un intento con error.
+            status = "retrying"
+        else:
+            status = job.status
+        self.last_fiscal_status = status
+        self.last_fiscal_number = job.full_number
+
+    @rx.event(background=True)
+    async def watch_fiscal_emission(self, job_id: int):
+        """Sigue el job de emisión de la última venta hasta su estado final.
+
+        Se corta si otra venta reemplaza al job del modal o pasados
+        ``FISCAL_STATUS_WATCH_SECONDS`` (el job sigue en la cola igual). Un
+        rechazo con el modal ya cerrado se avisa como notificación.
+        """
+        deadline = time.monotonic() + FISCAL_STATUS_WATCH_SECONDS
+        while time.monotonic() < deadline:
+            await wait_fiscal_job_update(job_id, FISCAL_STATUS_POLL_SECONDS)
+            try:
+                job = await get_fiscal_job_status(job_id)
+            except Exception as exc:
+                logger.debug("Estado del job fiscal %s no disponible: %s", job_id, exc)
+                continue
+            if job is None:
+                return
+            async with self:
+                if self.last_fiscal_job_id != job_id:
+                    return
+                self._apply_fiscal_job_status(job)
+                if (
+                    job.finished
+                    and self.last_fiscal_status in ("rejected", "failed")
+                    and not self.show_sale_receipt_modal
+                ):
+                    # El modal ya se cerró: avisar igual al cajero.
+                    self.add_notification(self.last_fiscal_status_label, "warning")
+            if job.finished:
+                return
+
     async def _fire_fiscal_emission(
         self,
         sale_id: int,
@@ -887,7 +997,8 @@ class VentaState(MixinState, CartMixin, PaymentMixin, ReceiptMixin, RecentMovesM
     ):
         """Emite el documento fiscal de forma fire-and-forget.
 
-        Se invoca via ``asyncio.create_task`` desde ``confirm_sale``
+        Camino sin cola (``FISCAL_QUEUE_ENABLED=0`` o si no se pudo encolar):
+        se invoca via ``asyncio.create_task`` desde ``confirm_sale``
         para no bloquear la UI (fire-and-forget sin mutar State). Si billing no está configurado, retorna
         silenciosamente. Si falla, el FiscalDocument queda en estado
         ``error`` para reintento manual posterior.
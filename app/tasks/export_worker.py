@@ -0,0 +1,87 @@
+"""Worker dedicado de exportaciones XLSX (cola ``export:queue`` en Redis).
+
+Por defecto cada réplica del app procesa los exports que encola con un pool
+de procesos embebido. Para sacar ese CPU del contenedor web:
+
+    1. ``EXPORT_JOBS_EMBEDDED=0`` en las réplicas web (sólo encolan).
+    2. Montar ``EXPORT_JOBS_DIR`` como volumen compartido en réplicas y
+       workers, con ``EXPORT_JOBS_SHARED_DIR=1`` en todos.
+    3. Levantar uno o más workers con el mismo ``REDIS_URL``:
+       python -m app.tasks.export_worker --workers 4
+
+Diseño:
+    - Saca un job de la cola sólo cuando tiene un proceso libre; el resto
+      queda en Redis para otros workers.
+    - Cada job corre en un proceso (spawn) del ``ProcessPoolExecutor``: un
+      crash o un OOM marca el job como fallido y se recrea el pool.
+    - Limpia cada minuto payloads y resultados más viejos que
+      ``EXPORT_JOB_TTL_SECONDS``.
+    - Sin Redis o sin ``EXPORT_JOBS_SHARED_DIR=1`` no hay cola compartida: el
+      worker no tiene qué procesar y sale con código 1.
+"""
+from __future__ import annotations
+
+import os
+import signal
+import sys
+
+# Asegurar que el directorio raíz del proyecto está en el path
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if _PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, _PROJECT_ROOT)
+
+from dotenv import load_dotenv
+
+load_dotenv(os.path.join(_PROJECT_ROOT, ".env"))
+
+# Import por efecto secundario: rxconfig arma REDIS_URL desde REDIS_HOST/PASSWORD
+# y lo deja en os.environ antes de que export_jobs lea la configuración.
+import rxconfig  # noqa: F401,E402 — side-effect
+
+from app.services.export_jobs import (  # noqa: E402
+    EXPORT_JOB_WORKERS,
+    EXPORT_JOBS_DIR,
+    ExportDispatcher,
+    export_queue_backend,
+)
+from app.utils.logger import get_logger  # noqa: E402
+
+logger = get_logger("ExportWorker")
+
+
+def main(workers: int = EXPORT_JOB_WORKERS) -> int:
+    if export_queue_backend() != "redis":
+        logger.error(
+            "ExportWorker requiere REDIS_URL (o REDIS_HOST + REDIS_PASSWORD) y "
+            "EXPORT_JOBS_SHARED_DIR=1 con EXPORT_JOBS_DIR en un volumen compartido."
+        )
+        return 1
+
+    dispatcher = ExportDispatcher(max_workers=workers)
+
+    def _shutdown(signum, _frame):
+        logger.info("Señal %s recibida: terminando jobs en curso…", signum)
+        dispatcher.stop(wait=False)
+
+    signal.signal(signal.SIGTERM, _shutdown)
+    signal.signal(signal.SIGINT, _shutdown)
+
+    logger.info("=== ExportWorker iniciado | workers=%d | dir=%s ===", workers, EXPORT_JOBS_DIR)
+    dispatcher.serve_forever()
+    dispatcher.stop(wait=True)
+    logger.info("=== ExportWorker detenido ===")
+    return 0
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Worker de exportaciones TUWAYKIAPP")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=EXPORT_JOB_WORKERS,
+        help=f"Procesos del pool (default: {EXPORT_JOB_WORKERS})",
+    )
+    args = parser.parse_args()
+    sys.exit(main(max(1, args.workers)))
@@ -12,9 +12,14 @@ Este módulo puede ejecutarse:
 Diseño:
     - Busca todos los FiscalDocument con status in (error, pending)
       y retry_count < MAX_RETRY_ATTEMPTS, agrupados por company_id.
+    - Omite los documentos con un job activo en la cola de emisión
+      (app.services.fiscal_queue): este worker barre lo que la cola
+      dio por perdido y lo emitido antes de que existiera.
     - Para cada documento llama retry_fiscal_document().
     - Respeta backoff exponencial entre intentos: espera 2^retry_count segundos
       antes de cada reintento (máx. 60s).
+    - Con numeración por bloques (app.services.fiscal_numbering) reconcilia
+      los bloques de correlativos abandonados antes de reintentar.
     - Registra resultados en el logger estándar (ver app.utils.logger).
     - Idempotente: se puede ejecutar múltiples veces sin riesgo de duplicados.
 
@@ -38,11 +43,14 @@ _PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(
 if _PROJECT_ROOT not in sys.path:
     sys.path.insert(0, _PROJECT_ROOT)
 
+from sqlalchemy import exists
 from sqlmodel import select
 
 from app.enums import FiscalStatus
-from app.models.billing import FiscalDocument
+from app.models.billing import FiscalDocument, FiscalEmissionJob
 from app.services.billing_service import retry_fiscal_document, MAX_RETRY_ATTEMPTS
+from app.services.fiscal_numbering import FISCAL_NUMBER_BLOCK_SIZE, reconcile_number_blocks
+from app.services.fiscal_queue import STATUS_QUEUED, STATUS_RUNNING
 from app.utils.db import get_async_session
 from app.utils.logger import get_logger
 from app.utils.tenant import tenant_context
@@ -65,13 +73,15 @@ async def run_auto_retry(dry_run: bool = False) -> dict:
                  sin ejecutar la llamada al servicio fiscal.
 
     Returns:
-        Diccionario con estadísticas: processed, authorized, still_error, skipped.
+        Diccionario con estadísticas: processed, authorized, still_error,
+        skipped, blocks_reconciled.
     """
     stats = {
         "processed": 0,
         "authorized": 0,
         "still_error": 0,
         "skipped": 0,
+        "blocks_reconciled": 0,
         "crashed": False,
         "dry_run": dry_run,
     }
@@ -102,6 +112,13 @@ async def run_auto_retry(dry_run: bool = False) -> dict:
         logger.warning("Lock Redis no disponible: %s — continuando sin lock", str(_lock_err)[:80])
 
     try:
+        if FISCAL_NUMBER_BLOCK_SIZE > 1 and not dry_run:
+            try:
+                reconciled = await reconcile_number_blocks()
+                stats["blocks_reconciled"] = reconciled["blocks"]
+            except Exception as exc:
+                logger.error("Error reconciliando bloques de numeración: %s", exc, exc_info=True)
+
         async with get_async_session() as session:
             docs_stmt = (
                 select(FiscalDocument)
@@ -111,6 +128,17 @@ async def run_auto_retry(dry_run: bool = False) -> dict:
                     )
                 )
                 .where(FiscalDocument.retry_count < MAX_RETRY_ATTEMPTS)
+                # Los que siguen en la cola de emisión los reintenta su worker.
+                # Se busca el job por venta: ``fiscal_document_id`` recién se
+                # llena al terminar el primer intento, y durante ese intento
+                # el documento ya existe en pending.
+                .where(
+                    ~exists().where(
+                        FiscalEmissionJob.company_id == FiscalDocument.company_id,
+                        FiscalEmissionJob.sale_id == FiscalDocument.sale_id,
+                        FiscalEmissionJob.status.in_([STATUS_QUEUED, STATUS_RUNNING]),
+                    )
+                )
                 .order_by(FiscalDocument.created_at.asc())  # type: ignore[union-attr]
                 .limit(_BATCH_LIMIT)
             )
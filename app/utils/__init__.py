@@ -28,6 +28,8 @@ from app.utils.performance import (
     query_timer,
     timed_operation,
     QueryStats,
+    query_unit,
+    track_queries,
 )
 
 __all__ = [
@@ -51,4 +53,6 @@ __all__ = [
     "query_timer",
     "timed_operation",
     "QueryStats",
+    "query_unit",
+    "track_queries",
 ]
@@ -0,0 +1,445 @@
+"""Rate limiting async con ventana deslizante atómica en Redis.
+
+Reemplaza, para los handlers async, el esquema de :mod:`app.utils.rate_limit`
+(cliente ``redis`` síncrono con ``socket_timeout=2`` y contadores INCR): un
+Redis lento frenaba el event loop entero hasta 2 s por llamada.
+
+* **Una ida y vuelta por chequeo**: un script Lua evalúa y (si corresponde)
+  registra todas las claves del chequeo — p. ej. usuario+IP e IP sola — de
+  forma atómica, con la hora del servidor Redis (sin desfase entre réplicas).
+  Cada clave es un ZSET de timestamps: ventana deslizante real, no fija.
+* **Cache local de "no limitado"** (``RATE_LIMIT_LOCAL_TTL_SECONDS``, 1 s por
+  defecto): un :func:`check_limits` permitido se recuerda por clave durante
+  ese lapso; :func:`add_hits` y :func:`reset_limits` lo invalidan.
+* **Decorador** :func:`rate_limited` para throttlear handlers costosos
+  (consulta de documentos, exports, acciones del owner).
+
+Mismas reglas de backend que :mod:`app.utils.rate_limit`: en producción sin
+Redis se falla cerrado salvo ``ALLOW_MEMORY_RATE_LIMIT_FALLBACK``; en
+desarrollo se usa una ventana en memoria por proceso.
+
+Uso::
+
+    from app.utils.async_rate_limit import Limit, hit_limits
+
+    result = await hit_limits(Limit(f"lookup:{user_id}", 30, 60))
+    if not result.allowed:
+        ...  # result.retry_after en segundos
+"""
+from __future__ import annotations
+
+import functools
+import inspect
+import logging
+import os
+import time
+import uuid
+import weakref
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Sequence
+
+from app.constants import LOGIN_LOCKOUT_MINUTES, MAX_LOGIN_ATTEMPTS
+from app.utils.rate_limit import (
+    _allow_memory_fallback_in_prod,
+    _build_key,
+    _normalize_ip,
+    _strict_rate_limit_backend,
+)
+from app.utils.redis_client import SharedRedis
+
+logger = logging.getLogger("RateLimit")
+
+RATE_LIMIT_LOCAL_TTL_SECONDS = max(
+    0.0, float(os.getenv("RATE_LIMIT_LOCAL_TTL_SECONDS", "1.0"))
+)
+# Fallos de login tolerados por IP sumando todos los usuarios (credential
+# stuffing); el límite por usuario+IP sigue siendo MAX_LOGIN_ATTEMPTS.
+LOGIN_MAX_ATTEMPTS_PER_IP = max(
+    1, int(os.getenv("LOGIN_MAX_ATTEMPTS_PER_IP", str(MAX_LOGIN_ATTEMPTS * 4)))
+)
+_KEY_PREFIX = "rl:"
+_REDIS_RETRY_SECONDS = 10.0
+_MEMORY_MAX_KEYS = 5000
+
+# Modo: "check" = sólo evalúa; "hit" = evalúa y registra si se permite;
+# "add" = registra siempre. Devuelve ms hasta que se libere un cupo (0 = ok).
+_SLIDING_WINDOW_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local mode = ARGV[1]
+local member = ARGV[2]
+local retry = 0
+for i, key in ipairs(KEYS) do
+  local limit = tonumber(ARGV[1 + i * 2])
+  local window = tonumber(ARGV[2 + i * 2])
+  redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+  if mode ~= 'add' and redis.call('ZCARD', key) >= limit then
+    local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+    local wait = window
+    if oldest[2] then wait = tonumber(oldest[2]) + window - now end
+    if wait < 1 then wait = 1 end
+    if wait > retry then retry = wait end
+  end
+end
+if mode == 'check' or retry > 0 then
+  return retry
+end
+for i, key in ipairs(KEYS) do
+  redis.call('ZADD', key, now, member)
+  redis.call('PEXPIRE', key, tonumber(ARGV[2 + i * 2]))
+end
+return 0
+"""
+
+
+@dataclass(frozen=True)
+class Limit:
+    """Cupo de ``limit`` eventos por ``window_seconds`` para ``key``."""
+
+    key: str
+    limit: int
+    window_seconds: float
+
+
+@dataclass(frozen=True)
+class RateLimitResult:
+    allowed: bool
+    retry_after: float = 0.0  # segundos hasta que se libere un cupo
+
+
+_ALLOWED = RateLimitResult(True)
+
+_redis = SharedRedis(
+    "rate limit",
+    timeout=2,
+    retry_seconds=_REDIS_RETRY_SECONDS,
+    logger=logger,
+    log_level=logging.ERROR,
+)
+# Script Lua registrado por cliente (hay un cliente por event loop).
+_scripts: "weakref.WeakKeyDictionary[Any, Any]" = weakref.WeakKeyDictionary()
+_not_limited_until: dict[str, float] = {}
+_memory_windows: "OrderedDict[str, deque[float]]" = OrderedDict()
+_stats = {"redis_calls": 0, "local_hits": 0, "limited": 0, "redis_errors": 0}
+
+
+def _get_redis():
+    """Cliente ``redis.asyncio`` del loop actual, o None si no hay backend."""
+    if not _redis.configured():
+        if _strict_rate_limit_backend():
+            logger.critical(
+                "Redis requerido en producción para rate limiting distribuido."
+            )
+        return None
+    return _redis.async_client()
+
+
+def _script_for(client):
+    script = _scripts.get(client)
+    if script is None:
+        script = _scripts[client] = client.register_script(_SLIDING_WINDOW_LUA)
+    return script
+
+
+def _redis_failed(exc: Exception) -> None:
+    _redis.failed(exc)
+    _stats["redis_errors"] += 1
+
+
+def _memory_eval(mode: str, limits: Sequence[Limit]) -> float:
+    """Misma semántica que el script Lua, en memoria del proceso (desarrollo)."""
+    now = time.monotonic()
+    retry = 0.0
+    windows = []
+    for item in limits:
+        window = _memory_windows.get(item.key)
+        if window is None:
+            window = _memory_windows[item.key] = deque()
+            if len(_memory_windows) > _MEMORY_MAX_KEYS:
+                _memory_windows.popitem(last=False)
+        else:
+            _memory_windows.move_to_end(item.key)
+        cutoff = now - item.window_seconds
+        while window and window[0] <= cutoff:
+            window.popleft()
+        if mode != "add" and len(window) >= item.limit:
+            retry = max(retry, window[0] + item.window_seconds - now, 0.001)
+        windows.append(window)
+    if mode == "check" or retry > 0:
+        return retry
+    for window in windows:
+        window.append(now)
+    return 0.0
+
+
+async def _evaluate(mode: str, limits: Sequence[Limit]) -> RateLimitResult:
+    if not limits:
+        return _ALLOWED
+    client = _get_redis()
+    if client is None and _strict_rate_limit_backend():
+        # Fail-closed: en producción no se permite backend en memoria.
+        return RateLimitResult(False, float(max(i.window_seconds for i in limits)))
+
+    retry = None
+    if client is not None:
+        script = _script_for(client)
+        args: list[Any] = [mode, f"{time.time_ns()}-{uuid.uuid4().hex[:8]}"]
+        for item in limits:
+            args.extend((int(item.limit), max(1, int(item.window_seconds * 1000))))
+        try:
+            _stats["redis_calls"] += 1
+            retry_ms = await script(
+                keys=[_KEY_PREFIX + item.key for item in limits], args=args
+            )
+            retry = int(retry_ms or 0) / 1000.0
+        except Exception as exc:
+            _redis_failed(exc)
+            if _strict_rate_limit_backend():
+                return RateLimitResult(
+                    False, float(max(i.window_seconds for i in limits))
+                )
+    if retry is None:
+        retry = _memory_eval(mode, limits)
+
+    if retry > 0:
+        _stats["limited"] += 1
+        return RateLimitResult(False, retry)
+    return _ALLOWED
+
+
+async def check_limits(*limits: Limit) -> RateLimitResult:
+    """¿Alguna clave agotó su cupo? No registra nada.
+
+    Un resultado permitido se cachea localmente por clave durante
+    ``RATE_LIMIT_LOCAL_TTL_SECONDS``; los bloqueos nunca se cachean.
+    """
+    now = time.monotonic()
+    if RATE_LIMIT_LOCAL_TTL_SECONDS > 0 and limits and all(
+        _not_limited_until.get(item.key, 0.0) > now for item in limits
+    ):
+        _stats["local_hits"] += 1
+        return _ALLOWED
+    result = await _evaluate("check", limits)
+    if result.allowed and RATE_LIMIT_LOCAL_TTL_SECONDS > 0:
+        until = now + RATE_LIMIT_LOCAL_TTL_SECONDS
+        for item in limits:
+            _not_limited_until[item.key] = until
+        if len(_not_limited_until) > _MEMORY_MAX_KEYS:
+            _purge_local_cache(now)
+    return result
+
+
+async def hit_limits(*limits: Limit) -> RateLimitResult:
+    """Chequea y, si todas las claves tienen cupo, consume uno en cada una."""
+    _forget_local(item.key for item in limits)
+    return await _evaluate("hit", limits)
+
+
+async def add_hits(*limits: Limit) -> None:
+    """Registra un evento en cada clave sin chequear (p. ej. login fallido)."""
+    _forget_local(item.key for item in limits)
+    await _evaluate("add", limits)
+
+
+async def reset_limits(*keys: str) -> None:
+    """Vacía las ventanas de ``keys`` (p. ej. tras un login exitoso)."""
+    if not keys:
+        return
+    _forget_local(keys)
+    for key in keys:
+        _memory_windows.pop(key, None)
+    client = _get_redis()
+    if client is None:
+        return
+    try:
+        _stats["redis_calls"] += 1
+        await client.delete(*(_KEY_PREFIX + key for key in keys))
+    except Exception as exc:
+        _redis_failed(exc)
+
+
+def _forget_local(keys: Iterable[str]) -> None:
+    for key in keys:
+        _not_limited_until.pop(key, None)
+
+
+def _purge_local_cache(now: float) -> None:
+    for key in [k for k, until in _not_limited_until.items() if until <= now]:
+        _not_limited_until.pop(key, None)
+
+
+# =============================================================================
+# LOGIN (usuario+IP e IP sola en un mismo chequeo)
+# =============================================================================
+
+
+def _login_limits(
+    username: str,
+    ip_address: str | None,
+    max_attempts: int,
+    window_minutes: int,
+) -> list[Limit]:
+    key = _build_key(username, ip_address)
+    if not key:
+        return []
+    window = window_minutes * 60
+    limits = [Limit(f"login:{key}", max_attempts, window)]
+    ip = _normalize_ip(ip_address)
+    if ip:
+        limits.append(Limit(f"login_ip:{ip}", LOGIN_MAX_ATTEMPTS_PER_IP, window))
+    return limits
+
+
+async def is_rate_limited_async(
+    username: str,
+    max_attempts: int = MAX_LOGIN_ATTEMPTS,
+    window_minutes: int = LOGIN_LOCKOUT_MINUTES,
+    ip_address: str | None = None,
+) -> bool:
+    """Equivalente async de :func:`app.utils.rate_limit.is_rate_limited`."""
+    limits = _login_limits(username, ip_address, max_attempts, window_minutes)
+    if not limits:
+        # Fail-closed: sin identificador válido, bloquear por seguridad.
+        logger.warning("is_rate_limited llamado con username vacío — bloqueando por seguridad.")
+        return True
+    return not (await check_limits(*limits)).allowed
+
+
+async def record_failed_attempt_async(
+    username: str,
+    window_minutes: int = LOGIN_LOCKOUT_MINUTES,
+    ip_address: str | None = None,
+) -> None:
+    """Equivalente async de :func:`app.utils.rate_limit.record_failed_attempt`."""
+    limits = _login_limits(username, ip_address, MAX_LOGIN_ATTEMPTS, window_minutes)
+    await add_hits(*limits)
+
+
+async def clear_login_attempts_async(
+    username: str, ip_address: str | None = None
+) -> None:
+    """Limpia los fallos de usuario+IP. El contador por IP sigue su ventana."""
+    limits = _login_limits(
+        username, ip_address, MAX_LOGIN_ATTEMPTS, LOGIN_LOCKOUT_MINUTES
+    )
+    if limits:
+        await reset_limits(limits[0].key)
+
+
+async def remaining_lockout_time_async(
+    username: str,
+    window_minutes: int = LOGIN_LOCKOUT_MINUTES,
+    ip_address: str | None = None,
+    max_attempts: int = MAX_LOGIN_ATTEMPTS,
+) -> int:
+    """Minutos (redondeados hacia arriba) hasta poder reintentar; 0 si no hay bloqueo."""
+    limits = _login_limits(username, ip_address, max_attempts, window_minutes)
+    if not limits:
+        return 0
+    result = await _evaluate("check", limits)
+    if result.allowed:
+        return 0
+    return max(1, int((result.retry_after + 59) // 60))
+
+
+# =============================================================================
+# DECORADOR PARA HANDLERS
+# =============================================================================
+
+
+def _default_actor(state: Any, *args: Any, **kwargs: Any) -> str | None:
+    user = getattr(state, "current_user", None) or {}
+    user_id = user.get("id") if isinstance(user, dict) else None
+    return str(user_id) if user_id else None
+
+
+def rate_limited(
+    bucket: str,
+    *,
+    limit: int,
+    window_seconds: float,
+    key: Callable[..., str | Sequence[str] | None] = _default_actor,
+    on_limited: Callable[[RateLimitResult], Any] | None = None,
+):
+    """Throttlea un handler async (o async generator) de un state.
+
+    ``key(self, *args, **kwargs)`` devuelve la identidad a limitar (una o
+    varias; por defecto el id del usuario logueado). Si no hay identidad el
+    handler corre sin límite. Al exceder el cupo no se ejecuta el handler y
+    se devuelve ``on_limited(result)`` — por defecto un toast con la espera.
+    Va debajo de ``@rx.event``::
+
+        @rx.event
+        @rate_limited("doc_lookup", limit=30, window_seconds=60)
+        async def lookup_fiscal_document(self, doc_number: str): ...
+    """
+
+    def _limits(state: Any, args: tuple, kwargs: dict) -> list[Limit]:
+        identities = key(state, *args, **kwargs)
+        if not identities:
+            return []
+        if isinstance(identities, str):
+            identities = [identities]
+        return [
+            Limit(f"{bucket}:{identity}", limit, window_seconds)
+            for identity in identities
+            if identity
+        ]
+
+    def _rejected(result: RateLimitResult) -> Any:
+        if on_limited is not None:
+            return on_limited(result)
+        import reflex as rx
+
+        from app.i18n import MSG
+
+        seconds = max(1, int(result.retry_after + 0.999))
+        return rx.toast(MSG.PERM_RATE_LIMITED.format(seconds=seconds), duration=4000)
+
+    def decorator(fn):
+        if inspect.isasyncgenfunction(fn):
+
+            @functools.wraps(fn)
+            async def gen_wrapper(self, *args, **kwargs):
+                result = await hit_limits(*_limits(self, args, kwargs))
+                if not result.allowed:
+                    yield _rejected(result)
+                    return
+                async for event in fn(self, *args, **kwargs):
+                    yield event
+
+            return gen_wrapper
+
+        if not inspect.iscoroutinefunction(fn):
+            raise TypeError("rate_limited requiere un handler async")
+
+        @functools.wraps(fn)
+        async def wrapper(self, *args, **kwargs):
+            result = await hit_limits(*_limits(self, args, kwargs))
+            if not result.allowed:
+                return _rejected(result)
+            return await fn(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def async_rate_limit_stats() -> dict[str, Any]:
+    """Contadores del limitador (depuración / métricas)."""
+    return {
+        **_stats,
+        "local_cache_entries": len(_not_limited_until),
+        "memory_keys": len(_memory_windows),
+        "memory_fallback_allowed": _allow_memory_fallback_in_prod(),
+    }
+
+
+def reset_async_rate_limit() -> None:
+    """Limpia cache local, ventanas en memoria y contadores (tests)."""
+    _not_limited_until.clear()
+    _memory_windows.clear()
+    _redis.reset_backoff()
+    for name in _stats:
+        _stats[name] = 0
@@ -1,33 +1,75 @@
-"""Sesión de solo-lectura para descargar reportes del MySQL primario (P3 §3.4).
+"""Ruteo de lecturas a la réplica de MySQL (P3 §3.4).
 
 Si hay una **réplica de lectura** configurada (`DB_READ_URL`, o `DB_READ_HOST`
-distinto del primario), los reportes pesados la usan y liberan al primario del POS.
-Si NO hay réplica (default), ``read_session()`` delega en ``rx.session()`` → el
-comportamiento actual, sin overhead ni riesgo.
+distinto del primario), las lecturas pesadas (dashboard, historial, alertas,
+reportes) la usan y liberan al primario del POS. Si NO hay réplica (default),
+``read_session()`` delega en ``rx.session()`` y ``read_async_session()`` en
+``get_async_session()`` → el comportamiento actual, sin overhead ni riesgo.
 
 Recomendado en host compartido/ajustado: una réplica **fuera de la caja** (AWS RDS
 read replica o instancia aparte), para no robarle RAM a los otros sistemas.
 
+Una lectura sólo va a la réplica si:
+
+* **El lag es conocido y bajo.** ``replica_heartbeat_monitor`` (lifespan)
+  escribe ``ReplicaHeartbeat.beat_at`` en el primario cada
+  ``DB_READ_HEARTBEAT_SECONDS`` y lo relee desde la réplica; la diferencia es
+  el lag. Si supera ``DB_READ_MAX_LAG_SECONDS``, falla la medición o el
+  monitor dejó de medir, se lee del primario.
+* **El cliente no escribió hace poco** (read-your-writes). ``ReadRoutingMiddleware``
+  asocia cada evento al token del cliente; tras un commit con escrituras, ese
+  cliente lee del primario durante ``DB_READ_PIN_SECONDS``.
+
 Seguridad multi-tenant: los listeners de ``tuwayki_core`` (``do_orm_execute`` /
 ``before_flush``) están registrados sobre la clase ``Session`` con
-``propagate=True`` → aplican también a esta sesión. El aislamiento por
+``propagate=True`` → aplican también a estas sesiones. El aislamiento por
 ``company_id`` se preserva igual que en ``rx.session()``.
 
-Sólo para LECTURAS. No escribir por esta sesión (una réplica es read-only; además
-rompería el ruteo). Para escrituras, seguir usando ``rx.session()``.
+Sólo para LECTURAS. No escribir por estas sesiones (una réplica es read-only;
+además rompería el ruteo). Para escrituras, seguir usando ``rx.session()``.
 """
 from __future__ import annotations
 
+import asyncio
+import logging
 import os
-from contextlib import contextmanager
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar, Token
 from functools import lru_cache
-from typing import Iterator
+from typing import Any, AsyncIterator, Iterator
 from urllib.parse import quote_plus
 
 import reflex as rx
-from sqlalchemy import create_engine
-from sqlalchemy.engine import Engine
-from sqlmodel import Session
+from reflex.middleware import Middleware
+from sqlalchemy import create_engine, event, update
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.models.platform_config import REPLICA_HEARTBEAT_ID, ReplicaHeartbeat
+from app.utils.timezone import utc_now_naive
+
+logger = logging.getLogger("DbRead")
+
+DB_READ_MAX_LAG_SECONDS = float(os.getenv("DB_READ_MAX_LAG_SECONDS", "10"))
+DB_READ_HEARTBEAT_SECONDS = float(os.getenv("DB_READ_HEARTBEAT_SECONDS", "2"))
+DB_READ_PIN_SECONDS = float(os.getenv("DB_READ_PIN_SECONDS", "5"))
+# Clientes fijados al primario a la vez; por encima se descartan los vencidos
+# y luego los más viejos.
+DB_READ_PIN_MAX_CLIENTS = 10_000
+
+# Drivers async equivalentes para derivar la URL async de la sync.
+_ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "mariadb": "mariadb+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+_WROTE_INFO_KEY = "read_routing_wrote"
 
 
 def _read_url() -> str | None:
@@ -47,12 +89,29 @@ def _read_url() -> str | None:
     return f"mysql+pymysql://{user}:{pw}@{read_host}:{port}/{name}?charset=utf8mb4"
 
 
+def _async_read_url() -> str | None:
+    """URL async de la réplica: ``DB_READ_ASYNC_URL`` o la sync con driver async."""
+    direct = (os.getenv("DB_READ_ASYNC_URL") or "").strip()
+    if direct:
+        return direct
+    url = _read_url()
+    if not url:
+        return None
+    parsed = make_url(url)
+    driver = _ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        return None
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
 @lru_cache(maxsize=1)
 def _read_engine() -> Engine | None:
     """Engine de la réplica (lazy, cacheado). None si no hay réplica configurada."""
     url = _read_url()
     if not url:
         return None
+    if make_url(url).get_backend_name() == "sqlite":
+        return create_engine(url, connect_args={"check_same_thread": False})
     return create_engine(
         url,
         pool_pre_ping=True,
@@ -62,22 +121,282 @@ def _read_engine() -> Engine | None:
     )
 
 
+@lru_cache(maxsize=1)
+def _async_read_engine() -> AsyncEngine | None:
+    """Engine async de la réplica (lazy, cacheado). None sin réplica."""
+    url = _async_read_url()
+    if not url:
+        return None
+    if make_url(url).get_backend_name() == "sqlite":
+        return create_async_engine(url)
+    return create_async_engine(
+        url,
+        pool_pre_ping=True,
+        pool_size=int(os.getenv("DB_READ_POOL_SIZE", "5")),
+        max_overflow=int(os.getenv("DB_READ_MAX_OVERFLOW", "5")),
+        pool_recycle=int(os.getenv("DB_READ_POOL_RECYCLE", "1800")),
+    )
+
+
 def read_replica_configured() -> bool:
     """True si hay una réplica de lectura configurada (para logs/health)."""
     return _read_engine() is not None
 
 
+async def dispose_read_engines() -> None:
+    """Cierra los pools de la réplica (shutdown)."""
+    if _async_read_engine.cache_info().currsize:
+        engine = _async_read_engine()
+        if engine is not None:
+            await engine.dispose()
+    if _read_engine.cache_info().currsize:
+        engine = _read_engine()
+        if engine is not None:
+            engine.dispose()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Lag de la réplica
+# ─────────────────────────────────────────────────────────────────────────────
+
+_lag_lock = threading.Lock()
+_lag_seconds: float | None = None
+_lag_checked_at = 0.0  # time.monotonic() de la última medición (0 = nunca)
+_lag_error: str | None = None
+
+
+def _primary_session():
+    """Sesión sync del primario (punto único para tests)."""
+    return rx.session()
+
+
+def _primary_async_session():
+    """Sesión async del primario (punto único para tests)."""
+    from app.utils.db import get_async_session
+
+    return get_async_session()
+
+
+def _record_lag(lag: float | None, error: str | None = None) -> None:
+    global _lag_seconds, _lag_checked_at, _lag_error
+    with _lag_lock:
+        _lag_seconds = lag
+        _lag_checked_at = time.monotonic()
+        _lag_error = error
+
+
+def _write_heartbeat(session: Session, beat_at) -> None:
+    result = session.execute(
+        update(ReplicaHeartbeat)
+        .where(ReplicaHeartbeat.id == REPLICA_HEARTBEAT_ID)
+        .values(beat_at=beat_at)
+    )
+    if not result.rowcount:
+        # Sin la fila de la migración (BD creada con create_all).
+        session.add(ReplicaHeartbeat(id=REPLICA_HEARTBEAT_ID, beat_at=beat_at))
+    session.commit()
+
+
+def probe_replica_lag() -> float | None:
+    """Escribe el latido en el primario y mide cuánto atrasa la réplica.
+
+    Devuelve el lag en segundos (None si no hay réplica o la medición falló)
+    y lo deja registrado para el ruteo. El lag incluye el intervalo desde el
+    latido anterior que la réplica ya aplicó, así que es una cota superior.
+    """
+    engine = _read_engine()
+    if engine is None:
+        return None
+    try:
+        with _primary_session() as session:
+            session.info["tenant_bypass"] = True
+            _write_heartbeat(session, utc_now_naive())
+    except Exception as exc:
+        logger.warning("No se pudo escribir el latido de réplica: %s", exc)
+        _record_lag(None, f"{type(exc).__name__}: {exc}")
+        return None
+    try:
+        with Session(engine) as session:
+            beat_at = session.exec(
+                select(ReplicaHeartbeat.beat_at).where(
+                    ReplicaHeartbeat.id == REPLICA_HEARTBEAT_ID
+                )
+            ).first()
+    except Exception as exc:
+        logger.warning("No se pudo leer el latido desde la réplica: %s", exc)
+        _record_lag(None, f"{type(exc).__name__}: {exc}")
+        return None
+    if beat_at is None:
+        _record_lag(None, "latido aún no replicado")
+        return None
+    lag = max(0.0, (utc_now_naive() - beat_at).total_seconds())
+    _record_lag(lag)
+    return lag
+
+
+def _lag_max_age() -> float:
+    """Antigüedad máxima de una medición para seguir confiando en ella."""
+    return max(3 * DB_READ_HEARTBEAT_SECONDS, 5.0)
+
+
+def replica_lag_seconds() -> float | None:
+    """Último lag medido, o None si es desconocido o la medición está vencida."""
+    with _lag_lock:
+        lag, checked_at = _lag_seconds, _lag_checked_at
+    if not checked_at or time.monotonic() - checked_at > _lag_max_age():
+        return None
+    return lag
+
+
+def replica_healthy() -> bool:
+    """True si hay réplica y su lag reciente está dentro del máximo tolerado."""
+    if _read_engine() is None:
+        return False
+    lag = replica_lag_seconds()
+    return lag is not None and lag <= DB_READ_MAX_LAG_SECONDS
+
+
+async def replica_heartbeat_monitor(interval: float | None = None) -> None:
+    """Mide el lag de la réplica en bucle (lifespan). No hace nada sin réplica."""
+    if _read_engine() is None:
+        return
+    interval = max(interval or DB_READ_HEARTBEAT_SECONDS, 0.5)
+    while True:
+        await asyncio.to_thread(probe_replica_lag)
+        await asyncio.sleep(interval)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Read-your-writes
+# ─────────────────────────────────────────────────────────────────────────────
+
+_route_key: ContextVar[str | None] = ContextVar("read_route_key", default=None)
+_pins_lock = threading.Lock()
+_pins: dict[str, float] = {}  # clave → time.monotonic() hasta el que se fija
+
+
+def set_read_route_key(key: str | None) -> Token:
+    """Asocia el contexto actual (evento/tarea) a un cliente para el ruteo."""
+    return _route_key.set(key or None)
+
+
+def reset_read_route_key(token: Token) -> None:
+    _route_key.reset(token)
+
+
+def pin_to_primary(key: str | None = None, seconds: float | None = None) -> None:
+    """Fija las lecturas de ``key`` (o del cliente actual) al primario."""
+    key = key or _route_key.get()
+    if not key or _read_engine() is None:
+        return
+    now = time.monotonic()
+    until = now + (DB_READ_PIN_SECONDS if seconds is None else seconds)
+    with _pins_lock:
+        _pins.pop(key, None)
+        _pins[key] = until
+        if len(_pins) > DB_READ_PIN_MAX_CLIENTS:
+            for stale in [k for k, v in _pins.items() if v <= now]:
+                del _pins[stale]
+            while len(_pins) > DB_READ_PIN_MAX_CLIENTS:
+                del _pins[next(iter(_pins))]
+
+
+def is_pinned_to_primary(key: str | None = None) -> bool:
+    """True si ``key`` (o el cliente actual) escribió hace menos de ``DB_READ_PIN_SECONDS``."""
+    key = key or _route_key.get()
+    if not key:
+        return False
+    with _pins_lock:
+        until = _pins.get(key)
+        if until is None:
+            return False
+        if until <= time.monotonic():
+            del _pins[key]
+            return False
+    return True
+
+
+def _mark_flush(session, flush_context) -> None:
+    session.info[_WROTE_INFO_KEY] = True
+
+
+def _mark_execute(orm_execute_state) -> None:
+    if (
+        orm_execute_state.is_insert
+        or orm_execute_state.is_update
+        or orm_execute_state.is_delete
+    ):
+        orm_execute_state.session.info[_WROTE_INFO_KEY] = True
+
+
+def _pin_after_commit(session) -> None:
+    if session.info.pop(_WROTE_INFO_KEY, False):
+        pin_to_primary()
+
+
+def _forget_after_rollback(session) -> None:
+    session.info.pop(_WROTE_INFO_KEY, None)
+
+
+_LISTENERS = (
+    ("after_flush", _mark_flush),
+    ("do_orm_execute", _mark_execute),
+    ("after_commit", _pin_after_commit),
+    ("after_rollback", _forget_after_rollback),
+)
+
+
+def register_read_routing_listeners() -> None:
+    """Marca los commits con escrituras para fijar al cliente al primario.
+
+    Idempotente. Se registra sobre la clase ``Session`` de SQLAlchemy, así
+    que cubre ``rx.session()`` y las sesiones async (su ``sync_session``).
+    """
+    for name, fn in _LISTENERS:
+        if not event.contains(OrmSession, name, fn):
+            event.listen(OrmSession, name, fn)
+
+
+def unregister_read_routing_listeners() -> None:
+    for name, fn in _LISTENERS:
+        if event.contains(OrmSession, name, fn):
+            event.remove(OrmSession, name, fn)
+
+
+class ReadRoutingMiddleware(Middleware):
+    """Asocia cada evento al token de su cliente (clave de read-your-writes).
+
+    ``preprocess`` corre dentro de la tarea del evento, así que la clave
+    alcanza al handler, a las tareas background que lance y a ``run_sync_db``
+    (que copia el contexto al pool).
+    """
+
+    async def preprocess(self, app, state, event):
+        set_read_route_key(getattr(event, "token", None))
+        return None
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Sesiones
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+def use_replica() -> bool:
+    """Decide si la lectura actual puede ir a la réplica."""
+    return replica_healthy() and not is_pinned_to_primary()
+
+
 @contextmanager
 def read_session() -> Iterator[Session]:
-    """Sesión de SOLO-LECTURA.
+    """Sesión sync de SOLO-LECTURA.
 
-    Usa la réplica si está configurada; si no, delega en ``rx.session()`` (primario).
-    Drop-in para reportes: ``with read_session() as session: ...``.
+    Usa la réplica si está sana y el cliente no escribió hace poco; si no,
+    delega en ``rx.session()`` (primario).
+    Drop-in para lecturas: ``with read_session() as session: ...``.
     """
-    engine = _read_engine()
+    engine = _read_engine() if use_replica() else None
     if engine is None:
-        # Sin réplica: comportamiento idéntico al actual.
-        with rx.session() as session:
+        with _primary_session() as session:
             yield session
         return
     session = Session(engine)
@@ -85,3 +404,49 @@ def read_session() -> Iterator[Session]:
         yield session
     finally:
         session.close()
+
+
+@asynccontextmanager
+async def read_async_session() -> AsyncIterator[AsyncSession]:
+    """Sesión async de SOLO-LECTURA, con el mismo ruteo que ``read_session``.
+
+    Drop-in para ``get_async_session()`` en lecturas:
+    ``async with read_async_session() as session: ...``.
+    """
+    engine = _async_read_engine() if use_replica() else None
+    if engine is None:
+        async with _primary_async_session() as session:
+            yield session
+        return
+    session = AsyncSession(engine, expire_on_commit=False)
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
+def read_routing_status() -> dict[str, Any]:
+    """Estado del ruteo para /api/health y métricas."""
+    configured = read_replica_configured()
+    with _lag_lock:
+        error = _lag_error
+    with _pins_lock:
+        pinned = len(_pins)
+    lag = replica_lag_seconds()
+    return {
+        "configured": configured,
+        "healthy": configured and lag is not None and lag <= DB_READ_MAX_LAG_SECONDS,
+        "lag_seconds": None if lag is None else round(lag, 3),
+        "max_lag_seconds": DB_READ_MAX_LAG_SECONDS,
+        "pinned_clients": pinned,
+        "error": error,
+    }
+
+
+def reset_read_routing() -> None:
+    """Olvida lag medido y fijaciones (tests / cambio de configuración)."""
+    global _lag_seconds, _lag_checked_at, _lag_error
+    with _lag_lock:
+        _lag_seconds, _lag_checked_at, _lag_error = None, 0.0, None
+    with _pins_lock:
+        _pins.clear()
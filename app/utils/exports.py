@@ -5,9 +5,14 @@ Funciones para simplificar la creacion y el formato de archivos Excel.
 """
 import io
 import logging
+import os
 import datetime
+import tempfile
 import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils.cell import coordinate_from_string, column_index_from_string
 from openpyxl.workbook import Workbook
+from openpyxl.worksheet.cell_range import CellRange
 from openpyxl.worksheet.worksheet import Worksheet
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
@@ -15,7 +20,7 @@ from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from typing import Any
+from typing import Any, BinaryIO
 from decimal import Decimal, InvalidOperation
 
 
@@ -285,6 +290,10 @@ def auto_adjust_column_widths(ws: Worksheet, min_width: int = 10, max_width: int
     """
     from openpyxl.cell.cell import MergedCell
 
+    if isinstance(ws, StreamingWorksheet):
+        ws.auto_adjust(min_width, max_width)
+        return
+
     for column in ws.columns:
         max_length = 0
         column_letter = None
@@ -337,6 +346,206 @@ def apply_wrap_text(
             cell.alignment = current.copy(wrap_text=True, vertical=vertical)
 
 
+# ─────────────────────────────────────────────────────────────────────────────
+# Exportación streaming (hojas write-only + archivo temporal)
+# ─────────────────────────────────────────────────────────────────────────────
+
+# XLSX_STREAMING=0 vuelve al Workbook en memoria (rollback sin deploy).
+XLSX_STREAMING_ENABLED = os.getenv("XLSX_STREAMING", "1").strip().lower() not in {
+    "0",
+    "false",
+    "no",
+}
+# Hasta este tamaño el archivo generado queda en RAM; por encima va a disco.
+XLSX_SPOOL_MAX_MEMORY = max(0, int(os.getenv("XLSX_SPOOL_MAX_MEMORY_MB", "8"))) * 1024 * 1024
+# Filas pendientes por hoja: muestra para el ancho de columnas y margen para
+# volver a escribir filas recientes (p. ej. % sobre la fila de totales).
+XLSX_STREAM_BUFFER_ROWS = 1000
+
+
+class StreamingWorksheet:
+    """Hoja write-only de openpyxl con la API de celdas de ``Worksheet``.
+
+    Acepta ``ws.cell(row, column)``, ``ws["A1"]``, ``merge_cells`` y
+    ``row_dimensions`` como una hoja normal, pero solo retiene las últimas
+    ``buffer_rows`` filas: las anteriores se escriben al stream en orden y ya
+    no se pueden modificar (``ValueError``). Los anchos de columna se calculan
+    una sola vez, sobre las filas retenidas al primer volcado.
+    """
+
+    def __init__(
+        self,
+        workbook: Workbook,
+        title: str,
+        *,
+        min_width: int = 10,
+        max_width: int = 50,
+        buffer_rows: int = XLSX_STREAM_BUFFER_ROWS,
+    ) -> None:
+        self._ws = workbook.create_sheet(title[:31])
+        self._pending: dict[int, dict[int, WriteOnlyCell]] = {}
+        self._next_row = 1
+        self._buffer_rows = max(1, buffer_rows)
+        self._min_width = min_width
+        self._max_width = max_width
+        self._widths_applied = False
+        self._closed = False
+
+    @property
+    def title(self) -> str:
+        return self._ws.title
+
+    @title.setter
+    def title(self, value: str) -> None:
+        self._ws.title = value[:31]
+
+    @property
+    def row_dimensions(self):
+        return self._ws.row_dimensions
+
+    @property
+    def column_dimensions(self):
+        return self._ws.column_dimensions
+
+    @property
+    def max_row(self) -> int:
+        return max(self._pending, default=self._next_row - 1)
+
+    def cell(self, row: int, column: int, value: Any = None) -> WriteOnlyCell:
+        if self._closed or row < self._next_row:
+            raise ValueError(f"Fila {row} ya escrita en la hoja {self.title!r}")
+        cells = self._pending.get(row)
+        if cells is None:
+            cells = self._pending[row] = {}
+        current = cells.get(column)
+        if current is None:
+            current = cells[column] = WriteOnlyCell(self._ws)
+        if value is not None:
+            current.value = value
+        if row - self._next_row >= self._buffer_rows:
+            self._flush_before(row - self._buffer_rows + 1)
+        return current
+
+    def __getitem__(self, coordinate: str) -> WriteOnlyCell:
+        column, row = coordinate_from_string(coordinate)
+        return self.cell(row=row, column=column_index_from_string(column))
+
+    def __setitem__(self, coordinate: str, value: Any) -> None:
+        self[coordinate].value = value
+
+    def merge_cells(
+        self,
+        range_string: str | None = None,
+        start_row: int | None = None,
+        start_column: int | None = None,
+        end_row: int | None = None,
+        end_column: int | None = None,
+    ) -> None:
+        self._ws.merged_cells.add(
+            CellRange(
+                range_string,
+                min_col=start_column,
+                min_row=start_row,
+                max_col=end_column,
+                max_row=end_row,
+            )
+        )
+
+    def auto_adjust(self, min_width: int | None = None, max_width: int | None = None) -> None:
+        """Fija los límites de ancho; se aplican al primer volcado (o al cerrar)."""
+        if min_width is not None:
+            self._min_width = min_width
+        if max_width is not None:
+            self._max_width = max_width
+
+    def _apply_widths(self) -> None:
+        widths: dict[int, int] = {}
+        for cells in self._pending.values():
+            for column, current in cells.items():
+                if current.value is not None:
+                    widths[column] = max(widths.get(column, 0), len(str(current.value)))
+        for column, length in widths.items():
+            self._ws.column_dimensions[get_column_letter(column)].width = min(
+                max(length + 2, self._min_width), self._max_width
+            )
+        self._widths_applied = True
+
+    def _flush_before(self, stop_row: int) -> None:
+        """Escribe al stream todas las filas anteriores a ``stop_row``."""
+        if not self._widths_applied:
+            self._apply_widths()
+        while self._next_row < stop_row:
+            cells = self._pending.pop(self._next_row, None) or {}
+            last = max(cells, default=0)
+            self._ws.append([cells.get(column) for column in range(1, last + 1)])
+            self._next_row += 1
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._flush_before(max(self._pending, default=0) + 1)
+        self._closed = True
+
+
+class StreamingWorkbook:
+    """``Workbook(write_only=True)`` cuyas hojas son :class:`StreamingWorksheet`.
+
+    Expone ``active``/``create_sheet``/``save`` para que los generadores de
+    reportes no distingan entre el modo streaming y el workbook en memoria.
+    """
+
+    def __init__(self, *, min_width: int = 10, max_width: int = 50) -> None:
+        self._wb = openpyxl.Workbook(write_only=True)
+        self._sheets: list[StreamingWorksheet] = []
+        self._width_bounds = {"min_width": min_width, "max_width": max_width}
+
+    @property
+    def active(self) -> StreamingWorksheet:
+        if not self._sheets:
+            self.create_sheet("Sheet")
+        return self._sheets[0]
+
+    @property
+    def worksheets(self) -> list[StreamingWorksheet]:
+        return list(self._sheets)
+
+    def create_sheet(self, title: str) -> StreamingWorksheet:
+        sheet = StreamingWorksheet(self._wb, title, **self._width_bounds)
+        self._sheets.append(sheet)
+        return sheet
+
+    def save(self, target) -> None:
+        for sheet in self._sheets:
+            sheet.close()
+        self._wb.save(target)
+
+
+def create_report_workbook(
+    streaming: bool | None = None, *, min_width: int = 10, max_width: int = 50
+) -> Workbook | StreamingWorkbook:
+    """Workbook para exportaciones grandes: streaming salvo ``XLSX_STREAMING=0``."""
+    if streaming is None:
+        streaming = XLSX_STREAMING_ENABLED
+    if streaming:
+        return StreamingWorkbook(min_width=min_width, max_width=max_width)
+    return openpyxl.Workbook()
+
+
+def save_workbook_spooled(workbook: Workbook | StreamingWorkbook) -> BinaryIO:
+    """Guarda el workbook en un archivo temporal (RAM hasta ``XLSX_SPOOL_MAX_MEMORY``).
+
+    Devuelve el archivo posicionado al inicio; el caller lo lee y lo cierra.
+    """
+    output = tempfile.SpooledTemporaryFile(max_size=XLSX_SPOOL_MAX_MEMORY, suffix=".xlsx")
+    try:
+        workbook.save(output)
+    except Exception:
+        output.close()
+        raise
+    output.seek(0)
+    return output
+
+
 def create_pdf_report(
     buffer: io.BytesIO,
     title: str,
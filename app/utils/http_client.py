@@ -0,0 +1,205 @@
+"""Clientes HTTP compartidos por upstream (Nubefact, AFIP, lookups, Food/Life).
+
+Abrir un ``httpx.AsyncClient`` por llamada paga un handshake TCP + TLS por
+cada boleta emitida o RUC consultado. Acá vive un cliente por upstream (por
+event loop: un ``AsyncClient`` queda atado al loop donde abrió sus
+conexiones) con keep-alive, HTTP/2 si está instalado ``h2``, un tope de
+requests concurrentes y un circuit breaker::
+
+    async with http_client("nubefact", timeout=NUBEFACT_TIMEOUT_SECONDS) as client:
+        response = await client.post(url, json=payload)
+
+Salir del bloque no cierra el cliente (lo cierra :func:`close_http_clients`
+en el lifespan de ``app.api``); sólo libera el cupo de concurrencia.
+
+Circuit breaker: ``HTTP_BREAKER_FAILURES`` fallas seguidas (timeout, error de
+conexión o HTTP 5xx) abren el circuito de ese upstream por
+``HTTP_BREAKER_RESET_SECONDS``; mientras tanto :func:`http_client` eleva
+:class:`CircuitOpenError` (un ``httpx.ConnectError``, así que los
+``except httpx.ConnectError`` existentes lo tratan como "no se pudo conectar")
+sin tocar la red. Pasado ese tiempo se deja pasar una request de prueba.
+"""
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import logging
+import os
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator
+
+import httpx
+
+logger = logging.getLogger("HttpClient")
+
+HTTP_POOL_MAX_CONNECTIONS = int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "20"))
+HTTP_POOL_KEEPALIVE_SECONDS = float(os.getenv("HTTP_POOL_KEEPALIVE_SECONDS", "60"))
+HTTP_MAX_CONCURRENCY = max(1, int(os.getenv("HTTP_MAX_CONCURRENCY", "10")))
+HTTP_BREAKER_FAILURES = max(1, int(os.getenv("HTTP_BREAKER_FAILURES", "5")))
+HTTP_BREAKER_RESET_SECONDS = float(os.getenv("HTTP_BREAKER_RESET_SECONDS", "30"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "1").strip().lower() not in {
+    "0",
+    "false",
+    "no",
+} and importlib.util.find_spec("h2") is not None
+
+_DEFAULT_TIMEOUT_SECONDS = 10.0
+
+
+class CircuitOpenError(httpx.ConnectError):
+    """El upstream acumuló fallas seguidas; no se intenta conectar."""
+
+
+@dataclass
+class _Breaker:
+    failures: int = 0
+    opened_at: float = 0.0
+    probing: bool = False
+
+    def is_open(self) -> bool:
+        return self.failures >= HTTP_BREAKER_FAILURES
+
+
+_breakers: dict[str, _Breaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def _before_request(name: str) -> None:
+    with _breakers_lock:
+        breaker = _breakers.setdefault(name, _Breaker())
+        if not breaker.is_open():
+            return
+        if time.monotonic() - breaker.opened_at < HTTP_BREAKER_RESET_SECONDS or breaker.probing:
+            raise CircuitOpenError(
+                f"Upstream '{name}' no disponible (circuito abierto tras "
+                f"{breaker.failures} fallas seguidas)"
+            )
+        # Half-open: una sola request de prueba.
+        breaker.probing = True
+
+
+def _record_result(name: str, ok: bool) -> None:
+    with _breakers_lock:
+        breaker = _breakers.setdefault(name, _Breaker())
+        breaker.probing = False
+        if ok:
+            if breaker.is_open():
+                logger.info("Upstream '%s' respondió de nuevo: circuito cerrado", name)
+            breaker.failures = 0
+            return
+        breaker.failures += 1
+        if breaker.failures == HTTP_BREAKER_FAILURES:
+            logger.warning(
+                "Upstream '%s': %d fallas seguidas, circuito abierto por %ss",
+                name, breaker.failures, HTTP_BREAKER_RESET_SECONDS,
+            )
+        if breaker.is_open():
+            breaker.opened_at = time.monotonic()
+
+
+def _end_probe(name: str) -> None:
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is not None:
+            breaker.probing = False
+
+
+def breaker_state() -> dict[str, dict[str, float | int | bool]]:
+    """Snapshot de los circuit breakers (health / debugging)."""
+    with _breakers_lock:
+        return {
+            name: {"failures": b.failures, "open": b.is_open(), "opened_at": b.opened_at}
+            for name, b in _breakers.items()
+        }
+
+
+def circuit_open(name: str) -> bool:
+    """True mientras :func:`http_client` rechazaría requests a ``name``."""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None or not breaker.is_open():
+            return False
+        return breaker.probing or time.monotonic() - breaker.opened_at < HTTP_BREAKER_RESET_SECONDS
+
+
+def reset_http_breakers() -> None:
+    """Cierra todos los circuitos (tests / mantenimiento)."""
+    with _breakers_lock:
+        _breakers.clear()
+
+
+@dataclass
+class _Upstream:
+    client: httpx.AsyncClient
+    semaphore: asyncio.Semaphore
+
+
+_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, _Upstream]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _upstream(name: str, timeout: float) -> _Upstream:
+    loop = asyncio.get_running_loop()
+    pools = _pools.setdefault(loop, {})
+    upstream = pools.get(name)
+    if upstream is None or upstream.client.is_closed:
+
+        async def _on_response(response: httpx.Response) -> None:
+            _record_result(name, response.status_code < 500)
+
+        upstream = pools[name] = _Upstream(
+            client=httpx.AsyncClient(
+                timeout=timeout,
+                http2=HTTP2_ENABLED,
+                limits=httpx.Limits(
+                    max_connections=HTTP_POOL_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTP_POOL_MAX_CONNECTIONS,
+                    keepalive_expiry=HTTP_POOL_KEEPALIVE_SECONDS,
+                ),
+                event_hooks={"response": [_on_response]},
+            ),
+            semaphore=asyncio.Semaphore(HTTP_MAX_CONCURRENCY),
+        )
+    return upstream
+
+
+@asynccontextmanager
+async def http_client(
+    name: str, *, timeout: float = _DEFAULT_TIMEOUT_SECONDS
+) -> AsyncIterator[httpx.AsyncClient]:
+    """Cliente compartido del upstream ``name`` con un cupo de concurrencia.
+
+    ``timeout`` es el default del cliente (se fija al crearlo); una llamada
+    puede pisarlo con ``client.post(..., timeout=...)``.
+    """
+    _before_request(name)
+    upstream = _upstream(name, timeout)
+    try:
+        async with upstream.semaphore:
+            try:
+                yield upstream.client
+            except httpx.TransportError:
+                _record_result(name, False)
+                raise
+    finally:
+        # Una request de prueba cancelada no deja el circuito trabado.
+        _end_probe(name)
+
+
+async def close_http_clients() -> None:
+    """Cierra los clientes del event loop actual (shutdown del lifespan)."""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    pools = _pools.pop(loop, {})
+    for name, upstream in pools.items():
+        try:
+            await upstream.client.aclose()
+        except Exception as exc:
+            logger.debug("Error cerrando cliente HTTP %s: %s", name, exc)
@@ -0,0 +1,236 @@
+"""Pipeline de login fuera del event loop.
+
+Tras un deploy todos los navegadores reconectan a la vez y ``AuthState.login``
+/ ``_resolve_current_user`` corren para cada uno. bcrypt tarda ~100-300 ms de
+CPU por verificación: ejecutado en el loop congela los websockets del resto de
+usuarios de la réplica. Este módulo aporta dos piezas:
+
+* **Pool de hashing** acotado (``LOGIN_HASH_MAX_WORKERS``) con cola de
+  admisión (``LOGIN_HASH_MAX_QUEUE``). bcrypt libera el GIL, así que un
+  ``ThreadPoolExecutor`` paraleliza de verdad. Si la cola está llena se
+  rechaza con :class:`LoginBusyError` en vez de acumular esperas de decenas de
+  segundos: el usuario reintenta y el loop sigue libre.
+* **Cache de JWT verificados**: token → snapshot del usuario ya resuelto
+  (rol, privilegios). Una reconexión con el mismo token no vuelve a la BD
+  mientras el snapshot esté vigente (``LOGIN_TOKEN_CACHE_SECONDS``). Los
+  cambios de ``token_version`` llaman a :func:`forget_verified_tokens`.
+
+Uso::
+
+    from app.utils.login_pipeline import verify_password_candidates
+
+    matches = await verify_password_candidates(password, [u.password_hash])
+
+Métricas en :func:`login_pipeline_stats`.
+"""
+from __future__ import annotations
+
+import asyncio
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Sequence
+
+import bcrypt
+
+LOGIN_HASH_MAX_WORKERS = max(
+    1, int(os.getenv("LOGIN_HASH_MAX_WORKERS", str(min(4, os.cpu_count() or 1))))
+)
+# Verificaciones que pueden esperar turno además de las que corren.
+LOGIN_HASH_MAX_QUEUE = max(0, int(os.getenv("LOGIN_HASH_MAX_QUEUE", "64")))
+LOGIN_TOKEN_CACHE_SECONDS = max(
+    0.0, float(os.getenv("LOGIN_TOKEN_CACHE_SECONDS", "30"))
+)
+_TOKEN_CACHE_MAX = 5000
+
+
+class LoginBusyError(RuntimeError):
+    """La cola de admisión del pool de hashing está llena."""
+
+
+_executor: ThreadPoolExecutor | None = None
+_lock = threading.Lock()
+_pending = 0
+_rejected = 0
+_hash_calls = 0
+_hash_seconds = 0.0
+_max_hash_seconds = 0.0
+
+# token -> (expira_en monotonic, snapshot del usuario)
+_verified_tokens: "OrderedDict[str, tuple[float, dict[str, Any]]]" = OrderedDict()
+_token_hits = 0
+_token_misses = 0
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=LOGIN_HASH_MAX_WORKERS,
+                thread_name_prefix="login-hash",
+            )
+        return _executor
+
+
+def _admit() -> None:
+    global _pending, _rejected
+    with _lock:
+        if _pending >= LOGIN_HASH_MAX_WORKERS + LOGIN_HASH_MAX_QUEUE:
+            _rejected += 1
+            raise LoginBusyError("login hash pool saturado")
+        _pending += 1
+
+
+def _timed(fn, *args):
+    global _hash_calls, _hash_seconds, _max_hash_seconds
+    started = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        elapsed = time.perf_counter() - started
+        with _lock:
+            _hash_calls += 1
+            _hash_seconds += elapsed
+            _max_hash_seconds = max(_max_hash_seconds, elapsed)
+
+
+async def _run_in_pool(fn, *args):
+    global _pending
+    _admit()
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_executor(), _timed, fn, *args)
+    finally:
+        with _lock:
+            _pending -= 1
+
+
+def _check_many(password: bytes, hashes: tuple[str, ...]) -> list[bool]:
+    results = []
+    for password_hash in hashes:
+        try:
+            results.append(bool(password_hash) and bcrypt.checkpw(
+                password, password_hash.encode("utf-8")
+            ))
+        except ValueError:
+            # Hash corrupto/no-bcrypt: se trata como contraseña incorrecta.
+            results.append(False)
+    return results
+
+
+async def verify_password_candidates(
+    password: bytes, hashes: Sequence[str]
+) -> list[bool]:
+    """Verifica ``password`` contra cada hash en el pool (un solo slot).
+
+    Varios candidatos (username repetido entre empresas) se comprueban en el
+    mismo job para no multiplicar la ocupación de la cola.
+    Lanza :class:`LoginBusyError` si la cola de admisión está llena.
+    """
+    if not hashes:
+        return []
+    return await _run_in_pool(_check_many, password, tuple(hashes))
+
+
+async def verify_password(password: bytes, password_hash: str) -> bool:
+    """Atajo de :func:`verify_password_candidates` para un único hash."""
+    return (await verify_password_candidates(password, [password_hash]))[0]
+
+
+def _hash(password: bytes) -> str:
+    return bcrypt.hashpw(password, bcrypt.gensalt()).decode()
+
+
+async def hash_password(password: bytes) -> str:
+    """``bcrypt.hashpw`` en el pool. Lanza :class:`LoginBusyError` si no hay cupo."""
+    return await _run_in_pool(_hash, password)
+
+
+# =============================================================================
+# CACHE DE JWT VERIFICADOS
+# =============================================================================
+
+
+def get_verified_token(token: str) -> dict[str, Any] | None:
+    """Snapshot del usuario para un token ya verificado, o None si expiró."""
+    global _token_hits, _token_misses
+    if not token or LOGIN_TOKEN_CACHE_SECONDS <= 0:
+        return None
+    now = time.monotonic()
+    with _lock:
+        entry = _verified_tokens.get(token)
+        if entry is None or entry[0] <= now:
+            if entry is not None:
+                _verified_tokens.pop(token, None)
+            _token_misses += 1
+            return None
+        _verified_tokens.move_to_end(token)
+        _token_hits += 1
+        return copy.deepcopy(entry[1])
+
+
+def remember_verified_token(token: str, user: dict[str, Any]) -> None:
+    """Guarda el snapshot de ``user`` (dict de ``AuthState.current_user``)."""
+    if not token or not user or LOGIN_TOKEN_CACHE_SECONDS <= 0:
+        return
+    expires_at = time.monotonic() + LOGIN_TOKEN_CACHE_SECONDS
+    with _lock:
+        _verified_tokens[token] = (expires_at, copy.deepcopy(user))
+        _verified_tokens.move_to_end(token)
+        while len(_verified_tokens) > _TOKEN_CACHE_MAX:
+            _verified_tokens.popitem(last=False)
+
+
+def forget_verified_tokens(
+    user_id: int | None = None, *, token: str | None = None
+) -> None:
+    """Descarta snapshots: de un token, de todos los de ``user_id``, o todos."""
+    with _lock:
+        if token is not None:
+            _verified_tokens.pop(token, None)
+            if user_id is None:
+                return
+        if user_id is None:
+            _verified_tokens.clear()
+            return
+        stale = [
+            key for key, (_, user) in _verified_tokens.items()
+            if user.get("id") == user_id
+        ]
+        for key in stale:
+            _verified_tokens.pop(key, None)
+
+
+def login_pipeline_stats() -> dict[str, Any]:
+    """Ocupación del pool de hashing y efectividad del cache de tokens."""
+    with _lock:
+        return {
+            "hash_workers": LOGIN_HASH_MAX_WORKERS,
+            "hash_queue_limit": LOGIN_HASH_MAX_QUEUE,
+            "hash_pending": _pending,
+            "hash_rejected": _rejected,
+            "hash_calls": _hash_calls,
+            "hash_seconds": round(_hash_seconds, 6),
+            "hash_max_seconds": round(_max_hash_seconds, 6),
+            "token_cache_entries": len(_verified_tokens),
+            "token_cache_hits": _token_hits,
+            "token_cache_misses": _token_misses,
+        }
+
+
+def reset_login_pipeline() -> None:
+    """Reinicia contadores y cache de tokens (tests / mantenimiento)."""
+    global _rejected, _hash_calls, _hash_seconds, _max_hash_seconds
+    global _token_hits, _token_misses
+    with _lock:
+        _verified_tokens.clear()
+        _rejected = 0
+        _hash_calls = 0
+        _hash_seconds = 0.0
+        _max_hash_seconds = 0.0
+        _token_hits = 0
+        _token_misses = 0
@@ -0,0 +1,426 @@
+"""Métricas del proceso en formato de texto Prometheus (``/api/metrics``).
+
+El backend Reflex es un solo proceso por superficie: lo que interesa ver es
+cuánto tarda cada event handler y cuántas queries dispara. Este módulo no
+depende de ``prometheus_client``; arma el formato de exposición 0.0.4 a mano
+con tres tipos mínimos (:class:`Counter`, :class:`Gauge`, :class:`Histogram`).
+
+Qué se mide:
+
+  * :class:`EventMetricsMiddleware` abre una medición por evento Reflex (en
+    ``preprocess``, con el state ya cargado) y la cierra cuando termina la
+    tarea del evento (handler + persistir el state): duración, queries y
+    tiempo de DB por handler.
+  * Las queries las cuentan los listeners de :mod:`app.utils.performance`
+    (engine async y sync): cada evento es una unidad de trabajo, así que
+    además de contarse por handler, una query repetida dentro del mismo
+    evento deja el warning de posible N+1.
+  * Pool del engine async (checked-out / overflow), latencia de Redis y lag
+    del event loop: los dos últimos los actualizan tareas del lifespan de
+    ``app.api`` (:func:`event_loop_lag_monitor`, :func:`redis_latency_monitor`),
+    así el scrape no toca dependencias.
+  * Contadores de negocio: ventas, emisiones fiscales y exports.
+
+``METRICS_ENABLED=0`` desactiva middleware, histograma de queries y endpoint.
+``METRICS_TOKEN`` exige ``Authorization: Bearer <token>`` en el scrape.
+"""
+from __future__ import annotations
+
+import asyncio
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Callable, Iterable
+
+from reflex.middleware import Middleware
+
+from app.utils.logger import get_logger
+from app.utils.performance import (
+    QueryUnit,
+    add_statement_observer,
+    begin_query_unit,
+    report_repeated,
+)
+
+logger = get_logger("Metrics")
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").strip().lower() not in {
+    "0",
+    "false",
+    "no",
+}
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "").strip()
+METRICS_LOOP_LAG_INTERVAL = float(os.getenv("METRICS_LOOP_LAG_INTERVAL", "0.5"))
+METRICS_REDIS_PING_INTERVAL = float(os.getenv("METRICS_REDIS_PING_INTERVAL", "15"))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_PREFIX = "tuwayki"
+_SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+_QUERY_SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+_QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+
+_UNKNOWN_HANDLER = "-"
+_INF_LABEL = 'le="+Inf"'
+
+_lock = threading.Lock()
+_registry: list["_Metric"] = []
+_collectors: list[Callable[[], None]] = []
+
+
+def _label_value(value: Any) -> str:
+    if isinstance(value, Enum):
+        value = value.value
+    return str(value)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = f"{_PREFIX}_{name}"
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple[str, ...], Any] = {}
+        with _lock:
+            _registry.append(self)
+
+    def _key(self, labels: dict[str, Any]) -> tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: labels esperados {self.labelnames}, recibidos {sorted(labels)}")
+        return tuple(_label_value(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        with _lock:
+            samples = self._samples()
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+            *samples,
+        ]
+
+    def clear(self) -> None:
+        with _lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        with _lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = float(value)
+
+    def value(self, **labels: Any) -> float | None:
+        with _lock:
+            return self._values.get(self._key(labels))
+
+    def _samples(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+@dataclass
+class _HistogramValue:
+    buckets: list[int]
+    total: float = 0.0
+    count: int = 0
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = _SECONDS_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with _lock:
+            current = self._values.get(key)
+            if current is None:
+                current = self._values[key] = _HistogramValue([0] * len(self.buckets))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    current.buckets[i] += 1
+            current.total += value
+            current.count += 1
+
+    def count(self, **labels: Any) -> int:
+        with _lock:
+            current = self._values.get(self._key(labels))
+            return current.count if current else 0
+
+    def _samples(self) -> list[str]:
+        lines: list[str] = []
+        for key, current in sorted(self._values.items()):
+            for bound, cumulative in zip(self.buckets, current.buckets):
+                le = f'le="{_format_number(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+                )
+            lines.append(
+                f"{self.name}_bucket{_format_labels(self.labelnames, key, _INF_LABEL)} {current.count}"
+            )
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_number(current.total)}")
+            lines.append(f"{self.name}_count{labels} {current.count}")
+        return lines
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Métricas
+# ─────────────────────────────────────────────────────────────────────────────
+
+EVENT_DURATION = Histogram(
+    "event_duration_seconds",
+    "Duración de cada evento Reflex (handler + persistencia del state).",
+    ("handler",),
+)
+EVENT_QUERIES = Histogram(
+    "event_db_queries",
+    "Queries SQL ejecutadas por evento Reflex.",
+    ("handler",),
+    buckets=_QUERY_COUNT_BUCKETS,
+)
+EVENT_DB_SECONDS = Counter(
+    "event_db_seconds_total",
+    "Tiempo acumulado en queries SQL por handler.",
+    ("handler",),
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "Duración de cada query SQL del proceso.",
+    buckets=_QUERY_SECONDS_BUCKETS,
+)
+DB_POOL_SIZE = Gauge("db_pool_size", "Tamaño base del pool del engine async.")
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out", "Conexiones del engine async prestadas en este momento."
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow", "Conexiones abiertas por encima de pool_size (negativo = libres)."
+)
+REDIS_UP = Gauge("redis_up", "1 si el último PING a Redis respondió.")
+REDIS_LATENCY = Gauge("redis_latency_seconds", "Latencia del último PING a Redis.")
+DB_REPLICA_LAG = Gauge(
+    "db_replica_lag_seconds",
+    "Último lag medido de la réplica de lectura (-1 = desconocido).",
+)
+DB_REPLICA_ROUTABLE = Gauge(
+    "db_replica_routable", "1 si las lecturas pueden ir a la réplica (lag bajo)."
+)
+EVENT_LOOP_LAG = Gauge(
+    "event_loop_lag_seconds", "Retraso del último tick del monitor del event loop."
+)
+EVENT_LOOP_LAG_HISTOGRAM = Histogram(
+    "event_loop_lag_histogram_seconds",
+    "Retrasos del event loop medidos por el monitor.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+SALES_TOTAL = Counter(
+    "sales_total",
+    "Ventas procesadas por resultado (ok, duplicate, rejected, error).",
+    ("result",),
+)
+FISCAL_EMISSIONS_TOTAL = Counter(
+    "fiscal_emissions_total",
+    "Emisiones de documentos fiscales por estado final.",
+    ("status",),
+)
+EXPORTS_TOTAL = Counter(
+    "exports_total",
+    "Exports XLSX terminados por estado final.",
+    ("status",),
+)
+
+
+def register_collector(collector: Callable[[], None]) -> None:
+    """``collector`` actualiza gauges justo antes de cada scrape."""
+    with _lock:
+        _collectors.append(collector)
+
+
+def _collect_db_pool() -> None:
+    from app.utils.db import async_engine
+
+    pool = async_engine.pool
+    for gauge, attr in (
+        (DB_POOL_SIZE, "size"),
+        (DB_POOL_CHECKED_OUT, "checkedout"),
+        (DB_POOL_OVERFLOW, "overflow"),
+    ):
+        getter = getattr(pool, attr, None)
+        if callable(getter):
+            gauge.set(getter())
+
+
+register_collector(_collect_db_pool)
+
+
+def _collect_db_replica() -> None:
+    from app.utils.db_read import read_routing_status
+
+    status = read_routing_status()
+    if not status["configured"]:
+        return
+    lag = status["lag_seconds"]
+    DB_REPLICA_LAG.set(-1 if lag is None else lag)
+    DB_REPLICA_ROUTABLE.set(1 if status["healthy"] else 0)
+
+
+register_collector(_collect_db_replica)
+
+
+def render_metrics() -> str:
+    """Texto de exposición de todas las métricas registradas."""
+    with _lock:
+        collectors = list(_collectors)
+        metrics = list(_registry)
+    for collector in collectors:
+        try:
+            collector()
+        except Exception as exc:
+            logger.debug("Collector %s falló: %s", getattr(collector, "__name__", collector), exc)
+    lines: list[str] = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def reset_metrics() -> None:
+    """Vacía todos los valores (tests / mantenimiento)."""
+    with _lock:
+        metrics = list(_registry)
+    for metric in metrics:
+        metric.clear()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Eventos Reflex y queries
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+def start_event_measure(handler: str) -> QueryUnit:
+    """Abre la unidad de queries del evento en el contexto de su tarea."""
+    return begin_query_unit(handler or _UNKNOWN_HANDLER)
+
+
+def finish_event_measure(unit: QueryUnit) -> None:
+    EVENT_DURATION.observe(time.perf_counter() - unit.started, handler=unit.name)
+    EVENT_QUERIES.observe(unit.count, handler=unit.name)
+    if unit.elapsed:
+        EVENT_DB_SECONDS.inc(unit.elapsed, handler=unit.name)
+    report_repeated(unit)
+
+
+class EventMetricsMiddleware(Middleware):
+    """Mide cada evento desde ``preprocess`` hasta el fin de su tarea.
+
+    Reflex corre cada evento en una tarea propia y no invoca ``postprocess``,
+    así que el cierre va en un done-callback de esa tarea.
+    """
+
+    async def preprocess(self, app, state, event):
+        unit = start_event_measure(getattr(event, "name", "") or _UNKNOWN_HANDLER)
+        task = asyncio.current_task()
+        if task is not None:
+            task.add_done_callback(lambda _task: finish_event_measure(unit))
+        return None
+
+
+if METRICS_ENABLED:
+    add_statement_observer(DB_QUERY_DURATION.observe)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Monitores del lifespan
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+async def event_loop_lag_monitor(interval: float = METRICS_LOOP_LAG_INTERVAL) -> None:
+    """Duerme ``interval`` en bucle; lo que se pasa del sleep es lag del loop."""
+    interval = max(interval, 0.05)
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - expected)
+        EVENT_LOOP_LAG.set(lag)
+        EVENT_LOOP_LAG_HISTOGRAM.observe(lag)
+
+
+async def redis_latency_monitor(interval: float = METRICS_REDIS_PING_INTERVAL) -> None:
+    """PING periódico a ``REDIS_URL`` con un cliente persistente."""
+    redis_url = os.getenv("REDIS_URL", "").strip()
+    if not redis_url:
+        return
+    import redis.asyncio as aioredis
+
+    client = aioredis.from_url(redis_url, socket_connect_timeout=2, socket_timeout=2)
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                async with asyncio.timeout(3):
+                    await client.ping()
+                REDIS_LATENCY.set(time.perf_counter() - started)
+                REDIS_UP.set(1)
+            except Exception as exc:
+                logger.debug("PING a Redis falló: %s", exc)
+                REDIS_UP.set(0)
+            await asyncio.sleep(max(interval, 1.0))
+    finally:
+        await client.aclose()
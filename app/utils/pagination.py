@@ -3,9 +3,30 @@
 `build_page_window` genera la lista de números de página para la barra numérica
 clickeable de `app.components.ui.pagination_controls` (modo numérico). Se centraliza
 acá para no duplicar el algoritmo en cada estado que la usa.
+
+Los listados grandes (historial de ventas, inventario) paginan por clave
+(keyset) en lugar de ``OFFSET``: cada página leída deja un marcador con su
+primera y última clave de orden, y la página pedida se lee desde el marcador
+más cercano (`plan_keyset_page`). Las páginas vecinas cuestan lo mismo que la
+primera; un salto lejano sólo recorre claves del índice, no filas completas.
+Los totales para la barra numérica se cachean (`CountCache`) y se corrigen con
+lo que devuelve cada página (`settle_keyset_total`).
 """
 from __future__ import annotations
 
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Hashable, Sequence
+
+import sqlalchemy as sa
+
+# Vida de un total cacheado; vencido, se recalcula en la próxima lectura.
+PAGINATION_COUNT_TTL_SECONDS = float(os.getenv("PAGINATION_COUNT_TTL_SECONDS", "30"))
+# Marcadores de página que guarda cada listado (los más lejanos se descartan).
+KEYSET_MAX_BOOKMARKS = 64
+
 
 def build_page_window(current: int, total: int) -> list[int]:
     """Devuelve los nº de página a mostrar en la barra numérica.
@@ -37,3 +58,153 @@ def build_page_window(current: int, total: int) -> list[int]:
         window.append(-1)
     window.append(total)
     return window
+
+
+def keyset_after(
+    columns: Sequence[Any], key: Sequence[Any], *, descending: bool = False
+) -> sa.ColumnElement[bool]:
+    """Predicado "fila posterior a ``key``" para ``ORDER BY columns``.
+
+    Todas las columnas ordenan en el mismo sentido (``descending``). Se expande
+    a ``c1 > v1 OR (c1 = v1 AND c2 > v2) …`` en vez de comparar tuplas: MySQL
+    resuelve la forma expandida como rango sobre el índice.
+    """
+    if len(columns) != len(key):
+        raise ValueError("keyset_after: columnas y clave de distinto largo")
+    clauses = []
+    for idx, column in enumerate(columns):
+        value = key[idx]
+        step = column < value if descending else column > value
+        equal = [columns[prev] == key[prev] for prev in range(idx)]
+        clauses.append(sa.and_(*equal, step))
+    return sa.or_(*clauses)
+
+
+@dataclass(frozen=True)
+class KeysetPlan:
+    """Cómo leer una página: desde qué clave, en qué sentido y cuánto saltear.
+
+    ``after`` es la clave exclusiva desde la que se recorre (None = desde el
+    principio, o desde el final si ``backward``). Con ``backward`` la query
+    ordena al revés y las filas se invierten al leerlas. ``offset`` son claves
+    a saltear desde ``after``; 0 en la navegación a páginas vecinas.
+    """
+
+    after: tuple | None
+    backward: bool
+    offset: int
+    limit: int
+
+
+def plan_keyset_page(
+    page: int,
+    per_page: int,
+    total_items: int,
+    bookmarks: dict[int, Sequence[Sequence[Any]]],
+) -> KeysetPlan:
+    """Elige el punto de partida que menos claves recorre para leer ``page``.
+
+    ``bookmarks`` mapea página → ``(primera_clave, última_clave)`` de páginas
+    ya leídas. Candidatos: el principio, el final (con ``total_items``) y cada
+    marcador; hacia adelante desde la última clave de una página anterior o
+    hacia atrás desde la primera de una posterior.
+    """
+    per_page = max(per_page, 1)
+    page = max(page, 1)
+    candidates = [KeysetPlan(None, False, (page - 1) * per_page, per_page)]
+    for known, (first_key, last_key) in bookmarks.items():
+        if known < page:
+            candidates.append(
+                KeysetPlan(tuple(last_key), False, (page - known - 1) * per_page, per_page)
+            )
+        elif known > page:
+            candidates.append(
+                KeysetPlan(tuple(first_key), True, (known - page - 1) * per_page, per_page)
+            )
+    remaining = total_items - (page - 1) * per_page
+    if remaining > 0:
+        on_page = min(per_page, remaining)
+        candidates.append(KeysetPlan(None, True, remaining - on_page, on_page))
+    return min(candidates, key=lambda plan: plan.offset)
+
+
+def remember_keyset_page(
+    bookmarks: dict[int, list],
+    page: int,
+    first_key: Sequence[Any],
+    last_key: Sequence[Any],
+    *,
+    max_bookmarks: int = KEYSET_MAX_BOOKMARKS,
+) -> dict[int, list]:
+    """Devuelve ``bookmarks`` con el marcador de ``page`` (dict nuevo).
+
+    Leer la página 1 reinicia los marcadores: las ventas nuevas entran por
+    arriba y correrían las posiciones de las páginas guardadas.
+    """
+    updated = {} if page == 1 else dict(bookmarks)
+    updated[page] = [list(first_key), list(last_key)]
+    if len(updated) > max_bookmarks:
+        keep = sorted(updated, key=lambda known: abs(known - page))[:max_bookmarks]
+        updated = {known: updated[known] for known in keep}
+    return updated
+
+
+def settle_keyset_total(
+    total_items: int, page: int, per_page: int, fetched: int, *, exact_start: bool
+) -> int:
+    """Corrige un total cacheado con las filas que devolvió ``page``.
+
+    Con ``exact_start`` (la lectura arrancó en la posición ``(page-1)*per_page``)
+    una página incompleta fija el total exacto; una completa lo acota por abajo.
+    """
+    if not exact_start:
+        return total_items
+    start = (max(page, 1) - 1) * per_page
+    if fetched < per_page:
+        return start + fetched
+    return max(total_items, start + fetched)
+
+
+class CountCache:
+    """Totales de paginación cacheados por proceso con vencimiento.
+
+    La clave incluye tenant y filtros. Un total vencido no se refresca en
+    segundo plano: se recalcula en la próxima lectura que lo pida.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 2048):
+        self._ttl = ttl_seconds
+        self._max_entries = max_entries
+        self._entries: dict[Hashable, tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def get(
+        self, key: Hashable, compute: Callable[[], int], *, refresh: bool = False
+    ) -> int:
+        now = time.monotonic()
+        if not refresh:
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                return entry[1]
+        value = int(compute() or 0)
+        self.put(key, value)
+        return value
+
+    def put(self, key: Hashable, value: int) -> None:
+        with self._lock:
+            if len(self._entries) >= self._max_entries and key not in self._entries:
+                now = time.monotonic()
+                self._entries = {
+                    k: v for k, v in self._entries.items() if v[0] > now
+                }
+                if len(self._entries) >= self._max_entries:
+                    self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (time.monotonic() + self._ttl, int(value))
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+count_cache = CountCache(PAGINATION_COUNT_TTL_SECONDS)
@@ -16,14 +16,41 @@ Uso básico::
     # ... ejecutar query ...
     elapsed = time.perf_counter() - start
     log_slow_query("buscar_clientes", elapsed)
+
+Conteo de queries por unidad de trabajo (detector de N+1)::
+
+    from app.utils.performance import query_unit, track_queries
+
+    @track_queries()
+    async def cargar_reporte(session): ...
+
+    with query_unit("importar_stock") as unit:
+        ...
+    unit.count, unit.repeated()
+
+Los listeners ``before/after_cursor_execute`` sobre :class:`Engine` atribuyen
+cada sentencia a las unidades abiertas en el contexto actual (service
+decorado con :func:`track_queries`, event handler vía
+``app.utils.metrics``). Al cerrar una unidad, una misma forma de sentencia
+(literales e ``IN (...)`` normalizados) repetida ``N_PLUS_ONE_THRESHOLD`` veces
+o más deja un warning "posible N+1". ``QUERY_TRACKING=0`` desactiva la
+atribución.
 """
+import contextvars
 import os
+import re
+import threading
 import time
+from collections import Counter
 from contextlib import contextmanager
-from typing import Generator
+from dataclasses import dataclass, field
+from typing import Callable, Generator
 from functools import wraps
 from decimal import Decimal
 
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
 from app.utils.logger import get_logger
 
 logger = get_logger("Performance")
@@ -212,3 +239,181 @@ class QueryStats:
     def queries(self) -> list[dict]:
         """Lista de consultas trackeadas."""
         return self._queries.copy()
+
+
+# =============================================================================
+# CONTEO DE QUERIES POR UNIDAD DE TRABAJO (N+1)
+# =============================================================================
+
+QUERY_TRACKING = os.getenv("QUERY_TRACKING", "1").strip().lower() not in {
+    "0",
+    "false",
+    "no",
+}
+# Repeticiones de una misma forma de sentencia que se reportan como N+1.
+N_PLUS_ONE_THRESHOLD = max(2, int(os.getenv("N_PLUS_ONE_THRESHOLD", "10")))
+
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = r"(?:\?|%s|%\(\w+\)s|:\w+)"
+_IN_LIST_RE = re.compile(rf"\(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})*\s*\)")
+_SPACES_RE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """Forma de una sentencia: literales → ``?``, ``IN (?, ?, …)`` → ``(?)``."""
+    shape = _LITERAL_RE.sub("?", statement)
+    shape = _IN_LIST_RE.sub("(?)", shape)
+    return _SPACES_RE.sub(" ", shape).strip()
+
+
+@dataclass
+class QueryUnit:
+    """Queries atribuidas a una unidad de trabajo (service, evento, test)."""
+
+    name: str
+    count: int = 0
+    elapsed: float = 0.0
+    started: float = field(default_factory=time.perf_counter)
+    shapes: Counter = field(default_factory=Counter)
+
+    def add(self, shape: str, elapsed: float = 0.0) -> None:
+        self.count += 1
+        self.elapsed += elapsed
+        self.shapes[shape] += 1
+
+    def repeated(self, threshold: int | None = None) -> list[tuple[str, int]]:
+        """Formas ejecutadas ``threshold`` veces o más, de mayor a menor."""
+        limit = N_PLUS_ONE_THRESHOLD if threshold is None else threshold
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= limit]
+
+    def describe(self, top: int = 10) -> str:
+        """Resumen legible (mensajes de assert / logs)."""
+        lines = [f"{self.name}: {self.count} queries, {round(self.elapsed * 1000, 2)}ms"]
+        lines.extend(f"  {n}× {shape[:160]}" for shape, n in self.shapes.most_common(top))
+        return "\n".join(lines)
+
+
+_query_units: contextvars.ContextVar[tuple[QueryUnit, ...]] = contextvars.ContextVar(
+    "query_units", default=()
+)
+_global_units: list[QueryUnit] = []
+_statement_observers: list[Callable[[float], None]] = []
+_units_lock = threading.Lock()
+_reported: set[tuple[str, str]] = set()
+
+
+def add_statement_observer(observer: Callable[[float], None]) -> None:
+    """``observer(elapsed)`` se llama por cada sentencia del proceso."""
+    _statement_observers.append(observer)
+
+
+def record_statement(statement: str, elapsed: float = 0.0) -> None:
+    """Atribuye una sentencia a las unidades abiertas.
+
+    La llaman los listeners del engine; los fakes de sesión de los tests la
+    usan para que los presupuestos de queries valgan también sin BD.
+    """
+    for observer in _statement_observers:
+        observer(elapsed)
+    if not QUERY_TRACKING:
+        return
+    units = _query_units.get()
+    if _global_units:
+        with _units_lock:
+            units = units + tuple(u for u in _global_units if u not in units)
+    if not units:
+        return
+    shape = statement_shape(statement)
+    for unit in units:
+        unit.add(shape, elapsed)
+
+
+def report_repeated(unit: QueryUnit, threshold: int | None = None) -> list[tuple[str, int]]:
+    """Warning (una vez por unidad + forma) por cada forma repetida."""
+    repeated = unit.repeated(threshold)
+    for shape, n in repeated:
+        key = (unit.name, shape)
+        if key in _reported:
+            continue
+        _reported.add(key)
+        logger.warning(
+            f"Posible N+1 en '{unit.name}': {n}× la misma query "
+            f"({unit.count} en total) | {shape[:200]}"
+        )
+    return repeated
+
+
+def begin_query_unit(name: str) -> QueryUnit:
+    """Abre una unidad en el contexto actual sin cerrarla (eventos Reflex:
+    la tarea del evento termina con su propio contexto)."""
+    unit = QueryUnit(name)
+    _query_units.set(_query_units.get() + (unit,))
+    return unit
+
+
+@contextmanager
+def query_unit(name: str, *, report: bool = True) -> Generator[QueryUnit, None, None]:
+    """Cuenta las queries del bloque (anidable: cada sentencia suma a todas
+    las unidades abiertas)."""
+    unit = QueryUnit(name)
+    token = _query_units.set(_query_units.get() + (unit,))
+    try:
+        yield unit
+    finally:
+        _query_units.reset(token)
+        if report:
+            report_repeated(unit)
+
+
+@contextmanager
+def capture_queries(name: str) -> Generator[QueryUnit, None, None]:
+    """Como :func:`query_unit` pero para todas las sentencias del proceso,
+    sin depender del contexto (tests, scripts de benchmark)."""
+    unit = QueryUnit(name)
+    with _units_lock:
+        _global_units.append(unit)
+    try:
+        yield unit
+    finally:
+        with _units_lock:
+            _global_units.remove(unit)
+
+
+def track_queries(name: str | None = None):
+    """Decorador: una unidad de trabajo por llamada al service (sync o async)."""
+    def decorator(func):
+        unit_name = name or func.__qualname__
+
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            with query_unit(unit_name):
+                return await func(*args, **kwargs)
+
+        @wraps(func)
+        def sync_wrapper(*args, **kwargs):
+            with query_unit(unit_name):
+                return func(*args, **kwargs)
+
+        import asyncio
+        if asyncio.iscoroutinefunction(func):
+            return async_wrapper
+        return sync_wrapper
+
+    return decorator
+
+
+_STATEMENT_STARTED_KEY = "query_unit_started"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info[_STATEMENT_STARTED_KEY] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop(_STATEMENT_STARTED_KEY, None)
+    elapsed = time.perf_counter() - started if started is not None else 0.0
+    record_statement(statement, elapsed)
+
+
+event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
@@ -3,6 +3,9 @@ Limitación de tasa centralizada con soporte para Redis (producción) y memoria
 
 Este módulo proporciona protección contra ataques de fuerza bruta
 en el sistema de autenticación, compartiendo estado entre workers.
+
+Los handlers async usan :mod:`app.utils.async_rate_limit` (``redis.asyncio``,
+ventana deslizante atómica en Lua): un Redis lento no frena el event loop.
 """
 from __future__ import annotations
 
@@ -0,0 +1,130 @@
+"""Clientes Redis compartidos (``REDIS_URL``) para caches, colas y límites.
+
+Cada módulo que usa Redis declara un :class:`SharedRedis` a nivel de módulo
+con su etiqueta (para los logs) y sus timeouts::
+
+    _redis = SharedRedis("cache de códigos", logger=logger)
+
+    client = _redis.sync_client()   # redis.Redis, o None
+    client = _redis.async_client()  # redis.asyncio.Redis del loop actual, o None
+    _redis.failed(exc)              # tras un error: pausa de ``retry_seconds``
+
+El cliente síncrono se valida con ``PING`` al crearse y se reusa en todo el
+proceso (es thread-safe): es para threads, workers y código fuera del event
+loop. El async queda atado al loop donde abrió sus conexiones, así que hay
+uno por event loop; es el que deben usar los handlers y servicios async para
+no frenar el loop con una ida y vuelta bloqueante.
+
+Ambos devuelven None sin ``REDIS_URL``, sin la librería ``redis`` o durante
+``retry_seconds`` tras un fallo: el llamador cae a su modo local.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+import time
+import weakref
+
+try:
+    import redis
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+_logger = logging.getLogger("Redis")
+
+
+def redis_url() -> str:
+    """``REDIS_URL`` configurada, o ``""`` si no hay Redis."""
+    return os.getenv("REDIS_URL", "").strip()
+
+
+class SharedRedis:
+    """Clientes Redis (sync y async) de un módulo, con pausa tras fallos."""
+
+    def __init__(
+        self,
+        label: str,
+        *,
+        decode_responses: bool = True,
+        timeout: float = 1.0,
+        retry_seconds: float = 30.0,
+        logger: logging.Logger | None = None,
+        log_level: int = logging.WARNING,
+    ) -> None:
+        self.label = label
+        self.decode_responses = decode_responses
+        self.timeout = timeout
+        self.retry_seconds = retry_seconds
+        self._logger = logger or _logger
+        self._log_level = log_level
+        self._sync_client: "redis.Redis | None" = None
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aioredis.Redis]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._failed_at = 0.0
+        self._lock = threading.Lock()
+
+    def configured(self) -> bool:
+        """Hay librería y ``REDIS_URL`` (no dice si Redis responde)."""
+        return REDIS_AVAILABLE and bool(redis_url())
+
+    def _backing_off(self) -> bool:
+        return bool(self._failed_at) and (
+            time.monotonic() - self._failed_at
+        ) < self.retry_seconds
+
+    def _options(self) -> dict:
+        return {
+            "decode_responses": self.decode_responses,
+            "socket_connect_timeout": self.timeout,
+            "socket_timeout": self.timeout,
+        }
+
+    def sync_client(self) -> "redis.Redis | None":
+        """Cliente síncrono del proceso; None = modo local."""
+        if self._sync_client is not None:
+            return self._sync_client
+        url = redis_url()
+        if not REDIS_AVAILABLE or not url or self._backing_off():
+            return None
+        with self._lock:
+            if self._sync_client is not None:
+                return self._sync_client
+            try:
+                client = redis.from_url(url, **self._options())
+                client.ping()
+            except Exception as exc:
+                self.failed(exc)
+                return None
+            self._sync_client = client
+            return client
+
+    def async_client(self) -> "aioredis.Redis | None":
+        """Cliente ``redis.asyncio`` del event loop actual; None = modo local.
+
+        No hace ``PING``: la conexión se abre en el primer comando, y si
+        falla el llamador lo informa con :meth:`failed`.
+        """
+        url = redis_url()
+        if not REDIS_AVAILABLE or not url or self._backing_off():
+            return None
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = self._async_clients[loop] = aioredis.from_url(url, **self._options())
+        return client
+
+    def failed(self, exc: Exception) -> None:
+        """Registra un error de Redis: no se reintenta por ``retry_seconds``."""
+        self._logger.log(
+            self._log_level, "Redis no disponible para %s: %s", self.label, str(exc)[:80]
+        )
+        self._failed_at = time.monotonic()
+
+    def reset_backoff(self) -> None:
+        """Permite reintentar ya mismo (tests)."""
+        self._failed_at = 0.0
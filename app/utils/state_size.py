@@ -0,0 +1,170 @@
+"""Tamaño serializado del state de Reflex, por substate y por evento.
+
+Al terminar cada evento Reflex pickle-a a Redis cada substate tocado; el costo
+(CPU + memoria de Redis por usuario conectado) crece con las listas que se
+guardan en el state. ``State._serialize`` llama a :func:`record_state_size`
+con los bytes de cada substate, y :class:`StateSizeMiddleware` anota qué
+evento se está procesando, así que :func:`state_size_stats` responde "qué
+state pesa cuánto y en qué evento".
+
+Como ``State`` compone todos los módulos en una sola clase (ver
+``root_state``), además se desglosa por mixin (``ClientesState``,
+``CuentasState``…): cada ``STATE_SIZE_BREAKDOWN_EVERY`` serializaciones, y
+la primera vez que un evento supera ``STATE_SIZE_WARN_BYTES``, se pickle-a
+cada var por separado y se suma por el mixin que la declara. Superar el
+umbral deja un warning (una vez por state + evento) con los mixins más
+pesados.
+
+``STATE_SIZE_TRACKING=0`` desactiva la medición.
+"""
+from __future__ import annotations
+
+import contextvars
+import os
+import pickle
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from reflex.middleware import Middleware
+
+from app.utils.logger import get_logger
+
+logger = get_logger("StateSize")
+
+STATE_SIZE_TRACKING = os.getenv("STATE_SIZE_TRACKING", "1").strip().lower() not in {
+    "0",
+    "false",
+    "no",
+}
+STATE_SIZE_WARN_BYTES = int(os.getenv("STATE_SIZE_WARN_BYTES", str(256 * 1024)))
+# 0 = desglose por mixin sólo al superar el umbral.
+STATE_SIZE_BREAKDOWN_EVERY = max(0, int(os.getenv("STATE_SIZE_BREAKDOWN_EVERY", "200")))
+
+_UNKNOWN_EVENT = "-"
+_UNGROUPED = "State"
+
+_current_event: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "state_size_event", default=_UNKNOWN_EVENT
+)
+
+
+@dataclass
+class _SizeStats:
+    serializations: int = 0
+    total_bytes: int = 0
+    max_bytes: int = 0
+    last_bytes: int = 0
+
+    def add(self, nbytes: int) -> None:
+        self.serializations += 1
+        self.total_bytes += nbytes
+        self.max_bytes = max(self.max_bytes, nbytes)
+        self.last_bytes = nbytes
+
+    def as_dict(self) -> dict[str, int]:
+        return {
+            "serializations": self.serializations,
+            "avg_bytes": self.total_bytes // max(self.serializations, 1),
+            "max_bytes": self.max_bytes,
+            "last_bytes": self.last_bytes,
+        }
+
+
+_lock = threading.Lock()
+_states: dict[str, _SizeStats] = {}
+_events: dict[tuple[str, str], _SizeStats] = {}
+_breakdowns: dict[str, dict[str, int]] = {}
+_warned: set[tuple[str, str]] = set()
+_var_groups: dict[str, str] = {}
+
+
+def register_state_var_groups(mapping: dict[str, str]) -> None:
+    """Var → nombre del mixin que la declara (lo arma ``root_state``)."""
+    with _lock:
+        _var_groups.update(mapping)
+
+
+def set_current_event(name: str) -> contextvars.Token:
+    return _current_event.set(name or _UNKNOWN_EVENT)
+
+
+def var_group_breakdown(values: dict[str, Any]) -> dict[str, int]:
+    """Bytes pickleados por grupo (mixin) para ``values`` (var → valor)."""
+    groups: dict[str, int] = {}
+    for name, value in values.items():
+        try:
+            size = len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            continue
+        group = _var_groups.get(name, _UNGROUPED)
+        groups[group] = groups.get(group, 0) + size
+    return dict(sorted(groups.items(), key=lambda item: item[1], reverse=True))
+
+
+def record_state_size(
+    state_name: str,
+    nbytes: int,
+    *,
+    values: Callable[[], dict[str, Any]] | None = None,
+) -> None:
+    """Registra una serialización de ``state_name`` en el evento actual.
+
+    ``values`` (perezoso) devuelve las vars serializadas; sólo se evalúa
+    cuando toca desglosar por mixin.
+    """
+    if not STATE_SIZE_TRACKING:
+        return
+    event = _current_event.get()
+    with _lock:
+        stats = _states.setdefault(state_name, _SizeStats())
+        stats.add(nbytes)
+        _events.setdefault((state_name, event), _SizeStats()).add(nbytes)
+        over = nbytes > STATE_SIZE_WARN_BYTES
+        sampled = bool(STATE_SIZE_BREAKDOWN_EVERY) and (
+            (stats.serializations - 1) % STATE_SIZE_BREAKDOWN_EVERY == 0
+        )
+        warn = over and (state_name, event) not in _warned
+        if warn:
+            _warned.add((state_name, event))
+    if values is None or not (warn or sampled):
+        return
+    breakdown = var_group_breakdown(values())
+    with _lock:
+        _breakdowns[state_name] = breakdown
+    if warn:
+        top = ", ".join(f"{group}={size // 1024}KB" for group, size in list(breakdown.items())[:5])
+        logger.warning(
+            "State %s serializa %dKB en el evento %s (umbral %dKB) | %s",
+            state_name, nbytes // 1024, event, STATE_SIZE_WARN_BYTES // 1024, top,
+        )
+
+
+def state_size_stats() -> dict[str, Any]:
+    """Snapshot: por state, por state+evento y último desglose por mixin."""
+    with _lock:
+        return {
+            "warn_bytes": STATE_SIZE_WARN_BYTES,
+            "states": {name: s.as_dict() for name, s in _states.items()},
+            "events": {
+                f"{state}|{event}": s.as_dict() for (state, event), s in _events.items()
+            },
+            "breakdown": {name: dict(groups) for name, groups in _breakdowns.items()},
+        }
+
+
+def reset_state_size_stats() -> None:
+    """Reinicia los contadores (tests / mantenimiento)."""
+    with _lock:
+        _states.clear()
+        _events.clear()
+        _breakdowns.clear()
+        _warned.clear()
+
+
+class StateSizeMiddleware(Middleware):
+    """Anota el evento en curso para atribuirle la serialización del state."""
+
+    async def preprocess(self, app, state, event):
+        set_current_event(getattr(event, "name", "") or _UNKNOWN_EVENT)
+        return None
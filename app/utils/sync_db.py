@@ -0,0 +1,189 @@
+"""Pool acotado de threads para trabajo síncrono de BD desde los states.
+
+Cada réplica corre un único event loop: un ``rx.session()`` dentro de un
+handler bloquea los websockets de *todos* los usuarios mientras dura la query.
+:func:`run_sync_db` ejecuta ese trabajo en un ``ThreadPoolExecutor`` acotado
+(``SYNC_DB_MAX_WORKERS``) y limita cuántos slots puede ocupar una misma empresa
+a la vez (``SYNC_DB_TENANT_LIMIT``), para que un supervisor abriendo el
+dashboard no deje sin hilos a los cajeros de otras empresas.
+
+El contexto (``contextvars``: tenant actual) se copia al thread, igual que
+``asyncio.to_thread``. El handler sigue siendo dueño del state mientras espera:
+el trabajo puede leer/escribir ``self`` porque el coroutine está suspendido
+hasta que el thread termina.
+
+Uso::
+
+    from app.utils.sync_db import run_sync_db
+
+    await run_sync_db(
+        self._load_dashboard_data,
+        company_id=self._company_id(),
+        operation="dashboard",
+    )
+
+Métricas por operación en :func:`sync_db_stats`.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, TypeVar
+
+from app.utils.performance import log_slow_query
+
+T = TypeVar("T")
+
+# Debe quedar por debajo del pool de conexiones sync (cada worker retiene una).
+SYNC_DB_MAX_WORKERS = max(1, int(os.getenv("SYNC_DB_MAX_WORKERS", "8")))
+# Slots simultáneos por empresa; el resto de sus pedidos espera en cola.
+SYNC_DB_TENANT_LIMIT = max(1, int(os.getenv("SYNC_DB_TENANT_LIMIT", "2")))
+
+
+@dataclass
+class _OperationStats:
+    calls: int = 0
+    errors: int = 0
+    wait_seconds: float = 0.0
+    run_seconds: float = 0.0
+    max_run_seconds: float = 0.0
+
+
+_executor: ThreadPoolExecutor | None = None
+_lock = threading.Lock()
+_stats: dict[str, _OperationStats] = {}
+_in_flight = 0
+_waiting = 0
+
+# Los semáforos asyncio quedan atados al loop donde esperan por primera vez;
+# si el loop cambia (tests, reinicio del worker) se descartan.
+_tenant_semaphores: dict[int, asyncio.Semaphore] = {}
+_semaphores_loop: asyncio.AbstractEventLoop | None = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=SYNC_DB_MAX_WORKERS,
+                thread_name_prefix="sync-db",
+            )
+        return _executor
+
+
+def _tenant_semaphore(company_id: int | None) -> asyncio.Semaphore | None:
+    global _semaphores_loop
+    if not company_id:
+        return None
+    loop = asyncio.get_running_loop()
+    if _semaphores_loop is not loop:
+        _tenant_semaphores.clear()
+        _semaphores_loop = loop
+    semaphore = _tenant_semaphores.get(company_id)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(SYNC_DB_TENANT_LIMIT)
+        _tenant_semaphores[company_id] = semaphore
+    return semaphore
+
+
+def _record(operation: str, *, wait: float, run: float, failed: bool) -> None:
+    with _lock:
+        stats = _stats.setdefault(operation, _OperationStats())
+        stats.calls += 1
+        stats.errors += int(failed)
+        stats.wait_seconds += wait
+        stats.run_seconds += run
+        stats.max_run_seconds = max(stats.max_run_seconds, run)
+
+
+async def run_sync_db(
+    fn: Callable[..., T],
+    /,
+    *args: Any,
+    company_id: int | None = None,
+    operation: str | None = None,
+    **kwargs: Any,
+) -> T:
+    """Ejecuta ``fn(*args, **kwargs)`` en el pool sync sin bloquear el loop.
+
+    ``company_id`` activa el límite por tenant (None = sin límite propio, sólo
+    el del pool). ``operation`` etiqueta las métricas; por defecto, el nombre
+    de la función. Las excepciones de ``fn`` se propagan al caller.
+    """
+    global _in_flight, _waiting
+    name = operation or getattr(fn, "__qualname__", None) or repr(fn)
+    queued_at = time.perf_counter()
+    timing = {"started": queued_at, "finished": queued_at}
+
+    def _timed_call() -> T:
+        timing["started"] = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            timing["finished"] = time.perf_counter()
+
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, _timed_call)
+    semaphore = _tenant_semaphore(company_id)
+    failed = False
+
+    with _lock:
+        _waiting += 1
+    try:
+        if semaphore is not None:
+            await semaphore.acquire()
+    finally:
+        with _lock:
+            _waiting -= 1
+
+    with _lock:
+        _in_flight += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_executor(), call)
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        with _lock:
+            _in_flight -= 1
+        if semaphore is not None:
+            semaphore.release()
+        run = max(0.0, timing["finished"] - timing["started"])
+        wait = max(0.0, timing["started"] - queued_at)
+        _record(name, wait=wait, run=run, failed=failed)
+        log_slow_query(f"sync_db:{name}", run, extra_context={"company_id": company_id})
+
+
+def sync_db_stats() -> dict[str, Any]:
+    """Snapshot de métricas del pool: ocupación actual y totales por operación."""
+    with _lock:
+        return {
+            "max_workers": SYNC_DB_MAX_WORKERS,
+            "tenant_limit": SYNC_DB_TENANT_LIMIT,
+            "in_flight": _in_flight,
+            "waiting": _waiting,
+            "operations": {
+                name: {
+                    "calls": s.calls,
+                    "errors": s.errors,
+                    "wait_seconds": round(s.wait_seconds, 6),
+                    "run_seconds": round(s.run_seconds, 6),
+                    "max_run_seconds": round(s.max_run_seconds, 6),
+                }
+                for name, s in _stats.items()
+            },
+        }
+
+
+def reset_sync_db_stats() -> None:
+    """Reinicia los contadores (tests / mantenimiento)."""
+    with _lock:
+        _stats.clear()
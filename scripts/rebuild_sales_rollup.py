@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Reconstruye (o verifica) los rollups diarios de ventas desde Sale/SaleItem.
+
+Idempotente: borra y recalcula los días del rango por sucursal, en una
+transacción por sucursal. Usar después de la migración ``z3c4d5e6`` y para
+reparar desvíos que detecte ``--check``.
+
+Uso (desde la raíz del proyecto, con el venv activado):
+    python scripts/rebuild_sales_rollup.py --all
+    python scripts/rebuild_sales_rollup.py --company 1 --branch 2 --from 2026-01-01 --to 2026-01-31
+    python scripts/rebuild_sales_rollup.py --all --check      # solo compara, exit 1 si difiere
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+from datetime import date
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+log = logging.getLogger(__name__)
+
+
+def _parse_day(value: str | None) -> date | None:
+    return date.fromisoformat(value) if value else None
+
+
+def _targets(session, args: argparse.Namespace) -> list[tuple[int, int, date, date]]:
+    """(company_id, branch_id, desde, hasta) a procesar."""
+    from sqlmodel import func, select
+
+    from app.models import Sale
+    from app.services.sales_rollup_service import resolve_tenant_clock
+
+    query = select(
+        Sale.company_id, Sale.branch_id, func.min(Sale.timestamp), func.max(Sale.timestamp)
+    ).group_by(Sale.company_id, Sale.branch_id)
+    if not args.all:
+        query = query.where(Sale.company_id == args.company, Sale.branch_id == args.branch)
+
+    targets = []
+    for company_id, branch_id, first_ts, last_ts in session.exec(query).all():
+        if first_ts is None:
+            continue
+        clock = resolve_tenant_clock(session, company_id, branch_id)
+        start_day = _parse_day(args.date_from) or clock.local(first_ts).date()
+        end_day = _parse_day(args.date_to) or clock.local(last_ts).date()
+        targets.append((company_id, branch_id, start_day, end_day))
+    return targets
+
+
+def main(args: argparse.Namespace) -> int:
+    from dotenv import load_dotenv
+
+    load_dotenv(ROOT / ".env")
+
+    import rxconfig  # noqa: F401 — construye DB_URL y configura pool
+
+    from sqlalchemy import create_engine
+    from sqlmodel import Session
+
+    from app.services.sales_rollup_service import check_sales_rollup, rebuild_sales_rollup
+    from app.utils.tenant import tenant_bypass
+
+    engine = create_engine(rxconfig.DB_URL, echo=False)
+    failed = False
+
+    with tenant_bypass(), Session(engine) as session:
+        targets = _targets(session, args)
+        if not targets:
+            log.info("No hay ventas para los filtros indicados. Nada que hacer.")
+            return 0
+
+        for company_id, branch_id, start_day, end_day in targets:
+            label = f"empresa={company_id} sucursal={branch_id} [{start_day} → {end_day}]"
+            if args.check:
+                mismatches = check_sales_rollup(session, company_id, branch_id, start_day, end_day)
+                session.rollback()
+                if mismatches:
+                    failed = True
+                    log.info("DIFERENCIAS %s: %d", label, len(mismatches))
+                    for m in mismatches[:20]:
+                        log.info(
+                            "  %s %s %s: esperado=%s actual=%s",
+                            m.table, m.key, m.column, m.expected, m.actual,
+                        )
+                else:
+                    log.info("OK %s", label)
+                continue
+
+            try:
+                written = rebuild_sales_rollup(session, company_id, branch_id, start_day, end_day)
+                session.commit()
+            except Exception:
+                session.rollback()
+                failed = True
+                log.exception("ERROR reconstruyendo %s", label)
+                continue
+            log.info("Reconstruido %s: %d filas", label, written)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Reconstruye o verifica los rollups diarios de ventas."
+    )
+    scope = parser.add_mutually_exclusive_group(required=True)
+    scope.add_argument("--all", action="store_true", help="Todas las sucursales con ventas.")
+    scope.add_argument("--company", type=int, help="ID de empresa (requiere --branch).")
+    parser.add_argument("--branch", type=int, help="ID de sucursal.")
+    parser.add_argument("--from", dest="date_from", help="Día local inicial (YYYY-MM-DD).")
+    parser.add_argument("--to", dest="date_to", help="Día local final (YYYY-MM-DD).")
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="No escribe: compara rollup vs recálculo y sale con código 1 si difiere.",
+    )
+    args = parser.parse_args()
+    if args.company is not None and args.branch is None:
+        parser.error("--company requiere --branch")
+    sys.exit(main(args))
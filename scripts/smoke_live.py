@@ -315,7 +315,7 @@ def setup_smoke_data() -> SmokeContext:
 def flow_login_multiempresa(ctx: SmokeContext) -> str:
     auth_a = AuthState()
     auth_a.needs_initial_admin = False
-    auth_a.login({"email": ctx.user_a_email, "password": ctx.user_a_password})
+    asyncio.run(auth_a.login({"email": ctx.user_a_email, "password": ctx.user_a_password}))
     if auth_a.error_message:
         raise AssertionError(f"Login empresa A fallo: {auth_a.error_message}")
     payload_a = decode_token(auth_a.token)
@@ -332,7 +332,7 @@ def flow_login_multiempresa(ctx: SmokeContext) -> str:
 
     auth_b = AuthState()
     auth_b.needs_initial_admin = False
-    auth_b.login({"email": ctx.user_b_email, "password": ctx.user_b_password})
+    asyncio.run(auth_b.login({"email": ctx.user_b_email, "password": ctx.user_b_password}))
     if auth_b.error_message:
         raise AssertionError(f"Login empresa B fallo: {auth_b.error_message}")
     payload_b = decode_token(auth_b.token)
@@ -352,7 +352,7 @@ def flow_login_multiempresa(ctx: SmokeContext) -> str:
 def flow_role_creation_by_tenant(ctx: SmokeContext) -> str:
     auth = AuthState()
     auth.needs_initial_admin = False
-    auth.login({"email": ctx.user_a_email, "password": ctx.user_a_password})
+    asyncio.run(auth.login({"email": ctx.user_a_email, "password": ctx.user_a_password}))
     if auth.error_message:
         raise AssertionError(f"No se pudo autenticar admin de A: {auth.error_message}")
 
@@ -22,6 +22,11 @@ Escenarios
 - ``hydrate``: dispara el evento de estado real ``...on_load_internal`` y espera
   el delta -> mide el pipeline completo (state manager + Redis). Sin auth.
 - ``supervisor``: login -> re-hidratar (lectura). Requiere entorno de PRUEBA.
+- ``login_storm``: login -> logout en bucle, todas las conexiones a la vez (la
+  tormenta de reconexión tras un deploy). Cada vuelta recorre el camino completo
+  de credenciales (rate limit + bcrypt en el pool + carga de usuario); el p95 de
+  ``login`` es la métrica. Un rechazo por cola de hashing llena
+  (``LOGIN_HASH_MAX_QUEUE``) vuelve como delta con error_message, no como timeout.
 - ``cajero``: login -> agregar producto(s) -> confirmar venta. **ESCRIBE ventas**
   -> correr SOLO contra un schema descartable, NUNCA `sistema_ventas`.
 
@@ -36,6 +41,10 @@ Uso
     WS_TARGET=http://localhost:8000 \
       python scripts/ws_load.py --scenario ping --ramp 10,50,100,200 --duration 30
 
+    # tormenta de logins (reconexión post-deploy) con un usuario de prueba:
+    python scripts/ws_load.py --scenario login_storm --ramp 10,50 --think-ms 0 \
+      --login-user supervisor1 --login-pass secret
+
     # escenario cajero contra un schema descartable, con creds e ids de prueba:
     python scripts/ws_load.py --scenario cajero --ramp 10,25 \
       --login-user cajero1 --login-pass secret --product-ids 1,2,3
@@ -156,6 +165,12 @@ def build_scenario(name: str, args: argparse.Namespace,
         return [login], [Step("rehydrate", "event",
                               {"name": ON_LOAD_INTERNAL, "payload": {}, "router_data": _router_data()})]
 
+    if name == "login_storm":
+        # logout borra el token: el siguiente login no toma el fast path del JWT.
+        return [], [login, Step("logout", "event", {
+            "name": f"{sn}.logout", "payload": {}, "router_data": _router_data(),
+        })]
+
     if name == "cajero":
         # Secuencia real del POS (verificada contra sesión viva): agregar producto(s)
         # -> elegir método de pago -> ingresar efectivo -> confirmar. confirm_sale
@@ -386,7 +401,8 @@ def _print_table(rows: list[LevelStats], slo_p95: float) -> None:
 async def main() -> None:
     parser = argparse.ArgumentParser(description="Harness de carga websocket Reflex (P2).")
     parser.add_argument("--target", default=os.getenv("WS_TARGET", "http://localhost:8000"))
-    parser.add_argument("--scenario", choices=["ping", "hydrate", "supervisor", "cajero"],
+    parser.add_argument("--scenario",
+                        choices=["ping", "hydrate", "supervisor", "login_storm", "cajero"],
                         default="ping")
     parser.add_argument("--ramp", default="10,50,100,200")
     parser.add_argument("--duration", type=int, default=30, help="Segundos de MEDICIÓN por nivel.")
@@ -412,7 +428,7 @@ async def main() -> None:
               file=sys.stderr)
         sys.exit(2)
 
-    if args.scenario in ("supervisor", "cajero") and not (args.login_user and args.login_pass):
+    if args.scenario in ("supervisor", "login_storm", "cajero") and not (args.login_user and args.login_pass):
         print(f"ERROR: el escenario '{args.scenario}' requiere --login-user y --login-pass "
               "(o WS_LOGIN_USER/WS_LOGIN_PASS). Ver §4 del plan (necesita schema de prueba).",
               file=sys.stderr)
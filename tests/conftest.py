@@ -9,6 +9,14 @@ os.environ.setdefault("AUTH_SECRET_KEY", "test_secret_key_for_pytest_only_32_cha
 
 from app.models import Product, Sale, Unit
 from app.schemas.sale_schemas import PaymentCashDTO, PaymentInfoDTO, SaleItemDTO
+from app.utils.performance import capture_queries, record_statement
+
+
+def _statement_text(statement) -> str:
+    try:
+        return str(statement)
+    except Exception:
+        return type(statement).__name__
 
 
 class ExecResult:
@@ -55,6 +63,9 @@ class _QueueingExecMock:
     async def __call__(self, *args, **kwargs):
         self.call_count += 1
         self.call_args_list.append(call(*args, **kwargs))
+        # Cuenta como query para los presupuestos de @pytest.mark.max_queries.
+        if args:
+            record_statement(_statement_text(args[0]))
         if self._side_effect_queue:
             return self._side_effect_queue.pop(0)
         return self._return_value
@@ -85,6 +96,28 @@ class FakeAsyncSession:
                 obj.id = 1
 
 
+@pytest.fixture
+def query_counter():
+    """Unidad con todas las queries del test (engines reales y FakeAsyncSession)."""
+    with capture_queries("test") as unit:
+        yield unit
+
+
+@pytest.fixture(autouse=True)
+def _query_budget(request):
+    """``@pytest.mark.max_queries(n)``: falla si el test ejecuta más de n queries."""
+    marker = request.node.get_closest_marker("max_queries")
+    if marker is None:
+        yield
+        return
+    budget = int(marker.args[0] if marker.args else marker.kwargs["n"])
+    with capture_queries(request.node.name) as unit:
+        yield
+    assert unit.count <= budget, (
+        f"Presupuesto de queries excedido ({unit.count} > {budget})\n{unit.describe()}"
+    )
+
+
 @pytest.fixture
 def session_mock():
     return FakeAsyncSession()
@@ -0,0 +1,356 @@
+"""FECAESolicitar en lote — varios comprobantes por request.
+
+Corre contra un WSFEv1 local mínimo (``asyncio.start_server``) que responde
+FECompUltimoAutorizado y FECAESolicitar como AFIP: un ``FECAEDetResponse``
+por registro, autoriza sólo si la numeración sigue al último autorizado.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import re
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+os.environ.setdefault("AUTH_SECRET_KEY", "test-secret-key-for-afip-tests")
+os.environ.setdefault("TENANT_STRICT", "0")
+
+import app.services.afip_wsfe as wsfe
+import app.services.billing_service as billing
+from app.enums import FiscalStatus, ReceiptType
+from app.services.afip_wsaa import WSAACredentials
+from app.services.afip_wsfe import (
+    WSFE_MAX_CANT_REG,
+    FECAERequest,
+    _build_fecae_lote_xml,
+    _build_fecae_request_xml,
+    fe_cae_solicitar_lote,
+)
+from app.services.billing_service import AFIPBillingStrategy
+from app.utils.http_client import close_http_clients, reset_http_breakers
+
+
+class _WSFEStub:
+    """WSFEv1 falso: numeración por cbte_tipo y un CAE por registro aprobado."""
+
+    def __init__(self, last: int = 0):
+        self.last: dict[int, int] = {}
+        self.default_last = last
+        self.reject: set[int] = set()
+        self.calls: list[tuple[str, int]] = []  # (SOAPAction, CantReg)
+        self._server: asyncio.AbstractServer | None = None
+
+    async def __aenter__(self) -> "_WSFEStub":
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}/wsfev1/service.asmx"
+
+    def soap_calls(self, action: str) -> list[int]:
+        return [cant for name, cant in self.calls if name == action]
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                head = (await reader.readuntil(b"\r\n\r\n")).decode()
+                length = 0
+                action = ""
+                for line in head.split("\r\n"):
+                    name, _, value = line.partition(":")
+                    if name.lower() == "content-length":
+                        length = int(value)
+                    elif name.lower() == "soapaction":
+                        action = value.strip().strip('"').rsplit("/", 1)[-1]
+                body = (await reader.readexactly(length)).decode() if length else ""
+                payload = self._respond(action, body).encode()
+                writer.write(
+                    f"HTTP/1.1 200 OK\r\nContent-Type: text/xml\r\n"
+                    f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def _respond(self, action: str, body: str) -> str:
+        cbte_tipo = int(re.search(r"<wsfe:CbteTipo>(\d+)<", body).group(1))
+        last = self.last.get(cbte_tipo, self.default_last)
+        if action == "FECompUltimoAutorizado":
+            self.calls.append((action, 0))
+            return _envelope(
+                "FECompUltimoAutorizadoResponse",
+                "FECompUltimoAutorizadoResult",
+                f"<PtoVta>1</PtoVta><CbteTipo>{cbte_tipo}</CbteTipo>"
+                f"<CbteNro>{last}</CbteNro>",
+            )
+
+        cant_reg = int(re.search(r"<wsfe:CantReg>(\d+)<", body).group(1))
+        self.calls.append((action, cant_reg))
+        dets = []
+        for nro in map(int, re.findall(r"<wsfe:CbteDesde>(\d+)<", body)):
+            if nro == last + 1 and nro not in self.reject:
+                last = nro
+                dets.append(
+                    f"<FECAEDetResponse><Resultado>A</Resultado>"
+                    f"<CbteDesde>{nro}</CbteDesde><CbteHasta>{nro}</CbteHasta>"
+                    f"<CAE>7{nro:013d}</CAE><CAEFchVto>20261031</CAEFchVto>"
+                    f"</FECAEDetResponse>"
+                )
+            else:
+                dets.append(
+                    f"<FECAEDetResponse><Resultado>R</Resultado>"
+                    f"<CbteDesde>{nro}</CbteDesde><CbteHasta>{nro}</CbteHasta>"
+                    f"<Observaciones><Obs><Code>10016</Code>"
+                    f"<Msg>El numero no es el proximo a autorizar</Msg></Obs>"
+                    f"</Observaciones></FECAEDetResponse>"
+                )
+        self.last[cbte_tipo] = last
+        # AFIP no garantiza el orden de los detalles: se asocian por CbteDesde.
+        dets.reverse()
+        return _envelope(
+            "FECAESolicitarResponse",
+            "FECAESolicitarResult",
+            f"<FeCabResp><CantReg>{cant_reg}</CantReg></FeCabResp>"
+            f"<FeDetResp>{''.join(dets)}</FeDetResp>",
+        )
+
+
+def _envelope(response: str, result: str, inner: str) -> str:
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">'
+        f'<soap:Body><{response} xmlns="http://ar.gov.afip.dif.FEV1/">'
+        f"<{result}>{inner}</{result}>"
+        f"</{response}></soap:Body></soap:Envelope>"
+    )
+
+
+@pytest.fixture(autouse=True)
+async def _clean_clients():
+    reset_http_breakers()
+    yield
+    await close_http_clients()
+    reset_http_breakers()
+
+
+@pytest.fixture
+async def wsfe_stub(monkeypatch):
+    async with _WSFEStub() as stub:
+        monkeypatch.setitem(wsfe.WSFE_URLS, "sandbox", stub.url)
+        yield stub
+
+
+def _request(nro: int, **overrides) -> FECAERequest:
+    fields = dict(
+        cbte_tipo=11,
+        punto_vta=1,
+        concepto=1,
+        tipo_doc=99,
+        nro_doc=0,
+        cbte_desde=nro,
+        cbte_hasta=nro,
+        fecha_cbte="20261016",
+        imp_total=100.0,
+        imp_tot_conc=100.0,
+        imp_neto=0.0,
+        imp_iva=0.0,
+        imp_trib=0.0,
+        imp_op_ex=0.0,
+    )
+    fields.update(overrides)
+    return FECAERequest(**fields)
+
+
+# ═════════════════════════════════════════════════════════════
+# XML del lote
+# ═════════════════════════════════════════════════════════════
+
+
+class TestLoteXML:
+    def test_cant_reg_and_one_detail_per_record(self):
+        xml = _build_fecae_lote_xml("T", "S", 20345678906, [_request(n) for n in (5, 6, 7)])
+        assert "<wsfe:CantReg>3</wsfe:CantReg>" in xml
+        assert xml.count("<wsfe:FECAEDetRequest>") == 3
+        assert xml.count("<wsfe:FeCabReq>") == 1
+
+    def test_single_builder_is_a_lote_of_one(self):
+        assert _build_fecae_request_xml("T", "S", 1, _request(5)) == _build_fecae_lote_xml(
+            "T", "S", 1, [_request(5)]
+        )
+
+    def test_mixed_cbte_tipo_is_rejected(self):
+        with pytest.raises(ValueError, match="único tipo"):
+            _build_fecae_lote_xml("T", "S", 1, [_request(1), _request(2, cbte_tipo=6)])
+
+    def test_ranges_and_oversized_lotes_are_rejected(self):
+        with pytest.raises(ValueError, match="1 comprobante por registro"):
+            _build_fecae_lote_xml("T", "S", 1, [_request(1, cbte_hasta=3)])
+        with pytest.raises(ValueError, match=str(WSFE_MAX_CANT_REG)):
+            _build_fecae_lote_xml(
+                "T", "S", 1, [_request(n) for n in range(1, WSFE_MAX_CANT_REG + 2)]
+            )
+
+
+# ═════════════════════════════════════════════════════════════
+# fe_cae_solicitar_lote contra el stub
+# ═════════════════════════════════════════════════════════════
+
+
+async def test_lote_maps_each_detail_back_by_cbte_desde(wsfe_stub):
+    wsfe_stub.default_last = 4
+    wsfe_stub.reject = {6}
+
+    results = await fe_cae_solicitar_lote(
+        "T", "S", 20345678906, [_request(n) for n in (5, 6, 7)]
+    )
+
+    assert wsfe_stub.soap_calls("FECAESolicitar") == [3]
+    assert [(r.cbte_nro, r.resultado) for r in results] == [(5, "A"), (6, "R"), (7, "R")]
+    assert results[0].success and results[0].cae == "70000000000005"
+    assert "[10016]" in results[1].observations[0]
+
+
+async def test_lote_transport_failure_fails_every_record(monkeypatch):
+    monkeypatch.setitem(wsfe.WSFE_URLS, "sandbox", "http://127.0.0.1:9/wsfe")
+
+    results = await fe_cae_solicitar_lote("T", "S", 1, [_request(1), _request(2)])
+
+    assert [r.success for r in results] == [False, False]
+    assert all(r.resultado == "" and r.errors for r in results)
+
+
+# ═════════════════════════════════════════════════════════════
+# AFIPBillingStrategy.send_documents
+# ═════════════════════════════════════════════════════════════
+
+
+def _config():
+    config = MagicMock()
+    config.company_id = 1
+    config.tax_id = "20345678906"
+    config.environment = "sandbox"
+    config.afip_punto_venta = 1
+    config.emisor_iva_condition = "monotributo"
+    config.encrypted_certificate = "encrypted_cert"
+    config.encrypted_private_key = "encrypted_key"
+    config.afip_concepto = 1
+    return config
+
+
+def _entry(nro: int):
+    doc = MagicMock()
+    doc.fiscal_number = nro
+    doc.receipt_type = ReceiptType.boleta
+    doc.total_amount = Decimal("100.00")
+    doc.buyer_doc_type = "99"
+    doc.buyer_doc_number = "0"
+    doc.serie = "0001"
+    doc.fiscal_status = FiscalStatus.pending
+    doc.fiscal_errors = None
+    doc.retry_count = 0
+    sale = MagicMock()
+    sale.id = 100 + nro
+    sale.timestamp = None
+    return doc, sale, []
+
+
+@pytest.fixture
+def wsaa():
+    creds = WSAACredentials(token="T", sign="S", expiration=999999999999.0)
+    with patch("app.services.afip_wsaa.authenticate", AsyncMock(return_value=creds)) as mock:
+        yield mock
+
+
+async def test_contiguous_documents_go_in_one_request(wsfe_stub, wsaa):
+    wsfe_stub.default_last = 4
+    entries = [_entry(n) for n in (6, 5, 7)]
+
+    docs = await AFIPBillingStrategy().send_documents(entries, _config())
+
+    assert [d.fiscal_status for d in docs] == [FiscalStatus.authorized] * 3
+    assert [d.cae_cdr for d in docs] == ["70000000000006", "70000000000005", "70000000000007"]
+    assert wsfe_stub.soap_calls("FECAESolicitar") == [3]
+    assert len(wsfe_stub.soap_calls("FECompUltimoAutorizado")) == 1
+    assert wsaa.await_count == 1
+    assert all(d.retry_count == 1 for d in docs)
+
+
+async def test_lotes_are_capped_by_batch_size(wsfe_stub, wsaa, monkeypatch):
+    monkeypatch.setattr(billing, "AFIP_WSFE_BATCH_SIZE", 2)
+
+    docs = await AFIPBillingStrategy().send_documents(
+        [_entry(n) for n in range(1, 6)], _config()
+    )
+
+    assert all(d.fiscal_status == FiscalStatus.authorized for d in docs)
+    assert wsfe_stub.soap_calls("FECAESolicitar") == [2, 2, 1]
+
+
+async def test_numbering_gap_falls_back_to_single_sends(wsfe_stub, wsaa):
+    """Sólo va en lote el tramo contiguo desde el último autorizado en AFIP."""
+    wsfe_stub.default_last = 4
+    entries = [_entry(n) for n in (5, 6, 9)]
+
+    docs = await AFIPBillingStrategy().send_documents(entries, _config())
+
+    assert [d.fiscal_status for d in docs] == [
+        FiscalStatus.authorized,
+        FiscalStatus.authorized,
+        FiscalStatus.rejected,
+    ]
+    assert wsfe_stub.soap_calls("FECAESolicitar") == [2, 1]
+
+
+async def test_rejected_record_sends_the_rest_one_by_one(wsfe_stub, wsaa, monkeypatch):
+    monkeypatch.setattr(billing, "AFIP_WSFE_BATCH_SIZE", 2)
+    wsfe_stub.reject = {2}
+
+    docs = await AFIPBillingStrategy().send_documents(
+        [_entry(n) for n in range(1, 5)], _config()
+    )
+
+    assert [d.fiscal_status for d in docs] == [
+        FiscalStatus.authorized,
+        FiscalStatus.rejected,
+        FiscalStatus.rejected,
+        FiscalStatus.rejected,
+    ]
+    assert wsfe_stub.soap_calls("FECAESolicitar") == [2, 1, 1]
+
+
+async def test_transport_failure_leaves_documents_retryable(wsaa, monkeypatch):
+    monkeypatch.setitem(wsfe.WSFE_URLS, "sandbox", "http://127.0.0.1:9/wsfe")
+    monkeypatch.setattr(
+        wsfe,
+        "fe_comp_ultimo_autorizado",
+        AsyncMock(return_value=wsfe.UltimoAutorizadoResult(success=True, cbte_nro=0)),
+    )
+
+    docs = await AFIPBillingStrategy().send_documents(
+        [_entry(n) for n in (1, 2, 3)], _config()
+    )
+
+    assert [d.fiscal_status for d in docs] == [FiscalStatus.error] * 3
+    assert json.loads(docs[0].fiscal_errors)["tipo"] == "wsfe_lote"
+
+
+async def test_wsaa_failure_marks_every_document(wsaa):
+    wsaa.side_effect = ConnectionError("Timeout")
+
+    docs = await AFIPBillingStrategy().send_documents(
+        [_entry(n) for n in (1, 2)], _config()
+    )
+
+    assert [d.fiscal_status for d in docs] == [FiscalStatus.error] * 2
+    assert "conectar" in docs[1].fiscal_errors
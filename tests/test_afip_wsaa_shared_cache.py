@@ -0,0 +1,277 @@
+"""Cache compartido de tickets WSAA — :mod:`app.services.afip_wsaa` con Redis.
+
+Redis se reemplaza por un fake en memoria y LoginCms por un mock que cuenta
+los logins; cada "réplica" es un proceso sin cache local ni lock propio.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import fnmatch
+import itertools
+import os
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+os.environ.setdefault("TENANT_STRICT", "0")
+
+import app.services.afip_wsaa as wsaa
+import app.utils.db as db_module
+from app.models import Company
+from app.models.billing import CompanyBillingConfig
+from app.services.afip_wsaa import (
+    WSAAAlreadyAuthenticated,
+    WSAACredentials,
+    authenticate,
+    clear_cache,
+    invalidate_credentials,
+    refresh_expiring_credentials,
+)
+from app.utils.tenant import tenant_bypass
+
+_KEY = "1:sandbox:wsfe"
+
+_ALREADY_AUTHENTICATED_FAULT = (
+    '<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/">'
+    "<soapenv:Body><soapenv:Fault>"
+    '<faultcode xmlns:ns1="http://xml.apache.org/axis/">ns1:coe.alreadyAuthenticated</faultcode>'
+    "<faultstring>El CEE ya posee un TA valido para el acceso al WSN solicitado</faultstring>"
+    "</soapenv:Fault></soapenv:Body></soapenv:Envelope>"
+)
+
+
+class _FakeRedis:
+    """Subconjunto de ``redis.asyncio.Redis`` que usa afip_wsaa."""
+
+    def __init__(self):
+        self.data: dict[str, str] = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def exists(self, key):
+        return int(key in self.data)
+
+    async def delete(self, *keys):
+        return sum(1 for key in keys if self.data.pop(key, None) is not None)
+
+    async def eval(self, _script, _numkeys, key, token):
+        if self.data.get(key) == token:
+            del self.data[key]
+            return 1
+        return 0
+
+    async def scan_iter(self, match):
+        for key in list(self.data):
+            if fnmatch.fnmatch(key, match):
+                yield key
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    fake = _FakeRedis()
+    monkeypatch.setattr(wsaa, "_get_shared_redis", lambda: fake)
+    monkeypatch.setattr(wsaa, "_SHARED_WAIT_POLL_SECONDS", 0.01)
+    clear_cache()
+    yield fake
+    clear_cache()
+
+
+@pytest.fixture
+def login(monkeypatch):
+    tokens = itertools.count(1)
+
+    async def _login(company_id, cert, key, environment, service):
+        await asyncio.sleep(0.05)
+        return WSAACredentials(
+            token=f"T{next(tokens)}", sign="S", expiration=time.time() + 12 * 3600,
+            service=service,
+        )
+
+    mock = AsyncMock(side_effect=_login)
+    monkeypatch.setattr(wsaa, "_login_cms", mock)
+    return mock
+
+
+def _new_replica(monkeypatch):
+    """Proceso nuevo: sin tickets en memoria y con sus propios locks."""
+    clear_cache()
+    monkeypatch.setattr(wsaa, "_get_company_lock", AsyncMock(side_effect=lambda _k: asyncio.Lock()))
+
+
+@pytest.mark.asyncio
+async def test_new_replica_reuses_shared_ticket(redis, login, monkeypatch):
+    first = await authenticate(1, "cert", "key")
+    _new_replica(monkeypatch)
+    second = await authenticate(1, "cert", "key")
+
+    assert login.await_count == 1
+    assert (second.token, second.sign) == (first.token, first.sign)
+    stored = redis.data[f"afip:wsaa:ta:{_KEY}"]
+    assert first.token not in stored
+
+
+@pytest.mark.asyncio
+async def test_concurrent_replicas_login_once(redis, login, monkeypatch):
+    _new_replica(monkeypatch)
+
+    results = await asyncio.gather(*(authenticate(1, "cert", "key") for _ in range(5)))
+
+    assert login.await_count == 1
+    assert {creds.token for creds in results} == {"T1"}
+    assert not any(key.startswith("afip:wsaa:lock:") for key in redis.data)
+
+
+@pytest.mark.asyncio
+async def test_released_lock_without_ticket_falls_back_to_own_login(redis, login):
+    redis.data[f"afip:wsaa:lock:{_KEY}"] = "otra-replica"
+
+    async def _other_replica_fails():
+        await asyncio.sleep(0.05)
+        del redis.data[f"afip:wsaa:lock:{_KEY}"]
+
+    creds, _ = await asyncio.gather(authenticate(1, "cert", "key"), _other_replica_fails())
+
+    assert creds.token == "T1"
+    assert login.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_force_refresh_keeps_a_ticket_wsaa_still_considers_valid(redis, login):
+    wsaa.cache_credentials(1, WSAACredentials(token="OLD", sign="S", expiration=time.time() + 900))
+
+    renewed = await authenticate(1, "cert", "key", force_refresh=True)
+
+    assert renewed.token == "OLD"
+    login.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_force_refresh_renews_an_expired_ticket(redis, login):
+    wsaa.cache_credentials(1, WSAACredentials(token="OLD", sign="S", expiration=time.time() - 1))
+
+    renewed = await authenticate(1, "cert", "key", force_refresh=True)
+
+    assert renewed.token == "T1"
+    assert login.await_count == 1
+    assert (await wsaa._load_shared_credentials(_KEY)).token == "T1"
+
+
+@pytest.mark.asyncio
+async def test_already_authenticated_keeps_the_current_ticket(redis, login):
+    # Dentro del margen de renovación: se intenta un login y WSAA lo rechaza.
+    wsaa.cache_credentials(1, WSAACredentials(token="OLD", sign="S", expiration=time.time() + 300))
+    login.side_effect = WSAAAlreadyAuthenticated("coe.alreadyAuthenticated")
+
+    first = await authenticate(1, "cert", "key")
+    again = await authenticate(1, "cert", "key")
+
+    assert (first.token, again.token) == ("OLD", "OLD")
+    assert login.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_already_authenticated_without_a_ticket_is_an_error(redis, login):
+    login.side_effect = WSAAAlreadyAuthenticated("coe.alreadyAuthenticated")
+
+    with pytest.raises(WSAAAlreadyAuthenticated):
+        await authenticate(1, "cert", "key")
+
+
+@pytest.mark.asyncio
+async def test_login_cms_recognizes_already_authenticated_fault(monkeypatch):
+    monkeypatch.setattr(wsaa, "decrypt_credential", lambda value: value)
+    monkeypatch.setattr(wsaa, "sign_tra", lambda *_args: "CMS")
+    response = SimpleNamespace(status_code=500, text=_ALREADY_AUTHENTICATED_FAULT)
+
+    @contextlib.asynccontextmanager
+    async def _client(_name, timeout):
+        yield SimpleNamespace(post=AsyncMock(return_value=response))
+
+    monkeypatch.setattr(wsaa, "http_client", _client)
+
+    with pytest.raises(WSAAAlreadyAuthenticated):
+        await wsaa._login_cms(1, "cert", "key", "sandbox", "wsfe")
+
+
+@pytest.mark.asyncio
+async def test_invalidate_drops_local_and_shared_tickets(redis, login):
+    await authenticate(1, "cert", "key")
+    await authenticate(2, "cert", "key")
+
+    await invalidate_credentials(1)
+
+    assert wsaa.get_cached_credentials(1) is None
+    assert f"afip:wsaa:ta:{_KEY}" not in redis.data
+    assert "afip:wsaa:ta:2:sandbox:wsfe" in redis.data
+
+
+@pytest.mark.asyncio
+async def test_without_redis_cache_is_per_process(login, monkeypatch):
+    monkeypatch.setattr(wsaa, "_get_shared_redis", lambda: None)
+    clear_cache()
+
+    await asyncio.gather(*(authenticate(1, "cert", "key") for _ in range(3)))
+    clear_cache()
+    await authenticate(1, "cert", "key")
+
+    assert login.await_count == 2
+
+
+@pytest_asyncio.fixture
+async def engine(monkeypatch):
+    engine = create_async_engine("sqlite+aiosqlite://", echo=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+    @contextlib.asynccontextmanager
+    async def _session():
+        async with AsyncSession(engine) as session:
+            yield session
+
+    monkeypatch.setattr(db_module, "get_async_session", _session)
+    yield engine
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_refresh_only_renews_expired_cached_tickets(engine, redis, login):
+    company_ids = []
+    async with AsyncSession(engine) as session:
+        with tenant_bypass():
+            for ruc in ("20111111112", "20222222223", "20333333334"):
+                company = Company(name="Co", ruc=ruc)
+                session.add(company)
+                await session.flush()
+                session.add(CompanyBillingConfig(
+                    company_id=company.id,
+                    country="AR",
+                    is_active=True,
+                    encrypted_certificate="cert",
+                    encrypted_private_key="key",
+                ))
+                company_ids.append(company.id)
+            await session.commit()
+    expired, valid, _never_used = company_ids
+    wsaa.cache_credentials(expired, WSAACredentials("OLD", "S", time.time() - 60))
+    # Vence pronto pero sigue vigente: WSAA rechazaría el login.
+    wsaa.cache_credentials(valid, WSAACredentials("NEW", "S", time.time() + 900))
+
+    assert await refresh_expiring_credentials() == 1
+
+    assert login.await_count == 1
+    assert login.await_args.args[0] == expired
+    assert wsaa.get_cached_credentials(valid).token == "NEW"
@@ -220,3 +220,35 @@ class TestUtcnowIso:
         from app.api import _utcnow_iso
 
         assert _utcnow_iso().endswith("Z")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Tests: /api/metrics
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+class TestMetrics:
+    @pytest.mark.asyncio
+    async def test_metrics_exposes_prometheus_text(self):
+        from app.api import _metrics
+
+        with patch("app.api.METRICS_TOKEN", ""):
+            resp = await _metrics(_make_request())
+
+        assert resp.status_code == 200
+        assert resp.media_type.startswith("text/plain; version=0.0.4")
+        assert b"# TYPE tuwayki_event_duration_seconds histogram" in resp.body
+
+    @pytest.mark.asyncio
+    async def test_metrics_requires_bearer_token_when_configured(self):
+        from app.api import _metrics
+
+        request = MagicMock()
+        request.headers = {"authorization": "Bearer otro"}
+        with patch("app.api.METRICS_TOKEN", "secreto"):
+            denied = await _metrics(request)
+            request.headers = {"authorization": "Bearer secreto"}
+            allowed = await _metrics(request)
+
+        assert denied.status_code == 401
+        assert allowed.status_code == 200
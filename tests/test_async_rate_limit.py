@@ -0,0 +1,179 @@
+"""Tests del rate limiting async — :mod:`app.utils.async_rate_limit`.
+
+Sin Redis (``REDIS_URL`` vacío, ENV=dev) se ejercita la ventana en memoria,
+que replica la semántica del script Lua.
+
+Cobertura:
+  * Ventana deslizante: check no consume, hit consume sólo si hay cupo.
+  * Multi-clave: basta una clave agotada para bloquear; el hit es todo o nada.
+  * Cache local de "no limitado" y su invalidación al registrar.
+  * Fail-closed en producción sin Redis.
+  * Helpers de login (usuario+IP e IP sola) y decorador para handlers.
+"""
+from __future__ import annotations
+
+import time
+
+import pytest
+
+from app.utils import async_rate_limit
+from app.utils.async_rate_limit import (
+    Limit,
+    add_hits,
+    async_rate_limit_stats,
+    check_limits,
+    clear_login_attempts_async,
+    hit_limits,
+    is_rate_limited_async,
+    rate_limited,
+    record_failed_attempt_async,
+    remaining_lockout_time_async,
+    reset_async_rate_limit,
+    reset_limits,
+)
+
+
+@pytest.fixture(autouse=True)
+def _memory_backend(monkeypatch):
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    monkeypatch.delenv("ALLOW_MEMORY_RATE_LIMIT_FALLBACK", raising=False)
+    monkeypatch.setenv("ENV", "dev")
+    reset_async_rate_limit()
+    yield
+    reset_async_rate_limit()
+
+
+@pytest.mark.asyncio
+async def test_hit_consumes_until_limit_and_reports_retry_after():
+    limit = Limit("lookup:1", 2, 60)
+
+    assert (await hit_limits(limit)).allowed
+    assert (await hit_limits(limit)).allowed
+    blocked = await hit_limits(limit)
+
+    assert not blocked.allowed
+    assert 0 < blocked.retry_after <= 60
+    assert not (await check_limits(limit)).allowed
+
+
+@pytest.mark.asyncio
+async def test_window_slides():
+    limit = Limit("lookup:1", 1, 0.05)
+    assert (await hit_limits(limit)).allowed
+    assert not (await hit_limits(limit)).allowed
+
+    time.sleep(0.06)
+
+    assert (await hit_limits(limit)).allowed
+
+
+@pytest.mark.asyncio
+async def test_multi_key_hit_is_all_or_nothing():
+    user = Limit("login:ana|1.2.3.4", 5, 60)
+    ip = Limit("login_ip:1.2.3.4", 1, 60)
+
+    assert (await hit_limits(user, ip)).allowed
+    assert not (await hit_limits(user, ip)).allowed
+
+    # El rechazo no consumió cupo de la clave de usuario.
+    await reset_limits(ip.key)
+    for _ in range(4):
+        assert (await hit_limits(user)).allowed
+    assert not (await hit_limits(user)).allowed
+
+
+@pytest.mark.asyncio
+async def test_allowed_check_is_cached_locally_until_a_hit_is_recorded():
+    limit = Limit("owner_action:a@b.c", 1, 60)
+
+    assert (await check_limits(limit)).allowed
+    assert (await check_limits(limit)).allowed
+    assert async_rate_limit_stats()["local_hits"] == 1
+
+    await add_hits(limit)
+
+    assert not (await check_limits(limit)).allowed
+
+
+@pytest.mark.asyncio
+async def test_strict_backend_without_redis_fails_closed(monkeypatch):
+    monkeypatch.setenv("ENV", "prod")
+
+    result = await check_limits(Limit("lookup:1", 100, 60))
+
+    assert not result.allowed
+    assert await is_rate_limited_async("ana", ip_address="1.2.3.4")
+
+
+@pytest.mark.asyncio
+async def test_login_helpers_track_user_ip_and_ip_only(monkeypatch):
+    monkeypatch.setattr(async_rate_limit, "LOGIN_MAX_ATTEMPTS_PER_IP", 4)
+
+    for _ in range(3):
+        await record_failed_attempt_async("ana", ip_address="10.0.0.1")
+    assert await is_rate_limited_async("ana", max_attempts=3, ip_address="10.0.0.1")
+    assert await remaining_lockout_time_async(
+        "ana", ip_address="10.0.0.1", max_attempts=3
+    ) >= 1
+    assert not await is_rate_limited_async("ana", max_attempts=3, ip_address="10.0.0.2")
+
+    await clear_login_attempts_async("ana", ip_address="10.0.0.1")
+    assert not await is_rate_limited_async("ana", max_attempts=3, ip_address="10.0.0.1")
+
+    # Otro usuario desde la misma IP agota el cupo por IP (4 fallos en total).
+    await record_failed_attempt_async("beto", ip_address="10.0.0.1")
+    assert await is_rate_limited_async("carla", max_attempts=3, ip_address="10.0.0.1")
+
+
+@pytest.mark.asyncio
+async def test_empty_login_identifier_is_blocked():
+    assert await is_rate_limited_async("   ")
+
+
+class _FakeState:
+    def __init__(self, user_id):
+        self.current_user = {"id": user_id}
+        self.calls = 0
+
+    @rate_limited(
+        "test_handler",
+        limit=1,
+        window_seconds=60,
+        on_limited=lambda result: ("limited", result.allowed),
+    )
+    async def handler(self, value: str):
+        self.calls += 1
+        return value
+
+    @rate_limited("test_gen", limit=1, window_seconds=60, on_limited=lambda r: "limited")
+    async def gen_handler(self):
+        self.calls += 1
+        yield "a"
+        yield "b"
+
+
+@pytest.mark.asyncio
+async def test_decorator_throttles_coroutine_handler_per_user():
+    first, second = _FakeState(1), _FakeState(2)
+
+    assert await first.handler("x") == "x"
+    assert await first.handler("y") == ("limited", False)
+    assert await second.handler("z") == "z"
+    assert first.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_decorator_throttles_async_generator_handler():
+    state = _FakeState(1)
+
+    assert [e async for e in state.gen_handler()] == ["a", "b"]
+    assert [e async for e in state.gen_handler()] == ["limited"]
+    assert state.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_decorator_without_identity_does_not_limit():
+    state = _FakeState(None)
+
+    assert await state.handler("x") == "x"
+    assert await state.handler("y") == "y"
@@ -0,0 +1,195 @@
+"""Cache de códigos de barras del POS (app/services/barcode_cache.py), sin Redis real."""
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import Column, Integer, Numeric, String, create_engine
+from sqlalchemy.orm import Session, declarative_base
+
+import app.services.barcode_cache as barcode_cache
+from app.services.barcode_cache import BarcodeEntry
+
+Base = declarative_base()
+
+
+class _Product(Base):
+    __tablename__ = "product"
+    id = Column(Integer, primary_key=True)
+    company_id = Column(Integer)
+    branch_id = Column(Integer)
+    barcode = Column(String(50))
+    description = Column(String(100))
+    stock = Column(Numeric(18, 4))
+
+
+@pytest.fixture(autouse=True)
+def local_cache(monkeypatch):
+    monkeypatch.setattr(barcode_cache, "_get_redis", lambda: None)
+    barcode_cache.clear_barcode_cache()
+    yield
+    barcode_cache.clear_barcode_cache()
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add(_Product(id=7, company_id=1, branch_id=2, barcode="775", description="Agua", stock=10))
+        db.commit()
+        yield db
+
+
+def _entry(product_id=7, variant_id=None, stock=10):
+    return BarcodeEntry({"product_id": product_id, "stock": stock}, product_id, variant_id)
+
+
+def test_lookup_ignores_case_and_spaces():
+    snapshot = barcode_cache.get_barcode_snapshot(1, 2)
+    snapshot.remember(" ABC-1 ", _entry())
+    assert snapshot.lookup("abc-1").product_id == 7
+    assert barcode_cache.get_barcode_snapshot(1, 2) is snapshot
+
+
+def test_eviction_marks_snapshot_partial():
+    snapshot = barcode_cache.get_barcode_snapshot(1, 2)
+    snapshot.complete = True
+    for idx in range(3):
+        snapshot.remember(f"c{idx}", _entry(product_id=idx), max_entries=2)
+    assert snapshot.lookup("c0") is None
+    assert snapshot.lookup("c2") is not None
+    assert snapshot.complete is False
+
+
+def test_stock_change_only_staled_for_touched_products():
+    snapshot = barcode_cache.get_barcode_snapshot(1, 2)
+    water, soda = _entry(product_id=7), _entry(product_id=8)
+    snapshot.remember("775", water)
+    snapshot.remember("776", soda)
+
+    barcode_cache.mark_barcode_stock_changed(1, 2, [7])
+    assert snapshot.stock_is_stale(water)
+    assert not snapshot.stock_is_stale(soda)
+
+    snapshot.refresh_stock(water, Decimal("9"), snapshot.current_seq())
+    assert not snapshot.stock_is_stale(water)
+    assert water.payload["stock"] == Decimal("9")
+
+    barcode_cache.mark_barcode_stock_changed(1, 2)
+    assert snapshot.stock_is_stale(water) and snapshot.stock_is_stale(soda)
+
+
+def test_stock_read_before_a_change_stays_stale():
+    snapshot = barcode_cache.get_barcode_snapshot(1, 2)
+    entry = _entry()
+    snapshot.remember("775", entry)
+    barcode_cache.mark_barcode_stock_changed(1, 2, [7])
+    seq = snapshot.current_seq()
+    # Otra venta confirma mientras se leía el stock.
+    barcode_cache.mark_barcode_stock_changed(1, 2, [7])
+    snapshot.refresh_stock(entry, Decimal("9"), seq)
+    assert snapshot.stock_is_stale(entry)
+
+
+def test_company_invalidation_drops_every_branch():
+    barcode_cache.get_barcode_snapshot(1, 2).remember("775", _entry())
+    barcode_cache.get_barcode_snapshot(1, 3).remember("775", _entry())
+    barcode_cache.get_barcode_snapshot(4, 2).remember("775", _entry())
+
+    barcode_cache.invalidate_barcode_cache(1)
+
+    assert barcode_cache.get_barcode_snapshot(1, 2, create=False) is None
+    assert barcode_cache.get_barcode_snapshot(1, 3, create=False) is None
+    assert barcode_cache.get_barcode_snapshot(4, 2, create=False).lookup("775")
+
+
+def test_warm_snapshot_discarded_if_catalog_changed_while_loading():
+    token = barcode_cache.load_token(1, 2)
+    barcode_cache.invalidate_barcode_cache(1, 2)
+    snapshot = barcode_cache.BranchBarcodeSnapshot(1, 2, complete=True)
+    assert barcode_cache.install_barcode_snapshot(snapshot, token) is False
+
+    token = barcode_cache.load_token(1, 2)
+    barcode_cache.mark_barcode_stock_changed(1, 2, [7])
+    snapshot = barcode_cache.BranchBarcodeSnapshot(1, 2, complete=True)
+    snapshot.remember("775", _entry())
+    assert barcode_cache.install_barcode_snapshot(snapshot, token) is True
+    assert snapshot.stock_is_stale(snapshot.lookup("775"))
+
+
+def test_commit_of_stock_change_keeps_snapshot(session):
+    snapshot = barcode_cache.get_barcode_snapshot(1, 2)
+    entry = _entry()
+    snapshot.remember("775", entry)
+
+    session.get(_Product, 7).stock = 4
+    session.commit()
+
+    assert barcode_cache.get_barcode_snapshot(1, 2) is snapshot
+    assert snapshot.stock_is_stale(entry)
+
+
+def test_commit_of_catalog_change_drops_snapshot(session):
+    snapshot = barcode_cache.get_barcode_snapshot(1, 2)
+    snapshot.remember("775", _entry())
+
+    session.get(_Product, 7).description = "Agua sin gas"
+    session.commit()
+
+    assert barcode_cache.get_barcode_snapshot(1, 2, create=False) is None
+
+
+def test_rollback_discards_pending_changes(session):
+    snapshot = barcode_cache.get_barcode_snapshot(1, 2)
+    snapshot.remember("775", _entry())
+
+    session.get(_Product, 7).description = "Otra"
+    session.flush()
+    session.rollback()
+    session.commit()
+
+    assert barcode_cache.get_barcode_snapshot(1, 2, create=False) is snapshot
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.values: dict[str, int] = {}
+        self.mgets = 0
+
+    def mget(self, keys):
+        self.mgets += 1
+        return [self.values.get(key) for key in keys]
+
+    def incr(self, key):
+        self.values[key] = self.values.get(key, 0) + 1
+        return self.values[key]
+
+
+def test_remote_versions_checked_at_most_once_per_interval(monkeypatch):
+    fake = _FakeRedis()
+    monkeypatch.setattr(barcode_cache, "_get_redis", lambda: fake)
+    snapshot = barcode_cache.get_barcode_snapshot(1, 2)
+    snapshot.remember("775", _entry())
+
+    for _ in range(5):
+        assert barcode_cache.get_barcode_snapshot(1, 2) is snapshot
+    assert fake.mgets == 1
+
+    # Escritura de otra réplica: se ve recién al vencer el intervalo.
+    fake.values["barcode:version:1:2"] = 1
+    assert barcode_cache.get_barcode_snapshot(1, 2, create=False) is snapshot
+    monkeypatch.setattr(barcode_cache, "BARCODE_CACHE_VERSION_CHECK_SECONDS", 0)
+    assert barcode_cache.get_barcode_snapshot(1, 2, create=False) is None
+    assert fake.mgets == 2
+
+
+def test_own_invalidation_rereads_remote_versions(monkeypatch):
+    fake = _FakeRedis()
+    monkeypatch.setattr(barcode_cache, "_get_redis", lambda: fake)
+    barcode_cache.get_barcode_snapshot(1, 2)
+
+    barcode_cache.invalidate_barcode_cache(1, 2)
+    fresh = barcode_cache.get_barcode_snapshot(1, 2)
+
+    assert fresh.version == (1, 0)
+    assert barcode_cache.get_barcode_snapshot(1, 2) is fresh
+    assert fake.mgets == 2
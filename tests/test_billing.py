@@ -695,7 +695,7 @@ class TestEmitFiscalDocument:
         mock_response.json.return_value = json.loads(mock_response.text)
 
         with patch("app.services.billing_service.get_async_session") as mock_get, \
-             patch("httpx.AsyncClient") as mock_httpx:
+             patch("app.services.billing_service.http_client") as mock_httpx:
             mock_get.return_value.__aenter__ = AsyncMock(return_value=mock_session)
             mock_get.return_value.__aexit__ = AsyncMock(return_value=False)
             mock_httpx.return_value.__aenter__ = AsyncMock()
@@ -743,7 +743,7 @@ class TestEmitFiscalDocument:
         mock_response.json.return_value = json.loads(mock_response.text)
 
         with patch("app.services.billing_service.get_async_session") as mock_get, \
-             patch("httpx.AsyncClient") as mock_httpx:
+             patch("app.services.billing_service.http_client") as mock_httpx:
             mock_get.return_value.__aenter__ = AsyncMock(return_value=mock_session)
             mock_get.return_value.__aexit__ = AsyncMock(return_value=False)
             mock_httpx.return_value.__aenter__ = AsyncMock()
@@ -782,7 +782,7 @@ class TestEmitFiscalDocument:
         mock_session.exec.side_effect = [no_doc, config_result, sale_result, items_result, tax_rate_result]
 
         with patch("app.services.billing_service.get_async_session") as mock_get, \
-             patch("httpx.AsyncClient") as mock_httpx:
+             patch("app.services.billing_service.http_client") as mock_httpx:
             mock_get.return_value.__aenter__ = AsyncMock(return_value=mock_session)
             mock_get.return_value.__aexit__ = AsyncMock(return_value=False)
             mock_httpx.return_value.__aenter__ = AsyncMock()
@@ -1068,7 +1068,7 @@ class TestEndToEndBillingFlow:
 
         with patch("app.services.billing_service.get_async_session") as mock_get, \
              patch("app.services.billing_service.utc_now_naive", return_value=datetime(2026, 4, 15)), \
-             patch("httpx.AsyncClient") as mock_httpx:
+             patch("app.services.billing_service.http_client") as mock_httpx:
             mock_get.return_value.__aenter__ = AsyncMock(return_value=mock_session)
             mock_get.return_value.__aexit__ = AsyncMock(return_value=False)
             mock_httpx.return_value.__aenter__ = AsyncMock()
@@ -1186,7 +1186,7 @@ class TestEndToEndBillingFlow:
         error_response.text = "Internal Server Error"
 
         with patch("app.services.billing_service.get_async_session") as mock_get, \
-             patch("httpx.AsyncClient") as mock_httpx:
+             patch("app.services.billing_service.http_client") as mock_httpx:
             mock_get.return_value.__aenter__ = AsyncMock(return_value=mock_session)
             mock_get.return_value.__aexit__ = AsyncMock(return_value=False)
             mock_httpx.return_value.__aenter__ = AsyncMock()
@@ -1874,7 +1874,7 @@ class TestSUNATStrategyE2E:
             strategy, "_resolve_nubefact_credentials",
             new=AsyncMock(return_value=("https://api.nubefact.com/api/v1/test", "test-token-123")),
         ):
-            with patch("app.services.billing_service.httpx.AsyncClient") as mock_client_cls:
+            with patch("app.services.billing_service.http_client") as mock_client_cls:
                 mock_client = AsyncMock()
                 mock_client.__aenter__ = AsyncMock(return_value=mock_client)
                 mock_client.__aexit__ = AsyncMock(return_value=None)
@@ -1913,7 +1913,7 @@ class TestSUNATStrategyE2E:
             strategy, "_resolve_nubefact_credentials",
             new=AsyncMock(return_value=("https://api.nubefact.com/api/v1/test", "test-token-123")),
         ):
-            with patch("app.services.billing_service.httpx.AsyncClient") as mock_client_cls:
+            with patch("app.services.billing_service.http_client") as mock_client_cls:
                 mock_client = AsyncMock()
                 mock_client.__aenter__ = AsyncMock(return_value=mock_client)
                 mock_client.__aexit__ = AsyncMock(return_value=None)
@@ -1962,7 +1962,7 @@ class TestSUNATStrategyE2E:
             strategy, "_resolve_nubefact_credentials",
             new=AsyncMock(return_value=("https://api.nubefact.com/api/v1/test", "test-token-123")),
         ):
-            with patch("app.services.billing_service.httpx.AsyncClient") as mock_client_cls:
+            with patch("app.services.billing_service.http_client") as mock_client_cls:
                 mock_client = AsyncMock()
                 mock_client.__aenter__ = AsyncMock(return_value=mock_client)
                 mock_client.__aexit__ = AsyncMock(return_value=None)
@@ -1992,7 +1992,7 @@ class TestSUNATStrategyE2E:
             strategy, "_resolve_nubefact_credentials",
             new=AsyncMock(return_value=("https://api.nubefact.com/api/v1/test", "test-token-123")),
         ):
-            with patch("app.services.billing_service.httpx.AsyncClient") as mock_client_cls:
+            with patch("app.services.billing_service.http_client") as mock_client_cls:
                 mock_client = AsyncMock()
                 mock_client.__aenter__ = AsyncMock(return_value=mock_client)
                 mock_client.__aexit__ = AsyncMock(return_value=None)
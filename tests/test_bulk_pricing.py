@@ -0,0 +1,213 @@
+"""Reprecio masivo — :func:`app.services.pricing.reprice_price_list` y afines.
+
+La sesión es un fake sync: ``exec`` devuelve las filas del SELECT (una sola
+query para todo el alcance) y ``execute`` registra los lotes del UPDATE. La
+invalidación de caches al commit se registra aparte (``_invalidations``).
+"""
+from __future__ import annotations
+
+from decimal import Decimal
+
+import pytest
+from sqlmodel import Session, create_engine
+
+import app.services.barcode_cache as barcode_cache
+import app.services.pricing as pricing
+import app.services.pricing_cache as pricing_cache
+from app.services.pricing import (
+    ADJUST_AMOUNT,
+    ADJUST_MARGIN,
+    ADJUST_PERCENT,
+    ROUND_DOWN,
+    ROUND_UP,
+    PriceAdjustment,
+    reprice_price_list,
+    reprice_products,
+    round_price,
+)
+
+
+_invalidate_caches_after_commit = pricing._invalidate_caches_after_commit
+
+
+@pytest.fixture(autouse=True)
+def _invalidations(monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        pricing,
+        "_invalidate_caches_after_commit",
+        lambda session, company_id, branch_id, *, barcodes: calls.append(
+            (company_id, branch_id, barcodes)
+        ),
+    )
+    return calls
+
+
+class _FakeSyncSession:
+    def __init__(self, *results):
+        self._results = list(results)
+        self.selects = 0
+        self.updates: list[list[dict]] = []
+
+    def exec(self, _query):
+        self.selects += 1
+        return iter(self._results.pop(0))
+
+    def execute(self, _stmt, params):
+        self.updates.append(list(params))
+
+
+def _item(item_id, unit_price, *, variant_id=None, sale_price="10.00", purchase="6.00",
+          custom_margin=None, variant_price=None, description="Agua"):
+    return (
+        item_id,
+        Decimal(unit_price),
+        variant_id,
+        description,
+        Decimal(sale_price) if sale_price is not None else None,
+        Decimal(purchase),
+        custom_margin,
+        Decimal(variant_price) if variant_price is not None else None,
+        "M" if variant_id else None,
+        None,
+    )
+
+
+def test_round_price_steps_and_modes():
+    assert round_price(Decimal("12.345")) == Decimal("12.35")
+    assert round_price(Decimal("12.34"), Decimal("0.10")) == Decimal("12.30")
+    assert round_price(Decimal("12.31"), Decimal("0.50"), ROUND_UP) == Decimal("12.50")
+    assert round_price(Decimal("12.99"), Decimal("1"), ROUND_DOWN) == Decimal("12.00")
+
+
+def test_adjustment_kinds():
+    assert PriceAdjustment(ADJUST_PERCENT, Decimal("-15")).apply(Decimal("10")) == Decimal("8.50")
+    assert PriceAdjustment(ADJUST_AMOUNT, Decimal("2.5")).apply(Decimal("10")) == Decimal("12.50")
+    margin = PriceAdjustment(ADJUST_MARGIN)
+    assert margin.apply(None, purchase_price=Decimal("6"), margin=50) == Decimal("9.00")
+    assert margin.apply(None, purchase_price=Decimal("0"), margin=50) is None
+    # Sin base o con resultado <= 0 la fila se omite.
+    assert PriceAdjustment(ADJUST_PERCENT, Decimal("10")).apply(Decimal("0")) is None
+    assert PriceAdjustment(ADJUST_AMOUNT, Decimal("-20")).apply(Decimal("10")) is None
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"kind": "otro", "value": Decimal("1")},
+        {"kind": ADJUST_PERCENT},
+        {"kind": ADJUST_PERCENT, "value": Decimal("-100")},
+        {"kind": ADJUST_MARGIN, "value": Decimal("-5")},
+        {"kind": ADJUST_AMOUNT, "value": Decimal("1"), "round_mode": "raro"},
+    ],
+)
+def test_invalid_adjustments_are_rejected(kwargs):
+    with pytest.raises(ValueError):
+        PriceAdjustment(**kwargs)
+
+
+def test_price_list_discount_uses_effective_price_cascade(monkeypatch):
+    monkeypatch.setattr(pricing, "BULK_PRICE_BATCH_SIZE", 1)
+    session = _FakeSyncSession([
+        _item(1, "9.00"),                                            # ya está al -10%
+        _item(2, "5.00", variant_id=7, variant_price="20.00"),       # base = variante 20
+        _item(3, "1.00", sale_price=None, purchase="8.00"),          # base = 8 × 1.25
+        _item(4, "1.00", sale_price=None, purchase="0"),             # sin base → omitido
+        _item(5, "2.00", sale_price="10.00"),                        # base = sale_price 10
+    ])
+    result = reprice_price_list(
+        session,
+        company_id=1,
+        branch_id=2,
+        price_list_id=3,
+        adjustment=PriceAdjustment(ADJUST_PERCENT, Decimal("-10")),
+        global_margin=25.0,
+    )
+
+    assert session.selects == 1
+    assert (result.matched, result.changed, result.skipped) == (5, 3, 1)
+    # Un executemany por lote (BULK_PRICE_BATCH_SIZE=1 → uno por fila).
+    assert session.updates == [
+        [{"row_id": 2, "new_price": Decimal("18.00")}],
+        [{"row_id": 3, "new_price": Decimal("9.00")}],
+        [{"row_id": 5, "new_price": Decimal("9.00")}],
+    ]
+    assert [row["id"] for row in result.preview] == [2, 3, 5]
+    assert result.preview[0]["description"] == "Agua (M)"
+
+
+def test_price_list_dry_run_only_counts():
+    session = _FakeSyncSession([_item(1, "9.00"), _item(2, "4.00")])
+    result = reprice_price_list(
+        session,
+        company_id=1,
+        branch_id=2,
+        price_list_id=3,
+        adjustment=PriceAdjustment(ADJUST_AMOUNT, Decimal("1")),
+        from_current=True,
+        dry_run=True,
+        preview_limit=1,
+    )
+    assert result.dry_run and result.changed == 2
+    assert result.preview == [
+        {"id": 1, "description": "Agua", "old_price": Decimal("9.00"), "new_price": Decimal("10.00")}
+    ]
+    assert session.updates == []
+
+
+def test_products_margin_recompute_prefers_custom_margin():
+    products = [
+        (1, "Agua", Decimal("10.00"), Decimal("6.00"), None),            # global 50%
+        (2, "Soda", Decimal("10.00"), Decimal("6.00"), Decimal("100")),  # propio 100%
+    ]
+    variants = [(9, Decimal("11.00"), "L", None, "Agua", Decimal("6.00"), None)]
+    session = _FakeSyncSession(products, variants)
+    result = reprice_products(
+        session,
+        company_id=1,
+        branch_id=2,
+        adjustment=PriceAdjustment(ADJUST_MARGIN, round_step=Decimal("0.10")),
+        global_margin=50.0,
+    )
+    assert result.changed == 3
+    product_batch, variant_batch = session.updates
+    assert product_batch == [
+        {"row_id": 1, "new_price": Decimal("9.00")},
+        {"row_id": 2, "new_price": Decimal("12.00")},
+    ]
+    assert variant_batch == [{"row_id": 9, "new_price": Decimal("9.00")}]
+
+
+def test_products_write_registers_cache_invalidation(_invalidations):
+    products = [(1, "Agua", Decimal("10.00"), Decimal("6.00"), None)]
+    adjustment = PriceAdjustment(ADJUST_PERCENT, Decimal("10"))
+
+    reprice_products(
+        _FakeSyncSession(products, []), company_id=1, branch_id=2,
+        adjustment=adjustment, dry_run=True,
+    )
+    assert _invalidations == []
+
+    reprice_products(
+        _FakeSyncSession(products, []), company_id=1, branch_id=2, adjustment=adjustment,
+    )
+    assert _invalidations == [(1, 2, True)]
+
+
+def test_caches_are_invalidated_only_when_the_caller_commits(monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        pricing_cache, "invalidate_pricing_cache", lambda c, b: calls.append(("pricing", c, b))
+    )
+    monkeypatch.setattr(
+        barcode_cache, "invalidate_barcode_cache", lambda c, b: calls.append(("barcode", c, b))
+    )
+    engine = create_engine("sqlite://")
+    with Session(engine) as session:
+        _invalidate_caches_after_commit(session, 1, 2, barcodes=True)
+        assert calls == []
+        session.commit()
+        assert calls == [("pricing", 1, 2), ("barcode", 1, 2)]
+        session.commit()
+        assert len(calls) == 2
+    engine.dispose()
@@ -59,6 +59,8 @@ def test_query_sales_by_category_includes_services_snapshot(monkeypatch):
     monkeypatch.setattr(state, "_company_id", lambda: 1)
     monkeypatch.setattr(state, "_branch_id", lambda: 1)
     monkeypatch.setattr(rx, "session", lambda: _FakeSession(rows, capture))
+    # Camino crudo (fallback sin rollups).
+    monkeypatch.setattr("app.states.dashboard_state.SALES_ROLLUP_READS_ENABLED", False)
 
     result = state._query_sales_by_category(limit=None)
 
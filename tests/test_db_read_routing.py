@@ -0,0 +1,234 @@
+"""Ruteo de lecturas primario/réplica — :mod:`app.utils.db_read`.
+
+Primario y réplica son dos archivos SQLite; la "replicación" se simula
+copiando el latido del primario a la réplica.
+
+Cobertura:
+  * Sin réplica configurada: todo va al primario (comportamiento previo).
+  * Lag: sin medición, con la réplica atrasada o con la medición vencida se
+    lee del primario; con lag bajo, de la réplica.
+  * Read-your-writes: el cliente que commitea escrituras queda fijado al
+    primario ``DB_READ_PIN_SECONDS``; los demás siguen en la réplica.
+  * Sesión async con el mismo ruteo.
+"""
+from __future__ import annotations
+
+from contextlib import asynccontextmanager
+from datetime import timedelta
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import Session, SQLModel, create_engine, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.models import ReplicaHeartbeat, Unit
+from app.utils import db_read
+from app.utils.db_read import (
+    is_pinned_to_primary,
+    probe_replica_lag,
+    read_async_session,
+    read_routing_status,
+    read_session,
+    register_read_routing_listeners,
+    set_read_route_key,
+    unregister_read_routing_listeners,
+)
+from app.utils.timezone import utc_now_naive
+
+
+def _session(engine) -> Session:
+    session = Session(engine)
+    session.info["tenant_bypass"] = True
+    return session
+
+
+def _db_name(session) -> str:
+    return session.get_bind().url.database.rsplit("/", 1)[-1]
+
+
+@pytest.fixture
+def dbs(tmp_path, monkeypatch):
+    primary_path = tmp_path / "primary.db"
+    replica_path = tmp_path / "replica.db"
+    primary = create_engine(f"sqlite:///{primary_path}")
+    replica = create_engine(f"sqlite:///{replica_path}")
+    tables = [ReplicaHeartbeat.__table__, Unit.__table__]
+    for engine in (primary, replica):
+        SQLModel.metadata.create_all(engine, tables=tables)
+    async_primary = create_async_engine(f"sqlite+aiosqlite:///{primary_path}")
+
+    @asynccontextmanager
+    async def _primary_async():
+        async with AsyncSession(async_primary) as session:
+            yield session
+
+    monkeypatch.setenv("DB_READ_URL", f"sqlite:///{replica_path}")
+    monkeypatch.setattr(db_read, "_primary_session", lambda: Session(primary))
+    monkeypatch.setattr(db_read, "_primary_async_session", _primary_async)
+    db_read._read_engine.cache_clear()
+    db_read._async_read_engine.cache_clear()
+    db_read.reset_read_routing()
+    register_read_routing_listeners()
+    yield primary, replica
+    unregister_read_routing_listeners()
+    db_read.reset_read_routing()
+    db_read._read_engine.cache_clear()
+    db_read._async_read_engine.cache_clear()
+    primary.dispose()
+    replica.dispose()
+
+
+def _replicate_heartbeat(primary, replica, delay: timedelta = timedelta(0)) -> None:
+    with Session(primary) as source:
+        beat = source.get(ReplicaHeartbeat, 1)
+        beat_at = beat.beat_at - delay
+    with Session(replica) as target:
+        target.merge(ReplicaHeartbeat(id=1, beat_at=beat_at))
+        target.commit()
+
+
+def _healthy_replica(primary, replica) -> None:
+    probe_replica_lag()
+    _replicate_heartbeat(primary, replica)
+    assert probe_replica_lag() < 5
+
+
+def test_without_replica_reads_go_to_primary(monkeypatch, tmp_path):
+    monkeypatch.delenv("DB_READ_URL", raising=False)
+    monkeypatch.delenv("DB_READ_HOST", raising=False)
+    primary = create_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+    monkeypatch.setattr(db_read, "_primary_session", lambda: Session(primary))
+    db_read._read_engine.cache_clear()
+    try:
+        assert probe_replica_lag() is None
+        with read_session() as session:
+            assert _db_name(session) == "primary.db"
+        assert read_routing_status()["configured"] is False
+    finally:
+        db_read._read_engine.cache_clear()
+        primary.dispose()
+
+
+def test_lag_decides_between_replica_and_primary(dbs, monkeypatch):
+    primary, replica = dbs
+
+    # Sin medición todavía: no se confía en la réplica.
+    with read_session() as session:
+        assert _db_name(session) == "primary.db"
+
+    # Primer latido aún no replicado.
+    assert probe_replica_lag() is None
+    assert read_routing_status()["error"] == "latido aún no replicado"
+
+    _healthy_replica(primary, replica)
+    with read_session() as session:
+        assert _db_name(session) == "replica.db"
+
+    # Réplica atrasada más que el máximo tolerado.
+    _replicate_heartbeat(primary, replica, delay=timedelta(seconds=60))
+    monkeypatch.setattr(db_read, "_write_heartbeat", lambda session, beat_at: None)
+    assert probe_replica_lag() >= 60
+    with read_session() as session:
+        assert _db_name(session) == "primary.db"
+    assert read_routing_status()["healthy"] is False
+
+
+def test_stale_measurement_falls_back_to_primary(dbs):
+    primary, replica = dbs
+    _healthy_replica(primary, replica)
+
+    # El monitor dejó de medir hace una hora.
+    db_read._lag_checked_at -= 3600
+
+    assert db_read.replica_lag_seconds() is None
+    with read_session() as session:
+        assert _db_name(session) == "primary.db"
+
+
+def test_heartbeat_row_is_created_when_missing(dbs):
+    primary, _ = dbs
+
+    probe_replica_lag()
+    probe_replica_lag()
+
+    with Session(primary) as session:
+        beats = session.exec(select(ReplicaHeartbeat)).all()
+    assert [b.id for b in beats] == [1]
+    assert utc_now_naive() - beats[0].beat_at < timedelta(seconds=5)
+
+
+def test_client_that_wrote_reads_its_writes_from_primary(dbs):
+    primary, replica = dbs
+    _healthy_replica(primary, replica)
+
+    token = set_read_route_key("tab-a")
+    try:
+        with read_session() as session:
+            assert _db_name(session) == "replica.db"
+
+        # Una lectura con commit no fija al cliente.
+        with _session(primary) as session:
+            session.exec(select(Unit)).all()
+            session.commit()
+        assert not is_pinned_to_primary()
+
+        with _session(primary) as session:
+            session.add(Unit(name="Caja", company_id=1, branch_id=1))
+            session.commit()
+        assert is_pinned_to_primary()
+        with read_session() as session:
+            session.info["tenant_bypass"] = True
+            assert _db_name(session) == "primary.db"
+            assert session.exec(select(Unit.name)).all() == ["Caja"]
+    finally:
+        db_read.reset_read_route_key(token)
+
+    # Otro cliente sigue leyendo de la réplica.
+    token = set_read_route_key("tab-b")
+    try:
+        with read_session() as session:
+            assert _db_name(session) == "replica.db"
+    finally:
+        db_read.reset_read_route_key(token)
+
+    # Vencida la fijación, vuelve a la réplica.
+    db_read._pins["tab-a"] = 0.0
+    assert not is_pinned_to_primary("tab-a")
+
+
+def test_rolled_back_write_does_not_pin(dbs):
+    primary, replica = dbs
+    _healthy_replica(primary, replica)
+
+    token = set_read_route_key("tab-a")
+    try:
+        with _session(primary) as session:
+            session.add(Unit(name="Caja", company_id=1, branch_id=1))
+            session.flush()
+            session.rollback()
+            session.commit()
+        assert not is_pinned_to_primary()
+    finally:
+        db_read.reset_read_route_key(token)
+
+
+@pytest.mark.asyncio
+async def test_async_read_session_follows_the_same_routing(dbs):
+    primary, replica = dbs
+
+    async with read_async_session() as session:
+        assert _db_name(session) == "primary.db"
+
+    _healthy_replica(primary, replica)
+    async with read_async_session() as session:
+        assert _db_name(session) == "replica.db"
+        assert (await session.exec(select(ReplicaHeartbeat.id))).all() == [1]
+
+    token = set_read_route_key("tab-a")
+    try:
+        db_read.pin_to_primary()
+        async with read_async_session() as session:
+            assert _db_name(session) == "primary.db"
+    finally:
+        db_read.reset_read_route_key(token)
+    await db_read.dispose_read_engines()
@@ -35,8 +35,8 @@ from app.services.document_lookup_service import (
 
 
 def _mock_httpx_client(mock_response=None, side_effect=None):
-    """Patch context-manager para httpx.AsyncClient."""
-    patcher = patch("app.services.document_lookup_service.httpx.AsyncClient")
+    """Patch context-manager para el cliente HTTP compartido."""
+    patcher = patch("app.services.document_lookup_service.http_client")
     mock_cls = patcher.start()
     # Usamos MagicMock base con funciones async reales para evitar
     # coroutines internas de AsyncMock que el GC de Python 3.13 reporta.
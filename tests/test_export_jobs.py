@@ -0,0 +1,159 @@
+"""Cola de exports (app/services/export_jobs.py) en modo local (sin Redis)."""
+import datetime
+import os
+import time
+from decimal import Decimal
+
+import openpyxl
+import pytest
+
+import app.services.export_jobs as export_jobs
+from app.utils import redis_client
+from app.utils.redis_client import SharedRedis
+
+
+@pytest.fixture
+def local_jobs(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_jobs, "EXPORT_JOBS_DIR", str(tmp_path))
+    monkeypatch.setattr(export_jobs, "_get_redis", lambda: None)
+    monkeypatch.setattr(export_jobs, "ensure_export_dispatcher", lambda: None)
+    monkeypatch.setattr(export_jobs, "_local_dedup", {})
+    return tmp_path
+
+
+def _payload(rows=None):
+    return {
+        "company_name": "Empresa",
+        "period_label": "Período: Inicio a Actual",
+        "generated_at": datetime.datetime(2026, 1, 1, 9, 0),
+        "currency_label": "S/",
+        "currency_format": '"S/"#,##0.00',
+        "rows": rows if rows is not None else [
+            ("01/01/2026 10:00", "Apertura de Caja", "admin", 100.0, 0.0, "Sin desglose", "-"),
+            ("01/01/2026 20:00", "Cierre de Caja", "admin", 0.0, 350.5, "Efectivo: S/ 350.50", "-"),
+        ],
+        "summary": {
+            "today": "01/01/2026",
+            "opening_count": 1,
+            "closing_count": 1,
+            "opening_total": 100.0,
+            "closing_total": 350.5,
+        },
+    }
+
+
+def _submit(filters=None, payload=None):
+    return export_jobs.submit_export_job(
+        "aperturas_cierres_caja",
+        company_id=1,
+        branch_id=2,
+        filters=filters or {"start": "2026-01-01", "end": ""},
+        payload=payload or _payload(),
+        filename="aperturas_cierres_caja.xlsx",
+    )
+
+
+def test_dedup_key_depends_on_tenant_report_and_filters():
+    key = export_jobs.export_dedup_key("reservas", 1, 2, {"a": 1, "b": "x"})
+    assert key == export_jobs.export_dedup_key("reservas", 1, 2, {"b": "x", "a": 1})
+    assert key != export_jobs.export_dedup_key("reservas", 1, 3, {"a": 1, "b": "x"})
+    assert key != export_jobs.export_dedup_key("historial_ventas", 1, 2, {"a": 1, "b": "x"})
+    assert key != export_jobs.export_dedup_key("reservas", 1, 2, {"a": 2, "b": "x"})
+
+
+def test_identical_requests_share_one_job(local_jobs):
+    first = _submit()
+    assert _submit().id == first.id
+    assert _submit(filters={"start": "2026-02-01", "end": ""}).id != first.id
+
+
+def test_job_runs_and_result_is_downloadable(local_jobs):
+    job = _submit()
+    assert export_jobs.run_export_job(job.id) == export_jobs.STATUS_DONE
+
+    done = export_jobs.get_export_job(job.id)
+    assert done.status == export_jobs.STATUS_DONE
+    assert done.progress == 100
+    assert not os.path.exists(os.path.join(local_jobs, f"{job.id}.payload"))
+
+    ws = openpyxl.load_workbook(export_jobs.export_result_path(job.id)).active
+    assert ws.title == "Aperturas y Cierres"
+    values = [cell.value for row in ws.iter_rows() for cell in row]
+    assert "Cierre de Caja" in values
+    assert any(isinstance(v, str) and v.startswith("=SUM(E") for v in values)
+
+
+def test_finished_job_reused_only_inside_dedup_window(local_jobs, monkeypatch):
+    job = _submit()
+    export_jobs.run_export_job(job.id)
+    assert _submit().id == job.id
+
+    monkeypatch.setattr(export_jobs, "EXPORT_JOB_DEDUP_SECONDS", 0)
+    export_jobs._update_job(job.id, finished_at=time.time() - 5)
+    assert _submit().id != job.id
+
+
+def test_renderer_failure_marks_job_as_error(local_jobs):
+    payload = _payload()
+    del payload["summary"]
+    job = _submit(payload=payload)
+    assert export_jobs.run_export_job(job.id) == export_jobs.STATUS_ERROR
+
+    failed = export_jobs.get_export_job(job.id)
+    assert failed.status == export_jobs.STATUS_ERROR
+    assert "summary" in failed.error
+    # Un job fallido no se reusa: el reintento encola uno nuevo.
+    assert _submit(payload=_payload()).id != job.id
+
+
+def test_unknown_report_is_rejected(local_jobs):
+    with pytest.raises(ValueError):
+        export_jobs.submit_export_job(
+            "no_existe", company_id=1, branch_id=2, filters={}, payload={}, filename="x.xlsx"
+        )
+
+
+def test_cleanup_removes_expired_files(local_jobs):
+    job = _submit()
+    export_jobs.run_export_job(job.id)
+    result = export_jobs.export_result_path(job.id)
+    old = time.time() - export_jobs.EXPORT_JOB_TTL_SECONDS - 10
+    os.utime(result, (old, old))
+
+    assert export_jobs.cleanup_export_files() == 1
+    assert not os.path.exists(result)
+    with pytest.raises(export_jobs.ExportJobError):
+        export_jobs.read_export_result(job.id)
+
+
+def test_redis_queue_requires_shared_dir(monkeypatch):
+    # Con Redis pero EXPORT_JOBS_DIR local, otra réplica podría sacar el job
+    # sin ver su payload: la cola queda en el proceso que encola.
+    monkeypatch.setenv("REDIS_URL", "redis://redis:6379/0")
+    monkeypatch.setattr(export_jobs, "EXPORT_JOBS_SHARED_DIR", False)
+    monkeypatch.setattr(export_jobs, "_redis", SharedRedis("exports"))
+    if redis_client.REDIS_AVAILABLE:
+        def _unexpected(*args, **kwargs):
+            raise AssertionError("no debe conectarse a Redis sin directorio compartido")
+
+        monkeypatch.setattr(redis_client.redis, "from_url", _unexpected)
+
+    assert export_jobs.export_queue_backend() == "local"
+
+
+def test_payments_by_method_participation_formulas():
+    from app.services.export_renderers import render_payments_by_method
+
+    payload = _payload()
+    payload["summary"] = [("Efectivo", 2, Decimal("30.00")), ("Yape", 1, Decimal("10.00"))]
+    payload["entries"] = [
+        ("01/01/2026 10:00", "Venta", "Efectivo", 10, "admin", "-"),
+        ("01/01/2026 11:00", "Venta", "Efectivo", 20, "admin", "-"),
+        ("01/01/2026 12:00", "Venta", "Yape", 10, "admin", "-"),
+    ]
+    wb = render_payments_by_method(payload, lambda _pct: None)
+
+    ws = wb["Resumen por Método"]
+    assert ws.cell(row=8, column=4).value == "=IF($C$10>0,C8/$C$10,0)"
+    assert ws.cell(row=10, column=3).value == "=SUM(C8:C9)"
+    assert len(wb.sheetnames) == 2
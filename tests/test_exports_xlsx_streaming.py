@@ -0,0 +1,171 @@
+"""Exportación XLSX en streaming (app/utils/exports.py).
+
+Los benchmarks (``-m benchmark``) corren en un subproceso para medir el pico
+de RSS sin lo que ya cargó pytest:
+
+    XLSX_BENCH=1 pytest tests/test_exports_xlsx_streaming.py -m benchmark -s
+"""
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+import openpyxl
+import pytest
+
+import app.utils.exports as exports
+
+
+def _round_trip(wb):
+    output = exports.save_workbook_spooled(wb)
+    with output:
+        return openpyxl.load_workbook(output)
+
+
+def test_streaming_sheet_keeps_cell_api_and_formatting():
+    wb = exports.create_report_workbook(streaming=True)
+    ws = wb.active
+    ws.title = "Detalle"
+    row = exports.add_company_header(ws, "Empresa", "Reporte", "Hoy", columns=3)
+    exports.style_header_row(ws, row, ["Producto", "Cantidad", "Total"])
+    data_start = row + 1
+    for i in range(3):
+        r = data_start + i
+        ws.cell(row=r, column=1, value=f"Producto {i}")
+        ws.cell(row=r, column=2, value=i + 1).number_format = exports.NUMBER_FORMAT
+        ws.cell(row=r, column=3, value=f"=B{r}*2").border = exports.THIN_BORDER
+    exports.add_totals_row_with_formulas(ws, data_start + 3, data_start, [
+        {"type": "label", "value": "TOTAL"},
+        {"type": "sum", "col_letter": "B"},
+        {"type": "sum", "col_letter": "C"},
+    ])
+    exports.auto_adjust_column_widths(ws)
+
+    loaded = _round_trip(wb)["Detalle"]
+    assert loaded["A1"].value == "EMPRESA"
+    assert loaded["A1"].font.b is True
+    assert "A1:C1" in {str(r) for r in loaded.merged_cells.ranges}
+    assert loaded.cell(row=data_start + 1, column=3).value == f"=B{data_start + 1}*2"
+    assert loaded.cell(row=data_start + 3, column=2).value == f"=SUM(B{data_start}:B{data_start + 2})"
+    assert loaded.column_dimensions["A"].width >= 10
+
+
+def test_streaming_sheet_rejects_rows_already_flushed():
+    wb = exports.StreamingWorkbook()
+    ws = wb.create_sheet("Datos")
+    ws._buffer_rows = 10
+    for r in range(1, 31):
+        ws.cell(row=r, column=1, value=r)
+    # Las últimas filas siguen en el buffer y se pueden modificar…
+    ws.cell(row=25, column=2, value="ok")
+    # …las primeras ya se escribieron al stream.
+    with pytest.raises(ValueError):
+        ws.cell(row=1, column=2, value="tarde")
+
+    loaded = _round_trip(wb)["Datos"]
+    assert loaded.max_row == 30
+    assert loaded["B25"].value == "ok"
+
+
+def test_column_widths_come_from_bounded_sample():
+    wb = exports.StreamingWorkbook(max_width=50)
+    ws = wb.create_sheet("Datos")
+    ws._buffer_rows = 5
+    for r in range(1, 21):
+        ws.cell(row=r, column=1, value="x" * (r if r < 15 else 200))
+
+    loaded = _round_trip(wb)["Datos"]
+    # La fila larga llega después de la muestra: no ensancha la columna.
+    assert loaded.column_dimensions["A"].width < 50
+
+
+def test_in_memory_mode_still_available():
+    wb = exports.create_report_workbook(streaming=False)
+    assert isinstance(wb, openpyxl.Workbook)
+    wb.active.cell(row=1, column=1, value="x")
+    assert _round_trip(wb).active["A1"].value == "x"
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Benchmarks: pico de RSS y tiempo para 100k / 1M filas (detalle de ventas)
+# ─────────────────────────────────────────────────────────────────────────────
+
+_BENCH_SCRIPT = textwrap.dedent(
+    """
+    import json, resource, sys, time
+    from decimal import Decimal
+
+    import app.utils.exports as exports
+
+    rows, streaming = int(sys.argv[1]), sys.argv[2] == "1"
+    started = time.perf_counter()
+    wb = exports.create_report_workbook(streaming=streaming)
+    ws = wb.active
+    ws.title = "Detalle"
+    row = exports.add_company_header(ws, "Empresa", "Detalle", "Año", columns=16)
+    exports.style_header_row(ws, row, [f"Col {c}" for c in range(1, 17)])
+    row += 1
+    for i in range(rows):
+        values = [
+            "01/01/2026 10:00", i, "Cliente general", "vendedor", "Efectivo",
+            f"Producto {i % 5000}", "-", "Bebidas", Decimal("2"), Decimal("10.50"),
+            Decimal("9.90"), Decimal("1.20"), Decimal("19.80"), 0.0571, "Promoción", "Verano",
+        ]
+        for column, value in enumerate(values, start=1):
+            ws.cell(row=row, column=column, value=value).border = exports.THIN_BORDER
+        row += 1
+    output = exports.save_workbook_spooled(wb)
+    output.seek(0, 2)
+    size = output.tell()
+    output.close()
+    print(json.dumps({
+        "rows": rows,
+        "streaming": streaming,
+        "seconds": round(time.perf_counter() - started, 2),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "size_mb": round(size / 1024 / 1024, 1),
+    }))
+    """
+)
+
+
+def _run_bench(rows: int, streaming: bool) -> dict:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run(
+        [sys.executable, "-c", _BENCH_SCRIPT, str(rows), "1" if streaming else "0"],
+        cwd=root,
+        capture_output=True,
+        text=True,
+        check=True,
+        timeout=3600,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+_bench = pytest.mark.skipif(
+    os.getenv("XLSX_BENCH") != "1" or sys.platform == "win32",
+    reason="Benchmark pesado: XLSX_BENCH=1 para ejecutarlo",
+)
+
+
+@pytest.mark.benchmark
+@_bench
+def test_benchmark_100k_rows_streaming_vs_in_memory(record_property):
+    streamed = _run_bench(100_000, streaming=True)
+    in_memory = _run_bench(100_000, streaming=False)
+    print(f"\n100k streaming: {streamed}\n100k en memoria: {in_memory}")
+    record_property("xlsx_100k_streaming", streamed)
+    record_property("xlsx_100k_in_memory", in_memory)
+    assert streamed["peak_rss_mb"] < in_memory["peak_rss_mb"]
+
+
+@pytest.mark.benchmark
+@_bench
+def test_benchmark_1m_rows_streaming_memory_is_flat(record_property):
+    small = _run_bench(100_000, streaming=True)
+    large = _run_bench(1_000_000, streaming=True)
+    print(f"\n100k streaming: {small}\n1M streaming: {large}")
+    record_property("xlsx_1m_streaming", large)
+    # 10× filas no debe escalar la memoria: solo el buffer de filas y el zip.
+    assert large["peak_rss_mb"] < small["peak_rss_mb"] * 1.5
@@ -0,0 +1,381 @@
+"""Numeración fiscal por bloques y cuota mensual — :mod:`app.services.fiscal_numbering`.
+
+Corre contra SQLite async con bloques de 5 correlativos. Las emisiones
+concurrentes usan un SQLite en archivo con ``BEGIN IMMEDIATE`` (como
+``scripts/bench_fiscal_numbering.py``): cada transacción toma el lock de
+escritura, así una sesión anidada dentro de la emisión se bloquearía.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import itertools
+import os
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+os.environ.setdefault("TENANT_STRICT", "0")
+
+from app.models import Company
+from app.models.billing import CompanyBillingConfig, FiscalNumberBlock, FiscalQuotaCounter
+from app.services import fiscal_numbering as fn
+from app.services.fiscal_numbering import (
+    BLOCK_CLOSED,
+    BLOCK_OPEN,
+    BLOCK_RECONCILED,
+    SERIE_BOLETA,
+    SERIE_FACTURA,
+    prepare_number_block,
+    reconcile_number_blocks,
+    reserve_quota,
+    take_number,
+    uses_number_blocks,
+)
+from app.utils.tenant import tenant_bypass
+from app.utils.timezone import utc_now_naive
+
+_rucs = itertools.count(20300000001)
+
+
+def _use_engine(monkeypatch, engine) -> None:
+    @contextlib.asynccontextmanager
+    async def _session():
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            yield session
+
+    monkeypatch.setattr(fn, "get_async_session", _session)
+    monkeypatch.setattr(fn, "FISCAL_NUMBER_BLOCK_SIZE", 5)
+
+
+@pytest_asyncio.fixture
+async def engine(monkeypatch):
+    engine = create_async_engine("sqlite+aiosqlite://", echo=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    _use_engine(monkeypatch, engine)
+    yield engine
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def locking_engine(monkeypatch, tmp_path):
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'numbering.db'}",
+        echo=False,
+        connect_args={"timeout": 2},
+    )
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _no_pysqlite_begin(dbapi_conn, _record):
+        dbapi_conn.isolation_level = None
+
+    @event.listens_for(engine.sync_engine, "begin")
+    def _begin_immediate(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    _use_engine(monkeypatch, engine)
+    yield engine
+    await engine.dispose()
+
+
+async def _seed(engine, **config_fields) -> CompanyBillingConfig:
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        with tenant_bypass():
+            company = Company(name="Co", ruc=str(next(_rucs)))
+            session.add(company)
+            await session.flush()
+            config_fields.setdefault("country", "PE")
+            config = CompanyBillingConfig(
+                company_id=company.id, is_active=True, **config_fields
+            )
+            session.add(config)
+            await session.commit()
+            return config
+
+
+async def _take(engine, config, holder, kind=SERIE_BOLETA, *, commit=True, prepare=True):
+    """Como ``emit_fiscal_document``: bloque preparado antes de la transacción."""
+    if prepare:
+        await prepare_number_block(config.company_id, kind, holder=holder)
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        serie, number = await take_number(session, config, kind, holder=holder)
+        if commit:
+            await session.commit()
+        else:
+            await session.rollback()
+    return serie, number
+
+
+async def _reserve(engine, config, *, commit=True) -> bool:
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        allowed = await reserve_quota(session, config)
+        if commit:
+            await session.commit()
+        else:
+            await session.rollback()
+    return allowed
+
+
+async def _used(engine, company_id) -> int | None:
+    async with AsyncSession(engine) as session:
+        return (
+            await session.exec(
+                select(FiscalQuotaCounter.used).where(FiscalQuotaCounter.company_id == company_id)
+            )
+        ).first()
+
+
+async def _config(engine, company_id) -> CompanyBillingConfig:
+    async with AsyncSession(engine) as session:
+        return (
+            await session.exec(
+                select(CompanyBillingConfig).where(CompanyBillingConfig.company_id == company_id)
+            )
+        ).one()
+
+
+async def _blocks(engine, company_id) -> list[FiscalNumberBlock]:
+    async with AsyncSession(engine) as session:
+        return (
+            await session.exec(
+                select(FiscalNumberBlock)
+                .where(FiscalNumberBlock.company_id == company_id)
+                .order_by(FiscalNumberBlock.id)
+            )
+        ).all()
+
+
+async def _age_blocks(engine, company_id, seconds):
+    async with AsyncSession(engine) as session:
+        for block in (
+            await session.exec(
+                select(FiscalNumberBlock).where(FiscalNumberBlock.company_id == company_id)
+            )
+        ).all():
+            block.lease_until = utc_now_naive() - timedelta(seconds=seconds)
+            session.add(block)
+        await session.commit()
+
+
+def test_argentina_keeps_strict_sequence(monkeypatch):
+    monkeypatch.setattr(fn, "FISCAL_NUMBER_BLOCK_SIZE", 5)
+    assert uses_number_blocks(SimpleNamespace(country="PE"))
+    assert not uses_number_blocks(SimpleNamespace(country="AR"))
+    monkeypatch.setattr(fn, "FISCAL_NUMBER_BLOCK_SIZE", 1)
+    assert not uses_number_blocks(SimpleNamespace(country="PE"))
+
+
+@pytest.mark.asyncio
+async def test_holders_get_disjoint_blocks(engine):
+    config = await _seed(engine)
+
+    taken = {"caja-1": [], "caja-2": []}
+    for _ in range(3):
+        for holder in taken:
+            taken[holder].append(await _take(engine, config, holder))
+
+    assert taken["caja-1"] == [("B001", 1), ("B001", 2), ("B001", 3)]
+    assert taken["caja-2"] == [("B001", 6), ("B001", 7), ("B001", 8)]
+    assert (await _config(engine, config.company_id)).current_sequence_boleta == 10
+
+
+@pytest.mark.asyncio
+async def test_exhausted_block_closes_and_series_are_independent(engine):
+    config = await _seed(engine)
+
+    numbers = [(await _take(engine, config, "caja-1"))[1] for _ in range(6)]
+    factura = await _take(engine, config, "caja-1", SERIE_FACTURA)
+
+    assert numbers == [1, 2, 3, 4, 5, 6]
+    assert factura == ("F001", 1)
+    blocks = await _blocks(engine, config.company_id)
+    assert [(b.serie, b.range_start, b.status) for b in blocks] == [
+        ("B001", 1, BLOCK_CLOSED),
+        ("B001", 6, BLOCK_OPEN),
+        ("F001", 1, BLOCK_OPEN),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_take_number_allocates_in_caller_transaction_without_prepare(engine):
+    config = await _seed(engine)
+
+    assert await _take(engine, config, "caja-1", prepare=False) == ("B001", 1)
+    assert await _take(engine, config, "caja-1", prepare=False, commit=False) == ("B001", 2)
+    assert await _take(engine, config, "caja-1", prepare=False) == ("B001", 2)
+
+    [block] = await _blocks(engine, config.company_id)
+    assert (block.holder, block.next_number) == ("caja-1", 3)
+    assert (await _config(engine, config.company_id)).current_sequence_boleta == 5
+
+
+@pytest.mark.asyncio
+async def test_prepare_skips_companies_without_blocks(engine):
+    config = await _seed(engine, country="AR")
+
+    assert await prepare_number_block(config.company_id, SERIE_BOLETA, holder="caja-1") is None
+    assert await _blocks(engine, config.company_id) == []
+
+
+@pytest.mark.asyncio
+async def test_rolled_back_number_is_reused(engine):
+    config = await _seed(engine)
+    await _take(engine, config, "caja-1")
+
+    assert await _take(engine, config, "caja-1", commit=False) == ("B001", 2)
+    assert await _take(engine, config, "caja-1") == ("B001", 2)
+
+
+@pytest.mark.asyncio
+async def test_expired_block_is_adopted_before_allocating(engine):
+    config = await _seed(engine)
+    await _take(engine, config, "caja-1")
+    await _age_blocks(engine, config.company_id, 1)
+
+    assert await _take(engine, config, "caja-2") == ("B001", 2)
+
+    [block] = await _blocks(engine, config.company_id)
+    assert block.holder == "caja-2"
+    assert (await _config(engine, config.company_id)).current_sequence_boleta == 5
+
+
+@pytest.mark.asyncio
+async def test_reconcile_returns_unused_tail_to_series(engine):
+    config = await _seed(engine)
+    await _take(engine, config, "caja-1")
+    await _take(engine, config, "caja-1")
+
+    stats = await reconcile_number_blocks("caja-1")
+
+    assert stats == {"blocks": 1, "returned": 3, "voided": 0}
+    assert (await _config(engine, config.company_id)).current_sequence_boleta == 2
+    [block] = await _blocks(engine, config.company_id)
+    assert block.status == BLOCK_RECONCILED
+    assert block.voided_count == 0
+    assert await _take(engine, config, "caja-2") == ("B001", 3)
+
+
+@pytest.mark.asyncio
+async def test_reconcile_voids_numbers_below_other_blocks(engine):
+    config = await _seed(engine)
+    await _take(engine, config, "caja-1")
+    await _take(engine, config, "caja-2")
+
+    stats = await reconcile_number_blocks("caja-1")
+
+    assert stats == {"blocks": 1, "returned": 0, "voided": 4}
+    assert (await _config(engine, config.company_id)).current_sequence_boleta == 10
+    first, second = await _blocks(engine, config.company_id)
+    assert (first.status, first.voided_count) == (BLOCK_RECONCILED, 4)
+    assert second.status == BLOCK_OPEN
+
+
+@pytest.mark.asyncio
+async def test_sweep_only_reconciles_abandoned_blocks(engine):
+    config = await _seed(engine)
+    await _take(engine, config, "caja-1")
+
+    assert (await reconcile_number_blocks())["blocks"] == 0
+
+    await _age_blocks(engine, config.company_id, fn.FISCAL_NUMBER_BLOCK_ABANDON_SECONDS + 60)
+    assert await reconcile_number_blocks() == {"blocks": 1, "returned": 4, "voided": 0}
+
+
+@pytest.mark.asyncio
+async def test_reconcile_voids_blocks_of_replaced_series(engine):
+    config = await _seed(engine)
+    await _take(engine, config, "caja-1")
+    async with AsyncSession(engine) as session:
+        current = await session.get(CompanyBillingConfig, config.id)
+        current.serie_boleta = "B002"
+        current.current_sequence_boleta = 0
+        session.add(current)
+        await session.commit()
+
+    assert await reconcile_number_blocks() == {"blocks": 1, "returned": 0, "voided": 4}
+
+
+@pytest.mark.asyncio
+async def test_quota_counter_enforces_monthly_limit(engine):
+    config = await _seed(engine, max_billing_limit=2)
+
+    assert [await _reserve(engine, config) for _ in range(3)] == [True, True, False]
+
+    async with AsyncSession(engine) as session:
+        counter = (await session.exec(select(FiscalQuotaCounter))).one()
+    assert counter.used == 2
+    assert counter.period == utc_now_naive().strftime("%Y%m")
+
+
+@pytest.mark.asyncio
+async def test_quota_counter_seeds_from_same_month_config_count(engine):
+    this_month = await _seed(
+        engine,
+        max_billing_limit=5,
+        current_billing_count=4,
+        billing_count_reset_date=utc_now_naive(),
+    )
+    last_month = await _seed(
+        engine,
+        max_billing_limit=5,
+        current_billing_count=4,
+        billing_count_reset_date=utc_now_naive() - timedelta(days=40),
+    )
+
+    assert [await _reserve(engine, this_month) for _ in range(2)] == [True, False]
+    assert [await _reserve(engine, last_month) for _ in range(5)] == [True] * 5
+
+
+@pytest.mark.asyncio
+async def test_rolled_back_emission_returns_quota(engine):
+    config = await _seed(engine, max_billing_limit=2)
+
+    assert await _reserve(engine, config, commit=False)
+    assert await _used(engine, config.company_id) is None
+
+    assert await _reserve(engine, config)
+    assert await _reserve(engine, config, commit=False)
+    assert await _used(engine, config.company_id) == 1
+    assert await _reserve(engine, config)
+    assert not await _reserve(engine, config)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_emissions_on_locking_backend(locking_engine):
+    config = await _seed(locking_engine, max_billing_limit=100)
+
+    async def _emit(holder: str) -> tuple[str, int]:
+        # Mismo orden que emit_fiscal_document: bloque antes, cupo y número
+        # dentro de la transacción de emisión.
+        await prepare_number_block(config.company_id, SERIE_BOLETA, holder=holder)
+        async with AsyncSession(locking_engine, expire_on_commit=False) as session:
+            await session.exec(
+                select(CompanyBillingConfig).where(CompanyBillingConfig.company_id == config.company_id)
+            )
+            await asyncio.sleep(0.01)
+            assert await reserve_quota(session, config)
+            taken = await take_number(session, config, SERIE_BOLETA, holder=holder)
+            await session.commit()
+        return taken
+
+    async def _terminal(holder: str) -> list[int]:
+        return [(await _emit(holder))[1] for _ in range(3)]
+
+    holders = [f"caja-{idx}" for idx in range(4)]
+    taken = await asyncio.gather(*(_terminal(holder) for holder in holders))
+
+    numbers = [number for terminal in taken for number in terminal]
+    assert len(set(numbers)) == 12
+    for terminal in taken:
+        assert terminal == list(range(terminal[0], terminal[0] + 3))
+    assert await _used(locking_engine, config.company_id) == 12
+    assert len(await _blocks(locking_engine, config.company_id)) == 4
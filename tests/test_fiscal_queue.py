@@ -0,0 +1,517 @@
+"""Cola de emisión fiscal — :mod:`app.services.fiscal_queue`.
+
+Corre contra SQLite async; ``emit_fiscal_document`` / ``retry_fiscal_document``
+se reemplazan por fakes que devuelven el ``FiscalDocument`` resultante.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import itertools
+import os
+from datetime import timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+os.environ.setdefault("TENANT_STRICT", "0")
+
+from app.models import Branch, Company, Sale
+from app.models.billing import CompanyBillingConfig, FiscalEmissionJob
+from app.services import fiscal_queue as fq
+from app.services.billing_service import MAX_RETRY_ATTEMPTS
+from app.services.fiscal_queue import (
+    STATUS_DONE,
+    STATUS_FAILED,
+    STATUS_QUEUED,
+    STATUS_RUNNING,
+    FiscalQueueDispatcher,
+    enqueue_fiscal_emission,
+    get_fiscal_job_status,
+)
+from app.utils.tenant import tenant_bypass
+from app.utils.timezone import utc_now_naive
+
+_rucs = itertools.count(20100000001)
+
+
+@pytest_asyncio.fixture
+async def engine(monkeypatch, tmp_path):
+    # Archivo y no ``:memory:``: cada sesión con su conexión, como en
+    # Postgres; con una sola conexión compartida, el rollback de una sesión
+    # concurrente se lleva el UPDATE aún no commiteado de otra.
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'fiscal_queue.db'}",
+        echo=False,
+        connect_args={"timeout": 5},
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+    @contextlib.asynccontextmanager
+    async def _session():
+        async with AsyncSession(engine) as session:
+            yield session
+
+    monkeypatch.setattr(fq, "get_async_session", _session)
+    monkeypatch.setattr(fq, "circuit_open", lambda _name: False)
+    yield engine
+    await engine.dispose()
+
+
+async def _seed(engine, *, country="PE", billing=True, sales=1):
+    """Empresa + sucursal + ``sales`` ventas; devuelve (company_id, branch_id, sale_ids)."""
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        with tenant_bypass():
+            company = Company(name="Co", ruc=str(next(_rucs)))
+            session.add(company)
+            await session.flush()
+            branch = Branch(name="Main", company_id=company.id)
+            session.add(branch)
+            await session.flush()
+            if billing:
+                session.add(CompanyBillingConfig(
+                    company_id=company.id, country=country, is_active=True
+                ))
+            sale_ids = []
+            for _ in range(sales):
+                sale = Sale(
+                    total_amount=Decimal("5.00"),
+                    company_id=company.id,
+                    branch_id=branch.id,
+                )
+                session.add(sale)
+                await session.flush()
+                sale_ids.append(sale.id)
+            await session.commit()
+        return company.id, branch.id, sale_ids
+
+
+async def _job(engine, job_id) -> FiscalEmissionJob:
+    async with AsyncSession(engine) as session:
+        return (
+            await session.exec(select(FiscalEmissionJob).where(FiscalEmissionJob.id == job_id))
+        ).one()
+
+
+async def _update_job(engine, job_id, **values) -> None:
+    async with AsyncSession(engine) as session:
+        row = await session.get(FiscalEmissionJob, job_id)
+        for name, value in values.items():
+            setattr(row, name, value)
+        session.add(row)
+        await session.commit()
+
+
+async def _drain(dispatcher: FiscalQueueDispatcher) -> None:
+    await asyncio.gather(*list(dispatcher._tasks.values()))
+
+
+def _doc(status, *, doc_id=1, retry_count=1, number="B001-00000001"):
+    return SimpleNamespace(
+        id=doc_id,
+        fiscal_status=status,
+        retry_count=retry_count,
+        full_number=number,
+        fiscal_errors='{"error": "timeout"}' if status == "error" else None,
+    )
+
+
+class _FakeProvider:
+    """Reemplaza emit/retry y registra qué ventas se emitieron."""
+
+    def __init__(self, monkeypatch, *results):
+        self.results = list(results)
+        self.emitted: list[int] = []
+        self.retried: list[int] = []
+        self.batches: list[list[int]] = []
+        self.on_emit = None  # hook async(sale_id) antes de cada emisión
+        monkeypatch.setattr(fq, "emit_fiscal_document", self.emit)
+        monkeypatch.setattr(fq, "retry_fiscal_document", self.retry)
+        monkeypatch.setattr(fq, "authorize_fiscal_batch", self.authorize)
+
+    def _next(self):
+        result = self.results.pop(0) if self.results else _doc("authorized")
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def emit(self, *, sale_id, send_now=True, **_kw):
+        if self.on_emit is not None:
+            await self.on_emit(sale_id)
+        self.emitted.append(sale_id)
+        if not send_now:
+            # Numerado y sin enviar; el id del documento es el de la venta.
+            return _doc("pending", doc_id=sale_id, retry_count=0)
+        return self._next()
+
+    async def authorize(self, fiscal_doc_ids, company_id, branch_id):
+        self.batches.append(list(fiscal_doc_ids))
+        return [_doc("authorized", doc_id=doc_id) for doc_id in fiscal_doc_ids]
+
+    async def retry(self, *, fiscal_doc_id, **_kw):
+        self.retried.append(fiscal_doc_id)
+        return self._next()
+
+
+@pytest.fixture(autouse=True)
+def _fast_backoff(monkeypatch):
+    monkeypatch.setattr(fq, "FISCAL_QUEUE_BACKOFF_BASE_SECONDS", 5.0)
+    monkeypatch.setattr(fq, "FISCAL_QUEUE_BACKOFF_MAX_SECONDS", 60.0)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Encolado
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+async def test_enqueue_without_active_billing_returns_none(engine):
+    company_id, branch_id, (sale_id,) = await _seed(engine, billing=False)
+    assert await enqueue_fiscal_emission(sale_id, company_id, branch_id, "boleta") is None
+
+
+async def test_enqueue_is_idempotent_per_sale_and_type(engine):
+    company_id, branch_id, (sale_id,) = await _seed(engine, country="AR")
+
+    first = await enqueue_fiscal_emission(sale_id, company_id, branch_id, "factura")
+    again = await enqueue_fiscal_emission(sale_id, company_id, branch_id, "factura")
+
+    assert first.status == STATUS_QUEUED
+    assert again.id == first.id
+    assert (await _job(engine, first.id)).provider == "afip_wsfe"
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Orden por empresa y claim
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+async def test_one_job_per_company_in_sale_order(engine, monkeypatch):
+    provider = _FakeProvider(monkeypatch)
+    a_company, a_branch, a_sales = await _seed(engine, sales=2)
+    b_company, b_branch, (b_sale,) = await _seed(engine)
+    for sale_id in a_sales:
+        await enqueue_fiscal_emission(sale_id, a_company, a_branch, "boleta")
+    await enqueue_fiscal_emission(b_sale, b_company, b_branch, "boleta")
+
+    dispatcher = FiscalQueueDispatcher()
+    assert await dispatcher.dispatch_once() == 2
+    await _drain(dispatcher)
+    assert sorted(provider.emitted) == sorted([a_sales[0], b_sale])
+
+    assert await dispatcher.dispatch_once() == 1
+    await _drain(dispatcher)
+    assert provider.emitted[-1] == a_sales[1]
+
+
+async def test_concurrent_dispatchers_claim_a_job_once(engine, monkeypatch):
+    provider = _FakeProvider(monkeypatch)
+    company_id, branch_id, (sale_id,) = await _seed(engine)
+    await enqueue_fiscal_emission(sale_id, company_id, branch_id, "boleta")
+
+    first, second = FiscalQueueDispatcher(), FiscalQueueDispatcher()
+    claimed = await asyncio.gather(first.dispatch_once(), second.dispatch_once())
+    await asyncio.gather(_drain(first), _drain(second))
+
+    assert sum(claimed) == 1
+    assert provider.emitted == [sale_id]
+
+
+async def test_expired_lease_is_reclaimed(engine, monkeypatch):
+    provider = _FakeProvider(monkeypatch)
+    company_id, branch_id, (sale_id,) = await _seed(engine)
+    job = await enqueue_fiscal_emission(sale_id, company_id, branch_id, "boleta")
+    async with AsyncSession(engine) as session:
+        row = await session.get(FiscalEmissionJob, job.id)
+        row.status = STATUS_RUNNING
+        row.locked_until = utc_now_naive() + timedelta(seconds=60)
+        session.add(row)
+        await session.commit()
+
+    dispatcher = FiscalQueueDispatcher()
+    assert await dispatcher.dispatch_once() == 0
+
+    async with AsyncSession(engine) as session:
+        row = await session.get(FiscalEmissionJob, job.id)
+        row.locked_until = utc_now_naive() - timedelta(seconds=1)
+        session.add(row)
+        await session.commit()
+
+    assert await dispatcher.dispatch_once() == 1
+    await _drain(dispatcher)
+    assert provider.emitted == [sale_id]
+    assert (await get_fiscal_job_status(job.id)).status == STATUS_DONE
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Resultados, backoff y proveedor
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+async def test_authorized_result_is_stored_for_the_pos(engine, monkeypatch):
+    _FakeProvider(monkeypatch, _doc("authorized", doc_id=7, number="B001-00000042"))
+    company_id, branch_id, (sale_id,) = await _seed(engine)
+    job = await enqueue_fiscal_emission(sale_id, company_id, branch_id, "boleta")
+
+    dispatcher = FiscalQueueDispatcher()
+    await dispatcher.dispatch_once()
+    await _drain(dispatcher)
+
+    status = await get_fiscal_job_status(job.id)
+    assert (status.status, status.fiscal_status, status.full_number) == (
+        STATUS_DONE, "authorized", "B001-00000042"
+    )
+    assert status.finished
+    assert (await _job(engine, job.id)).fiscal_document_id == 7
+
+
+async def test_error_requeues_with_backoff_and_retries_the_document(engine, monkeypatch):
+    provider = _FakeProvider(monkeypatch, _doc("error", doc_id=9), _doc("authorized", doc_id=9))
+    company_id, branch_id, (sale_id,) = await _seed(engine)
+    job = await enqueue_fiscal_emission(sale_id, company_id, branch_id, "boleta")
+    dispatcher = FiscalQueueDispatcher()
+
+    await dispatcher.dispatch_once()
+    await _drain(dispatcher)
+    row = await _job(engine, job.id)
+    assert (row.status, row.attempts, row.fiscal_document_id) == (STATUS_QUEUED, 1, 9)
+    assert row.next_attempt_at > utc_now_naive() + timedelta(seconds=4)
+    assert row.last_error
+
+    # No se toma antes del backoff.
+    assert await dispatcher.dispatch_once() == 0
+
+    async with AsyncSession(engine) as session:
+        stored = await session.get(FiscalEmissionJob, job.id)
+        stored.next_attempt_at = utc_now_naive() - timedelta(seconds=1)
+        session.add(stored)
+        await session.commit()
+    dispatcher._throttles.clear()  # sin la pausa del proveedor
+    assert await dispatcher.dispatch_once() == 1
+    await _drain(dispatcher)
+
+    assert provider.emitted == [sale_id]
+    assert provider.retried == [9]
+    assert (await get_fiscal_job_status(job.id)).status == STATUS_DONE
+
+
+async def test_document_out_of_retries_marks_job_failed(engine, monkeypatch):
+    _FakeProvider(monkeypatch, _doc("error", retry_count=MAX_RETRY_ATTEMPTS))
+    company_id, branch_id, (sale_id,) = await _seed(engine)
+    job = await enqueue_fiscal_emission(sale_id, company_id, branch_id, "boleta")
+
+    dispatcher = FiscalQueueDispatcher()
+    await dispatcher.dispatch_once()
+    await _drain(dispatcher)
+
+    assert (await get_fiscal_job_status(job.id)).status == STATUS_FAILED
+
+
+async def test_exceptions_count_attempts_until_failed(engine, monkeypatch):
+    monkeypatch.setattr(fq, "FISCAL_QUEUE_MAX_ATTEMPTS", 1)
+    _FakeProvider(monkeypatch, RuntimeError("boom"))
+    company_id, branch_id, (sale_id,) = await _seed(engine)
+    job = await enqueue_fiscal_emission(sale_id, company_id, branch_id, "boleta")
+
+    dispatcher = FiscalQueueDispatcher()
+    await dispatcher.dispatch_once()
+    await _drain(dispatcher)
+
+    status = await get_fiscal_job_status(job.id)
+    assert status.status == STATUS_FAILED
+    assert status.last_error == "boom"
+
+
+async def test_provider_error_pauses_other_companies_on_that_provider(engine, monkeypatch):
+    provider = _FakeProvider(monkeypatch, _doc("error"))
+    pe_company, pe_branch, (pe_sale,) = await _seed(engine)
+    await enqueue_fiscal_emission(pe_sale, pe_company, pe_branch, "boleta")
+    dispatcher = FiscalQueueDispatcher()
+    await dispatcher.dispatch_once()
+    await _drain(dispatcher)
+
+    other_pe, other_pe_branch, (other_pe_sale,) = await _seed(engine)
+    ar_company, ar_branch, (ar_sale,) = await _seed(engine, country="AR")
+    await enqueue_fiscal_emission(other_pe_sale, other_pe, other_pe_branch, "boleta")
+    await enqueue_fiscal_emission(ar_sale, ar_company, ar_branch, "factura")
+
+    assert await dispatcher.dispatch_once() == 1
+    await _drain(dispatcher)
+    assert provider.emitted == [pe_sale, ar_sale]
+
+
+async def test_open_circuit_defers_without_spending_attempts(engine, monkeypatch):
+    provider = _FakeProvider(monkeypatch)
+    monkeypatch.setattr(fq, "circuit_open", lambda name: name == "nubefact")
+    company_id, branch_id, (sale_id,) = await _seed(engine)
+    job = await enqueue_fiscal_emission(sale_id, company_id, branch_id, "boleta")
+
+    dispatcher = FiscalQueueDispatcher()
+    assert await dispatcher.dispatch_once() == 0
+    assert provider.emitted == []
+    row = await _job(engine, job.id)
+    assert (row.status, row.attempts) == (STATUS_QUEUED, 0)
+
+
+async def test_provider_concurrency_is_capped(engine, monkeypatch):
+    monkeypatch.setattr(fq, "FISCAL_QUEUE_PROVIDER_CONCURRENCY", 2)
+    in_flight = peak = 0
+
+    async def _slow_emit(**_kw):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.02)
+        in_flight -= 1
+        return _doc("authorized")
+
+    monkeypatch.setattr(fq, "emit_fiscal_document", _slow_emit)
+    for _ in range(5):
+        company_id, branch_id, (sale_id,) = await _seed(engine)
+        await enqueue_fiscal_emission(sale_id, company_id, branch_id, "boleta")
+
+    dispatcher = FiscalQueueDispatcher()
+    assert await dispatcher.dispatch_once() == 5
+    await _drain(dispatcher)
+    assert peak == 2
+
+
+def test_provider_pause_doubles_on_errors_and_halves_on_success():
+    throttle = fq._ProviderThrottle(asyncio.Semaphore(1))
+    throttle.record(False)
+    throttle.record(False)
+    assert throttle.penalty == 10.0
+    assert throttle.paused()
+    throttle.record(True)
+    assert throttle.penalty == 5.0
+    throttle.record(True)
+    assert throttle.penalty == 0.0
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Lote AFIP
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+async def test_afip_jobs_of_a_company_go_in_one_batch(engine, monkeypatch):
+    provider = _FakeProvider(monkeypatch)
+    company_id, branch_id, sale_ids = await _seed(engine, country="AR", sales=3)
+    jobs = [
+        await enqueue_fiscal_emission(sale_id, company_id, branch_id, "boleta")
+        for sale_id in sale_ids
+    ]
+
+    dispatcher = FiscalQueueDispatcher()
+    assert await dispatcher.dispatch_once() == 1
+    await _drain(dispatcher)
+
+    assert provider.emitted == sale_ids
+    assert provider.batches == [sale_ids]
+    for job, sale_id in zip(jobs, sale_ids):
+        row = await _job(engine, job.id)
+        assert (row.status, row.fiscal_status, row.fiscal_document_id) == (
+            STATUS_DONE, "authorized", sale_id
+        )
+
+
+async def test_afip_batch_stops_at_a_job_being_retried(engine, monkeypatch):
+    monkeypatch.setattr(fq, "FISCAL_QUEUE_BATCH_SIZE", 3)
+    provider = _FakeProvider(monkeypatch)
+    company_id, branch_id, sale_ids = await _seed(engine, country="AR", sales=4)
+    jobs = [
+        await enqueue_fiscal_emission(sale_id, company_id, branch_id, "boleta")
+        for sale_id in sale_ids
+    ]
+    async with AsyncSession(engine) as session:
+        retried = await session.get(FiscalEmissionJob, jobs[2].id)
+        retried.attempts = 1
+        session.add(retried)
+        await session.commit()
+
+    dispatcher = FiscalQueueDispatcher()
+    await dispatcher.dispatch_once()
+    await _drain(dispatcher)
+
+    assert provider.batches == [sale_ids[:2]]
+    assert (await _job(engine, jobs[2].id)).status == STATUS_QUEUED
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Lease
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+async def test_result_is_not_written_after_losing_the_lease(engine, monkeypatch):
+    provider = _FakeProvider(monkeypatch, _doc("authorized", doc_id=7))
+    company_id, branch_id, (sale_id,) = await _seed(engine)
+    job = await enqueue_fiscal_emission(sale_id, company_id, branch_id, "boleta")
+
+    async def _lease_taken_over(_sale_id):
+        # El lease venció durante la emisión y otra réplica retomó el job.
+        await _update_job(engine, job.id, claimed_by="otra-replica")
+
+    provider.on_emit = _lease_taken_over
+    dispatcher = FiscalQueueDispatcher()
+    await dispatcher.dispatch_once()
+    await _drain(dispatcher)
+
+    row = await _job(engine, job.id)
+    assert (row.status, row.claimed_by, row.attempts) == (STATUS_RUNNING, "otra-replica", 0)
+    assert row.fiscal_document_id is None
+
+
+async def test_afip_batch_renews_the_lease_before_each_document(engine, monkeypatch):
+    provider = _FakeProvider(monkeypatch)
+    company_id, branch_id, sale_ids = await _seed(engine, country="AR", sales=3)
+    jobs = [
+        await enqueue_fiscal_emission(sale_id, company_id, branch_id, "boleta")
+        for sale_id in sale_ids
+    ]
+    leases = []
+
+    async def _expire_leases(_sale_id):
+        now = utc_now_naive()
+        for job in jobs:
+            leases.append((await _job(engine, job.id)).locked_until > now)
+            await _update_job(engine, job.id, locked_until=now - timedelta(seconds=1))
+
+    provider.on_emit = _expire_leases
+    dispatcher = FiscalQueueDispatcher()
+    await dispatcher.dispatch_once()
+    await _drain(dispatcher)
+
+    assert all(leases) and len(leases) == 9
+    for job in jobs:
+        row = await _job(engine, job.id)
+        assert (row.status, row.claimed_by) == (STATUS_DONE, None)
+
+
+async def test_afip_batch_stops_where_the_lease_was_lost(engine, monkeypatch):
+    provider = _FakeProvider(monkeypatch)
+    company_id, branch_id, sale_ids = await _seed(engine, country="AR", sales=3)
+    jobs = [
+        await enqueue_fiscal_emission(sale_id, company_id, branch_id, "boleta")
+        for sale_id in sale_ids
+    ]
+
+    async def _second_job_taken_over(sale_id):
+        if sale_id == sale_ids[0]:
+            await _update_job(engine, jobs[1].id, claimed_by="otra-replica")
+
+    provider.on_emit = _second_job_taken_over
+    dispatcher = FiscalQueueDispatcher()
+    await dispatcher.dispatch_once()
+    await _drain(dispatcher)
+
+    # No se numera nada detrás de un job ajeno; lo no emitido vuelve a la cola.
+    assert provider.emitted == [sale_ids[0]]
+    assert provider.batches == [[sale_ids[0]]]
+    assert (await _job(engine, jobs[0].id)).status == STATUS_DONE
+    assert (await _job(engine, jobs[1].id)).claimed_by == "otra-replica"
+    released = await _job(engine, jobs[2].id)
+    assert (released.status, released.attempts, released.claimed_by) == (STATUS_QUEUED, 0, None)
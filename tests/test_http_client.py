@@ -0,0 +1,155 @@
+"""Clientes HTTP compartidos — :mod:`app.utils.http_client`.
+
+Corre contra un servidor HTTP/1.1 local mínimo (``asyncio.start_server``)
+que cuenta conexiones aceptadas y responde con el status configurado.
+"""
+from __future__ import annotations
+
+import asyncio
+
+import httpx
+import pytest
+
+from app.utils import http_client as http
+from app.utils.http_client import (
+    CircuitOpenError,
+    breaker_state,
+    close_http_clients,
+    http_client,
+    reset_http_breakers,
+)
+
+
+class _StubServer:
+    def __init__(self, status: int = 200):
+        self.status = status
+        self.connections = 0
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.delay = 0.0
+        self._server: asyncio.AbstractServer | None = None
+
+    async def __aenter__(self) -> "_StubServer":
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}/"
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.decode().split("\r\n"):
+                    if line.lower().startswith("content-length:"):
+                        length = int(line.split(":", 1)[1])
+                if length:
+                    await reader.readexactly(length)
+                self.requests += 1
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                self.in_flight -= 1
+                body = b"ok"
+                writer.write(
+                    f"HTTP/1.1 {self.status} X\r\nContent-Length: {len(body)}\r\n"
+                    "Connection: keep-alive\r\n\r\n".encode() + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+@pytest.fixture(autouse=True)
+async def _clean_clients():
+    reset_http_breakers()
+    yield
+    await close_http_clients()
+    reset_http_breakers()
+
+
+async def test_connections_are_reused_across_calls():
+    async with _StubServer() as server:
+        for _ in range(5):
+            async with http_client("stub") as client:
+                response = await client.post(server.url, content=b"<soap/>")
+            assert response.status_code == 200
+
+    assert server.requests == 5
+    assert server.connections == 1
+
+
+async def test_concurrency_is_capped_per_upstream(monkeypatch):
+    monkeypatch.setattr(http, "HTTP_MAX_CONCURRENCY", 2)
+
+    async def _call(url):
+        async with http_client("stub") as client:
+            await client.get(url)
+
+    async with _StubServer() as server:
+        server.delay = 0.05
+        await asyncio.gather(*(_call(server.url) for _ in range(6)))
+
+    assert server.requests == 6
+    assert server.max_in_flight <= 2
+
+
+async def test_breaker_opens_after_consecutive_5xx_and_skips_network(monkeypatch):
+    monkeypatch.setattr(http, "HTTP_BREAKER_FAILURES", 3)
+    async with _StubServer(status=503) as server:
+        for _ in range(3):
+            async with http_client("stub") as client:
+                await client.get(server.url)
+
+        with pytest.raises(CircuitOpenError):
+            async with http_client("stub") as client:
+                await client.get(server.url)
+
+    assert server.requests == 3
+    assert breaker_state()["stub"]["open"] is True
+    # Los except httpx.ConnectError de los services lo tratan como caída.
+    assert issubclass(CircuitOpenError, httpx.ConnectError)
+
+
+async def test_breaker_half_open_probe_closes_on_success(monkeypatch):
+    monkeypatch.setattr(http, "HTTP_BREAKER_FAILURES", 2)
+    monkeypatch.setattr(http, "HTTP_BREAKER_RESET_SECONDS", 0.0)
+    async with _StubServer(status=500) as server:
+        for _ in range(2):
+            async with http_client("stub") as client:
+                await client.get(server.url)
+        assert breaker_state()["stub"]["open"] is True
+
+        server.status = 200
+        async with http_client("stub") as client:
+            await client.get(server.url)
+
+    state = breaker_state()["stub"]
+    assert (state["failures"], state["open"]) == (0, False)
+
+
+async def test_connect_errors_count_as_failures(monkeypatch):
+    monkeypatch.setattr(http, "HTTP_BREAKER_FAILURES", 2)
+    async with _StubServer() as server:
+        url = server.url
+    # Servidor cerrado: conexión rechazada.
+    for _ in range(2):
+        with pytest.raises(httpx.ConnectError):
+            async with http_client("stub", timeout=1) as client:
+                await client.get(url)
+
+    with pytest.raises(CircuitOpenError):
+        async with http_client("stub") as client:
+            await client.get(url)
@@ -0,0 +1,231 @@
+"""Importación masiva de inventario — :mod:`app.services.inventory_import`.
+
+El archivo se escribe en disco (como lo deja ``save_import_file``) y se
+importa contra SQLite en memoria (upsert ``ON CONFLICT``).
+
+Cobertura:
+  * Lectura streaming de CSV con alias, BOM y ``;`` como separador.
+  * Validación por fila: errores acotados, unidad entera con stock decimal.
+  * Preview: muestra acotada y conteos sin escribir.
+  * Importación: altas, actualizaciones, stock gestionado por variantes,
+    precio vacío que conserva el actual, movimientos y categorías.
+  * Códigos que difieren sólo en mayúsculas (collation ``NOCASE``).
+  * Las queries crecen por bloque, no por fila.
+"""
+from __future__ import annotations
+
+import csv
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import String
+from sqlmodel import Session, SQLModel, create_engine, select
+
+import app.services.inventory_import as inventory_import
+from app.models import Category, Product, ProductVariant, StockMovement
+from app.services.inventory_import import (
+    ImportRowError,
+    analyze_inventory_import,
+    apply_inventory_import,
+    iter_import_rows,
+    parse_import_row,
+)
+from app.utils.performance import capture_queries
+
+TENANT = {"company_id": 1, "branch_id": 1}
+HEADERS = ["Código", "Descripción", "Categoría", "Stock", "Unidad", "Costo", "PVP"]
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def _session(engine) -> Session:
+    session = Session(engine)
+    session.info["tenant_bypass"] = True
+    return session
+
+
+def _write_csv(tmp_path, rows, name="catalogo.csv") -> str:
+    path = tmp_path / name
+    with open(path, "w", newline="", encoding="utf-8-sig") as fh:
+        writer = csv.writer(fh, delimiter=";")
+        writer.writerow(HEADERS)
+        writer.writerows(rows)
+    return str(path)
+
+
+def _catalog(n):
+    return [
+        [f"P{i:05d}", f"Producto {i}", "bebidas", str(i % 7), "Unidad", "1.50", "2.50"]
+        for i in range(n)
+    ]
+
+
+def test_iter_import_rows_maps_aliases_and_sniffs_delimiter(tmp_path):
+    path = _write_csv(tmp_path, [["779", "Agua", "bebidas", "5", "Unidad", "1", ""]])
+
+    rows = list(iter_import_rows(path))
+
+    assert rows == [(2, {
+        "barcode": "779",
+        "description": "Agua",
+        "category": "bebidas",
+        "stock": "5",
+        "unit": "Unidad",
+        "purchase_price": "1",
+        "sale_price": "",
+    })]
+
+
+def test_parse_import_row_validates_and_normalizes():
+    row = parse_import_row(3, {"barcode": " 779 ", "description": "Agua", "stock": "2"})
+    assert row.category == "GENERAL"
+    assert row.stock == Decimal("2")
+    assert row.price_from_margin
+
+    with pytest.raises(ImportRowError, match="código de barras vacío"):
+        parse_import_row(4, {"barcode": "", "description": "Agua"})
+    with pytest.raises(ImportRowError, match="valores numéricos"):
+        parse_import_row(5, {"barcode": "1", "description": "Agua", "stock": "abc"})
+    with pytest.raises(ImportRowError, match="no admite decimales"):
+        parse_import_row(6, {"barcode": "1", "description": "Agua", "stock": "1.5"})
+    assert parse_import_row(
+        7, {"barcode": "1", "description": "Queso", "stock": "1.5", "unit": "Kg"}, {"kg"}
+    ).stock == Decimal("1.5")
+
+
+def test_preview_keeps_only_a_sample_and_writes_nothing(engine, tmp_path, monkeypatch):
+    monkeypatch.setattr(inventory_import, "IMPORT_PREVIEW_LIMIT", 5)
+    rows = _catalog(20) + [["", "Sin código", "", "1", "", "", ""]]
+    path = _write_csv(tmp_path, rows)
+
+    with _session(engine) as session:
+        summary = analyze_inventory_import(session, path, **TENANT, global_margin=0.0)
+        assert session.exec(select(Product)).all() == []
+
+    assert summary.stats() == {
+        "new": 20, "updated": 0, "errors": 1, "total": 21,
+        "stock_locked": 0, "margin_missing": 0,
+    }
+    assert len(summary.preview) == 5
+    assert summary.error_messages == ["Fila 22: código de barras vacío."]
+
+
+def test_apply_upserts_products_categories_and_movements(engine, tmp_path):
+    with _session(engine) as session:
+        simple = Product(
+            barcode="A1", description="Viejo", stock=Decimal("4"),
+            sale_price=Decimal("9.00"), **TENANT,
+        )
+        managed = Product(barcode="V1", description="Remera", stock=Decimal("10"), **TENANT)
+        session.add_all([simple, managed])
+        session.flush()
+        session.add(ProductVariant(product_id=managed.id, sku="V1-M", stock=Decimal("10"), **TENANT))
+        session.commit()
+
+    path = _write_csv(tmp_path, [
+        ["A1", "Nuevo nombre", "limpieza", "7", "Unidad", "2", ""],
+        ["V1", "Remera lisa", "ropa", "99", "Unidad", "5", "20"],
+        ["N1", "Alta", "limpieza", "3", "Unidad", "1", ""],
+        ["N2", "Alta sin stock", "", "0", "Unidad", "1", "4"],
+        ["N3", "Decimal", "", "1.5", "Unidad", "1", "4"],
+    ])
+
+    with _session(engine) as session:
+        summary = apply_inventory_import(session, path, **TENANT, user_id=None)
+
+    assert (summary.new, summary.updated, summary.stock_locked, summary.errors) == (2, 2, 1, 1)
+    with _session(engine) as session:
+        products = {p.barcode: p for p in session.exec(select(Product)).all()}
+        assert products["A1"].description == "Nuevo nombre"
+        assert products["A1"].category == "LIMPIEZA"
+        assert products["A1"].stock == Decimal("7")
+        # P.Venta vacía en un producto existente: se conserva el precio.
+        assert products["A1"].sale_price == Decimal("9.00")
+        # Stock gestionado por variantes: no se pisa.
+        assert products["V1"].stock == Decimal("10")
+        assert products["V1"].sale_price == Decimal("20.00")
+        assert products["N1"].sale_price is None
+        assert products["N1"].is_active is True
+        assert "N3" not in products
+
+        movements = {
+            m.product_id: m for m in session.exec(select(StockMovement)).all()
+        }
+        assert set(movements) == {products["A1"].id, products["N1"].id}
+        assert movements[products["A1"].id].quantity == Decimal("3")
+        assert movements[products["A1"].id].description.startswith("Importación masiva (ajuste)")
+        assert movements[products["N1"].id].quantity == Decimal("3")
+
+        categories = set(session.exec(select(Category.name)).all())
+        assert {"LIMPIEZA", "ROPA", "GENERAL"} <= categories
+
+
+def test_repeated_barcode_applies_rows_in_order(engine, tmp_path):
+    path = _write_csv(tmp_path, [
+        ["R1", "Primera", "", "5", "Unidad", "1", "3"],
+        ["R1", "Segunda", "", "8", "Unidad", "1", ""],
+    ])
+
+    with _session(engine) as session:
+        summary = apply_inventory_import(session, path, **TENANT, user_id=None)
+
+    assert (summary.new, summary.updated) == (1, 1)
+    with _session(engine) as session:
+        product = session.exec(select(Product)).one()
+        assert product.description == "Segunda"
+        assert product.sale_price == Decimal("3.00")
+        total = sum(m.quantity for m in session.exec(select(StockMovement)).all())
+        assert total == Decimal("8")
+
+
+def test_barcode_differing_only_in_case_updates_existing(tmp_path, monkeypatch):
+    # Como la collation ``_ci`` de MySQL: la BD devuelve "AB-01" para "ab-01".
+    monkeypatch.setattr(Product.__table__.c.barcode, "type", String(100, collation="NOCASE"))
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    with _session(engine) as session:
+        session.add(Product(barcode="AB-01", description="Viejo", stock=Decimal("4"), **TENANT))
+        session.commit()
+
+    path = _write_csv(tmp_path, [
+        ["ab-01", "Nuevo nombre", "", "6", "Unidad", "1", "2"],
+        [" Ab-01 ", "Otra vez", "", "9", "Unidad", "1", ""],
+    ])
+
+    with _session(engine) as session:
+        preview = analyze_inventory_import(session, path, **TENANT)
+        summary = apply_inventory_import(session, path, **TENANT, user_id=None)
+
+    assert (preview.new, preview.updated) == (0, 2)
+    assert (summary.new, summary.updated) == (0, 2)
+    with _session(engine) as session:
+        product = session.exec(select(Product)).one()
+        assert product.description == "Otra vez"
+        assert product.stock == Decimal("9")
+        [movement] = session.exec(select(StockMovement)).all()
+        assert movement.quantity == Decimal("5")
+    engine.dispose()
+
+
+def test_import_queries_grow_per_chunk_not_per_row(tmp_path, monkeypatch):
+    monkeypatch.setattr(inventory_import, "IMPORT_CHUNK_SIZE", 50)
+
+    def _queries(n):
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False})
+        SQLModel.metadata.create_all(engine)
+        path = _write_csv(tmp_path, _catalog(n), name=f"c{n}.csv")
+        with _session(engine) as session, capture_queries(f"import {n}") as unit:
+            apply_inventory_import(session, path, **TENANT, user_id=None)
+        engine.dispose()
+        return unit
+
+    few = _queries(10)
+    many = _queries(50)
+
+    assert many.count == few.count, many.describe()
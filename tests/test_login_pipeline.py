@@ -0,0 +1,142 @@
+"""Tests del pipeline de login — :mod:`app.utils.login_pipeline`.
+
+Cobertura:
+  * bcrypt corre fuera del thread del event loop; varios candidatos en un job.
+  * La cola de admisión rechaza con LoginBusyError en vez de encolar sin límite.
+  * Cache de JWT verificados: hit, expiración e invalidación por usuario.
+  * Fast path de ``AuthState.login``: respeta el ruteo por suscripción.
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+
+import bcrypt
+import pytest
+
+from app.utils import login_pipeline
+from app.utils.login_pipeline import (
+    LoginBusyError,
+    forget_verified_tokens,
+    get_verified_token,
+    hash_password,
+    login_pipeline_stats,
+    remember_verified_token,
+    reset_login_pipeline,
+    verify_password,
+    verify_password_candidates,
+)
+
+
+@pytest.fixture(autouse=True)
+def _fresh_pipeline():
+    reset_login_pipeline()
+    yield
+    reset_login_pipeline()
+
+
+def _fast_hash(password: bytes) -> str:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=4)).decode()
+
+
+@pytest.mark.asyncio
+async def test_verify_runs_off_loop_thread(monkeypatch):
+    seen = []
+    original = login_pipeline._check_many
+
+    def _spy(password, hashes):
+        seen.append(threading.get_ident())
+        return original(password, hashes)
+
+    monkeypatch.setattr(login_pipeline, "_check_many", _spy)
+    good = _fast_hash(b"secreto")
+    other = _fast_hash(b"otra")
+
+    matches = await verify_password_candidates(b"secreto", [other, good, "no-bcrypt"])
+
+    assert matches == [False, True, False]
+    assert seen and seen[0] != threading.get_ident()
+    assert login_pipeline_stats()["hash_calls"] == 1
+
+
+@pytest.mark.asyncio
+async def test_hash_password_roundtrip():
+    password_hash = await hash_password(b"clave-nueva")
+
+    assert await verify_password(b"clave-nueva", password_hash) is True
+    assert await verify_password(b"otra", password_hash) is False
+
+
+@pytest.mark.asyncio
+async def test_admission_queue_rejects_when_full(monkeypatch):
+    monkeypatch.setattr(login_pipeline, "LOGIN_HASH_MAX_WORKERS", 1)
+    monkeypatch.setattr(login_pipeline, "LOGIN_HASH_MAX_QUEUE", 1)
+
+    def _slow(password, hashes):
+        time.sleep(0.1)
+        return [True for _ in hashes]
+
+    monkeypatch.setattr(login_pipeline, "_check_many", _slow)
+
+    results = await asyncio.gather(
+        *(verify_password(b"x", "h") for _ in range(4)),
+        return_exceptions=True,
+    )
+
+    rejected = [r for r in results if isinstance(r, LoginBusyError)]
+    assert len(rejected) == 2
+    assert login_pipeline_stats()["hash_rejected"] == 2
+    assert login_pipeline_stats()["hash_pending"] == 0
+
+
+def test_verified_token_cache_hit_and_invalidation():
+    user = {"id": 7, "username": "cajero", "privileges": {"view_ventas": True}}
+    remember_verified_token("tok-a", user)
+    remember_verified_token("tok-b", user)
+    remember_verified_token("tok-c", {"id": 8, "username": "otro"})
+
+    cached = get_verified_token("tok-a")
+    assert cached == user
+    cached["privileges"]["view_ventas"] = False
+    assert get_verified_token("tok-a")["privileges"]["view_ventas"] is True
+
+    forget_verified_tokens(7)
+
+    assert get_verified_token("tok-a") is None
+    assert get_verified_token("tok-b") is None
+    assert get_verified_token("tok-c") is not None
+
+
+def test_verified_token_cache_expires(monkeypatch):
+    monkeypatch.setattr(login_pipeline, "LOGIN_TOKEN_CACHE_SECONDS", 0.01)
+    remember_verified_token("tok", {"id": 1})
+    time.sleep(0.02)
+
+    assert get_verified_token("tok") is None
+    assert login_pipeline_stats()["token_cache_entries"] == 0
+
+
+
+def test_login_fast_path_defers_to_full_login_when_subscription_blocked(monkeypatch):
+    from app.states import auth_state
+    from app.states.auth_state import AuthState
+
+    monkeypatch.setattr(auth_state, "decode_token", lambda token: {"sub": "7"})
+    remember_verified_token(
+        "tok", {"id": 7, "username": "cajero", "must_change_password": False}
+    )
+    state = AuthState()
+    state.token = "tok"
+
+    state.subscription_snapshot = {"is_trial": False, "status_label": "activo"}
+    assert state._login_fast_path("cajero") == "/dashboard"
+    assert state._login_fast_path("otro") is None
+
+    state.subscription_snapshot = {"is_trial": False, "status_label": "suspendido"}
+    assert state._login_fast_path("cajero") is None
+    assert state._post_login_route(False) == "/cuenta-suspendida"
+
+    state.subscription_snapshot = {"is_trial": True, "status_label": "vencido"}
+    assert state._login_fast_path("cajero") is None
+    assert state._post_login_route(True) == "/periodo-prueba-finalizado"
@@ -0,0 +1,97 @@
+"""Métricas Prometheus — :mod:`app.utils.metrics`."""
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.utils import metrics
+from app.utils.metrics import (
+    EVENT_DB_SECONDS,
+    EVENT_DURATION,
+    EVENT_QUERIES,
+    EventMetricsMiddleware,
+    FISCAL_EMISSIONS_TOTAL,
+    Histogram,
+    render_metrics,
+    reset_metrics,
+)
+
+
+@pytest.fixture(autouse=True)
+def _clean_metrics():
+    reset_metrics()
+    yield
+    reset_metrics()
+
+
+def _sample(text_output: str, line_prefix: str) -> str:
+    for line in text_output.splitlines():
+        if line.startswith(line_prefix):
+            return line.rsplit(" ", 1)[1]
+    raise AssertionError(f"{line_prefix} no está en la salida")
+
+
+def test_histogram_buckets_are_cumulative():
+    hist = Histogram("test_latency_seconds", "test", ("handler",), buckets=(0.1, 1.0))
+    try:
+        for value in (0.05, 0.5, 3.0):
+            hist.observe(value, handler='a"b')
+        lines = hist.render()
+        assert '# TYPE tuwayki_test_latency_seconds histogram' in lines
+        assert 'tuwayki_test_latency_seconds_bucket{handler="a\\"b",le="0.1"} 1' in lines
+        assert 'tuwayki_test_latency_seconds_bucket{handler="a\\"b",le="1"} 2' in lines
+        assert 'tuwayki_test_latency_seconds_bucket{handler="a\\"b",le="+Inf"} 3' in lines
+        assert 'tuwayki_test_latency_seconds_count{handler="a\\"b"} 3' in lines
+    finally:
+        metrics._registry.remove(hist)
+
+
+def test_labels_must_match_declaration():
+    with pytest.raises(ValueError):
+        FISCAL_EMISSIONS_TOTAL.inc(result="ok")
+
+
+def test_enum_label_values_render_their_value():
+    from enum import Enum
+
+    class _Status(str, Enum):
+        authorized = "authorized"
+
+    FISCAL_EMISSIONS_TOTAL.inc(status=_Status.authorized)
+    output = render_metrics()
+    assert _sample(output, 'tuwayki_fiscal_emissions_total{status="authorized"}') == "1"
+
+
+def test_queries_are_attributed_to_the_current_event():
+    engine = create_engine("sqlite://")
+
+    async def _event():
+        await EventMetricsMiddleware().preprocess(None, None, SimpleNamespace(name="state.venta.pay"))
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 2"))
+
+    async def _main():
+        await asyncio.create_task(_event())
+        # El done-callback de la tarea corre en el siguiente tick del loop.
+        await asyncio.sleep(0)
+
+    asyncio.run(_main())
+
+    assert EVENT_DURATION.count(handler="state.venta.pay") == 1
+    assert EVENT_QUERIES.count(handler="state.venta.pay") == 1
+    output = render_metrics()
+    assert _sample(output, 'tuwayki_event_db_queries_sum{handler="state.venta.pay"}') == "2"
+    assert EVENT_DB_SECONDS.value(handler="state.venta.pay") > 0
+
+
+def test_queries_outside_events_only_feed_the_global_histogram():
+    engine = create_engine("sqlite://")
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    output = render_metrics()
+    assert _sample(output, "tuwayki_db_query_duration_seconds_count") == "1"
+    assert "tuwayki_event_db_queries_count" not in output
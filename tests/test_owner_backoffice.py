@@ -735,56 +735,68 @@ class TestOwnerRateLimiting:
     """Verifica el throttling de acciones owner (Redis-backed con fallback memoria)."""
 
     def setup_method(self):
-        """Limpiar store de memoria entre tests."""
-        from app.utils.rate_limit import _memory_store
-        _memory_store.clear()
+        """Limpiar ventanas en memoria y cache local entre tests."""
+        from app.utils.async_rate_limit import reset_async_rate_limit
+        reset_async_rate_limit()
 
-    def test_not_limited_initially(self):
+    async def test_not_limited_initially(self):
         from app.states.owner_state import _is_owner_rate_limited
-        assert _is_owner_rate_limited("admin@test.com") is False
+        assert await _is_owner_rate_limited("admin@test.com") is False
 
-    def test_limited_after_max_actions(self):
+    async def test_limited_after_max_actions(self):
         from app.states.owner_state import (
             _is_owner_rate_limited,
             _record_owner_action,
             OWNER_MAX_ACTIONS,
         )
         for _ in range(OWNER_MAX_ACTIONS):
-            _record_owner_action("admin@test.com")
-        assert _is_owner_rate_limited("admin@test.com") is True
+            await _record_owner_action("admin@test.com")
+        assert await _is_owner_rate_limited("admin@test.com") is True
 
-    def test_not_limited_one_below_max(self):
+    async def test_not_limited_one_below_max(self):
         from app.states.owner_state import (
             _is_owner_rate_limited,
             _record_owner_action,
             OWNER_MAX_ACTIONS,
         )
         for _ in range(OWNER_MAX_ACTIONS - 1):
-            _record_owner_action("admin@test.com")
-        assert _is_owner_rate_limited("admin@test.com") is False
+            await _record_owner_action("admin@test.com")
+        assert await _is_owner_rate_limited("admin@test.com") is False
 
-    def test_different_actors_independent(self):
+    async def test_different_actors_independent(self):
         from app.states.owner_state import (
             _is_owner_rate_limited,
             _record_owner_action,
             OWNER_MAX_ACTIONS,
         )
         for _ in range(OWNER_MAX_ACTIONS):
-            _record_owner_action("admin1@test.com")
-        assert _is_owner_rate_limited("admin1@test.com") is True
-        assert _is_owner_rate_limited("admin2@test.com") is False
+            await _record_owner_action("admin1@test.com")
+        assert await _is_owner_rate_limited("admin1@test.com") is True
+        assert await _is_owner_rate_limited("admin2@test.com") is False
 
-    def test_old_timestamps_cleaned(self):
-        from datetime import datetime, timedelta
+    @pytest.mark.asyncio
+    async def test_old_timestamps_cleaned(self, monkeypatch):
+        import time
+        from types import SimpleNamespace
+        from app.utils import async_rate_limit
         from app.states.owner_state import (
             _is_owner_rate_limited,
+            _record_owner_action,
             OWNER_MAX_ACTIONS,
             OWNER_ACTION_WINDOW_SECONDS,
         )
-        from app.utils.rate_limit import _memory_store
-        old_time = datetime.now() - timedelta(seconds=OWNER_ACTION_WINDOW_SECONDS + 10)
-        _memory_store["old@test.com"] = [old_time] * OWNER_MAX_ACTIONS
-        assert _is_owner_rate_limited("old@test.com") is False
+        for _ in range(OWNER_MAX_ACTIONS):
+            await _record_owner_action("old@test.com")
+        assert await _is_owner_rate_limited("old@test.com") is True
+
+        # Reloj de la ventana en memoria adelantado más allá de la ventana.
+        later = time.monotonic() + OWNER_ACTION_WINDOW_SECONDS + 10
+        monkeypatch.setattr(
+            async_rate_limit,
+            "time",
+            SimpleNamespace(monotonic=lambda: later, time_ns=time.time_ns),
+        )
+        assert await _is_owner_rate_limited("old@test.com") is False
 
 
 # ═════════════════════════════════════════════════════════
@@ -0,0 +1,94 @@
+"""Paginación keyset y totales cacheados (app/utils/pagination.py)."""
+import datetime
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+from app.utils.pagination import (
+    CountCache,
+    KeysetPlan,
+    build_page_window,
+    keyset_after,
+    plan_keyset_page,
+    remember_keyset_page,
+    settle_keyset_total,
+)
+
+_T1 = datetime.datetime(2026, 3, 1, 10, 0)
+_T2 = datetime.datetime(2026, 2, 1, 10, 0)
+
+
+def test_page_window_unchanged():
+    assert build_page_window(20, 37) == [1, -1, 19, 20, 21, -1, 37]
+
+
+def test_keyset_after_expands_tuple_comparison():
+    table = sa.table("sale", sa.column("timestamp"), sa.column("id"))
+    clause = keyset_after((table.c.timestamp, table.c.id), (_T1, 7), descending=True)
+    sql = str(clause.compile(dialect=mysql.dialect()))
+    assert sql == "sale.timestamp < %s OR sale.timestamp = %s AND sale.id < %s"
+
+
+def test_first_page_reads_from_the_start():
+    assert plan_keyset_page(1, 10, 500, {}) == KeysetPlan(None, False, 0, 10)
+
+
+def test_adjacent_pages_use_bookmarks_without_offset():
+    bookmarks = {4: [[_T1, 50], [_T2, 41]]}
+    assert plan_keyset_page(5, 10, 500, bookmarks) == KeysetPlan((_T2, 41), False, 0, 10)
+    assert plan_keyset_page(3, 10, 500, bookmarks) == KeysetPlan((_T1, 50), True, 0, 10)
+
+
+def test_last_pages_read_backwards_from_the_end():
+    # 495 filas: la página 50 tiene 5, la 49 arranca 5 filas antes del final.
+    assert plan_keyset_page(50, 10, 495, {}) == KeysetPlan(None, True, 0, 5)
+    assert plan_keyset_page(49, 10, 495, {}) == KeysetPlan(None, True, 5, 10)
+
+
+def test_far_jump_picks_nearest_start():
+    bookmarks = {10: [[_T1, 100], [_T2, 91]]}
+    plan = plan_keyset_page(14, 10, 10_000, bookmarks)
+    assert plan == KeysetPlan((_T2, 91), False, 30, 10)
+
+
+def test_remember_resets_on_first_page_and_bounds_size():
+    marks = remember_keyset_page({}, 3, (_T1, 3), (_T2, 1))
+    marks = remember_keyset_page(marks, 4, (_T1, 4), (_T2, 2))
+    assert set(marks) == {3, 4}
+    assert set(remember_keyset_page(marks, 1, (_T1, 9), (_T2, 8))) == {1}
+
+    bounded = {}
+    for page in range(1, 10):
+        bounded = remember_keyset_page(bounded, page, (page,), (page,), max_bookmarks=3)
+    assert set(bounded) == {7, 8, 9}
+
+
+def test_settle_total_from_partial_page():
+    assert settle_keyset_total(120, 5, 10, 3, exact_start=True) == 43
+    assert settle_keyset_total(30, 5, 10, 10, exact_start=True) == 50
+    assert settle_keyset_total(120, 5, 10, 3, exact_start=False) == 120
+
+
+def test_count_cache_reuses_until_expired_or_refreshed():
+    calls = []
+
+    def _count():
+        calls.append(1)
+        return 42
+
+    cache = CountCache(ttl_seconds=60)
+    assert cache.get("k", _count) == 42
+    assert cache.get("k", _count) == 42
+    assert len(calls) == 1
+    assert cache.get("k", _count, refresh=True) == 42
+    assert len(calls) == 2
+
+    cache.put("k", 7)
+    assert cache.get("k", _count) == 7
+    cache.invalidate("k")
+    assert cache.get("k", _count) == 42
+
+    expired = CountCache(ttl_seconds=0)
+    expired.get("k", _count)
+    expired.get("k", _count)
+    assert len(calls) == 5
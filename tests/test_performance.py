@@ -5,6 +5,7 @@ Cobertura del módulo de monitoreo de performance:
 - query_timer context manager
 - timed_operation decorator
 - QueryStats class
+- Conteo de queries por unidad de trabajo (N+1)
 """
 import pytest
 import time
@@ -18,6 +19,12 @@ from app.utils.performance import (
     QueryStats,
     SLOW_QUERY_THRESHOLD,
     CRITICAL_QUERY_THRESHOLD,
+    capture_queries,
+    query_unit,
+    record_statement,
+    report_repeated,
+    statement_shape,
+    track_queries,
 )
 
 
@@ -244,3 +251,65 @@ class TestQueryStats:
         queries_copy.append({"operation": "fake", "elapsed_ms": 0})
         
         assert len(stats.queries) == 1  # Original no modificado
+
+
+class TestQueryUnits:
+    """Tests para el conteo de queries por unidad de trabajo."""
+
+    def test_statement_shape_normalizes_literals_and_in_lists(self):
+        """Misma forma para distintos literales y largos de IN."""
+        a = statement_shape("SELECT * FROM product WHERE id IN (?, ?, ?) AND name = 'x'")
+        b = statement_shape("SELECT *  FROM product\nWHERE id IN (?) AND name = 'otro'")
+        assert a == b == "SELECT * FROM product WHERE id IN (?) AND name = ?"
+        assert statement_shape("SELECT 1 WHERE a IN (%(a_1)s, %(a_2)s)") == "SELECT ? WHERE a IN (?)"
+
+    def test_nested_units_count_every_statement(self):
+        """Cada sentencia suma a todas las unidades abiertas."""
+        with query_unit("outer", report=False) as outer:
+            record_statement("SELECT 1")
+            with query_unit("inner", report=False) as inner:
+                record_statement("SELECT 2")
+        record_statement("SELECT 3")
+        assert (outer.count, inner.count) == (2, 1)
+
+    @patch("app.utils.performance.logger")
+    def test_repeated_shape_is_reported_once(self, mock_logger):
+        """Una forma repetida sobre el umbral avisa una sola vez."""
+        with query_unit("cargar_lotes", report=False) as unit:
+            for i in range(12):
+                record_statement(f"SELECT * FROM productbatch WHERE product_id = {i}")
+            record_statement("SELECT * FROM product")
+        assert unit.repeated(threshold=10) == [("SELECT * FROM productbatch WHERE product_id = ?", 12)]
+        report_repeated(unit, threshold=10)
+        report_repeated(unit, threshold=10)
+        mock_logger.warning.assert_called_once()
+        assert "Posible N+1" in mock_logger.warning.call_args[0][0]
+
+    def test_track_queries_decorates_sync_and_async(self):
+        """El decorador abre una unidad por llamada, sync o async."""
+        @track_queries("sync_op")
+        def sync_op():
+            record_statement("SELECT 1")
+            return "ok"
+
+        @track_queries()
+        async def async_op():
+            record_statement("SELECT 1")
+            return "ok"
+
+        import asyncio
+
+        with capture_queries("test") as unit:
+            assert sync_op() == "ok"
+            assert asyncio.run(async_op()) == "ok"
+        assert unit.count == 2
+
+    def test_capture_sees_statements_from_other_threads(self):
+        """capture_queries no depende del contexto (run_sync_db, to_thread)."""
+        import threading
+
+        with capture_queries("test") as unit:
+            worker = threading.Thread(target=record_statement, args=("SELECT 1",))
+            worker.start()
+            worker.join()
+        assert unit.count == 1
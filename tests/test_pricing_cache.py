@@ -0,0 +1,248 @@
+"""Tests del cache de pricing por tenant — :mod:`app.services.pricing_cache`.
+
+Cobertura:
+  * Hit en caliente sin queries; recarga tras TTL e invalidación.
+  * Invalidación por empresa (todas las sucursales) y vía mensaje pub/sub.
+  * Un load que corre durante una invalidación no guarda su resultado.
+  * Cota LRU de tenants.
+  * Orden de ``active_promotions`` == ORDER BY de la query por ítem.
+  * Listas de precios cargadas a demanda una sola vez.
+  * Dentro del event loop, versión y propagación van por el cliente async.
+
+Sin ``REDIS_URL`` el módulo opera sólo con invalidación local.
+"""
+from __future__ import annotations
+
+import asyncio
+from datetime import timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import pricing_cache
+from app.services.pricing_cache import (
+    clear_pricing_cache,
+    get_cart_pricing_snapshot,
+    get_tenant_pricing_snapshot,
+    invalidate_pricing_cache,
+)
+from app.utils.redis_client import SharedRedis
+from app.utils.timezone import utc_now_naive
+
+
+@pytest.fixture(autouse=True)
+def _local_only_cache(monkeypatch):
+    monkeypatch.setenv("REDIS_URL", "")
+    monkeypatch.setattr(pricing_cache, "_redis", SharedRedis("pricing cache"))
+    clear_pricing_cache()
+    yield
+    clear_pricing_cache()
+
+
+def _promo(promo_id, scope, *, coupon_code=None, days_left=30):
+    now = utc_now_naive()
+    return SimpleNamespace(
+        id=promo_id,
+        scope=scope,
+        coupon_code=coupon_code,
+        starts_at=now - timedelta(days=1),
+        ends_at=now + timedelta(days=days_left),
+    )
+
+
+@pytest.mark.asyncio
+async def test_hit_does_not_query_and_invalidation_reloads(session_mock):
+    await get_tenant_pricing_snapshot(session_mock, 1, 1)
+    loads = session_mock.exec.call_count
+    assert loads > 0
+
+    await get_tenant_pricing_snapshot(session_mock, 1, 1)
+    assert session_mock.exec.call_count == loads
+
+    invalidate_pricing_cache(1, 1)
+    await get_tenant_pricing_snapshot(session_mock, 1, 1)
+    assert session_mock.exec.call_count == 2 * loads
+
+
+@pytest.mark.asyncio
+async def test_expired_entry_is_reloaded(session_mock):
+    snapshot = await get_tenant_pricing_snapshot(session_mock, 1, 1)
+    loads = session_mock.exec.call_count
+    snapshot.loaded_at -= pricing_cache.PRICING_CACHE_TTL_SECONDS + 1
+
+    await get_tenant_pricing_snapshot(session_mock, 1, 1)
+    assert session_mock.exec.call_count == 2 * loads
+
+
+@pytest.mark.asyncio
+async def test_company_invalidation_drops_every_branch(session_mock):
+    await get_tenant_pricing_snapshot(session_mock, 1, 1)
+    await get_tenant_pricing_snapshot(session_mock, 1, 2)
+    await get_tenant_pricing_snapshot(session_mock, 2, 1)
+
+    invalidate_pricing_cache(1)
+
+    assert set(pricing_cache._entries) == {(2, 1)}
+
+
+def test_pubsub_message_invalidates_locally():
+    pricing_cache._entries[(3, 4)] = object()
+    pricing_cache._entries[(3, 5)] = object()
+
+    pricing_cache._on_invalidation_message({"data": "3:4"})
+    assert set(pricing_cache._entries) == {(3, 5)}
+
+    pricing_cache._on_invalidation_message({"data": "3:*"})
+    assert not pricing_cache._entries
+
+    # Mensajes mal formados se ignoran.
+    pricing_cache._on_invalidation_message({"data": "basura"})
+
+
+@pytest.mark.asyncio
+async def test_load_racing_with_invalidation_is_not_stored(session_mock, monkeypatch):
+    real_load = pricing_cache._load_tenant_snapshot
+
+    async def _load_then_invalidate(session, company_id, branch_id):
+        snapshot = await real_load(session, company_id, branch_id)
+        # Un write que commitea mientras el load estaba en vuelo.
+        invalidate_pricing_cache(company_id, branch_id)
+        return snapshot
+
+    monkeypatch.setattr(pricing_cache, "_load_tenant_snapshot", _load_then_invalidate)
+
+    await get_tenant_pricing_snapshot(session_mock, 1, 1)
+    assert (1, 1) not in pricing_cache._entries
+
+
+@pytest.mark.asyncio
+async def test_lru_bound(session_mock, monkeypatch):
+    monkeypatch.setattr(pricing_cache, "PRICING_CACHE_MAX_TENANTS", 2)
+
+    await get_tenant_pricing_snapshot(session_mock, 1, 1)
+    await get_tenant_pricing_snapshot(session_mock, 1, 2)
+    await get_tenant_pricing_snapshot(session_mock, 1, 1)  # refresca (1, 1)
+    await get_tenant_pricing_snapshot(session_mock, 1, 3)
+
+    assert list(pricing_cache._entries) == [(1, 1), (1, 3)]
+
+
+def test_active_promotions_order_matches_per_item_query():
+    snapshot = pricing_cache.TenantPricingSnapshot(
+        company_id=1,
+        branch_id=1,
+        promotions_by_scope={
+            "all": [_promo(1, "all")],
+            "category": [_promo(2, "category")],
+            "product": [
+                _promo(3, "product"),
+                _promo(4, "product", coupon_code="VIP"),
+            ],
+        },
+        product_ids_by_promo={},
+        tiers_by_variant={},
+        tiers_by_product={},
+    )
+    now = utc_now_naive()
+
+    assert [p.id for p in snapshot.active_promotions(now)] == [3, 2, 1]
+    assert [p.id for p in snapshot.active_promotions(now, " vip ")] == [4, 3, 2, 1]
+    # Promo vencida: fuera del snapshot para ese instante.
+    assert [
+        p.id for p in snapshot.active_promotions(now + timedelta(days=40))
+    ] == []
+
+
+@pytest.mark.asyncio
+async def test_price_list_loaded_once_per_list(session_mock, exec_result):
+    await get_tenant_pricing_snapshot(session_mock, 1, 1)
+    loads = session_mock.exec.call_count
+    session_mock.exec.side_effect = [
+        exec_result(all_items=[
+            SimpleNamespace(product_id=7, product_variant_id=None, unit_price="80.00"),
+        ]),
+    ]
+
+    first = await get_cart_pricing_snapshot(
+        session_mock, company_id=1, branch_id=1, price_list_id=9,
+    )
+    second = await get_cart_pricing_snapshot(
+        session_mock, company_id=1, branch_id=1, price_list_id=9,
+    )
+
+    assert session_mock.exec.call_count == loads + 1
+    assert first.price_list_price(7, None) == Decimal("80.00")
+    assert second.price_list_price(7, None) == Decimal("80.00")
+
+
+class _FakeAsyncRedis:
+    def __init__(self):
+        self.values: dict[str, int] = {}
+        self.published: list[tuple[str, str]] = []
+
+    async def mget(self, *keys):
+        return [self.values.get(key) for key in keys]
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
+
+
+class _FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.ops = []
+
+    def incr(self, key):
+        self.ops.append(("incr", key))
+
+    def publish(self, channel, message):
+        self.ops.append(("publish", channel, message))
+
+    async def execute(self):
+        for op, *args in self.ops:
+            if op == "incr":
+                self.client.values[args[0]] = self.client.values.get(args[0], 0) + 1
+            else:
+                self.client.published.append(tuple(args))
+
+
+class _AsyncOnlyRedis:
+    """Redis configurado que falla si algo usa el cliente síncrono."""
+
+    def __init__(self):
+        self.client = _FakeAsyncRedis()
+
+    def configured(self):
+        return True
+
+    def async_client(self):
+        return self.client
+
+    def sync_client(self):
+        raise AssertionError("cliente Redis síncrono usado dentro del event loop")
+
+    def failed(self, exc):
+        raise exc
+
+
+@pytest.mark.asyncio
+async def test_redis_calls_inside_the_loop_use_async_client(session_mock, monkeypatch):
+    shared = _AsyncOnlyRedis()
+    monkeypatch.setattr(pricing_cache, "_redis", shared)
+    monkeypatch.setattr(pricing_cache, "_ensure_subscriber", lambda: None)
+
+    first = await get_tenant_pricing_snapshot(session_mock, 1, 1)
+    assert first.version == 0
+
+    invalidate_pricing_cache(1, 1)
+    await asyncio.gather(*list(pricing_cache._pending_broadcasts))
+    assert shared.client.published == [("pricing:invalidate", "1:1")]
+
+    # Sin listener vivo, el hit compara la versión remota antes de servirse.
+    second = await get_tenant_pricing_snapshot(session_mock, 1, 1)
+    assert second.version == 1
+    shared.client.values["pricing:version:1:*"] = 1
+    third = await get_tenant_pricing_snapshot(session_mock, 1, 1)
+    assert third is not second
+    assert third.version == 2
@@ -7,6 +7,8 @@ Cobertura:
     filtrado por vigencia, ``min_quantity`` y ``max_uses``.
   * ``apply_promotion_to_price``: PERCENTAGE, FIXED_AMOUNT, BUY_X_GET_Y.
   * ``resolve_effective_price``: jerarquía completa + promo.
+  * ``load_cart_pricing_snapshot``: query por tabla (no por ítem) y paridad
+    con los helpers por ítem.
 
 Estos helpers son puros (no mutan modelo), así que se testean contra
 ``FakeAsyncSession`` agotando ``exec.side_effect`` con ``ExecResult``.
@@ -25,6 +27,7 @@ from app.services.pricing import (
     PriceSource,
     apply_promotion_to_price,
     find_applicable_promotion,
+    load_cart_pricing_snapshot,
     resolve_effective_price,
     resolve_price_list_price,
     resolve_price_tier_price,
@@ -916,3 +919,190 @@ async def test_effective_price_falls_through_to_base_sale_price(
     assert res.source == PriceSource.BASE
     assert res.base_price == Decimal("100.00")
     assert res.final_price == Decimal("100.00")
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# load_cart_pricing_snapshot — resolución batch del carrito
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+def _make_pl_row(product_id, variant_id, unit_price) -> SimpleNamespace:
+    return SimpleNamespace(
+        product_id=product_id,
+        product_variant_id=variant_id,
+        unit_price=Decimal(str(unit_price)),
+    )
+
+
+def _make_tier_row(min_quantity, unit_price, *, product_id=None, variant_id=None):
+    return SimpleNamespace(
+        min_quantity=min_quantity,
+        unit_price=Decimal(str(unit_price)),
+        product_id=product_id,
+        product_variant_id=variant_id,
+    )
+
+
+@pytest.mark.asyncio
+async def test_snapshot_issues_one_query_per_table(session_mock, exec_result):
+    """Lista + tiers + promos + PromotionProduct: 4 queries sin importar ítems."""
+    promo = _make_promotion(promo_id=7, scope="product", product_id=None)
+    session_mock.exec.side_effect = [
+        exec_result(all_items=[_make_pl_row(1, None, "80.00")]),
+        exec_result(all_items=[_make_tier_row(5, "90.00", product_id=2)]),
+        exec_result(all_items=[promo]),
+        exec_result(all_items=[SimpleNamespace(promotion_id=7, product_id=3)]),
+    ]
+
+    snapshot = await load_cart_pricing_snapshot(
+        session_mock,
+        product_ids=list(range(1, 41)),
+        variant_ids=[101, 102],
+        company_id=1,
+        branch_id=1,
+        price_list_id=5,
+    )
+
+    assert session_mock.exec.call_count == 4
+    assert snapshot.price_list_price(1, None) == Decimal("80.00")
+    assert snapshot.tier_price(2, None, Decimal("5")) == Decimal("90.00")
+    assert snapshot.tier_price(2, None, Decimal("4")) is None
+    assert snapshot.find_promotion(
+        product_id=3, category=None, quantity=Decimal("1")
+    ) is promo
+    assert snapshot.find_promotion(
+        product_id=4, category=None, quantity=Decimal("1")
+    ) is None
+
+
+@pytest.mark.asyncio
+async def test_snapshot_skips_price_list_query_without_list(
+    session_mock, exec_result
+):
+    session_mock.exec.side_effect = [
+        exec_result(all_items=[]),  # tiers
+        exec_result(all_items=[]),  # promos (sin scope=PRODUCT → no PromotionProduct)
+    ]
+
+    snapshot = await load_cart_pricing_snapshot(
+        session_mock,
+        product_ids=[1, 2],
+        variant_ids=[],
+        company_id=1,
+        branch_id=1,
+        price_list_id=None,
+    )
+
+    assert session_mock.exec.call_count == 2
+    assert snapshot.price_list_price(1, None) is None
+
+
+@pytest.mark.asyncio
+async def test_snapshot_price_list_variant_precedence(session_mock, exec_result):
+    session_mock.exec.side_effect = [
+        exec_result(all_items=[
+            _make_pl_row(1, None, "80.00"),
+            _make_pl_row(1, 10, "75.00"),
+        ]),
+        exec_result(all_items=[]),
+        exec_result(all_items=[]),
+    ]
+
+    snapshot = await load_cart_pricing_snapshot(
+        session_mock,
+        product_ids=[1],
+        variant_ids=[10, 11],
+        company_id=1,
+        branch_id=1,
+        price_list_id=5,
+    )
+
+    assert snapshot.price_list_price(1, 10) == Decimal("75.00")
+    # Variante sin override propio → cae al producto base de la lista.
+    assert snapshot.price_list_price(1, 11) == Decimal("80.00")
+
+
+@pytest.mark.asyncio
+async def test_snapshot_tier_matches_per_item_semantics(session_mock, exec_result):
+    """Escalón más alto aplicable; variante primero y fallback a producto."""
+    session_mock.exec.side_effect = [
+        exec_result(all_items=[
+            _make_tier_row(3, "95.00", product_id=1),
+            _make_tier_row(10, "85.00", product_id=1),
+            _make_tier_row(6, "70.00", product_id=1, variant_id=10),
+        ]),
+        exec_result(all_items=[]),
+    ]
+
+    snapshot = await load_cart_pricing_snapshot(
+        session_mock,
+        product_ids=[1],
+        variant_ids=[10],
+        company_id=1,
+        branch_id=1,
+    )
+
+    assert snapshot.tier_price(1, None, Decimal("2")) is None
+    assert snapshot.tier_price(1, None, Decimal("3")) == Decimal("95.00")
+    assert snapshot.tier_price(1, None, Decimal("12")) == Decimal("85.00")
+    assert snapshot.tier_price(1, 10, Decimal("6")) == Decimal("70.00")
+    # Variante bajo su umbral → tier del producto (igual que la query por ítem).
+    assert snapshot.tier_price(1, 10, Decimal("4")) == Decimal("95.00")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "quantity,cart_subtotal",
+    [
+        (Decimal("1"), None),
+        (Decimal("3"), Decimal("50")),
+        (Decimal("3"), Decimal("500")),
+    ],
+)
+async def test_snapshot_promotion_parity_with_per_item(
+    session_mock, exec_result, quantity, cart_subtotal
+):
+    """El snapshot elige exactamente la misma promo que find_applicable_promotion."""
+    promos = [
+        _make_promotion(promo_id=1, scope="product", product_id=1, min_quantity=3),
+        _make_promotion(promo_id=2, scope="category", category="Bebidas",
+                        min_cart_amount="100"),
+        _make_promotion(promo_id=3, scope="all", max_uses=5, current_uses=5),
+        _make_promotion(promo_id=4, scope="all"),
+    ]
+    pp_rows = [SimpleNamespace(promotion_id=1, product_id=1)]
+
+    session_mock.exec.side_effect = [
+        exec_result(all_items=promos),
+        exec_result(all_items=pp_rows),
+    ]
+    expected = await find_applicable_promotion(
+        session_mock,
+        product_id=1,
+        category="Bebidas",
+        quantity=quantity,
+        company_id=1,
+        branch_id=1,
+        cart_subtotal=cart_subtotal,
+    )
+
+    session_mock.exec.side_effect = [
+        exec_result(all_items=[]),  # tiers
+        exec_result(all_items=promos),
+        exec_result(all_items=pp_rows),
+    ]
+    snapshot = await load_cart_pricing_snapshot(
+        session_mock,
+        product_ids=[1],
+        variant_ids=[],
+        company_id=1,
+        branch_id=1,
+    )
+
+    got = snapshot.find_promotion(
+        product_id=1,
+        category="Bebidas",
+        quantity=quantity,
+        cart_subtotal=cart_subtotal,
+    )
+    assert got is expected
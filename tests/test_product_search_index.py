@@ -0,0 +1,120 @@
+"""Índice de búsqueda de productos en memoria (app/services/product_search_index.py)."""
+import pytest
+
+import app.services.product_search_index as psi
+from app.services.product_search_index import (
+    ProductSearchIndex,
+    build_search_docs,
+    normalize_search_text,
+)
+
+
+@pytest.fixture
+def index():
+    products = [
+        (1, "Coca Cola 500ml", "7750001000011"),
+        (2, "Agua San Luis 625ml", "7750002000022"),
+        (3, "Galleta Soda Field", "7750003000033"),
+        (4, "Polo Básico", "POLO-BASE"),
+        (5, "Cable eléctrico", "CAB-001"),
+    ]
+    variants = [
+        (10, 4, "POLO-M-AZ", "M", "Azul"),
+        (11, 4, "POLO-L-RO", "L", "Rojo"),
+        (12, 99, "HUERFANA", "S", "Negro"),
+    ]
+    attributes = [(5, "Calibre", "14 AWG"), (5, "Material", "Cobre")]
+    return ProductSearchIndex.build(build_search_docs(products, variants, attributes))
+
+
+def test_normalize_lowercases_and_strips_accents():
+    assert normalize_search_text("  Eléctrico   ÁRBOL ") == "electrico arbol"
+
+
+def test_exact_barcode_ranks_first(index):
+    assert index.search("7750002000022")[0] == (2, None)
+
+
+def test_accent_insensitive_substring(index):
+    assert index.search("electri") == [(5, None)]
+    assert index.search("basico")[0] == (4, None)
+
+
+def test_variants_match_by_size_color_and_sku(index):
+    assert index.search("polo rojo") == [(4, 11)]
+    assert index.search("polo-m") == [(4, 10)]
+    # Variantes de productos fuera del índice (inactivos) no aparecen.
+    assert index.search("huerfana") == []
+
+
+def test_attributes_find_parent_product(index):
+    assert index.search("cobre") == [(5, None)]
+    assert index.search("14 awg") == [(5, None)]
+
+
+def test_prefix_matches_rank_before_infix(index):
+    ranked = index.search("co")
+    assert ranked[0] == (1, None)  # la descripción empieza con "co"
+    assert ranked[1] == (5, None)  # una palabra ("cobre") empieza con "co"
+    assert ranked.index((4, None)) > 1  # sólo en el medio ("básico")
+
+
+def test_short_terms_and_limit(index):
+    assert len(index.search("a", limit=2)) == 2
+    assert index.search("   ") == []
+    assert index.search("zzz") == []
+
+
+def test_offset_pages_through_ranked_results(index):
+    ranked = index.search("o", limit=20)
+    assert index.search("o", limit=2) + index.search("o", limit=2, offset=2) == ranked[:4]
+    assert index.search("o", limit=2, offset=len(ranked)) == []
+
+
+def test_products_only_collapses_variants(index):
+    assert index.search("polo", products_only=True) == [(4, None)]
+    # El SKU de una variante trae al producto padre.
+    assert index.search("polo-l", products_only=True) == [(4, None)]
+
+
+def test_invalidation_discards_cached_index(monkeypatch):
+    monkeypatch.setattr(psi, "_get_redis", lambda: None)
+    psi.clear_product_search_cache()
+    key = (1, 2)
+    psi._entries[key] = ProductSearchIndex.build([])
+    psi.invalidate_product_search(1, 2)
+    assert key not in psi._entries
+    assert psi._generations[key] == 1
+    psi.clear_product_search_cache()
+
+
+def test_remote_version_read_at_most_once_per_interval(monkeypatch):
+    class _FakeRedis:
+        def __init__(self):
+            self.values, self.gets = {}, 0
+
+        def get(self, key):
+            self.gets += 1
+            return self.values.get(key)
+
+        def incr(self, key):
+            self.values[key] = self.values.get(key, 0) + 1
+
+    fake = _FakeRedis()
+    monkeypatch.setattr(psi, "_get_redis", lambda: fake)
+    psi.clear_product_search_cache()
+    key = (1, 2)
+
+    assert [psi._remote_version(key) for _ in range(5)] == [0] * 5
+    assert fake.gets == 1
+
+    # La invalidación propia fuerza la relectura; la de otra réplica espera
+    # al intervalo.
+    psi.invalidate_product_search(1, 2)
+    assert psi._remote_version(key) == 1
+    fake.values[psi._version_key(*key)] = 5
+    assert psi._remote_version(key) == 1
+    monkeypatch.setattr(psi, "PRODUCT_SEARCH_VERSION_CHECK_SECONDS", 0)
+    assert psi._remote_version(key) == 5
+    assert fake.gets == 3
+    psi.clear_product_search_cache()
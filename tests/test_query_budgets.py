@@ -0,0 +1,296 @@
+"""Presupuestos de queries de los caminos calientes (``@pytest.mark.max_queries``).
+
+Las queries se cuentan con :func:`app.utils.performance.capture_queries`:
+los listeners del engine para SQLite y ``FakeAsyncSession.exec`` (conftest)
+para los tests con sesión fake. Un presupuesto que se rompe indica una query
+nueva por línea/ítem (N+1) en el camino medido.
+"""
+from __future__ import annotations
+
+import os
+from datetime import timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session, SQLModel, create_engine
+
+os.environ.setdefault("AUTH_SECRET_KEY", "test-secret-query-budgets-32-chars-min!")
+os.environ.setdefault("TENANT_STRICT", "0")
+
+import app.services.pricing as pricing
+from app.enums import PaymentMethodType
+from app.models import Branch, Company, Product, Sale, SaleItem, SalePayment
+from app.schemas.sale_schemas import PaymentCashDTO, PaymentInfoDTO, SaleItemDTO
+from app.services.pricing import (
+    ADJUST_PERCENT,
+    CartPricingSnapshot,
+    PriceAdjustment,
+    reprice_price_list,
+)
+from app.services.report_service import generate_sales_report
+from app.services.sale_service import SaleService
+from app.utils.performance import capture_queries, record_statement
+from app.utils.timezone import utc_now_naive
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SaleService.process_sale
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+def _products(n):
+    return [
+        Product(
+            id=i,
+            barcode=f"779000000000{i}",
+            description=f"Producto {i}",
+            stock=Decimal("10.0000"),
+            unit="Unidad",
+            sale_price=Decimal("5.00"),
+        )
+        for i in range(1, n + 1)
+    ]
+
+
+async def _process_sale(session_mock, exec_result, unit_sample, n):
+    products = _products(n)
+    session_mock.exec.side_effect = [
+        exec_result(all_items=[]),
+        exec_result(all_items=[unit_sample]),
+        exec_result(all_items=[]),  # Category requires_batch
+        exec_result(all_items=products),
+    ]
+    items = [
+        SaleItemDTO(
+            description=p.description,
+            quantity=Decimal("1"),
+            unit=p.unit,
+            price=Decimal("5.00"),
+            barcode=p.barcode,
+        )
+        for p in products
+    ]
+    total = Decimal("5.00") * n
+    return await SaleService.process_sale(
+        session=session_mock,
+        company_id=1,
+        branch_id=1,
+        user_id=1,
+        items=items,
+        payment_data=PaymentInfoDTO(
+            method="cash",
+            method_kind="cash",
+            cash=PaymentCashDTO(amount=total),
+        ),
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.max_queries(14)
+async def test_process_sale_budget(session_mock, exec_result, unit_sample):
+    """Venta de 5 productos: 9 queries fijas + el lock de lotes FEFO por producto."""
+    result = await _process_sale(session_mock, exec_result, unit_sample, 5)
+    assert result.sale_total == Decimal("25.00")
+
+
+@pytest.mark.asyncio
+async def test_process_sale_grows_one_query_per_product(session_mock, exec_result, unit_sample):
+    """Lo único que escala con las líneas es el lock de lotes por producto."""
+    with capture_queries("1 producto") as one:
+        await _process_sale(session_mock, exec_result, unit_sample, 1)
+    with capture_queries("5 productos") as five:
+        await _process_sale(type(session_mock)(), exec_result, unit_sample, 5)
+
+    assert five.count - one.count == 4
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# CartMixin._reprice_cart_lines (_recompute_cart_prices)
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+def _session_cm(session):
+    cm = MagicMock()
+    cm.__aenter__ = AsyncMock(return_value=session)
+    cm.__aexit__ = AsyncMock(return_value=False)
+    return cm
+
+
+@pytest.mark.asyncio
+@pytest.mark.max_queries(1)
+async def test_cart_repricing_budget(session_mock, exec_result):
+    """50 líneas: una sola query IN de productos (el snapshot viene de cache)."""
+    from app.states.venta.cart_mixin import CartMixin
+
+    session_mock.exec.return_value = exec_result(all_items=[
+        SimpleNamespace(id=i, sale_price=Decimal("10.00"), category="General")
+        for i in range(1, 51)
+    ])
+    snapshot = CartPricingSnapshot(
+        price_list_items={},
+        tiers_by_variant={},
+        tiers_by_product={},
+        promotions=[],
+        product_ids_by_promo={},
+        now=utc_now_naive(),
+    )
+    request = {
+        "company_id": 1,
+        "branch_id": 1,
+        "price_list_id": None,
+        "coupon": None,
+        "now": utc_now_naive(),
+        "global_margin": 0.3,
+        "lines": [
+            {
+                "temp_id": f"t{i}",
+                "product_id": i,
+                "variant_id": None,
+                "quantity": 1,
+                "kit_product_id": None,
+                "price": 0,
+            }
+            for i in range(1, 51)
+        ],
+    }
+    with patch("app.states.venta.cart_mixin.get_async_session", return_value=_session_cm(session_mock)), \
+         patch("app.services.pricing_cache.get_cart_pricing_snapshot", AsyncMock(return_value=snapshot)):
+        repriced = await CartMixin._reprice_cart_lines(request)
+
+    assert len(repriced) == 50
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Reprecio masivo (apply_bulk_discount → reprice_price_list)
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+class _RecordingSyncSession:
+    """Sesión sync fake: el SELECT y cada executemany cuentan como una query."""
+
+    def __init__(self, rows):
+        self._rows = rows
+
+    def exec(self, query):
+        record_statement(str(query))
+        return iter(self._rows)
+
+    def execute(self, stmt, params):
+        record_statement(str(stmt))
+
+
+def _price_list_rows(n):
+    return [
+        (i, Decimal("10.00"), None, "Agua", Decimal("10.00"), Decimal("6.00"), None, None, None, None)
+        for i in range(1, n + 1)
+    ]
+
+
+def _reprice(session):
+    return reprice_price_list(
+        session,
+        company_id=1,
+        branch_id=1,
+        price_list_id=1,
+        adjustment=PriceAdjustment(ADJUST_PERCENT, Decimal("-10")),
+    )
+
+
+@pytest.mark.max_queries(2)
+def test_bulk_discount_budget():
+    """300 ítems: un SELECT y un único lote de UPDATE."""
+    result = _reprice(_RecordingSyncSession(_price_list_rows(300)))
+    assert result.changed == 300
+
+
+def test_bulk_discount_queries_grow_per_batch_not_per_item(monkeypatch):
+    monkeypatch.setattr(pricing, "BULK_PRICE_BATCH_SIZE", 100)
+    with capture_queries("reprecio") as unit:
+        _reprice(_RecordingSyncSession(_price_list_rows(300)))
+    assert unit.count == 1 + 3
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# generate_sales_report (SQLite)
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+def _report_engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def _sqlite_functions(dbapi_conn, _record):
+        # GREATEST es de MySQL; el reporte lo usa para el descuento por ítem.
+        dbapi_conn.create_function("greatest", -1, max)
+
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+def _seed_sales(engine, n):
+    with Session(engine) as session:
+        company = Company(name="TestCo", ruc="20123456789")
+        session.add(company)
+        session.flush()
+        branch = Branch(name="Main", company_id=company.id)
+        session.add(branch)
+        session.flush()
+        tenant = {"company_id": company.id, "branch_id": branch.id}
+        product = Product(
+            barcode="7790000000001",
+            description="Agua",
+            stock=Decimal("100.0000"),
+            purchase_price=Decimal("3.00"),
+            sale_price=Decimal("5.00"),
+            **tenant,
+        )
+        session.add(product)
+        session.flush()
+        for _ in range(n):
+            sale = Sale(total_amount=Decimal("5.00"), **tenant)
+            session.add(sale)
+            session.flush()
+            session.add(SaleItem(
+                sale_id=sale.id,
+                product_id=product.id,
+                quantity=Decimal("1"),
+                unit_price=Decimal("5.00"),
+                unit_price_base=Decimal("5.00"),
+                subtotal=Decimal("5.00"),
+                product_name_snapshot="Agua",
+                **tenant,
+            ))
+            session.add(SalePayment(
+                sale_id=sale.id,
+                amount=Decimal("5.00"),
+                method_type=PaymentMethodType.cash,
+                **tenant,
+            ))
+        session.commit()
+        return tenant
+
+
+def _report_queries(n_sales):
+    engine = _report_engine()
+    tenant = _seed_sales(engine, n_sales)
+    now = utc_now_naive()
+    with Session(engine) as session, capture_queries(f"reporte {n_sales}") as unit:
+        generate_sales_report(
+            session,
+            now - timedelta(days=1),
+            now + timedelta(days=1),
+            include_cancelled=True,
+            **tenant,
+        )
+    return unit
+
+
+def test_sales_report_queries_do_not_grow_with_sales():
+    few = _report_queries(2)
+    many = _report_queries(12)
+
+    assert many.count == few.count, many.describe()
+    assert many.repeated() == []
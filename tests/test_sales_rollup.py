@@ -0,0 +1,225 @@
+from datetime import date, datetime
+from decimal import Decimal
+from types import SimpleNamespace
+
+from sqlmodel import Session, SQLModel, create_engine
+
+from app.enums import PaymentMethodType, SaleStatus
+from app.models import (
+    Branch,
+    Company,
+    Sale,
+    SaleItem,
+    SalePayment,
+    SalesCategoryRollup,
+    SalesDailyRollup,
+    SalesHourRollup,
+    SalesPaymentRollup,
+    SalesProductRollup,
+    SalesUserRollup,
+)
+from app.services.sales_rollup_service import (
+    SalesRollupDelta,
+    TenantClock,
+    apply_sale_to_rollup_sync,
+    compute_sales_rollup,
+)
+
+
+class _UtcClock(TenantClock):
+    def local(self, value):
+        return value
+
+
+def _delta():
+    return SalesRollupDelta(1, 2, _UtcClock())
+
+
+def _sale(sale_id=10, ts=datetime(2026, 3, 5, 14, 30), total="100.00", condition="contado"):
+    return SimpleNamespace(
+        sale_id=sale_id,
+        timestamp=ts,
+        total_amount=Decimal(total),
+        payment_condition=condition,
+        user_id=7,
+    )
+
+
+def _item(sale_id=10, category="Bebidas", product_id=3, qty="2", price="25.00", cost="10.00"):
+    return SimpleNamespace(
+        sale_id=sale_id,
+        timestamp=datetime(2026, 3, 5, 14, 30),
+        quantity=Decimal(qty),
+        subtotal=Decimal(price) * Decimal(qty),
+        unit_price=Decimal(price),
+        unit_price_base=Decimal(price),
+        purchase_price=Decimal(cost),
+        product_id=product_id,
+        product_name_snapshot=f"Producto {product_id}",
+        product_category_snapshot=category,
+        product_category=None,
+    )
+
+
+def test_sale_feeds_daily_user_hour_and_payment_buckets():
+    delta = _delta()
+    delta.add_sale(_sale())
+    delta.add_sale_item(_item())
+    delta.add_sale_payment(
+        SimpleNamespace(
+            timestamp=datetime(2026, 3, 5, 14, 30),
+            method_type="cash",
+            payment_method_id=None,
+            amount=Decimal("100.00"),
+        )
+    )
+    day = date(2026, 3, 5)
+
+    daily = delta.buckets[SalesDailyRollup][(day,)]
+    assert daily["sales_count"] == 1
+    assert daily["gross_amount"] == Decimal("100.00")
+    assert daily["items_amount"] == Decimal("50.00")
+    assert daily["cost_amount"] == Decimal("20.00")
+    assert daily["credit_count"] == 0
+    assert delta.buckets[SalesUserRollup][(day, 7)]["sales_count"] == 1
+    assert delta.buckets[SalesHourRollup][(day, 14)]["gross_amount"] == Decimal("100.00")
+    assert delta.buckets[SalesPaymentRollup][(day, "cash", 0)]["payments_count"] == 1
+
+
+def test_category_counts_each_sale_once():
+    delta = _delta()
+    delta.add_sale_item(_item(product_id=3))
+    delta.add_sale_item(_item(product_id=4))
+    delta.add_sale_item(_item(sale_id=11, product_id=3))
+
+    bucket = delta.buckets[SalesCategoryRollup][(date(2026, 3, 5), "Bebidas")]
+    assert bucket["sales_count"] == 2
+    assert bucket["quantity"] == Decimal("6.0000")
+    assert bucket["gross_amount"] == Decimal("150.00")
+
+
+def test_missing_category_uses_fallback():
+    delta = _delta()
+    delta.add_sale_item(_item(category="  "))
+
+    (key,) = delta.buckets[SalesCategoryRollup]
+    assert key[1] != ""
+
+
+def test_cancellation_nets_to_zero():
+    delta = _delta()
+    for sign in (1, -1):
+        delta.add_sale(_sale(condition="credito"), sign)
+        delta.add_sale_item(_item(), sign)
+
+    for model in (SalesDailyRollup, SalesCategoryRollup, SalesProductRollup):
+        for values in delta.buckets[model].values():
+            assert all(value == 0 for value in values.values())
+
+
+def test_return_header_counted_once_per_return():
+    delta = _delta()
+    for product_id in (3, 4):
+        delta.add_return_item(
+            SimpleNamespace(
+                sale_return_id=5,
+                timestamp=datetime(2026, 3, 6, 9, 0),
+                refund_amount=Decimal("30.00"),
+                return_quantity=Decimal("1"),
+                refund_subtotal=Decimal("15.00"),
+                purchase_price=Decimal("6.00"),
+                product_id=product_id,
+                product_name_snapshot=f"Producto {product_id}",
+                product_category_snapshot="Bebidas",
+                product_category=None,
+            )
+        )
+
+    daily = delta.buckets[SalesDailyRollup][(date(2026, 3, 6),)]
+    assert daily["refund_count"] == 1
+    assert daily["refund_amount"] == Decimal("30.00")
+    assert daily["refund_cost_amount"] == Decimal("12.00")
+
+
+def test_upsert_statements_follow_model_order():
+    delta = _delta()
+    delta.add_sale(_sale())
+    delta.add_sale_item(_item())
+
+    statements = delta.upsert_statements()
+    assert [stmt.table.name for stmt in statements] == [
+        "salesdailyrollup",
+        "salescategoryrollup",
+        "salesproductrollup",
+        "salesuserrollup",
+        "saleshourrollup",
+    ]
+    assert not delta.is_empty()
+
+
+def test_reservation_payment_lands_in_rollup(monkeypatch):
+    # Pago de reserva como lo registra ``services_state``: ítem de servicio
+    # sin producto, categoría "Servicios" y venta fuera de ``process_sale``.
+    # El upsert es SQL de MySQL: se captura el delta en lugar de ejecutarlo.
+    applied = []
+
+    def _capture(delta):
+        applied.append(delta)
+        return []
+
+    monkeypatch.setattr(SalesRollupDelta, "upsert_statements", _capture)
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.info["tenant_bypass"] = True
+        company = Company(name="TestCo", ruc="20123456789")
+        session.add(company)
+        session.flush()
+        branch = Branch(name="Main", company_id=company.id)
+        session.add(branch)
+        session.flush()
+        tenant = {"company_id": company.id, "branch_id": branch.id}
+        sale = Sale(
+            timestamp=datetime(2026, 3, 5, 18, 0),
+            total_amount=Decimal("40.00"),
+            status=SaleStatus.completed,
+            **tenant,
+        )
+        session.add(sale)
+        session.flush()
+        session.add(SalePayment(
+            sale_id=sale.id,
+            amount=Decimal("40.00"),
+            method_type=PaymentMethodType.cash,
+            reference_code="Reserva 1",
+            **tenant,
+        ))
+        session.add(SaleItem(
+            sale_id=sale.id,
+            product_id=None,
+            quantity=1,
+            unit_price=Decimal("40.00"),
+            subtotal=Decimal("40.00"),
+            product_name_snapshot="Adelanto reserva: Cancha 1",
+            product_barcode_snapshot="1",
+            product_category_snapshot="Servicios",
+            **tenant,
+        ))
+        session.flush()
+
+        apply_sale_to_rollup_sync(session, sale.id, **tenant)
+
+        (delta,) = applied
+        day = date(2026, 3, 5)
+        daily = delta.buckets[SalesDailyRollup][(day,)]
+        assert daily["sales_count"] == 1
+        assert daily["gross_amount"] == Decimal("40.00")
+        assert daily["items_amount"] == Decimal("40.00")
+        category = delta.buckets[SalesCategoryRollup][(day, "Servicios")]
+        assert category["gross_amount"] == Decimal("40.00")
+        assert delta.buckets[SalesPaymentRollup][(day, "cash", 0)]["amount"] == Decimal("40.00")
+        # Mismo resultado que el rebuild: ``check_sales_rollup`` no ve deriva.
+        rebuilt = compute_sales_rollup(
+            session, tenant["company_id"], tenant["branch_id"], day, day, clock=delta.clock
+        )
+        assert dict(rebuilt.buckets) == dict(delta.buckets)
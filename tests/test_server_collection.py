@@ -0,0 +1,127 @@
+"""Colecciones del lado servidor (app/services/server_collection.py)."""
+import pytest
+
+import app.services.server_collection as server_collection
+from app.services.server_collection import ServerCollection, page_count
+
+
+@pytest.fixture(autouse=True)
+def local_store(monkeypatch):
+    monkeypatch.setattr(server_collection, "_get_redis", lambda: None)
+    monkeypatch.setattr(server_collection, "_get_async_redis", lambda: None)
+    server_collection.clear_server_collections()
+    yield
+    server_collection.clear_server_collections()
+
+
+def test_pages_are_sliced_per_session():
+    clients = ServerCollection("clientes")
+    assert clients.replace("tab-a", [{"id": i} for i in range(25)]) == 25
+    clients.replace("tab-b", [{"id": 99}])
+
+    assert [row["id"] for row in clients.page("tab-a", 3, 10)] == list(range(20, 25))
+    assert clients.page("tab-a", 4, 10) == []
+    assert clients.page("tab-b", 1, 10) == [{"id": 99}]
+    assert len(clients.rows("tab-a")) == 25
+
+
+def test_missing_or_expired_collection_returns_none(monkeypatch):
+    clients = ServerCollection("clientes")
+    assert clients.page("tab-a", 1, 10) is None
+
+    clients.replace("tab-a", [])
+    assert clients.page("tab-a", 1, 10) == []
+
+    monkeypatch.setattr(server_collection, "SERVER_COLLECTION_TTL_SECONDS", -1)
+    clients.replace("tab-a", [{"id": 1}])
+    assert clients.page("tab-a", 1, 10) is None
+
+
+def test_local_store_is_lru_bounded(monkeypatch):
+    monkeypatch.setattr(server_collection, "SERVER_COLLECTION_MAX_LOCAL", 2)
+    debtors = ServerCollection("cuentas")
+    for token in ("a", "b", "c"):
+        debtors.replace(token, [{"id": token}])
+    assert debtors.page("a", 1, 10) is None
+    assert debtors.page("c", 1, 10) == [{"id": "c"}]
+
+
+@pytest.mark.asyncio
+async def test_async_methods_share_the_local_store():
+    clients = ServerCollection("clientes")
+    assert await clients.replace_async("tab-a", [{"id": i} for i in range(15)]) == 15
+
+    assert clients.page("tab-a", 2, 10) == [{"id": i} for i in range(10, 15)]
+    assert await clients.page_async("tab-a", 2, 10) == [{"id": i} for i in range(10, 15)]
+    assert len(await clients.rows_async("tab-a")) == 15
+
+    await clients.clear_async("tab-a")
+    assert await clients.page_async("tab-a", 1, 10) is None
+
+
+class _FakeAsyncRedis:
+    def __init__(self):
+        self.lists: dict[str, list[bytes]] = {}
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
+
+    async def delete(self, key):
+        self.lists.pop(key, None)
+
+
+class _FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.ops = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.ops.append((name, args))
+
+    async def execute(self):
+        lists = self.client.lists
+        results = []
+        for name, args in self.ops:
+            key = args[0]
+            if name == "delete":
+                lists.pop(key, None)
+            elif name == "rpush":
+                lists.setdefault(key, []).extend(args[1:])
+            elif name == "exists":
+                results.append(int(key in lists))
+                continue
+            elif name == "lrange":
+                start, stop = args[1], args[2]
+                values = lists.get(key, [])
+                results.append(values[start:] if stop == -1 else values[start:stop + 1])
+                continue
+            results.append(True)
+        return results
+
+
+@pytest.mark.asyncio
+async def test_async_methods_use_async_client(monkeypatch):
+    fake = _FakeAsyncRedis()
+    monkeypatch.setattr(server_collection, "_get_async_redis", lambda: fake)
+
+    def _sync_client():
+        raise AssertionError("cliente Redis síncrono usado desde el event loop")
+
+    monkeypatch.setattr(server_collection, "_get_redis", _sync_client)
+    monkeypatch.setattr(server_collection, "_PUSH_CHUNK", 4)
+    debtors = ServerCollection("cuentas")
+
+    assert await debtors.replace_async("tab-a", [{"id": i} for i in range(10)]) == 10
+    assert len(fake.lists["server_collection:cuentas:tab-a"]) == 10
+    assert await debtors.page_async("tab-a", 3, 4) == [{"id": 8}, {"id": 9}]
+    assert len(await debtors.rows_async("tab-a")) == 10
+
+    await debtors.replace_async("tab-a", [])
+    assert "server_collection:cuentas:tab-a" not in fake.lists
+    assert await debtors.page_async("tab-a", 1, 4) == []
+
+
+def test_page_count():
+    assert page_count(0, 10) == 1
+    assert page_count(10, 10) == 1
+    assert page_count(11, 10) == 2
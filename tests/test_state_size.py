@@ -0,0 +1,56 @@
+"""Medición del tamaño serializado del state (app/utils/state_size.py)."""
+import pytest
+
+import app.utils.state_size as state_size
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch):
+    monkeypatch.setattr(state_size, "STATE_SIZE_TRACKING", True)
+    monkeypatch.setattr(state_size, "_var_groups", {})
+    state_size.reset_state_size_stats()
+    yield
+    state_size.reset_state_size_stats()
+
+
+def test_sizes_are_recorded_per_state_and_event():
+    state_size.set_current_event("state.load_clients")
+    state_size.record_state_size("state", 100)
+    state_size.record_state_size("state", 300)
+    state_size.set_current_event("state.set_debtors_page")
+    state_size.record_state_size("state", 50)
+
+    stats = state_size.state_size_stats()
+    assert stats["states"]["state"] == {
+        "serializations": 3, "avg_bytes": 150, "max_bytes": 300, "last_bytes": 50,
+    }
+    assert stats["events"]["state|state.load_clients"]["max_bytes"] == 300
+    assert stats["events"]["state|state.set_debtors_page"]["serializations"] == 1
+
+
+def test_breakdown_groups_vars_by_declaring_mixin(monkeypatch):
+    monkeypatch.setattr(state_size, "STATE_SIZE_BREAKDOWN_EVERY", 0)
+    monkeypatch.setattr(state_size, "STATE_SIZE_WARN_BYTES", 1000)
+    state_size.register_state_var_groups(
+        {"clients_view": "ClientesState", "paginated_debtors": "CuentasState"}
+    )
+    values = {
+        "clients_view": [{"name": "x" * 50}] * 40,
+        "paginated_debtors": [],
+        "is_loading": False,
+    }
+    calls = []
+
+    def _values():
+        calls.append(1)
+        return values
+
+    state_size.record_state_size("state", 500, values=_values)
+    assert calls == []  # bajo el umbral y sin muestreo: no se desglosa
+
+    state_size.record_state_size("state", 5000, values=_values)
+    state_size.record_state_size("state", 5000, values=_values)
+    assert len(calls) == 1  # sólo la primera vez que el evento supera el umbral
+
+    breakdown = state_size.state_size_stats()["breakdown"]["state"]
+    assert list(breakdown) == ["ClientesState", "CuentasState", "State"]
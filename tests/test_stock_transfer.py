@@ -5,6 +5,7 @@ from decimal import Decimal
 
 import pytest
 import pytest_asyncio
+from sqlalchemy import String
 from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import SQLModel
 from sqlmodel.ext.asyncio.session import AsyncSession
@@ -26,6 +27,7 @@ from app.models import (
 from app.models.company import PlanType, SubscriptionStatus
 from app.models.inventory import TransferStatus
 from app.services.transfer_service import TransferError, TransferService
+from app.utils.performance import capture_queries
 from app.utils.tenant import (
     _refresh_tenant_models,
     register_tenant_listeners,
@@ -549,6 +551,134 @@ class TestTransferVariants:
             assert d_vars[0].stock == Decimal("8.0000")  # 5 + 3
 
 
+class TestSetBasedExecution:
+    @pytest.mark.asyncio
+    async def test_repeated_lines_see_previous_deduction(self, session, company_with_structures):
+        """Dos líneas del mismo producto con lotes: la 2da sigue el FEFO de la 1ra."""
+        ids = company_with_structures
+        await _exec(session, ids, [
+            {"product_id": ids["pb_id"], "quantity": 8},
+            {"product_id": ids["pb_id"], "quantity": 7},
+        ])
+        with tenant_bypass():
+            o_batches = (await session.exec(
+                select(ProductBatch).where(
+                    ProductBatch.branch_id == ids["origin_id"],
+                    ProductBatch.product_id == ids["pb_id"],
+                )
+            )).all()
+            by_num = {b.batch_number: b.stock for b in o_batches}
+            assert by_num == {"LOTE-A": Decimal("0.0000"), "LOTE-B": Decimal("15.0000")}
+
+            d_prod = (await session.exec(
+                select(Product).where(
+                    Product.branch_id == ids["dest_id"], Product.barcode == "PROD-BATCH",
+                )
+            )).all()
+            assert len(d_prod) == 1
+            d_batches = (await session.exec(
+                select(ProductBatch).where(ProductBatch.branch_id == ids["dest_id"])
+            )).all()
+            assert {b.batch_number: b.stock for b in d_batches} == {
+                "LOTE-A": Decimal("10.0000"),
+                "LOTE-B": Decimal("5.0000"),
+            }
+            assert d_prod[0].stock == Decimal("15.0000")
+
+            movs = (await session.exec(
+                select(StockMovement).where(StockMovement.company_id == ids["company_id"])
+            )).all()
+            assert [m.type for m in movs] == [
+                "Transferencia Salida", "Transferencia Ingreso",
+            ] * 2
+
+    @pytest.mark.asyncio
+    async def test_statements_do_not_grow_with_lines(self, session, company_with_structures):
+        """Con los espejos ya creados, 3 o 30 líneas emiten las mismas sentencias."""
+        ids = company_with_structures
+        lines = [
+            {"product_id": ids["pb_id"], "quantity": 1},
+            {"product_id": ids["pv_id"], "quantity": 1, "variant_id": ids["v1_id"]},
+            {"product_id": ids["pv_id"], "quantity": 1, "variant_id": ids["v2_id"]},
+        ]
+        await _exec(session, ids, lines)
+
+        counts = []
+        for items in (lines, lines * 10):
+            with tenant_bypass():
+                transfer = await TransferService.create_transfer(
+                    session,
+                    company_id=ids["company_id"],
+                    origin_branch_id=ids["origin_id"],
+                    destination_branch_id=ids["dest_id"],
+                    items=items,
+                )
+                await session.commit()
+                with capture_queries("execute_transfer") as unit:
+                    await TransferService.execute_transfer(
+                        session, transfer_id=transfer.id, company_id=ids["company_id"],
+                    )
+                    await session.commit()
+            counts.append(unit.count)
+
+        assert counts[0] == counts[1]
+
+
+class TestCaseInsensitiveMirrors:
+    """Espejos en destino que difieren del origen sólo en mayúsculas/espacios."""
+
+    @pytest_asyncio.fixture
+    async def async_engine(self, monkeypatch):
+        # Como la collation ``_ci`` de MySQL: la BD devuelve el valor guardado.
+        for column in (
+            Product.__table__.c.barcode,
+            Product.__table__.c.description,
+            ProductVariant.__table__.c.sku,
+        ):
+            monkeypatch.setattr(
+                column, "type", String(column.type.length, collation="NOCASE")
+            )
+        register_tenant_listeners()
+        _refresh_tenant_models()
+        engine = create_async_engine("sqlite+aiosqlite://", echo=False)
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+        yield engine
+        await engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_existing_mirror_matches_ignoring_case(self, session, company_with_structures):
+        ids = company_with_structures
+        with tenant_bypass():
+            d_prod = Product(
+                company_id=ids["company_id"], branch_id=ids["dest_id"],
+                barcode="prod-var", description="Producto Variante",
+                stock=Decimal("2.0000"), unit="Unidad",
+            )
+            session.add(d_prod)
+            await session.flush()
+            session.add(ProductVariant(
+                company_id=ids["company_id"], branch_id=ids["dest_id"],
+                product_id=d_prod.id, sku="sku-v1", size="M", color="Rojo",
+                stock=Decimal("2.0000"),
+            ))
+            await session.commit()
+
+        await _exec(session, ids, [
+            {"product_id": ids["pv_id"], "quantity": 5, "variant_id": ids["v1_id"]},
+        ])
+
+        with tenant_bypass():
+            d_prods = (await session.exec(
+                select(Product).where(Product.branch_id == ids["dest_id"])
+            )).all()
+            d_vars = (await session.exec(
+                select(ProductVariant).where(ProductVariant.branch_id == ids["dest_id"])
+            )).all()
+        assert [(p.barcode, p.stock) for p in d_prods] == [("prod-var", Decimal("7.0000"))]
+        assert [(v.sku, v.stock) for v in d_vars] == [("sku-v1", Decimal("7.0000"))]
+
+
 class TestCancelTransfer:
     @pytest.mark.asyncio
     async def test_cancel_pending(self, session, company_with_branches):
@@ -0,0 +1,84 @@
+"""Tests del pool sync — :mod:`app.utils.sync_db`.
+
+Cobertura:
+  * El trabajo corre fuera del thread del event loop y hereda contextvars.
+  * Límite de concurrencia por empresa; otras empresas no esperan.
+  * Excepciones se propagan y cuentan como error en las métricas.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import threading
+import time
+
+import pytest
+
+from app.utils import sync_db
+from app.utils.sync_db import reset_sync_db_stats, run_sync_db, sync_db_stats
+
+
+_tenant_var: contextvars.ContextVar[int | None] = contextvars.ContextVar(
+    "test_tenant", default=None
+)
+
+
+@pytest.fixture(autouse=True)
+def _fresh_stats():
+    reset_sync_db_stats()
+    yield
+    reset_sync_db_stats()
+
+
+@pytest.mark.asyncio
+async def test_runs_off_loop_thread_with_context():
+    _tenant_var.set(42)
+
+    def _work():
+        return threading.get_ident(), _tenant_var.get()
+
+    thread_id, tenant = await run_sync_db(_work, operation="ctx")
+
+    assert thread_id != threading.get_ident()
+    assert tenant == 42
+    assert sync_db_stats()["operations"]["ctx"]["calls"] == 1
+
+
+@pytest.mark.asyncio
+async def test_tenant_limit_bounds_concurrency(monkeypatch):
+    monkeypatch.setattr(sync_db, "SYNC_DB_TENANT_LIMIT", 2)
+    sync_db._tenant_semaphores.clear()
+    lock = threading.Lock()
+    running = {1: 0, 2: 0}
+    peak = {1: 0, 2: 0}
+
+    def _work(company_id):
+        with lock:
+            running[company_id] += 1
+            peak[company_id] = max(peak[company_id], running[company_id])
+        time.sleep(0.05)
+        with lock:
+            running[company_id] -= 1
+
+    await asyncio.gather(
+        *(run_sync_db(_work, 1, company_id=1) for _ in range(5)),
+        *(run_sync_db(_work, 2, company_id=2) for _ in range(2)),
+    )
+
+    assert peak[1] == 2
+    assert peak[2] == 2
+    assert sync_db_stats()["in_flight"] == 0
+    assert sync_db_stats()["waiting"] == 0
+
+
+@pytest.mark.asyncio
+async def test_exceptions_propagate_and_are_counted():
+    def _boom():
+        raise ValueError("fallo")
+
+    with pytest.raises(ValueError):
+        await run_sync_db(_boom, company_id=1, operation="boom")
+
+    stats = sync_db_stats()["operations"]["boom"]
+    assert stats["calls"] == 1
+    assert stats["errors"] == 1
@@ -360,7 +360,7 @@ class TestVentaFlujoPeru:
         mock_http_resp.json.return_value = nubefact_resp
 
         with patch("app.services.billing_service.get_async_session") as mock_get, \
-             patch("httpx.AsyncClient") as mock_httpx:
+             patch("app.services.billing_service.http_client") as mock_httpx:
             mock_get.return_value.__aenter__ = AsyncMock(return_value=mock_session)
             mock_get.return_value.__aexit__ = AsyncMock(return_value=False)
             mock_httpx.return_value.__aenter__ = AsyncMock()
@@ -426,7 +426,7 @@ class TestVentaFlujoPeru:
 
         with patch("app.services.billing_service.get_async_session") as mock_get, \
              patch("app.services.billing_service.utc_now_naive", return_value=datetime(2026, 4, 15)), \
-             patch("httpx.AsyncClient") as mock_httpx:
+             patch("app.services.billing_service.http_client") as mock_httpx:
             mock_get.return_value.__aenter__ = AsyncMock(return_value=mock_session)
             mock_get.return_value.__aexit__ = AsyncMock(return_value=False)
             mock_httpx.return_value.__aenter__ = AsyncMock()
@@ -548,7 +548,7 @@ class TestVentaFlujoPeru:
         ]
 
         with patch("app.services.billing_service.get_async_session") as mock_get, \
-             patch("httpx.AsyncClient") as mock_httpx:
+             patch("app.services.billing_service.http_client") as mock_httpx:
             mock_get.return_value.__aenter__ = AsyncMock(return_value=mock_session)
             mock_get.return_value.__aexit__ = AsyncMock(return_value=False)
             mock_httpx.return_value.__aenter__ = AsyncMock()
@@ -598,7 +598,7 @@ class TestVentaFlujoPeru:
         mock_http_resp.json.return_value = rejected_resp
 
         with patch("app.services.billing_service.get_async_session") as mock_get, \
-             patch("httpx.AsyncClient") as mock_httpx:
+             patch("app.services.billing_service.http_client") as mock_httpx:
             mock_get.return_value.__aenter__ = AsyncMock(return_value=mock_session)
             mock_get.return_value.__aexit__ = AsyncMock(return_value=False)
             mock_httpx.return_value.__aenter__ = AsyncMock()
@@ -1155,7 +1155,7 @@ class TestFlujoPipelineCompleto:
         mock_http_resp.json.return_value = nubefact_resp
 
         with patch("app.services.billing_service.get_async_session") as mock_get, \
-             patch("httpx.AsyncClient") as mock_httpx:
+             patch("app.services.billing_service.http_client") as mock_httpx:
             mock_get.return_value.__aenter__ = AsyncMock(return_value=mock_session)
             mock_get.return_value.__aexit__ = AsyncMock(return_value=False)
             mock_httpx.return_value.__aenter__ = AsyncMock()
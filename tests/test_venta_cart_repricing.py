@@ -0,0 +1,183 @@
+"""Tests del recálculo de precios del carrito (CartMixin).
+
+Verifica:
+  1. Una sola query ``IN`` para todos los productos del carrito (no dos por línea).
+  2. ``min_cart_amount`` se evalúa contra el subtotal pre-promo de todo el carrito,
+     incluyendo componentes de kit (que no se re-resuelven).
+  3. Líneas editadas mientras corría el recálculo en background no se pisan.
+"""
+from __future__ import annotations
+
+import os
+from datetime import timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+os.environ.setdefault("AUTH_SECRET_KEY", "test-secret-key-cart-repricing-32chars-long")
+os.environ.setdefault("TENANT_STRICT", "0")
+
+from app.services.pricing import CartPricingSnapshot
+from app.utils.timezone import utc_now_naive
+
+
+def _make_state(items):
+    from app.states.venta.cart_mixin import CartMixin
+
+    state = MagicMock()
+    state.new_sale_items = items
+    state.selected_client = {}
+    state._round_currency = MagicMock(side_effect=lambda v: round(float(v), 2))
+    state._apply_cart_repricing = CartMixin._apply_cart_repricing.__get__(state)
+    return state
+
+
+def _make_product(id_, sale_price, category="General"):
+    return SimpleNamespace(id=id_, sale_price=Decimal(str(sale_price)), category=category)
+
+
+def _line(temp_id, product_id, quantity, *, kit_product_id=None, price=0):
+    return {
+        "temp_id": temp_id,
+        "product_id": product_id,
+        "variant_id": None,
+        "quantity": quantity,
+        "kit_product_id": kit_product_id,
+        "price": price,
+    }
+
+
+def _snapshot(promotions=()):
+    return CartPricingSnapshot(
+        price_list_items={},
+        tiers_by_variant={},
+        tiers_by_product={},
+        promotions=list(promotions),
+        product_ids_by_promo={},
+        now=utc_now_naive(),
+    )
+
+
+def _cart_threshold_promo(min_cart_amount):
+    now = utc_now_naive()
+    return SimpleNamespace(
+        id=5,
+        name="10% superando umbral",
+        promotion_type="percentage",
+        scope="all",
+        discount_value=Decimal("10"),
+        min_quantity=1,
+        free_quantity=0,
+        max_uses=None,
+        current_uses=0,
+        product_id=None,
+        category=None,
+        starts_at=now - timedelta(days=1),
+        ends_at=now + timedelta(days=1),
+        weekdays_mask=127,
+        time_from=None,
+        time_to=None,
+        coupon_code=None,
+        min_cart_amount=Decimal(str(min_cart_amount)),
+        max_units_per_transaction=None,
+    )
+
+
+def _session_cm(session):
+    cm = MagicMock()
+    cm.__aenter__ = AsyncMock(return_value=session)
+    cm.__aexit__ = AsyncMock(return_value=False)
+    return cm
+
+
+async def _reprice(lines, products, snapshot):
+    from app.states.venta.cart_mixin import CartMixin
+
+    session = MagicMock()
+    result = MagicMock()
+    result.all.return_value = products
+    session.exec = AsyncMock(return_value=result)
+    request = {
+        "company_id": 1,
+        "branch_id": 1,
+        "price_list_id": None,
+        "coupon": None,
+        "now": utc_now_naive(),
+        "global_margin": 0.3,
+        "lines": lines,
+    }
+    with patch("app.states.venta.cart_mixin.get_async_session", return_value=_session_cm(session)), \
+         patch("app.services.pricing_cache.get_cart_pricing_snapshot", AsyncMock(return_value=snapshot)):
+        repriced = await CartMixin._reprice_cart_lines(request)
+    return repriced, session
+
+
+@pytest.mark.asyncio
+async def test_one_product_query_for_whole_cart():
+    lines = [_line(f"t{i}", i, 1) for i in range(1, 51)]
+    products = [_make_product(i, "10.00") for i in range(1, 51)]
+
+    repriced, session = await _reprice(lines, products, _snapshot())
+
+    assert session.exec.await_count == 1
+    assert len(repriced) == 50
+    assert repriced["t7"]["final_price"] == Decimal("10.00")
+
+
+@pytest.mark.asyncio
+async def test_cart_threshold_uses_full_pre_promo_subtotal():
+    """60 (líneas) + 50 (kit) = 110 ≥ 100 → la promo aplica a las líneas."""
+    lines = [
+        _line("a", 1, 2),
+        _line("b", 2, 1),
+        _line("kit", 3, 1, kit_product_id=9, price=50),
+    ]
+    products = [_make_product(1, "20.00"), _make_product(2, "20.00")]
+
+    repriced, _ = await _reprice(lines, products, _snapshot([_cart_threshold_promo(100)]))
+
+    assert "kit" not in repriced
+    assert repriced["a"]["final_price"] == Decimal("18.00")
+    assert repriced["a"]["base_price"] == Decimal("20.00")
+    assert repriced["a"]["applied_promotion_id"] == 5
+
+
+@pytest.mark.asyncio
+async def test_cart_threshold_not_reached():
+    lines = [_line("a", 1, 2)]
+    products = [_make_product(1, "20.00")]
+
+    repriced, _ = await _reprice(lines, products, _snapshot([_cart_threshold_promo(100)]))
+
+    assert repriced["a"]["final_price"] == Decimal("20.00")
+    assert repriced["a"]["applied_promotion_id"] is None
+
+
+def test_apply_skips_lines_edited_meanwhile():
+    items = [
+        {"temp_id": "a", "product_id": 1, "quantity": 3, "price": 20.0},
+        {"temp_id": "b", "product_id": 2, "quantity": 1, "price": 20.0},
+    ]
+    state = _make_state(items)
+    result = {
+        "final_price": Decimal("18.00"),
+        "base_price": Decimal("20.00"),
+        "from_price_list": False,
+        "original_price": Decimal("20.00"),
+        "promotion_name": "Promo",
+        "applied_promotion_id": 5,
+        "promo_receipt_hint": None,
+    }
+
+    state._apply_cart_repricing({
+        # La cantidad de "a" cambió de 2 a 3 mientras se resolvía.
+        "a": {**result, "product_id": 1, "quantity": 2},
+        "b": {**result, "product_id": 2, "quantity": 1},
+    })
+
+    assert state.new_sale_items[0]["price"] == 20.0
+    assert state.new_sale_items[1]["price"] == 18.0
+    assert state.new_sale_items[1]["subtotal"] == "18.00"
+    assert state.new_sale_items[1]["applied_promotion_id"] == 5